@@ -5,7 +5,7 @@ from __future__ import annotations
 MVC архитектура с WebSockets для реального времени
 """
 from flask import Flask, Response, render_template, jsonify, request, session, redirect, url_for, g, send_from_directory, send_file
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_babel import Babel, _, lazy_gettext as _l
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -27,6 +27,7 @@ from controllers.plg_ai_controller import PlgAiController
 from models import doc_registry, module_registry
 from controllers.peco_supply_controller import PecoSupplyController
 from models.peco_gps import PecoGps
+from models.run_queue import ProgressFeed, start_embedded
 from controllers.colass_controller import ColassController
 import threading
 import time
@@ -647,6 +648,28 @@ def api_colass_estimate_items(estimate_id):
     return jsonify(ColassController.get_estimate_items(estimate_id, section_id=section_id))
 
 
+@app.route('/api/colass/estimates/<int:estimate_id>/items/bulk', methods=['POST'])
+def api_colass_estimate_items_bulk(estimate_id):
+    if not AuthController.is_authenticated():
+        return jsonify({"error": "unauthorized"}), 401
+    payload = request.get_json(force=True) or {}
+    return jsonify(ColassController.add_estimate_items(estimate_id, payload.get('items') or []))
+
+
+@app.route('/api/colass/estimates/verify-totals', methods=['GET', 'POST'])
+def api_colass_verify_totals():
+    if not AuthController.is_authenticated():
+        return jsonify({"error": "unauthorized"}), 401
+    if request.method == 'POST':
+        payload = request.get_json(force=True) or {}
+        estimate_id = payload.get('estimate_id')
+        return jsonify(ColassController.verify_estimate_totals(
+            estimate_id=int(estimate_id) if estimate_id else None,
+            repair=bool(payload.get('repair')),
+        ))
+    return jsonify(ColassController.verify_estimate_totals(estimate_id=request.args.get('estimate_id', type=int)))
+
+
 @app.route('/api/colass/estimates/<int:estimate_id>/add-work', methods=['POST'])
 def api_colass_estimate_add_work(estimate_id):
     if not AuthController.is_authenticated():
@@ -3288,6 +3311,11 @@ def api_plg_gen_cancel(run_id):
     return jsonify(PlanogramController.cancel_generation(run_id))
 
 
+@app.route('/api/plg/gen/runs/<int:run_id>/resume', methods=['POST'])
+def api_plg_gen_resume(run_id):
+    return jsonify(PlanogramController.resume_generation(run_id))
+
+
 # --- Прогноз заказов: алгоритмы и модели ---
 @app.route('/api/plg/forecast/algorithms', methods=['GET'])
 def api_plg_fct_algorithms():
@@ -3342,7 +3370,8 @@ def api_plg_fct_cancel(run_id):
 def api_plg_order_proposal(run_id):
     return jsonify(PlanogramController.get_order_proposal(
         run_id, request.args.get('store_id', type=int),
-        request.args.get('limit', 200, type=int), _plg_lang()))
+        request.args.get('limit', 200, type=int), _plg_lang(),
+        request.args.get('offset', 0, type=int)))
 
 
 # --- Логистика: РЦ, транспорт, рейсы, Гант ---
@@ -3881,7 +3910,7 @@ def api_plg_ai_features():
 
 @app.route('/api/plg/ai/similar', methods=['GET'])
 def api_plg_ai_similar():
-    """Похожие по поведению SKU — векторный поиск по HNSW-индексу 26ai."""
+    """Похожие по поведению SKU — векторный индекс прогона (IVF), для старых прогонов HNSW 26ai."""
     result = PlgAiController.similar_skus(
         _plg_lang(), request.args.get('store_id', type=int),
         request.args.get('product_id', type=int),
@@ -3911,9 +3940,11 @@ def api_plg_order_runs():
 
 @app.route('/api/plg/orders/proposal', methods=['GET'])
 def api_plg_adjusted_proposal():
+    """Автозаказ из снимка прогона; страница — offset/limit (без limit — целиком)."""
     return jsonify(PlgAiController.order_proposal(
         _plg_lang(), request.args.get('run_id', type=int),
-        request.args.get('store_id', type=int)))
+        request.args.get('store_id', type=int),
+        request.args.get('offset', 0, type=int), request.args.get('limit', type=int)))
 
 
 @app.route('/api/plg/orders/adjust', methods=['POST'])
@@ -4017,14 +4048,26 @@ def api_plg_fuel_algorithms():
 
 @app.route('/api/plg/fuel/autoorder', methods=['POST'])
 def api_plg_fuel_autoorder():
+    """Автозаказ: ставит прогон в очередь и отдаёт run_id ({"sync": true} — итог сразу)."""
     result = PecoSupplyController.run_autoorder(request.get_json() or {},
                                                 session.get('username', 'user'))
     return jsonify(result), (200 if result.get('success') else result.get('status', 400))
 
 
+@app.route('/api/plg/fuel/autoorder/runs/<int:run_id>', methods=['GET'])
+def api_plg_fuel_autoorder_run(run_id):
+    result = PecoSupplyController.autoorder_run(run_id)
+    return jsonify(result), (200 if result.get('success') else result.get('status', 400))
+
+
+@app.route('/api/plg/fuel/autoorder/runs/<int:run_id>/cancel', methods=['POST'])
+def api_plg_fuel_autoorder_cancel(run_id):
+    return jsonify(PecoSupplyController.cancel_autoorder(run_id))
+
+
 @app.route('/api/plg/fuel/backtest', methods=['POST'])
 def api_plg_fuel_backtest():
-    """Сравнение алгоритмов на истории отпуска: MAPE, смещение, покрытие."""
+    """Сравнение алгоритмов на истории отпуска: ставит прогон в очередь, отдаёт run_id."""
     result = PecoSupplyController.backtest(request.get_json() or {},
                                            session.get('username', 'user'))
     return jsonify(result), (200 if result.get('success') else result.get('status', 400))
@@ -4035,6 +4078,17 @@ def api_plg_fuel_backtest_results():
     return jsonify(PecoSupplyController.backtest_results(_plg_lang()))
 
 
+@app.route('/api/plg/fuel/backtest/runs/<int:run_id>', methods=['GET'])
+def api_plg_fuel_backtest_run(run_id):
+    result = PecoSupplyController.backtest_run(run_id, _plg_lang())
+    return jsonify(result), (200 if result.get('success') else result.get('status', 400))
+
+
+@app.route('/api/plg/fuel/backtest/runs/<int:run_id>/cancel', methods=['POST'])
+def api_plg_fuel_backtest_cancel(run_id):
+    return jsonify(PecoSupplyController.cancel_backtest(run_id))
+
+
 @app.route('/api/plg/fuel/paths', methods=['GET'])
 def api_plg_fuel_paths():
     """Пути снабжения: импорт / рынок ↔ своя или чужая нефтебаза ↔ АЗС."""
@@ -4138,7 +4192,7 @@ def api_plg_fuel_gps_events():
 @app.route('/api/plg/fuel/gps/analyze', methods=['POST'])
 def api_plg_fuel_gps_analyze():
     body = request.get_json() or {}
-    return jsonify(PecoSupplyController.analyze(body.get('trip_id')))
+    return jsonify(PecoSupplyController.analyze(body.get('trip_id'), bool(body.get('rebuild'))))
 
 
 @app.route('/api/peco/gps/ping', methods=['POST'])
@@ -4184,6 +4238,7 @@ def handle_disconnect():
     """Обработка отключения WebSocket"""
     # Удаляем все подписки пользователя
     sid = request.sid
+    plg_run_feed.unsubscribe(sid)
     for metric in list(active_subscriptions.keys()):
         if sid in active_subscriptions[metric]:
             active_subscriptions[metric].remove(sid)
@@ -4229,6 +4284,27 @@ def handle_unsubscribe_metric(data):
             del active_subscriptions[metric_name]
 
 
+# Прогресс фоновых прогонов «Планограмм» (models/run_queue.py): один опрос
+# очереди на процесс, изменения уходят подписанным вкладкам.
+plg_run_feed = ProgressFeed(lambda row: socketio.emit('plg_run_progress', row, room='plg_runs'))
+
+
+@socketio.on('plg_runs_subscribe')
+def handle_plg_runs_subscribe(data=None):
+    """Подписка на прогресс прогонов прогноза / генератора / ИИ-мониторинга"""
+    if not AuthController.is_authenticated():
+        emit('error', {'message': 'Authentication required'})
+        return
+    join_room('plg_runs')
+    plg_run_feed.subscribe(request.sid)
+
+
+@socketio.on('plg_runs_unsubscribe')
+def handle_plg_runs_unsubscribe(data=None):
+    leave_room('plg_runs')
+    plg_run_feed.unsubscribe(request.sid)
+
+
 def background_metric_updater():
     """Фоновая задача для обновления метрик через WebSocket"""
     while True:
@@ -5085,6 +5161,85 @@ def api_nufarul_operator_order_by_barcode():
     return jsonify(NufarulController.get_order_by_barcode(barcode))
 
 
+# ---------- Nufarul: фото заказов (потоковые BLOB + миниатюры) ----------
+@app.route('/api/nufarul-operator/order/<int:order_id>/photo', methods=['POST'])
+def api_nufarul_operator_order_photo(order_id):
+    """Фото заказа: тело image/* (потоком), multipart-файл photo/file или JSON с base64."""
+    if not AuthController.is_authenticated():
+        return jsonify({"success": False, "error": "Authentication required"}), 401
+    if (request.mimetype or '').startswith('image/'):
+        return jsonify(NufarulController.save_photo(
+            order_id, request.args.get('item_id', type=int), stream=request.stream,
+            mime_type=request.mimetype, photo_name=request.args.get('photo_name') or None))
+    upload = request.files.get('photo') or request.files.get('file')
+    if upload is not None:
+        return jsonify(NufarulController.save_photo(
+            order_id, request.form.get('item_id', type=int), stream=upload.stream,
+            mime_type=upload.mimetype or 'image/jpeg', photo_name=upload.filename or None))
+    data = request.get_json(silent=True) or {}
+    if not data.get('photo'):
+        return jsonify({"success": False, "error": "photo required"}), 400
+    try:
+        item_id = int(data['item_id']) if data.get('item_id') else None
+    except (TypeError, ValueError):
+        item_id = None
+    return jsonify(NufarulController.save_photo(
+        order_id, item_id, data['photo'], mime_type=data.get('mime_type') or 'image/jpeg',
+        photo_name=data.get('photo_name') or None))
+
+
+@app.route('/api/nufarul-operator/order/<int:order_id>/photos', methods=['GET'])
+def api_nufarul_operator_order_photos(order_id):
+    if not AuthController.is_authenticated():
+        return jsonify({"success": False, "error": "Authentication required"}), 401
+    include_data = request.args.get('include_data') in ('1', 'true')
+    return jsonify(NufarulController.get_order_photos(order_id, include_data=include_data))
+
+
+@app.route('/api/nufarul-operator/photo/<int:photo_id>', methods=['GET'])
+@app.route('/api/nufarul-operator/photo/<int:photo_id>/thumb', methods=['GET'])
+def api_nufarul_operator_photo(photo_id):
+    """Байты фото / миниатюры: из кеша на диске или кусками из BLOB. ETag = SHA-256 фото."""
+    if not AuthController.is_authenticated():
+        return jsonify({"success": False, "error": "Authentication required"}), 401
+    from models.nufarul_photos import photo_cache
+    thumb = request.path.endswith('/thumb')
+    info = NufarulController.get_photo(photo_id)
+    if not info.get('success'):
+        return jsonify(info), 404
+    meta = info['data']
+    if not meta.get('photo_sha256'):
+        # фото, сохранённое до миниатюр: досчитать один раз
+        NufarulController.backfill_photo(photo_id)
+        meta = (NufarulController.get_photo(photo_id).get('data') or meta)
+    if thumb and not meta.get('has_thumb'):
+        return jsonify({"success": False, "error": "Thumbnail not available"}), 404
+    sha = meta.get('photo_sha256')
+    mime = 'image/jpeg' if thumb else (meta.get('photo_mime') or 'application/octet-stream')
+    etag = (sha + ('-t' if thumb else '')) if sha else None
+    headers = {'Cache-Control': 'private, max-age=86400'}
+    if etag:
+        headers['ETag'] = f'"{etag}"'
+        if etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+    cached = photo_cache.path(sha + '.thumb' if thumb else sha) if sha else None
+    if cached:
+        rv = send_file(cached, mimetype=mime, etag=False, conditional=False)
+        rv.headers.update(headers)
+        return rv
+    if not thumb and meta.get('photo_size'):
+        headers['Content-Length'] = str(meta['photo_size'])
+    return Response(NufarulController.iter_photo(photo_id, thumb=thumb, sha256=sha),
+                    mimetype=mime, headers=headers)
+
+
+@app.route('/api/nufarul-operator/photo/<int:photo_id>', methods=['DELETE'])
+def api_nufarul_operator_photo_delete(photo_id):
+    if not AuthController.is_authenticated():
+        return jsonify({"success": False, "error": "Authentication required"}), 401
+    return jsonify(NufarulController.delete_photo(photo_id))
+
+
 # ---------- Nufarul: AI parse order (shared by operator + TS kiosk) ----------
 @app.route('/api/nufarul-operator/ai-parse-order', methods=['POST'])
 def api_nufarul_operator_ai_parse_order():
@@ -5105,9 +5260,8 @@ def api_nufarul_operator_ai_parse_order():
     # local rapidfuzz fallback
     try:
         from nufarul_ai_parser import parse_order as _local_parse
-        svc_result = NufarulController.get_services(active_only=True)
-        services = svc_result.get('data') or []
-        matches = _local_parse(text, services, threshold=threshold)
+        catalog = NufarulController.get_parse_catalog()
+        matches = _local_parse(text, catalog, threshold=threshold)
         return jsonify({"success": True, "matches": matches, "backend": "local"})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -7585,6 +7739,12 @@ def _b26(fn):
 def api_biro26_conn_test():
     return _b26(Biro26Controller.connection_test)
 
+@app.route('/api/biro26/cache/stats', methods=['GET'])
+def api_biro26_cache_stats():
+    """RO: contoarele hit/miss ale regiunilor de cache / EN: cache region counters."""
+    from models.biro26_cache import stats
+    return _b26(stats)
+
 @app.route('/api/biro26/mapping/g-params', methods=['GET'])
 def api_biro26_gparams():
     return _b26(Biro26Controller.list_g_params)
@@ -7899,22 +8059,37 @@ def _biro26_warm_site_config():
 
 threading.Thread(target=_biro26_warm_site_config, daemon=True).start()
 
+# RO: replica catalogului magazinului se incarca in fundal de la pornire
+# EN: load the shop catalog replica in the background at boot
+try:
+    from models.biro26_catalog import Biro26Catalog as _Biro26Catalog
+    _Biro26Catalog.start()
+except Exception:                                            # noqa: BLE001
+    pass
+
 @app.route('/api/biro26/img', methods=['GET'])
 def api_biro26_img():
     """RO: serveste pe HTTPS o imagine gazduita doar pe HTTP (impreso.md).
     Fara asta, browserul o blocheaza ca "mixed content" si produsul apare
     fara poza, desi URL-ul din baza e corect.
     EN: re-serve an HTTP-only image over HTTPS; without this the browser blocks
-    it as mixed content."""
-    from models.biro26_imgproxy import fetch
+    it as mixed content.
+    RO: imaginile se servesc din cache-ul pe disc (image_cache); ?w=160|320|640
+    da varianta micsorata pentru liste. ETag = SHA-256 continutului.
+    EN: served from the disk cache; ?w= gives the downsized listing variant."""
+    from models.biro26_imgproxy import image_cache
     u = request.args.get('u', '')
+    w = request.args.get('w', type=int)
     try:
-        data, ctype = fetch(u)
+        data, ctype, etag = image_cache.get(u, width=w)
     except Exception as e:
         return (str(e), 400)
     # RO: imaginile de produs nu se schimba des / EN: product images rarely change
-    return Response(data, mimetype=ctype,
-                    headers={'Cache-Control': 'public, max-age=86400'})
+    headers = {'Cache-Control': 'public, max-age=86400', 'ETag': f'"{etag}"',
+               'X-Content-Type-Options': 'nosniff'}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(data, mimetype=ctype, headers=headers)
 
 @app.route('/api/biro26/pt/algorithms', methods=['GET'])
 def api_biro26_pt_algorithms():
@@ -8852,18 +9027,24 @@ def api_biro26_shop_me():
 
 @app.route('/api/biro26/shop/products', methods=['GET'])
 def api_biro26_shop_products():
-    # public read-only catalog (same grid data as Marfă/Stoc)
-    return jsonify(Biro26Controller.get_products_stock())
+    # public read-only catalog (same grid data as Marfă/Stoc), served from
+    # the local replica (models/biro26_catalog.py) with a live fallback
+    return jsonify(Biro26Controller.shop_products())
 
 @app.route('/api/biro26/shop/tree', methods=['GET'])
 def api_biro26_shop_tree():
     # public read-only grupa->categorie facet tree (Amazon-style sidebar)
-    return jsonify(Biro26Controller.get_product_tree())
+    return jsonify(Biro26Controller.shop_tree())
 
 @app.route('/api/biro26/shop/brands', methods=['GET'])
 def api_biro26_shop_brands():
     # public read-only brand facet with counts
-    return jsonify(Biro26Controller.get_product_brands())
+    return jsonify(Biro26Controller.shop_brands())
+
+@app.route('/api/biro26/shop/facets', methods=['GET'])
+def api_biro26_shop_facets():
+    # public read-only facet counts (brand/grupa/categorie/price) for the current filter
+    return jsonify(Biro26Controller.shop_facets())
 
 @app.route('/api/biro26/shop/transport', methods=['GET'])
 def api_biro26_shop_transport():
@@ -9195,4 +9376,10 @@ if __name__ == '__main__':
     
     use_reloader = Config.ENVIRONMENT != "REMOTE"
     is_debug = Config.ENVIRONMENT != "REMOTE"
+
+    # Очередь прогонов PLG: без отдельного воркера (scripts/plg_worker.py)
+    # задания выполняет поток этого процесса. При перезагрузчике — только
+    # в дочернем процессе, который и обслуживает запросы.
+    if Config.PLG_QUEUE_EMBEDDED and (not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        start_embedded(Config.PLG_WORKER_SLOTS)
     socketio.run(app, host=Config.SERVER_HOST, port=Config.SERVER_PORT, debug=is_debug, use_reloader=use_reloader, allow_unsafe_werkzeug=True)
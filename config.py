@@ -230,7 +230,15 @@ class Config:
     
     # Dashboard обновления (в секундах)
     DASHBOARD_UPDATE_INTERVAL = 60  # 1 минута для каждого элемента
-    
+
+    # Очередь фоновых прогонов PLG (models/run_queue.py). Задания выполняет
+    # отдельный процесс scripts/plg_worker.py (на сервере — юнит
+    # artgranit-plg-worker из setup-https.sh); на локальной машине, где его
+    # обычно не запускают, тот же диспетчер поднимается потоком внутри app.py.
+    PLG_QUEUE_EMBEDDED = os.environ.get(
+        'PLG_QUEUE_EMBEDDED', '1' if IS_LOCAL else '0').strip() in ('1', 'true', 'yes')
+    PLG_WORKER_SLOTS = int(os.environ.get('PLG_WORKER_SLOTS', '2'))
+
     # Аутентификация (только из .env файла)
     DEFAULT_USERNAME = os.environ.get('DEFAULT_USERNAME') or os.environ.get('DB_USER', '')
     DEFAULT_PASSWORD = os.environ.get('DEFAULT_PASSWORD') or os.environ.get('DB_PASSWORD', '')
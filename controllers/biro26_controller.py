@@ -12,6 +12,7 @@ from flask import request, session
 
 from models.biro26_db import Biro26DB
 from models.biro26_oracle_store import Biro26Store, G_PARAMS, _rows
+from models.biro26_catalog import Biro26Catalog
 from models.biro26_sources import Biro26Sources
 from models import biro26_ai
 
@@ -278,7 +279,8 @@ class Biro26Controller:
             return {"success": False, "error": "data_doc is required"}
         return Biro26Store.calc_stock(
             d["data_doc"], d.get("dep_filter", ""),
-            d.get("cont_filter"), d.get("pfilt"))
+            d.get("cont_filter"), d.get("pfilt"),
+            mode="full" if d.get("mode") == "full" else "delta")
 
     @staticmethod
     def get_latest_stock_calc() -> Dict[str, Any]:
@@ -291,9 +293,9 @@ class Biro26Controller:
             limit=a.get("limit", 500, type=int), offset=a.get("offset", 0, type=int))
 
     @staticmethod
-    def get_products_stock() -> Dict[str, Any]:
+    def _products_stock_args() -> Dict[str, Any]:
         a = request.args
-        return Biro26Store.get_products_stock(
+        return dict(
             search=a.get("search"), gr1=a.get("gr1"),
             brand=a.get("brand"), categorie=a.get("categorie"),
             grupa=a.get("grupa"), cod=a.get("cod", type=int),
@@ -313,12 +315,41 @@ class Biro26Controller:
             sort=(a.get("sort") if a.get("sort") in
                   ("name", "name_desc", "price_asc", "price_desc") else "name"))
 
+    @staticmethod
+    def get_products_stock() -> Dict[str, Any]:
+        return Biro26Store.get_products_stock(**Biro26Controller._products_stock_args())
+
+    # ── public shop catalog: local replica, live fallback ──
+    @staticmethod
+    def shop_products() -> Dict[str, Any]:
+        """RO: grila magazinului din replica locala (Biro26Catalog) — acelasi
+        rezultat si aceeasi ordine ca get_products_stock.
+        EN: shop grid from the local replica — same rows, same order."""
+        return Biro26Catalog.products_stock(**Biro26Controller._products_stock_args())
+
+    @staticmethod
+    def shop_facets() -> Dict[str, Any]:
+        """RO: numaratorile fatetelor (brand/grupa/categorie/pret) pe filtrul curent.
+        EN: facet counts for the current filter."""
+        return Biro26Catalog.facets(**Biro26Controller._products_stock_args())
+
+    @staticmethod
+    def shop_tree() -> Dict[str, Any]:
+        return Biro26Catalog.product_tree()
+
+    @staticmethod
+    def shop_brands() -> Dict[str, Any]:
+        return Biro26Catalog.product_brands()
+
     @staticmethod
     def product_archive(cod: int) -> Dict[str, Any]:
         """RO: dezactivare/reactivare cartela (soft-delete nativ ISARHIV).
         EN: deactivate/reactivate a card (native ISARHIV soft-delete)."""
         d = request.get_json(silent=True) or {}
-        return Biro26Store.set_product_archived(cod, bool(d.get("archived", True)))
+        res = Biro26Store.set_product_archived(cod, bool(d.get("archived", True)))
+        if res.get("success"):
+            Biro26Catalog.nudge()
+        return res
 
     # ── shop display settings (admin: products per page, invoice start nr) ──
     @staticmethod
@@ -1299,9 +1330,12 @@ class Biro26Controller:
     @staticmethod
     def update_product(cod: int) -> Dict[str, Any]:
         d = request.get_json(silent=True) or {}
-        return Biro26Store.update_product(
+        res = Biro26Store.update_product(
             cod, univers=d.get("univers"), goods=d.get("goods"),
             image=d.get("image"), bc_add=d.get("bc_add"), bc_remove=d.get("bc_remove"))
+        if res.get("success"):
+            Biro26Catalog.nudge()   # RO/EN: magazinul vede editarea fara sa astepte ciclul
+        return res
 
     @staticmethod
     def tree_rename() -> Dict[str, Any]:
@@ -9,6 +9,7 @@ import json
 import re
 import unicodedata
 from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
 from email import message_from_bytes
 from email.header import decode_header
 from email.utils import parseaddr, parsedate_to_datetime
@@ -16,6 +17,7 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from config import Config
+from models.colass_catalog import ColassCatalogIndex, cached_catalog_index
 from models.database import DatabaseModel
 
 try:
@@ -107,6 +109,22 @@ def _safe_float(value: Any, default: float = 0.0) -> float:
         return default
 
 
+_AMOUNT_STEP = Decimal("0.0001")  # AMOUNT and TOTAL_* are NUMBER(18,4)
+
+
+def _money(value: Any) -> Decimal:
+    """Amount exactly as NUMBER(18,4) stores it, so running totals add up without drift."""
+    return Decimal(repr(_safe_float(value))).quantize(_AMOUNT_STEP, rounding=ROUND_HALF_UP)
+
+
+def _dml(db: DatabaseModel, sql: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """execute_query that raises on error: totals must never be written after a failed item write or aggregate."""
+    r = db.execute_query(sql, params)
+    if not r.get("success"):
+        raise RuntimeError(r.get("message") or "query failed")
+    return r
+
+
 def _norm_text(value: str) -> str:
     s = str(value or "").strip().lower()
     if not s:
@@ -252,8 +270,20 @@ class ColassController:
 
     @staticmethod
     def _recalc_totals(db: DatabaseModel, estimate_id: int) -> None:
-        """Recalculate estimate totals by resource types + section totals."""
-        r = db.execute_query(
+        """
+        Recalculate estimate totals by resource types + section totals from all items.
+
+        Single item writes maintain totals incrementally (_apply_totals_delta); the full
+        pass is for bulk imports (add_estimate_items) and repairs (verify_estimate_totals).
+
+        The estimate row is locked before aggregating: a concurrent single-item write bumps
+        the same row, so it either commits before the aggregate reads the items or applies
+        its delta after the absolute totals are written, never in between. Every statement
+        raises on error, so a failed aggregate cannot overwrite the totals with zeros.
+        """
+        _dml(db, "SELECT ID FROM CLS_ESTIMATES WHERE ID = :eid FOR UPDATE", {"eid": estimate_id})
+        r = _dml(
+            db,
             """
             SELECT NVL(rt.CODE, 'OTHER') AS TYPE_CODE,
                    NVL(SUM(i.AMOUNT), 0) AS TOTAL_AMOUNT
@@ -271,7 +301,8 @@ class ColassController:
         total_utilaje = by_type.get("UTILAJE", 0.0)
         total_amount = sum(by_type.values())
 
-        db.execute_query(
+        _dml(
+            db,
             """
             UPDATE CLS_ESTIMATES
             SET TOTAL_MANOPERA = :m1,
@@ -290,7 +321,8 @@ class ColassController:
             },
         )
 
-        sec = db.execute_query(
+        sec = _dml(
+            db,
             """
             SELECT SECTION_ID, NVL(SUM(AMOUNT), 0) AS TOTAL_AMOUNT
             FROM CLS_ESTIMATE_ITEMS
@@ -301,13 +333,15 @@ class ColassController:
         )
         sec_totals = {int(x["section_id"]): _safe_float(x["total_amount"]) for x in _rows(sec)}
 
-        all_sections = db.execute_query(
+        all_sections = _dml(
+            db,
             "SELECT ID FROM CLS_ESTIMATE_SECTIONS WHERE ESTIMATE_ID = :eid",
             {"eid": estimate_id},
         )
         for section in _rows(all_sections):
             sid = int(section["id"])
-            db.execute_query(
+            _dml(
+                db,
                 """
                 UPDATE CLS_ESTIMATE_SECTIONS
                 SET TOTAL_AMOUNT = :total,
@@ -317,6 +351,60 @@ class ColassController:
                 {"sid": sid, "total": sec_totals.get(sid, 0.0)},
             )
 
+    @staticmethod
+    def _totals_delta(delta: Dict[str, Dict[Any, Decimal]], type_id: Any, section_id: Any, amount: Decimal) -> None:
+        """Accumulate an item amount change per resource type and per section."""
+        types = delta.setdefault("types", {})
+        tid = ColassController._to_int(type_id)
+        types[tid] = types.get(tid, Decimal(0)) + amount
+        sid = ColassController._to_int(section_id)
+        if sid is not None:
+            sections = delta.setdefault("sections", {})
+            sections[sid] = sections.get(sid, Decimal(0)) + amount
+
+    @staticmethod
+    def _apply_totals_delta(db: DatabaseModel, estimate_id: int, delta: Dict[str, Dict[Any, Decimal]]) -> None:
+        """
+        Bump estimate and section totals by accumulated item deltas, in the item write transaction.
+
+        Same buckets as _recalc_totals: the resource type code picks TOTAL_MANOPERA /
+        TOTAL_MATERIALE / TOTAL_UTILAJE, every amount goes to TOTAL_AMOUNT, section totals
+        only count sections of this estimate. Totals are added to, not overwritten, so
+        concurrent edits of one estimate serialize on its row instead of losing updates.
+        """
+        for type_id, amount in (delta.get("types") or {}).items():
+            if not amount:
+                continue
+            _dml(
+                db,
+                """
+                UPDATE CLS_ESTIMATES
+                SET TOTAL_MANOPERA = TOTAL_MANOPERA
+                        + CASE (SELECT CODE FROM CLS_RESOURCE_TYPES WHERE ID = :tid) WHEN 'MANOPERA' THEN :amount ELSE 0 END,
+                    TOTAL_MATERIALE = TOTAL_MATERIALE
+                        + CASE (SELECT CODE FROM CLS_RESOURCE_TYPES WHERE ID = :tid) WHEN 'MATERIALE' THEN :amount ELSE 0 END,
+                    TOTAL_UTILAJE = TOTAL_UTILAJE
+                        + CASE (SELECT CODE FROM CLS_RESOURCE_TYPES WHERE ID = :tid) WHEN 'UTILAJE' THEN :amount ELSE 0 END,
+                    TOTAL_AMOUNT = TOTAL_AMOUNT + :amount,
+                    UPDATED_AT = SYSTIMESTAMP
+                WHERE ID = :eid
+                """,
+                {"eid": estimate_id, "tid": type_id, "amount": amount},
+            )
+        for section_id, amount in (delta.get("sections") or {}).items():
+            if not amount:
+                continue
+            _dml(
+                db,
+                """
+                UPDATE CLS_ESTIMATE_SECTIONS
+                SET TOTAL_AMOUNT = TOTAL_AMOUNT + :amount,
+                    UPDATED_AT = SYSTIMESTAMP
+                WHERE ID = :sid AND ESTIMATE_ID = :eid
+                """,
+                {"eid": estimate_id, "sid": section_id, "amount": amount},
+            )
+
     @staticmethod
     def get_catalog_tree(search: Optional[str] = None) -> Dict[str, Any]:
         """Hierarchy tree for catalog: level1 -> level2 -> level3 -> works."""
@@ -539,58 +627,64 @@ class ColassController:
         except Exception as e:
             return {"success": False, "error": str(e), "data": [], "count": 0}
 
+    @staticmethod
+    def _item_values(estimate_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Bind values for a new CLS_ESTIMATE_ITEMS row; ValueError if the payload is incomplete."""
+        qty = _safe_float(payload.get("qty"), 0.0)
+        price = _safe_float(payload.get("price"), 0.0)
+        item_name = (payload.get("item_name") or "").strip()
+        if not item_name:
+            raise ValueError("item_name required")
+        return {
+            "estimate_id": estimate_id,
+            "section_id": payload.get("section_id"),
+            "work_id": payload.get("work_id"),
+            "resource_type_id": payload.get("resource_type_id"),
+            "resource_id": payload.get("resource_id"),
+            "item_code": (payload.get("item_code") or "").strip() or None,
+            "item_name": item_name,
+            "unit": (payload.get("unit") or "").strip() or None,
+            "qty": qty,
+            "price": price,
+            "amount": _money(_safe_float(payload.get("amount"), qty * price)),
+            "notes": (payload.get("notes") or "").strip() or None,
+            "source_doc": (payload.get("source_doc") or "MANUAL").strip()[:30],
+            "source_row": payload.get("source_row"),
+            "created_by": (payload.get("created_by") or "ui").strip()[:120],
+        }
+
+    @staticmethod
+    def _insert_item(db: DatabaseModel, values: Dict[str, Any], delta: Optional[Dict[str, Dict[Any, Decimal]]]) -> None:
+        """Insert one estimate item; its amount goes to delta unless totals are deferred (delta=None)."""
+        _dml(
+            db,
+            """
+            INSERT INTO CLS_ESTIMATE_ITEMS
+                (ESTIMATE_ID, SECTION_ID, WORK_ID, RESOURCE_TYPE_ID, RESOURCE_ID,
+                 ITEM_CODE, ITEM_NAME, UNIT, QTY, PRICE, AMOUNT,
+                 NOTES, SOURCE_DOC, SOURCE_ROW, CREATED_BY)
+            VALUES
+                (:estimate_id, :section_id, :work_id, :resource_type_id, :resource_id,
+                 :item_code, :item_name, :unit, :qty, :price, :amount,
+                 :notes, :source_doc, :source_row, :created_by)
+            """,
+            values,
+        )
+        if delta is not None:
+            ColassController._totals_delta(delta, values["resource_type_id"], values["section_id"], values["amount"])
+
     @staticmethod
     def add_estimate_item(estimate_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            section_id = payload.get("section_id")
-            work_id = payload.get("work_id")
-            resource_type_id = payload.get("resource_type_id")
-            resource_id = payload.get("resource_id")
-            item_code = (payload.get("item_code") or "").strip() or None
-            item_name = (payload.get("item_name") or "").strip()
-            unit = (payload.get("unit") or "").strip() or None
-            qty = _safe_float(payload.get("qty"), 0.0)
-            price = _safe_float(payload.get("price"), 0.0)
-            amount = _safe_float(payload.get("amount"), qty * price)
-            notes = (payload.get("notes") or "").strip() or None
-            created_by = (payload.get("created_by") or "ui").strip()[:120]
-            source_doc = (payload.get("source_doc") or "MANUAL").strip()[:30]
-            source_row = payload.get("source_row")
-
-            if not item_name:
-                return {"success": False, "error": "item_name required"}
+            try:
+                values = ColassController._item_values(estimate_id, payload)
+            except ValueError as e:
+                return {"success": False, "error": str(e)}
 
             with DatabaseModel() as db:
-                db.execute_query(
-                    """
-                    INSERT INTO CLS_ESTIMATE_ITEMS
-                        (ESTIMATE_ID, SECTION_ID, WORK_ID, RESOURCE_TYPE_ID, RESOURCE_ID,
-                         ITEM_CODE, ITEM_NAME, UNIT, QTY, PRICE, AMOUNT,
-                         NOTES, SOURCE_DOC, SOURCE_ROW, CREATED_BY)
-                    VALUES
-                        (:estimate_id, :section_id, :work_id, :resource_type_id, :resource_id,
-                         :item_code, :item_name, :unit, :qty, :price, :amount,
-                         :notes, :source_doc, :source_row, :created_by)
-                    """,
-                    {
-                        "estimate_id": estimate_id,
-                        "section_id": section_id,
-                        "work_id": work_id,
-                        "resource_type_id": resource_type_id,
-                        "resource_id": resource_id,
-                        "item_code": item_code,
-                        "item_name": item_name,
-                        "unit": unit,
-                        "qty": qty,
-                        "price": price,
-                        "amount": amount,
-                        "notes": notes,
-                        "source_doc": source_doc,
-                        "source_row": source_row,
-                        "created_by": created_by,
-                    },
-                )
-                ColassController._recalc_totals(db, estimate_id)
+                delta: Dict[str, Dict[Any, Decimal]] = {}
+                ColassController._insert_item(db, values, delta)
+                ColassController._apply_totals_delta(db, estimate_id, delta)
                 db.connection.commit()
 
                 rid = db.execute_query(
@@ -603,13 +697,62 @@ class ColassController:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @staticmethod
+    def add_estimate_items(estimate_id: int, items: List[Dict[str, Any]], created_by: str = "ui") -> Dict[str, Any]:
+        """
+        Bulk add to an estimate in one transaction: catalog works ({"work_id", "section_id",
+        "multiplier"}) and plain items (same payload as add_estimate_item).
+
+        Totals are not bumped per item: one _recalc_totals pass runs before commit.
+        Any failed item rolls back the whole batch.
+        """
+        try:
+            if not items:
+                return {"success": True, "inserted": 0, "estimate_id": estimate_id}
+            rows = []
+            for item in items:
+                if item.get("work_id"):
+                    rows.append(("work", item))
+                    continue
+                try:
+                    rows.append(("item", ColassController._item_values(estimate_id, {"created_by": created_by, **item})))
+                except ValueError as e:
+                    return {"success": False, "error": str(e)}
+
+            with DatabaseModel() as db:
+                inserted = 0
+                for kind, item in rows:
+                    if kind == "work":
+                        inserted += ColassController._insert_work(
+                            db,
+                            estimate_id,
+                            int(item["work_id"]),
+                            section_id=item.get("section_id"),
+                            multiplier=_safe_float(item.get("multiplier"), 1.0),
+                            created_by=created_by,
+                            delta=None,
+                        )
+                    else:
+                        ColassController._insert_item(db, item, None)
+                        inserted += 1
+                ColassController._recalc_totals(db, estimate_id)
+                db.connection.commit()
+                return {"success": True, "inserted": inserted, "estimate_id": estimate_id}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
     @staticmethod
     def update_estimate_item(item_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
         try:
             with DatabaseModel() as db:
                 base = _rows(
                     db.execute_query(
-                        "SELECT ID, ESTIMATE_ID, SECTION_ID, QTY, PRICE, AMOUNT, NOTES FROM CLS_ESTIMATE_ITEMS WHERE ID = :id",
+                        """
+                        SELECT ID, ESTIMATE_ID, SECTION_ID, RESOURCE_TYPE_ID, QTY, PRICE, AMOUNT, NOTES
+                        FROM CLS_ESTIMATE_ITEMS
+                        WHERE ID = :id
+                        FOR UPDATE
+                        """,
                         {"id": item_id},
                     )
                 )
@@ -623,10 +766,11 @@ class ColassController:
                 amount = payload.get("amount")
                 if amount is None:
                     amount = qty * price
-                amount = _safe_float(amount, qty * price)
+                amount = _money(_safe_float(amount, qty * price))
                 notes = payload.get("notes", cur.get("notes"))
 
-                db.execute_query(
+                _dml(
+                    db,
                     """
                     UPDATE CLS_ESTIMATE_ITEMS
                     SET SECTION_ID = :section_id,
@@ -646,7 +790,10 @@ class ColassController:
                         "notes": notes,
                     },
                 )
-                ColassController._recalc_totals(db, int(cur["estimate_id"]))
+                delta: Dict[str, Dict[Any, Decimal]] = {}
+                ColassController._totals_delta(delta, cur.get("resource_type_id"), cur.get("section_id"), -_money(cur.get("amount")))
+                ColassController._totals_delta(delta, cur.get("resource_type_id"), section_id, amount)
+                ColassController._apply_totals_delta(db, int(cur["estimate_id"]), delta)
                 db.connection.commit()
                 return {"success": True}
         except Exception as e:
@@ -658,16 +805,24 @@ class ColassController:
             with DatabaseModel() as db:
                 item = _rows(
                     db.execute_query(
-                        "SELECT ESTIMATE_ID FROM CLS_ESTIMATE_ITEMS WHERE ID = :id",
+                        """
+                        SELECT ESTIMATE_ID, SECTION_ID, RESOURCE_TYPE_ID, AMOUNT
+                        FROM CLS_ESTIMATE_ITEMS
+                        WHERE ID = :id
+                        FOR UPDATE
+                        """,
                         {"id": item_id},
                     )
                 )
                 if not item:
                     return {"success": False, "error": "Item not found"}
-                estimate_id = int(item[0]["estimate_id"])
+                cur = item[0]
+                estimate_id = int(cur["estimate_id"])
 
-                db.execute_query("DELETE FROM CLS_ESTIMATE_ITEMS WHERE ID = :id", {"id": item_id})
-                ColassController._recalc_totals(db, estimate_id)
+                _dml(db, "DELETE FROM CLS_ESTIMATE_ITEMS WHERE ID = :id", {"id": item_id})
+                delta: Dict[str, Dict[Any, Decimal]] = {}
+                ColassController._totals_delta(delta, cur.get("resource_type_id"), cur.get("section_id"), -_money(cur.get("amount")))
+                ColassController._apply_totals_delta(db, estimate_id, delta)
                 db.connection.commit()
                 return {"success": True}
         except Exception as e:
@@ -726,125 +881,298 @@ class ColassController:
             return {"success": False, "error": str(e), "estimate": None, "by_type": [], "by_sections": []}
 
     @staticmethod
-    def add_work_to_estimate(
-        estimate_id: int,
-        work_id: int,
-        section_id: Optional[int] = None,
-        multiplier: float = 1.0,
-        created_by: str = "ui",
-    ) -> Dict[str, Any]:
-        """Add work resources to estimate as rows in CLS_ESTIMATE_ITEMS."""
+    def verify_estimate_totals(estimate_id: Optional[int] = None, repair: bool = False) -> Dict[str, Any]:
+        """
+        Compare maintained estimate / section totals with a full recalculation from items.
+
+        Checks one estimate or all of them. mismatches lists every total that differs
+        (field, stored, calculated); repair=True recalculates those estimates with
+        _recalc_totals and commits.
+        """
         try:
-            multiplier = max(0.0, _safe_float(multiplier, 1.0))
             with DatabaseModel() as db:
-                work_rows = _rows(
+                params = {"eid": estimate_id}
+                checked = _rows(
                     db.execute_query(
-                        """
-                        SELECT ID, WORK_NO, WORK_CODE, WORK_NAME, UNIT, PRICE, AMOUNT
-                        FROM CLS_WORK_CATALOG
-                        WHERE ID = :id
-                        """,
-                        {"id": work_id},
+                        "SELECT COUNT(*) AS CNT FROM CLS_ESTIMATES WHERE (:eid IS NULL OR ID = :eid)",
+                        params,
                     )
                 )
-                if not work_rows:
-                    return {"success": False, "error": "Work not found"}
-                work = work_rows[0]
-
-                if section_id is None:
-                    first_section = _rows(
-                        db.execute_query(
-                            "SELECT ID FROM CLS_ESTIMATE_SECTIONS WHERE ESTIMATE_ID = :eid ORDER BY SORT_ORDER, ID",
-                            {"eid": estimate_id},
-                        )
-                    )
-                    section_id = first_section[0].get("id") if first_section else None
-
-                res_rows = _rows(
+                estimates = _rows(
                     db.execute_query(
                         """
-                        SELECT wr.RESOURCE_ID, wr.RESOURCE_CODE, wr.RESOURCE_NAME,
-                               wr.UNIT, wr.QTY_NORM, wr.UNIT_PRICE, wr.AMOUNT,
-                               r.TYPE_ID AS RESOURCE_TYPE_ID
-                        FROM CLS_WORK_RESOURCES wr
-                        LEFT JOIN CLS_RESOURCES r ON r.ID = wr.RESOURCE_ID
-                        WHERE wr.WORK_ID = :wid
-                        ORDER BY wr.SORT_ORDER, wr.ID
+                        SELECT * FROM (
+                            SELECT e.ID AS ESTIMATE_ID,
+                                   e.TOTAL_MANOPERA, e.TOTAL_MATERIALE, e.TOTAL_UTILAJE, e.TOTAL_AMOUNT,
+                                   NVL(SUM(CASE WHEN rt.CODE = 'MANOPERA' THEN i.AMOUNT END), 0) AS CALC_MANOPERA,
+                                   NVL(SUM(CASE WHEN rt.CODE = 'MATERIALE' THEN i.AMOUNT END), 0) AS CALC_MATERIALE,
+                                   NVL(SUM(CASE WHEN rt.CODE = 'UTILAJE' THEN i.AMOUNT END), 0) AS CALC_UTILAJE,
+                                   NVL(SUM(i.AMOUNT), 0) AS CALC_AMOUNT
+                            FROM CLS_ESTIMATES e
+                            LEFT JOIN CLS_ESTIMATE_ITEMS i ON i.ESTIMATE_ID = e.ID
+                            LEFT JOIN CLS_RESOURCE_TYPES rt ON rt.ID = i.RESOURCE_TYPE_ID
+                            WHERE (:eid IS NULL OR e.ID = :eid)
+                            GROUP BY e.ID, e.TOTAL_MANOPERA, e.TOTAL_MATERIALE, e.TOTAL_UTILAJE, e.TOTAL_AMOUNT
+                        )
+                        WHERE TOTAL_MANOPERA <> CALC_MANOPERA OR TOTAL_MATERIALE <> CALC_MATERIALE
+                           OR TOTAL_UTILAJE <> CALC_UTILAJE OR TOTAL_AMOUNT <> CALC_AMOUNT
+                        ORDER BY ESTIMATE_ID
                         """,
-                        {"wid": work_id},
+                        params,
                     )
                 )
-
-                inserted = 0
-                if res_rows:
-                    for res in res_rows:
-                        qty = _safe_float(res.get("qty_norm"), 0.0) * multiplier
-                        price = _safe_float(res.get("unit_price"), 0.0)
-                        amount = qty * price
-                        if amount == 0:
-                            amount = _safe_float(res.get("amount"), 0.0) * multiplier
-
-                        db.execute_query(
-                            """
-                            INSERT INTO CLS_ESTIMATE_ITEMS
-                                (ESTIMATE_ID, SECTION_ID, WORK_ID, RESOURCE_TYPE_ID, RESOURCE_ID,
-                                 ITEM_CODE, ITEM_NAME, UNIT, QTY, PRICE, AMOUNT,
-                                 SOURCE_DOC, CREATED_BY)
-                            VALUES
-                                (:estimate_id, :section_id, :work_id, :resource_type_id, :resource_id,
-                                 :item_code, :item_name, :unit, :qty, :price, :amount,
-                                 'F5', :created_by)
-                            """,
-                            {
-                                "estimate_id": estimate_id,
-                                "section_id": section_id,
-                                "work_id": work_id,
-                                "resource_type_id": res.get("resource_type_id"),
-                                "resource_id": res.get("resource_id"),
-                                "item_code": res.get("resource_code") or work.get("work_code"),
-                                "item_name": res.get("resource_name") or work.get("work_name"),
-                                "unit": res.get("unit") or work.get("unit"),
-                                "qty": qty,
-                                "price": price,
-                                "amount": amount,
-                                "created_by": created_by[:120],
-                            },
-                        )
-                        inserted += 1
-                else:
-                    qty = max(multiplier, 1.0)
-                    price = _safe_float(work.get("price"), 0.0)
-                    amount = qty * price
-                    if amount == 0:
-                        amount = _safe_float(work.get("amount"), 0.0) * qty
+                sections = _rows(
                     db.execute_query(
                         """
-                        INSERT INTO CLS_ESTIMATE_ITEMS
-                            (ESTIMATE_ID, SECTION_ID, WORK_ID, ITEM_CODE, ITEM_NAME, UNIT, QTY, PRICE, AMOUNT, SOURCE_DOC, CREATED_BY)
-                        VALUES
-                            (:estimate_id, :section_id, :work_id, :item_code, :item_name, :unit, :qty, :price, :amount, 'F5', :created_by)
+                        SELECT * FROM (
+                            SELECT s.ESTIMATE_ID, s.ID AS SECTION_ID, s.TOTAL_AMOUNT,
+                                   NVL(SUM(i.AMOUNT), 0) AS CALC_AMOUNT
+                            FROM CLS_ESTIMATE_SECTIONS s
+                            LEFT JOIN CLS_ESTIMATE_ITEMS i ON i.SECTION_ID = s.ID AND i.ESTIMATE_ID = s.ESTIMATE_ID
+                            WHERE (:eid IS NULL OR s.ESTIMATE_ID = :eid)
+                            GROUP BY s.ESTIMATE_ID, s.ID, s.TOTAL_AMOUNT
+                        )
+                        WHERE TOTAL_AMOUNT <> CALC_AMOUNT
+                        ORDER BY ESTIMATE_ID, SECTION_ID
                         """,
+                        params,
+                    )
+                )
+
+                mismatches: List[Dict[str, Any]] = []
+                for row in estimates:
+                    for field in ("manopera", "materiale", "utilaje", "amount"):
+                        stored = _safe_float(row.get(f"total_{field}"))
+                        calculated = _safe_float(row.get(f"calc_{field}"))
+                        if stored != calculated:
+                            mismatches.append(
+                                {
+                                    "estimate_id": row.get("estimate_id"),
+                                    "section_id": None,
+                                    "field": f"TOTAL_{field.upper()}",
+                                    "stored": stored,
+                                    "calculated": calculated,
+                                }
+                            )
+                for row in sections:
+                    mismatches.append(
                         {
-                            "estimate_id": estimate_id,
-                            "section_id": section_id,
-                            "work_id": work_id,
-                            "item_code": work.get("work_code"),
-                            "item_name": work.get("work_name"),
-                            "unit": work.get("unit"),
-                            "qty": qty,
-                            "price": price,
-                            "amount": amount,
-                            "created_by": created_by[:120],
-                        },
+                            "estimate_id": row.get("estimate_id"),
+                            "section_id": row.get("section_id"),
+                            "field": "SECTION_TOTAL_AMOUNT",
+                            "stored": _safe_float(row.get("total_amount")),
+                            "calculated": _safe_float(row.get("calc_amount")),
+                        }
                     )
-                    inserted = 1
 
-                ColassController._recalc_totals(db, estimate_id)
+                repaired: List[int] = []
+                if repair and mismatches:
+                    repaired = sorted({int(m["estimate_id"]) for m in mismatches})
+                    for eid in repaired:
+                        ColassController._recalc_totals(db, eid)
+                    db.connection.commit()
+
+                return {
+                    "success": True,
+                    "checked": int(checked[0].get("cnt") or 0) if checked else 0,
+                    "mismatches": mismatches,
+                    "repaired": repaired,
+                }
+        except Exception as e:
+            return {"success": False, "error": str(e), "checked": 0, "mismatches": [], "repaired": []}
+
+    @staticmethod
+    def _insert_work(
+        db: DatabaseModel,
+        estimate_id: int,
+        work_id: int,
+        section_id: Optional[int] = None,
+        multiplier: float = 1.0,
+        created_by: str = "ui",
+        delta: Optional[Dict[str, Dict[Any, Decimal]]] = None,
+    ) -> int:
+        """Insert a catalog work as its resource rows (or one row); ValueError if the work is missing."""
+        multiplier = max(0.0, _safe_float(multiplier, 1.0))
+        work_rows = _rows(
+            db.execute_query(
+                """
+                SELECT ID, WORK_NO, WORK_CODE, WORK_NAME, UNIT, PRICE, AMOUNT
+                FROM CLS_WORK_CATALOG
+                WHERE ID = :id
+                """,
+                {"id": work_id},
+            )
+        )
+        if not work_rows:
+            raise ValueError("Work not found")
+        work = work_rows[0]
+
+        if section_id is None:
+            first_section = _rows(
+                db.execute_query(
+                    "SELECT ID FROM CLS_ESTIMATE_SECTIONS WHERE ESTIMATE_ID = :eid ORDER BY SORT_ORDER, ID",
+                    {"eid": estimate_id},
+                )
+            )
+            section_id = first_section[0].get("id") if first_section else None
+
+        res_rows = _rows(
+            db.execute_query(
+                """
+                SELECT wr.RESOURCE_ID, wr.RESOURCE_CODE, wr.RESOURCE_NAME,
+                       wr.UNIT, wr.QTY_NORM, wr.UNIT_PRICE, wr.AMOUNT,
+                       r.TYPE_ID AS RESOURCE_TYPE_ID
+                FROM CLS_WORK_RESOURCES wr
+                LEFT JOIN CLS_RESOURCES r ON r.ID = wr.RESOURCE_ID
+                WHERE wr.WORK_ID = :wid
+                ORDER BY wr.SORT_ORDER, wr.ID
+                """,
+                {"wid": work_id},
+            )
+        )
+
+        inserted = 0
+        if res_rows:
+            for res in res_rows:
+                qty = _safe_float(res.get("qty_norm"), 0.0) * multiplier
+                price = _safe_float(res.get("unit_price"), 0.0)
+                amount = qty * price
+                if amount == 0:
+                    amount = _safe_float(res.get("amount"), 0.0) * multiplier
+                amount = _money(amount)
+
+                _dml(
+                    db,
+                    """
+                    INSERT INTO CLS_ESTIMATE_ITEMS
+                        (ESTIMATE_ID, SECTION_ID, WORK_ID, RESOURCE_TYPE_ID, RESOURCE_ID,
+                         ITEM_CODE, ITEM_NAME, UNIT, QTY, PRICE, AMOUNT,
+                         SOURCE_DOC, CREATED_BY)
+                    VALUES
+                        (:estimate_id, :section_id, :work_id, :resource_type_id, :resource_id,
+                         :item_code, :item_name, :unit, :qty, :price, :amount,
+                         'F5', :created_by)
+                    """,
+                    {
+                        "estimate_id": estimate_id,
+                        "section_id": section_id,
+                        "work_id": work_id,
+                        "resource_type_id": res.get("resource_type_id"),
+                        "resource_id": res.get("resource_id"),
+                        "item_code": res.get("resource_code") or work.get("work_code"),
+                        "item_name": res.get("resource_name") or work.get("work_name"),
+                        "unit": res.get("unit") or work.get("unit"),
+                        "qty": qty,
+                        "price": price,
+                        "amount": amount,
+                        "created_by": created_by[:120],
+                    },
+                )
+                if delta is not None:
+                    ColassController._totals_delta(delta, res.get("resource_type_id"), section_id, amount)
+                inserted += 1
+        else:
+            qty = max(multiplier, 1.0)
+            price = _safe_float(work.get("price"), 0.0)
+            amount = qty * price
+            if amount == 0:
+                amount = _safe_float(work.get("amount"), 0.0) * qty
+            amount = _money(amount)
+            _dml(
+                db,
+                """
+                INSERT INTO CLS_ESTIMATE_ITEMS
+                    (ESTIMATE_ID, SECTION_ID, WORK_ID, ITEM_CODE, ITEM_NAME, UNIT, QTY, PRICE, AMOUNT, SOURCE_DOC, CREATED_BY)
+                VALUES
+                    (:estimate_id, :section_id, :work_id, :item_code, :item_name, :unit, :qty, :price, :amount, 'F5', :created_by)
+                """,
+                {
+                    "estimate_id": estimate_id,
+                    "section_id": section_id,
+                    "work_id": work_id,
+                    "item_code": work.get("work_code"),
+                    "item_name": work.get("work_name"),
+                    "unit": work.get("unit"),
+                    "qty": qty,
+                    "price": price,
+                    "amount": amount,
+                    "created_by": created_by[:120],
+                },
+            )
+            if delta is not None:
+                ColassController._totals_delta(delta, None, section_id, amount)
+            inserted = 1
+        return inserted
+
+    @staticmethod
+    def add_work_to_estimate(
+        estimate_id: int,
+        work_id: int,
+        section_id: Optional[int] = None,
+        multiplier: float = 1.0,
+        created_by: str = "ui",
+    ) -> Dict[str, Any]:
+        """Add work resources to estimate as rows in CLS_ESTIMATE_ITEMS."""
+        try:
+            with DatabaseModel() as db:
+                delta: Dict[str, Dict[Any, Decimal]] = {}
+                try:
+                    inserted = ColassController._insert_work(
+                        db, estimate_id, work_id, section_id, multiplier, created_by, delta
+                    )
+                except ValueError as e:
+                    return {"success": False, "error": str(e)}
+                ColassController._apply_totals_delta(db, estimate_id, delta)
                 db.connection.commit()
                 return {"success": True, "inserted": inserted, "work_id": work_id, "estimate_id": estimate_id}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @staticmethod
+    def _catalog_version() -> Any:
+        """Catalog version from CLS_CATALOG_VERSION; None when the table is missing (sql/123)."""
+        try:
+            with DatabaseModel() as db:
+                rows = _rows(db.execute_query("SELECT VERSION FROM CLS_CATALOG_VERSION WHERE NAME = 'catalog'"))
+            return rows[0].get("version") if rows else None
+        except Exception:
+            return None
+
+    @staticmethod
+    def _load_parse_catalog() -> List[Dict[str, Any]]:
+        """Active works, then resources, by ID — rows for ColassCatalogIndex."""
+        with DatabaseModel() as db:
+            works = db.execute_query(
+                """
+                SELECT ID, WORK_CODE AS CODE, WORK_NAME AS NAME, UNIT, NVL(PRICE, NVL(AMOUNT, 0)) AS PRICE
+                FROM CLS_WORK_CATALOG
+                WHERE IS_ACTIVE = 'Y'
+                ORDER BY ID
+                """
+            )
+            resources = db.execute_query(
+                """
+                SELECT ID, RESOURCE_CODE AS CODE, NAME, UNIT, NVL(PRICE, NVL(AMOUNT, 0)) AS PRICE, TYPE_ID
+                FROM CLS_RESOURCES
+                WHERE IS_ACTIVE = 'Y'
+                ORDER BY ID
+                """
+            )
+        # Do not cache a failed query: an empty catalog would live until the next version bump
+        for result in (works, resources):
+            if not result.get("success"):
+                raise RuntimeError(result.get("message") or "catalog query failed")
+        rows = [dict(r, entity_type="work") for r in _rows(works)]
+        rows.extend(dict(r, entity_type="resource") for r in _rows(resources))
+        return rows
+
+    @staticmethod
+    def get_parse_catalog() -> ColassCatalogIndex:
+        """Parsed catalog for the local AI parse; reloaded when the catalog version changes."""
+        return cached_catalog_index(
+            ColassController._catalog_version, ColassController._load_parse_catalog, _norm_text
+        )
+
     @staticmethod
     def ai_parse_estimate_local(text: str, threshold: int = 45) -> Dict[str, Any]:
         """Local AI parse using rapidfuzz fallback scoring."""
@@ -853,74 +1181,32 @@ class ColassController:
             if not parts:
                 return {"success": True, "matches": [], "backend": "local"}
 
-            with DatabaseModel() as db:
-                works = _rows(
-                    db.execute_query(
-                        """
-                        SELECT ID, WORK_CODE AS CODE, WORK_NAME AS NAME, UNIT, NVL(PRICE, NVL(AMOUNT, 0)) AS PRICE
-                        FROM CLS_WORK_CATALOG
-                        WHERE IS_ACTIVE = 'Y'
-                        """
-                    )
-                )
-                resources = _rows(
-                    db.execute_query(
-                        """
-                        SELECT ID, RESOURCE_CODE AS CODE, NAME, UNIT, NVL(PRICE, NVL(AMOUNT, 0)) AS PRICE, TYPE_ID
-                        FROM CLS_RESOURCES
-                        WHERE IS_ACTIVE = 'Y'
-                        """
-                    )
-                )
+            catalog = ColassController.get_parse_catalog()
+            found = catalog.match_many([_norm_text(part["token"]) for part in parts])
 
             matches: List[Dict[str, Any]] = []
-            for part in parts:
+            for part, (row, score) in zip(parts, found):
                 token = part["token"]
-                token_norm = _norm_text(token)
                 qty = part["qty"]
-                best: Optional[Dict[str, Any]] = None
-                best_score = -1.0
-
-                for row in works:
-                    name_norm = _norm_text(row.get("name") or "")
-                    code_norm = _norm_text(row.get("code") or "")
-                    score = _score_local(token_norm, name_norm, code_norm)
-                    if score > best_score:
-                        best_score = score
-                        best = {
-                            "entity_type": "work",
-                            "id": row.get("id"),
-                            "code": row.get("code"),
-                            "name": row.get("name"),
-                            "unit": row.get("unit"),
-                            "price": _safe_float(row.get("price"), 0.0),
-                            "qty": qty,
-                            "confidence": round(score, 2),
-                            "original": part["original"],
-                            "token": token,
-                        }
-
-                for row in resources:
-                    name_norm = _norm_text(row.get("name") or "")
-                    code_norm = _norm_text(row.get("code") or "")
-                    score = _score_local(token_norm, name_norm, code_norm)
-                    if score > best_score:
-                        best_score = score
-                        best = {
-                            "entity_type": "resource",
-                            "id": row.get("id"),
-                            "code": row.get("code"),
-                            "name": row.get("name"),
-                            "unit": row.get("unit"),
-                            "price": _safe_float(row.get("price"), 0.0),
-                            "resource_type_id": row.get("type_id"),
+                if row is not None and round(score, 2) >= threshold:
+                    best = {
+                        "entity_type": row["entity_type"],
+                        "id": row.get("id"),
+                        "code": row.get("code"),
+                        "name": row.get("name"),
+                        "unit": row.get("unit"),
+                        "price": _safe_float(row.get("price"), 0.0),
+                    }
+                    if row["entity_type"] == "resource":
+                        best["resource_type_id"] = row.get("type_id")
+                    best.update(
+                        {
                             "qty": qty,
                             "confidence": round(score, 2),
                             "original": part["original"],
                             "token": token,
                         }
-
-                if best and best["confidence"] >= threshold:
+                    )
                     matches.append(best)
                 else:
                     matches.append(
@@ -932,7 +1218,7 @@ class ColassController:
                             "unit": None,
                             "price": 0.0,
                             "qty": qty,
-                            "confidence": round(max(best_score, 0), 2),
+                            "confidence": round(max(score, 0), 2),
                             "original": part["original"],
                             "token": token,
                         }
@@ -18,6 +18,7 @@ if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
 from models.database import DatabaseModel
+from models import nufarul_photos as _photos
 
 
 def _norm_rows(r: Dict[str, Any], keys_lower: bool = True) -> List[Dict[str, Any]]:
@@ -34,6 +35,47 @@ def _norm_rows(r: Dict[str, Any], keys_lower: bool = True) -> List[Dict[str, Any
     return out
 
 
+def _invalidate_parse_catalog() -> None:
+    """Сброс индекса каталога локального разбора заказов после правки услуг."""
+    try:
+        from nufarul_ai_parser import invalidate_catalog
+    except ImportError:  # нет rapidfuzz — нет и локального разбора с его кешем
+        return
+    invalidate_catalog()
+
+
+# Заказ за одно обращение к БД: номер заказа и ID из последовательностей,
+# шапка в леджер (+ оплата), ID всех позиций. ID позиций возвращаются строкой
+# через запятую — скалярный OUT-бинд, без PL/SQL-коллекций.
+_ORDER_BLOCK = """
+DECLARE
+  v_num   NUMBER;
+  v_oid   NUMBER;
+  v_onum  VARCHAR2(50);
+  v_iids  VARCHAR2(32767);
+BEGIN
+  SELECT NUF_ORDER_NUM_SEQ.NEXTVAL, NUF_ORDERS_LEDGER_SEQ.NEXTVAL, TO_CHAR(SYSDATE, 'YYYY')
+    INTO v_num, v_oid, v_onum FROM DUAL;
+  v_onum := v_onum || '-' || LPAD(TO_CHAR(v_num), GREATEST(5, LENGTH(TO_CHAR(v_num))), '0');
+  INSERT INTO NUF_ORDERS_LEDGER
+    (ID, ORDER_NUMBER, BARCODE, CLIENT_NAME, CLIENT_PHONE, STATUS_ID, TOTAL_AMOUNT, NOTES)
+  VALUES (v_oid, v_onum, v_onum, :cname, :cphone, :sid, :total, :notes);
+  {payment}
+  IF :n > 0 THEN
+    FOR r IN (SELECT NUF_ITEMS_LEDGER_SEQ.NEXTVAL AS ID FROM DUAL CONNECT BY LEVEL <= :n) LOOP
+      v_iids := v_iids || r.ID || ',';
+    END LOOP;
+  END IF;
+  :oid := v_oid;
+  :onum := v_onum;
+  :iids := v_iids;
+END;"""
+
+_ORDER_PAYMENT_INSERT = """INSERT INTO NUF_ORDER_PAYMENT
+    (ORDER_ID, ORDER_NUMBER, CLIENT_NAME, CLIENT_PHONE, PAYMENT_METHOD, NOTES, READY_DATE)
+  VALUES (v_oid, v_onum, :cname, :cphone, :pay, :notes, :rdate);"""
+
+
 class NufarulController:
     """API для админки Nufarul и интерфейса оператора приёма заказов."""
 
@@ -187,6 +229,7 @@ class NufarulController:
                     else:
                         raise
                 db.connection.commit()
+            _invalidate_parse_catalog()
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -197,6 +240,7 @@ class NufarulController:
             with DatabaseModel() as db:
                 db.execute_query("DELETE FROM NUF_SERVICES WHERE ID = :id", {"id": service_id})
                 db.connection.commit()
+            _invalidate_parse_catalog()
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -300,6 +344,23 @@ class NufarulController:
 
     # ---------- AI search backend toggle ----------
 
+    @staticmethod
+    def get_parse_catalog():
+        """
+        Индекс активных услуг для локального разбора заказа (nufarul_ai_parser.CatalogIndex)
+        из кеша процесса: собирается один раз на версию каталога, сбрасывается
+        upsert_service / delete_service. Ошибка чтения услуг не кешируется.
+        """
+        from nufarul_ai_parser import cached_catalog
+
+        def _load() -> List[Dict[str, Any]]:
+            r = NufarulController.get_services(active_only=True)
+            if not r.get("success"):
+                raise RuntimeError(r.get("error") or "NUF_SERVICES unavailable")
+            return r.get("data") or []
+
+        return cached_catalog(_load)
+
     @staticmethod
     def ai_parse_order_oracle(text: str, threshold: int = 40) -> list:
         """Парсинг текста через Oracle PL/SQL пакет NUF_AI_SEARCH (вектор/fuzzy)."""
@@ -350,6 +411,84 @@ class NufarulController:
 
     # ---------- Оператор: создание заказа ----------
 
+    # Справочник статусов: ID по коду, читается один раз на процесс
+    _status_ids: Dict[str, int] = {}
+
+    @staticmethod
+    def _status_id(cur, code: str) -> Optional[int]:
+        """ID статуса по коду из кеша процесса; нет кода в кеше — справочник перечитывается."""
+        if code not in NufarulController._status_ids:
+            cur.execute("SELECT CODE, ID FROM NUF_ORDER_STATUSES")
+            NufarulController._status_ids = {str(c): int(i) for c, i in cur.fetchall()}
+        return NufarulController._status_ids.get(code)
+
+    @staticmethod
+    def _insert_order(
+        cur,
+        client_name: str,
+        client_phone: Optional[str],
+        items: List[Dict[str, Any]],
+        notes: Optional[str],
+        payment: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Пишет заказ в леджер за постоянное число обращений, сколько бы ни было позиций:
+        PL/SQL-блок _ORDER_BLOCK (номер, шапка, оплата, ID позиций) и executemany позиций.
+        Леджер-таблицы, как и раньше, только INSERT с ID из тех же последовательностей.
+        commit / rollback — на вызывающем.
+        """
+        status_id = NufarulController._status_id(cur, "received")
+        if status_id is None:
+            raise LookupError("Status 'received' not found")
+
+        rows = []
+        for it in items:
+            qty = float(it.get("qty") or 1)
+            price = float(it.get("price") or 0)
+            rows.append({"sid": int(it.get("service_id") or 0), "qty": qty, "price": price,
+                         "amount": round(qty * price, 2)})
+        total = round(sum(r["qty"] * r["price"] for r in rows), 2)
+
+        oid = cur.var(int)
+        onum = cur.var(str, 50)
+        iids = cur.var(str, 32767)
+        binds = {
+            "cname": client_name, "cphone": client_phone, "sid": status_id,
+            "total": total, "notes": notes, "n": len(rows),
+            "oid": oid, "onum": onum, "iids": iids,
+        }
+        if payment is not None:
+            binds.update(payment)
+        cur.execute(
+            _ORDER_BLOCK.format(payment=_ORDER_PAYMENT_INSERT if payment is not None else ""),
+            binds,
+        )
+        order_id = oid.getvalue()
+        order_number = onum.getvalue()
+        item_ids = [int(x) for x in (iids.getvalue() or "").split(",") if x]
+        if not order_id or not order_number:
+            raise ValueError("Could not generate order ID")
+        if len(item_ids) != len(rows):
+            raise ValueError("Could not generate all item IDs")
+
+        if rows:
+            for iid, row in zip(item_ids, rows):
+                row["iid"] = iid
+                row["oid"] = order_id
+            cur.executemany(
+                """INSERT INTO NUF_ORDER_ITEMS_LEDGER
+                   (ID, ORDER_ID, SERVICE_ID, QTY, PRICE, AMOUNT)
+                   VALUES (:iid, :oid, :sid, :qty, :price, :amount)""",
+                rows,
+            )
+        return {
+            "order_id": order_id,
+            "order_number": order_number,
+            "barcode": order_number,  # или отдельная генерация EAN/Code128
+            "total_amount": total,
+            "item_ids": [{"service_id": r["sid"], "item_id": iid} for r, iid in zip(rows, item_ids)],
+        }
+
     @staticmethod
     def create_order(
         client_name: str,
@@ -360,75 +499,26 @@ class NufarulController:
         """Создаёт заказ и позиции. Генерирует ORDER_NUMBER и BARCODE."""
         try:
             with DatabaseModel() as db:
-                # Номер заказа: год + последовательность
-                r_seq = db.execute_query(
-                    "SELECT NUF_ORDER_NUM_SEQ.NEXTVAL AS NX FROM DUAL"
-                )
-                if not r_seq.get("success") or not r_seq.get("data"):
-                    return {"success": False, "error": "Could not generate order number"}
-                seq_val = r_seq["data"][0][0]
-                r_yr = db.execute_query("SELECT TO_CHAR(SYSDATE,'YYYY') AS Y FROM DUAL")
-                year = r_yr["data"][0][0] if r_yr.get("data") else "2026"
-                order_number = f"{year}-{str(seq_val).zfill(5)}"
-                barcode = order_number  # или отдельная генерация EAN/Code128
-
-                # Статус "Принят"
-                r_st = db.execute_query("SELECT ID FROM NUF_ORDER_STATUSES WHERE CODE = 'received'")
-                if not r_st.get("data"):
-                    return {"success": False, "error": "Status 'received' not found"}
-                status_id = r_st["data"][0][0]
-
-                total = 0
-                for it in items:
-                    qty = float(it.get("qty") or 1)
-                    price = float(it.get("price") or 0)
-                    total += qty * price
-
-                # Получаем ID из sequence для blockchain-таблицы
-                r_new_id = db.execute_query("SELECT NUF_ORDERS_LEDGER_SEQ.NEXTVAL FROM DUAL")
-                order_id = r_new_id["data"][0][0] if r_new_id.get("data") else None
-                if not order_id:
-                    return {"success": False, "error": "Could not generate order ID"}
-
-                db.execute_query(
-                    """INSERT INTO NUF_ORDERS_LEDGER (ID, ORDER_NUMBER, BARCODE, CLIENT_NAME, CLIENT_PHONE, STATUS_ID, TOTAL_AMOUNT, NOTES)
-                       VALUES (:oid, :onum, :barcode, :cname, :cphone, :sid, :total, :notes)""",
-                    {
-                        "oid": order_id,
-                        "onum": order_number,
-                        "barcode": barcode,
-                        "cname": (client_name or "").strip(),
-                        "cphone": (client_phone or "").strip(),
-                        "sid": status_id,
-                        "total": round(total, 2),
-                        "notes": (notes or "").strip() or None,
-                    },
-                )
-
-                item_ids = []
-                for it in items:
-                    service_id = int(it.get("service_id") or 0)
-                    qty = float(it.get("qty") or 1)
-                    price = float(it.get("price") or 0)
-                    amount = round(qty * price, 2)
-                    r_iid_seq = db.execute_query("SELECT NUF_ITEMS_LEDGER_SEQ.NEXTVAL FROM DUAL")
-                    iid = r_iid_seq["data"][0][0] if r_iid_seq.get("data") else None
-                    db.execute_query(
-                        """INSERT INTO NUF_ORDER_ITEMS_LEDGER (ID, ORDER_ID, SERVICE_ID, QTY, PRICE, AMOUNT)
-                           VALUES (:iid, :oid, :sid, :qty, :price, :amount)""",
-                        {"iid": iid, "oid": order_id, "sid": service_id, "qty": qty, "price": price, "amount": amount},
+                conn = db.connection
+                cur = conn.cursor()
+                try:
+                    order = NufarulController._insert_order(
+                        cur,
+                        (client_name or "").strip(),
+                        (client_phone or "").strip(),
+                        items,
+                        (notes or "").strip() or None,
                     )
-                    item_ids.append({"service_id": service_id, "item_id": iid})
-
-                db.connection.commit()
-                return {
-                    "success": True,
-                    "order_id": order_id,
-                    "order_number": order_number,
-                    "barcode": barcode,
-                    "total_amount": round(total, 2),
-                    "item_ids": item_ids,
-                }
+                    conn.commit()
+                    return {"success": True, **order}
+                except LookupError as e:
+                    conn.rollback()
+                    return {"success": False, "error": str(e)}
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cur.close()
         except Exception as e:
             return {"success": False, "error": str(e)}
 
@@ -520,31 +610,12 @@ class NufarulController:
         ready_date: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Creates order and stores per-item params in NUF_ORDER_ITEM_PARAMS companion table.
-        Uses a single bootstrap query + executemany to minimize Oracle round-trips."""
+        Same ledger write as create_order (_insert_order), plus one executemany for params."""
         try:
             with DatabaseModel() as db:
                 conn = db.connection
                 cur = conn.cursor()
                 try:
-                    n = len(items)
-                    # 1 round-trip: all sequences + year + status in one query
-                    cur.execute(f"""
-                        SELECT
-                            NUF_ORDER_NUM_SEQ.NEXTVAL,
-                            NUF_ORDERS_LEDGER_SEQ.NEXTVAL,
-                            TO_CHAR(SYSDATE,'YYYY'),
-                            (SELECT ID FROM NUF_ORDER_STATUSES WHERE CODE='received' AND ROWNUM=1)
-                        FROM DUAL
-                    """)
-                    row = cur.fetchone()
-                    if not row or row[3] is None:
-                        return {"success": False, "error": "Status 'received' not found"}
-                    seq_val, order_id, year, status_id = row
-                    order_number = f"{year}-{str(int(seq_val)).zfill(5)}"
-                    barcode = order_number
-                    total = sum(float(it.get("qty") or 1) * float(it.get("price") or 0) for it in items)
-
-                    # 2nd round-trip: insert order header into blockchain ledger
                     cname = (client_name or "Аноним").strip()
                     cphone = (client_phone or "").strip() or None
                     pay = (payment_method or "cash").strip()
@@ -556,68 +627,20 @@ class NufarulController:
                             rdate = datetime.fromisoformat(str(ready_date)[:16])
                         except Exception:
                             rdate = None
-                    cur.execute(
-                        """INSERT INTO NUF_ORDERS_LEDGER
-                           (ID, ORDER_NUMBER, BARCODE, CLIENT_NAME, CLIENT_PHONE, STATUS_ID, TOTAL_AMOUNT, NOTES)
-                           VALUES (:oid, :onum, :barcode, :cname, :cphone, :sid, :total, :notes)""",
-                        {
-                            "oid": order_id, "onum": order_number, "barcode": barcode,
-                            "cname": cname, "cphone": cphone,
-                            "sid": status_id, "total": round(total, 2),
-                            "notes": (notes or "").strip() or None,
-                        },
-                    )
-                    # Insert payment metadata into companion table (stores READY_DATE here, not on blockchain table)
-                    cur.execute(
-                        """INSERT INTO NUF_ORDER_PAYMENT
-                           (ORDER_ID, ORDER_NUMBER, CLIENT_NAME, CLIENT_PHONE, PAYMENT_METHOD, NOTES, READY_DATE)
-                           VALUES (:oid, :onum, :cname, :cphone, :pay, :notes, :rdate)""",
-                        {
-                            "oid": order_id, "onum": order_number,
-                            "cname": cname, "cphone": cphone,
-                            "pay": pay, "notes": (notes or "").strip() or None,
-                            "rdate": rdate,
-                        },
-                    )
 
-                    # 3rd round-trip: fetch all item IDs at once
-                    cur.execute(f"""
-                        SELECT NUF_ITEMS_LEDGER_SEQ.NEXTVAL
-                        FROM DUAL CONNECT BY LEVEL <= {int(n)}
-                    """)
-                    item_ids_seq = [r[0] for r in cur.fetchall()]
-                    if len(item_ids_seq) != n:
-                        raise ValueError("Could not generate all item IDs")
-
-                    # 4th round-trip: batch insert items
-                    items_data = []
-                    params_data = []
-                    item_ids = []
-                    for iid, it in zip(item_ids_seq, items):
-                        service_id = int(it.get("service_id") or 0)
-                        qty = float(it.get("qty") or 1)
-                        price = float(it.get("price") or 0)
-                        amount = round(qty * price, 2)
-                        items_data.append({
-                            "iid": iid, "oid": order_id, "sid": service_id,
-                            "qty": qty, "price": price, "amount": amount,
-                        })
-                        params_raw = it.get("params")
-                        if params_raw:
-                            params_data.append({
-                                "item_id": iid,
-                                "params": json.dumps(params_raw, ensure_ascii=False),
-                            })
-                        item_ids.append({"service_id": service_id, "item_id": iid})
-
-                    cur.executemany(
-                        """INSERT INTO NUF_ORDER_ITEMS_LEDGER
-                           (ID, ORDER_ID, SERVICE_ID, QTY, PRICE, AMOUNT)
-                           VALUES (:iid, :oid, :sid, :qty, :price, :amount)""",
-                        items_data,
+                    # 1-2 round-trips: header + payment metadata (READY_DATE lives in the
+                    # companion table, not on the blockchain table) + item IDs, then items
+                    order = NufarulController._insert_order(
+                        cur, cname, cphone, items, (notes or "").strip() or None,
+                        payment={"pay": pay, "rdate": rdate},
                     )
 
-                    # 5th round-trip (only if params present): batch insert params
+                    # 3rd round-trip (only if params present): batch insert params
+                    params_data = [
+                        {"item_id": ref["item_id"], "params": json.dumps(it["params"], ensure_ascii=False)}
+                        for ref, it in zip(order["item_ids"], items)
+                        if it.get("params")
+                    ]
                     if params_data:
                         cur.executemany(
                             """INSERT INTO NUF_ORDER_ITEM_PARAMS (ORDER_ITEM_ID, PARAMS)
@@ -627,12 +650,16 @@ class NufarulController:
 
                     conn.commit()
                     return {
-                        "success": True, "order_id": order_id,
-                        "order_number": order_number, "barcode": barcode,
-                        "total_amount": round(total, 2), "item_ids": item_ids,
+                        "success": True, **order,
                         "payment_method": pay,
                         "ready_date": rdate.isoformat() if rdate else None,
                     }
+                except LookupError as e:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                    return {"success": False, "error": str(e)}
                 except Exception as e:
                     try:
                         conn.rollback()
@@ -673,71 +700,212 @@ class NufarulController:
 
     # ---------- Фото заказов (BLOB) ----------
 
+    _PHOTO_COLUMNS = """ID, ORDER_ID, ITEM_ID, PHOTO_MIME, PHOTO_SIZE, PHOTO_NAME, PHOTO_SHA256,
+                        CASE WHEN THUMB_BLOB IS NULL THEN 0 ELSE 1 END AS HAS_THUMB, CREATED_AT"""
+    # Пока не применён sql/124, колонок PHOTO_SHA256 / THUMB_BLOB нет (ORA-00904):
+    # фото отдаются как раньше — без хэша и миниатюр, потоком из PHOTO_BLOB.
+    _PHOTO_COLUMNS_LEGACY = """ID, ORDER_ID, ITEM_ID, PHOTO_MIME, PHOTO_SIZE, PHOTO_NAME,
+                        CAST(NULL AS VARCHAR2(64)) AS PHOTO_SHA256, 0 AS HAS_THUMB, CREATED_AT"""
+
+    @staticmethod
+    def _select_photos(db, where: str, params: Dict[str, Any], with_thumb: bool = False) -> Dict[str, Any]:
+        """SELECT фото по условию; без колонок sql/124 — прежним набором колонок."""
+        r: Dict[str, Any] = {}
+        for cols, thumb_col in ((NufarulController._PHOTO_COLUMNS, ", THUMB_BLOB"),
+                                (NufarulController._PHOTO_COLUMNS_LEGACY, ", NULL AS THUMB_BLOB")):
+            r = db.execute_query(
+                f"SELECT {cols}{thumb_col if with_thumb else ''} FROM NUF_ORDER_PHOTOS WHERE {where}",
+                params,
+            )
+            if r.get("success") or "ORA-00904" not in str(r.get("message") or ""):
+                break
+        return r
+
+    @staticmethod
+    def _photo_urls(row: Dict[str, Any]) -> Dict[str, Any]:
+        pid = row.get("id")
+        row["has_thumb"] = bool(row.get("has_thumb"))
+        row["url"] = f"/api/nufarul-operator/photo/{pid}"
+        row["thumb_url"] = f"/api/nufarul-operator/photo/{pid}/thumb" if row["has_thumb"] else row["url"]
+        return row
+
     @staticmethod
-    def save_photo(order_id: int, item_id: Optional[int], photo_base64: str,
-                   mime_type: str = "image/jpeg", photo_name: Optional[str] = None) -> Dict[str, Any]:
-        """Сохраняет фото (base64) как BLOB в NUF_ORDER_PHOTOS."""
+    def save_photo(order_id: int, item_id: Optional[int], photo_base64: Optional[str] = None,
+                   mime_type: str = "image/jpeg", photo_name: Optional[str] = None,
+                   stream=None) -> Dict[str, Any]:
+        """
+        Сохраняет фото в NUF_ORDER_PHOTOS: base64 (photo_base64) или поток (stream —
+        тело запроса / файл multipart) читается кусками во временный файл, делается
+        миниатюра, BLOB пишется кусками в локатор из INSERT ... RETURNING (оттуда же ID).
+        """
         try:
-            photo_bytes = base64.b64decode(photo_base64)
-            photo_size = len(photo_bytes)
-            with DatabaseModel() as db:
-                cursor = db.connection.cursor()
-                cursor.setinputsizes(photo_blob=oracledb.DB_TYPE_BLOB)
-                cursor.execute(
-                    """INSERT INTO NUF_ORDER_PHOTOS (ORDER_ID, ITEM_ID, PHOTO_BLOB, PHOTO_MIME, PHOTO_SIZE, PHOTO_NAME)
-                       VALUES (:order_id, :item_id, :photo_blob, :mime, :psize, :pname)""",
-                    {
-                        "order_id": order_id,
-                        "item_id": item_id,
-                        "photo_blob": photo_bytes,
-                        "mime": mime_type,
-                        "psize": photo_size,
-                        "pname": photo_name,
-                    },
-                )
-                r = db.execute_query(
-                    "SELECT MAX(ID) FROM NUF_ORDER_PHOTOS WHERE ORDER_ID = :oid",
-                    {"oid": order_id},
-                )
-                photo_id = r["data"][0][0] if r.get("data") and r["data"][0] else None
-                db.connection.commit()
-                return {"success": True, "photo_id": photo_id, "photo_size": photo_size}
+            chunks = _photos.read_chunks(stream) if stream is not None else _photos.b64_chunks(photo_base64 or "")
+            f, photo_size, sha = _photos.spool(chunks)
         except Exception as e:
             return {"success": False, "error": str(e)}
+        try:
+            with f:
+                if not photo_size:
+                    return {"success": False, "error": "Empty photo"}
+                thumb = _photos.make_thumbnail(f)
+                with DatabaseModel() as db:
+                    conn = db.connection
+                    try:
+                        try:
+                            photo_id, lob = NufarulController._insert_photo(
+                                conn, order_id, item_id, mime_type, photo_size, photo_name, sha, thumb)
+                        except oracledb.DatabaseError as e:
+                            err = e.args[0] if e.args else None
+                            if getattr(err, "code", None) != 904:
+                                raise
+                            # до sql/124: без хэша и миниатюры
+                            thumb = None
+                            photo_id, lob = NufarulController._insert_photo(
+                                conn, order_id, item_id, mime_type, photo_size, photo_name)
+                        _photos.write_lob(lob, f)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                try:
+                    _photos.photo_cache.put_file(sha, f)
+                    if thumb:
+                        _photos.photo_cache.put_bytes(sha + ".thumb", thumb)
+                except OSError as e:
+                    _log.warning("nufarul photo cache write failed: %s", e)
+                return {"success": True, "photo_id": photo_id, "photo_size": photo_size,
+                        "sha256": sha, "has_thumb": bool(thumb)}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def _insert_photo(conn, order_id: int, item_id: Optional[int], mime_type: str, photo_size: int,
+                      photo_name: Optional[str], sha: Optional[str] = None, thumb: Optional[bytes] = None,
+                      ) -> tuple:
+        """
+        INSERT ... EMPTY_BLOB() RETURNING ID, PHOTO_BLOB → (ID, локатор BLOB).
+        Без sha — прежний набор колонок (до sql/124).
+        """
+        cur = conn.cursor()
+        try:
+            pid_var = cur.var(int)
+            lob_var = cur.var(oracledb.DB_TYPE_BLOB)
+            params = {
+                "order_id": order_id,
+                "item_id": item_id,
+                "mime": mime_type,
+                "psize": photo_size,
+                "pname": photo_name,
+                "pid": pid_var,
+                "lob": lob_var,
+            }
+            if sha is None:
+                cols, values = "", ""
+            else:
+                cur.setinputsizes(thumb=oracledb.DB_TYPE_BLOB)
+                cols, values = ", PHOTO_SHA256, THUMB_BLOB", ", :sha, :thumb"
+                params.update(sha=sha, thumb=thumb)
+            cur.execute(
+                f"""INSERT INTO NUF_ORDER_PHOTOS
+                       (ORDER_ID, ITEM_ID, PHOTO_BLOB, PHOTO_MIME, PHOTO_SIZE, PHOTO_NAME{cols})
+                   VALUES (:order_id, :item_id, EMPTY_BLOB(), :mime, :psize, :pname{values})
+                   RETURNING ID, PHOTO_BLOB INTO :pid, :lob""",
+                params,
+            )
+            return pid_var.getvalue()[0], lob_var.getvalue()[0]
+        finally:
+            cur.close()
 
     @staticmethod
     def get_order_photos(order_id: int, include_data: bool = False) -> Dict[str, Any]:
-        """Список фото заказа. include_data=True — возвращает base64 данные."""
+        """
+        Список фото заказа: метаданные + url / thumb_url (потоковая выдача).
+        include_data=True — ещё thumb_base64 (миниатюра, не полное фото).
+        """
         try:
             with DatabaseModel() as db:
+                r = NufarulController._select_photos(
+                    db, "ORDER_ID = :oid ORDER BY CREATED_AT, ID", {"oid": order_id}, with_thumb=include_data)
+                rows = [NufarulController._photo_urls(row) for row in _norm_rows(r)]
                 if include_data:
-                    sql = """SELECT ID, ORDER_ID, ITEM_ID, PHOTO_BLOB, PHOTO_MIME,
-                                    PHOTO_SIZE, PHOTO_NAME, CREATED_AT
-                             FROM NUF_ORDER_PHOTOS WHERE ORDER_ID = :oid ORDER BY CREATED_AT"""
-                else:
-                    sql = """SELECT ID, ORDER_ID, ITEM_ID, PHOTO_MIME,
-                                    PHOTO_SIZE, PHOTO_NAME, CREATED_AT
-                             FROM NUF_ORDER_PHOTOS WHERE ORDER_ID = :oid ORDER BY CREATED_AT"""
-                r = db.execute_query(sql, {"oid": order_id})
-                return {"success": True, "data": _norm_rows(r)}
+                    # execute_query отдаёт BLOB как base64 (bytes не UTF-8)
+                    for row in rows:
+                        data = row.pop("thumb_blob", None) or None
+                        if isinstance(data, (bytes, bytearray)):  # fetch_lobs = False
+                            data = base64.b64encode(data).decode("ascii")
+                        row["thumb_base64"] = data
+                return {"success": True, "data": rows}
         except Exception as e:
             return {"success": False, "error": str(e), "data": []}
 
     @staticmethod
     def get_photo(photo_id: int) -> Dict[str, Any]:
-        """Одно фото с полными base64 данными."""
+        """Метаданные одного фото (сами байты — iter_photo / кеш)."""
         try:
             with DatabaseModel() as db:
-                r = db.execute_query(
-                    """SELECT ID, ORDER_ID, ITEM_ID, PHOTO_BLOB, PHOTO_MIME,
-                              PHOTO_SIZE, PHOTO_NAME, CREATED_AT
-                       FROM NUF_ORDER_PHOTOS WHERE ID = :pid""",
-                    {"pid": photo_id},
-                )
+                r = NufarulController._select_photos(db, "ID = :pid", {"pid": photo_id})
                 rows = _norm_rows(r)
                 if not rows:
                     return {"success": False, "error": "Photo not found"}
-                return {"success": True, "data": rows[0]}
+                return {"success": True, "data": NufarulController._photo_urls(rows[0])}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def iter_photo(photo_id: int, thumb: bool = False, sha256: Optional[str] = None):
+        """
+        Генератор байтов фото (thumb=True — миниатюры) кусками из LOB.
+        С sha256 прочитанное заодно пишется в кеш — целиком, если дочитали до конца.
+        """
+        col = "THUMB_BLOB" if thumb else "PHOTO_BLOB"
+        writer = None
+        if sha256:
+            writer = _photos.photo_cache.writer(sha256 + ".thumb" if thumb else sha256)
+        try:
+            with DatabaseModel() as db:
+                cur = db.connection.cursor()
+                try:
+                    cur.outputtypehandler = _photos.lob_locators
+                    cur.execute(f"SELECT {col} FROM NUF_ORDER_PHOTOS WHERE ID = :pid", {"pid": photo_id})
+                    row = cur.fetchone()
+                    for chunk in _photos.iter_lob(row[0] if row else None):
+                        if writer is not None:
+                            writer.write(chunk)
+                        yield chunk
+                finally:
+                    cur.close()
+            if writer is not None:
+                writer.commit()
+        finally:
+            if writer is not None:
+                writer.abort()
+
+    @staticmethod
+    def backfill_photo(photo_id: int) -> Dict[str, Any]:
+        """Для фото, сохранённых до миниатюр: считает PHOTO_SHA256 и THUMB_BLOB из BLOB."""
+        try:
+            with DatabaseModel() as db:
+                probe = db.execute_query(
+                    "SELECT PHOTO_SHA256 FROM NUF_ORDER_PHOTOS WHERE ID = :pid", {"pid": photo_id})
+            if not probe.get("success"):
+                # нет колонок sql/124 — BLOB зря не читаем
+                return {"success": False, "error": probe.get("message") or "PHOTO_SHA256 unavailable"}
+            f, _size, sha = _photos.spool(NufarulController.iter_photo(photo_id))
+            with f:
+                thumb = _photos.make_thumbnail(f)
+                with DatabaseModel() as db:
+                    cur = db.connection.cursor()
+                    try:
+                        cur.setinputsizes(thumb=oracledb.DB_TYPE_BLOB)
+                        cur.execute(
+                            """UPDATE NUF_ORDER_PHOTOS SET PHOTO_SHA256 = :sha, THUMB_BLOB = :thumb
+                               WHERE ID = :pid""",
+                            {"sha": sha, "thumb": thumb, "pid": photo_id},
+                        )
+                        db.connection.commit()
+                    finally:
+                        cur.close()
+            return {"success": True, "sha256": sha, "has_thumb": bool(thumb)}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
@@ -18,9 +18,9 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from models.database import DatabaseModel
-from models.peco_autoorder import DEFAULTS, FuelAutoOrder
-from models.peco_gps import PecoGps
-from models import peco_forecast, peco_plan
+from models.peco_autoorder import DEFAULTS, FuelAutoOrder, FuelAutoOrderEngine
+from models.peco_gps import PecoGps, invalidate_lookup
+from models import peco_forecast, peco_packing, peco_plan
 
 LANGS = ('ru', 'ro', 'en')
 
@@ -153,7 +153,43 @@ class PecoSupplyController:
             except (TypeError, ValueError):
                 return {'success': False, 'status': 400,
                         'error': 'Стоимость денег должна быть числом'}
-        return FuelAutoOrder.run(numeric, username)
+        # По умолчанию прогон ставится в очередь (движок fuel_autoorder):
+        # ход — в PECO_ORDER_RUNS.STAGE и через Socket.IO. sync — прежний
+        # ответ с итогом в том же запросе, для скриптов и малых сетей
+        if payload.get('sync'):
+            return FuelAutoOrder.run(numeric, username)
+        try:
+            return FuelAutoOrder.launch(numeric, username)
+        except Exception as e:                                   # noqa: BLE001
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def autoorder_run(run_id: int) -> Dict[str, Any]:
+        """Прогон автозаказа: этап, процент и итог."""
+        try:
+            with DatabaseModel() as db:
+                run = _rows(db.execute_query(
+                    "SELECT ID, STATUS, STAGE, PROGRESS_PCT, STATION_COUNT, ORDER_COUNT, "
+                    "LITERS_TOTAL, DRY_RISK_CNT, ALGORITHM, MONEY_RATE, PLAN_COST, "
+                    "DURATION_SEC, MESSAGE, USERNAME, STARTED_AT, FINISHED_AT "
+                    "FROM PECO_ORDER_RUNS WHERE ID = :p_id", {'p_id': run_id}))
+                if not run:
+                    return {'success': False, 'status': 404, 'error': 'Прогон не найден'}
+                fc_used = _rows(db.execute_query(
+                    "SELECT COUNT(*) AS CNT FROM PECO_FUEL_ORDER_ITEMS i "
+                    "JOIN PECO_FUEL_ORDERS o ON o.ID = i.ORDER_ID "
+                    "WHERE o.RUN_ID = :p_id AND i.ALGORITHM IS NOT NULL", {'p_id': run_id}))
+            run[0]['forecasted_items'] = int(fc_used[0]['cnt']) if fc_used else 0
+            return {'success': True, 'run': run[0]}
+        except Exception as e:                                   # noqa: BLE001
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def cancel_autoorder(run_id: int) -> Dict[str, Any]:
+        try:
+            return FuelAutoOrderEngine.cancel(run_id)
+        except Exception as e:                                   # noqa: BLE001
+            return {'success': False, 'error': str(e)}
 
     # ==================== Алгоритмы прогноза ====================
 
@@ -187,9 +223,41 @@ class PecoSupplyController:
         except (TypeError, ValueError):
             return {'success': False, 'status': 400,
                     'error': 'Горизонт, число срезов и число баков — целые числа'}
-        return peco_plan.run_backtests(algos, horizon, folds,
-                                       payload.get('grade_code') or None,
-                                       max_tanks, username)
+        # Прогон идёт в очереди (движок fuel_backtest): ход — в
+        # PECO_FCT_BT_RUNS и через Socket.IO, итог — в PECO_FCT_BACKTESTS
+        try:
+            return peco_plan.FuelBacktestEngine.launch(
+                {'algorithms': algos, 'horizon': horizon, 'folds': folds,
+                 'grade_code': payload.get('grade_code') or None,
+                 'max_tanks': max_tanks}, username)
+        except Exception as e:                                   # noqa: BLE001
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def backtest_run(run_id: int, lang: str = 'ru') -> Dict[str, Any]:
+        """Прогон сравнения: этап, процент и строки результата."""
+        try:
+            with DatabaseModel() as db:
+                run = _rows(db.execute_query(
+                    "SELECT ID, STATUS, STAGE, PROGRESS_PCT, FOLDS_TOTAL, FOLDS_CACHED, "
+                    "BEST_ALGO, DURATION_SEC, MESSAGE, USERNAME, STARTED_AT, FINISHED_AT "
+                    "FROM PECO_FCT_BT_RUNS WHERE ID = :p_id", {'p_id': run_id}))
+                if not run:
+                    return {'success': False, 'status': 404, 'error': 'Прогон не найден'}
+                rows = _rows(db.execute_query(
+                    "SELECT * FROM V_PECO_FCT_BACKTESTS WHERE ID IN "
+                    "(SELECT ID FROM PECO_FCT_BACKTESTS WHERE RUN_ID = :p_id) ORDER BY MAPE",
+                    {'p_id': run_id}))
+            return {'success': True, 'run': run[0], 'data': _localize(rows, lang)}
+        except Exception as e:                                   # noqa: BLE001
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def cancel_backtest(run_id: int) -> Dict[str, Any]:
+        try:
+            return peco_plan.FuelBacktestEngine.cancel(run_id)
+        except Exception as e:                                   # noqa: BLE001
+            return {'success': False, 'error': str(e)}
 
     @staticmethod
     def backtest_results(lang: str = 'ru') -> Dict[str, Any]:
@@ -456,8 +524,14 @@ class PecoSupplyController:
 
     @staticmethod
     def plan_trips(payload: Dict[str, Any], username: str) -> Dict[str, Any]:
+        try:
+            budget = float(payload.get('time_budget') or peco_packing.DEFAULT_TIME_BUDGET_SEC)
+        except (TypeError, ValueError):
+            return {'success': False, 'status': 400, 'error': 'Бюджет времени — число секунд'}
+        # Раскладка идёт в HTTP-запросе: бюджет ограничен сверху
         return FuelAutoOrder.plan_trips(payload.get('run_id'), username,
-                                        int(payload.get('max_stations') or 3))
+                                        int(payload.get('max_stations') or 3),
+                                        max(0.0, min(budget, 20.0)))
 
     @staticmethod
     def trips(lang: str, status: Optional[str] = None) -> Dict[str, Any]:
@@ -501,6 +575,8 @@ class PecoSupplyController:
                         "UPDATE PECO_FUEL_ORDERS SET STATUS = 'delivered' "
                         "WHERE TRIP_ID = :p_tr AND STATUS = 'planned'", {'p_tr': trip_id})
                 db.connection.commit()
+            # Приём телеметрии привязывает пинги к активному рейсу из кеша
+            invalidate_lookup()
             _ = username
             return {'success': True}
         except Exception as e:                                   # noqa: BLE001
@@ -528,5 +604,5 @@ class PecoSupplyController:
         return PecoGps.track(trip_id)
 
     @staticmethod
-    def analyze(trip_id: Optional[int] = None) -> Dict[str, Any]:
-        return PecoGps.analyze(trip_id)
+    def analyze(trip_id: Optional[int] = None, rebuild: bool = False) -> Dict[str, Any]:
+        return PecoGps.analyze(trip_id, rebuild)
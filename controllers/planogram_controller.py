@@ -505,11 +505,21 @@ class PlanogramController:
         except Exception as e:
             return {"success": False, "error": str(e)}
         PlanogramController._audit("update" if product_id else "create", "product", product_id, params["p_code"])
+        PlanogramController._drop_voice_matchers()
         return {"success": True}
 
     @staticmethod
     def delete_product(product_id: int) -> Dict:
-        return PlanogramController._delete("PLG_PRODUCTS", product_id, "product")
+        result = PlanogramController._delete("PLG_PRODUCTS", product_id, "product")
+        if result.get("success"):
+            PlanogramController._drop_voice_matchers()
+        return result
+
+    @staticmethod
+    def _drop_voice_matchers():
+        """Каталог изменился — кеш сопоставителей голосового заказа устарел."""
+        from models.plg_voice import invalidate_matchers
+        invalidate_matchers()
 
     # ==================== Планограммы ====================
 
@@ -1202,6 +1212,7 @@ class PlanogramController:
         except Exception as e:
             return {"success": False, "error": str(e)}
         PlanogramController._audit("delete", "dataset", int(dataset_id), row.get("code"))
+        PlanogramController._drop_voice_matchers()
         return {"success": True}
 
     # ==================== Генерация тестовых данных ====================
@@ -1247,6 +1258,9 @@ class PlanogramController:
             "conversion_min": float(data.get("conversion_min") or 16),
             "conversion_max": float(data.get("conversion_max") or 21),
         }
+        if data.get("workers"):
+            # Процессы пула для спроса и трафика; на данные не влияет
+            params["workers"] = max(1, min(int(data["workers"]), 16))
         if params["store_count"] < 1 or params["store_count"] > 100:
             return {"success": False, "error": "Число магазинов должно быть от 1 до 100"}
         if params["sku_count"] < 10 or params["sku_count"] > 5000:
@@ -1320,6 +1334,19 @@ class PlanogramController:
             PlanogramController._audit("cancel", "gen_run", int(run_id), "")
         return result
 
+    @staticmethod
+    def resume_generation(run_id: int) -> Dict:
+        """Продолжает прерванный прогон с последней контрольной точки."""
+        from models.plg_datagen import DataGenerator
+        try:
+            result = DataGenerator.resume(int(run_id))
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        if result.get("success"):
+            PlanogramController._audit("resume", "gen_run", int(run_id),
+                                       f"{result.get('resume_stage') or ''}@{result.get('resume_unit') or 0}")
+        return result
+
     # ==================== Модели прогноза заказов ====================
 
     @staticmethod
@@ -1492,32 +1519,41 @@ class PlanogramController:
 
     @staticmethod
     def get_order_proposal(run_id: int, store_id: Optional[int] = None,
-                           limit: int = 200, lang: str = DEFAULT_LANG) -> Dict:
-        """Рекомендуемый заказ по итогам прогона, отсортированный по сумме."""
+                           limit: int = 200, lang: str = DEFAULT_LANG,
+                           offset: int = 0) -> Dict:
+        """
+        Рекомендуемый заказ по итогам прогона, отсортированный по сумме.
+        Читается из снимка прогона (PLG_ORDER_SNAPSHOT) страницами offset/limit.
+        """
+        from models.plg_forecast import ensure_order_snapshot
         lang = PlanogramController.lang(lang)
         try:
             limit = max(1, min(int(limit or 200), 2000))
+            offset = max(0, int(offset or 0))
         except (TypeError, ValueError):
-            limit = 200
-        sql = "SELECT * FROM V_PLG_ORDER_PROPOSAL WHERE RUN_ID = :p_run AND ORDER_QTY > 0"
+            limit, offset = 200, 0
+        where = " WHERE RUN_ID = :p_run AND ORDER_QTY > 0"
         params: Dict[str, Any] = {"p_run": int(run_id)}
         if store_id:
-            sql += " AND STORE_ID = :p_st"
+            where += " AND STORE_ID = :p_st"
             params["p_st"] = int(store_id)
         try:
             with DatabaseModel() as db:
+                if not ensure_order_snapshot(db.connection, int(run_id)):
+                    return {"success": True, "data": [], "totals": {}, "lang": lang}
                 r = db.execute_query(
-                    sql + f" ORDER BY ORDER_AMOUNT DESC NULLS LAST FETCH FIRST {limit} ROWS ONLY",
-                    params)
+                    "SELECT * FROM V_PLG_ORDER_SNAPSHOT" + where +
+                    " ORDER BY ORDER_AMOUNT DESC NULLS LAST, PRODUCT_ID"
+                    f" OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY", params)
                 if not r.get("success"):
                     return PlanogramController._fail(r)
                 rows = PlanogramController._localized(r, lang)
                 totals = PlanogramController._first(db.execute_query(
                     "SELECT COUNT(*) AS SKU_COUNT, ROUND(SUM(ORDER_QTY),3) AS QTY_TOTAL, "
                     "ROUND(SUM(ORDER_AMOUNT),2) AS AMOUNT_TOTAL "
-                    "FROM V_PLG_ORDER_PROPOSAL WHERE RUN_ID = :p_run AND ORDER_QTY > 0",
-                    {"p_run": int(run_id)})) or {}
-                return {"success": True, "data": rows, "totals": totals, "lang": lang}
+                    "FROM PLG_ORDER_SNAPSHOT" + where, params)) or {}
+                return {"success": True, "data": rows, "totals": totals, "lang": lang,
+                        "offset": offset, "limit": limit}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
@@ -5,7 +5,8 @@
 закупщика: мониторинг показывает проблему → корректировка автозаказа её
 закрывает → пакет документов уходит поставщику (внутреннему или импортному).
 
-Oracle-объекты: sql/96_plg_ai_monitor.sql, sql/97_plg_import.sql
+Oracle-объекты: sql/96_plg_ai_monitor.sql, sql/97_plg_import.sql,
+sql/114_plg_ai_vector_index.sql, sql/115_plg_order_snapshot.sql
 """
 from __future__ import annotations
 
@@ -23,6 +24,8 @@ if root_dir not in sys.path:
 
 from models.database import DatabaseModel
 from models.plg_ai_monitor import AiMonitorEngine
+from models.plg_forecast import ensure_order_snapshot
+from models.plg_vector_index import get_index
 
 LANGS = ('ru', 'ro', 'en')
 
@@ -196,8 +199,11 @@ class PlgAiController:
     def similar_skus(lang: str, store_id: int, product_id: int,
                      limit: int = 8) -> Dict[str, Any]:
         """
-        Похожие по поведению SKU — поиск ближайших соседей по HNSW-индексу
-        Oracle 26ai (FETCH APPROX ... ROWS ONLY по VECTOR_DISTANCE).
+        Похожие по поведению SKU — ближайшие соседи по векторному индексу
+        прогона (models/plg_vector_index.py): индекс магазина держится
+        в памяти процесса, запрос сравнивается только с ближайшими списками
+        IVF, а из базы читаются лишь карточки найденных SKU. Прогоны без
+        индекса — прежним путём, FETCH APPROX по HNSW-индексу Oracle 26ai.
 
         Зачем это закупщику: прогноз для новинки берётся по поведению
         аналогов; кандидаты на ту же промо-механику находятся по соседству
@@ -209,6 +215,33 @@ class PlgAiController:
                 if not run_id:
                     return {'success': False, 'error': 'Прогонов мониторинга ещё не было',
                             'status': 404}
+                index = get_index(db, run_id, store_id) if store_id and product_id else None
+                if index is not None:
+                    vec = index.vector_of(product_id)
+                    if vec is None:
+                        return {'success': True, 'data': [], 'run_id': run_id}
+                    hits = dict(index.search(vec, limit, exclude=product_id))
+                    if not hits:
+                        return {'success': True, 'data': [], 'run_id': run_id}
+                    ids = ','.join(str(int(pid)) for pid in hits)
+                    data = _localize(_rows(db.execute_query(
+                        "SELECT f.PRODUCT_ID, p.CODE AS PRODUCT_CODE, "
+                        "p.NAME_RU AS PRODUCT_NAME_RU, p.NAME_RO AS PRODUCT_NAME_RO, "
+                        "p.NAME_EN AS PRODUCT_NAME_EN, "
+                        "c.NAME_RU AS CATEGORY_NAME_RU, c.NAME_RO AS CATEGORY_NAME_RO, "
+                        "c.NAME_EN AS CATEGORY_NAME_EN, "
+                        "f.AVG_QTY_28, f.CV, f.TREND_PCT, f.PROMO_UPLIFT, f.OOS_DAYS_28, "
+                        "f.ABC_CLASS, f.XYZ_CLASS, f.IS_FRESH "
+                        "FROM PLG_AI_FEATURES f "
+                        "JOIN PLG_PRODUCTS p ON p.ID = f.PRODUCT_ID "
+                        "LEFT JOIN PLG_CATEGORIES c ON c.ID = p.CATEGORY_ID "
+                        "WHERE f.RUN_ID = :p_run AND f.STORE_ID = :p_st "
+                        f"AND f.PRODUCT_ID IN ({ids})",
+                        {'p_run': run_id, 'p_st': store_id})), lang)
+                    for row in data:
+                        row['distance'] = round(hits.get(int(row['product_id']), 1.0), 4)
+                    data.sort(key=lambda r: r['distance'])
+                    return {'success': True, 'data': data, 'run_id': run_id}
                 data = _localize(_rows(db.execute_query(
                     "SELECT f.PRODUCT_ID, p.CODE AS PRODUCT_CODE, "
                     "p.NAME_RU AS PRODUCT_NAME_RU, p.NAME_RO AS PRODUCT_NAME_RO, "
@@ -255,8 +288,14 @@ class PlgAiController:
             return {'success': False, 'error': str(e)}
 
     @staticmethod
-    def order_proposal(lang: str, run_id: Optional[int],
-                       store_id: Optional[int]) -> Dict[str, Any]:
+    def order_proposal(lang: str, run_id: Optional[int], store_id: Optional[int],
+                       offset: int = 0, limit: Optional[int] = None,
+                       ordered_only: bool = False) -> Dict[str, Any]:
+        """
+        Автозаказ с корректировками — из снимка прогона (PLG_ORDER_SNAPSHOT).
+        Страница: offset/limit (без limit — весь заказ, для печатного пакета);
+        итоги считаются по всему срезу, а не по странице.
+        """
         try:
             with DatabaseModel() as db:
                 if not run_id:
@@ -264,19 +303,32 @@ class PlgAiController:
                         "SELECT MAX(ID) AS ID FROM PLG_FCT_RUNS "
                         "WHERE STATUS = 'done' AND RUN_MODE = 'forecast'"))
                     run_id = rows[0].get('id') if rows else None
-                if not run_id:
-                    return {'success': True, 'data': [], 'run_id': None}
-                sql = "SELECT * FROM V_PLG_ORDER_ADJUSTED WHERE RUN_ID = :p_run"
+                if not run_id or not ensure_order_snapshot(db.connection, run_id):
+                    return {'success': True, 'data': [], 'run_id': run_id}
+                where = " WHERE RUN_ID = :p_run"
                 params: Dict[str, Any] = {'p_run': run_id}
                 if store_id:
-                    sql += " AND STORE_ID = :p_st"
+                    where += " AND STORE_ID = :p_st"
                     params['p_st'] = store_id
-                sql += " ORDER BY IS_ADJUSTED DESC, AMOUNT_FINAL DESC NULLS LAST"
+                if ordered_only:
+                    where += " AND QTY_FINAL > 0"
+                sql = ("SELECT * FROM V_PLG_ORDER_SNAPSHOT" + where +
+                       " ORDER BY IS_ADJUSTED DESC, AMOUNT_FINAL DESC NULLS LAST, PRODUCT_ID")
+                if limit:
+                    sql += (f" OFFSET {max(0, int(offset or 0))} ROWS"
+                            f" FETCH NEXT {max(1, min(int(limit), 2000))} ROWS ONLY")
                 data = _localize(_rows(db.execute_query(sql, params)), lang)
-            adjusted = sum(1 for r in data if r.get('is_adjusted'))
-            total = sum(float(r.get('amount_final') or 0) for r in data)
+                totals = _rows(db.execute_query(
+                    "SELECT COUNT(*) AS SKU_COUNT, "
+                    "SUM(CASE WHEN QTY_FINAL > 0 THEN 1 ELSE 0 END) AS POSITIONS, "
+                    "SUM(IS_ADJUSTED) AS ADJUSTED, ROUND(SUM(AMOUNT_FINAL), 2) AS AMOUNT "
+                    "FROM PLG_ORDER_SNAPSHOT" + where, params))
+            tot = totals[0] if totals else {}
             return {'success': True, 'data': data, 'run_id': run_id,
-                    'adjusted_count': adjusted, 'total_amount': round(total, 2)}
+                    'total': int(tot.get('sku_count') or 0),
+                    'positions': int(tot.get('positions') or 0),
+                    'adjusted_count': int(tot.get('adjusted') or 0),
+                    'total_amount': round(float(tot.get('amount') or 0), 2)}
         except Exception as e:                                   # noqa: BLE001
             return {'success': False, 'error': str(e)}
 
@@ -298,8 +350,9 @@ class PlgAiController:
             ('manual', 'promo', 'event', 'supply', 'quality', 'other') else 'manual'
         try:
             with DatabaseModel() as db:
+                ensure_order_snapshot(db.connection, run_id)
                 orig = _rows(db.execute_query(
-                    "SELECT ORDER_QTY FROM V_PLG_ORDER_PROPOSAL WHERE RUN_ID = :p_r "
+                    "SELECT ORDER_QTY FROM PLG_ORDER_SNAPSHOT WHERE RUN_ID = :p_r "
                     "AND STORE_ID = :p_s AND PRODUCT_ID = :p_p",
                     {'p_r': run_id, 'p_s': store_id, 'p_p': product_id}))
                 qty_model = float(orig[0]['order_qty'] or 0) if orig else None
@@ -321,6 +374,16 @@ class PlgAiController:
                      'p_note2': (payload.get('note') or '')[:600], 'p_user2': username})
                 if not r.get('success'):
                     return {'success': False, 'error': r.get('message')}
+                # Строка снимка правится на месте, в той же транзакции, что и журнал
+                db.execute_query(
+                    "UPDATE PLG_ORDER_SNAPSHOT SET QTY_ADJUSTED = :p_q, ADJ_REASON = :p_reason, "
+                    "ADJ_NOTE = :p_note, ADJ_BY = :p_user, ADJ_AT = SYSTIMESTAMP, "
+                    "QTY_FINAL = :p_q2, AMOUNT_FINAL = ROUND(:p_q3 * PRICE, 2), IS_ADJUSTED = 1 "
+                    "WHERE RUN_ID = :p_r AND STORE_ID = :p_s AND PRODUCT_ID = :p_p",
+                    {'p_q': float(qty), 'p_reason': reason,
+                     'p_note': (payload.get('note') or '')[:600], 'p_user': username,
+                     'p_q2': float(qty), 'p_q3': float(qty),
+                     'p_r': run_id, 'p_s': store_id, 'p_p': product_id})
                 db.connection.commit()
             return {'success': True, 'qty_model': qty_model}
         except Exception as e:                                   # noqa: BLE001
@@ -330,11 +393,16 @@ class PlgAiController:
     def reset_adjustment(payload: Dict[str, Any]) -> Dict[str, Any]:
         try:
             with DatabaseModel() as db:
+                key = {'p_r': payload.get('run_id'), 'p_s': payload.get('store_id'),
+                       'p_p': payload.get('product_id')}
                 db.execute_query(
                     "UPDATE PLG_ORDER_ADJUSTMENTS SET STATUS = 'cancelled' "
-                    "WHERE RUN_ID = :p_r AND STORE_ID = :p_s AND PRODUCT_ID = :p_p",
-                    {'p_r': payload.get('run_id'), 'p_s': payload.get('store_id'),
-                     'p_p': payload.get('product_id')})
+                    "WHERE RUN_ID = :p_r AND STORE_ID = :p_s AND PRODUCT_ID = :p_p", key)
+                db.execute_query(
+                    "UPDATE PLG_ORDER_SNAPSHOT SET QTY_ADJUSTED = NULL, ADJ_REASON = NULL, "
+                    "ADJ_NOTE = NULL, ADJ_BY = NULL, ADJ_AT = NULL, QTY_FINAL = ORDER_QTY, "
+                    "AMOUNT_FINAL = ORDER_AMOUNT, IS_ADJUSTED = 0 "
+                    "WHERE RUN_ID = :p_r AND STORE_ID = :p_s AND PRODUCT_ID = :p_p", key)
                 db.connection.commit()
             return {'success': True}
         except Exception as e:                                   # noqa: BLE001
@@ -346,13 +414,11 @@ class PlgAiController:
         Пакет документов заказа: позиции с учётом корректировок,
         сгруппированные по поставщикам, — данные для печатной формы.
         """
-        res = PlgAiController.order_proposal(lang, run_id, store_id)
+        res = PlgAiController.order_proposal(lang, run_id, store_id, ordered_only=True)
         if not res.get('success'):
             return res
         by_sup: Dict[str, Dict[str, Any]] = {}
         for row in res['data']:
-            if float(row.get('qty_final') or 0) <= 0:
-                continue
             key = row.get('supplier_name') or '—'
             g = by_sup.setdefault(key, {'supplier': key, 'items': [], 'amount': 0.0})
             g['items'].append(row)
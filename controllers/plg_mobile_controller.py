@@ -30,19 +30,25 @@ import random
 import secrets
 import string
 import sys
+import threading
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
 from models.database import DatabaseModel
-from models.plg_voice import ProductMatcher, parse_order
+from models.plg_voice import ProductMatcher, cached_matcher, invalidate_matchers, parse_order
 
 LANGS = ('ru', 'ro', 'en')
 PAIR_ALPHABET = string.ascii_uppercase.replace('O', '').replace('I', '') + '23456789'
 
+# Прогрев сопоставителей всех магазинов — один раз за процесс, с первым
+# запросом устройства: при импорте app базы может не быть (тесты, скрипты)
+_warm_lock = threading.Lock()
+_warm_started = False
+
 
 def _hash_token(token: str) -> str:
     return hashlib.sha256((token or '').encode('utf-8')).hexdigest()
@@ -137,6 +143,7 @@ class PlgMobileController:
                 if not r.get('success'):
                     return {'success': False, 'error': r.get('message')}
                 db.connection.commit()
+            PlgMobileController.warm_matchers(dev['store_id'])
             return {'success': True, 'token': token, 'device_id': dev['id'],
                     'store_id': dev['store_id'], 'lang': dev.get('lang') or 'ru'}
         except Exception as e:                                   # noqa: BLE001
@@ -161,7 +168,8 @@ class PlgMobileController:
                     "UPDATE PLG_MOBILE_DEVICES SET LAST_SEEN = SYSTIMESTAMP WHERE ID = :p_id",
                     {'p_id': rows[0]['id']})
                 db.connection.commit()
-                return rows[0]
+            PlgMobileController.warm_on_first_use()
+            return rows[0]
         except Exception:                                        # noqa: BLE001
             return None
 
@@ -231,9 +239,8 @@ class PlgMobileController:
     @staticmethod
     def catalog(store_id: int, lang: str, query: str = '', limit: int = 50) -> Dict[str, Any]:
         try:
-            items = PlgMobileController._catalog(store_id, lang)
+            items, matcher = PlgMobileController._store_matcher(store_id, lang)
             if query:
-                matcher = PlgMobileController._matcher(items, lang)
                 best, score, options = matcher.match(query)
                 ids = [o['id'] for o in options] or ([best['id']] if best else [])
                 by_id = {i['id']: i for i in items}
@@ -244,12 +251,63 @@ class PlgMobileController:
             return {'success': False, 'error': str(e)}
 
     @staticmethod
-    def _matcher(items: List[Dict[str, Any]], lang: str) -> ProductMatcher:
+    def _load_matcher_data(store_id: int, lang: str):
+        items = PlgMobileController._catalog(store_id, lang)
         with DatabaseModel() as db:
             syn = _rows(db.execute_query(
                 "SELECT PRODUCT_ID, CATEGORY_ID, PHRASE, WEIGHT FROM PLG_VOICE_SYNONYMS "
                 "WHERE LANG = :p_lang", {'p_lang': lang}))
-        return ProductMatcher(items, syn, lang)
+        return items, syn
+
+    @staticmethod
+    def _store_matcher(store_id: int, lang: str) -> Tuple[List[Dict[str, Any]], ProductMatcher]:
+        """Каталог и сопоставитель магазина — из кеша процесса (models/plg_voice.py)."""
+        return cached_matcher(store_id, lang, PlgMobileController._load_matcher_data)
+
+    @staticmethod
+    def warm_matchers(store_id: Optional[int] = None, background: bool = True) -> None:
+        """
+        Прогрев кеша сопоставителей для магазинов с активными устройствами
+        (или одного магазина) на языках этих устройств. Первая голосовая
+        команда после рестарта или правки каталога не должна ждать сборки.
+        """
+        def run():
+            try:
+                sql = ("SELECT DISTINCT STORE_ID, NVL(LANG,'ru') AS LANG FROM PLG_MOBILE_DEVICES "
+                       "WHERE STATUS = 'active'")
+                params: Dict[str, Any] = {}
+                if store_id:
+                    sql += " AND STORE_ID = :p_st"
+                    params['p_st'] = int(store_id)
+                with DatabaseModel() as db:
+                    pairs = _rows(db.execute_query(sql, params))
+                for row in pairs:
+                    PlgMobileController._store_matcher(int(row['store_id']), row['lang'])
+            except Exception:                                    # noqa: BLE001
+                pass
+        if background:
+            threading.Thread(target=run, daemon=True).start()
+        else:
+            run()
+
+    @staticmethod
+    def warm_on_first_use() -> None:
+        """warm_matchers() в фоне при первом обращении устройства к процессу."""
+        global _warm_started
+        with _warm_lock:
+            if _warm_started:
+                return
+            _warm_started = True
+        PlgMobileController.warm_matchers()
+
+    @staticmethod
+    def refresh_matchers(lang: Optional[str] = None, store_id: Optional[int] = None) -> None:
+        """
+        Сброс кеша после правки товаров или синонимов и прогрев заново в фоне.
+        store_id — только этот магазин: прочие подхватят правку по MATCHER_TTL.
+        """
+        invalidate_matchers(store_id, lang)
+        PlgMobileController.warm_matchers(store_id)
 
     # ==================== Голосовой заказ ====================
 
@@ -267,8 +325,8 @@ class PlgMobileController:
         lang = payload.get('lang') if payload.get('lang') in LANGS else (device.get('lang') or 'ru')
         store_id = int(device['store_id'])
         try:
-            items = PlgMobileController._catalog(store_id, lang)
-            parsed = parse_order(text, lang, PlgMobileController._matcher(items, lang))
+            _items, matcher = PlgMobileController._store_matcher(store_id, lang)
+            parsed = parse_order(text, lang, matcher)
 
             order_id = payload.get('order_id')
             order: Optional[Dict[str, Any]] = None
@@ -472,7 +530,7 @@ class PlgMobileController:
                 if not r.get('success'):
                     return {'success': False, 'error': r.get('message')}
                 PlgMobileController._learn_synonym(db, item_id, payload.get('product_id'),
-                                                   device.get('lang') or 'ru')
+                                                   device.get('lang') or 'ru', device['store_id'])
                 PlgMobileController._recalc(db, order_id)
                 db.connection.commit()
             return PlgMobileController.get_order(device, order_id)
@@ -481,11 +539,13 @@ class PlgMobileController:
 
     @staticmethod
     def _learn_synonym(db: DatabaseModel, item_id: int, product_id: Optional[int],
-                       lang: str) -> None:
+                       lang: str, store_id: int) -> None:
         """
         Если менеджер вручную выбрал товар для непонятой фразы — запоминаем эту
         фразу как синоним. Словарь пополняется работой, а не отдельным проектом
         по его наполнению: «помидоры» становятся «Томатами» после первого раза.
+        Пересобирается сопоставитель только магазина, где выбрали товар:
+        исправления идут потоком, и каждое не должно перестраивать все магазины.
         """
         if not product_id:
             return
@@ -509,6 +569,7 @@ class PlgMobileController:
                 {'p_p': int(product_id), 'p_l': lang, 'p_ph': phrase[:200],
                  'p_l2': lang, 'p_ph2': phrase[:200], 'p_p2': int(product_id)})
             db.connection.commit()
+            PlgMobileController.refresh_matchers(lang, store_id)
         except Exception:                                        # noqa: BLE001
             pass
 
@@ -671,7 +732,8 @@ class PlgMobileController:
                      'p_ph': phrase[:200], 'p_w': float(payload.get('weight') or 1),
                      'p_by': username})
                 db.connection.commit()
-                return {'success': bool(r.get('success')), 'error': r.get('message')}
+            PlgMobileController.refresh_matchers()
+            return {'success': bool(r.get('success')), 'error': r.get('message')}
         except Exception as e:                                   # noqa: BLE001
             return {'success': False, 'error': str(e)}
 
@@ -682,6 +744,7 @@ class PlgMobileController:
                 r = db.execute_query("DELETE FROM PLG_VOICE_SYNONYMS WHERE ID = :p_id",
                                      {'p_id': syn_id})
                 db.connection.commit()
-                return {'success': bool(r.get('success')), 'error': r.get('message')}
+            PlgMobileController.refresh_matchers()
+            return {'success': bool(r.get('success')), 'error': r.get('message')}
         except Exception as e:                                   # noqa: BLE001
             return {'success': False, 'error': str(e)}
@@ -5,19 +5,43 @@ Oracle-backed normalized relational store для проекта DECOR.
 from __future__ import annotations
 
 import json
+import random
 import threading
+import time
 import re
 from copy import deepcopy
 from datetime import datetime
 from pathlib import Path
-from difflib import SequenceMatcher
 from typing import Any, Dict, List, Optional
 
-from models.decor_oracle_store import load_state as load_decor_state, save_state as save_decor_state
+from models.decor_matcher import DecorMaterialMatcher
+from models.decor_oracle_store import (
+    DecorChanges,
+    DecorConflictError,
+    load_state as load_decor_state,
+    query_orders as query_decor_orders,
+    report_orders_by_day as report_decor_orders_by_day,
+    save_changes as save_decor_changes,
+    save_state as save_decor_state,
+    state_stamp as decor_state_stamp,
+)
 
 
 class DecorLocalStore:
     _lock = threading.RLock()
+    # Сколько раз операция перечитывает state и применяется заново после конфликта версий
+    _conflict_retries = 5
+    # State без заказов, общий на процесс: читается из Oracle заново, только
+    # когда сменился штамп (запись другого процесса) или после конфликта
+    _state_cache: Optional[Dict[str, Any]] = None
+    _state_checked_at = 0.0
+    # Как часто (с) сверять штамп закэшированного state с Oracle
+    _state_check_sec = 5.0
+    # Разобранный каталог для ai_parse_items: пересобирается, только когда
+    # сменились версии строк материалов (upsert_material / delete_material)
+    _matcher: Optional[DecorMaterialMatcher] = None
+    _matcher_rows: Optional[List[Dict[str, Any]]] = None
+    _matcher_key: Optional[tuple] = None
     _path = Path(__file__).resolve().parent / "data" / "decor_store.json"
     _store_key = "decor_store"
     _image_map_path = Path(__file__).resolve().parent / "data" / "decor_material_images.json"
@@ -236,14 +260,18 @@ class DecorLocalStore:
         }
 
     @classmethod
-    def _load(cls) -> Dict[str, Any]:
+    def _read_state(cls) -> tuple:
+        """State без заказов из Oracle; второй элемент — прочитан ли он (а не взят по умолчанию)."""
         try:
             state = load_decor_state(
                 default_factory=cls._default_state,
                 fallback_path=cls._path,
+                include_orders=False,
             )
+            loaded = True
         except Exception:
             state = cls._default_state()
+            loaded = False
 
         # Backward-compatible fill.
         base = cls._default_state()
@@ -251,11 +279,98 @@ class DecorLocalStore:
             state.setdefault(key, deepcopy(value))
         # Normalize materials to enrich old stores with images/translations.
         state["materials"] = [cls._normalize_material_row(m) for m in state.get("materials", [])]
-        return state
+        return state, loaded
+
+    @classmethod
+    def _load(cls) -> Dict[str, Any]:
+        """
+        Справочная часть state (материалы, настройки, статусы, раздвижные
+        системы, счётчики) из кэша процесса. Заказов в нём нет — они читаются
+        запросами (get_orders и др.). Возвращаемый dict общий: только читать,
+        изменения — через _mutate.
+        """
+        with cls._lock:
+            state = cls._state_cache
+            now = time.monotonic()
+            if state is not None:
+                if now - cls._state_checked_at < cls._state_check_sec:
+                    return state
+                try:
+                    fresh = decor_state_stamp() == state["_versions"].get("stamp")
+                except Exception:
+                    fresh = True
+                if fresh:
+                    cls._state_checked_at = now
+                    return state
+            state, loaded = cls._read_state()
+            if loaded:
+                cls._state_cache = state
+                cls._state_checked_at = now
+            return state
+
+    @classmethod
+    def _invalidate(cls) -> None:
+        with cls._lock:
+            cls._state_cache = None
 
     @classmethod
-    def _save(cls, state: Dict[str, Any]) -> None:
-        save_decor_state(state)
+    def _remember(cls, state: Dict[str, Any], changes: DecorChanges, base_stamp: int) -> None:
+        """
+        После записи: state, прочитанный при штампе base_stamp, становится
+        кэшем, только если кэш всё ещё на этом штампе, а запись подняла его
+        ровно на единицу. Иначе между чтением и записью писал кто-то ещё
+        (другой поток этого процесса тоже) — кэш сбрасывается.
+        """
+        if not changes.reference():
+            return
+        with cls._lock:
+            cached = cls._state_cache
+            stamp = state.get("_versions", {}).get("stamp")
+            if (
+                cached is not None
+                and cached["_versions"].get("stamp", 0) == base_stamp
+                and stamp == base_stamp + 1
+            ):
+                state["orders"] = []
+                state["_versions"]["orders"] = {}
+                cls._state_cache = state
+                cls._state_checked_at = time.monotonic()
+            else:
+                cls._invalidate()
+
+    @classmethod
+    def _save(cls, state: Dict[str, Any], changes: Optional[DecorChanges] = None) -> None:
+        if changes is None:
+            save_decor_state(state)
+        else:
+            save_decor_changes(state, changes)
+
+    @classmethod
+    def _mutate(cls, apply) -> Dict[str, Any]:
+        """
+        Изменение state без общего замка: apply(state, changes) меняет копию
+        state и отмечает тронутые строки в changes, в Oracle уходят только они
+        с проверкой версий. Если строку успел изменить другой процесс или поток,
+        state перечитывается и apply применяется заново.
+        """
+        for _attempt in range(cls._conflict_retries):
+            base = cls._load()
+            base_stamp = base.get("_versions", {}).get("stamp", 0)
+            state = deepcopy(base)
+            changes = DecorChanges()
+            result = apply(state, changes)
+            if not result.get("success"):
+                return result
+            try:
+                cls._save(state, changes)
+            except DecorConflictError:
+                cls._invalidate()
+                # Пауза со случайной добавкой, чтобы соперники не столкнулись снова
+                time.sleep(random.uniform(0.02, 0.1) * (_attempt + 1))
+                continue
+            cls._remember(state, changes, base_stamp)
+            return result
+        return {"success": False, "error": "Данные изменены другим пользователем, повторите операцию"}
 
     @classmethod
     def _status_by_id(cls, state: Dict[str, Any], status_id: int) -> Optional[Dict[str, Any]]:
@@ -310,23 +425,24 @@ class DecorLocalStore:
         return parts
 
     @classmethod
-    def _ai_score_material(cls, token_norm: str, m: Dict[str, Any]) -> float:
-        code = cls._norm_text(m.get("code"))
-        n1 = cls._norm_text(m.get("name"))
-        n2 = cls._norm_text(m.get("name_original"))
-        n3 = cls._norm_text(m.get("name_ro"))
-        if token_norm == code and code:
-            return 100.0
-        if code and code in token_norm:
-            return 95.0
-        if token_norm and any(token_norm in n for n in (n1, n2, n3) if n):
-            return 90.0
-        best = 0.0
-        for cand in [code, n1, n2, n3]:
-            if not cand:
-                continue
-            best = max(best, SequenceMatcher(None, token_norm, cand).ratio() * 100.0)
-        return round(best, 2)
+    def _material_matcher(cls, state: Dict[str, Any]) -> DecorMaterialMatcher:
+        rows = state.get("materials", [])
+        with cls._lock:
+            if cls._matcher is not None and cls._matcher_rows is rows:
+                return cls._matcher
+        # Новый state (после записи настроек, перечитывания) — тот же каталог,
+        # если версии материалов не сдвинулись
+        versions = (state.get("_versions") or {}).get("materials")
+        key = tuple(sorted(versions.items())) if versions else None
+        with cls._lock:
+            if cls._matcher is not None and key is not None and key == cls._matcher_key:
+                cls._matcher_rows = rows
+                return cls._matcher
+        matcher = DecorMaterialMatcher([m for m in rows if (m.get("active") or "Y") == "Y"], cls._norm_text)
+        if key is not None:
+            with cls._lock:
+                cls._matcher, cls._matcher_rows, cls._matcher_key = matcher, rows, key
+        return matcher
 
     @classmethod
     def get_catalog(cls, active_only: bool = True) -> Dict[str, Any]:
@@ -351,20 +467,12 @@ class DecorLocalStore:
             parts = cls._ai_split_parts(text)
             if not parts:
                 return {"success": True, "matches": [], "backend": "local"}
-            state = cls._load()
-            mats = [m for m in state.get("materials", []) if (m.get("active") or "Y") == "Y"]
+            matcher = cls._material_matcher(cls._load())
             matches: List[Dict[str, Any]] = []
             th = max(0, min(int(threshold), 100))
             for part in parts:
                 token = part["token"]
-                token_norm = cls._norm_text(token)
-                best = None
-                best_score = -1.0
-                for m in mats:
-                    score = cls._ai_score_material(token_norm, m)
-                    if score > best_score:
-                        best_score = score
-                        best = m
+                best, best_score = matcher.best(cls._norm_text(token))
                 if best and best_score >= th:
                     qty = round(cls._to_float(part["qty"], 1.0), 3)
                     unit_price = round(cls._to_float(best.get("unit_price")), 2)
@@ -419,8 +527,7 @@ class DecorLocalStore:
 
     @classmethod
     def upsert_material(cls, payload: Dict[str, Any]) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
+        def apply(state: Dict[str, Any], changes: DecorChanges) -> Dict[str, Any]:
             rows = state.get("materials", [])
             mid = int(payload.get("id") or 0)
             data = {
@@ -456,23 +563,27 @@ class DecorLocalStore:
             else:
                 new_id = int(state.get("next_material_id") or 1000)
                 state["next_material_id"] = new_id + 1
+                changes.counters.add("next_material_id")
                 saved = {"id": new_id, **data, "created_at": cls._now_iso(), "updated_at": cls._now_iso()}
                 rows.append(saved)
             state["materials"] = rows
-            cls._save(state)
+            changes.materials.add(int(saved["id"]))
             return {"success": True, "data": saved}
 
+        return cls._mutate(apply)
+
     @classmethod
     def delete_material(cls, material_id: int) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
+        def apply(state: Dict[str, Any], changes: DecorChanges) -> Dict[str, Any]:
             before = len(state.get("materials", []))
             state["materials"] = [m for m in state.get("materials", []) if int(m.get("id") or 0) != int(material_id)]
             if len(state["materials"]) == before:
                 return {"success": False, "error": "Материал не найден"}
-            cls._save(state)
+            changes.deleted_materials.add(int(material_id))
             return {"success": True}
 
+        return cls._mutate(apply)
+
     @classmethod
     def get_settings(cls) -> Dict[str, Any]:
         with cls._lock:
@@ -481,8 +592,7 @@ class DecorLocalStore:
 
     @classmethod
     def update_settings(cls, payload: Dict[str, Any]) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
+        def apply(state: Dict[str, Any], changes: DecorChanges) -> Dict[str, Any]:
             s = state.get("settings", {})
             for key in [
                 "exchange_rate_usd_to_mdl", "markup_percent", "waste_percent",
@@ -505,9 +615,11 @@ class DecorLocalStore:
                 if list_key in payload and isinstance(payload.get(list_key), list):
                     s[list_key] = [str(x).strip() for x in payload[list_key] if str(x).strip()]
             state["settings"] = s
-            cls._save(state)
+            changes.settings = True
             return {"success": True, "data": s}
 
+        return cls._mutate(apply)
+
     @classmethod
     def calculate_quote(cls, payload: Dict[str, Any]) -> Dict[str, Any]:
         with cls._lock:
@@ -707,11 +819,11 @@ class DecorLocalStore:
             return quote
         qd = quote["data"]
 
-        with cls._lock:
-            state = cls._load()
+        def apply(state: Dict[str, Any], changes: DecorChanges) -> Dict[str, Any]:
             order_id = int(state.get("next_order_id") or 1)
             state["next_order_id"] = order_id + 1
             order_number = cls._order_number(state)
+            changes.counters.update(("next_order_id", "next_quote_seq"))
             status = cls._status_by_id(state, 1) or {"id": 1, "code": "lead", "name": "Лид / Новый"}
 
             order = {
@@ -741,9 +853,11 @@ class DecorLocalStore:
                 return {"success": False, "error": "Numele și telefonul clientului sunt obligatorii"}
 
             state.setdefault("orders", []).insert(0, order)
-            cls._save(state)
+            changes.order(order_id, with_quote=True)
             return {"success": True, "data": order}
 
+        return cls._mutate(apply)
+
     @classmethod
     def get_orders(
         cls,
@@ -753,26 +867,17 @@ class DecorLocalStore:
         search: Optional[str] = None,
         limit: int = 200,
     ) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
-            rows = list(state.get("orders", []))
-            if status_id:
-                rows = [o for o in rows if int(o.get("status_id") or 0) == int(status_id)]
-            if date_from:
-                rows = [o for o in rows if str(o.get("created_at") or "")[:10] >= str(date_from)]
-            if date_to:
-                rows = [o for o in rows if str(o.get("created_at") or "")[:10] <= str(date_to)]
-            if search:
-                q = search.strip().lower()
-                rows = [
-                    o for o in rows
-                    if q in str(o.get("order_number") or "").lower()
-                    or q in str(o.get("barcode") or "").lower()
-                    or q in str(o.get("client_name") or "").lower()
-                    or q in str(o.get("client_phone") or "").lower()
-                    or q in str(o.get("project_name") or "").lower()
-                ]
-            return {"success": True, "data": rows[: max(1, min(int(limit or 200), 1000))]}
+        try:
+            rows, _versions = query_decor_orders(
+                status_id=status_id,
+                date_from=date_from,
+                date_to=date_to,
+                search=search,
+                limit=max(1, min(int(limit or 200), 1000)),
+            )
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        return {"success": True, "data": rows}
 
     @classmethod
     def get_recent_orders(cls, limit: int = 20) -> Dict[str, Any]:
@@ -783,42 +888,45 @@ class DecorLocalStore:
         q = (number_or_barcode or "").strip().lower()
         if not q:
             return {"success": False, "error": "Не указан номер заказа"}
-        with cls._lock:
-            state = cls._load()
-            for o in state.get("orders", []):
-                if q in (
-                    str(o.get("order_number") or "").lower(),
-                    str(o.get("barcode") or "").lower(),
-                ):
-                    return {"success": True, "data": o}
-            return {"success": False, "error": "Заказ не найден"}
+        try:
+            rows, _versions = query_decor_orders(number=q, limit=1)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        if rows:
+            return {"success": True, "data": rows[0]}
+        return {"success": False, "error": "Заказ не найден"}
 
     @classmethod
     def get_order_by_id(cls, order_id: int) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
-            for o in state.get("orders", []):
-                if int(o.get("id") or 0) == int(order_id):
-                    return {"success": True, "data": o}
-            return {"success": False, "error": "Заказ не найден"}
+        try:
+            rows, _versions = query_decor_orders(order_id=int(order_id), limit=1)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        if rows:
+            return {"success": True, "data": rows[0]}
+        return {"success": False, "error": "Заказ не найден"}
 
     @classmethod
     def update_order_status(cls, order_id: int, status_id: int) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
+        def apply(state: Dict[str, Any], changes: DecorChanges) -> Dict[str, Any]:
             status = cls._status_by_id(state, status_id)
             if not status:
                 return {"success": False, "error": "Статус не найден"}
-            for o in state.get("orders", []):
+            orders, versions = query_decor_orders(order_id=int(order_id), limit=1)
+            state["orders"] = orders
+            state.setdefault("_versions", {})["orders"] = versions
+            for o in orders:
                 if int(o.get("id") or 0) == int(order_id):
                     o["status_id"] = status["id"]
                     o["status_code"] = status["code"]
                     o["status_name"] = status["name"]
                     o["updated_at"] = cls._now_iso()
-                    cls._save(state)
+                    changes.order(o["id"])
                     return {"success": True, "data": o}
             return {"success": False, "error": "Заказ не найден"}
 
+        return cls._mutate(apply)
+
     @classmethod
     def get_statuses(cls) -> Dict[str, Any]:
         with cls._lock:
@@ -827,16 +935,10 @@ class DecorLocalStore:
 
     @classmethod
     def report_by_day(cls, date_from: Optional[str] = None, date_to: Optional[str] = None) -> Dict[str, Any]:
-        orders = cls.get_orders(date_from=date_from, date_to=date_to, limit=10000)
-        if not orders.get("success"):
-            return orders
-        agg: Dict[str, Dict[str, Any]] = {}
-        for o in orders.get("data", []):
-            day = str(o.get("created_at") or "")[:10] or "unknown"
-            row = agg.setdefault(day, {"date": day, "orders_count": 0, "total_amount": 0.0, "currency": o.get("currency") or "USD"})
-            row["orders_count"] += 1
-            row["total_amount"] = round(cls._to_float(row["total_amount"]) + cls._to_float(o.get("total_amount")), 2)
-        data = [agg[k] for k in sorted(agg.keys(), reverse=True)]
+        try:
+            data = report_decor_orders_by_day(date_from=date_from, date_to=date_to)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
         return {"success": True, "data": data}
 
     # ── Sliding module ─────────────────────────────────────────────
@@ -852,8 +954,7 @@ class DecorLocalStore:
 
     @classmethod
     def update_sliding_material(cls, material_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
+        def apply(state: Dict[str, Any], changes: DecorChanges) -> Dict[str, Any]:
             for m in state.get("sliding_materials", []):
                 if int(m.get("id", 0)) == int(material_id):
                     for key in ("name", "name_ro", "unit", "currency", "family", "active"):
@@ -863,10 +964,12 @@ class DecorLocalStore:
                         m["unit_price"] = round(cls._to_float(payload["unit_price"]), 2)
                     if "weight_g_per_m" in payload:
                         m["weight_g_per_m"] = round(cls._to_float(payload["weight_g_per_m"]), 1)
-                    cls._save(state)
+                    changes.sliding_materials.add(int(m["id"]))
                     return {"success": True, "data": m}
             return {"success": False, "error": "Material not found"}
 
+        return cls._mutate(apply)
+
     @classmethod
     def get_sliding_settings(cls) -> Dict[str, Any]:
         with cls._lock:
@@ -875,8 +978,7 @@ class DecorLocalStore:
 
     @classmethod
     def update_sliding_settings(cls, payload: Dict[str, Any]) -> Dict[str, Any]:
-        with cls._lock:
-            state = cls._load()
+        def apply(state: Dict[str, Any], changes: DecorChanges) -> Dict[str, Any]:
             s = state.get("sliding_settings", {})
             for key in ("assembly_rate", "installation_rate", "painting_rate_m2",
                         "markup_percent", "waste_percent", "exchange_rate_mdl_to_usd"):
@@ -898,9 +1000,11 @@ class DecorLocalStore:
                 if list_key in payload and isinstance(payload[list_key], list):
                     s[list_key] = [str(x).strip() for x in payload[list_key] if str(x).strip()]
             state["sliding_settings"] = s
-            cls._save(state)
+            changes.sliding_settings = True
             return {"success": True, "data": s}
 
+        return cls._mutate(apply)
+
     @classmethod
     def get_sliding_variants(cls) -> Dict[str, Any]:
         with cls._lock:
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 """Deploy Biro26 stock-balance cache tables (officeplus, Oracle 11g).
 
-Idempotent: skips if YBIRO_STOCK_CALC already exists. Runs the DDL from
-sql/biro26/03_biro26_stock_tables.sql via the thick-mode subprocess worker
-(no sqlplus required).
+Idempotent: skips the base tables if YBIRO_STOCK_CALC already exists. Runs
+the DDL from sql/biro26/03_biro26_stock_tables.sql, then the rerunnable
+snapshot-diff upgrade from sql/biro26/20_ybiro_stock_delta.sql, via the
+thick-mode subprocess worker (no sqlplus required).
 
 Usage: ./venv/bin/python deploy_biro26_stock_tables.py
 """
@@ -50,14 +51,63 @@ CREATE TABLE YBIRO_STOCK_CALC_ITEM (
 
 DDL_INDEX = "CREATE INDEX IX_YBIRO_STOCK_ITEM_SC ON YBIRO_STOCK_CALC_ITEM(sc)"
 
+# RO/EN: sql/biro26/20_ybiro_stock_delta.sql — rerunnable guard blocks
+DDL_DELTA_COLS = """
+DECLARE
+  n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO n FROM USER_TAB_COLUMNS
+   WHERE TABLE_NAME = 'YBIRO_STOCK_CALC' AND COLUMN_NAME = 'CALC_MODE';
+  IF n = 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE YBIRO_STOCK_CALC ADD ('
+      || 'calc_mode VARCHAR2(10) DEFAULT ''FULL'', changed_count NUMBER)';
+  END IF;
+  SELECT COUNT(*) INTO n FROM USER_TAB_COLUMNS
+   WHERE TABLE_NAME = 'YBIRO_STOCK_CALC_ITEM' AND COLUMN_NAME = 'IS_DEL';
+  IF n = 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE YBIRO_STOCK_CALC_ITEM ADD (is_del VARCHAR2(1) DEFAULT ''0'')';
+  END IF;
+END;"""
+
+DDL_STOCK_CUR = """
+DECLARE
+  n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO n FROM USER_TABLES WHERE TABLE_NAME = 'YBIRO_STOCK_CUR';
+  IF n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE TABLE YBIRO_STOCK_CUR (sc NUMBER NOT NULL, '
+      || 'dep NUMBER NOT NULL, cant NUMBER, cant1 NUMBER, calc_id NUMBER, '
+      || 'CONSTRAINT pk_ybiro_stock_cur PRIMARY KEY (sc, dep))';
+    EXECUTE IMMEDIATE 'INSERT INTO YBIRO_STOCK_CUR(sc, dep, cant, cant1, calc_id) '
+      || 'SELECT sc, NVL(dep,0), cant, cant1, calc_id FROM YBIRO_STOCK_CALC_ITEM '
+      || 'WHERE calc_id = (SELECT MAX(id) FROM YBIRO_STOCK_CALC WHERE is_latest = ''1'')';
+    COMMIT;
+  END IF;
+END;"""
+
+UPGRADE_STEPS = [
+    ("columns CALC_MODE / CHANGED_COUNT / IS_DEL", DDL_DELTA_COLS, True),
+    ("table YBIRO_STOCK_CUR", DDL_STOCK_CUR, True),
+]
+
+
+def _run(db, steps) -> bool:
+    for label, sql, cap in steps:
+        r = db.call_proc(sql) if cap else db.execute_dml(sql)
+        ok = r.get("success")
+        print(f"  [{'OK ' if ok else 'ERR'}] {label}" + ("" if ok else f" -> {r.get('message')}"))
+        if not ok:
+            return False
+    return True
+
 
 def main() -> int:
     db = Biro26DB()
     ex = db.execute_query(
         "SELECT COUNT(*) FROM all_objects WHERE object_name='YBIRO_STOCK_CALC'")
     if ex["success"] and ex["data"] and ex["data"][0][0] > 0:
-        print("YBIRO_STOCK_CALC already exists — nothing to do.")
-        return 0
+        print("YBIRO_STOCK_CALC already exists — applying the snapshot-diff upgrade only.")
+        return 0 if _run(db, UPGRADE_STEPS) else 1
 
     print("Deploying Biro26 stock-balance cache tables to OfficePlus 11g...")
     steps = [
@@ -67,13 +117,9 @@ def main() -> int:
         ("table YBIRO_STOCK_CALC_ITEM", DDL_TABLE_ITEM, False),
         ("index IX_YBIRO_STOCK_ITEM_SC", DDL_INDEX, False),
     ]
-    for label, sql, cap in steps:
-        r = db.call_proc(sql) if cap else db.execute_dml(sql)
-        ok = r.get("success")
-        print(f"  [{'OK ' if ok else 'ERR'}] {label}" + ("" if ok else f" -> {r.get('message')}"))
-        if not ok:
-            return 1
-    print("Done. YBIRO_STOCK_CALC / YBIRO_STOCK_CALC_ITEM ready.")
+    if not _run(db, steps + UPGRADE_STEPS):
+        return 1
+    print("Done. YBIRO_STOCK_CALC / YBIRO_STOCK_CALC_ITEM / YBIRO_STOCK_CUR ready.")
     return 0
 
 
@@ -200,6 +200,18 @@ def main() -> None:
         "110_peco_algorithms.sql",
         "111_peco_paths_demo.sql",
         "112_plg_i18n_algos.sql",
+        "113_plg_gen_checkpoints.sql",
+        "114_plg_ai_vector_index.sql",
+        "115_plg_order_snapshot.sql",
+        "116_plg_job_queue.sql",
+        "117_peco_gps_ingest.sql",
+        "118_peco_gps_trip_state.sql",
+        "119_peco_backtest_cache.sql",
+        "120_peco_autoorder_queue.sql",
+        "121_decor_row_versions.sql",
+        "122_decor_order_indexes.sql",
+        "123_colass_catalog_version.sql",
+        "124_nufarul_photo_thumbs.sql",
         # 105_peco_demo_station.sql НАМЕРЕННО не в этом списке: это демо-
         # станция, а не справочник, запускается только вручную и никогда
         # на production (см. docs/PECO/README.md).
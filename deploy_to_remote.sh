@@ -240,6 +240,9 @@ $SSH_CMD "$REMOTE_USER@$REMOTE_HOST" "bash -s" << REMOTEEOF
   # Перезапуск ТОЛЬКО через systemd (правило CLAUDE.md: pkill+nohup уводит
   # процесс из-под systemd и приложение не поднимется после ребута сервера)
   sudo systemctl restart artgranit
+  # Воркер очереди PLG (юнит ставит setup-https.sh) перезапускается вместе
+  # с приложением, иначе задания продолжат выполняться старым кодом.
+  sudo systemctl restart artgranit-plg-worker || echo '  ⚠ юнита artgranit-plg-worker нет — запустите setup-https.sh, иначе прогоны PLG не выполняются'
   sleep 4
   systemctl is-active --quiet artgranit && echo '  ✓ Зависимости установлены, artgranit перезапущен (systemd)' || echo '  ⚠ artgranit не active — проверьте journalctl -u artgranit'
 REMOTEEOF
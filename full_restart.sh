@@ -36,6 +36,9 @@ export ENVIRONMENT=REMOTE
 export PORT=8000
 # Запуск в фоне с перенаправлением логов
 nohup python3 app.py > app.log 2>&1 &
+# Воркер очереди прогонов PLG: при ENVIRONMENT=REMOTE встроенный диспетчер
+# выключен, без него прогоны остаются в статусе 'queued'.
+nohup python3 scripts/plg_worker.py > plg_worker.log 2>&1 &
 
 echo "=== [5/5] Проверка статуса... ==="
 sleep 3
@@ -48,6 +51,11 @@ if ps aux | grep "app.py" | grep -v grep > /dev/null; then
     ps aux | grep "app.py" | grep -v grep
     echo "---------------------------------------------------"
     echo "Логи доступны в файле: app.log"
+    if ps aux | grep "plg_worker.py" | grep -v grep > /dev/null; then
+        echo "✅ Воркер очереди PLG запущен (лог: plg_worker.log)"
+    else
+        echo "⚠️ Воркер очереди PLG не запустился, см. plg_worker.log"
+    fi
     echo "Проверка в браузере: http://92.5.3.187:8000/test.html"
 else
     echo "❌ ОШИБКА: Приложение не запустилось. Последние строки лога:"
@@ -0,0 +1,386 @@
+"""RO: Strat comun de cache pentru modelele Biro26.
+    EN: Shared cache layer for the Biro26 models.
+
+RO: De ce exista. Ofertele de credit, configuratia vitrinei, "cele mai
+    populare", versiunea din subsol si setarile providerilor de credit aveau
+    fiecare cache-ul lui scris de mina: alt TTL, alt lock, alt fir de
+    reimprospatare, iar niciunul nu era vazut de ceilalti workeri gunicorn —
+    un save din admin invalida doar workerul care l-a primit. Aici e un singur
+    mecanism:
+      * regiuni cu nume (CacheRegion), fiecare cu TTL-ul ei;
+      * stale-while-revalidate optional (swr=True): dupa expirare se intoarce
+        IMEDIAT valoarea veche, iar reincarcarea pleaca intr-un fir de fundal;
+      * single-flight: un singur apel per cheie incarca din Oracle, ceilalti
+        asteapta rezultatul lui (un miss rece nu porneste N workeri-subproces);
+      * invalidare explicita (hard = se arunca, soft = devine "expirata") plus
+        hook-uri on_invalidate;
+      * partajare optionala intre procese (BIRO26_CACHE_SHARED=1): valorile si
+        stampila de invalidare stau in fisiere in BIRO26_CACHE_DIR — implicit
+        /dev/shm, adica memorie partajata, nu disc;
+      * contoare hit/miss per regiune (stats(), /api/biro26/cache/stats).
+EN: one cache subsystem instead of five hand-rolled ones: named regions with a
+    TTL, optional stale-while-revalidate, single-flight loads, explicit
+    invalidation with hooks, optional cross-process sharing through files on
+    tmpfs (/dev/shm) and per-region hit/miss counters.
+
+RO: O incarcare care a inceput INAINTE de o invalidare se pastreaza, dar deja
+    expirata — altfel un refresh pornit inainte de save ar pune la loc, ca
+    proaspete, datele de dinainte de save.
+EN: a load that started before an invalidation is kept but already stale, so
+    an in-flight refresh cannot resurrect pre-save data as fresh.
+"""
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# RO: partajare intre procese (workerii gunicorn) — implicit oprita
+# EN: cross-process sharing (gunicorn workers) — off by default
+SHARED = os.environ.get("BIRO26_CACHE_SHARED", "").strip().lower() in ("1", "true", "yes", "on")
+CACHE_DIR = os.environ.get("BIRO26_CACHE_DIR") or os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "biro26-cache")
+
+_COUNTERS = ("hits", "stale", "misses", "shared_hits", "loads", "errors", "invalidations")
+
+
+class _Entry(NamedTuple):
+    value: Any
+    started: float       # RO: cind a inceput incarcarea / EN: when its load started
+    fresh_until: float   # RO: 0 = expirata (invalidata) / EN: 0 = stale (invalidated)
+
+
+class _Flight:
+    """RO: incarcarea in curs a unei chei (single-flight) / EN: an in-flight load."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def private_dir(path: str) -> bool:
+    """RO: creeaza directorul (0700) si spune daca e sigur sa tinem fisiere in
+    el: director adevarat (nu link), al nostru, fara drepturi pentru grup sau
+    altii. /tmp si /dev/shm sint comune — un director creat inaintea noastra de
+    alt utilizator local i-ar lasa sa ne puna fisiere false.
+    EN: create the directory (0700) and tell whether it is safe to keep files
+    in: a real directory owned by our uid with no group/other bits."""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid()
+            and stat.S_IMODE(st.st_mode) & 0o077 == 0)
+
+
+class _FileStore:
+    """RO: valorile si stampila de invalidare ale unei regiuni, in fisiere JSON.
+
+    Scrierea e atomica (fisier temporar + os.replace), iar orice eroare de
+    I/O inseamna doar "nu e in cache" — partajarea nu poate strica cererea.
+    Directorul trebuie sa treaca private_dir(), altfel ok=False si regiunea
+    ramine locala. Valorile care nu trec identic prin JSON nu se partajeaza.
+    EN: per-region JSON value files + invalidation stamp; atomic writes, any
+    I/O error degrades to a plain miss. The directory must pass private_dir(),
+    otherwise ok=False and the region stays process-local. Values that do not
+    round-trip through JSON unchanged are not shared.
+    """
+
+    def __init__(self, root: str, name: str) -> None:
+        self.root, self.name = root, name
+        self.stamp_path = os.path.join(root, f"{name}.stamp")
+        self.ok = private_dir(root)
+
+    def _path(self, key: Any) -> str:
+        h = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.root, f"{self.name}-{h}.json")
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def read(self, key: Any) -> Optional[Tuple[float, float, Any]]:
+        """RO: (started, finished, value) sau None / EN: or None."""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                k, started, finished, value = json.load(f)
+        except (OSError, ValueError, TypeError):
+            return None
+        return (float(started), float(finished), value) if k == repr(key) else None
+
+    def write(self, key: Any, started: float, finished: float, value: Any) -> None:
+        try:
+            text = json.dumps([repr(key), started, finished, value], ensure_ascii=False)
+            if json.loads(text)[3] != value:        # tuple, Decimal, int keys...
+                return
+        except (TypeError, ValueError):
+            return
+        self._atomic_write(self._path(key), text.encode("utf-8"))
+
+    def stamp(self) -> int:
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def read_stamp(self) -> Tuple[float, bool]:
+        """RO: (momentul invalidarii, hard) / EN: (invalidated at, hard)."""
+        try:
+            with open(self.stamp_path, "r", encoding="ascii") as f:
+                at, hard = f.read().split()
+            return float(at), hard == "1"
+        except (OSError, ValueError):
+            return 0.0, False
+
+    def bump(self, at: float, hard: bool, key: Any) -> int:
+        if hard:
+            paths = ([self._path(key)] if key is not None
+                     else glob.glob(os.path.join(glob.escape(self.root), f"{self.name}-*.json")))
+            for p in paths:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+        self._atomic_write(self.stamp_path, f"{at!r} {int(hard)}".encode("ascii"))
+        return self.stamp()
+
+
+_REGISTRY: "weakref.WeakValueDictionary[str, CacheRegion]" = weakref.WeakValueDictionary()
+_REGISTRY_LOCK = threading.Lock()
+
+
+class CacheRegion:
+    """RO: o regiune de cache cu nume: TTL, SWR optional, single-flight.
+
+    get(key, loader) intoarce valoarea din cache sau o incarca prin loader().
+    cache_if(value) -> False = valoarea se intoarce, dar nu se pastreaza
+    (ex. ofertele de credit: doar rezultatele reusite). secret=True = valorile
+    nu se scriu niciodata in fisierele partajate (doar invalidarea se
+    propaga) — pentru setari cu parole.
+    EN: a named cache region. get(key, loader) serves from cache or calls
+    loader(); cache_if filters what is kept; secret regions never write
+    values to the shared files, only invalidations.
+    """
+
+    def __init__(self, name: str, ttl: float, *, swr: bool = False,
+                 cache_if: Optional[Callable[[Any], bool]] = None,
+                 shared: Optional[bool] = None, secret: bool = False,
+                 cache_dir: Optional[str] = None, register: bool = True) -> None:
+        self.name, self.ttl, self.swr = name, float(ttl), swr
+        self.cache_if, self.secret = cache_if, secret
+        self._lock = threading.Lock()
+        self._entries: Dict[Any, _Entry] = {}
+        self._flights: Dict[Any, _Flight] = {}
+        self._refreshing: set = set()
+        self._hooks: List[Callable[[Optional[Any]], None]] = []
+        self._inval_at = 0.0
+        self._counts = dict.fromkeys(_COUNTERS, 0)
+        self._store: Optional[_FileStore] = None
+        self._stamp_seen = 0
+        store = _FileStore(cache_dir or CACHE_DIR, name) if (SHARED if shared is None else shared) else None
+        if store is not None and store.ok:
+            self._store = store
+            self._stamp_seen = self._store.stamp()
+            self._inval_at = self._store.read_stamp()[0]
+        if register:
+            with _REGISTRY_LOCK:
+                _REGISTRY[name] = self
+
+    # ── citire / read ─────────────────────────────────────────────────
+    def get(self, key: Any, loader: Callable[[], Any]) -> Any:
+        self._sync()
+        now = time.time()
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None and e.fresh_until > now:
+                self._counts["hits"] += 1
+                return e.value
+        if self._store is not None and not self.secret:
+            e = self._adopt(key, e, now)
+            if e is not None and e.fresh_until > now:
+                return e.value
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None and e.fresh_until > now:
+                self._counts["hits"] += 1
+                return e.value
+            if e is not None and self.swr:
+                # RO: servim copia veche, reincarcarea pleaca in fundal
+                # EN: serve stale, refresh in the background (once per key)
+                self._counts["stale"] += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key, loader),
+                                     daemon=True, name=f"cache-{self.name}").start()
+                return e.value
+            self._counts["misses"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = self._load(key, loader)
+            return flight.value
+        except BaseException as ex:
+            flight.error = ex
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def peek(self, key: Any) -> Any:
+        """RO: valoarea din cache (chiar expirata), fara incarcare / EN: no load."""
+        with self._lock:
+            e = self._entries.get(key)
+        return e.value if e is not None else None
+
+    def _load(self, key: Any, loader: Callable[[], Any]) -> Any:
+        started = time.time()
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+        finished = time.time()
+        with self._lock:
+            self._counts["loads"] += 1
+            if self.cache_if is not None and not self.cache_if(value):
+                return value
+            current = started > self._inval_at
+            self._entries[key] = _Entry(value, started, finished + self.ttl if current else 0.0)
+        if current and self._store is not None and not self.secret:
+            self._store.write(key, started, finished, value)
+        return value
+
+    def _refresh(self, key: Any, loader: Callable[[], Any]) -> None:
+        try:
+            self._load(key, loader)
+        except Exception:                                # noqa: BLE001
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _adopt(self, key: Any, e: Optional[_Entry], now: float) -> Optional[_Entry]:
+        """RO: preia valoarea incarcata de alt proces, daca e mai noua.
+        EN: adopt another process's value when it is newer than ours."""
+        got = self._store.read(key)
+        if got is None:
+            return e
+        started, finished, value = got
+        if e is not None and started <= e.started:
+            return e
+        with self._lock:
+            fresh = finished + self.ttl if started > self._inval_at else 0.0
+            e = self._entries[key] = _Entry(value, started, fresh)
+            if fresh > now:
+                self._counts["shared_hits"] += 1
+        return e
+
+    def _sync(self) -> None:
+        """RO: aplica invalidarile facute de alte procese / EN: remote invalidations."""
+        if self._store is None:
+            return
+        stamp = self._store.stamp()
+        if stamp == self._stamp_seen:
+            return
+        self._stamp_seen = stamp
+        at, hard = self._store.read_stamp()
+        if at > self._inval_at:
+            self._invalidate_local(None, hard, at)
+
+    # ── invalidare / invalidation ─────────────────────────────────────
+    def invalidate(self, key: Optional[Any] = None, hard: bool = True) -> None:
+        """RO: key=None = toata regiunea. hard=True arunca valorile; hard=False
+        le marcheaza expirate (o regiune swr le mai serveste o data, cit se
+        reincarca). Se propaga la celelalte procese cind regiunea e partajata.
+        EN: key=None drops the whole region; soft invalidation only marks
+        entries stale. Broadcast to other processes when shared."""
+        at = time.time()
+        self._invalidate_local(key, hard, at)
+        if self._store is not None:
+            # RO: celelalte procese nu stiu cheia — invalideaza toata regiunea
+            # EN: other processes apply it region-wide
+            stamp = self._store.bump(at, hard, key)
+            with self._lock:
+                self._stamp_seen = stamp
+
+    def _invalidate_local(self, key: Optional[Any], hard: bool, at: float) -> None:
+        with self._lock:
+            self._counts["invalidations"] += 1
+            self._inval_at = max(self._inval_at, at)
+            keys = list(self._entries) if key is None else [key]
+            for k in keys:
+                e = self._entries.get(k)
+                if e is None:
+                    continue
+                if hard:
+                    del self._entries[k]
+                else:
+                    self._entries[k] = e._replace(fresh_until=0.0)
+            hooks = list(self._hooks)
+        for fn in hooks:
+            try:
+                fn(key)
+            except Exception:                            # noqa: BLE001
+                pass
+
+    def on_invalidate(self, fn: Callable[[Optional[Any]], None]) -> Callable[[Optional[Any]], None]:
+        """RO: fn(key) dupa fiecare invalidare (key=None = toata regiunea).
+        EN: hook called after every invalidation; usable as a decorator."""
+        with self._lock:
+            self._hooks.append(fn)
+        return fn
+
+    # ── metrici / metrics ─────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self._counts)
+            c.update(entries=len(self._entries), ttl=self.ttl, swr=self.swr,
+                     shared=self._store is not None)
+        served = c["hits"] + c["stale"] + c["shared_hits"]
+        total = served + c["misses"]
+        c["hit_ratio"] = round(served / total, 3) if total else None
+        return c
+
+
+def region(name: str, ttl: float, **kw: Any) -> CacheRegion:
+    """RO: regiunea cu acest nume (creata la primul apel) / EN: get-or-create."""
+    with _REGISTRY_LOCK:
+        r = _REGISTRY.get(name)
+    return r if r is not None else CacheRegion(name, ttl, **kw)
+
+
+def stats() -> Dict[str, Any]:
+    """RO: contoarele tuturor regiunilor vii / EN: counters of all live regions."""
+    return {"success": True, "shared": SHARED,
+            "regions": {name: r.stats() for name, r in sorted(_REGISTRY.items())}}
+
+
+def invalidate(name: str, key: Optional[Any] = None, hard: bool = True) -> bool:
+    r = _REGISTRY.get(name)
+    if r is None:
+        return False
+    r.invalidate(key, hard)
+    return True
@@ -0,0 +1,766 @@
+"""RO: Replica locala a catalogului Biro26 pentru magazinul public.
+    EN: Local replica of the Biro26 catalog for the public shop.
+
+RO: Biro26Store.get_products_stock pagineaza ~78k produse prin worker-ul thick
+    (ROWNUM peste ROW_NUMBER pe BIRO26_GOODS, lista de preturi la data,
+    cautare LIKE '%q%' pe denumiri / coduri / barcode-uri / descriere,
+    COUNT(*) separat). Paginile adinci si numaratorile de fatete incarca
+    serverul 11g la fiecare cerere a magazinului. Replica tine in proces
+    nucleul ieftin al interogarii (u + g + mp + pl) si:
+      * indexul de cautare — textele cautabile lipite in "haystack"-uri cu
+        separatori, offset -> produs prin bisect. LIKE '%q%' e cautare de
+        SUBSIR, pe care un index pe cuvinte nu il reproduce; str.find pe un
+        sir lung ruleaza in C, fara bucla Python pe fiecare produs;
+      * ordinea — DENUMIREA in sortarea BINARY a sesiunii (octetii din setul
+        de caractere al bazei), pretul efectiv la data ceruta, NULLS LAST;
+      * fatetele precalculate — brand, grupa, categorie, intervale de pret.
+    Stocul / rezervarile / barcode-ul / variantele raman LIVE, dar se citesc
+    DOAR pentru codurile paginii (STOCK_PAGE_JOINS, ca in interogarea live).
+
+    Reimprospatare: completa la pornire si la fiecare FULL_SEC; intre ele
+    incrementala la REFRESH_SEC — codurile schimbate dupa ORA_ROWSCN (cite un
+    prag pe tabel), plus numaratori de control: o nepotrivire (stergere fizica,
+    produs scos din TIP='P') duce la reincarcare completa. Replica e imutabila:
+    reimprospatarea construieste una noua si o inlocuieste atomic.
+
+EN: the shop's catalog grid served from an in-process replica of the cheap
+    query core: substring search over separator-joined haystacks, BINARY name
+    order, as-of-date effective prices and precomputed facets. Stock-related
+    columns still come live, for the page's codes only. Full reload at start
+    and every FULL_SEC, ORA_ROWSCN-driven incremental refresh in between,
+    control counts force a full reload on physical deletes.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models.biro26_db import Biro26DB
+from models.biro26_oracle_store import (
+    RETAIL1_FEED_EXPR, STOCK_PAGE_COLS, STOCK_PAGE_JOINS, Biro26Store,
+    _rows, goods_dedup_sql)
+
+_log = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("BIRO26_CATALOG_REPLICA", "1") != "0"
+REFRESH_SEC = float(os.environ.get("BIRO26_CATALOG_REFRESH_SEC", "120"))
+FULL_SEC = float(os.environ.get("BIRO26_CATALOG_FULL_SEC", str(6 * 3600)))
+# RO: cite zile in urma se pastreaza din lista de preturi (price_date mai
+#     vechi => interogarea live) / EN: price-list history kept locally
+PRICE_HISTORY_DAYS = int(os.environ.get("BIRO26_CATALOG_PRICE_DAYS", "31"))
+MAX_INCREMENTAL = 5000          # RO: mai multe coduri schimbate => reincarcare completa
+PRICE_BUCKETS = (0, 50, 100, 200, 500, 1000, 2000, 5000)
+_IN_CHUNK = 900
+_DATE_VIEWS = 4
+
+# RO: setul de caractere al bazei -> codec Python; sortarea BINARY compara octetii
+# EN: database character set -> Python codec; BINARY sort compares the bytes
+_CHARSET_CODECS = {
+    "CL8MSWIN1251": "cp1251", "EE8MSWIN1250": "cp1250", "WE8MSWIN1252": "cp1252",
+    "WE8ISO8859P1": "latin-1", "CL8ISO8859P5": "iso8859_5",
+    "AL32UTF8": "utf-8", "UTF8": "utf-8",
+}
+
+# RO: coloanele nucleului, in ordinea din _core_sql / EN: core columns, _core_sql order
+CORE_COLS = ("cod", "codvechi", "denumirea", "namerus", "um", "tip", "gr1", "isarhiv",
+             "grupa", "categorie", "brand", "photo_url", "image_link", "matgr1",
+             "angro_feed", "ionline_feed", "retail1_feed")
+(_COD, _CODVECHI, _DEN, _NAMERUS, _UM, _TIP, _GR1, _ISARHIV, _GRUPA, _CATEG,
+ _BRAND, _PHOTO, _IMGLINK, _MATGR1, _ANGRO, _IONLINE, _RETAIL) = range(len(CORE_COLS))
+
+# RO: tabelele urmarite: prag ORA_ROWSCN + coloana codului produsului
+# EN: tracked tables: ORA_ROWSCN watermark + product code column
+_TRACKED = (
+    ("U", "TMS_UNIVERS", "COD", "TIP = 'P'"),
+    ("G", "BIRO26_GOODS", "COD_UNIVERS", ""),
+    ("M", "TMS_MPT", "COD", ""),
+    ("B", "TMS_MPT_BARCODE", "COD", ""),
+    ("W", "TMS_MPT_WEBATTR", "COD", ""),
+    ("P", "TPR1D_PERPRLIST", "SC", "CODPRICE = 1"),
+)
+
+_SEP = "\x00"       # RO: intre cimpurile unui produs / EN: between a product's fields
+_END = "\x01"       # RO: intre produse / EN: between products
+_LIKE_ANY = "[^\x00\x01]*"
+_LIKE_ONE = "[^\x00\x01]"
+
+
+def name_key(charset: str):
+    """RO: cheia sortarii BINARY pentru setul de caractere dat.
+    EN: BINARY sort key for the given database character set."""
+    codec = _CHARSET_CODECS.get((charset or "").upper(), "utf-8")
+    return lambda s: s.encode(codec, "replace")
+
+
+def like_regex(pattern: str):
+    """RO: LIKE Oracle (% si _) -> regex care nu trece peste separatori.
+    EN: Oracle LIKE pattern -> regex that never crosses field separators."""
+    out = []
+    for ch in pattern:
+        if ch == "%":
+            out.append(_LIKE_ANY)
+        elif ch == "_":
+            out.append(_LIKE_ONE)
+        else:
+            out.append(re.escape(ch))
+    return re.compile("".join(out))
+
+
+def _num(v: Any) -> Any:
+    """RO: ca _cell din worker: numarul intreg ramine int.
+    EN: like the worker's _cell: integral numbers stay int."""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _round2(v: Optional[float]) -> Optional[float]:
+    """RO: ROUND(v / 1.2, 2) ca in Oracle (jumatatea departe de zero).
+    EN: Oracle ROUND(v / 1.2, 2), half away from zero."""
+    if v is None:
+        return None
+    q = (Decimal(repr(v)) / Decimal("1.2")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return _num(float(q))
+
+
+def _sql_eq(value: Any, param: Any) -> bool:
+    """RO: egalitatea SQL cu conversia implicita NUMBER <- sir.
+    EN: SQL equality with the implicit NUMBER <- string conversion."""
+    if value is None or param is None:
+        return False
+    if isinstance(value, (int, float)) and not isinstance(param, (int, float)):
+        try:
+            return float(value) == float(str(param).strip())
+        except ValueError:
+            return False
+    return value == param
+
+
+def _archived(v: Any) -> bool:
+    return v is not None and str(v) == "2"
+
+
+def _in_list(col: str, cods: Iterable[int]) -> str:
+    cods = sorted({int(c) for c in cods})
+    parts = [f"{col} IN ({','.join(str(c) for c in cods[i:i + _IN_CHUNK])})"
+             for i in range(0, len(cods), _IN_CHUNK)]
+    return "(" + " OR ".join(parts or ["1 = 0"]) + ")"
+
+
+class _Haystack:
+    """RO: textele produselor lipite intr-un singur sir; offset -> cod prin bisect.
+    EN: all products' texts in one string; offset -> code via bisect."""
+
+    def __init__(self, items: Iterable[Tuple[int, List[Optional[str]]]]):
+        parts: List[str] = []
+        self._starts: List[int] = []
+        self._cods: List[int] = []
+        pos = 0
+        for cod, fields in items:
+            fields = [f for f in fields if f is not None]
+            if not fields:
+                continue
+            seg = _SEP.join(fields)
+            self._starts.append(pos)
+            self._cods.append(cod)
+            parts.append(seg)
+            pos += len(seg) + 1
+        self._text = _END.join(parts)
+
+    def all(self) -> set:
+        return set(self._cods)
+
+    def find(self, needle: str) -> set:
+        out, text, starts = set(), self._text, self._starts
+        i = text.find(needle)
+        while i >= 0:
+            k = bisect.bisect_right(starts, i) - 1
+            out.add(self._cods[k])
+            if k + 1 >= len(starts):
+                break
+            i = text.find(needle, starts[k + 1])
+        return out
+
+    def match(self, rx) -> set:
+        out, text, starts = set(), self._text, self._starts
+        m = rx.search(text)
+        while m is not None:
+            k = bisect.bisect_right(starts, m.start()) - 1
+            out.add(self._cods[k])
+            if k + 1 >= len(starts):
+                break
+            m = rx.search(text, starts[k + 1])
+        return out
+
+
+class _DateView:
+    """RO: preturile efective la o data + ordinile de sortare.
+    EN: effective prices as of one date + the sort orders."""
+
+    def __init__(self, replica: "CatalogReplica", price_date: str):
+        at = price_date + " 00:00:00"
+        entries: List[Tuple] = []
+        for cod in replica.order:
+            p = replica.products[cod]
+            hits = [iv for iv in replica.prices.get(cod, ()) if iv[0] <= at <= iv[1]]
+            # RO: LEFT JOIN: fara interval -> un rind cu pl NULL; doua intervale
+            #     suprapuse -> doua rinduri, exact ca join-ul live
+            for iv in hits or [None]:
+                angro = iv[3] if iv is not None and iv[3] is not None else p[_ANGRO]
+                ionline = iv[4] if iv is not None and iv[4] is not None else p[_IONLINE]
+                retail = iv[2] if iv is not None and iv[2] is not None else p[_RETAIL]
+                entries.append((cod, angro, ionline, retail, _round2(angro)))
+        self.entries = entries
+        self._orders: Dict[str, List[int]] = {"name": list(range(len(entries)))}
+        self._lock = threading.Lock()
+        products = replica.products
+        self.base_facets = replica.facet_counts(
+            entries, [i for i, e in enumerate(entries) if not _archived(products[e[0]][_ISARHIV])])
+
+    def order(self, sort: str) -> List[int]:
+        got = self._orders.get(sort)
+        if got is not None:
+            return got
+        with self._lock:
+            e = self.entries
+            n = len(e)
+            if sort == "name_desc":
+                got = list(range(n - 1, -1, -1))
+            elif sort == "price_desc":
+                got = sorted(range(n), key=lambda i: (e[i][3] is None, -(e[i][3] or 0), i))
+            else:  # price_asc
+                got = sorted(range(n), key=lambda i: (e[i][3] is None, e[i][3] or 0, i))
+            self._orders[sort] = got
+            return got
+
+
+class CatalogReplica:
+    """RO: instantaneu imutabil al catalogului + motorul de interogare.
+    EN: immutable catalog snapshot + the query engine."""
+
+    def __init__(self, products: Dict[int, tuple], barcodes: Dict[int, List[str]],
+                 webattr: Dict[int, tuple], prices: Dict[int, List[tuple]],
+                 i18n: Optional[Dict[Tuple[str, str], List[tuple]]] = None,
+                 charset: str = "AL32UTF8", price_horizon: str = "1900-01-01"):
+        self.products = products
+        self.barcodes = barcodes
+        self.webattr = webattr
+        self.prices = prices
+        self.i18n = i18n or {}
+        self.charset = charset
+        self.price_horizon = price_horizon
+        self.key = name_key(charset)
+        key = self.key
+        self.order = sorted(products, key=lambda c: (
+            products[c][_DEN] is None, key(products[c][_DEN] or ""), c))
+        self._names = _Haystack(
+            (c, [_up(p[_DEN]), _up(p[_NAMERUS]),
+                 *[_up(x) for x in (webattr.get(c) or (None, None, None))[:2]]])
+            for c, p in products.items())
+        self._codes = _Haystack((c, [None if p[_CODVECHI] is None else str(p[_CODVECHI]),
+                                     *barcodes.get(c, ())])
+                                for c, p in products.items())
+        self._desc = _Haystack((c, [_up((webattr.get(c) or (None, None, None))[2])])
+                               for c in products)
+        self._views: Dict[str, _DateView] = {}
+        self._views_lock = threading.Lock()
+
+    # ── counts for the incremental control ────────────────────────────
+    def counts(self) -> Dict[str, int]:
+        return {"U": len(self.products),
+                "B": sum(len(v) for v in self.barcodes.values()),
+                "W": len(self.webattr),
+                "P": sum(len(v) for v in self.prices.values())}
+
+    def updated(self, cods: Iterable[int], products: Dict[int, tuple],
+                barcodes: Dict[int, List[str]], webattr: Dict[int, tuple],
+                prices: Dict[int, List[tuple]]) -> "CatalogReplica":
+        """RO: replica noua cu codurile `cods` inlocuite (lipsa = sters).
+        EN: a new replica with `cods` replaced (absent = deleted)."""
+        p2, b2, w2, pr2 = dict(self.products), dict(self.barcodes), dict(self.webattr), dict(self.prices)
+        for c in cods:
+            for src, dst in ((products, p2), (barcodes, b2), (webattr, w2), (prices, pr2)):
+                if c in src:
+                    dst[c] = src[c]
+                else:
+                    dst.pop(c, None)
+        return CatalogReplica(p2, b2, w2, pr2, self.i18n, self.charset, self.price_horizon)
+
+    # ── search ────────────────────────────────────────────────────────
+    def search(self, q_norm: str) -> set:
+        """RO: aceleasi coduri ca subinterogarea live: LIKE '%q%' pe UPPER(DENUMIREA /
+        NAMERUS / DENUMIRE_FULL_RO / _RU), CODVECHI si BARCODE (fara UPPER), plus
+        INSTR pe UPPER(DESCRIERE_NON_DIACR_RO) (literal, fara % si _).
+        EN: same codes as the live search subquery."""
+        if "%" in q_norm or "_" in q_norm or not q_norm:
+            # RO: '%' de la capete nu schimba potrivirea unui subsir
+            # EN: leading/trailing '%' never change a substring match
+            core = q_norm.strip("%")
+            hits = self._names.match(like_regex(core.upper())) | self._codes.match(like_regex(core))
+        else:
+            hits = self._names.find(q_norm.upper()) | self._codes.find(q_norm)
+        if q_norm:
+            hits |= self._desc.find(q_norm.upper())
+        return hits
+
+    # ── prices as of a date ───────────────────────────────────────────
+    def view(self, price_date: str) -> _DateView:
+        v = self._views.get(price_date)
+        if v is not None:
+            return v
+        with self._views_lock:
+            v = self._views.get(price_date)
+            if v is None:
+                if len(self._views) >= _DATE_VIEWS:
+                    self._views.pop(next(iter(self._views)))
+                v = self._views[price_date] = _DateView(self, price_date)
+            return v
+
+    # ── query ─────────────────────────────────────────────────────────
+    def query(self, search: Optional[str] = None, gr1: Optional[str] = None,
+              brand: Optional[str] = None, categorie: Optional[str] = None,
+              grupa: Optional[str] = None, cod: Optional[int] = None,
+              limit: int = 200, offset: int = 0, price_date: Optional[str] = None,
+              price_min: Optional[float] = None, price_max: Optional[float] = None,
+              only_new: bool = False, with_count: bool = False,
+              archived: bool = False, sort: str = "name",
+              facets: bool = False) -> Dict[str, Any]:
+        """RO: aceiasi parametri ca Biro26Store.get_products_stock; intoarce
+        {entries: pagina de (cod, angro, ionline, retail1, angro_fara_tva),
+        total?, facets?}. EN: same parameters as get_products_stock."""
+        view = self.view(price_date or date.today().isoformat())
+        entries = view.entries
+        products = self.products
+        checks = []
+        if search:
+            try:
+                from models.biro26pt_loader import cp1251_safe
+                q_norm = cp1251_safe(str(search)).strip()
+            except Exception:
+                q_norm = str(search).strip()
+            hits = self.search(q_norm.replace(_SEP, "").replace(_END, ""))
+            checks.append(lambda p, e: p[_COD] in hits)
+        if archived:
+            checks.append(lambda p, e: _archived(p[_ISARHIV]))
+        else:
+            checks.append(lambda p, e: not _archived(p[_ISARHIV]))
+        if cod:
+            checks.append(lambda p, e, c=int(cod): p[_COD] == c)
+        if gr1:
+            checks.append(lambda p, e: _sql_eq(p[_GR1], gr1))
+        if brand:
+            bl = set([b.strip() for b in str(brand).split(",") if b.strip()][:30])
+            checks.append(lambda p, e: p[_BRAND] in bl)
+        if grupa:
+            checks.append(lambda p, e: p[_GRUPA] == grupa)
+        if categorie:
+            checks.append(lambda p, e: p[_CATEG] == categorie)
+        if price_min is not None:
+            pmin = float(price_min)
+            checks.append(lambda p, e: e[3] is not None and e[3] >= pmin)
+        if price_max is not None:
+            pmax = float(price_max)
+            checks.append(lambda p, e: e[3] is not None and e[3] <= pmax)
+        if only_new:
+            checks.append(lambda p, e: p[_MATGR1] == 1)
+
+        if sort not in ("name_desc", "price_asc", "price_desc"):
+            sort = "name"
+        order = view.order(sort)
+        stop = None if (with_count or facets) else int(offset) + int(limit)
+        picked: List[int] = []
+        for i in order:
+            e = entries[i]
+            p = products[e[0]]
+            if all(chk(p, e) for chk in checks):
+                picked.append(i)
+                if stop is not None and len(picked) >= stop:
+                    break
+        out: Dict[str, Any] = {
+            "entries": [entries[i] for i in picked[int(offset):int(offset) + int(limit)]]}
+        if with_count:
+            out["total"] = len(picked)
+        if facets:
+            out["facets"] = self.facet_counts(entries, picked)
+        return out
+
+    # ── facets ────────────────────────────────────────────────────────
+    def facet_counts(self, entries: List[Tuple], idx: Iterable[int]) -> Dict[str, Any]:
+        """RO: numaratori distincte pe cod: brand, grupa, grupa+categorie, pret.
+        EN: distinct-code counts per brand, group, group+category, price bucket."""
+        seen: set = set()
+        brands, grupe, cats, prices = Counter(), Counter(), Counter(), Counter()
+        products = self.products
+        for i in idx:
+            e = entries[i]
+            if e[0] in seen:
+                continue
+            seen.add(e[0])
+            p = products[e[0]]
+            if p[_BRAND] is not None:
+                brands[p[_BRAND]] += 1
+            if p[_GRUPA] is not None:
+                grupe[p[_GRUPA]] += 1
+                cats[(p[_GRUPA], p[_CATEG])] += 1
+            if e[3] is not None:
+                prices[bisect.bisect_right(PRICE_BUCKETS, e[3]) - 1] += 1
+        key = self.key
+        return {
+            "brand": [{"brand": b, "cnt": n} for b, n in sorted(brands.items(), key=lambda kv: key(kv[0]))],
+            "grupa": [{"grupa": g, "cnt": n} for g, n in sorted(grupe.items(), key=lambda kv: key(kv[0]))],
+            "categorie": [{"grupa": g, "categorie": c, "cnt": n} for (g, c), n in sorted(
+                cats.items(), key=lambda kv: (key(kv[0][0]), kv[0][1] is None, key(kv[0][1] or "")))],
+            "price": [{"from": PRICE_BUCKETS[b],
+                       "to": PRICE_BUCKETS[b + 1] if b + 1 < len(PRICE_BUCKETS) else None,
+                       "cnt": n} for b, n in sorted(prices.items()) if b >= 0],
+        }
+
+    def brands(self, price_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """RO: ca Biro26Store.get_product_brands / EN: same rows as get_product_brands."""
+        return self.view(price_date or date.today().isoformat()).base_facets["brand"]
+
+    def tree(self, price_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """RO: ca Biro26Store.get_product_tree (cu numele RU/EN din YBIRO_GRP_I18N).
+        EN: same rows as get_product_tree, i18n names included."""
+        key = self.key
+
+        def _min(kind, name, pos):
+            vals = [r[pos] for r in self.i18n.get((kind, name), ()) if r[pos] is not None]
+            return min(vals, key=key) if vals else None
+
+        out = []
+        for r in self.view(price_date or date.today().isoformat()).base_facets["categorie"]:
+            g, c = r["grupa"], r["categorie"]
+            out.append({"grupa": g, "categorie": c, "cnt": r["cnt"],
+                        "grupa_ru": _min("grupa", g, 0), "grupa_en": _min("grupa", g, 1),
+                        "cat_ru": _min("categorie", c, 0), "cat_en": _min("categorie", c, 1)})
+        return out
+
+    def row(self, entry: Tuple, extra: Dict[str, Any]) -> Dict[str, Any]:
+        """RO: rindul grilei, cu aceleasi chei ca interogarea live.
+        EN: a grid row with the same keys as the live query."""
+        p = self.products[entry[0]]
+        image = extra.get("ie_linkadres")
+        if image is None:
+            image = p[_PHOTO] if p[_PHOTO] is not None else p[_IMGLINK]
+        row = {
+            "cod": p[_COD], "codvechi": p[_CODVECHI], "denumirea": p[_DEN],
+            "namerus": p[_NAMERUS], "um": p[_UM], "tip": p[_TIP],
+            "grupa": p[_GRUPA], "categorie": p[_CATEG], "brand": p[_BRAND],
+            "matgr1": p[_MATGR1], "angro": entry[1], "ionline": entry[2],
+            "retail1": entry[3], "angro_fara_tva": entry[4], "image": image,
+        }
+        # RO: restul coloanelor vin din STOCK_PAGE_COLS, in ordinea lor
+        # EN: the remaining columns come from STOCK_PAGE_COLS, in order
+        row.update((k, v) for k, v in extra.items() if k not in ("cod", "ie_linkadres"))
+        return row
+
+
+def _up(s: Optional[str]) -> Optional[str]:
+    return s.upper() if s is not None else None
+
+
+# ── loading from Oracle ────────────────────────────────────────────────
+
+def _core_sql(cods: Optional[Iterable[int]] = None) -> str:
+    """RO: nucleul interogarii live fara lista de preturi. ANGRO / IONLINE trec
+    prin aceeasi conversie implicita ca NVL(pl.PRETV1, g.ANGRO) cind pl lipseste.
+    EN: the live query core without the price list; feed values get the same
+    implicit conversion as NVL(pl.PRETV1, g.ANGRO) with no price-list row."""
+    where_u = f" AND {_in_list('u.COD', cods)}" if cods is not None else ""
+    where_g = _in_list("g0.COD_UNIVERS", cods) if cods is not None else ""
+    return ("SELECT u.COD, u.CODVECHI, u.DENUMIREA, u.NAMERUS, u.UM, u.TIP, u.GR1, u.ISARHIV, "
+            "g.GRUPA, g.CATEGORIE, g.BRAND, g.PHOTO_URL, g.IMAGE_LINK, "
+            "NVL(mp.MATGR1, 0) MATGR1, "
+            "NVL(TO_NUMBER(NULL), g.ANGRO) ANGRO_FEED, "
+            "NVL(TO_NUMBER(NULL), g.IONLINE) IONLINE_FEED, "
+            f"{RETAIL1_FEED_EXPR} RETAIL1_FEED "
+            "FROM TMS_UNIVERS u "
+            f"LEFT JOIN ({goods_dedup_sql(where_g)}) g ON g.COD_UNIVERS = u.COD "
+            "LEFT JOIN TMS_MPT mp ON mp.COD = u.COD "
+            f"WHERE u.TIP='P'{where_u} ORDER BY u.DENUMIREA")
+
+
+def _data_statements(horizon: str, cods: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+    cods = list(cods) if cods is not None else None
+    where = (lambda col: f" WHERE {_in_list(col, cods)}") if cods is not None else (lambda col: "")
+    and_ = (lambda col: f" AND {_in_list(col, cods)}") if cods is not None else (lambda col: "")
+    return [
+        {"sql": _core_sql(cods), "kind": "query"},
+        {"sql": "SELECT COD, BARCODE FROM TMS_MPT_BARCODE" + where("COD"), "kind": "query"},
+        {"sql": "SELECT COD, DENUMIRE_FULL_RO, DENUMIRE_FULL_RU, DESCRIERE_NON_DIACR_RO "
+                "FROM TMS_MPT_WEBATTR" + where("COD"), "kind": "query"},
+        {"sql": "SELECT SC, TO_CHAR(DATASTART,'YYYY-MM-DD HH24:MI:SS') DS, "
+                "TO_CHAR(DATAEND,'YYYY-MM-DD HH24:MI:SS') DE, PRETV, PRETV1, PRETV2 "
+                "FROM TPR1D_PERPRLIST WHERE CODPRICE = 1 AND DATASTART IS NOT NULL "
+                f"AND DATAEND >= DATE '{horizon}'" + and_("SC"), "kind": "query"},
+    ]
+
+
+def _parse_data(results: List[Dict[str, Any]]):
+    core, bcs, webs, prs = results
+    products = {int(r[0]): tuple(_num(v) if i >= _MATGR1 else v for i, v in enumerate(r))
+                for r in core.get("data") or []}
+    barcodes: Dict[int, List[str]] = {}
+    for c, b in bcs.get("data") or []:
+        if b is not None:
+            barcodes.setdefault(int(c), []).append(str(b))
+    webattr = {int(r[0]): (r[1], r[2], r[3]) for r in webs.get("data") or []}
+    prices: Dict[int, List[tuple]] = {}
+    for sc, ds, de, pv, pv1, pv2 in prs.get("data") or []:
+        prices.setdefault(int(sc), []).append((ds, de, _num(pv), _num(pv1), _num(pv2)))
+    return products, barcodes, webattr, prices, [r[2] for r in core.get("data") or []]
+
+
+def _check(res: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if not res.get("success"):
+        raise RuntimeError(res.get("message") or "catalog load failed")
+    return res.get("results") or []
+
+
+class Biro26Catalog:
+    """RO: fatada: replica curenta, firul de reimprospatare, fallback pe live.
+    EN: facade: current replica, refresh thread, live fallback."""
+
+    _replica: Optional[CatalogReplica] = None
+    _marks: Dict[str, Any] = {}
+    _next_full = 0.0
+    _lock = threading.Lock()
+    _wake = threading.Event()
+    _thread: Optional[threading.Thread] = None
+    _status: Dict[str, Any] = {}
+
+    # ── lifecycle ─────────────────────────────────────────────────────
+    @staticmethod
+    def start() -> None:
+        """RO: porneste (o singura data) firul de reimprospatare.
+        EN: start the refresh thread (once)."""
+        if not ENABLED or Biro26Catalog._thread is not None:
+            return
+        with Biro26Catalog._lock:
+            if Biro26Catalog._thread is not None:
+                return
+            t = threading.Thread(target=Biro26Catalog._loop, daemon=True,
+                                 name="biro26-catalog")
+            Biro26Catalog._thread = t
+            t.start()
+
+    @staticmethod
+    def nudge() -> None:
+        """RO: reimprospatare incrementala imediat (dupa editari din backoffice).
+        EN: run an incremental refresh now (after back-office edits)."""
+        Biro26Catalog._wake.set()
+
+    @staticmethod
+    def _loop() -> None:
+        while True:
+            try:
+                Biro26Catalog.refresh()
+            except Exception as e:                               # noqa: BLE001
+                Biro26Catalog._status["error"] = str(e)
+                _log.warning("biro26 catalog refresh failed: %s", e)
+            Biro26Catalog._wake.wait(REFRESH_SEC)
+            Biro26Catalog._wake.clear()
+
+    @staticmethod
+    def replica() -> Optional[CatalogReplica]:
+        return Biro26Catalog._replica
+
+    @staticmethod
+    def status() -> Dict[str, Any]:
+        r = Biro26Catalog._replica
+        return {"success": True, "enabled": ENABLED, "ready": r is not None,
+                "products": len(r.products) if r else 0, **Biro26Catalog._status}
+
+    # ── refresh ───────────────────────────────────────────────────────
+    @staticmethod
+    def refresh(full: bool = False) -> Dict[str, Any]:
+        with Biro26Catalog._lock:
+            t0 = time.time()
+            if full or Biro26Catalog._replica is None or t0 >= Biro26Catalog._next_full:
+                mode, changed = Biro26Catalog._load_full()
+            else:
+                mode, changed = Biro26Catalog._load_incremental()
+            Biro26Catalog._status = {"mode": mode, "changed": changed,
+                                     "refreshed_at": t0, "seconds": round(time.time() - t0, 2)}
+            return {"success": True, **Biro26Catalog._status}
+
+    @staticmethod
+    def _load_full() -> Tuple[str, int]:
+        horizon = (date.today() - timedelta(days=PRICE_HISTORY_DAYS)).isoformat()
+        marks = ", ".join(f"(SELECT MAX(ORA_ROWSCN) FROM {t}) {k}" for k, t, _c, _w in _TRACKED)
+        res = _check(Biro26DB().execute_script([
+            # RO: un singur instantaneu pentru praguri si date
+            # EN: one read-consistent snapshot for watermarks and data
+            {"sql": "SET TRANSACTION READ ONLY", "kind": "dml"},
+            {"sql": "SELECT (SELECT VALUE FROM NLS_DATABASE_PARAMETERS "
+                    "WHERE PARAMETER = 'NLS_CHARACTERSET') CS, "
+                    "(SELECT VALUE FROM NLS_SESSION_PARAMETERS "
+                    f"WHERE PARAMETER = 'NLS_SORT') NSORT, {marks} FROM DUAL", "kind": "query"},
+            *_data_statements(horizon),
+        ]))
+        meta = _rows({"success": True, **res[1]})[0]
+        products, barcodes, webattr, prices, names = _parse_data(res[2:6])
+        i18n = Biro26Catalog._load_i18n()
+        replica = CatalogReplica(products, barcodes, webattr, prices, i18n,
+                                 charset=meta.get("cs") or "AL32UTF8", price_horizon=horizon)
+        # RO: replica se serveste doar daca reproduce ORDER BY-ul live
+        # EN: only serve the replica when it reproduces the live ORDER BY
+        if (meta.get("nsort") or "BINARY").upper() != "BINARY" or not _sorted_like(names, replica.key):
+            Biro26Catalog._replica = None
+            raise RuntimeError(f"DENUMIREA order does not match BINARY/{replica.charset}; "
+                               "shop stays on the live query")
+        Biro26Catalog._marks = {k: meta.get(k.lower()) or 0 for k, _t, _c, _w in _TRACKED}
+        Biro26Catalog._replica = replica
+        Biro26Catalog._next_full = time.time() + FULL_SEC
+        return "full", len(products)
+
+    @staticmethod
+    def _load_i18n() -> Dict[Tuple[str, str], List[tuple]]:
+        out: Dict[Tuple[str, str], List[tuple]] = {}
+        for r in _rows(Biro26DB().execute_query(
+                "SELECT KIND, NAME_RO, NAME_RU, NAME_EN FROM YBIRO_GRP_I18N")):
+            out.setdefault((r["kind"], r["name_ro"]), []).append((r["name_ru"], r["name_en"]))
+        return out
+
+    @staticmethod
+    def _load_incremental() -> Tuple[str, int]:
+        replica = Biro26Catalog._replica
+        marks = Biro26Catalog._marks
+        horizon = replica.price_horizon
+        parts = [f"SELECT '{k}' T, {col} COD, ORA_ROWSCN SCN FROM {t} "
+                 f"WHERE {w + ' AND ' if w else ''}ORA_ROWSCN > {int(marks.get(k) or 0)}"
+                 for k, t, col, w in _TRACKED]
+        parts += [
+            "SELECT 'CU', NULL, COUNT(*) FROM TMS_UNIVERS WHERE TIP = 'P'",
+            "SELECT 'CB', NULL, COUNT(*) FROM TMS_MPT_BARCODE WHERE BARCODE IS NOT NULL",
+            "SELECT 'CW', NULL, COUNT(*) FROM TMS_MPT_WEBATTR",
+            "SELECT 'CP', NULL, COUNT(*) FROM TPR1D_PERPRLIST WHERE CODPRICE = 1 "
+            f"AND DATASTART IS NOT NULL AND DATAEND >= DATE '{horizon}'",
+        ]
+        r = Biro26DB().execute_query(" UNION ALL ".join(parts))
+        if not r.get("success"):
+            raise RuntimeError(r.get("message") or "catalog change scan failed")
+        changed: set = set()
+        new_marks = dict(marks)
+        counts: Dict[str, int] = {}
+        for t, cod, scn in r.get("data") or []:
+            if t.startswith("C"):
+                counts[t[1:]] = int(scn or 0)
+                continue
+            if cod is not None:
+                changed.add(int(cod))
+            new_marks[t] = max(int(new_marks.get(t) or 0), int(scn or 0))
+        if len(changed) > MAX_INCREMENTAL:
+            return Biro26Catalog._load_full()
+        if changed:
+            res = _check(Biro26DB().execute_script(_data_statements(horizon, changed)))
+            products, barcodes, webattr, prices, _names = _parse_data(res)
+            replica = replica.updated(changed, products, barcodes, webattr, prices)
+        if replica.counts() != counts:
+            # RO: stergere fizica sau produs scos din TIP='P' — nu se vede in ORA_ROWSCN
+            # EN: a physical delete / TIP change is invisible to ORA_ROWSCN
+            return Biro26Catalog._load_full()
+        Biro26Catalog._replica = replica
+        Biro26Catalog._marks = new_marks
+        return "incremental", len(changed)
+
+    # ── serving ───────────────────────────────────────────────────────
+    @staticmethod
+    def _can_serve(kw: Dict[str, Any]) -> Optional[CatalogReplica]:
+        replica = Biro26Catalog._replica
+        if replica is None:
+            return None
+        pd = kw.get("price_date")
+        if pd:
+            if not re.match(r"^\d{4}-\d{2}-\d{2}$", str(pd)) or str(pd) < replica.price_horizon:
+                return None
+        brand = kw.get("brand")
+        if brand and not [b for b in str(brand).split(",") if b.strip()]:
+            return None      # RO: live da eroare SQL (IN ()) / EN: live fails on IN ()
+        return replica
+
+    @staticmethod
+    def products_stock(**kw) -> Dict[str, Any]:
+        """RO: Biro26Store.get_products_stock din replica (acelasi rezultat si aceeasi
+        ordine), cu fallback pe interogarea live cind replica nu e gata.
+        EN: get_products_stock served from the replica, live fallback."""
+        replica = Biro26Catalog._can_serve(kw)
+        if replica is None:
+            return Biro26Store.get_products_stock(**kw)
+        try:
+            got = replica.query(**kw)
+            rows = Biro26Catalog._page_rows(replica, got["entries"])
+            if rows is None:
+                return Biro26Store.get_products_stock(**kw)
+            res: Dict[str, Any] = {"success": True, "data": rows}
+            if "total" in got:
+                res["total"] = got["total"]
+            return res
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def _page_rows(replica: CatalogReplica, entries: List[Tuple]) -> Optional[List[Dict[str, Any]]]:
+        """RO: coloanele scumpe (stoc, rezervari, barcode, variante) — live, doar
+        pentru codurile paginii. EN: live page-only expensive columns."""
+        if not entries:
+            return []
+        cods = {e[0] for e in entries}
+        r = Biro26DB().execute_query(
+            "SELECT c.COD, m.IE_LINKADRES, " + STOCK_PAGE_COLS
+            + f"FROM (SELECT COD FROM TMS_UNIVERS WHERE {_in_list('COD', cods)}) c "
+            + STOCK_PAGE_JOINS)
+        if not r.get("success"):
+            return None
+        extras: Dict[int, List[Dict[str, Any]]] = {}
+        for x in _rows(r):
+            extras.setdefault(int(x["cod"]), []).append(x)
+        rows = [replica.row(e, x) for e in entries for x in extras.get(e[0], ())]
+        from models.biro26_imgproxy import rewrite_rows
+        rewrite_rows(rows, "IMAGE")
+        return rows
+
+    @staticmethod
+    def product_brands() -> Dict[str, Any]:
+        replica = Biro26Catalog._can_serve({})
+        if replica is None:
+            return Biro26Store.get_product_brands()
+        return {"success": True, "data": replica.brands()}
+
+    @staticmethod
+    def product_tree() -> Dict[str, Any]:
+        replica = Biro26Catalog._can_serve({})
+        if replica is None:
+            return Biro26Store.get_product_tree()
+        return {"success": True, "data": replica.tree()}
+
+    @staticmethod
+    def facets(**kw) -> Dict[str, Any]:
+        """RO: fatetele rezultatului filtrat (brand, grupa, categorie, pret).
+        EN: facet counts for the filtered result."""
+        replica = Biro26Catalog._can_serve(kw)
+        if replica is None:
+            return {"success": False, "error": "catalog replica not ready"}
+        kw = {k: v for k, v in kw.items() if k not in ("limit", "offset", "with_count", "sort")}
+        return {"success": True, "data": replica.query(limit=0, facets=True, **kw)["facets"]}
+
+
+def _sorted_like(names: List[Optional[str]], key) -> bool:
+    """RO: ordinea ORDER BY DENUMIREA data de Oracle e nedescrescatoare sub cheia locala?
+    EN: is Oracle's ORDER BY DENUMIREA order non-decreasing under the local key?"""
+    prev = None
+    for n in names:
+        k = (n is None, key(n or ""))
+        if prev is not None and k < prev:
+            return False
+        prev = k
+    return True
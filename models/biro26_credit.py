@@ -25,6 +25,7 @@ from __future__ import annotations
 import re
 from typing import Any, Dict, List, Optional
 
+from models.biro26_cache import region
 from models.biro26_db import Biro26DB
 from models.biro26_oracle_store import _result, _rows
 
@@ -167,13 +168,12 @@ class Biro26Credit:
     # EN: offers are the same for every client and change only on admin edits;
     #     each rebuild costs several subprocess round-trips, so cache them and
     #     invalidate explicitly on save/delete.
-    _OFFERS_TTL = 300.0
-    _offers_cache: Optional[tuple[float, Dict[str, Any]]] = None
-    _offers_busy = False
+    _offers = region("biro26.credit.offers", 300.0, swr=True,
+                     cache_if=lambda r: bool(r.get("success")))
 
     @staticmethod
     def invalidate_offers() -> None:
-        Biro26Credit._offers_cache = None
+        Biro26Credit._offers.invalidate()
 
     @staticmethod
     def public_offers() -> Dict[str, Any]:
@@ -182,34 +182,10 @@ class Biro26Credit:
         Cind cache-ul a expirat se intoarce IMEDIAT valoarea veche, iar
         reconstructia pleaca in fundal: doar primul client de dupa pornirea
         aplicatiei asteapta cele citeva secunde, nu si cei de dupa expirare.
+        Se pastreaza doar rezultatele reusite.
         EN: stale-while-revalidate — only the very first caller ever waits.
         """
-        import threading
-        import time as _t
-        hit = Biro26Credit._offers_cache
-        if hit:
-            if _t.time() - hit[0] >= Biro26Credit._OFFERS_TTL \
-                    and not Biro26Credit._offers_busy:
-                Biro26Credit._offers_busy = True
-                threading.Thread(target=Biro26Credit._refresh_offers,
-                                 daemon=True).start()
-            return hit[1]
-        res = Biro26Credit._build_offers()
-        if res.get("success"):
-            Biro26Credit._offers_cache = (_t.time(), res)
-        return res
-
-    @staticmethod
-    def _refresh_offers() -> None:
-        import time as _t
-        try:
-            res = Biro26Credit._build_offers()
-            if res.get("success"):
-                Biro26Credit._offers_cache = (_t.time(), res)
-        except Exception:                              # noqa: BLE001
-            pass
-        finally:
-            Biro26Credit._offers_busy = False
+        return Biro26Credit._offers.get("offers", Biro26Credit._build_offers)
 
     @staticmethod
     def _build_offers() -> Dict[str, Any]:
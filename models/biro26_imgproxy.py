@@ -22,9 +22,25 @@ EN: SECURITY — a proxy that fetches arbitrary URLs is an SSRF hole, so: allowl
 """
 from __future__ import annotations
 
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
 import urllib.parse
 import urllib.request
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
+
+from models.biro26_cache import private_dir
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover
+    Image = None
+    ImageOps = None
 
 # RO: gazdele pentru care avem voie sa aducem imagini / EN: hosts we may fetch from
 ALLOWED_HOSTS = frozenset({
@@ -54,6 +70,21 @@ PROXY_PATH = "/api/biro26/img"
 MAX_BYTES = 8 * 1024 * 1024          # RO: 8 MB — o poza de produs e sub 1 MB
 TIMEOUT_S = 15
 
+# RO: latimile permise pentru variantele micsorate (liste, carduri, fisa)
+# EN: allowed widths of the derived (downsized) variants
+WIDTHS = (160, 320, 640)
+THUMB_QUALITY = 82
+
+CACHE_DIR = os.environ.get("BIRO26_IMG_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "biro26_img_cache")
+CACHE_MAX_BYTES = int(os.environ.get("BIRO26_IMG_CACHE_MB") or 512) * 1024 * 1024
+# RO: dupa atit timp imaginea se re-descarca (sursa o poate inlocui sub acelasi URL)
+# EN: after this long the image is re-fetched (the source may replace it in place)
+CACHE_TTL_S = int(os.environ.get("BIRO26_IMG_CACHE_TTL_H") or 24 * 7) * 3600
+# RO: esecurile se tin minte scurt, ca o sursa picata sa nu fie lovita la fiecare card
+# EN: failures are remembered briefly so a dead source isn't hit per card
+NEGATIVE_TTL_S = 60
+
 
 def _host_of(url: str) -> str:
     try:
@@ -70,16 +101,19 @@ def needs_proxy(url: Optional[str]) -> bool:
     return url.startswith("http://") and _host_of(url) in ALLOWED_HOSTS
 
 
-def proxy_url(url: Optional[str]) -> Optional[str]:
+def proxy_url(url: Optional[str], width: Optional[int] = None) -> Optional[str]:
     """RO: intoarce URL-ul de afisat: prin proxy daca e nevoie, altfel neschimbat;
     stub-urile 'fara imagine' devin None (UI-ul isi arata placeholder-ul propriu).
+    `width` (una din WIDTHS) cere varianta micsorata pentru liste.
     EN: the URL to render: proxied when needed, unchanged otherwise; no-image
-    stubs collapse to None so the UI shows its own placeholder."""
+    stubs collapse to None so the UI shows its own placeholder. `width` (one
+    of WIDTHS) asks for the downsized listing variant."""
     if is_stub(url):
         return None
     if not needs_proxy(url):
         return url
-    return PROXY_PATH + "?u=" + urllib.parse.quote(url, safe="")
+    out = PROXY_PATH + "?u=" + urllib.parse.quote(url, safe="")
+    return out + f"&w={int(width)}" if width in WIDTHS else out
 
 
 def rewrite_rows(rows, *fields):
@@ -122,3 +156,316 @@ def fetch(url: str):
     if len(data) > MAX_BYTES:
         raise ValueError("RO: imagine prea mare / EN: image too large")
     return data, ctype
+
+
+# ── disk cache ─────────────────────────────────────────────────────────
+
+_BLOB_RE = re.compile(r"^[0-9a-f]{64}(\.w\d{2,4})?$")
+
+
+def _is_image(ctype) -> bool:
+    return isinstance(ctype, str) and ctype.startswith("image/")
+
+
+def resize(data: bytes, width: int) -> Optional[Tuple[bytes, str]]:
+    """RO: varianta micsorata (latime <= width). JPEG, sau PNG daca are
+    transparenta. None — nu e imagine Pillow / nu exista Pillow.
+    EN: downsized variant (width <= width); JPEG, PNG when it has alpha."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            im.draft("RGB", (width, width * 4))   # RO: JPEG decodat direct micsorat
+            out_im = ImageOps.exif_transpose(im)
+            if out_im.width > width:
+                out_im = out_im.resize((width, max(1, round(out_im.height * width / out_im.width))),
+                                       Image.LANCZOS)
+            out = io.BytesIO()
+            if out_im.mode in ("RGBA", "LA", "P") and (
+                    out_im.mode != "P" or "transparency" in out_im.info):
+                out_im.save(out, "PNG", optimize=True)
+                return out.getvalue(), "image/png"
+            if out_im.mode not in ("RGB", "L"):
+                out_im = out_im.convert("RGB")
+            out_im.save(out, "JPEG", quality=THUMB_QUALITY, optimize=True, progressive=True)
+            return out.getvalue(), "image/jpeg"
+    except Exception:
+        return None
+
+
+class ImageCache:
+    """RO: cache pe disc al imaginilor aduse prin proxy.
+      * continutul se tine dupa SHA-256 (<root>/blobs/<sha[:2]>/<sha>[.w320]) —
+        aceeasi poza sub mai multe URL-uri ocupa loc o singura data;
+      * <root>/urls/<sha256(url)>.json: sha-ul continutului, tipul, ora aducerii;
+        variantele au alaturi <blob>.json cu tipul si sha-ul lor;
+      * scrierea prin fisier temporar + os.replace (cititorii vad fisierul
+        intreg sau deloc); citirea actualizeaza mtime; peste max_bytes se sterg
+        cele mai vechi (LRU dupa mtime) pina la 90% din limita;
+      * single-flight: cererile simultane pentru aceeasi imagine lipsa asteapta
+        O SINGURA descarcare / micsorare;
+      * descarcarea ramine fetch() — lista alba, fara redirectari, doar image/*.
+    RO: SECURITATE — /api/biro26/img e public si serveste ce gaseste aici, deci
+    un fisier strecurat in cache ar ajunge in browser de pe originea magazinului
+    (text/html = XSS). Radacina trebuie sa treaca private_dir() (a noastra,
+    0700), altfel ok=False si imaginile se aduc la fiecare cerere, fara disc.
+    De pe disc se accepta doar tipuri image/*, iar continutul se serveste numai
+    daca SHA-256-ul lui e cel din meta.
+    EN: content-addressed disk cache for proxied images: url -> meta json ->
+    blob by SHA-256, derived widths next to the blob, atomic writes, mtime LRU
+    eviction, single-flight misses; fetching stays fetch() with all its
+    allowlist / no-redirect / image-only guarantees. The root must pass
+    private_dir() or nothing is cached; only image/* types are read back and
+    a blob is served only when its SHA-256 matches."""
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 ttl: int = CACHE_TTL_S, fetcher: Callable[[str], Tuple[bytes, str]] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._fetch = fetcher or fetch
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._failed: Dict[str, Tuple[float, str]] = {}
+        self._bytes: Optional[int] = None
+        self.ok = private_dir(root)
+
+    # ── public ────────────────────────────────────────────────────────
+    def get(self, url: str, width: Optional[int] = None) -> Tuple[bytes, str, str]:
+        """RO: (continut, content_type, etag) pentru imaginea (sau varianta
+        `width`); ridica ValueError ca fetch().
+        EN: (content, content type, etag) for the image or its `width`
+        variant; raises ValueError like fetch()."""
+        if not needs_proxy(url):
+            raise ValueError("RO: adresa nu e permisa / EN: url not allowed")
+        if width is not None and width not in WIDTHS:
+            raise ValueError("RO: latime nepermisa / EN: width not allowed")
+        if not self.ok:
+            return self._uncached(url, width)
+        original = self._single_flight("u:" + url, lambda: self._original(url))
+        if width is None:
+            return original
+        data, ctype, sha = original
+        return self._single_flight(f"w:{sha}:{width}", lambda: self._variant(data, ctype, sha, width))
+
+    # ── misses ────────────────────────────────────────────────────────
+    def _single_flight(self, key: str, work: Callable[[], object]):
+        while True:
+            got = self._peek(key)
+            if got is not None:
+                return got
+            with self._lock:
+                failed = self._failed.get(key)
+                if failed and failed[0] > time.time():
+                    raise ValueError(failed[1])
+                ev = self._inflight.get(key)
+                leader = ev is None
+                if leader:
+                    ev = self._inflight[key] = threading.Event()
+            if not leader:
+                ev.wait(TIMEOUT_S * 2)
+                with self._lock:
+                    failed = self._failed.get(key)
+                if failed and failed[0] > time.time():
+                    raise ValueError(failed[1])
+                continue
+            try:
+                return work()
+            except Exception as e:
+                self._remember_failure(key, str(e))
+                if isinstance(e, ValueError):
+                    raise
+                raise ValueError(str(e))
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                ev.set()
+
+    def _remember_failure(self, key: str, reason: str) -> None:
+        now = time.time()
+        with self._lock:
+            if len(self._failed) > 1000:
+                self._failed = {k: v for k, v in self._failed.items() if v[0] > now}
+            self._failed[key] = (now + NEGATIVE_TTL_S, reason)
+
+    def _peek(self, key: str):
+        """RO: raspunsul din cache fara retea, sau None. EN: cached answer or None."""
+        if key.startswith("u:"):
+            meta = self._read_meta(key[2:])
+            if meta is None or meta.get("fetched", 0) + self.ttl < time.time():
+                return None
+            return self._read_original(meta)
+        _w, sha, width = key.split(":")
+        path = self._blob(sha, int(width))
+        meta_v = self._read_json(path + ".json")
+        if not meta_v or not _is_image(meta_v.get("ctype")):
+            return None
+        data = self._read_blob(path, str(meta_v.get("sha") or ""))
+        if data is None:
+            return None
+        return data, str(meta_v["ctype"]), f"{sha}-w{width}"
+
+    def _uncached(self, url: str, width: Optional[int]) -> Tuple[bytes, str, str]:
+        """RO: fara cache (radacina nesigura): aduce si micsoreaza in memorie.
+        EN: no cache (unsafe root): fetch and downsize in memory."""
+        try:
+            data, ctype = self._fetch(url)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"RO: sursa indisponibila / EN: source unavailable: {e}")
+        sha = hashlib.sha256(data).hexdigest()
+        got = resize(data, width) if width is not None else None
+        if got is None:
+            return data, ctype, sha
+        return got[0], got[1], f"{sha}-w{width}"
+
+    def _original(self, url: str) -> Tuple[bytes, str, str]:
+        try:
+            data, ctype = self._fetch(url)
+        except ValueError:
+            raise
+        except Exception as e:
+            # RO: sursa picata — imaginea veche (expirata) e mai buna decit nimic
+            # EN: source down — a stale copy beats no image
+            stale = self._read_meta(url)
+            got = self._read_original(stale) if stale is not None else None
+            if got is not None:
+                return got
+            raise ValueError(f"RO: sursa indisponibila / EN: source unavailable: {e}")
+        sha = hashlib.sha256(data).hexdigest()
+        if self._read_blob(self._blob(sha), sha) is None:
+            self._write(self._blob(sha), data)
+        meta = {"sha": sha, "ctype": ctype, "fetched": time.time()}
+        self._write(self._meta_path(url), json.dumps(meta).encode(), count=False)
+        return data, ctype, sha
+
+    def _variant(self, data: bytes, ctype: str, sha: str, width: int) -> Tuple[bytes, str, str]:
+        got = resize(data, width)
+        if got is None:
+            # RO: fara Pillow / format necunoscut — se serveste originalul
+            # EN: no Pillow / unknown format — serve the original
+            return data, ctype, sha
+        body, vtype = got
+        path = self._blob(sha, width)
+        self._write(path, body)
+        meta_v = {"ctype": vtype, "sha": hashlib.sha256(body).hexdigest()}
+        self._write(path + ".json", json.dumps(meta_v).encode(), count=False)
+        return body, vtype, f"{sha}-w{width}"
+
+    # ── files ─────────────────────────────────────────────────────────
+    def _blob(self, sha: str, width: Optional[int] = None) -> str:
+        name = sha + (f".w{width}" if width else "")
+        if not _BLOB_RE.match(name):
+            raise ValueError(f"bad cache key: {name!r}")
+        return os.path.join(self.root, "blobs", sha[:2], name)
+
+    def _meta_path(self, url: str) -> str:
+        h = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "urls", h[:2], h + ".json")
+
+    def _read_meta(self, url: str) -> Optional[Dict[str, object]]:
+        meta = self._read_json(self._meta_path(url))
+        if (not meta or not _BLOB_RE.match(str(meta.get("sha") or ""))
+                or not _is_image(meta.get("ctype"))):
+            return None
+        return meta
+
+    def _read_original(self, meta: Dict[str, object]) -> Optional[Tuple[bytes, str, str]]:
+        sha = str(meta["sha"])
+        data = self._read_blob(self._blob(sha), sha)
+        return None if data is None else (data, str(meta["ctype"]), sha)
+
+    def _read_blob(self, path: str, sha: str) -> Optional[bytes]:
+        """RO: continutul, doar daca SHA-256-ul lui e `sha`; citirea
+        actualizeaza mtime (LRU). EN: the content only when its SHA-256
+        matches; a read refreshes mtime for LRU."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read(MAX_BYTES + 1)
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != sha:
+            return None
+        self._touch(path)
+        return data
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[Dict[str, object]]:
+        try:
+            with open(path, "rb") as f:
+                got = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        return got if isinstance(got, dict) else None
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _write(self, path: str, data: bytes, count: bool = True) -> None:
+        d = os.path.dirname(path)
+        os.makedirs(d, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=d, prefix=".part-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        if count:
+            self._added(len(data))
+
+    # ── eviction ──────────────────────────────────────────────────────
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(sz for _m, sz, _p in self._files())
+            else:
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._bytes = self._evict()
+
+    def _files(self):
+        for dirpath, _dirs, names in os.walk(os.path.join(self.root, "blobs")):
+            for name in names:
+                if _BLOB_RE.match(name):
+                    p = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, p
+
+    def _evict(self) -> int:
+        """RO: sterge blob-urile cele mai vechi (si variantele lor raman orfane
+        doar pina la propria evictie); meta URL-urilor orfane e ignorata la citire.
+        EN: drop least recently used blobs down to 90% of the limit; orphaned
+        URL metas are ignored on read."""
+        files = sorted(self._files())
+        total = sum(sz for _m, sz, _p in files)
+        target = self.max_bytes * 9 // 10
+        for _mtime, size, p in files:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+            try:
+                os.remove(p + ".json")
+            except OSError:
+                pass
+        return total
+
+
+image_cache = ImageCache()
@@ -8,6 +8,7 @@ Multi-statement atomic ops use db.execute_script([...]) (one transaction).
 """
 from __future__ import annotations
 
+import os
 import re as _re
 from typing import Any, Dict, List, Optional
 
@@ -81,6 +82,76 @@ def build_gset_block(profile: Dict[str, Any]) -> str:
     return "\n".join(lines)
 
 
+# RO: pretul retail din feed — RETAIL1 e VARCHAR, se convertesc doar
+#     valorile care arata a numar (g = rindul BIRO26_GOODS)
+# EN: feed retail price — RETAIL1 is VARCHAR, convert numeric-looking values only
+RETAIL1_FEED_EXPR = ("CASE WHEN REGEXP_LIKE(TRIM(g.RETAIL1), "
+                     "'^-?[0-9]+([.,][0-9]+)?$') THEN "
+                     "TO_NUMBER(REPLACE(TRIM(g.RETAIL1),',','.')) END")
+
+
+def goods_dedup_sql(where: str = "") -> str:
+    """RO: BIRO26_GOODS cu un singur rind per produs (primul dupa ID) — feed-ul
+    are citeva rinduri duplicate identice. `where` filtreaza g0 inainte de
+    ROW_NUMBER (reincarcarea incrementala a replicii).
+    EN: BIRO26_GOODS deduplicated to the first row per product."""
+    return ("SELECT gg.* FROM (SELECT g0.*, ROW_NUMBER() OVER "
+            "  (PARTITION BY g0.COD_UNIVERS ORDER BY g0.ID) RN0 "
+            f"  FROM BIRO26_GOODS g0{' WHERE ' + where if where else ''}) gg WHERE gg.RN0 = 1")
+
+
+# RO: coloanele si join-urile scumpe ale grilei Marfa/Stoc — se aplica DOAR
+#     peste pagina de <=200 randuri (c = pagina, cu c.COD). Comune pentru
+#     interogarea live si pentru replica locala (models/biro26_catalog.py).
+# EN: the grid's expensive columns and joins — applied ONLY over the page
+#     (c = the page, exposing c.COD); shared by the live query and the
+#     local catalog replica.
+STOCK_PAGE_COLS = (
+    "s.CANT REAL_CANT, NVL(rz.QTY, 0) RESERVED, "
+    "GREATEST(NVL(s.CANT, 0) - NVL(rz.QTY, 0), 0) AVAIL_CANT, "
+    "bc.BARCODE, bc.BC_CNT, "
+    "vr.VARIANT, vr.MASTER_COD, NVL(vg.VCNT, 1) VAR_CNT, "
+    # RO: denumirea completa din TMS_MPT_WEBATTR — copia VARCHAR2
+    #     (ieftina) pentru grila/tooltip; BLOB-ul DOAR in fisa
+    "w.DENUMIRE_FULL_RO DENUM_FULL, w.DENUMIRE_FULL_RU DENUM_FULL_RU "
+)
+STOCK_PAGE_JOINS = (
+    "LEFT JOIN TMS_MPT_WEBATTR w ON w.COD = c.COD "
+    "LEFT JOIN VMS_MPT_TVR m ON m.COD = c.COD "
+    # RO: soldul curent (YBIRO_STOCK_CUR, tinut la zi de calc_stock)
+    # EN: the current balance (YBIRO_STOCK_CUR, kept up to date by calc_stock)
+    "LEFT JOIN (SELECT sc, SUM(cant) cant FROM YBIRO_STOCK_CUR "
+    "  GROUP BY sc) s ON s.sc = c.COD "
+    # RO: cantitatea BLOCATA de comenzile magazinului. Instantaneul
+    #     de stoc (YBIRO_STOCK_CALC) se recalculeaza periodic, deci
+    #     nu stie nici de comenzile neonorate, nici de livrarile de
+    #     dupa data lui. Scadem ambele:
+    #       - contul de plata NElivrat (ctnrdoc IS NULL) -> rezervat;
+    #       - livrat DUPA data instantaneului -> marfa a plecat deja.
+    #     Cele doua cazuri nu se suprapun: la livrare comanda se inchide.
+    # EN: quantity locked by shop orders — the stock snapshot is
+    #     periodic, so subtract both unshipped orders and shipments
+    #     made after the snapshot date.
+    "LEFT JOIN (SELECT d.CTSC SC, SUM(NVL(d.CANT, 0)) QTY "
+    "  FROM VMDB_ST201D d "
+    "  JOIN VMDB_ST201M m ON m.NRDOC = d.NRDOC "
+    "  JOIN VMDB_DOCS   h ON h.COD = d.NRDOC AND h.SYSFID = 12280 "
+    "  WHERE d.CTSC IS NOT NULL AND ("
+    "        m.CTNRDOC IS NULL "
+    "     OR NVL((SELECT dh.DATAMANUAL FROM VMDB_DOCS dh "
+    "               WHERE dh.COD = m.CTNRDOC), h.DATAMANUAL) > "
+    "        NVL((SELECT MAX(DATA_DOC) FROM YBIRO_STOCK_CALC "
+    "               WHERE IS_LATEST = '1'), DATE '1900-01-01')) "
+    "  GROUP BY d.CTSC) rz ON rz.SC = c.COD "
+    "LEFT JOIN (SELECT COD, MIN(BARCODE) BARCODE, COUNT(*) BC_CNT "
+    "  FROM TMS_MPT_BARCODE GROUP BY COD) bc ON bc.COD = c.COD "
+    "LEFT JOIN BIRO26_VARIANTS vr ON vr.COD_UNIVERS = c.COD "
+    "LEFT JOIN (SELECT MASTER_COD, COUNT(*) VCNT FROM BIRO26_VARIANTS "
+    "  WHERE MASTER_COD IS NOT NULL GROUP BY MASTER_COD) vg "
+    "  ON vg.MASTER_COD = vr.MASTER_COD "
+)
+
+
 class Biro26Store:
     """All OfficePlus CRUD + package orchestration for Biro26."""
 
@@ -620,11 +691,14 @@ class Biro26Store:
     STOCK_GTT = "YBIRO_STOCK_GTT"          # fixed name so the whole calc runs in ONE session
     DEFAULT_CONT = "217 2165 2114"          # RO: conturi marfa / EN: goods GL accounts
     DEFAULT_PFILT = "ACDE12"                # RO: masca filtru / EN: filter mask (per formula)
+    STOCK_KEEP_DAYS = int(os.environ.get("BIRO26_STOCK_KEEP_DAYS") or 35)
+    STOCK_KEEP_CALCS = int(os.environ.get("BIRO26_STOCK_KEEP_CALCS") or 10)
 
     @staticmethod
     def calc_stock(data_doc: str, dep_filter: str = "",
                    cont_filter: Optional[str] = None,
-                   pfilt: Optional[str] = None) -> Dict[str, Any]:
+                   pfilt: Optional[str] = None,
+                   mode: str = "delta") -> Dict[str, Any]:
         """Run UN$SOLD.GET_SOLDT and persist the balance into YBIRO_STOCK_CALC(_ITEM).
 
         data_doc: 'YYYY-MM-DD' (the :datadoc bind). dep_filter: the :m_ctdep bind
@@ -634,14 +708,68 @@ class Biro26Store:
         the session that created it — a later request cannot see its rows. The
         persisted YBIRO_STOCK_CALC_ITEM already carries its own index (SC), so no
         index is created on the ephemeral GTT (Oracle blocks that: ORA-14452).
+
+        RO: mode='delta' (implicit) scrie in ITEM DOAR rindurile (sc, dep) al
+        caror sold difera de YBIRO_STOCK_CUR (is_del='1' = rindul a disparut) si
+        le aplica pe CUR; mode='full' scrie tot soldul, ca inainte, si rescrie
+        CUR. Cititorii folosesc CUR, deci vad acelasi sold in ambele moduri.
+        In acelasi script, rularile vechi se compacteaza (compact_stock_calcs).
+        EN: mode='delta' (default) stores only the (sc, dep) rows whose balance
+        differs from YBIRO_STOCK_CUR (is_del='1' tombstones) and applies them to
+        CUR; mode='full' stores everything and rewrites CUR. Readers use CUR, so
+        both modes give the same latest-balance view. Old runs are compacted
+        in the same script (compact_stock_calcs).
         """
         cont = cont_filter or Biro26Store.DEFAULT_CONT
         flt = pfilt or Biro26Store.DEFAULT_PFILT
         gtt = Biro26Store.STOCK_GTT
+        delta = (mode or "delta").lower() != "full"
+        latest = "(SELECT MAX(id) FROM YBIRO_STOCK_CALC WHERE is_latest='1')"
+        fresh = (f"SELECT SC, NVL(DEP,0) DEP, SUM(CANT) CANT, SUM(CANT1) CANT1 FROM {gtt} "
+                 "WHERE SC IS NOT NULL GROUP BY SC, NVL(DEP,0)")
+        if delta:
+            # RO: diferenta fata de soldul curent; DECODE compara si NULL-urile
+            # EN: diff against the current balance; DECODE treats NULLs as equal
+            persist = [
+                {"sql": "INSERT INTO YBIRO_STOCK_CALC_ITEM(calc_id, sc, dep, cant, cant1, is_del) "
+                        f"SELECT {latest}, NVL(n.SC, o.sc), NVL(n.DEP, o.dep), n.CANT, n.CANT1, "
+                        "CASE WHEN n.SC IS NULL THEN '1' ELSE '0' END "
+                        f"FROM ({fresh}) n FULL OUTER JOIN YBIRO_STOCK_CUR o "
+                        "  ON o.sc = n.SC AND o.dep = n.DEP "
+                        "WHERE n.SC IS NULL OR o.sc IS NULL "
+                        "   OR DECODE(n.CANT, o.cant, 0, 1) = 1 "
+                        "   OR DECODE(n.CANT1, o.cant1, 0, 1) = 1",
+                 "params": {}, "kind": "dml"},
+                {"sql": "DELETE FROM YBIRO_STOCK_CUR c WHERE EXISTS ("
+                        "SELECT 1 FROM YBIRO_STOCK_CALC_ITEM i "
+                        f"WHERE i.calc_id = {latest} AND i.is_del = '1' "
+                        "AND i.sc = c.sc AND i.dep = c.dep)",
+                 "params": {}, "kind": "dml"},
+                {"sql": "MERGE INTO YBIRO_STOCK_CUR c USING ("
+                        "SELECT calc_id, sc, dep, cant, cant1 FROM YBIRO_STOCK_CALC_ITEM "
+                        f"WHERE calc_id = {latest} AND is_del = '0') d "
+                        "ON (c.sc = d.sc AND c.dep = d.dep) "
+                        "WHEN MATCHED THEN UPDATE SET c.cant = d.cant, c.cant1 = d.cant1, "
+                        "  c.calc_id = d.calc_id "
+                        "WHEN NOT MATCHED THEN INSERT (sc, dep, cant, cant1, calc_id) "
+                        "  VALUES (d.sc, d.dep, d.cant, d.cant1, d.calc_id)",
+                 "params": {}, "kind": "dml"},
+            ]
+        else:
+            persist = [
+                {"sql": "INSERT INTO YBIRO_STOCK_CALC_ITEM(calc_id, sc, dep, cant, cant1) "
+                        f"SELECT {latest}, "
+                        f"SC, NVL(DEP,0), SUM(CANT), SUM(CANT1) FROM {gtt} "
+                        "WHERE SC IS NOT NULL GROUP BY SC, NVL(DEP,0)",
+                 "params": {}, "kind": "dml"},
+                {"sql": "DELETE FROM YBIRO_STOCK_CUR", "params": {}, "kind": "dml"},
+                {"sql": "INSERT INTO YBIRO_STOCK_CUR(sc, dep, cant, cant1, calc_id) "
+                        "SELECT sc, dep, cant, cant1, calc_id FROM YBIRO_STOCK_CALC_ITEM "
+                        f"WHERE calc_id = {latest}",
+                 "params": {}, "kind": "dml"},
+            ]
         try:
             res = Biro26DB().execute_script([
-                {"sql": "UPDATE YBIRO_STOCK_CALC SET is_latest='0' WHERE is_latest='1'",
-                 "params": {}, "kind": "dml"},
                 {"sql": f"BEGIN EXECUTE IMMEDIATE 'DROP TABLE {gtt}'; "
                         "EXCEPTION WHEN OTHERS THEN NULL; END;",
                  "params": {}, "kind": "dml"},
@@ -652,35 +780,87 @@ class Biro26Store:
                  "params": {"p_data": data_doc, "p_pfilt": flt, "p_cont": cont,
                             "p_dep": dep_filter or " "},
                  "kind": "dml"},
+                # RO: DUPA GET_SOLDT (DDL-ul lui face commit implicit): un calcul
+                #     esuat nu mai lasa baza fara niciun "ultim calcul"
+                # EN: AFTER GET_SOLDT (its DDL commits implicitly), so a failed
+                #     run no longer leaves no latest calc behind
+                {"sql": "UPDATE YBIRO_STOCK_CALC SET is_latest='0' WHERE is_latest='1'",
+                 "params": {}, "kind": "dml"},
                 {"sql": "INSERT INTO YBIRO_STOCK_CALC(data_doc, dep_filter, cont_filter, "
-                        "pfilt, src_table, row_count, is_latest, status) "
+                        "pfilt, src_table, row_count, is_latest, status, calc_mode) "
                         "VALUES(TO_DATE(:p_data,'YYYY-MM-DD'), :p_dep, :p_cont, :p_pfilt, "
-                        f"'{gtt}', (SELECT COUNT(*) FROM {gtt}), '1', 'OK')",
+                        f"'{gtt}', (SELECT COUNT(*) FROM {gtt}), '1', 'OK', :p_mode)",
                  "params": {"p_data": data_doc, "p_dep": dep_filter or "", "p_cont": cont,
-                            "p_pfilt": flt},
+                            "p_pfilt": flt, "p_mode": "DELTA" if delta else "FULL"},
                  "kind": "dml"},
-                {"sql": "INSERT INTO YBIRO_STOCK_CALC_ITEM(calc_id, sc, dep, cant, cant1) "
-                        "SELECT (SELECT MAX(id) FROM YBIRO_STOCK_CALC WHERE is_latest='1'), "
-                        f"SC, NVL(DEP,0), SUM(CANT), SUM(CANT1) FROM {gtt} "
-                        "WHERE SC IS NOT NULL GROUP BY SC, NVL(DEP,0)",
+                *persist,
+                {"sql": "UPDATE YBIRO_STOCK_CALC c SET changed_count = "
+                        "(SELECT COUNT(*) FROM YBIRO_STOCK_CALC_ITEM i WHERE i.calc_id = c.id) "
+                        "WHERE is_latest = '1'",
                  "params": {}, "kind": "dml"},
+                # RO: retentia, in aceeasi tranzactie / EN: retention, same transaction
+                *Biro26Store._compact_statements(Biro26Store.STOCK_KEEP_DAYS,
+                                                 Biro26Store.STOCK_KEEP_CALCS),
             ])
             if not res.get("success"):
                 return {"success": False, "error": res.get("message")}
             head = _rows(Biro26DB().execute_query(
-                "SELECT * FROM (SELECT id, row_count, "
+                "SELECT * FROM (SELECT id, row_count, calc_mode, changed_count, "
                 "TO_CHAR(run_at,'DD.MM.YYYY HH24:MI') run_at FROM YBIRO_STOCK_CALC "
                 "WHERE is_latest='1' ORDER BY id DESC) WHERE ROWNUM=1"))
-            return {"success": True, "data": head[0] if head else None}
+            return {"success": True, "data": head[0] if head else None,
+                    "compacted": Biro26Store._compacted(res.get("results") or [])}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @staticmethod
+    def compact_stock_calcs(keep_days: Optional[int] = None,
+                            keep_calcs: Optional[int] = None) -> Dict[str, Any]:
+        """RO: retentia calculelor de stoc: rindurile ITEM si antetele rularilor
+        mai vechi de keep_days se sterg, pastrind mereu ultimele keep_calcs
+        rulari (si pe cea is_latest). Soldul curent e in YBIRO_STOCK_CUR, deci
+        stergerea nu schimba ce vad grila si magazinul.
+        EN: stock-calc retention: drop ITEM rows and headers of runs older than
+        keep_days, always keeping the last keep_calcs runs (and the latest one).
+        The current balance lives in YBIRO_STOCK_CUR, so reads are unaffected."""
+        days = int(keep_days if keep_days is not None else Biro26Store.STOCK_KEEP_DAYS)
+        calcs = int(keep_calcs if keep_calcs is not None else Biro26Store.STOCK_KEEP_CALCS)
+        try:
+            res = Biro26DB().execute_script(Biro26Store._compact_statements(days, calcs))
+            if not res.get("success"):
+                return {"success": False, "error": res.get("message")}
+            return {"success": True, "data": Biro26Store._compacted(res.get("results") or [])}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def _compact_statements(days: int, calcs: int) -> List[Dict[str, Any]]:
+        old = ("SELECT id FROM (SELECT id, run_at, is_latest, "
+               "ROW_NUMBER() OVER (ORDER BY id DESC) rn FROM YBIRO_STOCK_CALC) "
+               "WHERE rn > :keep AND is_latest = '0' "
+               "AND run_at < SYSTIMESTAMP - NUMTODSINTERVAL(:days, 'DAY')")
+        params = {"keep": int(calcs), "days": int(days)}
+        return [
+            {"sql": f"DELETE FROM YBIRO_STOCK_CALC_ITEM WHERE calc_id IN ({old})",
+             "params": params, "kind": "dml"},
+            {"sql": f"DELETE FROM YBIRO_STOCK_CALC WHERE id IN ({old})",
+             "params": params, "kind": "dml"},
+        ]
+
+    @staticmethod
+    def _compacted(results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """RO/EN: rowcount-urile celor doua DELETE de la coada scriptului."""
+        tail = (results[-2:] if len(results) >= 2 else [{}, {}])
+        return {"items": int(tail[0].get("rowcount") or 0),
+                "calcs": int(tail[1].get("rowcount") or 0)}
+
     @staticmethod
     def get_latest_stock_calc() -> Dict[str, Any]:
         try:
             r = Biro26DB().execute_query(
                 "SELECT * FROM (SELECT id, TO_CHAR(data_doc,'DD.MM.YYYY') data_doc, "
-                "dep_filter, cont_filter, pfilt, row_count, status, err_text, "
+                "dep_filter, cont_filter, pfilt, row_count, calc_mode, changed_count, "
+                "status, err_text, "
                 "TO_CHAR(run_at,'DD.MM.YYYY HH24:MI') run_at FROM YBIRO_STOCK_CALC "
                 "WHERE is_latest='1' ORDER BY id DESC) WHERE ROWNUM=1")
             if not r.get("success"):
@@ -692,11 +872,10 @@ class Biro26Store:
 
     @staticmethod
     def get_stock_items(limit: int = 500, offset: int = 0) -> Dict[str, Any]:
-        """Rows of the latest stock calculation (SC, total CANT across depts)."""
+        """Rows of the current stock balance (SC, total CANT across depts)."""
         try:
-            inner = ("SELECT i.sc, u.DENUMIREA, SUM(i.cant) cant FROM YBIRO_STOCK_CALC_ITEM i "
+            inner = ("SELECT i.sc, u.DENUMIREA, SUM(i.cant) cant FROM YBIRO_STOCK_CUR i "
                      "LEFT JOIN TMS_UNIVERS u ON u.COD = i.sc "
-                     "WHERE i.calc_id = (SELECT id FROM YBIRO_STOCK_CALC WHERE is_latest='1') "
                      "GROUP BY i.sc, u.DENUMIREA ORDER BY u.DENUMIREA")
             r = Biro26DB().execute_query(_page(inner, limit, offset))
             return _result(r)
@@ -717,8 +896,8 @@ class Biro26Store:
                            sort: str = "name") -> Dict[str, Any]:
         """Product + stock grid (Windows-Excel-style columns), TIP='P' driven.
 
-        Real balance comes from the latest YBIRO_STOCK_CALC_ITEM (NULL if never
-        calculated or item has no postings). App/UI applies the visual placeholder
+        Real balance comes from YBIRO_STOCK_CUR, the balance of the latest
+        calculation (NULL if never calculated or item has no postings). App/UI applies the visual placeholder
         constant when real_cant is NULL or 0, mirroring the legacy Excel export.
         Paginated (ROWNUM, 11g) so the UI can page through all ~78k products via
         infinite scroll instead of loading everything at once.
@@ -738,9 +917,7 @@ class Biro26Store:
         # RO: pretul retail efectiv (folosit in SELECT si in filtrul de pret)
         # EN: effective retail price (used in SELECT and in the price filter);
         #     RETAIL1 is VARCHAR in the feed — convert only numeric-looking values
-        price_expr = ("NVL(pl.PRETV, CASE WHEN REGEXP_LIKE(TRIM(g.RETAIL1), "
-                      "'^-?[0-9]+([.,][0-9]+)?$') THEN "
-                      "TO_NUMBER(REPLACE(TRIM(g.RETAIL1),',','.')) END)")
+        price_expr = f"NVL(pl.PRETV, {RETAIL1_FEED_EXPR})"
         try:
             # RO: nucleu ieftin (doar u+g+pl: filtrele si sortarea), paginat cu
             #     ROWNUM; join-urile scumpe (VMS_MPT_TVR view, stoc, barcode,
@@ -762,9 +939,7 @@ class Biro26Store:
                 "ROUND(NVL(pl.PRETV1, g.ANGRO)/1.2,2) ANGRO_FARA_TVA "
                 "FROM TMS_UNIVERS u "
                 # dedupe: the feed holds a few identical duplicate rows per product
-                "LEFT JOIN (SELECT gg.* FROM (SELECT g0.*, ROW_NUMBER() OVER "
-                "  (PARTITION BY g0.COD_UNIVERS ORDER BY g0.ID) RN0 "
-                "  FROM BIRO26_GOODS g0) gg WHERE gg.RN0 = 1) g ON g.COD_UNIVERS = u.COD "
+                f"LEFT JOIN ({goods_dedup_sql()}) g ON g.COD_UNIVERS = u.COD "
                 # RO: pretul in vigoare la data ceruta / EN: price effective at the requested date
                 "LEFT JOIN TPR1D_PERPRLIST pl ON pl.CODPRICE = 1 AND pl.SC = u.COD "
                 "  AND TO_DATE(:pd,'YYYY-MM-DD') BETWEEN pl.DATASTART AND pl.DATAEND "
@@ -856,47 +1031,10 @@ class Biro26Store:
                 "c.ANGRO, c.IONLINE, c.RETAIL1, "
                 "c.ANGRO_FARA_TVA, "
                 "NVL(m.IE_LINKADRES, NVL(c.PHOTO_URL, c.IMAGE_LINK)) IMAGE, "
-                "s.CANT REAL_CANT, NVL(rz.QTY, 0) RESERVED, "
-                "GREATEST(NVL(s.CANT, 0) - NVL(rz.QTY, 0), 0) AVAIL_CANT, "
-                "bc.BARCODE, bc.BC_CNT, "
-                "vr.VARIANT, vr.MASTER_COD, NVL(vg.VCNT, 1) VAR_CNT, "
-                # RO: denumirea completa din TMS_MPT_WEBATTR — copia VARCHAR2
-                #     (ieftina) pentru grila/tooltip; BLOB-ul DOAR in fisa
-                "w.DENUMIRE_FULL_RO DENUM_FULL, w.DENUMIRE_FULL_RU DENUM_FULL_RU "
-                f"FROM ({_page(inner, limit, offset)}) c "
-                "LEFT JOIN TMS_MPT_WEBATTR w ON w.COD = c.COD "
-                "LEFT JOIN VMS_MPT_TVR m ON m.COD = c.COD "
-                "LEFT JOIN (SELECT sc, SUM(cant) cant FROM YBIRO_STOCK_CALC_ITEM "
-                "  WHERE calc_id = (SELECT id FROM YBIRO_STOCK_CALC WHERE is_latest='1') "
-                "  GROUP BY sc) s ON s.sc = c.COD "
-                # RO: cantitatea BLOCATA de comenzile magazinului. Instantaneul
-                #     de stoc (YBIRO_STOCK_CALC) se recalculeaza periodic, deci
-                #     nu stie nici de comenzile neonorate, nici de livrarile de
-                #     dupa data lui. Scadem ambele:
-                #       - contul de plata NElivrat (ctnrdoc IS NULL) -> rezervat;
-                #       - livrat DUPA data instantaneului -> marfa a plecat deja.
-                #     Cele doua cazuri nu se suprapun: la livrare comanda se inchide.
-                # EN: quantity locked by shop orders — the stock snapshot is
-                #     periodic, so subtract both unshipped orders and shipments
-                #     made after the snapshot date.
-                "LEFT JOIN (SELECT d.CTSC SC, SUM(NVL(d.CANT, 0)) QTY "
-                "  FROM VMDB_ST201D d "
-                "  JOIN VMDB_ST201M m ON m.NRDOC = d.NRDOC "
-                "  JOIN VMDB_DOCS   h ON h.COD = d.NRDOC AND h.SYSFID = 12280 "
-                "  WHERE d.CTSC IS NOT NULL AND ("
-                "        m.CTNRDOC IS NULL "
-                "     OR NVL((SELECT dh.DATAMANUAL FROM VMDB_DOCS dh "
-                "               WHERE dh.COD = m.CTNRDOC), h.DATAMANUAL) > "
-                "        NVL((SELECT MAX(DATA_DOC) FROM YBIRO_STOCK_CALC "
-                "               WHERE IS_LATEST = '1'), DATE '1900-01-01')) "
-                "  GROUP BY d.CTSC) rz ON rz.SC = c.COD "
-                "LEFT JOIN (SELECT COD, MIN(BARCODE) BARCODE, COUNT(*) BC_CNT "
-                "  FROM TMS_MPT_BARCODE GROUP BY COD) bc ON bc.COD = c.COD "
-                "LEFT JOIN BIRO26_VARIANTS vr ON vr.COD_UNIVERS = c.COD "
-                "LEFT JOIN (SELECT MASTER_COD, COUNT(*) VCNT FROM BIRO26_VARIANTS "
-                "  WHERE MASTER_COD IS NOT NULL GROUP BY MASTER_COD) vg "
-                "  ON vg.MASTER_COD = vr.MASTER_COD "
-                "ORDER BY c.rn")
+                + STOCK_PAGE_COLS
+                + f"FROM ({_page(inner, limit, offset)}) c "
+                + STOCK_PAGE_JOINS
+                + "ORDER BY c.rn")
             r = Biro26DB().execute_query(outer, params)
             res = _result(r)
             # RO: sursele fara HTTPS (impreso.md) trec prin proxy, altfel browserul
@@ -5,6 +5,7 @@ EN: storefront limited-admin storage for the new Figma site homepage."""
 
 from typing import Any, Dict
 
+from models.biro26_cache import region
 from models.biro26_db import Biro26DB
 from models.biro26_oracle_store import _rows
 
@@ -17,14 +18,18 @@ class Biro26Site:
     #     schimba doar din admin, deci 60s de cache nu se simt; orice save
     #     din admin o invalideaza imediat prin _invalidate().
     # EN: whole-config cache (60s TTL); every admin save invalidates it.
-    _config_cache: Dict[str, Any] = {"exp": 0.0, "data": None}
+    _config_cache = region("biro26.site.config", 60.0, swr=True)
+    # RO: "Cele mai populare" — cache simplu 120s (fara SWR)
+    # EN: featured products — plain 120s cache
+    _featured_cache = region("biro26.site.featured", 120.0)
 
     @staticmethod
     def _invalidate() -> None:
-        Biro26Site._config_cache["exp"] = 0.0
-        Biro26Site._featured_cache["exp"] = 0.0
-
-    _config_refreshing = False
+        # RO: invalidare "soft": vitrina mai primeste o data copia veche cit
+        #     se reincarca in fundal; lista "populare" se reincarca la cerere.
+        # EN: soft: the config is served stale once while it reloads.
+        Biro26Site._config_cache.invalidate(hard=False)
+        Biro26Site._featured_cache.invalidate(hard=False)
 
     # ── public: configuratia vitrinei pentru pagina principala ─────────
     @staticmethod
@@ -34,30 +39,10 @@ class Biro26Site:
         Oracle, ~15s la rece) ruleaza intr-un fir de fundal. Doar primul
         apel dupa pornire plateste pretul intreg.
         EN: serve stale instantly, refresh in a background thread."""
-        import threading as _th
-        import time as _t
-        c = Biro26Site._config_cache
-        if c["data"] is not None:
-            if c["exp"] <= _t.time() and not Biro26Site._config_refreshing:
-                Biro26Site._config_refreshing = True
-                _th.Thread(target=Biro26Site._config_refresh,
-                           daemon=True).start()
-            return c["data"]
-        return Biro26Site._config_load()
-
-    @staticmethod
-    def _config_refresh() -> None:
-        try:
-            Biro26Site._config_load()
-        except Exception:                                    # noqa: BLE001
-            pass
-        finally:
-            Biro26Site._config_refreshing = False
+        return Biro26Site._config_cache.get("config", Biro26Site._config_load)
 
     @staticmethod
     def _config_load() -> Dict[str, Any]:
-        import time as _t
-        c = Biro26Site._config_cache
         db = Biro26DB()
         hero = _rows(db.execute_query(
             "SELECT ID, KICKER_RO, KICKER_RU, TITLE_RO, TITLE_RU, SUB_RO, "
@@ -73,8 +58,8 @@ class Biro26Site:
         if d:
             deal = {"ends_at": d[0].get("ends_at"), "product": None}
             try:
-                from models.biro26_oracle_store import Biro26Store
-                pr = Biro26Store.get_products_stock(
+                from models.biro26_catalog import Biro26Catalog
+                pr = Biro26Catalog.products_stock(
                     cod=int(d[0]["product_cod"]), limit=1)
                 rows = pr.get("data") or []
                 if rows:
@@ -103,7 +88,6 @@ class Biro26Site:
             "featured": Biro26Site.featured_products(),
             "min_order": min_order,
             "deal": deal}}
-        c.update(exp=_t.time() + 60, data=res)
         return res
 
     # ── admin: hero slides CRUD ────────────────────────────────────────
@@ -188,8 +172,6 @@ class Biro26Site:
                                            "error": r.get("message")}
 
     # ── "Cele mai populare": lista de COD-uri setata in backoffice ─────
-    _featured_cache = {"exp": 0.0, "rows": []}
-
     @staticmethod
     def featured_list() -> Dict[str, Any]:
         rows = _rows(Biro26DB().execute_query(
@@ -220,24 +202,23 @@ class Biro26Site:
     @staticmethod
     def featured_products() -> list:
         """RO: fisele produselor din lista (cache 120s — pagina publica)."""
-        import time as _t
-        c = Biro26Site._featured_cache
-        if c["exp"] > _t.time():
-            return c["rows"]
+        return Biro26Site._featured_cache.get("featured", Biro26Site._featured_load)
+
+    @staticmethod
+    def _featured_load() -> list:
         rows = []
         try:
-            from models.biro26_oracle_store import Biro26Store
+            from models.biro26_catalog import Biro26Catalog
             ids = _rows(Biro26DB().execute_query(
                 "SELECT PRODUCT_COD FROM YBIRO_SITE_FEATURED ORDER BY ORD, ID"))
             for r in ids[:25]:
-                pr = Biro26Store.get_products_stock(
+                pr = Biro26Catalog.products_stock(
                     cod=int(r["product_cod"]), limit=1)
                 got = pr.get("data") or []
                 if got:
                     rows.append(got[0])
         except Exception:
             rows = []
-        c.update(exp=_t.time() + 120, rows=rows)
         return rows
 
     # ── newsletter: abonare publica + lista pentru admin ───────────────
@@ -13,40 +13,28 @@ Cum se seteaza / как ставится: scripts/set_app_version.py (пишет
 """
 from __future__ import annotations
 
-import threading
-import time
-from typing import Optional
-
+from models.biro26_cache import region
 from models.biro26_db import Biro26DB
 
 CACHE_TTL_SEC = 600.0
 
-_lock = threading.Lock()
-_cache: Optional[tuple[float, str]] = None
+_cache = region("biro26.version", CACHE_TTL_SEC)
 
 
 def invalidate() -> None:
-    global _cache
-    with _lock:
-        _cache = None
+    _cache.invalidate()
 
 
 def current(app_code: str = "site") -> str:
     """Текущая версия. Пустая строка, если БД недоступна — подвал не ломаем."""
-    global _cache
-    with _lock:
-        hit = _cache
-    if hit and time.time() - hit[0] < CACHE_TTL_SEC:
-        return hit[1]
-    vers = ""
+    return _cache.get(app_code, lambda: _load(app_code))
+
+
+def _load(app_code: str) -> str:
     try:
         r = Biro26DB().execute_query(
             "SELECT VERS FROM VMS_WEBAPPVERS WHERE APP_CODE = :a", {"a": app_code})
         rows = r.get("data") or []
-        if rows:
-            vers = str(rows[0][0] or "")
+        return str(rows[0][0] or "") if rows else ""
     except Exception:                                  # noqa: BLE001
-        vers = ""
-    with _lock:
-        _cache = (time.time(), vers)
-    return vers
+        return ""
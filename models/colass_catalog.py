@@ -0,0 +1,256 @@
+"""
+Индекс каталога работ и ресурсов Colass для локального разбора сметы
+(ColassController.ai_parse_estimate_local).
+
+Раньше каждый разбор читал CLS_WORK_CATALOG и CLS_RESOURCES целиком и
+нормализовал и скорил каждую строку каталога против каждой части сметы.
+Теперь каталог разбирается один раз на версию (CLS_CATALOG_VERSION,
+sql/123_colass_catalog_version.sql — счётчик двигают триггеры на
+изменение строк каталога) и хранится в процессе.
+
+Оценка строки та же, что в _score_local: код совпал — 100, имя совпало —
+99, запрос входит в имя — 92, имя входит в запрос — 80, иначе WRatio.
+Ступени ищутся точно: словари кодов и имён, индекс триграмм имён (в каких
+именах может стоять запрос) и индекс первых триграмм (какие имена могут
+стоять в запросе). WRatio считается не по всему каталогу, а по кандидатам:
+строки со словами, начинающимися как слова запроса (префикс из трёх
+букв), или похожими на них по триграммам (опечатки), — с весом по
+редкости слова; частые слова (в большой доле каталога) отбирают, только
+если редких в части нет. Часть без единого общего с каталогом слова или
+похожего на него — не найдена (оценка 0), как и при полном переборе почти
+всегда, но без прохода WRatio по всему каталогу.
+
+match_many разбирает все части вставленной сметы за один вызов: отбор
+кандидатов по одинаковым словам и одинаковые части считаются один раз.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+import time
+from typing import Any, Callable
+
+try:
+    from rapidfuzz import fuzz, process
+except Exception:
+    fuzz = process = None
+
+_GRAM = 3
+_CANDIDATES = 256          # строк каталога на WRatio для одной части
+_COMMON_SHARE = 0.2        # слово в большей доле строк — не отбирает кандидатов
+# extractOne отбрасывает оценку, равную score_cutoff, — порог чуть ниже
+_CUTOFF_SLACK = 0.01
+
+CATALOG_CHECK_SEC = 5.0    # как часто сверять версию каталога с Oracle
+CATALOG_TTL = 600          # сек; без CLS_CATALOG_VERSION индекс просто живёт столько
+
+
+def _grams(text: str) -> set[str]:
+    return {text[i:i + _GRAM] for i in range(len(text) - _GRAM + 1)}
+
+
+def _tier(token: str, name: str, code: str) -> float | None:
+    """Ступень _score_local для непустых token / name, None — дальше WRatio."""
+    if code and token == code:
+        return 100.0
+    if token == name:
+        return 99.0
+    if token in name:
+        return 92.0
+    if name in token:
+        return 80.0
+    return None
+
+
+class ColassCatalogIndex:
+    """
+    Разобранный каталог: rows — работы, затем ресурсы (entity_type 'work' /
+    'resource'), в порядке ID; при равной оценке побеждает строка раньше.
+    """
+
+    def __init__(self, rows: list[dict[str, Any]], norm: Callable[[str], str]):
+        self.rows = rows
+        self._names = [norm(r.get("name") or "") for r in rows]
+        self._codes = [norm(r.get("code") or "") for r in rows]
+        self._by_code: dict[str, list[int]] = {}
+        self._by_name: dict[str, list[int]] = {}
+        self._grams: dict[str, list[int]] = {}       # триграмма имени → строки
+        self._heads: dict[str, list[int]] = {}       # первая триграмма имени → строки
+        self._short: list[int] = []                  # имена короче триграммы
+        self._word_rows: dict[str, list[int]] = {}   # слово имени → строки
+        for pos, name in enumerate(self._names):
+            if not name:
+                continue  # пустое имя — оценка 0, в поиск не идёт
+            if self._codes[pos]:
+                self._by_code.setdefault(self._codes[pos], []).append(pos)
+            self._by_name.setdefault(name, []).append(pos)
+            for g in _grams(name):
+                self._grams.setdefault(g, []).append(pos)
+            if len(name) < _GRAM:
+                self._short.append(pos)
+            else:
+                self._heads.setdefault(name[:_GRAM], []).append(pos)
+            for w in set(name.split()):
+                self._word_rows.setdefault(w, []).append(pos)
+        self._word_prefix: dict[str, list[str]] = {}  # три первые буквы → слова
+        self._word_grams: dict[str, list[str]] = {}   # триграмма слова → слова
+        for w in self._word_rows:
+            self._word_prefix.setdefault(w[:_GRAM], []).append(w)
+            for g in _grams(w):
+                self._word_grams.setdefault(g, []).append(w)
+        self._common = max(1, int(len(rows) * _COMMON_SHARE))
+
+    # ---- ступени ----
+
+    def _tiers(self, token: str) -> tuple[float, int | None, set[int]]:
+        """(лучшая ступень, её строка, все строки со ступенью)."""
+        found = set(self._by_code.get(token, ())) | set(self._by_name.get(token, ()))
+        if len(token) < _GRAM:
+            found.update(p for p, n in enumerate(self._names) if n and token in n)
+        else:
+            postings = [self._grams.get(g) for g in _grams(token)]
+            if all(postings):
+                found.update(p for p in min(postings, key=len) if token in self._names[p])
+        found.update(p for p in self._short if self._names[p] in token)
+        for g in _grams(token):
+            found.update(p for p in self._heads.get(g, ()) if self._names[p] in token)
+        best, best_pos = -1.0, None
+        for pos in found:
+            score = _tier(token, self._names[pos], self._codes[pos])
+            if score is not None and (score > best or (score == best and pos < best_pos)):
+                best, best_pos = score, pos
+        return best, best_pos, found
+
+    # ---- кандидаты на WRatio ----
+
+    def _word_weights(self, word: str) -> tuple[dict[int, float], bool]:
+        """
+        Строки со словом, начинающимся так же или похожим по триграммам, с весом
+        слова по редкости; второе — слово частое (в большой доле каталога).
+        """
+        words = set(self._word_prefix.get(word[:_GRAM], ())) if len(word) >= _GRAM else set()
+        if word in self._word_rows:
+            words.add(word)
+        grams = _grams(word)
+        if grams:
+            counts: dict[str, int] = {}
+            for g in grams:
+                for w in self._word_grams.get(g, ()):
+                    counts[w] = counts.get(w, 0) + 1
+            need = (len(grams) + 1) // 2
+            words.update(w for w, c in counts.items() if c >= need)
+        rows: set[int] = set()
+        for w in words:
+            rows.update(self._word_rows[w])
+        if not rows:
+            return {}, False
+        weight = math.log(1.0 + len(self.rows) / len(rows))
+        return dict.fromkeys(rows, weight), len(rows) > self._common
+
+    def _candidates(self, token: str, word_cache: dict[str, tuple[dict[int, float], bool]]) -> list[int]:
+        """Строки под WRatio: по редким словам части, а если их нет — по частым."""
+        rare, common = [], []
+        for word in set(token.split()):
+            if word not in word_cache:
+                word_cache[word] = self._word_weights(word)
+            weights, is_common = word_cache[word]
+            if weights:
+                (common if is_common else rare).append(weights)
+        score: dict[int, float] = {}
+        for weights in rare or common:
+            for pos, weight in weights.items():
+                score[pos] = score.get(pos, 0.0) + weight
+        if len(score) <= _CANDIDATES:
+            return sorted(score)
+        # при равном весе — строки раньше: при равной оценке побеждают они
+        return sorted(heapq.nlargest(_CANDIDATES, score, key=lambda pos: (score[pos], -pos)))
+
+    # ---- разбор ----
+
+    def _fuzzy(self, token: str, positions: list[int] | None, hit: set[int], floor: float) -> tuple[float, int | None]:
+        if fuzz is None:
+            return -1.0, None
+        if positions is None:
+            choices = [None if (p in hit or not n) else n for p, n in enumerate(self._names)]
+            owners = None
+        else:
+            positions = [p for p in positions if p not in hit]
+            choices = [self._names[p] for p in positions]
+            owners = positions
+        res = process.extractOne(token, choices, scorer=fuzz.WRatio,
+                                 score_cutoff=max(0.0, floor - _CUTOFF_SLACK))
+        if not res:
+            return -1.0, None
+        return float(res[1]), (res[2] if owners is None else owners[res[2]])
+
+    def match(self, token: str, exhaustive: bool = False,
+              word_cache: dict[str, tuple[dict[int, float], bool]] | None = None) -> tuple[dict[str, Any] | None, float]:
+        """
+        (строка каталога, оценка) для нормализованной части сметы.
+        exhaustive=True — WRatio по всему каталогу, как прежний перебор.
+        """
+        if not self.rows:
+            return None, -1.0
+        if not token:
+            return self.rows[0], 0.0
+        tier, tier_pos, hit = self._tiers(token)
+        positions = None
+        if not exhaustive:
+            positions = self._candidates(token, word_cache if word_cache is not None else {})
+        score, pos = self._fuzzy(token, positions, hit, max(tier, 0.0))
+        if pos is not None and (tier_pos is None or score > tier or (score == tier and pos < tier_pos)):
+            tier, tier_pos = score, pos
+        if tier_pos is None or tier <= 0:
+            # Ничего не похоже: как и раньше — первая строка с оценкой 0
+            return self.rows[0], 0.0
+        return self.rows[tier_pos], tier
+
+    def match_many(self, tokens: list[str], exhaustive: bool = False) -> list[tuple[dict[str, Any] | None, float]]:
+        """Все части сметы за один проход: общие слова и одинаковые части — один раз."""
+        word_cache: dict[str, tuple[dict[int, float], bool]] = {}
+        done: dict[str, tuple[dict[str, Any] | None, float]] = {}
+        out = []
+        for token in tokens:
+            if token not in done:
+                done[token] = self.match(token, exhaustive, word_cache)
+            out.append(done[token])
+        return out
+
+
+_index_lock = threading.Lock()
+_index: ColassCatalogIndex | None = None
+_index_version: Any = None
+_index_built = 0.0
+_index_checked = 0.0
+
+
+def cached_catalog_index(probe: Callable[[], Any], loader: Callable[[], list[dict[str, Any]]],
+                         norm: Callable[[str], str]) -> ColassCatalogIndex:
+    """
+    Индекс каталога из кеша процесса.
+
+    probe() → версия каталога (None — таблицы версий нет, тогда индекс живёт
+    CATALOG_TTL) вызывается не чаще раза в CATALOG_CHECK_SEC; loader() → строки
+    каталога — только если версия сменилась, вне блокировки. Сбрасывать
+    кеш из кода не нужно: каталог правится только импортом и SQL, а любую
+    такую правку видят триггеры sql/123 — версия сменится.
+    """
+    global _index, _index_version, _index_built, _index_checked
+    now = time.monotonic()
+    with _index_lock:
+        if _index is not None and now - _index_checked < CATALOG_CHECK_SEC:
+            return _index
+    version = probe()
+    with _index_lock:
+        if _index is not None:
+            same = version == _index_version if version is not None else now - _index_built < CATALOG_TTL
+            if same:
+                _index_checked = now
+                return _index
+    index = ColassCatalogIndex(loader(), norm)
+    with _index_lock:
+        _index, _index_version = index, version
+        _index_built = _index_checked = now
+    return index
+
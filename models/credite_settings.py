@@ -4,17 +4,18 @@
   AdbBackend    — Oracle ADB основного проекта (thin mode + wallet)
   Biro26Backend — Oracle 11g OfficePlus (thick mode, subprocess worker)
 
-CrediteSettings — CRUD поверх любого бэкенда, с кэшем в памяти (TTL 60 c).
+CrediteSettings — CRUD поверх любого бэкенда, с кэшем в памяти (TTL 60 c,
+models/biro26_cache.py).
 При недоступности БД чтение возвращает None: вызывающий код (config.py,
 провайдеры) откатывается на значения из .env.
 """
 from __future__ import annotations
 
-import threading
-import time
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 
+from models.biro26_cache import CacheRegion
+
 CACHE_TTL_SEC = 60
 
 
@@ -129,8 +130,10 @@ class CrediteSettings:
 
     def __init__(self, backend: CrediteBackend) -> None:
         self.backend = backend
-        self._cache: Dict[str, tuple[float, Optional[Dict[str, Any]]]] = {}
-        self._lock = threading.Lock()
+        # Параметры расшифрованы (пароли) — значения не пишутся в общие
+        # файлы кэша между процессами, распространяется только инвалидация.
+        self._cache = CacheRegion(f"credite_settings.{getattr(backend, 'id', 'db')}",
+                                  CACHE_TTL_SEC, secret=True)
 
     # ── чтение ──
 
@@ -140,14 +143,7 @@ class CrediteSettings:
         Возвращает None, если провайдера нет или БД недоступна.
         """
         code = (code or "").strip().lower()
-        with self._lock:
-            hit = self._cache.get(code)
-            if hit and time.time() - hit[0] < CACHE_TTL_SEC:
-                return hit[1]
-        val = self._load(code)
-        with self._lock:
-            self._cache[code] = (time.time(), val)
-        return val
+        return self._cache.get(code, lambda: self._load(code))
 
     def _load(self, code: str) -> Optional[Dict[str, Any]]:
         try:
@@ -292,11 +288,7 @@ class CrediteSettings:
         return {"success": True}
 
     def invalidate(self, code: Optional[str] = None) -> None:
-        with self._lock:
-            if code is None:
-                self._cache.clear()
-            else:
-                self._cache.pop(code.lower(), None)
+        self._cache.invalidate(code.lower() if code is not None else None)
 
 
 _ADB: Optional[CrediteSettings] = None
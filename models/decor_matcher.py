@@ -0,0 +1,152 @@
+"""
+Сопоставление строк сметы DECOR с материалами каталога (DecorLocalStore.ai_parse_items).
+
+Каталог разбирается один раз: нормализованные код и имена каждого материала,
+словарь кодов, индекс триграмм кодов (какие коды могут входить в строку) и
+имён (в каких именах может стоять строка). Ступени оценки прежние, как при
+переборе материалов на каждую строку: код совпал — 100, код входит в строку —
+95, строка входит в имя — 90, иначе нечёткая близость к коду или имени. Побеждает
+максимальная оценка, при равной — материал раньше по каталогу; материал
+со ступенью оценивается только ступенью, нечёткая близость у него не считается.
+
+Нечёткая близость — Indel-ratio rapidfuzz (та же формула 2·M / (|a| + |b|),
+что у difflib.SequenceMatcher, но M — наибольшая общая подпоследовательность)
+одним проходом по всем полям каталога с порогом не ниже лучшей ступени.
+Без rapidfuzz — SequenceMatcher, как раньше, с отсевом полей по
+real_quick_ratio / quick_ratio (верхние границы ratio).
+"""
+from __future__ import annotations
+
+from difflib import SequenceMatcher
+from typing import Any, Callable
+
+try:
+    from rapidfuzz import fuzz, process
+except Exception:
+    fuzz = process = None
+
+_GRAM = 3
+# extractOne отбрасывает оценку, равную score_cutoff, — порог чуть ниже
+_CUTOFF_SLACK = 0.01
+
+
+def _grams(text: str) -> set[str]:
+    return {text[i:i + _GRAM] for i in range(len(text) - _GRAM + 1)}
+
+
+class DecorMaterialMatcher:
+    """Разобранный каталог активных материалов; best(token) — лучший материал и оценка."""
+
+    def __init__(self, materials: list[dict[str, Any]], norm: Callable[[Any], str]):
+        self.materials = list(materials)
+        self._codes: list[str] = []
+        self._names: list[tuple[str, ...]] = []
+        self._code_pos: dict[str, int] = {}
+        self._code_grams: dict[str, list[int]] = {}   # первая триграмма кода → материалы
+        self._short_codes: list[int] = []              # коды короче триграммы
+        self._name_grams: dict[str, list[int]] = {}   # триграмма имени → материалы
+        self._fields: list[str] = []                   # код и имена подряд, по материалам
+        self._field_owner: list[int] = []
+        self._field_range: list[range] = []
+        for pos, m in enumerate(self.materials):
+            code = norm(m.get("code"))
+            names = tuple(n for n in (norm(m.get("name")), norm(m.get("name_original")), norm(m.get("name_ro"))) if n)
+            self._codes.append(code)
+            self._names.append(names)
+            if code:
+                self._code_pos.setdefault(code, pos)
+                if len(code) < _GRAM:
+                    self._short_codes.append(pos)
+                else:
+                    self._code_grams.setdefault(code[:_GRAM], []).append(pos)
+            for g in set().union(*(_grams(n) for n in names)) if names else ():
+                self._name_grams.setdefault(g, []).append(pos)
+            start = len(self._fields)
+            for cand in (code,) + names:
+                if cand:
+                    self._fields.append(cand)
+                    self._field_owner.append(pos)
+            self._field_range.append(range(start, len(self._fields)))
+
+    def _tiers(self, token: str) -> tuple[float, int | None, set[int]]:
+        """(оценка лучшей ступени, её материал, все материалы со ступенью)."""
+        hit: set[int] = set()
+        best, best_pos = -1.0, None
+        if not token:
+            return best, best_pos, hit
+        exact = self._code_pos.get(token)
+        if exact is not None:
+            best, best_pos = 100.0, exact
+        # Код входит в строку: кандидаты — коды, чья первая триграмма есть в строке
+        contained = [p for p in self._short_codes if self._codes[p] in token]
+        for g in _grams(token):
+            contained.extend(p for p in self._code_grams.get(g, ()) if self._codes[p] in token)
+        if contained:
+            hit.update(contained)
+            if best_pos is None:
+                best, best_pos = 95.0, min(contained)
+        # Строка входит в имя: кандидаты — материалы со всеми триграммами строки
+        if len(token) < _GRAM:
+            named = [p for p, names in enumerate(self._names) if any(token in n for n in names)]
+        else:
+            postings = [self._name_grams.get(g) for g in _grams(token)]
+            if all(postings):
+                rarest = min(postings, key=len)
+                named = [p for p in rarest if any(token in n for n in self._names[p])]
+            else:
+                named = []
+        named = [p for p in named if p not in hit]
+        if named:
+            hit.update(named)
+            if best_pos is None:
+                best, best_pos = 90.0, min(named)
+        return best, best_pos, hit
+
+    def _fuzzy_rapidfuzz(self, token: str, hit: set[int], floor: float) -> tuple[float, int | None]:
+        choices: list[str | None] = self._fields
+        if hit:
+            choices = list(self._fields)
+            for p in hit:
+                for i in self._field_range[p]:
+                    choices[i] = None
+        cutoff = max(0.0, floor - _CUTOFF_SLACK)
+        res = process.extractOne(token, choices, scorer=fuzz.ratio, score_cutoff=cutoff)
+        if not res:
+            return -1.0, None
+        return round(res[1], 2), self._field_owner[res[2]]
+
+    def _fuzzy_difflib(self, token: str, hit: set[int], floor: float) -> tuple[float, int | None]:
+        best, best_pos = -1.0, None
+        for pos, rng in enumerate(self._field_range):
+            if pos in hit or not rng:
+                continue
+            top = 0.0
+            for i in rng:
+                sm = SequenceMatcher(None, token, self._fields[i])
+                # ratio не считается, если даже верхняя граница не поднимет оценку
+                # материала, не обгонит лучший материал и не дотянет до ступени
+                if not all(u > top and round(u, 2) > best and round(u, 2) >= floor
+                           for u in (sm.real_quick_ratio() * 100.0, sm.quick_ratio() * 100.0)):
+                    continue
+                top = max(top, sm.ratio() * 100.0)
+            score = round(top, 2)
+            if score > best:
+                best, best_pos = score, pos
+        return best, best_pos
+
+    def best(self, token: str) -> tuple[dict[str, Any] | None, float]:
+        """(материал, оценка) с максимальной оценкой; нет материалов — (None, -1)."""
+        if not self.materials:
+            return None, -1.0
+        tier, tier_pos, hit = self._tiers(token)
+        floor = max(tier, 0.0)
+        if fuzz is not None:
+            score, pos = self._fuzzy_rapidfuzz(token, hit, floor)
+        else:
+            score, pos = self._fuzzy_difflib(token, hit, floor)
+        if pos is not None and (tier_pos is None or score > tier or (score == tier and pos < tier_pos)):
+            tier, tier_pos = score, pos
+        if tier_pos is None or tier <= 0:
+            # Ничего не похоже: как и раньше — первый материал с оценкой 0
+            return self.materials[0], 0.0
+        return self.materials[tier_pos], tier
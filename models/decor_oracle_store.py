@@ -11,6 +11,21 @@ from .database import DatabaseConnection
 
 _DECOR_CORE_TABLE = "DECOR_MATERIALS"
 _SCHEMA_READY = False
+_VERSIONED_TABLES = (
+    "DECOR_MATERIALS",
+    "DECOR_SETTINGS",
+    "DECOR_ORDERS",
+    "DECOR_SLIDING_MATERIALS",
+    "DECOR_SLIDING_SETTINGS",
+)
+_ORDER_INDEXES = (
+    "CREATE INDEX IX_DECOR_ORD_STATUS ON DECOR_ORDERS (STATUS_ID, ID)",
+    "CREATE INDEX IX_DECOR_ORD_DAY ON DECOR_ORDERS (SUBSTR(CREATED_AT, 1, 10), ID)",
+    "CREATE INDEX IX_DECOR_ORD_SEARCH ON DECOR_ORDERS (LOWER(ORDER_NUMBER), LOWER(BARCODE), LOWER(CLIENT_NAME), LOWER(CLIENT_PHONE), LOWER(PROJECT_NAME), ID)",
+    "CREATE INDEX IX_DECOR_ORD_BARCODE ON DECOR_ORDERS (LOWER(BARCODE))",
+)
+# Ключ DECOR_COUNTERS: штамп справочной части state, см. state_stamp
+_STAMP_KEY = "state_stamp"
 
 
 def _db_error_code(exc: Exception) -> int | None:
@@ -339,6 +354,20 @@ def ensure_schema() -> None:
                 except oracledb.DatabaseError as exc:
                     if _db_error_code(exc) != 955:
                         raise
+            # Выборки заказов в Oracle (query_orders, report_orders_by_day), см. sql/122
+            for statement in _ORDER_INDEXES:
+                try:
+                    cursor.execute(statement)
+                except oracledb.DatabaseError as exc:
+                    if _db_error_code(exc) not in (955, 1408):
+                        raise
+            # Версия строки для построчной записи (save_changes), см. sql/121
+            for table_name in _VERSIONED_TABLES:
+                try:
+                    cursor.execute(f"ALTER TABLE {table_name} ADD (ROW_VERSION NUMBER DEFAULT 1 NOT NULL)")
+                except oracledb.DatabaseError as exc:
+                    if _db_error_code(exc) != 1430:
+                        raise
         connection.commit()
         _SCHEMA_READY = True
     finally:
@@ -359,7 +388,386 @@ def _as_flag(value: Any) -> str:
     return "Y" if str(value or "N").upper() not in {"N", "0", "FALSE", ""} else "N"
 
 
+_MATERIAL_INSERT = """
+    INSERT INTO DECOR_MATERIALS (
+      ID, CODE, NAME, NAME_ORIGINAL, ORIGINAL_LANG, NAME_RO, IMAGE_URL,
+      CATEGORY, UNIT, UNIT_PRICE, CURRENCY, SOURCE_FILE, SOURCE_SHEET,
+      NOTES, ACTIVE, CREATED_AT, UPDATED_AT
+    ) VALUES (
+      :id, :code, :name, :name_original, :original_lang, :name_ro, :image_url,
+      :category, :unit, :unit_price, :currency, :source_file, :source_sheet,
+      :notes, :active, :created_at, :updated_at
+    )
+    """
+_MATERIAL_UPDATE = """
+    UPDATE DECOR_MATERIALS SET
+      CODE = :code, NAME = :name, NAME_ORIGINAL = :name_original, ORIGINAL_LANG = :original_lang,
+      NAME_RO = :name_ro, IMAGE_URL = :image_url, CATEGORY = :category, UNIT = :unit,
+      UNIT_PRICE = :unit_price, CURRENCY = :currency, SOURCE_FILE = :source_file,
+      SOURCE_SHEET = :source_sheet, NOTES = :notes, ACTIVE = :active,
+      CREATED_AT = :created_at, UPDATED_AT = :updated_at, ROW_VERSION = ROW_VERSION + 1
+    WHERE ID = :id AND ROW_VERSION = :row_version
+    """
+_SETTINGS_COLUMNS = """
+      CURRENCY = :currency, EXCHANGE_RATE_USD_TO_MDL = :exchange_rate_usd_to_mdl,
+      MARKUP_PERCENT = :markup_percent, WASTE_PERCENT = :waste_percent,
+      PROFILE_WEIGHT_KG_PER_M2 = :profile_weight_kg_per_m2, ACCESSORY_FIXED_PER_M2 = :accessory_fixed_per_m2,
+      DRAINAGE_FIXED = :drainage_fixed, TRANSPORT_FIXED = :transport_fixed, INSTALL_RATE_M2 = :install_rate_m2
+    """
+_SETTINGS_INSERT = """
+    INSERT INTO DECOR_SETTINGS (
+      SETTINGS_ID, CURRENCY, EXCHANGE_RATE_USD_TO_MDL, MARKUP_PERCENT, WASTE_PERCENT,
+      PROFILE_WEIGHT_KG_PER_M2, ACCESSORY_FIXED_PER_M2, DRAINAGE_FIXED,
+      TRANSPORT_FIXED, INSTALL_RATE_M2
+    ) VALUES (
+      1, :currency, :exchange_rate_usd_to_mdl, :markup_percent, :waste_percent,
+      :profile_weight_kg_per_m2, :accessory_fixed_per_m2, :drainage_fixed,
+      :transport_fixed, :install_rate_m2
+    )
+    """
+_ORDER_INSERT = """
+    INSERT INTO DECOR_ORDERS (
+      ID, ORDER_NUMBER, BARCODE, PRODUCT_TYPE, CLIENT_NAME, CLIENT_PHONE, CLIENT_EMAIL,
+      PROJECT_TYPE, PROJECT_NAME, LOCATION, COLOR, NOTES, STATUS_ID,
+      CURRENCY, TOTAL_AMOUNT, CREATED_AT, UPDATED_AT
+    ) VALUES (
+      :id, :order_number, :barcode, :product_type, :client_name, :client_phone, :client_email,
+      :project_type, :project_name, :location, :color, :notes, :status_id,
+      :currency, :total_amount, :created_at, :updated_at
+    )
+    """
+_ORDER_UPDATE = """
+    UPDATE DECOR_ORDERS SET
+      ORDER_NUMBER = :order_number, BARCODE = :barcode, PRODUCT_TYPE = :product_type,
+      CLIENT_NAME = :client_name, CLIENT_PHONE = :client_phone, CLIENT_EMAIL = :client_email,
+      PROJECT_TYPE = :project_type, PROJECT_NAME = :project_name, LOCATION = :location,
+      COLOR = :color, NOTES = :notes, STATUS_ID = :status_id, CURRENCY = :currency,
+      TOTAL_AMOUNT = :total_amount, CREATED_AT = :created_at, UPDATED_AT = :updated_at,
+      ROW_VERSION = ROW_VERSION + 1
+    WHERE ID = :id AND ROW_VERSION = :row_version
+    """
+_ORDER_INPUTS_INSERT = """
+    INSERT INTO DECOR_ORDER_INPUTS (
+      ORDER_ID, WIDTH_MM, PROJECTION_MM, FRONT_HEIGHT_MM, REAR_HEIGHT_MM, SYSTEM_TYPE,
+      LED_OPTION, INCLUDE_INSTALLATION, INCLUDE_TRANSPORT, INCLUDE_DRAINAGE, EXTRA_ITEMS_COUNT,
+      VARIANT_KEY, VARIANT_LABEL, FAMILY, HEIGHT_MM, ORIENTATION, INCLUDE_THRESHOLD,
+      INCLUDE_GLASS, GLASS_SYSTEM, GLASS_FINISH, GLASS_THICKNESS, INCLUDE_ASSEMBLY
+    ) VALUES (
+      :order_id, :width_mm, :projection_mm, :front_height_mm, :rear_height_mm, :system_type,
+      :led_option, :include_installation, :include_transport, :include_drainage, :extra_items_count,
+      :variant_key, :variant_label, :family, :height_mm, :orientation, :include_threshold,
+      :include_glass, :glass_system, :glass_finish, :glass_thickness, :include_assembly
+    )
+    """
+_ORDER_METRICS_INSERT = """
+    INSERT INTO DECOR_ORDER_METRICS (
+      ORDER_ID, AREA_M2, PERIMETER_M, SLOPE_MM, SLOPE_PERCENT, POST_COUNT, SECTION_COUNT,
+      BEAM_COUNT, RAFTER_LENGTH_M, FRAME_LENGTH_M, PROFILE_WEIGHT_TOTAL_KG,
+      GLASS_PANEL_COUNT, GLASS_PANEL_AREA_M2, GLASS_PANEL_WIDTH_M, GLASS_PANEL_LENGTH_M,
+      TOTAL_PANELS, PANEL_WIDTH_MM, PROFILE_WEIGHT_KG
+    ) VALUES (
+      :order_id, :area_m2, :perimeter_m, :slope_mm, :slope_percent, :post_count, :section_count,
+      :beam_count, :rafter_length_m, :frame_length_m, :profile_weight_total_kg,
+      :glass_panel_count, :glass_panel_area_m2, :glass_panel_width_m, :glass_panel_length_m,
+      :total_panels, :panel_width_mm, :profile_weight_kg
+    )
+    """
+_ORDER_SUMMARY_INSERT = """
+    INSERT INTO DECOR_ORDER_SUMMARY (
+      ORDER_ID, CURRENCY, PROFILE_COST, ACCESSORY_COST, GLASS_COST, ASSEMBLY_COST,
+      INSTALLATION_COST, DIRECT_COST, WASTE_AMOUNT, SUBTOTAL, MARGIN_AMOUNT, TOTAL,
+      EXCHANGE_RATE_USD_TO_MDL, TOTAL_MDL, EXTRA_ITEMS_AMOUNT, TOTAL_USD
+    ) VALUES (
+      :order_id, :currency, :profile_cost, :accessory_cost, :glass_cost, :assembly_cost,
+      :installation_cost, :direct_cost, :waste_amount, :subtotal, :margin_amount, :total,
+      :exchange_rate_usd_to_mdl, :total_mdl, :extra_items_amount, :total_usd
+    )
+    """
+_ORDER_ITEM_INSERT = """
+    INSERT INTO DECOR_ORDER_ITEMS (
+      ORDER_ID, LINE_NO, CODE, NAME, QTY, UNIT, UNIT_PRICE, AMOUNT,
+      CATEGORY, SOURCE_NAME, IMAGE_URL, LENGTH_M, TOTAL_LENGTH_M, WEIGHT_KG
+    ) VALUES (
+      :order_id, :line_no, :code, :name, :qty, :unit, :unit_price, :amount,
+      :category, :source_name, :image_url, :length_m, :total_length_m, :weight_kg
+    )
+    """
+_SLIDING_MATERIAL_INSERT = """
+    INSERT INTO DECOR_SLIDING_MATERIALS (
+      ID, CODE, NAME, NAME_RO, UNIT, CURRENCY, FAMILY, CATEGORY, UNIT_PRICE, WEIGHT_G_PER_M, ACTIVE
+    ) VALUES (
+      :id, :code, :name, :name_ro, :unit, :currency, :family, :category, :unit_price, :weight_g_per_m, :active
+    )
+    """
+_SLIDING_MATERIAL_UPDATE = """
+    UPDATE DECOR_SLIDING_MATERIALS SET
+      CODE = :code, NAME = :name, NAME_RO = :name_ro, UNIT = :unit, CURRENCY = :currency,
+      FAMILY = :family, CATEGORY = :category, UNIT_PRICE = :unit_price,
+      WEIGHT_G_PER_M = :weight_g_per_m, ACTIVE = :active, ROW_VERSION = ROW_VERSION + 1
+    WHERE ID = :id AND ROW_VERSION = :row_version
+    """
+_SLIDING_SETTINGS_COLUMNS = """
+      CURRENCY = :currency, ASSEMBLY_RATE = :assembly_rate, INSTALLATION_RATE = :installation_rate,
+      PAINTING_RATE_M2 = :painting_rate_m2, MARKUP_PERCENT = :markup_percent, WASTE_PERCENT = :waste_percent,
+      EXCHANGE_RATE_MDL_TO_USD = :exchange_rate_mdl_to_usd, ASSEMBLY_BASIS = :assembly_basis,
+      INSTALLATION_BASIS = :installation_basis
+    """
+_SLIDING_SETTINGS_INSERT = """
+    INSERT INTO DECOR_SLIDING_SETTINGS (
+      SETTINGS_ID, CURRENCY, ASSEMBLY_RATE, INSTALLATION_RATE, PAINTING_RATE_M2,
+      MARKUP_PERCENT, WASTE_PERCENT, EXCHANGE_RATE_MDL_TO_USD, ASSEMBLY_BASIS, INSTALLATION_BASIS
+    ) VALUES (
+      1, :currency, :assembly_rate, :installation_rate, :painting_rate_m2,
+      :markup_percent, :waste_percent, :exchange_rate_mdl_to_usd, :assembly_basis, :installation_basis
+    )
+    """
+
+
+def _material_params(material: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": int(material.get("id") or 0),
+        "code": str(material.get("code") or "").strip(),
+        "name": str(material.get("name") or "").strip(),
+        "name_original": str(material.get("name_original") or "").strip(),
+        "original_lang": str(material.get("original_lang") or "").strip(),
+        "name_ro": str(material.get("name_ro") or "").strip(),
+        "image_url": str(material.get("image_url") or "").strip(),
+        "category": str(material.get("category") or "").strip(),
+        "unit": str(material.get("unit") or "").strip(),
+        "unit_price": float(material.get("unit_price") or 0),
+        "currency": str(material.get("currency") or "").strip(),
+        "source_file": str(material.get("source_file") or "").strip(),
+        "source_sheet": str(material.get("source_sheet") or "").strip(),
+        "notes": str(material.get("notes") or "").strip(),
+        "active": _as_flag(material.get("active") or "Y"),
+        "created_at": str(material.get("created_at") or "").strip(),
+        "updated_at": str(material.get("updated_at") or "").strip(),
+    }
+
+
+def _settings_params(settings: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "currency": str(settings.get("currency") or "USD"),
+        "exchange_rate_usd_to_mdl": float(settings.get("exchange_rate_usd_to_mdl") or 0),
+        "markup_percent": float(settings.get("markup_percent") or 0),
+        "waste_percent": float(settings.get("waste_percent") or 0),
+        "profile_weight_kg_per_m2": float(settings.get("profile_weight_kg_per_m2") or 0),
+        "accessory_fixed_per_m2": float(settings.get("accessory_fixed_per_m2") or 0),
+        "drainage_fixed": float(settings.get("drainage_fixed") or 0),
+        "transport_fixed": float(settings.get("transport_fixed") or 0),
+        "install_rate_m2": float(settings.get("install_rate_m2") or 0),
+    }
+
+
+def _insert_settings_children(cursor: oracledb.Cursor, settings: dict[str, Any]) -> None:
+    glass = [{"system_type": str(k), "rate": float(v or 0)} for k, v in (settings.get("glass_rate_m2") or {}).items()]
+    if glass:
+        cursor.executemany("INSERT INTO DECOR_SETTING_GLASS_RATES (SETTINGS_ID, SYSTEM_TYPE, RATE) VALUES (1, :system_type, :rate)", glass)
+    led = [{"option_code": str(k), "rate": float(v or 0)} for k, v in (settings.get("led_options") or {}).items()]
+    if led:
+        cursor.executemany("INSERT INTO DECOR_SETTING_LED_OPTIONS (SETTINGS_ID, OPTION_CODE, RATE) VALUES (1, :option_code, :rate)", led)
+    values = [
+        {"list_type": list_type, "value_text": str(value), "sort_order": idx}
+        for list_type in ("project_types", "system_types", "colors")
+        for idx, value in enumerate(settings.get(list_type) or [], start=1)
+    ]
+    if values:
+        cursor.executemany("INSERT INTO DECOR_SETTING_LIST_VALUES (SETTINGS_ID, LIST_TYPE, VALUE_TEXT, SORT_ORDER) VALUES (1, :list_type, :value_text, :sort_order)", values)
+
+
+def _order_params(order: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": int(order.get("id") or 0),
+        "order_number": str(order.get("order_number") or ""),
+        "barcode": str(order.get("barcode") or ""),
+        "product_type": str(order.get("product_type") or ""),
+        "client_name": str(order.get("client_name") or ""),
+        "client_phone": str(order.get("client_phone") or ""),
+        "client_email": str(order.get("client_email") or ""),
+        "project_type": str(order.get("project_type") or ""),
+        "project_name": str(order.get("project_name") or ""),
+        "location": str(order.get("location") or ""),
+        "color": str(order.get("color") or ""),
+        "notes": str(order.get("notes") or ""),
+        "status_id": int(order.get("status_id") or 0),
+        "currency": str(order.get("currency") or ""),
+        "total_amount": float(order.get("total_amount") or 0),
+        "created_at": str(order.get("created_at") or ""),
+        "updated_at": str(order.get("updated_at") or ""),
+    }
+
+
+def _order_quote_params(order: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any], dict[str, Any], list[dict[str, Any]]]:
+    """Строки DECOR_ORDER_INPUTS / METRICS / SUMMARY / ITEMS одного заказа."""
+    order_id = int(order.get("id") or 0)
+    quote = order.get("quote") or {}
+    inputs = quote.get("inputs") or {}
+    metrics = quote.get("metrics") or {}
+    summary = quote.get("summary") or {}
+    inputs_row = {
+        "order_id": order_id,
+        "width_mm": float(inputs.get("width_mm") or 0),
+        "projection_mm": float(inputs.get("projection_mm") or 0),
+        "front_height_mm": float(inputs.get("front_height_mm") or 0),
+        "rear_height_mm": float(inputs.get("rear_height_mm") or 0),
+        "system_type": str(inputs.get("system_type") or ""),
+        "led_option": str(inputs.get("led_option") or ""),
+        "include_installation": _as_flag(inputs.get("include_installation")),
+        "include_transport": _as_flag(inputs.get("include_transport")),
+        "include_drainage": _as_flag(inputs.get("include_drainage")),
+        "extra_items_count": int(inputs.get("extra_items_count") or 0),
+        "variant_key": str(inputs.get("variant") or ""),
+        "variant_label": str(inputs.get("variant_label") or ""),
+        "family": str(inputs.get("family") or ""),
+        "height_mm": float(inputs.get("height_mm") or 0),
+        "orientation": str(inputs.get("orientation") or ""),
+        "include_threshold": _as_flag(inputs.get("include_threshold")),
+        "include_glass": _as_flag(inputs.get("include_glass")),
+        "glass_system": str(inputs.get("glass_system") or ""),
+        "glass_finish": str(inputs.get("glass_finish") or ""),
+        "glass_thickness": str(inputs.get("glass_thickness") or ""),
+        "include_assembly": _as_flag(inputs.get("include_assembly")),
+    }
+    metrics_row = {
+        "order_id": order_id,
+        "area_m2": float(metrics.get("area_m2") or 0),
+        "perimeter_m": float(metrics.get("perimeter_m") or 0),
+        "slope_mm": float(metrics.get("slope_mm") or 0),
+        "slope_percent": float(metrics.get("slope_percent") or 0),
+        "post_count": int(metrics.get("post_count") or 0),
+        "section_count": int(metrics.get("section_count") or 0),
+        "beam_count": int(metrics.get("beam_count") or 0),
+        "rafter_length_m": float(metrics.get("rafter_length_m") or 0),
+        "frame_length_m": float(metrics.get("frame_length_m") or 0),
+        "profile_weight_total_kg": float(metrics.get("profile_weight_total_kg") or 0),
+        "glass_panel_count": int(metrics.get("glass_panel_count") or 0),
+        "glass_panel_area_m2": float(metrics.get("glass_panel_area_m2") or 0),
+        "glass_panel_width_m": float(metrics.get("glass_panel_width_m") or 0),
+        "glass_panel_length_m": float(metrics.get("glass_panel_length_m") or 0),
+        "total_panels": int(metrics.get("total_panels") or 0),
+        "panel_width_mm": float(metrics.get("panel_width_mm") or 0),
+        "profile_weight_kg": float(metrics.get("profile_weight_kg") or 0),
+    }
+    summary_row = {
+        "order_id": order_id,
+        "currency": str(summary.get("currency") or order.get("currency") or ""),
+        "profile_cost": float(summary.get("profile_cost") or 0),
+        "accessory_cost": float(summary.get("accessory_cost") or 0),
+        "glass_cost": float(summary.get("glass_cost") or 0),
+        "assembly_cost": float(summary.get("assembly_cost") or 0),
+        "installation_cost": float(summary.get("installation_cost") or 0),
+        "direct_cost": float(summary.get("direct_cost") or 0),
+        "waste_amount": float(summary.get("waste_amount") or 0),
+        "subtotal": float(summary.get("subtotal") or 0),
+        "margin_amount": float(summary.get("margin_amount") or 0),
+        "total": float(summary.get("total") or order.get("total_amount") or 0),
+        "exchange_rate_usd_to_mdl": float(summary.get("exchange_rate_usd_to_mdl") or 0),
+        "total_mdl": float(summary.get("total_mdl") or 0),
+        "extra_items_amount": float(summary.get("extra_items_amount") or 0),
+        "total_usd": float(summary.get("total_usd") or 0),
+    }
+    items = [
+        {
+            "order_id": order_id,
+            "line_no": line_no,
+            "code": str(item.get("code") or ""),
+            "name": str(item.get("name") or ""),
+            "qty": float(item.get("qty") or 0),
+            "unit": str(item.get("unit") or ""),
+            "unit_price": float(item.get("unit_price") or 0),
+            "amount": float(item.get("amount") or 0),
+            "category": str(item.get("category") or ""),
+            "source_name": str(item.get("source") or ""),
+            "image_url": str(item.get("image_url") or ""),
+            "length_m": float(item.get("length_m") or 0),
+            "total_length_m": float(item.get("total_length_m") or 0),
+            "weight_kg": float(item.get("weight_kg") or 0),
+        }
+        for line_no, item in enumerate(order.get("items") or [], start=1)
+    ]
+    return inputs_row, metrics_row, summary_row, items
+
+
+def _insert_order_quotes(cursor: oracledb.Cursor, orders: list[dict[str, Any]]) -> None:
+    inputs_rows, metrics_rows, summary_rows, item_rows = [], [], [], []
+    for order in orders:
+        inputs_row, metrics_row, summary_row, items = _order_quote_params(order)
+        inputs_rows.append(inputs_row)
+        metrics_rows.append(metrics_row)
+        summary_rows.append(summary_row)
+        item_rows.extend(items)
+    for sql, rows in (
+        (_ORDER_INPUTS_INSERT, inputs_rows),
+        (_ORDER_METRICS_INSERT, metrics_rows),
+        (_ORDER_SUMMARY_INSERT, summary_rows),
+        (_ORDER_ITEM_INSERT, item_rows),
+    ):
+        if rows:
+            cursor.executemany(sql, rows)
+
+
+def _sliding_material_params(material: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": int(material.get("id") or 0),
+        "code": str(material.get("code") or ""),
+        "name": str(material.get("name") or ""),
+        "name_ro": str(material.get("name_ro") or ""),
+        "unit": str(material.get("unit") or ""),
+        "currency": str(material.get("currency") or ""),
+        "family": str(material.get("family") or ""),
+        "category": str(material.get("category") or ""),
+        "unit_price": float(material.get("unit_price") or 0),
+        "weight_g_per_m": float(material.get("weight_g_per_m") or 0),
+        "active": _as_flag(material.get("active") or "Y"),
+    }
+
+
+def _sliding_settings_params(sliding_settings: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "currency": str(sliding_settings.get("currency") or "MDL"),
+        "assembly_rate": float(sliding_settings.get("assembly_rate") or 0),
+        "installation_rate": float(sliding_settings.get("installation_rate") or 0),
+        "painting_rate_m2": float(sliding_settings.get("painting_rate_m2") or 0),
+        "markup_percent": float(sliding_settings.get("markup_percent") or 0),
+        "waste_percent": float(sliding_settings.get("waste_percent") or 0),
+        "exchange_rate_mdl_to_usd": float(sliding_settings.get("exchange_rate_mdl_to_usd") or 0),
+        "assembly_basis": str(sliding_settings.get("assembly_basis") or ""),
+        "installation_basis": str(sliding_settings.get("installation_basis") or ""),
+    }
+
+
+def _insert_sliding_settings_children(cursor: oracledb.Cursor, sliding_settings: dict[str, Any]) -> None:
+    rates = [
+        {"system_type": str(system_type), "finish_key": str(finish_key), "rate": float(rate or 0)}
+        for system_type, finish_map in (sliding_settings.get("glass_rate_matrix") or {}).items()
+        for finish_key, rate in (finish_map or {}).items()
+    ]
+    if rates:
+        cursor.executemany("INSERT INTO DECOR_SLIDING_GLASS_RATES (SETTINGS_ID, SYSTEM_TYPE, FINISH_KEY, RATE) VALUES (1, :system_type, :finish_key, :rate)", rates)
+    values = [
+        {"list_type": list_type, "value_text": str(value), "sort_order": idx}
+        for list_type in ("system_types", "glass_finishes", "glass_thicknesses", "colors")
+        for idx, value in enumerate(sliding_settings.get(list_type) or [], start=1)
+    ]
+    if values:
+        cursor.executemany("INSERT INTO DECOR_SLIDING_LIST_VALUES (SETTINGS_ID, LIST_TYPE, VALUE_TEXT, SORT_ORDER) VALUES (1, :list_type, :value_text, :sort_order)", values)
+
+
+def _state_counters(state: dict[str, Any]) -> dict[str, int]:
+    return {
+        "next_material_id": int(state.get("next_material_id") or 1000),
+        "next_order_id": int(state.get("next_order_id") or 1),
+        "next_quote_seq": int(state.get("next_quote_seq") or 1),
+        "next_sliding_material_id": int(state.get("next_sliding_material_id") or 1),
+    }
+
+
 def _replace_state(cursor: oracledb.Cursor, state: dict[str, Any]) -> None:
+    """
+    Полная перезапись всех таблиц DECOR_* из state. Нужна только для первичного
+    заполнения и импорта: версии строк начинаются заново с 1, поэтому
+    параллельно с построчной записью (save_changes) её не запускают.
+    """
     for table_name in (
         "DECOR_SLIDING_PANEL_OFFSETS",
         "DECOR_SLIDING_VARIANT_ACCESSORIES",
@@ -384,334 +792,42 @@ def _replace_state(cursor: oracledb.Cursor, state: dict[str, Any]) -> None:
     ):
         cursor.execute(f"DELETE FROM {table_name}")
 
-    for material in state.get("materials", []):
-        cursor.execute(
-            """
-            INSERT INTO DECOR_MATERIALS (
-              ID, CODE, NAME, NAME_ORIGINAL, ORIGINAL_LANG, NAME_RO, IMAGE_URL,
-              CATEGORY, UNIT, UNIT_PRICE, CURRENCY, SOURCE_FILE, SOURCE_SHEET,
-              NOTES, ACTIVE, CREATED_AT, UPDATED_AT
-            ) VALUES (
-              :id, :code, :name, :name_original, :original_lang, :name_ro, :image_url,
-              :category, :unit, :unit_price, :currency, :source_file, :source_sheet,
-              :notes, :active, :created_at, :updated_at
-            )
-            """,
-            {
-                "id": int(material.get("id") or 0),
-                "code": str(material.get("code") or "").strip(),
-                "name": str(material.get("name") or "").strip(),
-                "name_original": str(material.get("name_original") or "").strip(),
-                "original_lang": str(material.get("original_lang") or "").strip(),
-                "name_ro": str(material.get("name_ro") or "").strip(),
-                "image_url": str(material.get("image_url") or "").strip(),
-                "category": str(material.get("category") or "").strip(),
-                "unit": str(material.get("unit") or "").strip(),
-                "unit_price": float(material.get("unit_price") or 0),
-                "currency": str(material.get("currency") or "").strip(),
-                "source_file": str(material.get("source_file") or "").strip(),
-                "source_sheet": str(material.get("source_sheet") or "").strip(),
-                "notes": str(material.get("notes") or "").strip(),
-                "active": _as_flag(material.get("active") or "Y"),
-                "created_at": str(material.get("created_at") or "").strip(),
-                "updated_at": str(material.get("updated_at") or "").strip(),
-            },
-        )
+    materials = [_material_params(m) for m in state.get("materials", [])]
+    if materials:
+        cursor.executemany(_MATERIAL_INSERT, materials)
 
-    for status in state.get("statuses", []):
-        cursor.execute(
-            "INSERT INTO DECOR_STATUSES (ID, CODE, NAME) VALUES (:id, :code, :name)",
-            {
-                "id": int(status.get("id") or 0),
-                "code": str(status.get("code") or "").strip(),
-                "name": str(status.get("name") or "").strip(),
-            },
-        )
+    statuses = [
+        {
+            "id": int(status.get("id") or 0),
+            "code": str(status.get("code") or "").strip(),
+            "name": str(status.get("name") or "").strip(),
+        }
+        for status in state.get("statuses", [])
+    ]
+    if statuses:
+        cursor.executemany("INSERT INTO DECOR_STATUSES (ID, CODE, NAME) VALUES (:id, :code, :name)", statuses)
 
     settings = state.get("settings", {})
-    cursor.execute(
-        """
-        INSERT INTO DECOR_SETTINGS (
-          SETTINGS_ID, CURRENCY, EXCHANGE_RATE_USD_TO_MDL, MARKUP_PERCENT, WASTE_PERCENT,
-          PROFILE_WEIGHT_KG_PER_M2, ACCESSORY_FIXED_PER_M2, DRAINAGE_FIXED,
-          TRANSPORT_FIXED, INSTALL_RATE_M2
-        ) VALUES (
-          1, :currency, :exchange_rate_usd_to_mdl, :markup_percent, :waste_percent,
-          :profile_weight_kg_per_m2, :accessory_fixed_per_m2, :drainage_fixed,
-          :transport_fixed, :install_rate_m2
-        )
-        """,
-        {
-            "currency": str(settings.get("currency") or "USD"),
-            "exchange_rate_usd_to_mdl": float(settings.get("exchange_rate_usd_to_mdl") or 0),
-            "markup_percent": float(settings.get("markup_percent") or 0),
-            "waste_percent": float(settings.get("waste_percent") or 0),
-            "profile_weight_kg_per_m2": float(settings.get("profile_weight_kg_per_m2") or 0),
-            "accessory_fixed_per_m2": float(settings.get("accessory_fixed_per_m2") or 0),
-            "drainage_fixed": float(settings.get("drainage_fixed") or 0),
-            "transport_fixed": float(settings.get("transport_fixed") or 0),
-            "install_rate_m2": float(settings.get("install_rate_m2") or 0),
-        },
+    cursor.execute(_SETTINGS_INSERT, _settings_params(settings))
+    _insert_settings_children(cursor, settings)
+
+    cursor.executemany(
+        "INSERT INTO DECOR_COUNTERS (COUNTER_KEY, COUNTER_VALUE) VALUES (:counter_key, :counter_value)",
+        [{"counter_key": k, "counter_value": v} for k, v in _state_counters(state).items()],
     )
-    for system_type, rate in (settings.get("glass_rate_m2") or {}).items():
-        cursor.execute(
-            "INSERT INTO DECOR_SETTING_GLASS_RATES (SETTINGS_ID, SYSTEM_TYPE, RATE) VALUES (1, :system_type, :rate)",
-            {"system_type": str(system_type), "rate": float(rate or 0)},
-        )
-    for option_code, rate in (settings.get("led_options") or {}).items():
-        cursor.execute(
-            "INSERT INTO DECOR_SETTING_LED_OPTIONS (SETTINGS_ID, OPTION_CODE, RATE) VALUES (1, :option_code, :rate)",
-            {"option_code": str(option_code), "rate": float(rate or 0)},
-        )
-    for list_type in ("project_types", "system_types", "colors"):
-        for idx, value in enumerate(settings.get(list_type) or [], start=1):
-            cursor.execute(
-                "INSERT INTO DECOR_SETTING_LIST_VALUES (SETTINGS_ID, LIST_TYPE, VALUE_TEXT, SORT_ORDER) VALUES (1, :list_type, :value_text, :sort_order)",
-                {"list_type": list_type, "value_text": str(value), "sort_order": idx},
-            )
 
-    counters = {
-        "next_material_id": int(state.get("next_material_id") or 1000),
-        "next_order_id": int(state.get("next_order_id") or 1),
-        "next_quote_seq": int(state.get("next_quote_seq") or 1),
-        "next_sliding_material_id": int(state.get("next_sliding_material_id") or 1),
-    }
-    for counter_key, counter_value in counters.items():
-        cursor.execute(
-            "INSERT INTO DECOR_COUNTERS (COUNTER_KEY, COUNTER_VALUE) VALUES (:counter_key, :counter_value)",
-            {"counter_key": counter_key, "counter_value": counter_value},
-        )
+    orders = state.get("orders", [])
+    if orders:
+        cursor.executemany(_ORDER_INSERT, [_order_params(o) for o in orders])
+        _insert_order_quotes(cursor, orders)
 
-    for order in state.get("orders", []):
-        cursor.execute(
-            """
-            INSERT INTO DECOR_ORDERS (
-              ID, ORDER_NUMBER, BARCODE, PRODUCT_TYPE, CLIENT_NAME, CLIENT_PHONE, CLIENT_EMAIL,
-              PROJECT_TYPE, PROJECT_NAME, LOCATION, COLOR, NOTES, STATUS_ID,
-              CURRENCY, TOTAL_AMOUNT, CREATED_AT, UPDATED_AT
-            ) VALUES (
-              :id, :order_number, :barcode, :product_type, :client_name, :client_phone, :client_email,
-              :project_type, :project_name, :location, :color, :notes, :status_id,
-              :currency, :total_amount, :created_at, :updated_at
-            )
-            """,
-            {
-                "id": int(order.get("id") or 0),
-                "order_number": str(order.get("order_number") or ""),
-                "barcode": str(order.get("barcode") or ""),
-                "product_type": str(order.get("product_type") or ""),
-                "client_name": str(order.get("client_name") or ""),
-                "client_phone": str(order.get("client_phone") or ""),
-                "client_email": str(order.get("client_email") or ""),
-                "project_type": str(order.get("project_type") or ""),
-                "project_name": str(order.get("project_name") or ""),
-                "location": str(order.get("location") or ""),
-                "color": str(order.get("color") or ""),
-                "notes": str(order.get("notes") or ""),
-                "status_id": int(order.get("status_id") or 0),
-                "currency": str(order.get("currency") or ""),
-                "total_amount": float(order.get("total_amount") or 0),
-                "created_at": str(order.get("created_at") or ""),
-                "updated_at": str(order.get("updated_at") or ""),
-            },
-        )
-        quote = order.get("quote") or {}
-        inputs = quote.get("inputs") or {}
-        metrics = quote.get("metrics") or {}
-        summary = quote.get("summary") or {}
-        cursor.execute(
-            """
-            INSERT INTO DECOR_ORDER_INPUTS (
-              ORDER_ID, WIDTH_MM, PROJECTION_MM, FRONT_HEIGHT_MM, REAR_HEIGHT_MM, SYSTEM_TYPE,
-              LED_OPTION, INCLUDE_INSTALLATION, INCLUDE_TRANSPORT, INCLUDE_DRAINAGE, EXTRA_ITEMS_COUNT,
-              VARIANT_KEY, VARIANT_LABEL, FAMILY, HEIGHT_MM, ORIENTATION, INCLUDE_THRESHOLD,
-              INCLUDE_GLASS, GLASS_SYSTEM, GLASS_FINISH, GLASS_THICKNESS, INCLUDE_ASSEMBLY
-            ) VALUES (
-              :order_id, :width_mm, :projection_mm, :front_height_mm, :rear_height_mm, :system_type,
-              :led_option, :include_installation, :include_transport, :include_drainage, :extra_items_count,
-              :variant_key, :variant_label, :family, :height_mm, :orientation, :include_threshold,
-              :include_glass, :glass_system, :glass_finish, :glass_thickness, :include_assembly
-            )
-            """,
-            {
-                "order_id": int(order.get("id") or 0),
-                "width_mm": float(inputs.get("width_mm") or 0),
-                "projection_mm": float(inputs.get("projection_mm") or 0),
-                "front_height_mm": float(inputs.get("front_height_mm") or 0),
-                "rear_height_mm": float(inputs.get("rear_height_mm") or 0),
-                "system_type": str(inputs.get("system_type") or ""),
-                "led_option": str(inputs.get("led_option") or ""),
-                "include_installation": _as_flag(inputs.get("include_installation")),
-                "include_transport": _as_flag(inputs.get("include_transport")),
-                "include_drainage": _as_flag(inputs.get("include_drainage")),
-                "extra_items_count": int(inputs.get("extra_items_count") or 0),
-                "variant_key": str(inputs.get("variant") or ""),
-                "variant_label": str(inputs.get("variant_label") or ""),
-                "family": str(inputs.get("family") or ""),
-                "height_mm": float(inputs.get("height_mm") or 0),
-                "orientation": str(inputs.get("orientation") or ""),
-                "include_threshold": _as_flag(inputs.get("include_threshold")),
-                "include_glass": _as_flag(inputs.get("include_glass")),
-                "glass_system": str(inputs.get("glass_system") or ""),
-                "glass_finish": str(inputs.get("glass_finish") or ""),
-                "glass_thickness": str(inputs.get("glass_thickness") or ""),
-                "include_assembly": _as_flag(inputs.get("include_assembly")),
-            },
-        )
-        cursor.execute(
-            """
-            INSERT INTO DECOR_ORDER_METRICS (
-              ORDER_ID, AREA_M2, PERIMETER_M, SLOPE_MM, SLOPE_PERCENT, POST_COUNT, SECTION_COUNT,
-              BEAM_COUNT, RAFTER_LENGTH_M, FRAME_LENGTH_M, PROFILE_WEIGHT_TOTAL_KG,
-              GLASS_PANEL_COUNT, GLASS_PANEL_AREA_M2, GLASS_PANEL_WIDTH_M, GLASS_PANEL_LENGTH_M,
-              TOTAL_PANELS, PANEL_WIDTH_MM, PROFILE_WEIGHT_KG
-            ) VALUES (
-              :order_id, :area_m2, :perimeter_m, :slope_mm, :slope_percent, :post_count, :section_count,
-              :beam_count, :rafter_length_m, :frame_length_m, :profile_weight_total_kg,
-              :glass_panel_count, :glass_panel_area_m2, :glass_panel_width_m, :glass_panel_length_m,
-              :total_panels, :panel_width_mm, :profile_weight_kg
-            )
-            """,
-            {
-                "order_id": int(order.get("id") or 0),
-                "area_m2": float(metrics.get("area_m2") or 0),
-                "perimeter_m": float(metrics.get("perimeter_m") or 0),
-                "slope_mm": float(metrics.get("slope_mm") or 0),
-                "slope_percent": float(metrics.get("slope_percent") or 0),
-                "post_count": int(metrics.get("post_count") or 0),
-                "section_count": int(metrics.get("section_count") or 0),
-                "beam_count": int(metrics.get("beam_count") or 0),
-                "rafter_length_m": float(metrics.get("rafter_length_m") or 0),
-                "frame_length_m": float(metrics.get("frame_length_m") or 0),
-                "profile_weight_total_kg": float(metrics.get("profile_weight_total_kg") or 0),
-                "glass_panel_count": int(metrics.get("glass_panel_count") or 0),
-                "glass_panel_area_m2": float(metrics.get("glass_panel_area_m2") or 0),
-                "glass_panel_width_m": float(metrics.get("glass_panel_width_m") or 0),
-                "glass_panel_length_m": float(metrics.get("glass_panel_length_m") or 0),
-                "total_panels": int(metrics.get("total_panels") or 0),
-                "panel_width_mm": float(metrics.get("panel_width_mm") or 0),
-                "profile_weight_kg": float(metrics.get("profile_weight_kg") or 0),
-            },
-        )
-        cursor.execute(
-            """
-            INSERT INTO DECOR_ORDER_SUMMARY (
-              ORDER_ID, CURRENCY, PROFILE_COST, ACCESSORY_COST, GLASS_COST, ASSEMBLY_COST,
-              INSTALLATION_COST, DIRECT_COST, WASTE_AMOUNT, SUBTOTAL, MARGIN_AMOUNT, TOTAL,
-              EXCHANGE_RATE_USD_TO_MDL, TOTAL_MDL, EXTRA_ITEMS_AMOUNT, TOTAL_USD
-            ) VALUES (
-              :order_id, :currency, :profile_cost, :accessory_cost, :glass_cost, :assembly_cost,
-              :installation_cost, :direct_cost, :waste_amount, :subtotal, :margin_amount, :total,
-              :exchange_rate_usd_to_mdl, :total_mdl, :extra_items_amount, :total_usd
-            )
-            """,
-            {
-                "order_id": int(order.get("id") or 0),
-                "currency": str(summary.get("currency") or order.get("currency") or ""),
-                "profile_cost": float(summary.get("profile_cost") or 0),
-                "accessory_cost": float(summary.get("accessory_cost") or 0),
-                "glass_cost": float(summary.get("glass_cost") or 0),
-                "assembly_cost": float(summary.get("assembly_cost") or 0),
-                "installation_cost": float(summary.get("installation_cost") or 0),
-                "direct_cost": float(summary.get("direct_cost") or 0),
-                "waste_amount": float(summary.get("waste_amount") or 0),
-                "subtotal": float(summary.get("subtotal") or 0),
-                "margin_amount": float(summary.get("margin_amount") or 0),
-                "total": float(summary.get("total") or order.get("total_amount") or 0),
-                "exchange_rate_usd_to_mdl": float(summary.get("exchange_rate_usd_to_mdl") or 0),
-                "total_mdl": float(summary.get("total_mdl") or 0),
-                "extra_items_amount": float(summary.get("extra_items_amount") or 0),
-                "total_usd": float(summary.get("total_usd") or 0),
-            },
-        )
-        for line_no, item in enumerate(order.get("items") or [], start=1):
-            cursor.execute(
-                """
-                INSERT INTO DECOR_ORDER_ITEMS (
-                  ORDER_ID, LINE_NO, CODE, NAME, QTY, UNIT, UNIT_PRICE, AMOUNT,
-                  CATEGORY, SOURCE_NAME, IMAGE_URL, LENGTH_M, TOTAL_LENGTH_M, WEIGHT_KG
-                ) VALUES (
-                  :order_id, :line_no, :code, :name, :qty, :unit, :unit_price, :amount,
-                  :category, :source_name, :image_url, :length_m, :total_length_m, :weight_kg
-                )
-                """,
-                {
-                    "order_id": int(order.get("id") or 0),
-                    "line_no": line_no,
-                    "code": str(item.get("code") or ""),
-                    "name": str(item.get("name") or ""),
-                    "qty": float(item.get("qty") or 0),
-                    "unit": str(item.get("unit") or ""),
-                    "unit_price": float(item.get("unit_price") or 0),
-                    "amount": float(item.get("amount") or 0),
-                    "category": str(item.get("category") or ""),
-                    "source_name": str(item.get("source") or ""),
-                    "image_url": str(item.get("image_url") or ""),
-                    "length_m": float(item.get("length_m") or 0),
-                    "total_length_m": float(item.get("total_length_m") or 0),
-                    "weight_kg": float(item.get("weight_kg") or 0),
-                },
-            )
-
-    for material in state.get("sliding_materials", []):
-        cursor.execute(
-            """
-            INSERT INTO DECOR_SLIDING_MATERIALS (
-              ID, CODE, NAME, NAME_RO, UNIT, CURRENCY, FAMILY, CATEGORY, UNIT_PRICE, WEIGHT_G_PER_M, ACTIVE
-            ) VALUES (
-              :id, :code, :name, :name_ro, :unit, :currency, :family, :category, :unit_price, :weight_g_per_m, :active
-            )
-            """,
-            {
-                "id": int(material.get("id") or 0),
-                "code": str(material.get("code") or ""),
-                "name": str(material.get("name") or ""),
-                "name_ro": str(material.get("name_ro") or ""),
-                "unit": str(material.get("unit") or ""),
-                "currency": str(material.get("currency") or ""),
-                "family": str(material.get("family") or ""),
-                "category": str(material.get("category") or ""),
-                "unit_price": float(material.get("unit_price") or 0),
-                "weight_g_per_m": float(material.get("weight_g_per_m") or 0),
-                "active": _as_flag(material.get("active") or "Y"),
-            },
-        )
+    sliding_materials = [_sliding_material_params(m) for m in state.get("sliding_materials", [])]
+    if sliding_materials:
+        cursor.executemany(_SLIDING_MATERIAL_INSERT, sliding_materials)
 
     sliding_settings = state.get("sliding_settings", {})
-    cursor.execute(
-        """
-        INSERT INTO DECOR_SLIDING_SETTINGS (
-          SETTINGS_ID, CURRENCY, ASSEMBLY_RATE, INSTALLATION_RATE, PAINTING_RATE_M2,
-          MARKUP_PERCENT, WASTE_PERCENT, EXCHANGE_RATE_MDL_TO_USD, ASSEMBLY_BASIS, INSTALLATION_BASIS
-        ) VALUES (
-          1, :currency, :assembly_rate, :installation_rate, :painting_rate_m2,
-          :markup_percent, :waste_percent, :exchange_rate_mdl_to_usd, :assembly_basis, :installation_basis
-        )
-        """,
-        {
-            "currency": str(sliding_settings.get("currency") or "MDL"),
-            "assembly_rate": float(sliding_settings.get("assembly_rate") or 0),
-            "installation_rate": float(sliding_settings.get("installation_rate") or 0),
-            "painting_rate_m2": float(sliding_settings.get("painting_rate_m2") or 0),
-            "markup_percent": float(sliding_settings.get("markup_percent") or 0),
-            "waste_percent": float(sliding_settings.get("waste_percent") or 0),
-            "exchange_rate_mdl_to_usd": float(sliding_settings.get("exchange_rate_mdl_to_usd") or 0),
-            "assembly_basis": str(sliding_settings.get("assembly_basis") or ""),
-            "installation_basis": str(sliding_settings.get("installation_basis") or ""),
-        },
-    )
-    for system_type, finish_map in (sliding_settings.get("glass_rate_matrix") or {}).items():
-        for finish_key, rate in (finish_map or {}).items():
-            cursor.execute(
-                "INSERT INTO DECOR_SLIDING_GLASS_RATES (SETTINGS_ID, SYSTEM_TYPE, FINISH_KEY, RATE) VALUES (1, :system_type, :finish_key, :rate)",
-                {"system_type": str(system_type), "finish_key": str(finish_key), "rate": float(rate or 0)},
-            )
-    for list_type in ("system_types", "glass_finishes", "glass_thicknesses", "colors"):
-        for idx, value in enumerate(sliding_settings.get(list_type) or [], start=1):
-            cursor.execute(
-                "INSERT INTO DECOR_SLIDING_LIST_VALUES (SETTINGS_ID, LIST_TYPE, VALUE_TEXT, SORT_ORDER) VALUES (1, :list_type, :value_text, :sort_order)",
-                {"list_type": list_type, "value_text": str(value), "sort_order": idx},
-            )
+    cursor.execute(_SLIDING_SETTINGS_INSERT, _sliding_settings_params(sliding_settings))
+    _insert_sliding_settings_children(cursor, sliding_settings)
 
     for variant_key, variant in (state.get("sliding_variants") or {}).items():
         cursor.execute(
@@ -795,7 +911,118 @@ def _load_rows(cursor: oracledb.Cursor, sql: str, params: dict[str, Any] | None
     return cursor.fetchall() or []
 
 
-def load_state(default_factory: Callable[[], dict[str, Any]] | None = None, fallback_path: Path | None = None) -> dict[str, Any]:
+_ORDER_COLUMNS = (
+    "ID, ORDER_NUMBER, BARCODE, PRODUCT_TYPE, CLIENT_NAME, CLIENT_PHONE, CLIENT_EMAIL, PROJECT_TYPE, "
+    "PROJECT_NAME, LOCATION, COLOR, NOTES, STATUS_ID, CURRENCY, TOTAL_AMOUNT, CREATED_AT, UPDATED_AT, ROW_VERSION"
+)
+# Сколько id заказов уходит в один IN (...) при дочитывании расчётов
+_ORDER_ID_CHUNK = 500
+
+
+def _child_rows(cursor: oracledb.Cursor, order_ids: list[int] | None, sql: str, order_by: str = "") -> list[tuple[Any, ...]]:
+    """Строки дочерней таблицы заказов: все (order_ids is None) или только по списку id, пачками."""
+    if order_ids is None:
+        return _load_rows(cursor, sql + order_by)
+    rows: list[tuple[Any, ...]] = []
+    for start in range(0, len(order_ids), _ORDER_ID_CHUNK):
+        binds = {f"o{i}": order_id for i, order_id in enumerate(order_ids[start:start + _ORDER_ID_CHUNK])}
+        rows.extend(_load_rows(cursor, f"{sql} WHERE ORDER_ID IN ({', '.join(':' + k for k in binds)}){order_by}", binds))
+    return rows
+
+
+def _load_orders(
+    cursor: oracledb.Cursor,
+    status_by_id: dict[int, dict[str, Any]],
+    where: str = "",
+    params: dict[str, Any] | None = None,
+    limit: int | None = None,
+) -> tuple[list[dict[str, Any]], dict[int, int]]:
+    """
+    Заказы (новые первыми) с расчётом и строками и их ROW_VERSION. Без where
+    и limit — все заказы; иначе расчёты дочитываются только для отобранных.
+    """
+    params = dict(params or {})
+    sql = f"SELECT {_ORDER_COLUMNS} FROM DECOR_ORDERS" + (f" WHERE {where}" if where else "") + " ORDER BY ID DESC"
+    if limit:
+        sql += " FETCH FIRST :row_limit ROWS ONLY"
+        params["row_limit"] = int(limit)
+    headers = _load_rows(cursor, sql, params)
+    order_ids = [int(row[0] or 0) for row in headers] if (where or limit) else None
+    if order_ids == []:
+        return [], {}
+
+    inputs_by_order: dict[int, dict[str, Any]] = {}
+    for row in _child_rows(cursor, order_ids, "SELECT ORDER_ID, WIDTH_MM, PROJECTION_MM, FRONT_HEIGHT_MM, REAR_HEIGHT_MM, SYSTEM_TYPE, LED_OPTION, INCLUDE_INSTALLATION, INCLUDE_TRANSPORT, INCLUDE_DRAINAGE, EXTRA_ITEMS_COUNT, VARIANT_KEY, VARIANT_LABEL, FAMILY, HEIGHT_MM, ORIENTATION, INCLUDE_THRESHOLD, INCLUDE_GLASS, GLASS_SYSTEM, GLASS_FINISH, GLASS_THICKNESS, INCLUDE_ASSEMBLY FROM DECOR_ORDER_INPUTS"):
+        inputs_by_order[int(row[0] or 0)] = {
+            "width_mm": float(row[1] or 0), "projection_mm": float(row[2] or 0), "front_height_mm": float(row[3] or 0),
+            "rear_height_mm": float(row[4] or 0), "system_type": row[5] or "", "led_option": row[6] or "",
+            "include_installation": (row[7] or "N") == "Y", "include_transport": (row[8] or "N") == "Y",
+            "include_drainage": (row[9] or "N") == "Y", "extra_items_count": int(row[10] or 0),
+            "variant": row[11] or "", "variant_label": row[12] or "", "family": row[13] or "",
+            "height_mm": float(row[14] or 0), "orientation": row[15] or "", "include_threshold": (row[16] or "N") == "Y",
+            "include_glass": (row[17] or "N") == "Y", "glass_system": row[18] or "", "glass_finish": row[19] or "",
+            "glass_thickness": row[20] or "", "include_assembly": (row[21] or "N") == "Y",
+        }
+    metrics_by_order: dict[int, dict[str, Any]] = {}
+    for row in _child_rows(cursor, order_ids, "SELECT ORDER_ID, AREA_M2, PERIMETER_M, SLOPE_MM, SLOPE_PERCENT, POST_COUNT, SECTION_COUNT, BEAM_COUNT, RAFTER_LENGTH_M, FRAME_LENGTH_M, PROFILE_WEIGHT_TOTAL_KG, GLASS_PANEL_COUNT, GLASS_PANEL_AREA_M2, GLASS_PANEL_WIDTH_M, GLASS_PANEL_LENGTH_M, TOTAL_PANELS, PANEL_WIDTH_MM, PROFILE_WEIGHT_KG FROM DECOR_ORDER_METRICS"):
+        metrics_by_order[int(row[0] or 0)] = {
+            "area_m2": float(row[1] or 0), "perimeter_m": float(row[2] or 0), "slope_mm": float(row[3] or 0),
+            "slope_percent": float(row[4] or 0), "post_count": int(row[5] or 0), "section_count": int(row[6] or 0),
+            "beam_count": int(row[7] or 0), "rafter_length_m": float(row[8] or 0), "frame_length_m": float(row[9] or 0),
+            "profile_weight_total_kg": float(row[10] or 0), "glass_panel_count": int(row[11] or 0),
+            "glass_panel_area_m2": float(row[12] or 0), "glass_panel_width_m": float(row[13] or 0), "glass_panel_length_m": float(row[14] or 0),
+            "total_panels": int(row[15] or 0), "panel_width_mm": float(row[16] or 0), "profile_weight_kg": float(row[17] or 0),
+        }
+    summary_by_order: dict[int, dict[str, Any]] = {}
+    for row in _child_rows(cursor, order_ids, "SELECT ORDER_ID, CURRENCY, PROFILE_COST, ACCESSORY_COST, GLASS_COST, ASSEMBLY_COST, INSTALLATION_COST, DIRECT_COST, WASTE_AMOUNT, SUBTOTAL, MARGIN_AMOUNT, TOTAL, EXCHANGE_RATE_USD_TO_MDL, TOTAL_MDL, EXTRA_ITEMS_AMOUNT, TOTAL_USD FROM DECOR_ORDER_SUMMARY"):
+        summary_by_order[int(row[0] or 0)] = {
+            "currency": row[1] or "", "profile_cost": float(row[2] or 0), "accessory_cost": float(row[3] or 0),
+            "glass_cost": float(row[4] or 0), "assembly_cost": float(row[5] or 0), "installation_cost": float(row[6] or 0),
+            "direct_cost": float(row[7] or 0), "waste_amount": float(row[8] or 0), "subtotal": float(row[9] or 0),
+            "margin_amount": float(row[10] or 0), "total": float(row[11] or 0), "exchange_rate_usd_to_mdl": float(row[12] or 0),
+            "total_mdl": float(row[13] or 0), "extra_items_amount": float(row[14] or 0), "total_usd": float(row[15] or 0),
+        }
+    items_by_order: dict[int, list[dict[str, Any]]] = {}
+    for row in _child_rows(cursor, order_ids, "SELECT ORDER_ID, LINE_NO, CODE, NAME, QTY, UNIT, UNIT_PRICE, AMOUNT, CATEGORY, SOURCE_NAME, IMAGE_URL, LENGTH_M, TOTAL_LENGTH_M, WEIGHT_KG FROM DECOR_ORDER_ITEMS", " ORDER BY ORDER_ID, LINE_NO"):
+        items_by_order.setdefault(int(row[0] or 0), []).append({
+            "code": row[2] or "", "name": row[3] or "", "qty": float(row[4] or 0), "unit": row[5] or "",
+            "unit_price": float(row[6] or 0), "amount": float(row[7] or 0), "category": row[8] or "",
+            "source": row[9] or "", "image_url": row[10] or "", "length_m": float(row[11] or 0),
+            "total_length_m": float(row[12] or 0), "weight_kg": float(row[13] or 0),
+        })
+    orders = []
+    versions: dict[int, int] = {}
+    for row in headers:
+        order_id = int(row[0] or 0)
+        versions[order_id] = int(row[17] or 1)
+        status = status_by_id.get(int(row[12] or 0), {})
+        orders.append({
+            "id": order_id, "order_number": row[1] or "", "barcode": row[2] or "", "product_type": row[3] or "",
+            "client_name": row[4] or "", "client_phone": row[5] or "", "client_email": row[6] or "",
+            "project_type": row[7] or "", "project_name": row[8] or "", "location": row[9] or "", "color": row[10] or "",
+            "notes": row[11] or "", "status_id": int(row[12] or 0), "status_code": status.get("code"), "status_name": status.get("name"),
+            "currency": row[13] or "", "total_amount": float(row[14] or 0), "created_at": row[15] or "", "updated_at": row[16] or "",
+            "items": items_by_order.get(order_id, []),
+            "quote": {
+                "product_type": row[3] or "",
+                "inputs": inputs_by_order.get(order_id, {}),
+                "metrics": metrics_by_order.get(order_id, {}),
+                "lines": items_by_order.get(order_id, []),
+                "summary": summary_by_order.get(order_id, {}),
+            },
+        })
+    return orders, versions
+
+
+def load_state(
+    default_factory: Callable[[], dict[str, Any]] | None = None,
+    fallback_path: Path | None = None,
+    include_orders: bool = True,
+) -> dict[str, Any]:
+    """
+    State DECOR из таблиц. include_orders=False — без заказов (справочники,
+    настройки, счётчики): заказы тогда читаются точечно через query_orders.
+    """
     ensure_schema()
     connection = DatabaseConnection.get_connection()
     try:
@@ -805,8 +1032,10 @@ def load_state(default_factory: Callable[[], dict[str, Any]] | None = None, fall
                 _replace_state(cursor, state)
                 connection.commit()
 
+            versions: dict[str, Any] = {"materials": {}, "orders": {}, "sliding_materials": {}}
             materials = []
-            for row in _load_rows(cursor, "SELECT ID, CODE, NAME, NAME_ORIGINAL, ORIGINAL_LANG, NAME_RO, IMAGE_URL, CATEGORY, UNIT, UNIT_PRICE, CURRENCY, SOURCE_FILE, SOURCE_SHEET, NOTES, ACTIVE, CREATED_AT, UPDATED_AT FROM DECOR_MATERIALS ORDER BY ID"):
+            for row in _load_rows(cursor, "SELECT ID, CODE, NAME, NAME_ORIGINAL, ORIGINAL_LANG, NAME_RO, IMAGE_URL, CATEGORY, UNIT, UNIT_PRICE, CURRENCY, SOURCE_FILE, SOURCE_SHEET, NOTES, ACTIVE, CREATED_AT, UPDATED_AT, ROW_VERSION FROM DECOR_MATERIALS ORDER BY ID"):
+                versions["materials"][int(row[0] or 0)] = int(row[17] or 1)
                 materials.append({
                     "id": int(row[0] or 0), "code": row[1] or "", "name": row[2] or "", "name_original": row[3] or "",
                     "original_lang": row[4] or "", "name_ro": row[5] or "", "image_url": row[6] or "",
@@ -820,9 +1049,10 @@ def load_state(default_factory: Callable[[], dict[str, Any]] | None = None, fall
                 statuses.append({"id": int(row[0] or 0), "code": row[1] or "", "name": row[2] or ""})
             status_by_id = {s["id"]: s for s in statuses}
 
-            settings_rows = _load_rows(cursor, "SELECT CURRENCY, EXCHANGE_RATE_USD_TO_MDL, MARKUP_PERCENT, WASTE_PERCENT, PROFILE_WEIGHT_KG_PER_M2, ACCESSORY_FIXED_PER_M2, DRAINAGE_FIXED, TRANSPORT_FIXED, INSTALL_RATE_M2 FROM DECOR_SETTINGS WHERE SETTINGS_ID = 1")
+            settings_rows = _load_rows(cursor, "SELECT CURRENCY, EXCHANGE_RATE_USD_TO_MDL, MARKUP_PERCENT, WASTE_PERCENT, PROFILE_WEIGHT_KG_PER_M2, ACCESSORY_FIXED_PER_M2, DRAINAGE_FIXED, TRANSPORT_FIXED, INSTALL_RATE_M2, ROW_VERSION FROM DECOR_SETTINGS WHERE SETTINGS_ID = 1")
             if settings_rows:
                 row = settings_rows[0]
+                versions["settings"] = int(row[9] or 1)
                 settings = {
                     "currency": row[0] or "USD",
                     "exchange_rate_usd_to_mdl": float(row[1] or 0),
@@ -843,76 +1073,26 @@ def load_state(default_factory: Callable[[], dict[str, Any]] | None = None, fall
                 settings[list_type] = [row[1] for row in list_rows if row[0] == list_type]
 
             counters = {str(row[0]): int(row[1] or 0) for row in _load_rows(cursor, "SELECT COUNTER_KEY, COUNTER_VALUE FROM DECOR_COUNTERS")}
+            versions["stamp"] = counters.pop(_STAMP_KEY, 0)
+            versions["counters"] = dict(counters)
 
-            inputs_by_order: dict[int, dict[str, Any]] = {}
-            for row in _load_rows(cursor, "SELECT ORDER_ID, WIDTH_MM, PROJECTION_MM, FRONT_HEIGHT_MM, REAR_HEIGHT_MM, SYSTEM_TYPE, LED_OPTION, INCLUDE_INSTALLATION, INCLUDE_TRANSPORT, INCLUDE_DRAINAGE, EXTRA_ITEMS_COUNT, VARIANT_KEY, VARIANT_LABEL, FAMILY, HEIGHT_MM, ORIENTATION, INCLUDE_THRESHOLD, INCLUDE_GLASS, GLASS_SYSTEM, GLASS_FINISH, GLASS_THICKNESS, INCLUDE_ASSEMBLY FROM DECOR_ORDER_INPUTS"):
-                inputs_by_order[int(row[0] or 0)] = {
-                    "width_mm": float(row[1] or 0), "projection_mm": float(row[2] or 0), "front_height_mm": float(row[3] or 0),
-                    "rear_height_mm": float(row[4] or 0), "system_type": row[5] or "", "led_option": row[6] or "",
-                    "include_installation": (row[7] or "N") == "Y", "include_transport": (row[8] or "N") == "Y",
-                    "include_drainage": (row[9] or "N") == "Y", "extra_items_count": int(row[10] or 0),
-                    "variant": row[11] or "", "variant_label": row[12] or "", "family": row[13] or "",
-                    "height_mm": float(row[14] or 0), "orientation": row[15] or "", "include_threshold": (row[16] or "N") == "Y",
-                    "include_glass": (row[17] or "N") == "Y", "glass_system": row[18] or "", "glass_finish": row[19] or "",
-                    "glass_thickness": row[20] or "", "include_assembly": (row[21] or "N") == "Y",
-                }
-            metrics_by_order: dict[int, dict[str, Any]] = {}
-            for row in _load_rows(cursor, "SELECT ORDER_ID, AREA_M2, PERIMETER_M, SLOPE_MM, SLOPE_PERCENT, POST_COUNT, SECTION_COUNT, BEAM_COUNT, RAFTER_LENGTH_M, FRAME_LENGTH_M, PROFILE_WEIGHT_TOTAL_KG, GLASS_PANEL_COUNT, GLASS_PANEL_AREA_M2, GLASS_PANEL_WIDTH_M, GLASS_PANEL_LENGTH_M, TOTAL_PANELS, PANEL_WIDTH_MM, PROFILE_WEIGHT_KG FROM DECOR_ORDER_METRICS"):
-                metrics_by_order[int(row[0] or 0)] = {
-                    "area_m2": float(row[1] or 0), "perimeter_m": float(row[2] or 0), "slope_mm": float(row[3] or 0),
-                    "slope_percent": float(row[4] or 0), "post_count": int(row[5] or 0), "section_count": int(row[6] or 0),
-                    "beam_count": int(row[7] or 0), "rafter_length_m": float(row[8] or 0), "frame_length_m": float(row[9] or 0),
-                    "profile_weight_total_kg": float(row[10] or 0), "glass_panel_count": int(row[11] or 0),
-                    "glass_panel_area_m2": float(row[12] or 0), "glass_panel_width_m": float(row[13] or 0), "glass_panel_length_m": float(row[14] or 0),
-                    "total_panels": int(row[15] or 0), "panel_width_mm": float(row[16] or 0), "profile_weight_kg": float(row[17] or 0),
-                }
-            summary_by_order: dict[int, dict[str, Any]] = {}
-            for row in _load_rows(cursor, "SELECT ORDER_ID, CURRENCY, PROFILE_COST, ACCESSORY_COST, GLASS_COST, ASSEMBLY_COST, INSTALLATION_COST, DIRECT_COST, WASTE_AMOUNT, SUBTOTAL, MARGIN_AMOUNT, TOTAL, EXCHANGE_RATE_USD_TO_MDL, TOTAL_MDL, EXTRA_ITEMS_AMOUNT, TOTAL_USD FROM DECOR_ORDER_SUMMARY"):
-                summary_by_order[int(row[0] or 0)] = {
-                    "currency": row[1] or "", "profile_cost": float(row[2] or 0), "accessory_cost": float(row[3] or 0),
-                    "glass_cost": float(row[4] or 0), "assembly_cost": float(row[5] or 0), "installation_cost": float(row[6] or 0),
-                    "direct_cost": float(row[7] or 0), "waste_amount": float(row[8] or 0), "subtotal": float(row[9] or 0),
-                    "margin_amount": float(row[10] or 0), "total": float(row[11] or 0), "exchange_rate_usd_to_mdl": float(row[12] or 0),
-                    "total_mdl": float(row[13] or 0), "extra_items_amount": float(row[14] or 0), "total_usd": float(row[15] or 0),
-                }
-            items_by_order: dict[int, list[dict[str, Any]]] = {}
-            for row in _load_rows(cursor, "SELECT ORDER_ID, LINE_NO, CODE, NAME, QTY, UNIT, UNIT_PRICE, AMOUNT, CATEGORY, SOURCE_NAME, IMAGE_URL, LENGTH_M, TOTAL_LENGTH_M, WEIGHT_KG FROM DECOR_ORDER_ITEMS ORDER BY ORDER_ID, LINE_NO"):
-                items_by_order.setdefault(int(row[0] or 0), []).append({
-                    "code": row[2] or "", "name": row[3] or "", "qty": float(row[4] or 0), "unit": row[5] or "",
-                    "unit_price": float(row[6] or 0), "amount": float(row[7] or 0), "category": row[8] or "",
-                    "source": row[9] or "", "image_url": row[10] or "", "length_m": float(row[11] or 0),
-                    "total_length_m": float(row[12] or 0), "weight_kg": float(row[13] or 0),
-                })
-            orders = []
-            for row in _load_rows(cursor, "SELECT ID, ORDER_NUMBER, BARCODE, PRODUCT_TYPE, CLIENT_NAME, CLIENT_PHONE, CLIENT_EMAIL, PROJECT_TYPE, PROJECT_NAME, LOCATION, COLOR, NOTES, STATUS_ID, CURRENCY, TOTAL_AMOUNT, CREATED_AT, UPDATED_AT FROM DECOR_ORDERS ORDER BY ID DESC"):
-                order_id = int(row[0] or 0)
-                status = status_by_id.get(int(row[12] or 0), {})
-                orders.append({
-                    "id": order_id, "order_number": row[1] or "", "barcode": row[2] or "", "product_type": row[3] or "",
-                    "client_name": row[4] or "", "client_phone": row[5] or "", "client_email": row[6] or "",
-                    "project_type": row[7] or "", "project_name": row[8] or "", "location": row[9] or "", "color": row[10] or "",
-                    "notes": row[11] or "", "status_id": int(row[12] or 0), "status_code": status.get("code"), "status_name": status.get("name"),
-                    "currency": row[13] or "", "total_amount": float(row[14] or 0), "created_at": row[15] or "", "updated_at": row[16] or "",
-                    "items": items_by_order.get(order_id, []),
-                    "quote": {
-                        "product_type": row[3] or "",
-                        "inputs": inputs_by_order.get(order_id, {}),
-                        "metrics": metrics_by_order.get(order_id, {}),
-                        "lines": items_by_order.get(order_id, []),
-                        "summary": summary_by_order.get(order_id, {}),
-                    },
-                })
+            if include_orders:
+                orders, versions["orders"] = _load_orders(cursor, status_by_id)
+            else:
+                orders = []
 
             sliding_materials = []
-            for row in _load_rows(cursor, "SELECT ID, CODE, NAME, NAME_RO, UNIT, CURRENCY, FAMILY, CATEGORY, UNIT_PRICE, WEIGHT_G_PER_M, ACTIVE FROM DECOR_SLIDING_MATERIALS ORDER BY ID"):
+            for row in _load_rows(cursor, "SELECT ID, CODE, NAME, NAME_RO, UNIT, CURRENCY, FAMILY, CATEGORY, UNIT_PRICE, WEIGHT_G_PER_M, ACTIVE, ROW_VERSION FROM DECOR_SLIDING_MATERIALS ORDER BY ID"):
+                versions["sliding_materials"][int(row[0] or 0)] = int(row[11] or 1)
                 sliding_materials.append({
                     "id": int(row[0] or 0), "code": row[1] or "", "name": row[2] or "", "name_ro": row[3] or "", "unit": row[4] or "",
                     "currency": row[5] or "", "family": row[6] or "", "category": row[7] or "", "unit_price": float(row[8] or 0),
                     "weight_g_per_m": float(row[9] or 0), "active": row[10] or "Y",
                 })
-            sliding_settings_rows = _load_rows(cursor, "SELECT CURRENCY, ASSEMBLY_RATE, INSTALLATION_RATE, PAINTING_RATE_M2, MARKUP_PERCENT, WASTE_PERCENT, EXCHANGE_RATE_MDL_TO_USD, ASSEMBLY_BASIS, INSTALLATION_BASIS FROM DECOR_SLIDING_SETTINGS WHERE SETTINGS_ID = 1")
+            sliding_settings_rows = _load_rows(cursor, "SELECT CURRENCY, ASSEMBLY_RATE, INSTALLATION_RATE, PAINTING_RATE_M2, MARKUP_PERCENT, WASTE_PERCENT, EXCHANGE_RATE_MDL_TO_USD, ASSEMBLY_BASIS, INSTALLATION_BASIS, ROW_VERSION FROM DECOR_SLIDING_SETTINGS WHERE SETTINGS_ID = 1")
             if sliding_settings_rows:
                 row = sliding_settings_rows[0]
+                versions["sliding_settings"] = int(row[9] or 1)
                 sliding_settings = {
                     "currency": row[0] or "MDL", "assembly_rate": float(row[1] or 0), "installation_rate": float(row[2] or 0),
                     "painting_rate_m2": float(row[3] or 0), "markup_percent": float(row[4] or 0), "waste_percent": float(row[5] or 0),
@@ -978,12 +1158,14 @@ def load_state(default_factory: Callable[[], dict[str, Any]] | None = None, fall
                 "sliding_settings": sliding_settings,
                 "sliding_variants": variants,
                 "next_sliding_material_id": counters.get("next_sliding_material_id", 1),
+                "_versions": versions,
             }
     finally:
         connection.close()
 
 
 def save_state(state: dict[str, Any]) -> None:
+    """Полная перезапись (импорт, восстановление); обычные операции идут через save_changes."""
     ensure_schema()
     connection = DatabaseConnection.get_connection()
     try:
@@ -992,3 +1174,325 @@ def save_state(state: dict[str, Any]) -> None:
         connection.commit()
     finally:
         connection.close()
+    state["_versions"] = {
+        "materials": {int(m.get("id") or 0): 1 for m in state.get("materials", [])},
+        "orders": {int(o.get("id") or 0): 1 for o in state.get("orders", [])},
+        "sliding_materials": {int(m.get("id") or 0): 1 for m in state.get("sliding_materials", [])},
+        "settings": 1,
+        "sliding_settings": 1,
+        "counters": _state_counters(state),
+        "stamp": 0,
+    }
+
+
+class DecorConflictError(Exception):
+    """Строку успели изменить или удалить после того, как её прочитал load_state."""
+
+
+class DecorChanges:
+    """
+    Строки state, которые изменила одна операция DecorLocalStore: save_changes
+    пишет только их. orders — id заказа → переписывать ли вместе с шапкой
+    расчёт (inputs / metrics / summary / items); counters — ключи DECOR_COUNTERS.
+    """
+
+    def __init__(self) -> None:
+        self.orders: dict[int, bool] = {}
+        self.materials: set[int] = set()
+        self.deleted_materials: set[int] = set()
+        self.sliding_materials: set[int] = set()
+        self.settings = False
+        self.sliding_settings = False
+        self.counters: set[str] = set()
+
+    def order(self, order_id: int, with_quote: bool = False) -> None:
+        order_id = int(order_id)
+        self.orders[order_id] = self.orders.get(order_id, False) or with_quote
+
+    def reference(self) -> bool:
+        """Затронута ли справочная часть state (всё, кроме заказов)."""
+        return bool(
+            self.materials or self.deleted_materials or self.sliding_materials
+            or self.settings or self.sliding_settings or self.counters
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.orders) or self.reference()
+
+
+def _versioned_update(cursor: oracledb.Cursor, sql: str, params: dict[str, Any], version: int, what: str) -> None:
+    cursor.execute(sql, {**params, "row_version": version})
+    if cursor.rowcount != 1:
+        raise DecorConflictError(f"{what} изменён другим пользователем")
+
+
+def _write_changes(cursor: oracledb.Cursor, state: dict[str, Any], changes: DecorChanges, versions: dict[str, Any]) -> list[tuple[str, Any, Any]]:
+    """Пишет изменённые строки; возвращает новые версии (раздел, ключ, версия / None — удалена)."""
+    pending: list[tuple[str, Any, Any]] = []
+
+    # Счётчики первыми: два одновременных create_order прочитали одно и то же
+    # next_order_id, второй упрётся здесь, до вставки заказа
+    counter_versions = versions.get("counters") or {}
+    counters = _state_counters(state)
+    for key in sorted(changes.counters):
+        new_value, old_value = counters[key], counter_versions.get(key)
+        if old_value is None:
+            cursor.execute(
+                "INSERT INTO DECOR_COUNTERS (COUNTER_KEY, COUNTER_VALUE) VALUES (:counter_key, :counter_value)",
+                {"counter_key": key, "counter_value": new_value},
+            )
+        elif new_value != old_value:
+            cursor.execute(
+                "UPDATE DECOR_COUNTERS SET COUNTER_VALUE = :new_value WHERE COUNTER_KEY = :counter_key AND COUNTER_VALUE = :old_value",
+                {"new_value": new_value, "counter_key": key, "old_value": old_value},
+            )
+            if cursor.rowcount != 1:
+                raise DecorConflictError(f"Счётчик {key} изменён другим пользователем")
+        pending.append(("counters", key, new_value))
+
+    material_versions = versions.get("materials") or {}
+    materials_by_id = {int(m.get("id") or 0): m for m in state.get("materials", [])}
+    for material_id in sorted(changes.materials):
+        material = materials_by_id.get(material_id)
+        if material is None:
+            continue
+        version = material_versions.get(material_id)
+        if version is None:
+            cursor.execute(_MATERIAL_INSERT, _material_params(material))
+            pending.append(("materials", material_id, 1))
+        else:
+            _versioned_update(cursor, _MATERIAL_UPDATE, _material_params(material), version, f"Материал {material_id}")
+            pending.append(("materials", material_id, version + 1))
+    for material_id in sorted(changes.deleted_materials):
+        version = material_versions.get(material_id)
+        if version is None:
+            continue
+        cursor.execute(
+            "DELETE FROM DECOR_MATERIALS WHERE ID = :id AND ROW_VERSION = :row_version",
+            {"id": material_id, "row_version": version},
+        )
+        if cursor.rowcount != 1:
+            raise DecorConflictError(f"Материал {material_id} изменён другим пользователем")
+        pending.append(("materials", material_id, None))
+
+    if changes.settings:
+        settings = state.get("settings", {})
+        version = versions.get("settings")
+        if version is None:
+            cursor.execute(_SETTINGS_INSERT, _settings_params(settings))
+        else:
+            _versioned_update(
+                cursor,
+                f"UPDATE DECOR_SETTINGS SET {_SETTINGS_COLUMNS}, ROW_VERSION = ROW_VERSION + 1 WHERE SETTINGS_ID = 1 AND ROW_VERSION = :row_version",
+                _settings_params(settings), version, "Настройки",
+            )
+        for table_name in ("DECOR_SETTING_GLASS_RATES", "DECOR_SETTING_LED_OPTIONS", "DECOR_SETTING_LIST_VALUES"):
+            cursor.execute(f"DELETE FROM {table_name} WHERE SETTINGS_ID = 1")
+        _insert_settings_children(cursor, settings)
+        pending.append(("settings", None, (version or 0) + 1))
+
+    order_versions = versions.get("orders") or {}
+    orders_by_id = {int(o.get("id") or 0): o for o in state.get("orders", [])} if changes.orders else {}
+    quote_orders = []
+    for order_id in sorted(changes.orders):
+        order = orders_by_id.get(order_id)
+        if order is None:
+            continue
+        version = order_versions.get(order_id)
+        if version is None:
+            cursor.execute(_ORDER_INSERT, _order_params(order))
+            quote_orders.append(order)
+            pending.append(("orders", order_id, 1))
+            continue
+        _versioned_update(cursor, _ORDER_UPDATE, _order_params(order), version, f"Заказ {order.get('order_number') or order_id}")
+        pending.append(("orders", order_id, version + 1))
+        if changes.orders[order_id]:
+            for table_name in ("DECOR_ORDER_ITEMS", "DECOR_ORDER_SUMMARY", "DECOR_ORDER_METRICS", "DECOR_ORDER_INPUTS"):
+                cursor.execute(f"DELETE FROM {table_name} WHERE ORDER_ID = :order_id", {"order_id": order_id})
+            quote_orders.append(order)
+    _insert_order_quotes(cursor, quote_orders)
+
+    sliding_versions = versions.get("sliding_materials") or {}
+    sliding_by_id = {int(m.get("id") or 0): m for m in state.get("sliding_materials", [])}
+    for material_id in sorted(changes.sliding_materials):
+        material = sliding_by_id.get(material_id)
+        if material is None:
+            continue
+        version = sliding_versions.get(material_id)
+        if version is None:
+            cursor.execute(_SLIDING_MATERIAL_INSERT, _sliding_material_params(material))
+            pending.append(("sliding_materials", material_id, 1))
+        else:
+            _versioned_update(cursor, _SLIDING_MATERIAL_UPDATE, _sliding_material_params(material), version, f"Материал {material_id}")
+            pending.append(("sliding_materials", material_id, version + 1))
+
+    if changes.sliding_settings:
+        sliding_settings = state.get("sliding_settings", {})
+        version = versions.get("sliding_settings")
+        if version is None:
+            cursor.execute(_SLIDING_SETTINGS_INSERT, _sliding_settings_params(sliding_settings))
+        else:
+            _versioned_update(
+                cursor,
+                f"UPDATE DECOR_SLIDING_SETTINGS SET {_SLIDING_SETTINGS_COLUMNS}, ROW_VERSION = ROW_VERSION + 1 WHERE SETTINGS_ID = 1 AND ROW_VERSION = :row_version",
+                _sliding_settings_params(sliding_settings), version, "Настройки раздвижных систем",
+            )
+        for table_name in ("DECOR_SLIDING_GLASS_RATES", "DECOR_SLIDING_LIST_VALUES"):
+            cursor.execute(f"DELETE FROM {table_name} WHERE SETTINGS_ID = 1")
+        _insert_sliding_settings_children(cursor, sliding_settings)
+        pending.append(("sliding_settings", None, (version or 0) + 1))
+
+    # Штамп последним: строка держится под замком только до фиксации
+    if changes.reference():
+        cursor.execute(f"UPDATE DECOR_COUNTERS SET COUNTER_VALUE = COUNTER_VALUE + 1 WHERE COUNTER_KEY = '{_STAMP_KEY}'")
+        if cursor.rowcount == 0:
+            cursor.execute(f"INSERT INTO DECOR_COUNTERS (COUNTER_KEY, COUNTER_VALUE) VALUES ('{_STAMP_KEY}', 1)")
+        stamp = _load_rows(cursor, f"SELECT COUNTER_VALUE FROM DECOR_COUNTERS WHERE COUNTER_KEY = '{_STAMP_KEY}'")
+        pending.append(("stamp", None, int(stamp[0][0] or 0)))
+
+    return pending
+
+
+def save_changes(state: dict[str, Any], changes: DecorChanges) -> None:
+    """
+    Записывает одной транзакцией только строки из changes, а не весь state.
+    UPDATE / DELETE идут с проверкой ROW_VERSION (счётчики — с проверкой
+    прежнего значения), прочитанной load_state: если другой процесс успел
+    изменить строку, транзакция откатывается и поднимается DecorConflictError.
+    После фиксации версии в state["_versions"] сдвигаются, так что тот же
+    state можно менять и сохранять дальше.
+    """
+    if not changes:
+        return
+    ensure_schema()
+    versions = state.setdefault("_versions", {})
+    connection = DatabaseConnection.get_connection()
+    try:
+        try:
+            with connection.cursor() as cursor:
+                pending = _write_changes(cursor, state, changes, versions)
+            connection.commit()
+        except oracledb.IntegrityError as exc:
+            connection.rollback()
+            # ORA-00001: строку с тем же ключом (id, номер заказа) уже вставил другой процесс
+            if _db_error_code(exc) == 1:
+                raise DecorConflictError("Запись уже создана другим пользователем") from exc
+            raise
+        except Exception:
+            connection.rollback()
+            raise
+    finally:
+        connection.close()
+
+    for section, key, version in pending:
+        if key is None:
+            versions[section] = version
+        elif version is None:
+            versions.setdefault(section, {}).pop(key, None)
+        else:
+            versions.setdefault(section, {})[key] = version
+
+
+_ORDER_SEARCH = (
+    "(INSTR(LOWER(ORDER_NUMBER), :q) > 0 OR INSTR(LOWER(BARCODE), :q) > 0"
+    " OR INSTR(LOWER(CLIENT_NAME), :q) > 0 OR INSTR(LOWER(CLIENT_PHONE), :q) > 0"
+    " OR INSTR(LOWER(PROJECT_NAME), :q) > 0)"
+)
+
+
+def _order_filter(
+    status_id: int | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    search: str | None = None,
+) -> tuple[list[str], dict[str, Any]]:
+    where: list[str] = []
+    params: dict[str, Any] = {}
+    if status_id:
+        where.append("STATUS_ID = :status_id")
+        params["status_id"] = int(status_id)
+    if date_from:
+        where.append("SUBSTR(CREATED_AT, 1, 10) >= :date_from")
+        params["date_from"] = str(date_from)
+    if date_to:
+        where.append("SUBSTR(CREATED_AT, 1, 10) <= :date_to")
+        params["date_to"] = str(date_to)
+    q = (search or "").strip().lower()
+    if q:
+        where.append(_ORDER_SEARCH)
+        params["q"] = q
+    return where, params
+
+
+def query_orders(
+    status_id: int | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    search: str | None = None,
+    order_id: int | None = None,
+    number: str | None = None,
+    limit: int = 200,
+) -> tuple[list[dict[str, Any]], dict[int, int]]:
+    """
+    Заказы (новые первыми) и их ROW_VERSION одним запросом по фильтрам:
+    статус, день создания, подстрока в номере / штрихкоде / клиенте /
+    телефоне / проекте, id или точный номер / штрихкод без учёта регистра.
+    Фильтр, сортировка и лимит — в Oracle (индексы sql/122), расчёты и
+    строки дочитываются только для возвращаемых заказов.
+    """
+    where, params = _order_filter(status_id, date_from, date_to, search)
+    if order_id is not None:
+        where.append("ID = :order_id")
+        params["order_id"] = int(order_id)
+    if number is not None:
+        where.append("(LOWER(ORDER_NUMBER) = :num OR LOWER(BARCODE) = :num)")
+        params["num"] = str(number).strip().lower()
+    ensure_schema()
+    connection = DatabaseConnection.get_connection()
+    try:
+        with connection.cursor() as cursor:
+            status_by_id = {
+                int(row[0] or 0): {"id": int(row[0] or 0), "code": row[1] or "", "name": row[2] or ""}
+                for row in _load_rows(cursor, "SELECT ID, CODE, NAME FROM DECOR_STATUSES")
+            }
+            return _load_orders(cursor, status_by_id, " AND ".join(where), params, max(1, int(limit or 1)))
+    finally:
+        connection.close()
+
+
+def report_orders_by_day(date_from: str | None = None, date_to: str | None = None) -> list[dict[str, Any]]:
+    """
+    Заказы по дням создания: число, сумма и валюта последнего заказа дня —
+    агрегатом в Oracle, без выборки самих заказов. Дни — от новых к старым.
+    """
+    where, params = _order_filter(date_from=date_from, date_to=date_to)
+    ensure_schema()
+    connection = DatabaseConnection.get_connection()
+    try:
+        with connection.cursor() as cursor:
+            rows = _load_rows(
+                cursor,
+                "SELECT NVL(SUBSTR(CREATED_AT, 1, 10), 'unknown') AS DAY, COUNT(*), NVL(SUM(TOTAL_AMOUNT), 0),"
+                " NVL(MAX(CURRENCY) KEEP (DENSE_RANK LAST ORDER BY ID), 'USD')"
+                " FROM DECOR_ORDERS" + (" WHERE " + " AND ".join(where) if where else "")
+                + " GROUP BY NVL(SUBSTR(CREATED_AT, 1, 10), 'unknown') ORDER BY 1 DESC",
+                params,
+            )
+    finally:
+        connection.close()
+    return [
+        {"date": row[0], "orders_count": int(row[1] or 0), "total_amount": round(float(row[2] or 0), 2), "currency": row[3] or "USD"}
+        for row in rows
+    ]
+
+
+def state_stamp() -> int:
+    """Штамп справочной части state (всё, кроме заказов): растёт с каждой её записью."""
+    ensure_schema()
+    connection = DatabaseConnection.get_connection()
+    try:
+        with connection.cursor() as cursor:
+            rows = _load_rows(cursor, f"SELECT COUNTER_VALUE FROM DECOR_COUNTERS WHERE COUNTER_KEY = '{_STAMP_KEY}'")
+            return int(rows[0][0] or 0) if rows else 0
+    finally:
+        connection.close()
@@ -0,0 +1,325 @@
+"""
+Nufarul: фото заказов — потоковая запись и чтение BLOB, миниатюры, кеш на диске.
+
+Раньше save_photo декодировал base64 целиком в память и связывал как один
+BLOB, а get_photo / get_order_photos(include_data=True) читали BLOB целиком
+и отдавали base64 в JSON. Теперь:
+
+  * загрузка (multipart, «сырое» тело image/* или base64 из JSON) идёт
+    кусками во временный файл (SpooledTemporaryFile), по дороге считаются
+    SHA-256 и размер;
+  * из временного файла делается миниатюра JPEG (THUMB_SIDE по длинной
+    стороне) — её и показывают списки;
+  * в Oracle: INSERT ... EMPTY_BLOB() RETURNING ID, PHOTO_BLOB, затем
+    запись в LOB кусками по CHUNK_BYTES — ID приходит из самой вставки;
+  * выдача — кусками из LOB (iter_lob) или файлом из кеша;
+  * PhotoCache — кеш на диске по содержимому (<sha256>, <sha256>.thumb):
+    горячие фото отдаются без Oracle; фото по ID не меняются, так что
+    кеш по SHA-256 не устаревает, а только вытесняется по размеру. Кеш
+    работает только в собственном каталоге 0700 (по умолчанию он в общем
+    /tmp), а фото из него отдаётся, только если его SHA-256 совпал с ключом.
+
+Миниатюры — Pillow (ставится вместе с reportlab / weasyprint). Нет Pillow
+или файл не картинка — фото сохраняется без миниатюры.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import os
+import re
+import stat
+import tempfile
+import threading
+from typing import IO, Iterable, Iterator, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover
+    Image = None
+    ImageOps = None
+
+CHUNK_BYTES = 256 * 1024                  # кусок записи / чтения LOB и файла
+SPOOL_MEM_BYTES = 1024 * 1024             # до 1 МБ загрузка держится в памяти
+MAX_PHOTO_BYTES = 25 * 1024 * 1024        # фото с телефона — 2–8 МБ
+THUMB_SIDE = 320
+THUMB_QUALITY = 80
+
+CACHE_DIR = os.environ.get("NUF_PHOTO_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "nufarul_photo_cache")
+CACHE_MAX_BYTES = int(os.environ.get("NUF_PHOTO_CACHE_MB") or 512) * 1024 * 1024
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}(\.thumb)?$")
+_SPACE_RE = re.compile(r"\s+")
+
+
+# ---------- Загрузка ----------
+
+def read_chunks(stream, size: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Куски из файлового объекта (request.stream, FileStorage.stream, файл)."""
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def b64_chunks(text: str, size: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Декодирует base64 (можно data:-URL) кусками, без второй полной копии в памяти."""
+    if text.startswith("data:") and "," in text:
+        text = text.split(",", 1)[1]
+    if _SPACE_RE.search(text):
+        text = _SPACE_RE.sub("", text)  # иначе куски по 4 символа съедут
+    step = max(4, size // 3 * 4)
+    for i in range(0, len(text), step):
+        yield base64.b64decode(text[i:i + step])
+
+
+def spool(chunks: Iterable[bytes], max_bytes: int = MAX_PHOTO_BYTES) -> Tuple[IO[bytes], int, str]:
+    """
+    Пишет куски во временный файл. Возвращает (файл в начале, размер, sha256).
+    Больше max_bytes — ValueError.
+    """
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEM_BYTES)
+    h = hashlib.sha256()
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"Photo too large (max {max_bytes // (1024 * 1024)} MB)")
+            h.update(chunk)
+            f.write(chunk)
+    except Exception:
+        f.close()
+        raise
+    f.seek(0)
+    return f, size, h.hexdigest()
+
+
+def make_thumbnail(f: IO[bytes], side: int = THUMB_SIDE) -> Optional[bytes]:
+    """Миниатюра JPEG из файла фото (позиция в файле сохраняется). None — не картинка / нет Pillow."""
+    if Image is None:
+        return None
+    pos = f.tell()
+    try:
+        with Image.open(f) as im:
+            im.draft("RGB", (side, side))  # JPEG декодируется сразу в уменьшенном масштабе
+            thumb = ImageOps.exif_transpose(im)
+            thumb.thumbnail((side, side))
+            if thumb.mode not in ("RGB", "L"):
+                thumb = thumb.convert("RGB")
+            out = io.BytesIO()
+            thumb.save(out, "JPEG", quality=THUMB_QUALITY, optimize=True)
+            return out.getvalue()
+    except Exception:
+        return None
+    finally:
+        f.seek(pos)
+
+
+# ---------- LOB ----------
+
+def write_lob(lob, f: IO[bytes]) -> int:
+    """Пишет файл в LOB кусками, кратными размеру чанка LOB. Возвращает число байт."""
+    lob_chunk = max(1, lob.getchunksize())
+    step = max(1, CHUNK_BYTES // lob_chunk) * lob_chunk
+    offset = 1
+    while True:
+        chunk = f.read(step)
+        if not chunk:
+            return offset - 1
+        lob.write(chunk, offset)
+        offset += len(chunk)
+
+
+def iter_lob(lob, size: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """Читает LOB кусками (или режет bytes, если LOB пришёл значением — fetch_lobs=False)."""
+    if lob is None:
+        return
+    if isinstance(lob, (bytes, bytearray)):
+        for i in range(0, len(lob), size):
+            yield bytes(lob[i:i + size])
+        return
+    offset = 1
+    while True:
+        chunk = lob.read(offset, size)
+        if not chunk:
+            return
+        yield chunk
+        offset += len(chunk)
+
+
+def lob_locators(cursor, metadata):
+    """outputtypehandler: BLOB всегда как локатор, даже при oracledb.defaults.fetch_lobs = False."""
+    import oracledb
+
+    if metadata.type_code is oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_BLOB, arraysize=cursor.arraysize)
+    return None
+
+
+# ---------- Кеш на диске ----------
+
+def _private_dir(path: str) -> bool:
+    """
+    Создаёт каталог (0700) и проверяет, что держать в нём файлы безопасно:
+    настоящий каталог (не ссылка), наш uid, без прав группы и остальных.
+    Каталог в общем /tmp, созданный раньше другим пользователем, иначе
+    позволил бы подложить нам файлы.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid()
+            and stat.S_IMODE(st.st_mode) & 0o077 == 0)
+
+
+class PhotoCache:
+    """
+    Кеш фото на диске по содержимому: <root>/<sha[:2]>/<sha>[.thumb].
+    Запись — через временный файл и os.replace, так что читатели видят файл
+    целиком или не видят вовсе. Чтение обновляет mtime; при превышении
+    max_bytes вытесняются самые давние — до 90% лимита.
+
+    Каталог root должен пройти _private_dir, иначе ok=False и кеш выключен:
+    path() ничего не находит, запись пропускается. Фото отдаётся из кеша,
+    только если SHA-256 файла равен ключу (это PHOTO_SHA256), миниатюра —
+    если файл JPEG; иначе файл удаляется и фото читается из Oracle.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None
+        self.ok = _private_dir(root)
+
+    def _path(self, key: str) -> str:
+        if not _KEY_RE.match(key or ""):
+            raise ValueError(f"bad cache key: {key!r}")
+        return os.path.join(self.root, key[:2], key)
+
+    def path(self, key: Optional[str]) -> Optional[str]:
+        """Путь к проверенному файлу в кеше или None."""
+        if not key or not self.ok:
+            return None
+        p = self._path(key)
+        try:
+            with open(p, "rb") as f:
+                if key.endswith(".thumb"):
+                    valid = f.read(3) == b"\xff\xd8\xff"
+                else:
+                    h = hashlib.sha256()
+                    for chunk in read_chunks(f):
+                        h.update(chunk)
+                    valid = h.hexdigest() == key
+            if not valid:
+                os.remove(p)
+                return None
+            os.utime(p)
+        except OSError:
+            return None
+        return p
+
+    def put_file(self, key: str, f: IO[bytes]) -> None:
+        """Копирует файловый объект в кеш (с начала; позиция возвращается в начало)."""
+        f.seek(0)
+        w = self.writer(key)
+        try:
+            for chunk in read_chunks(f):
+                w.write(chunk)
+            w.commit()
+        finally:
+            w.abort()
+            f.seek(0)
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        self.put_file(key, io.BytesIO(data))
+
+    def writer(self, key: str) -> "_CacheWriter":
+        """Пишущий объект: write(...), затем commit(); abort() — выбросить недописанное."""
+        return _CacheWriter(self, self._path(key) if self.ok else None)
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_total()
+            else:
+                self._bytes += size
+            if self._bytes <= self.max_bytes:
+                return
+            self._bytes = self._evict()
+
+    def _files(self):
+        for dirpath, _dirs, names in os.walk(self.root):
+            for name in names:
+                if _KEY_RE.match(name):
+                    p = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, p
+
+    def _scan_total(self) -> int:
+        return sum(size for _m, size, _p in self._files())
+
+    def _evict(self) -> int:
+        files = sorted(self._files())
+        total = sum(size for _m, size, _p in files)
+        target = self.max_bytes * 9 // 10
+        for _mtime, size, p in files:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        return total
+
+
+class _CacheWriter:
+    def __init__(self, cache: PhotoCache, path: Optional[str]):
+        self._cache = cache
+        self._path = path
+        self._tmp = None
+        self._size = 0
+
+    def write(self, chunk: bytes) -> None:
+        if self._path is None:  # кеш выключен
+            return
+        if self._tmp is None:
+            d = os.path.dirname(self._path)
+            os.makedirs(d, mode=0o700, exist_ok=True)
+            fd, name = tempfile.mkstemp(dir=d, prefix=".part-")
+            self._tmp = (os.fdopen(fd, "wb"), name)
+        self._tmp[0].write(chunk)
+        self._size += len(chunk)
+
+    def commit(self) -> None:
+        if self._tmp is None:
+            return
+        fh, name = self._tmp
+        self._tmp = None
+        fh.close()
+        os.replace(name, self._path)
+        self._cache._added(self._size)
+
+    def abort(self) -> None:
+        if self._tmp is None:
+            return
+        fh, name = self._tmp
+        self._tmp = None
+        fh.close()
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+
+
+photo_cache = PhotoCache()
@@ -41,14 +41,14 @@ import math
 import os
 import sys
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
-from models.database import DatabaseModel
-from models import peco_forecast, peco_plan, peco_sourcing
+from models.database import DatabaseConnection, DatabaseModel
+from models import peco_forecast, peco_packing, peco_plan, peco_sourcing, run_queue
 
 # Параметры по умолчанию. Вынесены в один словарь: их придётся крутить
 # под конкретную сеть, и искать их нужно в одном месте.
@@ -65,6 +65,14 @@ DEFAULTS = {
     'recent_weight': 0.35,    # вес свежей недели против месяца в оценке спроса
 }
 
+# Процессов пула на прогноз резервуаров в прогоне автозаказа
+FORECAST_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class AutoOrderCancelled(Exception):
+    pass
+
+
 # Квантили нормального распределения: те же, что в товарном прогнозе
 _Z = [(50, 0.0), (80, 0.842), (90, 1.282), (95, 1.645), (97, 1.881),
       (98, 2.054), (99, 2.326), (99.5, 2.576), (99.9, 3.090)]
@@ -261,12 +269,8 @@ class FuelAutoOrder:
         return [dict(zip(cols, r)) for r in (res.get('data') or [])]
 
     @staticmethod
-    def run(params: Optional[Dict[str, Any]] = None,
-            username: str = 'system') -> Dict[str, Any]:
-        """
-        Синхронный прогон: 184 резервуара считаются за секунды, фоновый
-        поток здесь только усложнил бы отладку и статус-поллинг.
-        """
+    def _prepare(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Параметры прогона: числа поверх DEFAULTS, алгоритм и стоимость денег отдельно."""
         p = dict(DEFAULTS)
         params = dict(params or {})
         algorithm = params.pop('algorithm', None) or None
@@ -275,161 +279,289 @@ class FuelAutoOrder:
                     'error': f'Неизвестный алгоритм прогноза: {algorithm}'}
         money_rate = float(params.pop('money_rate', peco_plan.DEFAULT_MONEY_RATE) or 0)
         p.update({k: v for k, v in params.items() if v is not None})
-        started = datetime.now()
-        plan_cost = None
+        return {'success': True, 'p': p, 'algorithm': algorithm, 'money_rate': money_rate}
+
+    @staticmethod
+    def _open_run(cur, p: Dict[str, Any], username: str, status: str) -> int:
+        """
+        Строка PECO_ORDER_RUNS: 'running' — синхронный прогон, 'queued' —
+        прогон в очереди; в 'running' его переводит первый _stage воркера.
+        """
+        cur.execute("SELECT ID FROM PECO_DEPOTS WHERE ACTIVE = 1 ORDER BY ID")
+        depot = cur.fetchone()
+        out = cur.var(int)
+        cur.execute(
+            "INSERT INTO PECO_ORDER_RUNS (DEPOT_ID, STATUS, STAGE, PARAMS_JSON, USERNAME) "
+            "VALUES (:p_d, :p_s, :p_st, :p_p, :p_u) RETURNING ID INTO :p_id",
+            {'p_d': depot[0] if depot else None, 'p_s': status,
+             'p_st': 'queued' if status == 'queued' else 'start',
+             'p_p': json.dumps(p, ensure_ascii=False)[:2000], 'p_u': username, 'p_id': out})
+        return int(out.getvalue()[0])
+
+    @staticmethod
+    def run(params: Optional[Dict[str, Any]] = None,
+            username: str = 'system') -> Dict[str, Any]:
+        """
+        Синхронный прогон — для скриптов и небольших сетей. Из веб-интерфейса
+        прогон ставится в очередь (launch): при нескольких сотнях резервуаров
+        с прогнозом бустингом запрос не доживает до ответа.
+        """
+        prep = FuelAutoOrder._prepare(params)
+        if not prep['success']:
+            return prep
         try:
             with DatabaseModel() as db:
-                depot = FuelAutoOrder._rows(db.execute_query(
-                    "SELECT ID, NAME FROM PECO_DEPOTS WHERE ACTIVE = 1 ORDER BY ID"))
-                depot_id = depot[0]['id'] if depot else None
-
-                db.execute_query(
-                    "INSERT INTO PECO_ORDER_RUNS (DEPOT_ID, STATUS, STAGE, PARAMS_JSON, USERNAME) "
-                    "VALUES (:p_d, 'running', 'start', :p_p, :p_u)",
-                    {'p_d': depot_id, 'p_p': json.dumps(p, ensure_ascii=False)[:2000],
-                     'p_u': username})
-                db.connection.commit()
-                run_id = FuelAutoOrder._rows(db.execute_query(
-                    "SELECT MAX(ID) AS ID FROM PECO_ORDER_RUNS"))[0]['id']
-
-                # Секции всего парка: множество доступных объёмов налива
-                comps = [float(r['volume_l']) for r in FuelAutoOrder._rows(db.execute_query(
-                    "SELECT DISTINCT VOLUME_L FROM PECO_TRUCK_COMPARTMENTS "
-                    "WHERE ACTIVE = 1 ORDER BY VOLUME_L"))]
-                if not comps:
-                    comps = [5000.0, 6000.0, 8000.0]
-
-                # Разброс суточного отпуска нужен для страхового запаса
-                sigma_by_tank = {int(r['tank_id']): float(r['sigma_l'] or 0)
-                                 for r in FuelAutoOrder._rows(db.execute_query(
-                                     "SELECT TANK_ID, ROUND(STDDEV(LITERS), 3) AS SIGMA_L "
-                                     "FROM PECO_TANK_DAILY "
-                                     "WHERE SALE_DATE > (SELECT MAX(SALE_DATE) - 28 FROM PECO_TANK_DAILY) "
-                                     "GROUP BY TANK_ID"))}
-
-                tanks = FuelAutoOrder._rows(db.execute_query(
-                    "SELECT TANK_ID, STATION_ID, STATION_CODE, STATION_NAME, TANK_CODE, "
-                    "GRADE_CODE, CAPACITY_L, CURRENT_L, MIN_ALARM_L, AVG_L_28, AVG_L_7 "
-                    "FROM V_PECO_TANK_SUPPLY ORDER BY STATION_ID, GRADE_CODE"))
-
-                # История отпуска под выбранный алгоритм прогноза.
-                # Поднимается ОДНИМ запросом на всю сеть: 184 бака по
-                # запросу каждый — это 184 round-trip до Oracle в Ирландии,
-                # то есть минуты вместо секунд.
-                horizon = max(3, int(math.ceil(float(p['lead_days']) +
-                                               float(p['review_days']))) + 1)
-                hist = {}
-                if algorithm:
-                    peco_plan.load_min_history(db)
-                    hist = peco_plan.load_tank_history(db, peco_plan.HISTORY_DAYS)
-
-                by_station: Dict[int, List[Dict[str, Any]]] = {}
-                dry_risk = 0
-                fc_used = 0
-                for t in tanks:
-                    t['sigma_l'] = sigma_by_tank.get(int(t['tank_id']))
-                    if algorithm:
-                        h = hist.get(int(t['tank_id']))
-                        # У conformal своя параметризация: покрытие долей
-                        # единицы и окно защиты в сутках — это плечо плюс
-                        # период между завозами, а не горизонт прогноза
-                        fparams = {'coverage': float(p['service_level']) / 100.0,
-                                   'protect_days': float(p['lead_days']) + float(p['review_days'])}
-                        f = peco_plan.forecast_tank(h, algorithm, horizon, fparams) if h else None
-                        if f:
-                            f['algorithm'] = algorithm
-                            t['forecast'] = f
-                            fc_used += 1
-                    res = calc_tank_order(t, p, comps)
-                    if res['liters'] <= 0:
-                        if res['is_dry_risk']:
-                            dry_risk += 1
-                        continue
-                    dry_risk += res['is_dry_risk']
-                    by_station.setdefault(int(t['station_id']), []).append((t, res))
-
-                orders, liters_total = 0, 0.0
-                need_by = date.today() + timedelta(days=int(math.ceil(p['lead_days'])))
-                for station_id, items in by_station.items():
-                    station_liters = sum(r['liters'] for _t, r in items)
-                    db.execute_query(
-                        "INSERT INTO PECO_FUEL_ORDERS (RUN_ID, STATION_ID, SOURCE_CODE, "
-                        "DEPOT_ID, STATUS, NEED_BY, LITERS_TOTAL, CREATED_BY) "
-                        "VALUES (:p_r, :p_s, 'depot', :p_d, 'draft', :p_n, :p_l, :p_u)",
-                        {'p_r': run_id, 'p_s': station_id, 'p_d': depot_id,
-                         'p_n': need_by, 'p_l': round(station_liters, 3), 'p_u': username})
-                    order_id = FuelAutoOrder._rows(db.execute_query(
-                        "SELECT MAX(ID) AS ID FROM PECO_FUEL_ORDERS WHERE RUN_ID = :p_r "
-                        "AND STATION_ID = :p_s", {'p_r': run_id, 'p_s': station_id}))[0]['id']
-                    for t, r in items:
-                        db.execute_query(
-                            "INSERT INTO PECO_FUEL_ORDER_ITEMS (ORDER_ID, STATION_ID, TANK_ID, "
-                            "GRADE_CODE, LITERS_MODEL, LITERS_ORDER, CURRENT_L, ULLAGE_L, "
-                            "DAILY_RATE_L, DAYS_TO_DRY, COVER_AFTER_D, IS_DRY_RISK, "
-                            "ALGORITHM, FORECAST_DAILY_L, SAFETY_L) "
-                            "VALUES (:p_o, :p_s, :p_t, :p_g, :p_lm, :p_lo, :p_cur, :p_ul, "
-                            ":p_dr, :p_dd, :p_ca, :p_risk, :p_alg, :p_fd, :p_sf)",
-                            {'p_o': order_id, 'p_s': station_id, 'p_t': int(t['tank_id']),
-                             'p_g': t['grade_code'], 'p_lm': r['liters'], 'p_lo': r['liters'],
-                             'p_cur': t['current_l'], 'p_ul': r['ullage_l'],
-                             'p_dr': r['daily_rate_l'], 'p_dd': r['days_to_dry'],
-                             'p_ca': r['cover_after_d'], 'p_risk': r['is_dry_risk'],
-                             'p_alg': r.get('algorithm'),
-                             'p_fd': r.get('daily_rate_l') if r.get('algorithm') else None,
-                             'p_sf': r.get('safety_l')})
-                    orders += 1
-                    liters_total += station_liters
-
+                run_id = FuelAutoOrder._open_run(db.connection.cursor(), prep['p'],
+                                                 username, 'running')
                 db.connection.commit()
-
-                # Выбор пути снабжения: чем именно закрывать каждую строку.
-                # Считается ПОСЛЕ записи строк, потому что оптимизатору
-                # нужны итоговые литры (после подбора секций), а не
-                # «сколько хотелось».
-                plan_cost = None
                 try:
-                    dem = peco_plan.station_demands(db, run_id)
-                    src = peco_plan.load_paths(db, 'distribution')
-                    dist = peco_sourcing.solve_distribution(dem, src, money_rate)
-                    if dist.get('success'):
-                        for a in dist['allocations']:
-                            key = a['key']
-                            a['item_id'] = int(key.split(':')[1]) if key.startswith('item:') else None
-                        peco_plan.apply_plan_to_items(db, dist['allocations'])
-                        plan_cost = dist.get('total_cost')
-                        uncovered = len(dist.get('uncovered') or [])
-                except Exception as pe:                          # noqa: BLE001
-                    # Заказ важнее его себестоимости: если путей ещё нет
-                    # или справочник цен пуст, заказ остаётся валидным,
-                    # просто без выбранного пути
-                    uncovered = 0
-                    plan_note = str(pe)[:200]
-
-                db.execute_query(
-                    "UPDATE PECO_ORDER_RUNS SET ALGORITHM = :p_alg, MONEY_RATE = :p_mr, "
-                    "PLAN_COST = :p_pc WHERE ID = :p_id",
-                    {'p_alg': algorithm, 'p_mr': money_rate, 'p_pc': plan_cost,
-                     'p_id': run_id})
-
-                db.execute_query(
-                    "UPDATE PECO_ORDER_RUNS SET STATUS = 'done', STAGE = 'finished', "
-                    "PROGRESS_PCT = 100, STATION_COUNT = :p_st, ORDER_COUNT = :p_o, "
-                    "LITERS_TOTAL = :p_l, DRY_RISK_CNT = :p_dry, FINISHED_AT = SYSTIMESTAMP, "
-                    "DURATION_SEC = :p_dur, MESSAGE = :p_m WHERE ID = :p_id",
-                    {'p_st': len(by_station), 'p_o': orders, 'p_l': round(liters_total, 3),
-                     'p_dry': dry_risk, 'p_dur': int((datetime.now() - started).total_seconds()),
-                     'p_m': f'Заказов: {orders}, литров: {round(liters_total)}, '
-                            f'риск сухого бака: {dry_risk}',
-                     'p_id': run_id})
-                db.connection.commit()
-            return {'success': True, 'run_id': run_id, 'orders': orders,
-                    'liters': round(liters_total, 1), 'dry_risk': dry_risk,
-                    'stations': len(by_station), 'algorithm': algorithm,
-                    'forecasted_tanks': fc_used, 'plan_cost': plan_cost,
-                    'money_rate': money_rate}
+                    return FuelAutoOrder._execute(db, run_id, prep, username)
+                except Exception as e:                           # noqa: BLE001
+                    db.connection.rollback()
+                    FuelAutoOrder._close_run(db, run_id, 'failed', str(e))
+                    raise
         except Exception as e:                                   # noqa: BLE001
             return {'success': False, 'error': str(e)}
 
+    @staticmethod
+    def launch(params: Optional[Dict[str, Any]], username: str) -> Dict[str, Any]:
+        """
+        Прогон в очереди (models/run_queue.py, движок 'fuel_autoorder'):
+        запрос пишет PECO_ORDER_RUNS со STATUS = 'queued' и сразу отдаёт
+        run_id; этап и процент идут в ту же строку и подписчикам Socket.IO.
+        """
+        prep = FuelAutoOrder._prepare(params)
+        if not prep['success']:
+            return prep
+        conn = DatabaseConnection.get_connection()
+        try:
+            cur = conn.cursor()
+            run_id = FuelAutoOrder._open_run(cur, prep['p'], username, 'queued')
+            run_queue.enqueue(cur, 'fuel_autoorder', run_id,
+                              {'params': params or {}, 'username': username}, username)
+            conn.commit()
+        finally:
+            conn.close()
+        return {'success': True, 'run_id': run_id, 'queued': True}
+
+    @staticmethod
+    def _stage(db, run_id: int, stage: str, pct: int) -> None:
+        """Этап и процент; первый этап переводит прогон из очереди в 'running'."""
+        db.execute_query(
+            "UPDATE PECO_ORDER_RUNS SET STAGE = :p_st, PROGRESS_PCT = :p_pct, "
+            "STATUS = CASE STATUS WHEN 'queued' THEN 'running' ELSE STATUS END WHERE ID = :p_id",
+            {'p_st': stage[:60], 'p_pct': max(0, min(100, int(pct))), 'p_id': run_id})
+        db.connection.commit()
+
+    @staticmethod
+    def _close_run(db, run_id: int, status: str, message: str) -> None:
+        db.execute_query(
+            "UPDATE PECO_ORDER_RUNS SET STATUS = :p_st, MESSAGE = :p_m, "
+            "FINISHED_AT = SYSTIMESTAMP WHERE ID = :p_id AND STATUS IN ('queued', 'running')",
+            {'p_st': status, 'p_m': message[:2000], 'p_id': run_id})
+        db.connection.commit()
+
+    @staticmethod
+    def _forecasts(hist: Dict[int, Dict[str, Any]], tanks: List[Dict[str, Any]],
+                   algorithm: str, horizon: int, fparams: Dict[str, Any], workers: int,
+                   progress: Callable[[int, int], None]) -> Dict[int, Dict[str, Any]]:
+        """
+        Прогноз по всем резервуарам пачками в пуле процессов
+        (peco_plan.pool_map). Алгоритмы — чистые функции над рядом,
+        поэтому результат тот же, что и по одному резервуару подряд.
+        """
+        items = []
+        for t in tanks:
+            h = hist.get(int(t['tank_id']))
+            if h and len(h['series']) >= peco_plan.ALGO_MIN_HISTORY.get(algorithm, 28):
+                items.append((int(t['tank_id']), h['series'], h['weekdays'], h['last_date']))
+        size = max(1, -(-len(items) // (workers * 4)))
+        chunks = [(algorithm, horizon, fparams, items[i:i + size])
+                  for i in range(0, len(items), size)]
+        out: Dict[int, Dict[str, Any]] = {}
+        done = 0
+        for res in peco_plan.pool_map(peco_plan.forecast_chunk, chunks, workers):
+            for tank_id, f in res:
+                if f:
+                    out[tank_id] = f
+            done += len(res)
+            progress(done, len(items))
+        return out
+
+    @staticmethod
+    def _execute(db, run_id: int, prep: Dict[str, Any], username: str,
+                 cancelled: Optional[Callable[[], bool]] = None,
+                 workers: int = FORECAST_WORKERS) -> Dict[str, Any]:
+        """
+        Сам прогон по уже открытой строке PECO_ORDER_RUNS. Этапы пишутся
+        в STAGE / PROGRESS_PCT: load → history → forecast i/N → write →
+        sourcing → finished. cancelled() проверяется до записи заказов;
+        после неё прогон доводится до конца — заказы уже в базе.
+        """
+        p, algorithm, money_rate = prep['p'], prep['algorithm'], prep['money_rate']
+        cancelled = cancelled or (lambda: False)
+        started = datetime.now()
+        stage = lambda name, pct: FuelAutoOrder._stage(db, run_id, name, pct)
+
+        def check():
+            if cancelled():
+                raise AutoOrderCancelled()
+
+        stage('load', 3)
+        depot = FuelAutoOrder._rows(db.execute_query(
+            "SELECT DEPOT_ID FROM PECO_ORDER_RUNS WHERE ID = :p_id", {'p_id': run_id}))
+        depot_id = depot[0]['depot_id'] if depot else None
+
+        # Секции всего парка: множество доступных объёмов налива
+        comps = [float(r['volume_l']) for r in FuelAutoOrder._rows(db.execute_query(
+            "SELECT DISTINCT VOLUME_L FROM PECO_TRUCK_COMPARTMENTS "
+            "WHERE ACTIVE = 1 ORDER BY VOLUME_L"))]
+        if not comps:
+            comps = [5000.0, 6000.0, 8000.0]
+
+        # Разброс суточного отпуска нужен для страхового запаса
+        sigma_by_tank = {int(r['tank_id']): float(r['sigma_l'] or 0)
+                         for r in FuelAutoOrder._rows(db.execute_query(
+                             "SELECT TANK_ID, ROUND(STDDEV(LITERS), 3) AS SIGMA_L "
+                             "FROM PECO_TANK_DAILY "
+                             "WHERE SALE_DATE > (SELECT MAX(SALE_DATE) - 28 FROM PECO_TANK_DAILY) "
+                             "GROUP BY TANK_ID"))}
+
+        tanks = FuelAutoOrder._rows(db.execute_query(
+            "SELECT TANK_ID, STATION_ID, STATION_CODE, STATION_NAME, TANK_CODE, "
+            "GRADE_CODE, CAPACITY_L, CURRENT_L, MIN_ALARM_L, AVG_L_28, AVG_L_7 "
+            "FROM V_PECO_TANK_SUPPLY ORDER BY STATION_ID, GRADE_CODE"))
+        check()
+
+        # История отпуска под выбранный алгоритм прогноза.
+        # Поднимается ОДНИМ запросом на всю сеть: 184 бака по
+        # запросу каждый — это 184 round-trip до Oracle в Ирландии,
+        # то есть минуты вместо секунд.
+        horizon = max(3, int(math.ceil(float(p['lead_days']) +
+                                       float(p['review_days']))) + 1)
+        forecasts: Dict[int, Dict[str, Any]] = {}
+        if algorithm:
+            stage('history', 8)
+            peco_plan.load_min_history(db)
+            hist = peco_plan.load_tank_history(db, peco_plan.HISTORY_DAYS)
+            # У conformal своя параметризация: покрытие долей
+            # единицы и окно защиты в сутках — это плечо плюс
+            # период между завозами, а не горизонт прогноза
+            fparams = {'coverage': float(p['service_level']) / 100.0,
+                       'protect_days': float(p['lead_days']) + float(p['review_days'])}
+            last_pct = [0]
+
+            def on_forecast(done: int, total: int):
+                check()
+                pct = 10 + 60 * done // max(1, total)
+                if pct >= last_pct[0] + 5 or done == total:
+                    last_pct[0] = pct
+                    stage(f'forecast {done}/{total}', pct)
+
+            forecasts = FuelAutoOrder._forecasts(hist, tanks, algorithm, horizon, fparams,
+                                                 workers, on_forecast)
+
+        by_station: Dict[int, List[Dict[str, Any]]] = {}
+        dry_risk = 0
+        fc_used = 0
+        for t in tanks:
+            t['sigma_l'] = sigma_by_tank.get(int(t['tank_id']))
+            f = forecasts.get(int(t['tank_id']))
+            if f:
+                f['algorithm'] = algorithm
+                t['forecast'] = f
+                fc_used += 1
+            res = calc_tank_order(t, p, comps)
+            if res['liters'] <= 0:
+                if res['is_dry_risk']:
+                    dry_risk += 1
+                continue
+            dry_risk += res['is_dry_risk']
+            by_station.setdefault(int(t['station_id']), []).append((t, res))
+        check()
+
+        # Заказы и строки пишутся пачками: шапки одним executemany,
+        # их ID — одним запросом по прогону, строки — вторым executemany.
+        # Прежде было два запроса на станцию и по одному на резервуар.
+        stage('write', 75)
+        need_by = date.today() + timedelta(days=int(math.ceil(p['lead_days'])))
+        totals = {sid: sum(r['liters'] for _t, r in items) for sid, items in by_station.items()}
+        cur = db.connection.cursor()
+        if by_station:
+            cur.executemany(
+                "INSERT INTO PECO_FUEL_ORDERS (RUN_ID, STATION_ID, SOURCE_CODE, "
+                "DEPOT_ID, STATUS, NEED_BY, LITERS_TOTAL, CREATED_BY) "
+                "VALUES (:p_r, :p_s, 'depot', :p_d, 'draft', :p_n, :p_l, :p_u)",
+                [{'p_r': run_id, 'p_s': sid, 'p_d': depot_id, 'p_n': need_by,
+                  'p_l': round(totals[sid], 3), 'p_u': username} for sid in by_station])
+            order_ids = {int(r['station_id']): r['id'] for r in FuelAutoOrder._rows(db.execute_query(
+                "SELECT ID, STATION_ID FROM PECO_FUEL_ORDERS WHERE RUN_ID = :p_r",
+                {'p_r': run_id}))}
+            cur.executemany(
+                "INSERT INTO PECO_FUEL_ORDER_ITEMS (ORDER_ID, STATION_ID, TANK_ID, "
+                "GRADE_CODE, LITERS_MODEL, LITERS_ORDER, CURRENT_L, ULLAGE_L, "
+                "DAILY_RATE_L, DAYS_TO_DRY, COVER_AFTER_D, IS_DRY_RISK, "
+                "ALGORITHM, FORECAST_DAILY_L, SAFETY_L) "
+                "VALUES (:p_o, :p_s, :p_t, :p_g, :p_lm, :p_lo, :p_cur, :p_ul, "
+                ":p_dr, :p_dd, :p_ca, :p_risk, :p_alg, :p_fd, :p_sf)",
+                [{'p_o': order_ids[sid], 'p_s': sid, 'p_t': int(t['tank_id']),
+                  'p_g': t['grade_code'], 'p_lm': r['liters'], 'p_lo': r['liters'],
+                  'p_cur': t['current_l'], 'p_ul': r['ullage_l'],
+                  'p_dr': r['daily_rate_l'], 'p_dd': r['days_to_dry'],
+                  'p_ca': r['cover_after_d'], 'p_risk': r['is_dry_risk'],
+                  'p_alg': r.get('algorithm'),
+                  'p_fd': r.get('daily_rate_l') if r.get('algorithm') else None,
+                  'p_sf': r.get('safety_l')}
+                 for sid, items in by_station.items() for t, r in items])
+        orders = len(by_station)
+        liters_total = sum(totals.values())
+        db.connection.commit()
+        stage('sourcing', 88)
+
+        # Выбор пути снабжения: чем именно закрывать каждую строку.
+        # Считается ПОСЛЕ записи строк, потому что оптимизатору
+        # нужны итоговые литры (после подбора секций), а не
+        # «сколько хотелось».
+        plan_cost = None
+        try:
+            dem = peco_plan.station_demands(db, run_id)
+            src = peco_plan.load_paths(db, 'distribution')
+            dist = peco_sourcing.solve_distribution(dem, src, money_rate, warm=True)
+            if dist.get('success'):
+                for a in dist['allocations']:
+                    key = a['key']
+                    a['item_id'] = int(key.split(':')[1]) if key.startswith('item:') else None
+                peco_plan.apply_plan_to_items(db, dist['allocations'])
+                plan_cost = dist.get('total_cost')
+        except Exception:                                        # noqa: BLE001
+            # Заказ важнее его себестоимости: если путей ещё нет
+            # или справочник цен пуст, заказ остаётся валидным,
+            # просто без выбранного пути
+            pass
+
+        db.execute_query(
+            "UPDATE PECO_ORDER_RUNS SET ALGORITHM = :p_alg, MONEY_RATE = :p_mr, "
+            "PLAN_COST = :p_pc WHERE ID = :p_id",
+            {'p_alg': algorithm, 'p_mr': money_rate, 'p_pc': plan_cost,
+             'p_id': run_id})
+
+        db.execute_query(
+            "UPDATE PECO_ORDER_RUNS SET STATUS = 'done', STAGE = 'finished', "
+            "PROGRESS_PCT = 100, STATION_COUNT = :p_st, ORDER_COUNT = :p_o, "
+            "LITERS_TOTAL = :p_l, DRY_RISK_CNT = :p_dry, FINISHED_AT = SYSTIMESTAMP, "
+            "DURATION_SEC = :p_dur, MESSAGE = :p_m WHERE ID = :p_id",
+            {'p_st': len(by_station), 'p_o': orders, 'p_l': round(liters_total, 3),
+             'p_dry': dry_risk, 'p_dur': int((datetime.now() - started).total_seconds()),
+             'p_m': f'Заказов: {orders}, литров: {round(liters_total)}, '
+                    f'риск сухого бака: {dry_risk}',
+             'p_id': run_id})
+        db.connection.commit()
+        return {'success': True, 'run_id': run_id, 'orders': orders,
+                'liters': round(liters_total, 1), 'dry_risk': dry_risk,
+                'stations': len(by_station), 'algorithm': algorithm,
+                'forecasted_tanks': fc_used, 'plan_cost': plan_cost,
+                'money_rate': money_rate}
+
     # ==================== Второй эшелон: потребность нефтебазы ====================
 
     @staticmethod
@@ -468,7 +600,8 @@ class FuelAutoOrder:
 
     @staticmethod
     def plan_trips(run_id: Optional[int] = None, username: str = 'system',
-                   max_stations: int = 3) -> Dict[str, Any]:
+                   max_stations: int = 3,
+                   time_budget: float = peco_packing.DEFAULT_TIME_BUDGET_SEC) -> Dict[str, Any]:
         """
         Раскладка утверждённых заказов по бензовозам.
 
@@ -483,9 +616,10 @@ class FuelAutoOrder:
         и молча пропускала всё, что больше самой большой секции:
         из 42 заказов в рейс попадали три.
 
-        Станции берутся по возрастанию покрытия — сначала те, где ближе
-        сухой бак. Больше max_stations точек в рейс не ставим: бензовоз
-        физически не успевает объехать больше за смену.
+        Строки раскладываются по всему парку сразу (models/peco_packing.py):
+        сначала те, где ближе сухой бак. Больше max_stations точек в рейс
+        не ставим: бензовоз физически не успевает объехать больше за смену.
+        В ответе — разложенный объём, верхняя граница и разрыв до неё.
         """
         try:
             with DatabaseModel() as db:
@@ -516,84 +650,125 @@ class FuelAutoOrder:
                         "SELECT ID, TRUCK_ID, COMP_NO, VOLUME_L FROM PECO_TRUCK_COMPARTMENTS "
                         "WHERE ACTIVE = 1 ORDER BY TRUCK_ID, VOLUME_L DESC")):
                     comps_by_truck.setdefault(int(c['truck_id']), []).append(c)
+                for t in trucks:
+                    t['id'] = int(t['id'])
 
-                trips_created, stops_created, assigned = 0, 0, set()
-                depart = datetime.now() + timedelta(hours=2)
+                packed = peco_packing.pack_fleet(items, trucks, comps_by_truck,
+                                                 max_stations, time_budget)
 
-                for truck in trucks:
-                    free = sorted(comps_by_truck.get(int(truck['id']), []),
-                                  key=lambda c: -float(c['volume_l']))
-                    if not free:
-                        continue
-                    # План загрузки: (строка заказа, список секций под неё)
-                    load: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
-                    stations: set = set()
-                    for it in items:
-                        if it['item_id'] in assigned or not free:
-                            continue
-                        if (it['station_id'] not in stations
-                                and len(stations) >= max_stations):
-                            continue
-                        need = float(it['liters_order'] or 0)
-                        taken: List[Dict[str, Any]] = []
-                        rest = need
-                        for c in list(free):
-                            vol = float(c['volume_l'])
-                            if vol <= rest + 1e-6:
-                                taken.append(c)
-                                free.remove(c)
-                                rest -= vol
-                                if rest <= 1e-6:
-                                    break
-                        if rest > 1e-6:
-                            # Целиком не набралось — возвращаем секции в парк,
-                            # частичный завоз резервуара не планируем
-                            free.extend(taken)
-                            free.sort(key=lambda c: -float(c['volume_l']))
-                            continue
-                        assigned.add(it['item_id'])
-                        stations.add(it['station_id'])
-                        load.append((it, taken))
-                    if not load:
-                        continue
-
-                    depot_id = load[0][0]['depot_id'] or truck['depot_id']
-                    db.execute_query(
+                depart = datetime.now() + timedelta(hours=2)
+                cur = db.connection.cursor()
+                stops: List[Dict[str, Any]] = []
+                orders: Dict[int, int] = {}
+                for truck, load in packed['loads']:
+                    # Объезд: станции по срочности, на станции — все её сливы подряд
+                    urgency: Dict[Any, float] = {}
+                    for it, _c in load:
+                        dd = 99.0 if it['days_to_dry'] is None else float(it['days_to_dry'])
+                        urgency[it['station_id']] = min(urgency.get(it['station_id'], dd), dd)
+                    load.sort(key=lambda x: (urgency[x[0]['station_id']], x[0]['station_id']))
+
+                    out = cur.var(int)
+                    cur.execute(
                         "INSERT INTO PECO_TRIPS (DEPOT_ID, TRUCK_ID, DRIVER_NAME, STATUS, "
                         "PLAN_DEPART, LITERS_TOTAL, STOPS_COUNT, CREATED_BY) "
-                        "VALUES (:p_d, :p_t, :p_dr, 'planned', :p_dep, :p_l, :p_s, :p_u)",
-                        {'p_d': depot_id, 'p_t': int(truck['id']),
+                        "VALUES (:p_d, :p_t, :p_dr, 'planned', :p_dep, :p_l, :p_s, :p_u) "
+                        "RETURNING ID INTO :p_id",
+                        {'p_d': load[0][0]['depot_id'] or truck['depot_id'], 'p_t': truck['id'],
                          'p_dr': truck.get('driver_name'), 'p_dep': depart,
                          'p_l': round(sum(float(i['liters_order']) for i, _c in load), 3),
-                         'p_s': len(stations), 'p_u': username})
-                    trip_id = FuelAutoOrder._rows(db.execute_query(
-                        "SELECT MAX(ID) AS ID FROM PECO_TRIPS WHERE TRUCK_ID = :p_t",
-                        {'p_t': int(truck['id'])}))[0]['id']
+                         'p_s': len(urgency), 'p_u': username, 'p_id': out})
+                    trip_id = int(out.getvalue()[0])
 
                     stop_no = 0
                     eta = depart + timedelta(minutes=45)
+                    station = None
                     for it, comps in load:
+                        if station is not None and it['station_id'] != station:
+                            eta += timedelta(minutes=50)
+                        station = it['station_id']
                         for c in comps:
                             stop_no += 1
-                            db.execute_query(
-                                "INSERT INTO PECO_TRIP_STOPS (TRIP_ID, STOP_NO, STATION_ID, "
-                                "ORDER_ID, COMP_ID, GRADE_CODE, LITERS_PLAN, PLAN_ARRIVE) "
-                                "VALUES (:p_tr, :p_no, :p_st, :p_o, :p_c, :p_g, :p_l, :p_eta)",
-                                {'p_tr': trip_id, 'p_no': stop_no,
-                                 'p_st': int(it['station_id']), 'p_o': int(it['order_id']),
-                                 'p_c': int(c['id']), 'p_g': it['grade_code'],
-                                 'p_l': float(c['volume_l']), 'p_eta': eta})
-                            stops_created += 1
-                        db.execute_query(
-                            "UPDATE PECO_FUEL_ORDERS SET TRIP_ID = :p_tr, STATUS = 'planned' "
-                            "WHERE ID = :p_o", {'p_tr': trip_id, 'p_o': int(it['order_id'])})
-                        eta += timedelta(minutes=50)
-                    trips_created += 1
+                            stops.append({'p_tr': trip_id, 'p_no': stop_no,
+                                          'p_st': int(it['station_id']),
+                                          'p_o': int(it['order_id']), 'p_c': int(c['id']),
+                                          'p_g': it['grade_code'],
+                                          'p_l': float(c['volume_l']), 'p_eta': eta})
+                        orders[int(it['order_id'])] = trip_id
                     depart += timedelta(minutes=40)   # разнос выездов по наливным постам
 
+                if stops:
+                    cur.executemany(
+                        "INSERT INTO PECO_TRIP_STOPS (TRIP_ID, STOP_NO, STATION_ID, "
+                        "ORDER_ID, COMP_ID, GRADE_CODE, LITERS_PLAN, PLAN_ARRIVE) "
+                        "VALUES (:p_tr, :p_no, :p_st, :p_o, :p_c, :p_g, :p_l, :p_eta)", stops)
+                    cur.executemany(
+                        "UPDATE PECO_FUEL_ORDERS SET TRIP_ID = :p_tr, STATUS = 'planned' "
+                        "WHERE ID = :p_o",
+                        [{'p_tr': tr, 'p_o': o} for o, tr in orders.items()])
                 db.connection.commit()
-            return {'success': True, 'trips': trips_created, 'stops': stops_created,
-                    'items_assigned': len(assigned),
-                    'items_left': len(items) - len(assigned)}
+            return {'success': True, 'trips': len(packed['loads']), 'stops': len(stops),
+                    'items_assigned': len(packed['assigned']),
+                    'items_left': len(items) - len(packed['assigned']),
+                    'liters': packed['liters'], 'liters_bound': packed['bound'],
+                    'gap': packed['gap'], 'timed_out': packed['timed_out'],
+                    'elapsed_sec': packed['elapsed_sec']}
         except Exception as e:                                   # noqa: BLE001
             return {'success': False, 'error': str(e)}
+
+
+class FuelAutoOrderEngine:
+    """
+    Прогон автозаказа в очереди (models/run_queue.py, движок
+    'fuel_autoorder'). Строку PECO_ORDER_RUNS уже создал
+    FuelAutoOrder.launch; здесь — тот же FuelAutoOrder._execute, что
+    и у синхронного прогона, плюс флаг отмены.
+    """
+
+    _active: Dict[int, 'FuelAutoOrderEngine'] = {}
+
+    def __init__(self, run_id: int, params: Dict[str, Any], username: str):
+        self.run_id = run_id
+        self.params = params
+        self.username = username
+        self.cancelled = False
+
+    @staticmethod
+    def from_job(run_id: int, payload: Dict[str, Any]) -> 'FuelAutoOrderEngine':
+        """Экземпляр прогона из задания очереди."""
+        engine = FuelAutoOrderEngine(run_id, payload.get('params') or {},
+                                     payload.get('username') or 'system')
+        FuelAutoOrderEngine._active[run_id] = engine
+        return engine
+
+    @staticmethod
+    def cancel(run_id: int) -> Dict[str, Any]:
+        engine = FuelAutoOrderEngine._active.get(run_id)
+        if engine:
+            engine.cancelled = True
+            return {'success': True}
+        if run_queue.request_cancel('fuel_autoorder', run_id):
+            return {'success': True}
+        return {'success': False, 'error': 'Прогон не активен'}
+
+    def _run(self):
+        try:
+            with DatabaseModel() as db:
+                try:
+                    prep = FuelAutoOrder._prepare(self.params)
+                    if not prep['success']:
+                        FuelAutoOrder._close_run(db, self.run_id, 'failed', prep['error'])
+                        return
+                    FuelAutoOrder._execute(db, self.run_id, prep, self.username,
+                                           cancelled=lambda: self.cancelled)
+                except AutoOrderCancelled:
+                    db.connection.rollback()
+                    FuelAutoOrder._close_run(db, self.run_id, 'cancelled',
+                                             'Остановлено оператором')
+                except Exception as e:                           # noqa: BLE001
+                    db.connection.rollback()
+                    FuelAutoOrder._close_run(db, self.run_id, 'failed', str(e))
+        except Exception:                                        # noqa: BLE001
+            pass
+        finally:
+            FuelAutoOrderEngine._active.pop(self.run_id, None)
@@ -37,6 +37,9 @@ from __future__ import annotations
 
 import math
 import random
+from bisect import bisect_left
+from itertools import accumulate, compress, filterfalse
+from operator import ne
 from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 # ==================== Общие утилиты ====================
@@ -362,42 +365,193 @@ class _Tree:
         return node.value
 
 
-def _build_tree(X: List[List[float]], g: List[float], depth: int,
-                min_leaf: int, feat_idx: Sequence[int]) -> _Tree:
+class GbtMatrix:
+    """
+    Признаки ряда, один раз разложенные по корзинам и упорядоченные.
+
+    Строка — день ряда начиная с `start` (раньше лаги не существуют).
+    Признаки дня i зависят только от series[:i], поэтому матрица полного
+    ряда годится для любого его префикса: срезы backtest берут первые
+    строки той же матрицы, а не строят признаки заново.
+
+    Пока различных значений признака не больше max_bins, корзина — это
+    одно значение, и пороги совпадают с точным перебором. Дальше корзины
+    квантильные. `order[f]` — номера строк по возрастанию корзины признака f:
+    сортировка делается здесь один раз, узлы деревьев её только фильтруют.
+    """
+
+    __slots__ = ('start', 'rows', 'y', 'bins', 'lo', 'hi', 'order')
+
+    def __init__(self, series: Sequence[float], weekdays: Sequence[int],
+                 max_bins: int = 255, start: int = 14):
+        X = [_features(series, weekdays, i) for i in range(start, len(series))]
+        self.start = start
+        self.rows = len(X)
+        self.y = [float(series[i]) for i in range(start, len(series))]
+        self.bins: List[List[int]] = []
+        self.lo: List[List[float]] = []          # наименьшее значение в корзине
+        self.hi: List[List[float]] = []          # наибольшее
+        self.order: List[List[int]] = []
+        for f in range(len(X[0]) if X else 0):
+            col = [row[f] for row in X]
+            distinct = sorted(set(col))
+            if len(distinct) <= max_bins:
+                pos = {v: b for b, v in enumerate(distinct)}
+                col_bins = [pos[v] for v in col]
+                nb = len(distinct)
+            else:
+                k = len(distinct)
+                edges = sorted({distinct[(b + 1) * k // max_bins - 1] for b in range(max_bins)})
+                col_bins = [bisect_left(edges, v) for v in col]
+                nb = len(edges)
+            lo, hi = [math.inf] * nb, [-math.inf] * nb
+            for v, b in zip(col, col_bins):
+                if v < lo[b]:
+                    lo[b] = v
+                if v > hi[b]:
+                    hi[b] = v
+            self.bins.append(col_bins)
+            self.lo.append(lo)
+            self.hi.append(hi)
+            self.order.append(sorted(range(len(col)), key=col_bins.__getitem__))
+
+
+def _boundaries(m: GbtMatrix, orders: List[List[int]], min_leaf: int) -> List[Optional[Tuple]]:
+    """
+    Для каждого признака узла: корзины строк по порядку и позиции, после
+    которых допустимо разбиение (граница корзин, в листьях не меньше
+    min_leaf строк). От остатков не зависит — у корня считается раз на fit.
+    """
+    out: List[Optional[Tuple]] = []
+    for f, order in enumerate(orders):
+        bs = list(map(m.bins[f].__getitem__, order))
+        lo_k, hi_k = min_leaf - 1, len(order) - min_leaf
+        cand = list(compress(range(lo_k, hi_k), map(ne, bs[lo_k:hi_k], bs[lo_k + 1:hi_k + 1]))) \
+            if hi_k > lo_k and bs[0] != bs[-1] else []
+        out.append((bs, cand) if cand else None)
+    return out
+
+
+_SPLIT_WEIGHTS: Dict[int, Tuple[List[int], List[float]]] = {}
+
+
+def _split_weights(n: int) -> Tuple[List[int], List[float]]:
+    """Для разбиения после k-й строки из n: nl = k + 1 и N / (nl · nr)."""
+    w = _SPLIT_WEIGHTS.get(n)
+    if w is None:
+        w = _SPLIT_WEIGHTS[n] = ([k + 1 for k in range(n - 1)],
+                                 [n / ((k + 1) * (n - k - 1)) for k in range(n - 1)])
+    return w
+
+
+def _grow(m: GbtMatrix, orders: List[List[int]], g: List[float], depth: int,
+          min_leaf: int, leaves: List[Tuple[_Tree, List[int]]],
+          mark: bytearray, bounds: Optional[List[Optional[Tuple]]] = None) -> _Tree:
+    """
+    Узел дерева. `orders` — строки узла по возрастанию корзины каждого
+    признака; накопленные суммы остатков на границах корзин и есть
+    гистограмма узла. Пороги перебираются в том же порядке и с тем же
+    приростом, что у точного перебора; потомки получают порядок
+    фильтрацией родительского, без новой сортировки.
+    """
     node = _Tree()
-    node.value = _mean(g)
-    if depth <= 0 or len(g) < 2 * min_leaf:
+    idx = orders[0]
+    total_n = len(idx)
+    gget = g.__getitem__
+    total_sum = sum(map(gget, idx))
+    node.value = total_sum / total_n if total_n else 0.0
+    if depth <= 0 or total_n < 2 * min_leaf:
+        leaves.append((node, idx))
         return node
-    best = (0.0, None, 0.0)          # (прирост, признак, порог)
-    total_sum, total_n = sum(g), len(g)
-    for f in feat_idx:
-        pairs = sorted(zip((row[f] for row in X), g))
-        left_sum, left_n = 0.0, 0
-        prev = None
-        for val, gv in pairs:
-            if prev is not None and val != prev and left_n >= min_leaf \
-                    and total_n - left_n >= min_leaf:
-                right_sum = total_sum - left_sum
-                right_n = total_n - left_n
-                # Прирост = уменьшение суммы квадратов при разбиении
-                gain = (left_sum * left_sum / left_n +
-                        right_sum * right_sum / right_n -
-                        total_sum * total_sum / total_n)
-                if gain > best[0]:
-                    best = (gain, f, (val + prev) / 2.0)
-            left_sum += gv
-            left_n += 1
-            prev = val
+    best = (0.0, None, 0, 0)         # (прирост, признак, корзина слева, корзина справа)
+    share, weight = _split_weights(total_n)
+    mean = total_sum / total_n
+    for f, fb in enumerate(bounds or _boundaries(m, orders, min_leaf)):
+        if fb is None:
+            continue
+        bs, cand = fb
+        cum = list(accumulate(map(gget, orders[f])))
+        lo, hi = cand[0], cand[-1] + 1
+        if hi - lo == len(cand):     # без повторов корзин — срезы вместо выборки
+            cs, ps, ws = cum[lo:hi], share[lo:hi], weight[lo:hi]
+        else:
+            cs = list(map(cum.__getitem__, cand))
+            ps = list(map(share.__getitem__, cand))
+            ws = list(map(weight.__getitem__, cand))
+        # Прирост = уменьшение суммы квадратов при разбиении после k-й строки:
+        # L²/nl + R²/nr − T²/N = (L − nl·T/N)² · N / (nl·nr)
+        gains = [(d := c - mean * p) * d * w for c, p, w in zip(cs, ps, ws)]
+        top = max(gains)
+        # Равный прирост у разных признаков (день недели и «выходной» режут
+        # выборку одинаково) решает порядок признаков, а не шум округления
+        if top > best[0] * (1.0 + 1e-9):
+            k = cand[gains.index(top)]
+            best = (top, f, bs[k], bs[k + 1])
     if best[1] is None or best[0] <= 1e-12:
+        leaves.append((node, idx))
         return node
-    node.feat, node.thr = best[1], best[2]
-    li = [i for i in range(len(X)) if X[i][node.feat] <= node.thr]
-    ri = [i for i in range(len(X)) if X[i][node.feat] > node.thr]
-    node.left = _build_tree([X[i] for i in li], [g[i] for i in li], depth - 1, min_leaf, feat_idx)
-    node.right = _build_tree([X[i] for i in ri], [g[i] for i in ri], depth - 1, min_leaf, feat_idx)
+    _, f, lb, rb = best
+    node.feat = f
+    node.thr = (m.hi[f][lb] + m.lo[f][rb]) / 2.0
+    col = m.bins[f]
+    for i in idx:
+        mark[i] = col[i] <= lb
+    if depth - 1 <= 0:
+        # Потомки — листья: упорядочивать по остальным признакам незачем
+        sides = [orders[:1]]
+    else:
+        sides = [orders]
+    left = [list(compress(o, map(mark.__getitem__, o))) for o in sides[0]]
+    right = [list(filterfalse(mark.__getitem__, o)) for o in sides[0]]
+    node.left = _grow(m, left, g, depth - 1, min_leaf, leaves, mark)
+    node.right = _grow(m, right, g, depth - 1, min_leaf, leaves, mark)
     return node
 
 
+class GradientBoosting:
+    """
+    Бустинг деревьев на матрице GbtMatrix: fit по первым `rows` строкам,
+    predict — по сырым признакам (для рекурсивного прогноза вперёд).
+    """
+
+    def __init__(self, rounds: int = 60, depth: int = 3, lr: float = 0.1, min_leaf: int = 3):
+        self.rounds = rounds
+        self.depth = depth
+        self.lr = lr
+        self.min_leaf = min_leaf
+        self.base = 0.0
+        self.trees: List[_Tree] = []
+        self.train_rmse = 0.0
+
+    def fit(self, m: GbtMatrix, rows: Optional[int] = None) -> 'GradientBoosting':
+        n = m.rows if rows is None else min(rows, m.rows)
+        y = m.y[:n]
+        self.base = _mean(y)
+        g = [v - self.base for v in y]              # остатки текущего ансамбля
+        orders = m.order if n == m.rows else [[i for i in o if i < n] for o in m.order]
+        bounds = _boundaries(m, orders, self.min_leaf)      # корень одинаков во всех раундах
+        mark = bytearray(n)
+        self.trees = []
+        for _ in range(self.rounds):
+            leaves: List[Tuple[_Tree, List[int]]] = []
+            self.trees.append(_grow(m, orders, g, self.depth, self.min_leaf, leaves,
+                                    mark, bounds))
+            # Остатки обновляются по листьям: строка уже знает свой лист,
+            # проходить дерево заново не нужно
+            for leaf, rows_in in leaves:
+                step = self.lr * leaf.value
+                for i in rows_in:
+                    g[i] -= step
+        self.train_rmse = math.sqrt(_mean([r * r for r in g])) if g else 0.0
+        return self
+
+    def predict(self, x: Sequence[float]) -> float:
+        v = self.base
+        for t in self.trees:
+            v += self.lr * t.predict(x)
+        return v
+
+
 def _features(series: Sequence[float], weekdays: Sequence[int], i: int) -> List[float]:
     """
     Признаки для дня i: календарь, лаги, скользящие средние, тренд.
@@ -419,7 +573,8 @@ def _features(series: Sequence[float], weekdays: Sequence[int], i: int) -> List[
 
 def forecast_gbt(series: Sequence[float], weekdays: Sequence[int],
                  horizon: int, future_wd: Sequence[int],
-                 params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                 params: Optional[Dict[str, Any]] = None,
+                 matrix: Optional[GbtMatrix] = None) -> Dict[str, Any]:
     """
     Градиентный бустинг регрессионных деревьев, чистый Python.
 
@@ -429,16 +584,21 @@ def forecast_gbt(series: Sequence[float], weekdays: Sequence[int],
     складывает эффекты, дерево их перемножает.
 
     Устройство: деревья глубины 3 на квадратичной ошибке, шаг обучения
-    0.1, стартовое значение — среднее. Прогноз строится РЕКУРСИВНО:
-    предсказали день, подставили как лаг, пошли дальше. Рекурсия копит
-    ошибку, поэтому горизонт ограничен неделей — дальше модель честно
-    вырождается в свой базовый уровень.
+    0.1, стартовое значение — среднее. Пороги ищутся по гистограммам
+    заранее разложенных по корзинам признаков (GbtMatrix). Прогноз строится
+    РЕКУРСИВНО: предсказали день, подставили как лаг, пошли дальше.
+    Рекурсия копит ошибку, поэтому горизонт ограничен неделей — дальше
+    модель честно вырождается в свой базовый уровень.
+
+    `matrix` — матрица более длинного ряда, префиксом которого является
+    series (срезы backtest): обучение идёт по её первым строкам.
 
     Ограничение выборки: при истории меньше 30 дней бустинг переобучается
     на шуме и проигрывает Theta; в этом случае возвращаем среднее
     и помечаем причину.
     """
-    p = {'rounds': 60, 'depth': 3, 'lr': 0.1, 'min_leaf': 3, 'min_history': 30}
+    p = {'rounds': 60, 'depth': 3, 'lr': 0.1, 'min_leaf': 3, 'min_history': 30,
+         'max_bins': 255}
     p.update(params or {})
     n = len(series)
     if n < int(p['min_history']):
@@ -446,31 +606,16 @@ def forecast_gbt(series: Sequence[float], weekdays: Sequence[int],
         return {'daily': [max(0.0, base)] * horizon, 'safety_l': 0.0,
                 'meta': {'algo': 'gbt', 'reason': 'short_history', 'n': n}}
 
-    start = 14                       # первые дни нужны, чтобы лаги существовали
-    X = [_features(series, weekdays, i) for i in range(start, n)]
-    y = [float(series[i]) for i in range(start, n)]
-    if len(y) < 10:
+    if matrix is None:
+        matrix = GbtMatrix(series, weekdays, int(p['max_bins']))
+    rows = n - matrix.start          # первые дни нужны, чтобы лаги существовали
+    if rows < 10:
         base = _mean(series)
         return {'daily': [max(0.0, base)] * horizon, 'safety_l': 0.0,
                 'meta': {'algo': 'gbt', 'reason': 'few_rows'}}
 
-    base = _mean(y)
-    pred = [base] * len(y)
-    trees: List[_Tree] = []
-    lr = float(p['lr'])
-    feat_idx = list(range(len(X[0])))
-    for _ in range(int(p['rounds'])):
-        resid = [y[i] - pred[i] for i in range(len(y))]
-        tree = _build_tree(X, resid, int(p['depth']), int(p['min_leaf']), feat_idx)
-        trees.append(tree)
-        for i in range(len(y)):
-            pred[i] += lr * tree.predict(X[i])
-
-    def predict_one(feat: Sequence[float]) -> float:
-        v = base
-        for t in trees:
-            v += lr * t.predict(feat)
-        return v
+    model = GradientBoosting(int(p['rounds']), int(p['depth']), float(p['lr']),
+                             int(p['min_leaf'])).fit(matrix, rows)
 
     hist = list(float(v) for v in series)
     wds = list(int(w) for w in weekdays)
@@ -478,15 +623,13 @@ def forecast_gbt(series: Sequence[float], weekdays: Sequence[int],
     for h in range(horizon):
         wds.append(int(future_wd[h]) if h < len(future_wd) else 0)
         feat = _features(hist + [0.0], wds, len(hist))
-        val = max(0.0, predict_one(feat))
+        val = max(0.0, model.predict(feat))
         out.append(val)
         hist.append(val)              # рекурсивная подстановка
 
-    resid = [y[i] - pred[i] for i in range(len(y))]
-    rmse = math.sqrt(_mean([r * r for r in resid])) if resid else 0.0
     return {'daily': out, 'safety_l': 0.0,
-            'meta': {'algo': 'gbt', 'rounds': len(trees), 'rows': len(y),
-                     'train_rmse': round(rmse, 2)}}
+            'meta': {'algo': 'gbt', 'rounds': len(model.trees), 'rows': rows,
+                     'train_rmse': round(model.train_rmse, 2)}}
 
 
 # ==================== Реестр ====================
@@ -501,6 +644,11 @@ ALGORITHMS = {
 # Порядок и подписи держим здесь, чтобы UI и SQL-реестр не расходились
 ALGO_ORDER = ['theta', 'croston_sba', 'conformal', 'gbt']
 
+# Ревизия реализации алгоритма. Входит в ключ кэша срезов backtest
+# (PECO_FCT_BT_FOLDS): поменялись формулы — поднимите номер, и прежние
+# прогнозы срезов перестанут считаться годными.
+ALGO_REV = {'theta': 1, 'croston_sba': 1, 'conformal': 1, 'gbt': 2}
+
 
 def run_forecast(algorithm: str, series: Sequence[float], weekdays: Sequence[int],
                  horizon: int, future_wd: Sequence[int],
@@ -514,9 +662,17 @@ def run_forecast(algorithm: str, series: Sequence[float], weekdays: Sequence[int
 # ==================== Backtest ====================
 
 
+def fold_cuts(n: int, horizon: int, folds: int) -> List[int]:
+    """Точки среза скользящего backtest: последние `folds` с равным шагом."""
+    step = max(1, (n - horizon - 12) // max(1, folds))
+    return list(range(12, n - horizon + 1, step))[-folds:]
+
+
 def backtest(algorithm: str, series: Sequence[float], weekdays: Sequence[int],
              horizon: int = 3, folds: int = 8,
-             params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+             params: Optional[Dict[str, Any]] = None,
+             cuts: Optional[Sequence[int]] = None,
+             known: Optional[Dict[int, float]] = None) -> Dict[str, Any]:
     """
     Скользящий backtest с фиксированным горизонтом.
 
@@ -524,17 +680,38 @@ def backtest(algorithm: str, series: Sequence[float], weekdays: Sequence[int],
     отдельного дня: заказ покрывает окно до следующего завоза целиком,
     и промах в понедельник, скомпенсированный вторником, для бака
     безразличен.
+
+    `cuts` — точки среза, если их выбирает вызывающий (по календарю,
+    см. peco_plan.run_backtests); `known` — уже посчитанные прогнозы
+    суммы за горизонт по точке среза, модель для них не переобучается.
+    Прогнозы всех срезов возвращаются в `preds` — для кэша.
     """
     n = len(series)
     if n < horizon + 15:
         return {'success': False, 'error': 'Мало истории для backtest'}
+    if cuts is None:
+        cuts = fold_cuts(n, horizon, folds)
+    cuts = [c for c in cuts if 12 <= c <= n - horizon]
+    known = known or {}
     errs, pcts, signed = [], [], []
-    step = max(1, (n - horizon - 12) // max(1, folds))
-    cuts = list(range(12, n - horizon + 1, step))[-folds:]
+    preds: Dict[int, float] = {}
+    matrix = None
     for cut in cuts:
-        res = run_forecast(algorithm, series[:cut], weekdays[:cut], horizon,
-                           weekdays[cut:cut + horizon], params)
-        pred = sum(res['daily'][:horizon])
+        if cut in known:
+            pred = float(known[cut])
+        elif algorithm == 'gbt':
+            # Признаки и корзины — один раз на ряд, срез берёт первые строки
+            if matrix is None:
+                matrix = GbtMatrix(series, weekdays,
+                                   int((params or {}).get('max_bins') or 255))
+            res = forecast_gbt(series[:cut], weekdays[:cut], horizon,
+                               weekdays[cut:cut + horizon], params, matrix=matrix)
+            pred = sum(res['daily'][:horizon])
+        else:
+            res = run_forecast(algorithm, series[:cut], weekdays[:cut], horizon,
+                               weekdays[cut:cut + horizon], params)
+            pred = sum(res['daily'][:horizon])
+        preds[cut] = pred
         actual = sum(float(v) for v in series[cut:cut + horizon])
         err = pred - actual
         errs.append(abs(err))
@@ -552,4 +729,5 @@ def backtest(algorithm: str, series: Sequence[float], weekdays: Sequence[int],
             'mape': round(mape, 2) if mape is not None else None,
             'bias': round(bias, 2),
             'bias_pct': round(bias / denom * 100, 2),
-            'rmse': round(math.sqrt(_mean([e * e for e in errs])), 2)}
+            'rmse': round(math.sqrt(_mean([e * e for e in errs])), 2),
+            'preds': preds}
@@ -17,14 +17,27 @@
    выключенном зажигании. Слив топлива система не «обнаруживает» —
    она показывает факты, из которых человек делает вывод.
 
-Oracle-объекты: sql/106_peco_supply.sql
+Приём пакетный: справочник устройств и активных рейсов берётся из кеша
+процесса, пачка пишется одним executemany, повтор пинга отсекает
+уникальный индекс (TRUCK_ID, TS).
+
+Разбор инкрементальный: у рейса водяной знак (PECO_GPS_TRIP_STATE),
+детекторы — потоковый автомат TripScanner, коридор маршрута — сеточный
+индекс отрезков CorridorIndex.
+
+Oracle-объекты: sql/106_peco_supply.sql, sql/117_peco_gps_ingest.sql,
+sql/118_peco_gps_trip_state.sql
 """
 from __future__ import annotations
 
 import hashlib
+import json
 import math
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -32,6 +45,8 @@ ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+import oracledb
+
 from models.database import DatabaseModel
 
 # Пороги детекторов
@@ -95,6 +110,222 @@ def distance_to_corridor_km(lat: float, lon: float,
     return best or 0.0
 
 
+class CorridorIndex:
+    """
+    Коридор маршрута с сеточным индексом отрезков.
+
+    distance() даёт ровно то же, что distance_to_corridor_km (та же
+    проекция на отрезок), но смотрит не все отрезки, а только те, что
+    лежат в ячейках сетки вокруг точки, расширяя кольцо, пока ближайший
+    найденный отрезок не окажется ближе границы кольца. Ячейка — CELL_DEG
+    градусов; оценка снизу через km на градус в самой северной точке
+    маршрута, где градус долготы короче всего.
+    """
+
+    CELL_DEG = 0.05
+
+    def __init__(self, route: List[Tuple[float, float]]):
+        self.route = list(route)
+        self.segments: List[Tuple[float, float, float, float, float, float]] = []
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        if len(self.route) < 2:
+            return
+        c = self.CELL_DEG
+        for (alat, alon), (blat, blon) in zip(self.route, self.route[1:]):
+            kx = 111.32 * math.cos(math.radians((alat + blat) / 2))
+            self.segments.append((alat, alon, kx, (blon - alon) * kx, (blat - alat) * 110.57,
+                                  ((blon - alon) * kx) ** 2 + ((blat - alat) * 110.57) ** 2))
+            i = len(self.segments) - 1
+            for cy in range(math.floor(min(alat, blat) / c), math.floor(max(alat, blat) / c) + 1):
+                for cx in range(math.floor(min(alon, blon) / c), math.floor(max(alon, blon) / c) + 1):
+                    self.cells.setdefault((cy, cx), []).append(i)
+        ys = [k[0] for k in self.cells]
+        xs = [k[1] for k in self.cells]
+        self._bounds = (min(ys), max(ys), min(xs), max(xs))
+        max_lat = max(abs(lat) for lat, _ in self.route)
+        self._ring_km = c * min(110.57, 111.32 * math.cos(math.radians(max_lat)))
+
+    def _segment_km(self, i: int, lat: float, lon: float) -> float:
+        alat, alon, kx, bx, by, seg2 = self.segments[i]
+        px, py = (lon - alon) * kx, (lat - alat) * 110.57
+        if seg2 <= 1e-9:
+            return math.hypot(px, py)
+        t = max(0.0, min(1.0, (px * bx + py * by) / seg2))
+        return math.hypot(px - bx * t, py - by * t)
+
+    def distance(self, lat: float, lon: float) -> float:
+        if not self.route:
+            return 0.0
+        if not self.segments:
+            return haversine_km(lat, lon, self.route[0][0], self.route[0][1])
+        c = self.CELL_DEG
+        cy, cx = math.floor(lat / c), math.floor(lon / c)
+        y0, y1, x0, x1 = self._bounds
+        # Кольцо, после которого сетка маршрута заведомо покрыта целиком
+        last = max(abs(cy - y0), abs(cy - y1), abs(cx - x0), abs(cx - x1))
+        best = None
+        seen = set()
+        for r in range(last + 1):
+            for y in range(cy - r, cy + r + 1):
+                for x in (range(cx - r, cx + r + 1) if y in (cy - r, cy + r) else (cx - r, cx + r)):
+                    for i in self.cells.get((y, x), ()):
+                        if i not in seen:
+                            seen.add(i)
+                            d = self._segment_km(i, lat, lon)
+                            best = d if best is None or d < best else best
+            # Всё, что дальше кольца r, не ближе r·ячейка
+            if best is not None and best <= r * self._ring_km:
+                break
+        return best or 0.0
+
+
+# Коридоры рейсов: маршрут не меняется за время рейса, и пересчитывать
+# его на каждый разбор незачем
+_corridors: 'OrderedDict[int, CorridorIndex]' = OrderedDict()
+_corridors_lock = threading.Lock()
+CORRIDOR_CACHE = 256
+
+
+def _corridor(db, trip_id: int, depot_id) -> CorridorIndex:
+    with _corridors_lock:
+        idx = _corridors.get(trip_id)
+        if idx is not None:
+            _corridors.move_to_end(trip_id)
+            return idx
+    # Точки маршрута: нефтебаза плюс станции рейса в порядке объезда
+    route = _rows(db.execute_query(
+        "SELECT LAT, LON FROM (SELECT d.LAT, d.LON, 0 AS STOP_NO FROM PECO_DEPOTS d "
+        "WHERE d.ID = :p_d "
+        "UNION ALL "
+        "SELECT s.LAT, s.LON, st.STOP_NO FROM PECO_TRIP_STOPS st "
+        "JOIN PECO_STATIONS s ON s.ID = st.STATION_ID "
+        "WHERE st.TRIP_ID = :p_tr AND s.LAT IS NOT NULL) ORDER BY STOP_NO",
+        {'p_d': depot_id, 'p_tr': int(trip_id)}))
+    idx = CorridorIndex([(float(r['lat']), float(r['lon'])) for r in route
+                         if r.get('lat') is not None])
+    with _corridors_lock:
+        _corridors[trip_id] = idx
+        while len(_corridors) > CORRIDOR_CACHE:
+            _corridors.popitem(last=False)
+    return idx
+
+
+def _ts_out(ts) -> Optional[str]:
+    return ts.isoformat() if ts is not None else None
+
+
+def _ts_in(value) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class TripScanner:
+    """
+    Потоковый разбор трека: пинги подаются порциями по времени, открытые
+    эпизоды (стоянка, съезд с коридора, открытая пломба) живут в state()
+    между вызовами. Детекторы и тексты событий — прежние.
+    """
+
+    def __init__(self, corridor: CorridorIndex, state: Optional[Dict[str, Any]] = None):
+        self.corridor = corridor
+        state = state or {}
+        stop = state.get('stop')
+        dev = state.get('dev')
+        seal = state.get('seal')
+        self.stop_start = (_ts_in(stop[0]), stop[1], stop[2]) if stop else None
+        self.dev_open = (_ts_in(dev[0]), dev[1], dev[2], dev[3]) if dev else None
+        self.seal_open = (_ts_in(seal[0]), seal[1], seal[2]) if seal else None
+        self.last_ts: Optional[datetime] = _ts_in(state.get('last_ts'))
+        # Ключи (тип, минута) уже записанных событий: превышение скорости
+        # пишется по пингу, и минута может разойтись на две порции
+        self.seen = {tuple(k) for k in state.get('seen') or []}
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            'stop': ([_ts_out(self.stop_start[0]), self.stop_start[1], self.stop_start[2]]
+                     if self.stop_start else None),
+            'dev': ([_ts_out(self.dev_open[0])] + list(self.dev_open[1:])
+                    if self.dev_open else None),
+            'seal': ([_ts_out(self.seal_open[0]), self.seal_open[1], self.seal_open[2]]
+                     if self.seal_open else None),
+            'last_ts': _ts_out(self.last_ts),
+            # Старше последней минуты ключи уже не совпадут ни с чем
+            'seen': [list(k) for k in self.seen
+                     if self.last_ts and k[1] >= str(self.last_ts)[:16]],
+        }
+
+    def feed(self, pings: List[Dict[str, Any]]) -> List[tuple]:
+        """Строки событий (тип, важность, ts, lat, lon, значение, ru, ro, en)."""
+        out: List[tuple] = []
+
+        def add(ev_type, sev, ts, lat, lon, val, ru, ro, en):
+            key = (ev_type, str(ts)[:16])
+            if key in self.seen:
+                return
+            self.seen.add(key)
+            out.append((ev_type, sev, ts, lat, lon,
+                        round(val, 2) if val is not None else None,
+                        ru[:500], ro[:500], en[:500]))
+
+        for p in pings:
+            lat, lon = float(p['lat']), float(p['lon'])
+            speed = float(p.get('speed_kmh') or 0)
+            ts = p['ts']
+            self.last_ts = ts
+
+            if speed > TH['speed_kmh']:
+                add('speeding', 'warn', ts, lat, lon, speed,
+                    f'Скорость {speed:.0f} км/ч на гружёной цистерне',
+                    f'Viteză {speed:.0f} km/h cu cisterna încărcată',
+                    f'Speed {speed:.0f} km/h with a loaded tanker')
+
+            near = self.corridor.distance(lat, lon) if self.corridor.route else None
+            if near is not None and near > TH['deviation_km']:
+                if self.dev_open is None or near > self.dev_open[1]:
+                    self.dev_open = (ts, near, lat, lon)
+            elif self.dev_open is not None:
+                dts, dnear, dlat, dlon = self.dev_open
+                self.dev_open = None
+                add('route_deviation', 'warn', dts, dlat, dlon, dnear,
+                    f'Съезд с маршрута, максимум {dnear:.1f} км от коридора',
+                    f'Ieșire de pe traseu, maxim {dnear:.1f} km de la coridor',
+                    f'Off-route excursion, up to {dnear:.1f} km from the corridor')
+
+            # Пломба: один сигнал на эпизод, а не на каждый пинг.
+            # Открытая пломба держится минутами, и десяток
+            # одинаковых строк в журнале только прячет остальные.
+            if p.get('seal_closed') == 0:
+                if self.seal_open is None:
+                    self.seal_open = (ts, lat, lon)
+            elif self.seal_open is not None:
+                sts, slat, slon = self.seal_open
+                mins = (ts - sts).total_seconds() / 60.0
+                self.seal_open = None
+                add('seal_open', 'crit', sts, slat, slon, mins,
+                    f'Пломба горловины открыта {mins:.0f} мин вне точки слива',
+                    f'Sigiliul deschis {mins:.0f} min în afara punctului de descărcare',
+                    f'Discharge seal open for {mins:.0f} min outside a delivery point')
+
+            # Остановка: копим, пока скорость около нуля
+            if speed < 3:
+                if self.stop_start is None:
+                    self.stop_start = (ts, lat, lon)
+            elif self.stop_start is not None:
+                sts, slat, slon = self.stop_start
+                mins = (ts - sts).total_seconds() / 60.0
+                d = self.corridor.distance(slat, slon) if self.corridor.route else 99.0
+                if mins >= TH['stop_minutes'] and d > TH['stop_radius_km']:
+                    add('unplanned_stop', 'crit', sts, slat, slon, mins,
+                        f'Стоянка {mins:.0f} мин в {d:.1f} км от точек маршрута',
+                        f'Staționare {mins:.0f} min la {d:.1f} km de traseu',
+                        f'{mins:.0f} min stop {d:.1f} km away from the route')
+                self.stop_start = None
+        return out
+
+
+def _clob(value) -> Optional[str]:
+    return value.read() if hasattr(value, 'read') else value
+
+
 def _rows(res) -> List[Dict[str, Any]]:
     if not res or not res.get('success'):
         return []
@@ -102,6 +333,81 @@ def _rows(res) -> List[Dict[str, Any]]:
     return [dict(zip(cols, r)) for r in (res.get('data') or [])]
 
 
+# Пачка пингов пишется одним executemany; ID выдаёт триггер PECO_GPS_PINGS_BI
+INGEST_SQL = (
+    "INSERT INTO PECO_GPS_PINGS (TRUCK_ID, TRIP_ID, TS, LAT, LON, SPEED_KMH, HEADING, "
+    "IGNITION, SEAL_CLOSED, FUEL_L, PROVIDER_ID) "
+    "VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9, :10, :11)")
+# Типы заданы явно: в пачке None и числа вперемешку, и тип колонки не должен
+# зависеть от того, что пришло в первой строке
+INGEST_TYPES = ([oracledb.DB_TYPE_NUMBER] * 2 + [oracledb.DB_TYPE_TIMESTAMP]
+                + [oracledb.DB_TYPE_NUMBER] * 8)
+
+# Разбор берёт пинги, принятые не позже этого: ID выдаётся при вставке,
+# и пачка с меньшими ID может зафиксироваться позже соседней
+INGEST_SETTLE_SEC = 30
+
+LOOKUP_TTL_SEC = 60.0       # машины и активные рейсы меняются редко
+LOOKUP_RETRY_SEC = 5.0      # неизвестное устройство перечитывает справочник не чаще
+
+_lookup: Dict[str, Any] = {'at': 0.0, 'trucks': {}, 'trips': {}}
+_lookup_lock = threading.Lock()
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    """ISO-время пинга провайдера; пусто — None (время приёма ставит ingest)."""
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value)[:19])
+
+
+def _received_ts(start: datetime, n: int) -> datetime:
+    """
+    Время приёма для n-го пинга пачки без ts. Одно SYSTIMESTAMP на всю
+    пачку совпало бы у всех таких пингов машины, и уникальный индекс
+    (TRUCK_ID, TS) принял бы их за повторы; поэтому каждому — своё
+    время, с шагом в микросекунду.
+    """
+    return start + timedelta(microseconds=n)
+
+
+def _num(value) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _device_lookup(db, missing: bool = False) -> Tuple[Dict[str, int], Dict[int, int]]:
+    """
+    (устройство → машина, машина → активный рейс) из кеша процесса.
+
+    Раньше оба справочника читались на каждую пачку. Кеш живёт
+    LOOKUP_TTL_SEC; missing=True — в пачке есть незнакомое устройство,
+    справочник перечитывается раньше, но не чаще LOOKUP_RETRY_SEC.
+    """
+    with _lookup_lock:
+        age = time.time() - _lookup['at']
+        if age < (LOOKUP_RETRY_SEC if missing else LOOKUP_TTL_SEC):
+            return _lookup['trucks'], _lookup['trips']
+    trucks = {str(r['gps_device_id']): int(r['id']) for r in _rows(db.execute_query(
+        "SELECT ID, GPS_DEVICE_ID FROM PECO_TRUCKS "
+        "WHERE GPS_DEVICE_ID IS NOT NULL AND ACTIVE = 1"))}
+    # Активный рейс машины: пинг привязывается к нему,
+    # иначе телеметрия повиснет без контекста маршрута
+    trips = {int(r['truck_id']): int(r['id']) for r in _rows(db.execute_query(
+        "SELECT ID, TRUCK_ID FROM PECO_TRIPS "
+        "WHERE STATUS IN ('loading','en_route') ORDER BY ID"))}
+    with _lookup_lock:
+        _lookup.update(at=time.time(), trucks=trucks, trips=trips)
+    return trucks, trips
+
+
+def invalidate_lookup():
+    """Сброс кеша устройств и рейсов — после смены статуса рейса или машины."""
+    with _lookup_lock:
+        _lookup['at'] = 0.0
+
+
 class PecoGps:
     """Приём пингов и разбор их в события."""
 
@@ -140,43 +446,65 @@ class PecoGps:
                             "seal_closed": 1, "fuel_l": ..}, ...]}
         Неизвестный device_id не роняет пачку — он считается пропущенным
         и возвращается в ответе: у провайдера могут быть чужие машины.
+
+        Пачка пишется одним executemany. Повтор уже принятого пинга
+        (та же машина и время) отсекает уникальный индекс — он возвращается
+        в duplicates, а не в ошибку: провайдер повторяет пачку при таймауте.
+        Строка с битыми полями отклоняется одна (rejected), остальные
+        принимаются. Пинг без ts получает время приёма — у каждого своё
+        (_received_ts); такой пинг повтор пачки уже не отсечёт.
         """
         pings = payload.get('pings') or ([payload] if payload.get('device_id') else [])
         if not pings:
             return {'success': False, 'error': 'Пустая пачка телеметрии', 'status': 400}
         try:
             with DatabaseModel() as db:
-                trucks = {r['gps_device_id']: r for r in _rows(db.execute_query(
-                    "SELECT ID, GPS_DEVICE_ID FROM PECO_TRUCKS "
-                    "WHERE GPS_DEVICE_ID IS NOT NULL AND ACTIVE = 1"))}
-                # Активный рейс машины: пинг привязывается к нему,
-                # иначе телеметрия повиснет без контекста маршрута
-                trips = {int(r['truck_id']): int(r['id']) for r in _rows(db.execute_query(
-                    "SELECT ID, TRUCK_ID FROM PECO_TRIPS "
-                    "WHERE STATUS IN ('loading','en_route') ORDER BY ID"))}
-                accepted, unknown = 0, []
-                for p in pings:
+                trucks, trips = _device_lookup(db)
+                devices = {str(p.get('device_id') or '') for p in pings}
+                if not devices <= trucks.keys():
+                    # Машину могли подключить минуту назад — перечитываем
+                    # справочник, но не чаще LOOKUP_RETRY_SEC
+                    trucks, trips = _device_lookup(db, missing=True)
+
+                rows, src, unknown, rejected = [], [], [], []
+                received, no_ts = datetime.now(), 0
+                for i, p in enumerate(pings):
                     dev = str(p.get('device_id') or '')
-                    truck = trucks.get(dev)
-                    if not truck:
+                    truck_id = trucks.get(dev)
+                    if truck_id is None:
                         unknown.append(dev)
                         continue
-                    ts = p.get('ts')
-                    db.execute_query(
-                        "INSERT INTO PECO_GPS_PINGS (TRUCK_ID, TRIP_ID, TS, LAT, LON, "
-                        "SPEED_KMH, HEADING, IGNITION, SEAL_CLOSED, FUEL_L, PROVIDER_ID) "
-                        "VALUES (:p_t, :p_tr, "
-                        " NVL(TO_TIMESTAMP(:p_ts, 'YYYY-MM-DD\"T\"HH24:MI:SS'), SYSTIMESTAMP), "
-                        " :p_lat, :p_lon, :p_sp, :p_hd, :p_ig, :p_seal, :p_fuel, :p_pr)",
-                        {'p_t': int(truck['id']), 'p_tr': trips.get(int(truck['id'])),
-                         'p_ts': (ts or '')[:19] or None,
-                         'p_lat': float(p.get('lat') or 0), 'p_lon': float(p.get('lon') or 0),
-                         'p_sp': p.get('speed'), 'p_hd': p.get('heading'),
-                         'p_ig': p.get('ignition'), 'p_seal': p.get('seal_closed'),
-                         'p_fuel': p.get('fuel_l'), 'p_pr': provider.get('id')})
-                    accepted += 1
-                db.connection.commit()
-            return {'success': True, 'accepted': accepted,
+                    try:
+                        ts = _parse_ts(p.get('ts'))
+                        if ts is None:
+                            ts = _received_ts(received, no_ts)
+                            no_ts += 1
+                        rows.append((truck_id, trips.get(truck_id), ts,
+                                     _num(p.get('lat')) or 0.0, _num(p.get('lon')) or 0.0,
+                                     _num(p.get('speed')), _num(p.get('heading')),
+                                     _num(p.get('ignition')), _num(p.get('seal_closed')),
+                                     _num(p.get('fuel_l')), provider.get('id')))
+                        src.append(i)
+                    except (TypeError, ValueError) as e:
+                        rejected.append({'index': i, 'device_id': dev, 'error': str(e)})
+
+                duplicates, failed = 0, 0
+                if rows:
+                    cur = db.connection.cursor()
+                    cur.setinputsizes(*INGEST_TYPES)
+                    cur.executemany(INGEST_SQL, rows, batcherrors=True)
+                    for err in cur.getbatcherrors():
+                        if err.code == 1:               # ORA-00001: пинг уже принят
+                            duplicates += 1
+                            continue
+                        failed += 1
+                        ping = pings[src[err.offset]]
+                        rejected.append({'index': src[err.offset],
+                                         'device_id': str(ping.get('device_id') or ''),
+                                         'error': err.message})
+                    db.connection.commit()
+            return {'success': True, 'accepted': len(rows) - duplicates - failed,
+                    'duplicates': duplicates, 'rejected': rejected,
                     'unknown_devices': sorted(set(unknown))}
         except Exception as e:                                   # noqa: BLE001
             return {'success': False, 'error': str(e)}
@@ -184,122 +512,101 @@ class PecoGps:
     # ==================== Разбор в события ====================
 
     @staticmethod
-    def analyze(trip_id: Optional[int] = None) -> Dict[str, Any]:
+    def analyze(trip_id: Optional[int] = None, rebuild: bool = False) -> Dict[str, Any]:
         """
-        Разбор телеметрии рейса в события.
+        Разбор телеметрии рейса в события — инкрементально.
+
+        Берутся только рейсы, у которых есть пинги, принятые после
+        водяного знака (PECO_GPS_TRIP_STATE.WATERMARK_ID — ID пинга, то
+        есть порядок приёма), и только эти пинги. Незакрытые эпизоды
+        (стоянка, съезд, открытая пломба) переживают вызов в STATE_JSON,
+        поэтому эпизод, начатый в одной пачке и закрытый в следующей,
+        даёт то же событие, что и разбор всего трека разом.
 
-        Считается по последовательности пингов: остановки (скорость ~0),
-        удаление от ближайшей точки маршрута, скорость, срыв пломбы.
-        Повторно найденное событие не дублируется — совпадение по типу
-        и минуте времени.
+        Пинг, досланный с временем старше уже разобранных, не теряется:
+        детекторы идут по времени, поэтому рейс разбирается заново с
+        первого пинга, как при rebuild.
+
+        rebuild=True — разобрать рейс(ы) заново с первого пинга: уже
+        записанные события не дублируются (совпадение по типу и минуте).
         """
         try:
             with DatabaseModel() as db:
+                if rebuild:
+                    db.execute_query(
+                        "DELETE FROM PECO_GPS_TRIP_STATE"
+                        + (" WHERE TRIP_ID = :p_id" if trip_id else ""),
+                        {'p_id': trip_id} if trip_id else {})
+                settled = "RECEIVED_AT < SYSTIMESTAMP - NUMTODSINTERVAL(:p_settle, 'SECOND')"
+                params = {'p_settle': INGEST_SETTLE_SEC}
+                if trip_id:
+                    params['p_id'] = trip_id
                 trips = _rows(db.execute_query(
-                    "SELECT ID, TRUCK_ID, DEPOT_ID FROM PECO_TRIPS "
-                    + ("WHERE ID = :p_id" if trip_id else
-                       "WHERE STATUS IN ('loading','en_route','done')"),
-                    {'p_id': trip_id} if trip_id else {}))
-                created = 0
+                    "SELECT t.ID, t.TRUCK_ID, t.DEPOT_ID, s.WATERMARK_ID, s.STATE_JSON "
+                    "FROM PECO_TRIPS t LEFT JOIN PECO_GPS_TRIP_STATE s ON s.TRIP_ID = t.ID "
+                    + ("WHERE t.ID = :p_id " if trip_id else
+                       "WHERE t.STATUS IN ('loading','en_route','done') ")
+                    + "AND EXISTS (SELECT 1 FROM PECO_GPS_PINGS p WHERE p.TRIP_ID = t.ID "
+                      "AND (s.WATERMARK_ID IS NULL OR p.ID > s.WATERMARK_ID) AND p." + settled + ")",
+                    params))
+                created, scanned = 0, 0
+                cur = db.connection.cursor()
                 for tr in trips:
-                    pings = _rows(db.execute_query(
-                        "SELECT TS, LAT, LON, SPEED_KMH, IGNITION, SEAL_CLOSED "
-                        "FROM PECO_GPS_PINGS WHERE TRIP_ID = :p_tr ORDER BY TS",
-                        {'p_tr': int(tr['id'])}))
-                    if len(pings) < 2:
+                    tid = int(tr['id'])
+                    params = {'p_tr': tid, 'p_settle': INGEST_SETTLE_SEC}
+                    sql = ("SELECT ID, TS, LAT, LON, SPEED_KMH, IGNITION, SEAL_CLOSED "
+                           "FROM PECO_GPS_PINGS WHERE TRIP_ID = :p_tr AND " + settled)
+                    replay = tr['watermark_id'] is None
+                    if not replay:
+                        params['p_wm'] = tr['watermark_id']
+                    new = _rows(db.execute_query(
+                        sql + ("" if replay else " AND ID > :p_wm") + " ORDER BY TS, ID", params))
+                    if not new:
                         continue
-                    # Точки маршрута: нефтебаза плюс станции рейса
-                    route = _rows(db.execute_query(
-                        "SELECT d.LAT, d.LON FROM PECO_DEPOTS d WHERE d.ID = :p_d "
-                        "UNION ALL "
-                        "SELECT s.LAT, s.LON FROM PECO_TRIP_STOPS st "
-                        "JOIN PECO_STATIONS s ON s.ID = st.STATION_ID "
-                        "WHERE st.TRIP_ID = :p_tr AND s.LAT IS NOT NULL",
-                        {'p_d': tr['depot_id'], 'p_tr': int(tr['id'])}))
-                    pts = [(float(r['lat']), float(r['lon'])) for r in route
-                           if r.get('lat') is not None]
-
-                    existing = {(r['event_type'], str(r['ts'])[:16]) for r in _rows(
-                        db.execute_query(
-                            "SELECT EVENT_TYPE, TS FROM PECO_GPS_EVENTS WHERE TRIP_ID = :p_tr",
-                            {'p_tr': int(tr['id'])}))}
-
-                    def add(ev_type, sev, ts, lat, lon, val, ru, ro, en):
-                        nonlocal created
-                        key = (ev_type, str(ts)[:16])
-                        if key in existing:
-                            return
-                        existing.add(key)
-                        db.execute_query(
+                    state = _clob(tr.get('state_json'))
+                    corridor = _corridor(db, tid, tr['depot_id'])
+                    scanner = TripScanner(corridor, json.loads(state) if state else None)
+                    pings = new
+                    if not replay and scanner.last_ts is not None and new[0]['ts'] < scanner.last_ts:
+                        # Провайдер дослал пинги старше уже разобранных —
+                        # рейс заново с первого пинга
+                        replay = True
+                        scanner = TripScanner(corridor)
+                        del params['p_wm']
+                        pings = _rows(db.execute_query(sql + " ORDER BY TS, ID", params))
+                    if replay:
+                        # Первый разбор рейса, rebuild или досланные пинги:
+                        # события прежних разборов уже в журнале — не повторяем их
+                        scanner.seen = {(r['event_type'], str(r['ts'])[:16]) for r in _rows(
+                            db.execute_query(
+                                "SELECT EVENT_TYPE, TS FROM PECO_GPS_EVENTS WHERE TRIP_ID = :p_tr",
+                                {'p_tr': tid}))}
+                    events = scanner.feed(pings)
+                    watermark = max(int(p['id']) for p in pings)
+                    if events:
+                        cur.executemany(
                             "INSERT INTO PECO_GPS_EVENTS (TRUCK_ID, TRIP_ID, EVENT_TYPE, "
                             "SEVERITY, TS, LAT, LON, VALUE_NUM, MESSAGE_RU, MESSAGE_RO, "
-                            "MESSAGE_EN) VALUES (:p_t, :p_tr, :p_ty, :p_s, :p_ts, :p_lat, "
-                            ":p_lon, :p_v, :p_ru, :p_ro, :p_en)",
-                            {'p_t': int(tr['truck_id']), 'p_tr': int(tr['id']),
-                             'p_ty': ev_type, 'p_s': sev, 'p_ts': ts, 'p_lat': lat,
-                             'p_lon': lon, 'p_v': round(val, 2) if val is not None else None,
-                             'p_ru': ru[:500], 'p_ro': ro[:500], 'p_en': en[:500]})
-                        created += 1
-
-                    stop_start = None
-                    dev_open = None
-                    seal_open = None
-                    for i, p in enumerate(pings):
-                        lat, lon = float(p['lat']), float(p['lon'])
-                        speed = float(p.get('speed_kmh') or 0)
-                        ts = p['ts']
-
-                        if speed > TH['speed_kmh']:
-                            add('speeding', 'warn', ts, lat, lon, speed,
-                                f'Скорость {speed:.0f} км/ч на гружёной цистерне',
-                                f'Viteză {speed:.0f} km/h cu cisterna încărcată',
-                                f'Speed {speed:.0f} km/h with a loaded tanker')
-
-                        near = distance_to_corridor_km(lat, lon, pts) if pts else None
-                        if near is not None and near > TH['deviation_km']:
-                            if dev_open is None or near > dev_open[1]:
-                                dev_open = (ts, near, lat, lon)
-                        elif dev_open is not None:
-                            dts, dnear, dlat, dlon = dev_open
-                            dev_open = None
-                            add('route_deviation', 'warn', dts, dlat, dlon, dnear,
-                                f'Съезд с маршрута, максимум {dnear:.1f} км от коридора',
-                                f'Ieșire de pe traseu, maxim {dnear:.1f} km de la coridor',
-                                f'Off-route excursion, up to {dnear:.1f} km from the corridor')
-
-                        # Пломба: один сигнал на эпизод, а не на каждый пинг.
-                        # Открытая пломба держится минутами, и десяток
-                        # одинаковых строк в журнале только прячет остальные.
-                        if p.get('seal_closed') == 0:
-                            if seal_open is None:
-                                seal_open = (ts, lat, lon)
-                        elif seal_open is not None:
-                            sts, slat, slon = seal_open
-                            mins = (ts - sts).total_seconds() / 60.0
-                            seal_open = None
-                            add('seal_open', 'crit', sts, slat, slon, mins,
-                                f'Пломба горловины открыта {mins:.0f} мин вне точки слива',
-                                f'Sigiliul deschis {mins:.0f} min în afara punctului de descărcare',
-                                f'Discharge seal open for {mins:.0f} min outside a delivery point')
-
-                        # Остановка: копим, пока скорость около нуля
-                        if speed < 3:
-                            if stop_start is None:
-                                stop_start = (ts, lat, lon)
-                        else:
-                            if stop_start is not None:
-                                mins = (ts - stop_start[0]).total_seconds() / 60.0
-                                d = (distance_to_corridor_km(stop_start[1], stop_start[2], pts)
-                                     if pts else 99.0)
-                                if mins >= TH['stop_minutes'] and d > TH['stop_radius_km']:
-                                    add('unplanned_stop', 'crit', stop_start[0],
-                                        stop_start[1], stop_start[2], mins,
-                                        f'Стоянка {mins:.0f} мин в {d:.1f} км от точек маршрута',
-                                        f'Staționare {mins:.0f} min la {d:.1f} km de traseu',
-                                        f'{mins:.0f} min stop {d:.1f} km away from the route')
-                                stop_start = None
+                            "MESSAGE_EN) VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9, :10, :11)",
+                            [(int(tr['truck_id']), tid) + ev for ev in events])
+                    cur.execute(
+                        "MERGE INTO PECO_GPS_TRIP_STATE s USING (SELECT :p_tr AS TRIP_ID FROM DUAL) x "
+                        "ON (s.TRIP_ID = x.TRIP_ID) "
+                        "WHEN MATCHED THEN UPDATE SET WATERMARK_ID = :p_wm, WATERMARK_TS = :p_ts, "
+                        "  STATE_JSON = :p_st, PINGS_SEEN = PINGS_SEEN + :p_n, UPDATED_AT = SYSTIMESTAMP "
+                        "WHEN NOT MATCHED THEN INSERT (TRIP_ID, WATERMARK_ID, WATERMARK_TS, "
+                        "  STATE_JSON, PINGS_SEEN) VALUES (:p_tr2, :p_wm2, :p_ts2, :p_st2, :p_n2)",
+                        {'p_tr': tid, 'p_tr2': tid, 'p_wm': watermark, 'p_wm2': watermark,
+                         'p_ts': scanner.last_ts, 'p_ts2': scanner.last_ts,
+                         'p_st': json.dumps(scanner.state()),
+                         'p_st2': json.dumps(scanner.state()),
+                         'p_n': len(new), 'p_n2': len(new)})
+                    # События и водяной знак — одной транзакцией: сбой между
+                    # ними не даст ни потерянных, ни повторных событий
                     db.connection.commit()
-            return {'success': True, 'events': created}
+                    created += len(events)
+                    scanned += len(pings)
+            return {'success': True, 'events': created, 'trips': len(trips), 'pings': scanned}
         except Exception as e:                                   # noqa: BLE001
             return {'success': False, 'error': str(e)}
 
@@ -11,23 +11,32 @@
    стоимости (импорт / рынок ↔ своя или чужая нефтебаза ↔ АЗС);
 3. результат оптимизатора → обратно в строки заказа (путь и цена литра).
 
-Oracle-объекты: sql/110_peco_algorithms.sql, sql/111_peco_paths_demo.sql
+Oracle-объекты: sql/110_peco_algorithms.sql, sql/111_peco_paths_demo.sql,
+sql/119_peco_backtest_cache.sql
 """
 from __future__ import annotations
 
+import hashlib
+import json
 import math
 import os
 import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import date, timedelta
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
-from models.database import DatabaseModel
+from models.database import DatabaseConnection, DatabaseModel
 from models import peco_forecast as fc
 from models import peco_sourcing as srcng
+from models import run_queue
 
 HISTORY_DAYS = 120        # сколько истории поднимаем под прогноз
 DEFAULT_ALGORITHM = 'theta'
@@ -44,6 +53,155 @@ def _rows(res) -> List[Dict[str, Any]]:
 # ==================== История отпуска ====================
 
 
+# Хранилище истории. Раньше каждый автозаказ и каждый прогон backtest
+# поднимали из PECO_TANK_DAILY все строки окна и заново строили
+# календарные ряды. Теперь история живёт в процессе: полная загрузка —
+# один раз, дальше на каждый вызов один агрегат-«штамп» (MAX(ORA_ROWSCN),
+# COUNT(*), MAX(SALE_DATE)), и при изменении дочитываются только строки
+# с ORA_ROWSCN выше прежнего — новые и исправленные (UPDATE LITERS
+# старого дня тоже поднимает SCN). ORA_ROWSCN без ROWDEPENDENCIES — SCN
+# блока, поэтому дочитывается и часть соседних строк; они просто
+# перезаписываются теми же значениями. Удаление с вставкой того же
+# числа строк штамп может не заметить — на этот случай раз
+# в HISTORY_RELOAD_SEC история перечитывается целиком.
+HISTORY_RELOAD_SEC = 3600
+
+
+class TankHistoryStore:
+    """
+    Суточный отпуск по резервуарам в процессе, с версией.
+
+    Резервуар хранится компактно: марка, дата первого дня и `array('d')`
+    по календарю, где NaN — «данных нет». Готовые ряды под окно
+    и марку (`history`) собираются один раз на версию и отдаются всем
+    вызывающим одними и теми же массивами — их нельзя менять на месте.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.days = 0
+        self.last: Optional[date] = None
+        self._tanks: Dict[int, List[Any]] = {}          # tank_id -> [grade, first, array('d')]
+        self._stamp: Optional[Tuple] = None
+        self._loaded_at = 0.0
+        self._views: Dict[Tuple[int, Optional[str]], Dict[int, Dict[str, Any]]] = {}
+
+    def history(self, db, days: int, grade_code: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            self._refresh(db, days)
+            key = (days, grade_code)
+            view = self._views.get(key)
+            if view is None:
+                view = self._views[key] = self._view(days, grade_code)
+            return view
+
+    def _refresh(self, db, days: int) -> None:
+        stamp_rows = _rows(db.execute_query(
+            "SELECT MAX(ORA_ROWSCN) AS SCN, COUNT(*) AS CNT, MAX(SALE_DATE) AS LAST_DATE "
+            "FROM PECO_TANK_DAILY"))
+        st = stamp_rows[0] if stamp_rows else {}
+        stamp = (st.get('scn'), st.get('cnt'), _day(st.get('last_date')))
+        if (days > self.days or self._stamp is None
+                or time.monotonic() - self._loaded_at > HISTORY_RELOAD_SEC
+                or (stamp[1] or 0) < (self._stamp[1] or 0)):
+            # Первая загрузка, окно шире загруженного, плановая перезагрузка
+            # или строки удалены — читаем окно целиком
+            keep = max(days, self.days, HISTORY_DAYS + BT_ANCHOR_DAYS)
+            self._tanks = {}
+            self._apply(_rows(db.execute_query(
+                "SELECT TANK_ID, GRADE_CODE, SALE_DATE, LITERS FROM PECO_TANK_DAILY "
+                "WHERE SALE_DATE > (SELECT MAX(SALE_DATE) - :p_d FROM PECO_TANK_DAILY)",
+                {'p_d': keep})), stamp[2], keep)
+            self.days = keep
+            self._loaded_at = time.monotonic()
+        elif stamp != self._stamp:
+            self._apply(_rows(db.execute_query(
+                "SELECT TANK_ID, GRADE_CODE, SALE_DATE, LITERS FROM PECO_TANK_DAILY "
+                "WHERE ORA_ROWSCN > :p_scn",
+                {'p_scn': self._stamp[0] or 0})), stamp[2], self.days)
+        else:
+            return
+        self._stamp = stamp
+        self.version += 1
+        self._views = {}
+
+    def _apply(self, rows: List[Dict[str, Any]], last: Optional[date], keep: int) -> None:
+        """Строки — в календарные массивы; всё старше окна отрезается."""
+        self.last = last
+        if last is None:
+            self._tanks = {}
+            return
+        lo = last - timedelta(days=keep - 1)
+        tanks = self._tanks
+        for r in rows:
+            d = _day(r['sale_date'])
+            if d is None or d < lo:
+                continue
+            tid = int(r['tank_id'])
+            t = tanks.get(tid)
+            if t is None:
+                t = tanks[tid] = [r.get('grade_code'), d, array('d')]
+            first, vals = t[1], t[2]
+            if d < first:
+                vals[0:0] = array('d', [math.nan]) * (first - d).days
+                t[1] = first = d
+            i = (d - first).days
+            if i >= len(vals):
+                vals.extend([math.nan] * (i - len(vals) + 1))
+            vals[i] = float(r['liters'] or 0)
+        for t in tanks.values():
+            if t[1] < lo:
+                del t[2][:(lo - t[1]).days]
+                t[1] = lo
+
+    def _view(self, days: int, grade_code: Optional[str]) -> Dict[int, Dict[str, Any]]:
+        if self.last is None:
+            return {}
+        lo = self.last - timedelta(days=days - 1)
+        picked = []
+        for tid in sorted(self._tanks):
+            grade, first, vals = self._tanks[tid]
+            if grade_code and grade != grade_code:
+                continue
+            skip = max(0, (lo - first).days)
+            obs = [i for i in range(skip, len(vals)) if vals[i] == vals[i]]
+            if obs:
+                picked.append((tid, first, vals, obs))
+        if not picked:
+            return {}
+        # Конец рядов — последний день с данными среди выбранных резервуаров
+        last = max(first + timedelta(days=obs[-1]) for _tid, first, _v, obs in picked)
+
+        out: Dict[int, Dict[str, Any]] = {}
+        for tid, first, vals, obs in picked:
+            ordered = sorted(vals[i] for i in obs)
+            med = ordered[len(ordered) // 2]
+            start = first + timedelta(days=obs[0])
+            n = (last - start).days + 1
+            series = array('d', vals[obs[0]:obs[0] + n])
+            if len(series) < n:
+                series.extend([math.nan] * (n - len(series)))
+            if len(obs) < n:
+                for i, v in enumerate(series):
+                    if v != v:
+                        series[i] = med
+            wd0 = start.weekday()
+            out[tid] = {'series': series,
+                        'weekdays': array('b', [(wd0 + i) % 7 for i in range(n)]),
+                        'last_date': last}
+        return out
+
+
+def _day(value) -> Optional[date]:
+    if value is None:
+        return None
+    return value.date() if hasattr(value, 'date') else value
+
+
+_history = TankHistoryStore()
+
+
 def load_tank_history(db, days: int = HISTORY_DAYS,
                       grade_code: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
     """
@@ -54,40 +212,11 @@ def load_tank_history(db, days: int = HISTORY_DAYS,
     сдвинуть ряд на день, недельный профиль (пятница против вторника)
     развалится. Дырки закрываются медианой резервуара — консервативно
     и не тянет прогноз ни вверх, ни вниз.
+
+    Ряды берутся из TankHistoryStore процесса: `series` — `array('d')`,
+    `weekdays` — `array('b')`, общие для всех вызывающих.
     """
-    sql = ("SELECT TANK_ID, SALE_DATE, LITERS FROM PECO_TANK_DAILY "
-           "WHERE SALE_DATE > (SELECT MAX(SALE_DATE) - :p_d FROM PECO_TANK_DAILY)")
-    params: Dict[str, Any] = {'p_d': days}
-    if grade_code:
-        sql += " AND GRADE_CODE = :p_g"
-        params['p_g'] = grade_code
-    sql += " ORDER BY TANK_ID, SALE_DATE"
-
-    raw = _rows(db.execute_query(sql, params))
-    by_tank: Dict[int, Dict[date, float]] = {}
-    all_dates: List[date] = []
-    for r in raw:
-        d = r['sale_date']
-        d = d.date() if hasattr(d, 'date') else d
-        by_tank.setdefault(int(r['tank_id']), {})[d] = float(r['liters'] or 0)
-        all_dates.append(d)
-    if not all_dates:
-        return {}
-    last = max(all_dates)
-
-    out: Dict[int, Dict[str, Any]] = {}
-    for tank_id, dmap in by_tank.items():
-        first = min(dmap)
-        vals = sorted(dmap.values())
-        med = vals[len(vals) // 2] if vals else 0.0
-        series, weekdays = [], []
-        cur = first
-        while cur <= last:
-            series.append(dmap.get(cur, med))
-            weekdays.append(cur.weekday())
-            cur += timedelta(days=1)
-        out[tank_id] = {'series': series, 'weekdays': weekdays, 'last_date': last}
-    return out
+    return _history.history(db, days, grade_code)
 
 
 def future_weekdays(last_day: date, horizon: int) -> List[int]:
@@ -131,6 +260,24 @@ def forecast_tank(hist: Dict[str, Any], algorithm: str, horizon: int,
         return None
 
 
+def forecast_chunk(task: Tuple) -> List[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Прогноз пачки резервуаров одним алгоритмом — задача pool_map для
+    прогона автозаказа. То же, что forecast_tank, кроме проверки минимума
+    истории: реестр ALGO_MIN_HISTORY загружен в процессе-родителе, и он
+    отбирает резервуары сам.
+    """
+    algorithm, horizon, params, items = task
+    out = []
+    for tank_id, series, weekdays, last_date in items:
+        try:
+            out.append((tank_id, fc.run_forecast(algorithm, series, weekdays, horizon,
+                                                 future_weekdays(last_date, horizon), params)))
+        except Exception:                                        # noqa: BLE001
+            out.append((tank_id, None))
+    return out
+
+
 # Минимум истории. Значение живёт в реестре `PECO_FCT_ALGORITHMS` — это
 # то же число, которое видит пользователь в карточке алгоритма. Здесь
 # только КЭШ на время процесса: ходить в Oracle на каждый из 184 баков
@@ -292,7 +439,8 @@ def build_plan(run_id: Optional[int] = None, money_rate: float = DEFAULT_MONEY_R
             dist_src = load_paths(db, 'distribution')
             dep_need = depot_demands(db, import_lead_days)
             repl_src = load_paths(db, 'replenishment')
-        plan = srcng.solve_supply_plan(dem, dist_src, dep_need, repl_src, money_rate)
+        plan = srcng.solve_supply_plan(dem, dist_src, dep_need, repl_src, money_rate,
+                                       warm=True)
         # Литры и стоимость понятны только вместе с адресом: подшиваем имена
         by_key = {d['key']: d for d in dem}
         by_dep = {d['key']: d for d in dep_need}
@@ -333,15 +481,15 @@ def apply_plan_to_items(db, allocations: List[Dict[str, Any]]) -> int:
         if float(a['liters']) > cur['best_l']:
             cur['best_l'] = float(a['liters'])
             cur['path'] = a['path_code']
-    n = 0
+    rows = []
     for item_id, v in agg.items():
         cpl = (v['amount'] / v['liters']) if v['liters'] > 0 else None
-        db.execute_query(
+        rows.append({'p_p': v['path'], 'p_c': round(cpl, 4) if cpl else None, 'p_id': item_id})
+    if rows:
+        db.connection.cursor().executemany(
             "UPDATE PECO_FUEL_ORDER_ITEMS SET PATH_CODE = :p_p, COST_PER_L = :p_c "
-            "WHERE ID = :p_id",
-            {'p_p': v['path'], 'p_c': round(cpl, 4) if cpl else None, 'p_id': item_id})
-        n += 1
-    return n
+            "WHERE ID = :p_id", rows)
+    return len(rows)
 
 
 def explain_demand(station_id: int, grade_code: str, liters: float,
@@ -361,11 +509,166 @@ def explain_demand(station_id: int, grade_code: str, liters: float,
 
 
 # ==================== Backtest алгоритмов ====================
+#
+# Полный прогон — алгоритм × резервуар × срез, и `gbt` / `conformal`
+# переобучаются на каждом срезе. Поэтому:
+#
+#   * резервуары считаются задачами в пуле процессов (_bt_tank), Oracle
+#     остаётся в потоке прогона;
+#   * прогноз каждого среза кэшируется в PECO_FCT_BT_FOLDS по ключу
+#     (резервуар, алгоритм, параметры + ревизия алгоритма, горизонт,
+#     дата среза) с хешем обучающего окна. Срез пересчитывается, только
+#     если окно изменилось;
+#   * чтобы окна вообще могли совпасть между прогонами, начало истории и
+#     точки среза привязаны к КАЛЕНДАРЮ: начало — к сетке BT_ANCHOR_DAYS
+#     суток, срезы — к шагу от начала. Через сутки новых данных обучающие
+#     окна прежних срезов те же, досчитывается только новый срез;
+#     все срезы пересчитываются раз в BT_ANCHOR_DAYS, когда сдвигается начало.
+
+BT_ANCHOR_DAYS = 28       # кратно неделе: сдвиг начала не ломает недельный профиль
+BT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class BacktestCancelled(Exception):
+    pass
+
+
+def bt_step(horizon: int, folds: int) -> int:
+    """Шаг между срезами — как у fc.fold_cuts на полной истории."""
+    return max(1, (HISTORY_DAYS - horizon - 12) // max(1, folds))
+
+
+def anchor_history(h: Dict[str, Any]) -> Tuple[List[float], List[int], date]:
+    """Ряд резервуара с началом, выровненным по сетке BT_ANCHOR_DAYS."""
+    series, weekdays = h['series'], h['weekdays']
+    first = h['last_date'] - timedelta(days=len(series) - 1)
+    skip = -first.toordinal() % BT_ANCHOR_DAYS
+    return series[skip:], weekdays[skip:], first + timedelta(days=skip)
+
+
+def calendar_cuts(n: int, horizon: int, folds: int) -> List[int]:
+    """Срезы на шаге от выровненного начала: дата среза не плывёт с новым днём."""
+    step = bt_step(horizon, folds)
+    first = -(-12 // step) * step
+    return list(range(first, n - horizon + 1, step))[-folds:]
+
+
+def window_hashes(series: Sequence[float], start: date, cuts: Sequence[int]) -> Dict[int, str]:
+    """Хеш обучающего окна series[:cut] для каждого среза — за один проход."""
+    hs = hashlib.sha1(start.isoformat().encode())
+    out, pos = {}, 0
+    for cut in sorted(cuts):
+        for v in series[pos:cut]:
+            hs.update(repr(float(v)).encode())
+            hs.update(b';')
+        pos = cut
+        out[cut] = hs.hexdigest()
+    return out
+
+
+def params_hash(algorithm: str, params: Optional[Dict[str, Any]]) -> str:
+    key = json.dumps({'rev': fc.ALGO_REV.get(algorithm, 0), 'params': params or {}},
+                     sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _bt_tank(task: Tuple) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+    """
+    Backtest одного резервуара всеми алгоритмами. Уровень модуля — задача
+    пиклится в процесс пула; Oracle не трогает.
+    """
+    tank_id, series, weekdays, horizon, folds, cuts, jobs = task
+    out = {}
+    for algo, params, known in jobs:
+        out[algo] = fc.backtest(algo, series, weekdays, horizon, folds, params,
+                                cuts=cuts, known=known)
+    return tank_id, out
+
+
+def pool_map(fn: Callable[[Tuple], Any], tasks: List[Tuple], workers: int):
+    """
+    Результаты fn(task) по мере готовности. При workers=1 или недоступном
+    пуле процессов (eventlet без fork) — в текущем потоке, результат тот же.
+    Если пул сломался по ходу (BrokenProcessPool — процесс убит), задачи,
+    чей результат ещё не отдан, досчитываются в текущем потоке в порядке
+    задач, как в DataGenerator._shard_map.
+    fn — функция уровня модуля: она пиклится в процесс пула.
+    """
+    pool = None
+    if workers > 1 and len(tasks) > 1:
+        try:
+            pool = ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError, ValueError):
+            pool = None
+    if pool is None:
+        for task in tasks:
+            yield fn(task)
+        return
+    futures: List[Tuple[Tuple, Any]] = []       # (задача, future) в порядке задач
+    yielded = set()
+    try:
+        try:
+            for task in tasks:
+                futures.append((task, pool.submit(fn, task)))
+            by_future = {fut: i for i, (_t, fut) in enumerate(futures)}
+            for fut in as_completed(by_future):
+                res = fut.result()
+                yielded.add(by_future[fut])
+                yield res
+            return
+        except (BrokenProcessPool, OSError):
+            rest = ([t for i, (t, _f) in enumerate(futures) if i not in yielded]
+                    + list(tasks[len(futures):]))
+    finally:
+        for _t, fut in futures:
+            fut.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+    for task in rest:
+        yield fn(task)
+
+
+def load_fold_cache(db, horizon: int, since: date) -> Dict[Tuple, Tuple[str, float]]:
+    rows = _rows(db.execute_query(
+        "SELECT TANK_ID, ALGORITHM, PARAMS_HASH, CUT_DATE, HIST_HASH, PRED_L "
+        "FROM PECO_FCT_BT_FOLDS WHERE HORIZON = :p_h AND CUT_DATE >= :p_d",
+        {'p_h': horizon, 'p_d': since}))
+    out = {}
+    for r in rows:
+        d = r['cut_date']
+        d = d.date() if hasattr(d, 'date') else d
+        out[(int(r['tank_id']), r['algorithm'], r['params_hash'], d)] = \
+            (r['hist_hash'], float(r['pred_l']))
+    return out
+
+
+def save_fold_cache(db, horizon: int, rows: List[Tuple], prune_before: date):
+    """rows: (tank, алгоритм, хеш параметров, дата среза, хеш окна, прогноз)."""
+    cur = db.connection.cursor()
+    if rows:
+        cur.executemany(
+            "MERGE INTO PECO_FCT_BT_FOLDS t USING (SELECT :1 AS TANK_ID, :2 AS ALGORITHM, "
+            ":3 AS PARAMS_HASH, :4 AS HORIZON, :5 AS CUT_DATE, :6 AS HIST_HASH, "
+            ":7 AS PRED_L FROM DUAL) s "
+            "ON (t.TANK_ID = s.TANK_ID AND t.ALGORITHM = s.ALGORITHM "
+            "AND t.PARAMS_HASH = s.PARAMS_HASH AND t.HORIZON = s.HORIZON "
+            "AND t.CUT_DATE = s.CUT_DATE) "
+            "WHEN MATCHED THEN UPDATE SET t.HIST_HASH = s.HIST_HASH, t.PRED_L = s.PRED_L, "
+            "t.UPDATED_AT = SYSTIMESTAMP "
+            "WHEN NOT MATCHED THEN INSERT (TANK_ID, ALGORITHM, PARAMS_HASH, HORIZON, "
+            "CUT_DATE, HIST_HASH, PRED_L) VALUES (s.TANK_ID, s.ALGORITHM, s.PARAMS_HASH, "
+            "s.HORIZON, s.CUT_DATE, s.HIST_HASH, s.PRED_L)",
+            [(t, a, ph, horizon, d, hh, round(p, 4)) for t, a, ph, d, hh, p in rows])
+    # Срезы, выпавшие из окна истории, больше не понадобятся
+    cur.execute("DELETE FROM PECO_FCT_BT_FOLDS WHERE HORIZON = :p_h AND CUT_DATE < :p_d",
+                {'p_h': horizon, 'p_d': prune_before})
 
 
 def run_backtests(algorithms: Optional[List[str]] = None, horizon: int = 3,
                   folds: int = 8, grade_code: Optional[str] = None,
-                  max_tanks: int = 40, username: str = 'system') -> Dict[str, Any]:
+                  max_tanks: int = 40, username: str = 'system',
+                  run_id: Optional[int] = None, workers: int = BT_WORKERS,
+                  progress: Optional[Callable[[str, int], None]] = None,
+                  cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
     """
     Сравнение алгоритмов на реальной истории отпуска.
 
@@ -374,47 +677,96 @@ def run_backtests(algorithms: Optional[List[str]] = None, horizon: int = 3,
     вторником, для бака безразличен. Результат ложится в
     `PECO_FCT_BACKTESTS` — иначе выбор алгоритма остаётся спором,
     а не измерением.
+
+    Из веб-интерфейса вызывается прогоном очереди (FuelBacktestEngine):
+    progress(этап, процент) пишет ход прогона, cancelled() — флаг отмены.
     """
     from datetime import datetime
     algos = algorithms or list(fc.ALGO_ORDER)
     started = datetime.now()
+    progress = progress or (lambda stage, pct: None)
     try:
         with DatabaseModel() as db:
+            progress('history', 2)
             load_min_history(db)
-            hist = load_tank_history(db, HISTORY_DAYS, grade_code)
+            hist = load_tank_history(db, HISTORY_DAYS + BT_ANCHOR_DAYS, grade_code)
             tank_ids = sorted(hist)[:max_tanks]
-            results = []
-            for algo in algos:
-                errs, pcts, signed, sq, used = [], [], [], [], 0
-                for tid in tank_ids:
-                    h = hist[tid]
-                    if len(h['series']) < ALGO_MIN_HISTORY.get(algo, 28) + horizon:
+            if not tank_ids:
+                return {'success': False, 'error': 'Нет истории отпуска'}
+            last = max(hist[t]['last_date'] for t in tank_ids)
+            cache_since = last - timedelta(days=HISTORY_DAYS + 2 * BT_ANCHOR_DAYS)
+            cache = load_fold_cache(db, horizon, cache_since)
+            phash = {a: params_hash(a, None) for a in algos}
+
+            # Задачи по резервуарам: в процесс уходят только срезы без кэша
+            tasks, meta = [], {}
+            folds_total = folds_cached = 0
+            for tid in tank_ids:
+                series, weekdays, start = anchor_history(hist[tid])
+                cuts = calendar_cuts(len(series), horizon, folds)
+                if not cuts:
+                    continue
+                hashes = window_hashes(series, start, cuts)
+                jobs, known_by_algo = [], {}
+                for algo in algos:
+                    if len(series) < ALGO_MIN_HISTORY.get(algo, 28) + horizon:
                         continue
-                    r = fc.backtest(algo, h['series'], h['weekdays'], horizon, folds)
-                    if not r.get('success') or r.get('mape') is None:
+                    known = {}
+                    for c in cuts:
+                        hit = cache.get((tid, algo, phash[algo], start + timedelta(days=c)))
+                        if hit and hit[0] == hashes[c]:
+                            known[c] = hit[1]
+                    folds_total += len(cuts)
+                    folds_cached += len(known)
+                    jobs.append((algo, None, known))
+                    known_by_algo[algo] = known
+                if jobs:
+                    tasks.append((tid, series, weekdays, horizon, folds, cuts, jobs))
+                    meta[tid] = (start, hashes, known_by_algo)
+
+            per_algo: Dict[str, List[Dict[str, Any]]] = {a: [] for a in algos}
+            fresh: List[Tuple] = []
+            done = 0
+            for tid, res in pool_map(_bt_tank, tasks, workers):
+                if cancelled and cancelled():
+                    raise BacktestCancelled()
+                start, hashes, known_by_algo = meta[tid]
+                for algo, r in res.items():
+                    if not r.get('success'):
                         continue
-                    used += 1
-                    errs.append(float(r['mae']))
-                    pcts.append(float(r['mape']))
-                    signed.append(float(r['bias_pct']))
-                    # RMSE усредняем по квадратам, а не по корням: среднее
-                    # корней меньше корня среднего и приукрашивает разброс
-                    sq.append(float(r['rmse']) ** 2)
+                    for c, pred in r['preds'].items():
+                        if c not in known_by_algo[algo]:
+                            fresh.append((tid, algo, phash[algo], start + timedelta(days=c),
+                                          hashes[c], pred))
+                    if r.get('mape') is not None:
+                        per_algo[algo].append(r)
+                done += 1
+                progress(f'tanks {done}/{len(tasks)}', 5 + int(done * 85 / len(tasks)))
+
+            progress('save', 92)
+            save_fold_cache(db, horizon, fresh, cache_since)
+            results = []
+            for algo in algos:
+                rs = per_algo[algo]
+                used = len(rs)
                 if not used:
                     continue
-                mae = sum(errs) / used
-                mape = sum(pcts) / used
-                bias = sum(signed) / used
-                rmse = math.sqrt(sum(sq) / used)
+                mae = sum(float(r['mae']) for r in rs) / used
+                mape = sum(float(r['mape']) for r in rs) / used
+                bias = sum(float(r['bias_pct']) for r in rs) / used
+                # RMSE усредняем по квадратам, а не по корням: среднее
+                # корней меньше корня среднего и приукрашивает разброс
+                rmse = math.sqrt(sum(float(r['rmse']) ** 2 for r in rs) / used)
                 db.execute_query(
                     "INSERT INTO PECO_FCT_BACKTESTS (ALGORITHM, GRADE_CODE, HORIZON, FOLDS, "
-                    "TANK_COUNT, MAPE, MAE, RMSE, BIAS_PCT, DURATION_SEC, USERNAME) "
-                    "VALUES (:p_a, :p_g, :p_h, :p_f, :p_t, :p_mp, :p_ma, :p_rm, :p_b, :p_d, :p_u)",
+                    "TANK_COUNT, MAPE, MAE, RMSE, BIAS_PCT, DURATION_SEC, USERNAME, RUN_ID) "
+                    "VALUES (:p_a, :p_g, :p_h, :p_f, :p_t, :p_mp, :p_ma, :p_rm, :p_b, :p_d, "
+                    ":p_u, :p_run)",
                     {'p_a': algo, 'p_g': grade_code, 'p_h': horizon, 'p_f': folds,
                      'p_t': used, 'p_mp': round(mape, 4), 'p_ma': round(mae, 4),
                      'p_rm': round(rmse, 4), 'p_b': round(bias, 4),
                      'p_d': int((datetime.now() - started).total_seconds()),
-                     'p_u': username})
+                     'p_u': username, 'p_run': run_id})
                 results.append({'algorithm': algo, 'tanks': used, 'mape': round(mape, 2),
                                 'mae': round(mae, 1), 'rmse': round(rmse, 1),
                                 'bias_pct': round(bias, 2)})
@@ -423,6 +775,112 @@ def run_backtests(algorithms: Optional[List[str]] = None, horizon: int = 3,
         return {'success': True, 'data': results, 'horizon': horizon, 'folds': folds,
                 'grade_code': grade_code,
                 'best': results[0]['algorithm'] if results else None,
+                'folds_total': folds_total, 'folds_cached': folds_cached,
                 'duration_sec': int((datetime.now() - started).total_seconds())}
+    except BacktestCancelled:
+        raise
     except Exception as e:                                       # noqa: BLE001
         return {'success': False, 'error': str(e)}
+
+
+class FuelBacktestEngine:
+    """
+    Прогон сравнения алгоритмов в очереди (models/run_queue.py, движок
+    'fuel_backtest'): запрос только ставит задание, этап и процент идут
+    в PECO_FCT_BT_RUNS и дальше подписчикам Socket.IO, как у прогонов
+    «Планограмм».
+    """
+
+    _active: Dict[int, 'FuelBacktestEngine'] = {}
+
+    def __init__(self, run_id: int, params: Dict[str, Any], username: str):
+        self.run_id = run_id
+        self.params = params
+        self.username = username
+        self.cancelled = False
+        self.conn = None
+
+    @staticmethod
+    def launch(params: Dict[str, Any], username: str) -> Dict[str, Any]:
+        conn = DatabaseConnection.get_connection()
+        try:
+            cur = conn.cursor()
+            out = cur.var(int)
+            cur.execute(
+                "INSERT INTO PECO_FCT_BT_RUNS (STAGE, PARAMS_JSON, USERNAME) "
+                "VALUES ('queued', :p_params, :p_user) RETURNING ID INTO :p_id",
+                {'p_params': json.dumps(params, ensure_ascii=False),
+                 'p_user': username, 'p_id': out})
+            run_id = int(out.getvalue()[0])
+            run_queue.enqueue(cur, 'fuel_backtest', run_id,
+                              {'params': params, 'username': username}, username)
+            conn.commit()
+        finally:
+            conn.close()
+        return {'success': True, 'run_id': run_id, 'queued': True}
+
+    @staticmethod
+    def from_job(run_id: int, payload: Dict[str, Any]) -> 'FuelBacktestEngine':
+        """Экземпляр прогона из задания очереди."""
+        engine = FuelBacktestEngine(run_id, payload.get('params') or {},
+                                    payload.get('username') or '')
+        FuelBacktestEngine._active[run_id] = engine
+        return engine
+
+    @staticmethod
+    def cancel(run_id: int) -> Dict[str, Any]:
+        engine = FuelBacktestEngine._active.get(run_id)
+        if engine:
+            engine.cancelled = True
+            return {'success': True}
+        if run_queue.request_cancel('fuel_backtest', run_id):
+            return {'success': True}
+        return {'success': False, 'error': 'Прогон не активен'}
+
+    def _progress(self, stage: str, pct: int):
+        cur = self.conn.cursor()
+        cur.execute(
+            "UPDATE PECO_FCT_BT_RUNS SET STAGE = :p_stage, PROGRESS_PCT = :p_pct "
+            "WHERE ID = :p_id",
+            {'p_stage': stage[:60], 'p_pct': max(0, min(100, int(pct))), 'p_id': self.run_id})
+        self.conn.commit()
+
+    def _finish(self, status: str, message: str = '', result: Optional[Dict[str, Any]] = None):
+        result = result or {}
+        cur = self.conn.cursor()
+        cur.execute(
+            "UPDATE PECO_FCT_BT_RUNS SET STATUS = :p_st, PROGRESS_PCT = "
+            "CASE WHEN :p_st2 = 'done' THEN 100 ELSE PROGRESS_PCT END, "
+            "BEST_ALGO = :p_best, FOLDS_TOTAL = :p_ft, FOLDS_CACHED = :p_fc, "
+            "DURATION_SEC = ROUND((CAST(SYSTIMESTAMP AS DATE) - CAST(STARTED_AT AS DATE)) * 86400), "
+            "MESSAGE = :p_msg, FINISHED_AT = SYSTIMESTAMP WHERE ID = :p_id",
+            {'p_st': status, 'p_st2': status, 'p_best': result.get('best'),
+             'p_ft': result.get('folds_total'), 'p_fc': result.get('folds_cached'),
+             'p_msg': message[:2000], 'p_id': self.run_id})
+        self.conn.commit()
+
+    def _run(self):
+        p = self.params
+        try:
+            self.conn = DatabaseConnection.get_connection()
+            res = run_backtests(p.get('algorithms'), int(p.get('horizon') or 3),
+                                int(p.get('folds') or 8), p.get('grade_code'),
+                                int(p.get('max_tanks') or 40), self.username,
+                                run_id=self.run_id, progress=self._progress,
+                                cancelled=lambda: self.cancelled)
+            if res.get('success'):
+                self._finish('done', f"Лучший: {res.get('best') or '—'}; срезов "
+                             f"{res['folds_total']}, из кэша {res['folds_cached']}", res)
+            else:
+                self._finish('failed', res.get('error') or '')
+        except BacktestCancelled:
+            self._finish('cancelled', 'Остановлено оператором')
+        except Exception as e:                                   # noqa: BLE001
+            try:
+                self._finish('failed', str(e))
+            except Exception:                                    # noqa: BLE001
+                pass
+        finally:
+            FuelBacktestEngine._active.pop(self.run_id, None)
+            if self.conn:
+                self.conn.close()
@@ -24,7 +24,9 @@
 и решается алгоритмом последовательных кратчайших путей с потенциалами
 Джонсона. Граф маленький (единицы источников, единицы баз, сотни
 потребностей), поэтому точное решение считается за миллисекунды —
-эвристика тут не нужна и не оправдана.
+эвристика тут не нужна и не оправдана. Пересчёт плана к тому же
+начинается с прежнего решения (SupplyNetwork): меняются несколько
+потребностей — чинятся несколько путей.
 
 Что входит в стоимость литра (landed cost):
   цена поставщика + транспорт + перевалка на базе (своя дешевле чужой)
@@ -40,9 +42,12 @@ Oracle-объекты: sql/110_peco_algorithms.sql
 from __future__ import annotations
 
 import heapq
+import threading
 from typing import Any, Dict, List, Optional, Tuple
 
 INF = float('inf')
+EPS = 1e-9          # объём, который считается нулём
+RC_EPS = 1e-9       # допуск сведённой стоимости: шум плавающей точки — не цикл
 
 
 class MinCostFlow:
@@ -50,66 +55,248 @@ class MinCostFlow:
     Поток минимальной стоимости: последовательные кратчайшие пути
     с потенциалами Джонсона (Дейкстра на неотрицательных сведённых весах).
 
-    Реализация на списках смежности с рёбрами-парами: обратное ребро
-    хранится рядом, что даёт отмену уже отправленного потока — без неё
-    жадный проход застревает в локальном оптимуме.
+    Рёбра — плоские списки `to` / `cap` / `cost`, обратное ребро к `e` —
+    `e ^ 1`: отмена уже отправленного потока без поиска пары, а без неё
+    жадный проход застревает в локальном оптимуме. `cap` — остаточная
+    ёмкость, поток по ребру — остаточная ёмкость обратного.
+
+    Решение ТЕПЛОЕ: поток, потенциалы и дисбалансы узлов живут между
+    вызовами `flow`. После `set_capacity` / `set_cost` / `add_edge`
+    повторный `flow` не строит решение заново, а чинит прежнее:
+      * ребро с отрицательной сведённой стоимостью насыщается — это
+        восстанавливает условие оптимальности, но оставляет избыток
+        и недостачу в его концах;
+      * избытки и недостачи промежуточных узлов разводятся кратчайшими
+        путями (исток и сток принимают и отдают сколько угодно);
+      * величина потока доводится до `want` путями s → t или,
+        если её стало много, снимается путями t → s.
+    Если поменялись несколько потребностей, чинится несколько путей,
+    а не весь граф.
+
+    За одну Дейкстру отправляется не один путь, а все пути той же
+    длины (поиск в глубину по рёбрам с нулевой сведённой стоимостью):
+    у потребностей, которые закрывает один и тот же источник, длина
+    пути одна и та же, и раньше на каждую уходила своя Дейкстра.
+
+    `scaling=True` — масштабирование ёмкостей: сначала пути
+    с остаточной ёмкостью не меньше Δ (крупные партии), затем Δ / 2
+    и так до литра, последняя фаза — точная, без порога. Стоимость
+    та же. На сети плана снабжения, где каждой потребности станции
+    нужен свой путь, масштабирование делает почти вдвое больше Дейкстр
+    и медленнее обычного режима (scripts/bench_peco_mincostflow.py),
+    поэтому план его не включает — только явный вызов.
     """
 
     def __init__(self, n: int):
         self.n = n
-        self.graph: List[List[List[float]]] = [[] for _ in range(n)]
-        # ребро: [to, capacity, cost, index_of_reverse]
-
-    def add_edge(self, u: int, v: int, cap: float, cost: float) -> None:
-        self.graph[u].append([v, cap, cost, len(self.graph[v])])
-        self.graph[v].append([u, 0.0, -cost, len(self.graph[u]) - 1])
-
-    def flow(self, s: int, t: int, want: float = INF) -> Tuple[float, float]:
-        """Возвращает (пропущенный поток, суммарная стоимость)."""
-        n = self.n
-        res_flow, res_cost = 0.0, 0.0
-        pot = [0.0] * n                      # потенциалы: держим веса неотрицательными
-        while want > 1e-9:
-            dist = [INF] * n
-            prev_v = [-1] * n
-            prev_e = [-1] * n
-            dist[s] = 0.0
-            pq = [(0.0, s)]
-            while pq:
-                d, v = heapq.heappop(pq)
-                if d > dist[v] + 1e-12:
+        self.adj: List[List[int]] = [[] for _ in range(n)]
+        self.to: List[int] = []
+        self.cap: List[float] = []
+        self.cost: List[float] = []
+        self.pot = [0.0] * n      # потенциалы: держим сведённые веса неотрицательными
+        self.ex = [0.0] * n       # дисбаланс узла: пришло минус ушло
+
+    def add_node(self) -> int:
+        self.adj.append([])
+        self.pot.append(0.0)
+        self.ex.append(0.0)
+        self.n += 1
+        return self.n - 1
+
+    def add_edge(self, u: int, v: int, cap: float, cost: float) -> int:
+        """Добавляет ребро u → v; возвращает его номер для `set_*` и `edge_flow`."""
+        e = len(self.to)
+        self.to += (v, u)
+        self.cap += (float(cap), 0.0)
+        self.cost += (float(cost), -float(cost))
+        self.adj[u].append(e)
+        self.adj[v].append(e + 1)
+        return e
+
+    def edge_flow(self, e: int) -> float:
+        return self.cap[e ^ 1]
+
+    def set_capacity(self, e: int, cap: float) -> None:
+        """Новая ёмкость ребра; лишний поток снимается и становится дисбалансом концов."""
+        cap = max(0.0, float(cap))
+        f = self.cap[e ^ 1]
+        if f > cap:
+            d = f - cap
+            self.cap[e ^ 1] = cap
+            self.ex[self.to[e ^ 1]] += d
+            self.ex[self.to[e]] -= d
+            f = cap
+        self.cap[e] = cap - f
+
+    def set_cost(self, e: int, cost: float) -> None:
+        """Новая стоимость ребра; оптимальность восстановит следующий `flow`."""
+        self.cost[e] = float(cost)
+        self.cost[e ^ 1] = -float(cost)
+
+    def total_cost(self) -> float:
+        cap, cost = self.cap, self.cost
+        return sum(cap[e + 1] * cost[e] for e in range(0, len(cost), 2))
+
+    def flow(self, s: int, t: int, want: float = INF,
+             scaling: bool = False) -> Tuple[float, float]:
+        """
+        Доводит поток s → t до `want` (или до максимума сети) при
+        минимальной стоимости. Возвращает (поток, суммарная стоимость) —
+        ВЕСЬ поток сети, включая отправленный прежними вызовами.
+        """
+        deltas = [EPS]
+        if scaling:
+            top = max([c for c in self.cap if c < INF] + [want if want < INF else 0.0])
+            d = 1.0
+            while d * 2 <= top:
+                d *= 2
+            while d >= 1.0:
+                deltas.insert(-1, d)
+                d /= 2
+        for delta in deltas:                 # delta не меньше EPS: пустые рёбра не ходят
+            self._saturate(delta)
+            self._settle(s, t, delta)
+            ex = self.ex
+            while want - ex[t] > EPS:
+                if not self._phase({s: want - ex[t]}, {t: INF}, delta):
+                    break                    # больше путей нет
+            while ex[t] - want > EPS:
+                if not self._phase({t: ex[t] - want}, {s: INF}, delta):
+                    break
+        return self.ex[t], self.total_cost()
+
+    def _saturate(self, delta: float) -> None:
+        """Рёбра с отрицательной сведённой стоимостью — насыщаем целиком."""
+        to, cap, cost, pot, ex = self.to, self.cap, self.cost, self.pot, self.ex
+        for e in range(len(to)):
+            c = cap[e]
+            if c >= delta:
+                u, v = to[e ^ 1], to[e]
+                if cost[e] + pot[u] - pot[v] < -RC_EPS:
+                    cap[e] = 0.0
+                    cap[e ^ 1] += c
+                    ex[u] -= c
+                    ex[v] += c
+
+    def _settle(self, s: int, t: int, delta: float) -> None:
+        """Разводит дисбалансы промежуточных узлов (исток и сток — свободные)."""
+        ex = self.ex
+        while True:
+            srcs = {v: ex[v] for v in range(self.n)
+                    if ex[v] >= delta and v != s and v != t}
+            if not srcs:
+                break
+            sinks = {v: -ex[v] for v in range(self.n)
+                     if -ex[v] >= delta and v != s and v != t}
+            sinks[s] = sinks[t] = INF
+            if not self._phase(srcs, sinks, delta):
+                break
+        while True:
+            sinks = {v: -ex[v] for v in range(self.n)
+                     if -ex[v] >= delta and v != s and v != t}
+            if not sinks:
+                break
+            if not self._phase({s: INF, t: INF}, sinks, delta):
+                break
+
+    def _phase(self, sources: Dict[int, float], sinks: Dict[int, float],
+               delta: float) -> float:
+        """
+        Одна Дейкстра от всех `sources` до ближайшего из `sinks` по рёбрам
+        с остатком не меньше `delta`, затем все пути той же длины.
+        Возвращает отправленный объём (0 — стоки недостижимы).
+        """
+        n, adj, to, cap, cost, pot, ex = (self.n, self.adj, self.to, self.cap,
+                                          self.cost, self.pot, self.ex)
+        dist = [INF] * n
+        pq = []
+        for v in sources:
+            dist[v] = 0.0
+            pq.append((0.0, v))
+        heapq.heapify(pq)
+        top = INF
+        while pq:
+            d, v = heapq.heappop(pq)
+            if d > top:
+                break
+            if d > dist[v]:
+                continue
+            if v in sinks and top == INF:
+                top = d                      # дальше — только пути той же длины
+            pv = pot[v] + d
+            for e in adj[v]:
+                if cap[e] < delta:
+                    continue
+                w = to[e]
+                nd = pv + cost[e] - pot[w]
+                if nd < dist[w] - 1e-12:
+                    dist[w] = nd
+                    heapq.heappush(pq, (nd, w))
+        if top == INF:
+            return 0.0
+        # Потенциал недостигнутых и дальних узлов сдвигается на длину
+        # найденного пути: сведённые веса остаются неотрицательными везде
+        for v in range(n):
+            pot[v] += dist[v] if dist[v] < top else top
+
+        # Все кратчайшие пути: обход в глубину по рёбрам с нулевой
+        # сведённой стоимостью, `it` — указатель текущего ребра узла
+        it = [0] * n
+        dead = bytearray(n)
+        on_path = bytearray(n)
+        sent = 0.0
+        for src in sources:
+            avail = sources[src]
+            path: List[int] = []
+            v = src
+            on_path[src] = 1
+            while avail > EPS:
+                room = sinks.get(v, 0.0) if v != src else 0.0
+                if room > EPS:
+                    d = min(avail, room)
+                    for e in path:
+                        d = min(d, cap[e])
+                    for e in path:
+                        cap[e] -= d
+                        cap[e ^ 1] += d
+                    ex[src] -= d
+                    ex[v] += d
+                    avail -= d
+                    sinks[v] = room - d
+                    sent += d
+                    for e in path:
+                        on_path[to[e]] = 0
+                    path = []
+                    v = src
+                    continue
+                edges = adj[v]
+                pv = pot[v]
+                i = it[v]
+                while i < len(edges):
+                    e = edges[i]
+                    w = to[e]
+                    if (cap[e] >= delta and not dead[w] and not on_path[w]
+                            and cost[e] + pv - pot[w] <= RC_EPS):
+                        break
+                    i += 1
+                it[v] = i
+                if i < len(edges):
+                    e = edges[i]
+                    path.append(e)
+                    v = to[e]
+                    on_path[v] = 1
                     continue
-                for i, e in enumerate(self.graph[v]):
-                    to, cap, cost, _rev = e
-                    if cap <= 1e-9:
-                        continue
-                    nd = d + cost + pot[v] - pot[int(to)]
-                    if nd < dist[int(to)] - 1e-12:
-                        dist[int(to)] = nd
-                        prev_v[int(to)] = v
-                        prev_e[int(to)] = i
-                        heapq.heappush(pq, (nd, int(to)))
-            if dist[t] == INF:
-                break                        # больше путей нет
-            for v in range(n):
-                if dist[v] < INF:
-                    pot[v] += dist[v]
-            # Узкое место найденного пути
-            d = want
-            v = t
-            while v != s:
-                d = min(d, self.graph[prev_v[v]][prev_e[v]][1])
-                v = prev_v[v]
-            v = t
-            while v != s:
-                e = self.graph[prev_v[v]][prev_e[v]]
-                e[1] -= d
-                self.graph[int(e[0])][int(e[3])][1] += d
-                v = prev_v[v]
-            res_flow += d
-            res_cost += d * pot[t]
-            want -= d
-        return res_flow, res_cost
+                dead[v] = 1                  # отсюда кратчайших путей больше нет
+                if not path:
+                    break
+                e = path.pop()
+                on_path[v] = 0
+                v = to[e ^ 1]
+                it[v] += 1
+            for e in path:
+                on_path[to[e]] = 0
+            on_path[src] = 0
+        return sent
 
 
 def landed_cost_per_l(path: Dict[str, Any], money_rate_year: float = 0.14) -> float:
@@ -131,7 +318,7 @@ def landed_cost_per_l(path: Dict[str, Any], money_rate_year: float = 0.14) -> fl
 
 
 def solve_distribution(demands: List[Dict[str, Any]], sources: List[Dict[str, Any]],
-                       money_rate_year: float = 0.14) -> Dict[str, Any]:
+                       money_rate_year: float = 0.14, warm: bool = False) -> Dict[str, Any]:
     """
     ЗАДАЧА 1 — сегодняшняя развозка: чем закрыть потребность станций
     прямо сейчас.
@@ -150,13 +337,17 @@ def solve_distribution(demands: List[Dict[str, Any]], sources: List[Dict[str, An
     и станция в полусутках от сухого бака оказывалась непокрытой при
     полной нефтебазе в сорока километрах. Это была ошибка модели,
     а не жизни.
+
+    warm=True — решение от сети прошлого вызова (см. SupplyNetwork).
     """
+    if warm:
+        return _solve_warm('distribution', demands, sources, money_rate_year, 'lead_days')
     return _solve_flow(demands, sources, money_rate_year, lead_field='lead_days')
 
 
 def solve_replenishment(depot_needs: List[Dict[str, Any]],
                         supplies: List[Dict[str, Any]],
-                        money_rate_year: float = 0.14) -> Dict[str, Any]:
+                        money_rate_year: float = 0.14, warm: bool = False) -> Dict[str, Any]:
     """
     ЗАДАЧА 2 — пополнение нефтебаз: импорт против внутреннего рынка.
 
@@ -169,6 +360,8 @@ def solve_replenishment(depot_needs: List[Dict[str, Any]],
     внутренний рынок дороже, но приезжает за двое. Выбор между ними —
     ровно то, что считает этот поток.
     """
+    if warm:
+        return _solve_warm('replenishment', depot_needs, supplies, money_rate_year, 'lead_days')
     return _solve_flow(depot_needs, supplies, money_rate_year, lead_field='lead_days')
 
 
@@ -180,9 +373,77 @@ def solve_replenishment(depot_needs: List[Dict[str, Any]],
 LATE_PENALTY_PER_L_DAY = 5.0
 
 
+class SupplyNetwork:
+    """
+    Граф задачи, переживающий пересчёт плана.
+
+    Узлы и рёбра адресуются ключами (код пути, ключ потребности),
+    поэтому следующий пересчёт не строит граф заново: у существующих
+    рёбер меняются ёмкость и стоимость, новые добавляются, пропавшие
+    получают нулевую ёмкость, а MinCostFlow доводит прежний поток
+    до нового оптимума. Обычно между пересчётами меняются несколько
+    потребностей станций, и чинится несколько путей, а не весь поток.
+    """
+
+    SRC, SINK = 0, 1
+
+    def __init__(self):
+        self.mcf = MinCostFlow(2)
+        self.nodes: Dict[Tuple[str, str], int] = {}
+        self.arcs: Dict[Tuple[str, ...], int] = {}
+        self.live = 0
+        self.solved = False
+
+    def node(self, key: Tuple[str, str]) -> int:
+        v = self.nodes.get(key)
+        if v is None:
+            v = self.nodes[key] = self.mcf.add_node()
+        return v
+
+    def arc(self, key: Tuple[str, ...], u: int, v: int, cap: float, cost: float,
+            seen: set) -> int:
+        seen.add(key)
+        e = self.arcs.get(key)
+        if e is None:
+            e = self.arcs[key] = self.mcf.add_edge(u, v, cap, cost)
+        else:
+            self.mcf.set_cost(e, cost)
+            self.mcf.set_capacity(e, cap)
+        return e
+
+    def retire(self, seen: set) -> None:
+        for key, e in self.arcs.items():
+            if key not in seen:
+                self.mcf.set_capacity(e, 0.0)
+        self.live = len(seen)
+
+    @property
+    def bloated(self) -> bool:
+        """Мёртвых рёбер больше живых — дешевле начать с чистого графа."""
+        return len(self.arcs) > 2 * self.live + 64
+
+
+# Тёплые сети по задачам: 'distribution' / 'replenishment'
+_networks: Dict[str, SupplyNetwork] = {}
+_networks_lock = threading.Lock()
+
+
+def _solve_warm(name: str, demands: List[Dict[str, Any]], sources: List[Dict[str, Any]],
+                money_rate_year: float, lead_field: str) -> Dict[str, Any]:
+    with _networks_lock:
+        # Сеть вынимается на время решения: упавшее на середине решение
+        # не оставит в кеше полуизменённый граф
+        net = _networks.pop(name, None) or SupplyNetwork()
+        res = _solve_flow(demands, sources, money_rate_year, lead_field, net=net)
+        if net.solved and not net.bloated:
+            _networks[name] = net
+        return res
+
+
 def _solve_flow(demands: List[Dict[str, Any]], sources: List[Dict[str, Any]],
                 money_rate_year: float, lead_field: str,
-                late_penalty: float = LATE_PENALTY_PER_L_DAY) -> Dict[str, Any]:
+                late_penalty: float = LATE_PENALTY_PER_L_DAY,
+                net: Optional[SupplyNetwork] = None) -> Dict[str, Any]:
     """
     Общее ядро обеих задач: поток минимальной стоимости
     «источники → потребности» с запретом по плечу.
@@ -193,6 +454,9 @@ def _solve_flow(demands: List[Dict[str, Any]], sources: List[Dict[str, Any]],
                'lead_days', 'price_per_l', 'transport_per_l',
                'handling_per_l', 'duty_per_l', 'available_l', 'min_lot_l',
                'depot_id'|None, 'depot_name'|None}]
+    net: сеть прошлого решения той же задачи (см. SupplyNetwork) — тогда
+         решение тёплое; при равной стоимости путей оно сохраняет прежнее
+         распределение, а не перетасовывает станции
     """
     if not demands:
         return {'success': True, 'allocations': [], 'uncovered': [],
@@ -200,16 +464,16 @@ def _solve_flow(demands: List[Dict[str, Any]], sources: List[Dict[str, Any]],
     if not sources:
         return {'success': False, 'error': 'Не задано ни одного источника'}
 
-    S, N = len(sources), len(demands)
-    src, sink = 0, 1 + S + N
-    s_node = lambda i: 1 + i
-    d_node = lambda j: 1 + S + j
-    mcf = MinCostFlow(sink + 1)
+    net = net if net is not None else SupplyNetwork()
+    src, sink = SupplyNetwork.SRC, SupplyNetwork.SINK
+    mcf = net.mcf
+    seen: set = set()
+    s_nodes = [net.node(('s', p['code'])) for p in sources]
+    d_nodes = [net.node(('d', dem['key'])) for dem in demands]
 
     for i, p in enumerate(sources):
         avail = max(0.0, float(p.get('available_l') or 0))
-        if avail > 0:
-            mcf.add_edge(src, s_node(i), avail, 0.0)
+        net.arc(('src', p['code']), src, s_nodes[i], avail, 0.0, seen)
 
     reasons: Dict[str, str] = {}
     edge_ref: Dict[Tuple[int, int], int] = {}
@@ -217,7 +481,7 @@ def _solve_flow(demands: List[Dict[str, Any]], sources: List[Dict[str, Any]],
         need = float(dem.get('liters') or 0)
         if need <= 0:
             continue
-        mcf.add_edge(d_node(j), sink, need, 0.0)
+        net.arc(('sink', dem['key']), d_nodes[j], sink, need, 0.0, seen)
         served = False
         for i, p in enumerate(sources):
             if p.get('grade_code') and p['grade_code'] != dem.get('grade_code'):
@@ -245,21 +509,24 @@ def _solve_flow(demands: List[Dict[str, Any]], sources: List[Dict[str, Any]],
                 reasons.setdefault(dem['key'], 'min_lot')
                 continue
             cap = min(need, float(p['available_l']))
-            edge_ref[(i, j)] = len(mcf.graph[s_node(i)])
-            mcf.add_edge(s_node(i), d_node(j), cap,
-                         landed_cost_per_l(p, money_rate_year) + late * late_penalty)
+            edge_ref[(i, j)] = net.arc(
+                ('x', p['code'], dem['key']), s_nodes[i], d_nodes[j], cap,
+                landed_cost_per_l(p, money_rate_year) + late * late_penalty, seen)
             served = True
         if not served:
             reasons.setdefault(dem['key'], reasons.get(dem['key'], 'no_source'))
+    # Рёбра, которых в этой задаче нет (потребность закрыта, путь
+    # отключён), остаются в сети с нулевой ёмкостью
+    net.retire(seen)
 
     total_need = sum(float(d.get('liters') or 0) for d in demands)
     flow, cost = mcf.flow(src, sink, total_need)
+    net.solved = True
 
     allocations: List[Dict[str, Any]] = []
     covered: Dict[str, float] = {}
-    for (i, j), idx in edge_ref.items():
-        e = mcf.graph[s_node(i)][idx]
-        vol = mcf.graph[int(e[0])][int(e[3])][1]      # сколько вернулось в обратное ребро
+    for (i, j), e in edge_ref.items():
+        vol = mcf.edge_flow(e)
         if vol <= 1e-9:
             continue
         p, dem = sources[i], demands[j]
@@ -306,7 +573,7 @@ def solve_supply_plan(station_demands: List[Dict[str, Any]],
                       distribution_sources: List[Dict[str, Any]],
                       depot_needs: List[Dict[str, Any]],
                       replenishment_sources: List[Dict[str, Any]],
-                      money_rate_year: float = 0.14) -> Dict[str, Any]:
+                      money_rate_year: float = 0.14, warm: bool = False) -> Dict[str, Any]:
     """
     Полный план снабжения: развозка сегодня плюс пополнение баз.
 
@@ -314,8 +581,8 @@ def solve_supply_plan(station_demands: List[Dict[str, Any]],
     диспетчер смотрит развозку, закупщик смотрит пополнение, и это
     разные люди с разным горизонтом.
     """
-    dist = solve_distribution(station_demands, distribution_sources, money_rate_year)
-    repl = solve_replenishment(depot_needs, replenishment_sources, money_rate_year)
+    dist = solve_distribution(station_demands, distribution_sources, money_rate_year, warm)
+    repl = solve_replenishment(depot_needs, replenishment_sources, money_rate_year, warm)
     total = 0.0
     for part in (dist, repl):
         if part.get('success'):
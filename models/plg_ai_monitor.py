@@ -17,23 +17,34 @@ z-оценки против недельной базы, покрытие ост
 на ней обучаются модели из дорожной карты (см. AUTO_ORDER_GUIDE.md),
 а детекторы задают базовую линию, которую ML обязан бить, чтобы жить.
 
-Oracle-объекты: sql/96_plg_ai_monitor.sql
+Векторы поведения обрабатываются потоково, магазин за магазином: как только
+признаки магазина посчитаны, из них строится векторный индекс
+(models/plg_vector_index.py), по нему сразу ищутся выбросы среди соседей,
+и индекс сохраняется для API «похожие SKU». Второго прохода по всем
+признакам прогона нет.
+
+Прогон ставится в очередь models/run_queue.py и выполняется воркером.
+
+Oracle-объекты: sql/96_plg_ai_monitor.sql, sql/114_plg_ai_vector_index.sql
 """
 from __future__ import annotations
 
 import math
 import os
 import sys
-import threading
 import time
 from datetime import date, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
+import oracledb
+
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
+from models import run_queue
 from models.database import DatabaseConnection
+from models.plg_vector_index import BehaviorIndex, remember
 
 BATCH = 5000
 WINDOW = 28          # окно признаков, дней
@@ -72,12 +83,12 @@ def _squash(value: float, scale: float) -> float:
     return v / (v + scale)
 
 
-def behavior_vector(avg7: float, mean28: float, med28: float, sigma: float,
+def behavior_coords(avg7: float, mean28: float, med28: float, sigma: float,
                     cv: float, trend: float, weekend_lift: float,
                     promo_uplift: float, oos_days: int, cover: float,
-                    waste_pct: Optional[float], is_fresh: int) -> str:
+                    waste_pct: Optional[float], is_fresh: int) -> List[float]:
     """
-    Вектор поведения SKU: 12 нормированных координат для колонки VECTOR.
+    Вектор поведения SKU: 12 нормированных координат.
 
     Состав подобран так, чтобы близость векторов означала «товары живут
     одинаково»: уровень спроса, стабильность, тренд, недельный рисунок,
@@ -99,9 +110,19 @@ def behavior_vector(avg7: float, mean28: float, med28: float, sigma: float,
         min(1.0, (waste_pct or 0.0) / 20.0),       # ожидаемое списание
         float(is_fresh),                           # фреш-флаг
     ]
+    return [round(c, 5) for c in coords]
+
+
+def vector_literal(coords: List[float]) -> str:
+    """Текстовый литерал для колонки VECTOR (PLG_AI_FEATURES.EMB)."""
     return '[' + ','.join(f'{c:.5f}' for c in coords) + ']'
 
 
+def behavior_vector(*args) -> str:
+    """Вектор поведения сразу литералом VECTOR — аргументы как у behavior_coords."""
+    return vector_literal(behavior_coords(*args))
+
+
 def _median(vals: List[float]) -> float:
     s = sorted(vals)
     n = len(s)
@@ -136,18 +157,25 @@ class AiMonitorEngine:
             cur = conn.cursor()
             out = cur.var(int)
             cur.execute(
-                "INSERT INTO PLG_AI_RUNS (DATASET_ID, STORE_ID, USERNAME) "
-                "VALUES (:p_ds, :p_st, :p_user) RETURNING ID INTO :p_id",
+                "INSERT INTO PLG_AI_RUNS (DATASET_ID, STORE_ID, STAGE, USERNAME) "
+                "VALUES (:p_ds, :p_st, 'queued', :p_user) RETURNING ID INTO :p_id",
                 {'p_ds': dataset_id, 'p_st': store_id, 'p_user': username, 'p_id': out})
             run_id = int(out.getvalue()[0])
+            run_queue.enqueue(cur, 'aimonitor', run_id,
+                              {'dataset_id': dataset_id, 'store_id': store_id,
+                               'username': username}, username)
             conn.commit()
         finally:
             conn.close()
-        engine = AiMonitorEngine(run_id, dataset_id, store_id, username)
+        return {'success': True, 'run_id': run_id, 'queued': True}
+
+    @staticmethod
+    def from_job(run_id: int, payload: Dict[str, Any]) -> 'AiMonitorEngine':
+        """Экземпляр прогона из задания очереди (models/run_queue.py)."""
+        engine = AiMonitorEngine(run_id, payload.get('dataset_id'), payload.get('store_id'),
+                                 payload.get('username') or '')
         AiMonitorEngine._active[run_id] = engine
-        threading.Thread(target=engine._run, daemon=True,
-                         name=f'plg-ai-monitor-{run_id}').start()
-        return {'success': True, 'run_id': run_id}
+        return engine
 
     @staticmethod
     def cancel(run_id: int) -> Dict[str, Any]:
@@ -155,6 +183,9 @@ class AiMonitorEngine:
         if engine:
             engine.cancelled = True
             return {'success': True}
+        # Прогон в очереди или у воркера в другом процессе
+        if run_queue.request_cancel('aimonitor', run_id):
+            return {'success': True}
         return {'success': False, 'error': 'Прогон не активен'}
 
     def _check_cancel(self):
@@ -300,6 +331,7 @@ class AiMonitorEngine:
         for si, store_id in enumerate(stores):
             self._check_cancel()
             self._progress(f'store {store_id}', int(si / len(stores) * 100))
+            vec_items: List[Tuple[int, Optional[int], List[float]]] = []
 
             meta = {int(r[0]): (r[1], float(r[2] or 0), float(r[3] or 0), r[4],
                                 int(r[5] or 0), int(r[6] or 0))
@@ -356,6 +388,10 @@ class AiMonitorEngine:
                 xyz = 'X' if cv < 0.35 else ('Y' if cv < 0.8 else 'Z')
                 waste_pct = waste_by_key.get((store_id, pid))
                 bias = None   # смещение уровня сети хранится в сигналах, не в признаке SKU
+                coords = behavior_coords(avg7, mean28, med28, sigma, cv, trend,
+                                         weekend_lift, promo_uplift, oos_days, cover,
+                                         waste_pct, is_fresh)
+                vec_items.append((pid, cat_id, coords))
 
                 feat_buf.append((
                     self.run_id, store_id, pid, last_date,
@@ -367,9 +403,7 @@ class AiMonitorEngine:
                     bias, price or None,
                     round(margin, 2) if margin is not None else None,
                     abc, xyz, is_fresh,
-                    behavior_vector(avg7, mean28, med28, sigma, cv, trend,
-                                    weekend_lift, promo_uplift, oos_days, cover,
-                                    waste_pct, is_fresh)))
+                    vector_literal(coords)))
                 self.feature_count += 1
 
                 # ---------- Детекторы ----------
@@ -445,65 +479,67 @@ class AiMonitorEngine:
                 if len(sig_buf) >= BATCH:
                     self._write(sig_sql, sig_buf); sig_buf = []
 
+            # Векторный контур магазина — пока его признаки ещё в памяти
+            index = BehaviorIndex.build(vec_items)
+            sig_buf.extend(self._vector_outliers(store_id, index))
+            self._save_index(store_id, index)
+
         self._write(feat_sql, feat_buf)
         self._write(sig_sql, sig_buf)
-        self._vector_outliers(stores, sig_sql)
 
-    def _vector_outliers(self, stores: List[int], sig_sql: str):
+    def _vector_outliers(self, store_id: int, index: BehaviorIndex) -> List[Tuple]:
         """
         Векторный детектор: выброс среди соседей по категории.
 
-        Расстояния считает БАЗА (VECTOR_DISTANCE по колонке VECTOR из 26ai),
-        а не Python: среднее косинусное расстояние каждого SKU до товаров
-        своей категории в том же магазине. SKU, чьё расстояние выше
-        медианы категории на 2.5 межквартильных размаха, — аномалия
-        сочетания признаков, даже если каждый признак по отдельности
-        в норме и пороговые детекторы молчат.
+        Среднее косинусное расстояние каждого SKU до товаров своей категории
+        в том же магазине. Считается по индексу магазина ТОЧНО и за один
+        проход (через сумму векторов категории), а не попарным
+        VECTOR_DISTANCE в базе. SKU, чьё расстояние выше медианы категории
+        на 2.5 межквартильных размаха, — аномалия сочетания признаков, даже
+        если каждый признак по отдельности в норме и пороговые детекторы молчат.
         """
-        self._progress('vector outliers', 96)
         sig_buf: List[Tuple] = []
-        for store_id in stores:
-            self._check_cancel()
-            rows = self._fetch(
-                "SELECT f1.PRODUCT_ID, p1.CATEGORY_ID, "
-                "AVG(VECTOR_DISTANCE(f1.EMB, f2.EMB, COSINE)) AS D, COUNT(*) AS N "
-                "FROM PLG_AI_FEATURES f1 "
-                "JOIN PLG_PRODUCTS p1 ON p1.ID = f1.PRODUCT_ID "
-                "JOIN PLG_PRODUCTS p2 ON p2.CATEGORY_ID = p1.CATEGORY_ID "
-                "JOIN PLG_AI_FEATURES f2 ON f2.PRODUCT_ID = p2.ID "
-                " AND f2.RUN_ID = f1.RUN_ID AND f2.STORE_ID = f1.STORE_ID "
-                " AND f2.PRODUCT_ID <> f1.PRODUCT_ID "
-                "WHERE f1.RUN_ID = :p_run AND f1.STORE_ID = :p_st "
-                " AND f1.EMB IS NOT NULL AND f2.EMB IS NOT NULL "
-                "GROUP BY f1.PRODUCT_ID, p1.CATEGORY_ID HAVING COUNT(*) >= 5",
-                {'p_run': self.run_id, 'p_st': store_id})
-            by_cat: Dict[int, List[Tuple[int, float]]] = {}
-            for (pid, cat_id, d, _n) in rows:
-                by_cat.setdefault(int(cat_id or 0), []).append((int(pid), float(d)))
-            for cat_id, items in by_cat.items():
-                dists = sorted(d for _, d in items)
-                if len(dists) < 8:
+        by_cat: Dict[int, List[Tuple[int, float]]] = {}
+        for pid, (cat_id, d, _n) in index.category_mean_distance(min_peers=5).items():
+            by_cat.setdefault(cat_id, []).append((pid, d))
+        for cat_id, items in by_cat.items():
+            dists = sorted(d for _, d in items)
+            if len(dists) < 8:
+                continue
+            q1 = dists[len(dists) // 4]
+            q3 = dists[3 * len(dists) // 4]
+            med = dists[len(dists) // 2]
+            iqr = max(q3 - q1, 0.005)
+            threshold = med + 2.5 * iqr
+            for pid, d in items:
+                if d <= threshold or d < 0.03:
                     continue
-                q1 = dists[len(dists) // 4]
-                q3 = dists[3 * len(dists) // 4]
-                med = dists[len(dists) // 2]
-                iqr = max(q3 - q1, 0.005)
-                threshold = med + 2.5 * iqr
-                for pid, d in items:
-                    if d <= threshold or d < 0.03:
-                        continue
-                    delta = (d / med - 1) * 100 if med > 0 else 100.0
-                    sig_buf.append((
-                        self.run_id, 'peer_outlier', 'warn', store_id, pid,
-                        cat_id or None, round(d, 4), round(med, 4), round(delta, 1),
-                        'Поведение товара выбивается из категории: векторное расстояние '
-                        f'{d:.3f} при типичном {med:.3f} — проверьте карточку и историю',
-                        'Comportamentul produsului iese din tiparul categoriei: distanța '
-                        f'vectorială {d:.3f} față de {med:.3f} tipic',
-                        f'Product behaviour deviates from its category: vector distance '
-                        f'{d:.3f} vs the typical {med:.3f}',
-                        'aimonitor'))
-        self._write(sig_sql, sig_buf)
+                delta = (d / med - 1) * 100 if med > 0 else 100.0
+                sig_buf.append((
+                    self.run_id, 'peer_outlier', 'warn', store_id, pid,
+                    cat_id or None, round(d, 4), round(med, 4), round(delta, 1),
+                    'Поведение товара выбивается из категории: векторное расстояние '
+                    f'{d:.3f} при типичном {med:.3f} — проверьте карточку и историю',
+                    'Comportamentul produsului iese din tiparul categoriei: distanța '
+                    f'vectorială {d:.3f} față de {med:.3f} tipic',
+                    f'Product behaviour deviates from its category: vector distance '
+                    f'{d:.3f} vs the typical {med:.3f}',
+                    'aimonitor'))
+        return sig_buf
+
+    def _save_index(self, store_id: int, index: BehaviorIndex):
+        """Индекс магазина — в PLG_AI_VECTOR_INDEX и в кеш процесса для /api/plg/ai/similar."""
+        if not len(index):
+            return
+        cur = self.conn.cursor()
+        cur.setinputsizes(p_payload=oracledb.DB_TYPE_BLOB)
+        cur.execute(
+            "INSERT INTO PLG_AI_VECTOR_INDEX (RUN_ID, STORE_ID, DIM, ITEM_COUNT, NLIST, PAYLOAD) "
+            "VALUES (:p_run, :p_st, :p_dim, :p_cnt, :p_nl, :p_payload)",
+            {'p_run': self.run_id, 'p_st': store_id, 'p_dim': index.dim,
+             'p_cnt': len(index), 'p_nl': index.nlist, 'p_payload': index.to_bytes()})
+        self.conn.commit()
+        remember(self.run_id, store_id, index)
 
     def _write(self, sql: str, rows: List[Tuple]):
         if not rows:
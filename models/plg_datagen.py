@@ -16,10 +16,25 @@
 Воспроизводимость: весь случайный поток идёт из random.Random(seed) набора,
 поэтому одинаковые (seed, параметры) дают идентичные данные.
 
+Продолжение после сбоя: после каждого магазина (поставщика, конкурента,
+рынка) в PLG_GEN_RUNS пишется контрольная точка — в той же транзакции,
+что и его данные, вместе с состоянием общего random.Random. Прерванный
+прогон продолжается с первого незаписанного магазина (DataGenerator.resume)
+и даёт те же данные, что непрерывный.
+
+Параллельность: спрос и трафик магазина зависят только от seed и НОМЕРА
+магазина, поэтому считаются в пуле процессов по магазину на задачу
+(params['workers']). Запись в Oracle остаётся в потоке прогона и идёт
+в порядке магазинов, так что результат не зависит от числа процессов.
+
+Запуск и продолжение ставят задание в очередь models/run_queue.py;
+выполняет его воркер (scripts/plg_worker.py).
+
 Oracle-объекты: sql/84_plg_testdata.sql
 """
 from __future__ import annotations
 
+import itertools
 import json
 import math
 import os
@@ -27,6 +42,9 @@ import random
 import sys
 import threading
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import date, datetime, time as dtime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -34,10 +52,17 @@ root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
+import oracledb
+
+from models import run_queue
 from models.database import DatabaseConnection
 
 BATCH = 20000
 
+# Сколько задач держать «в полёте» на один процесс пула: больше — лучше
+# загрузка, но готовые ряды спроса копятся в памяти, пока их пишет Oracle.
+SHARD_WINDOW = 2
+
 
 def datetime_at(day: date, hour_float: float) -> datetime:
     """
@@ -199,6 +224,171 @@ PROMO_TEMPLATES = [
 ]
 
 
+# ==================== Расчёт магазина в пуле процессов ====================
+# Функции уровня модуля: их задачи пиклятся в процессы ProcessPoolExecutor.
+# Ни Oracle, ни общего random.Random они не трогают — только свой seed,
+# поэтому результат одинаков при любом числе процессов.
+
+def _process_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Пул процессов или None, если считать надо в текущем потоке: workers=1,
+    процесс под eventlet (потоки пула подменены зелёными — пул зависает)
+    или ОС не даёт создать процессы.
+    """
+    if workers <= 1:
+        return None
+    try:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return None
+    except ImportError:
+        pass
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError, ValueError):
+        return None
+
+
+DEMAND_ABC_BASE = {'A': (7.0, 26.0), 'B': (2.2, 8.0), 'C': (0.35, 2.6)}
+
+
+def _demand_shard(task: Tuple) -> Tuple[int, List[Tuple]]:
+    """Суточные ряды спроса одного магазина: (store_idx, строки PLG_SALES_DAILY)."""
+    seed, store_idx, store_id, fmt, products, promo_map, start, days, knobs = task
+    noise_pct = knobs['noise_pct']
+    oos_rate = knobs['oos_rate']
+    trend_year = knobs['trend_year']
+    weekly_amp = knobs['weekly_amp']
+    yearly_amp_k = knobs['yearly_amp_k']
+
+    prof = STORE_FORMATS.get(fmt, STORE_FORMATS['super'])
+    share = prof['assortment_share']
+    traffic_k = sum(prof['traffic']) / 2.0 / 3000.0   # нормировка к «среднему» супермаркету
+
+    # Порядковый номер товара внутри набора. Именно он, а НЕ PLG_PRODUCTS.ID,
+    # идёт в seed: ID выдаёт последовательность Oracle, поэтому у второго
+    # набора с тем же seed он другой, и данные переставали воспроизводиться.
+    prod_index = {p[0]: i for i, p in enumerate(products)}
+
+    # Ассортимент магазина детерминирован seed'ом и НОМЕРОМ магазина в наборе
+    srnd = random.Random(seed * 7919 + store_idx)
+    local_products = products if share >= 0.999 else srnd.sample(
+        products, max(1, int(len(products) * share)))
+
+    # Календарные множители одинаковы для всех SKU магазина — считаем один раз
+    calendar = []
+    for i in range(days):
+        d = start + timedelta(days=i)
+        wd = WEEKDAY_PROFILE[d.weekday()]
+        calendar.append((d, d.timetuple().tm_yday, d.toordinal(),
+                         1.0 + (wd - 1.0) * (weekly_amp / 0.35),
+                         (1.0 + trend_year) ** (i / 365.0)))
+
+    rows: List[Tuple] = []
+    for (prod_id, ccode, price, abc, pack) in local_products:
+        cprof = CATEGORY_PROFILE.get(ccode, CATEGORY_PROFILE['grocery'])
+        lo, hi = DEMAND_ABC_BASE.get(abc or 'C', DEMAND_ABC_BASE['C'])
+        prnd = random.Random(seed * 104729 + store_idx * 7919 + prod_index.get(prod_id, 0))
+        base = prnd.uniform(lo, hi) * traffic_k
+        yearly_amp = cprof['yearly_amp'] * (yearly_amp_k / 0.20)
+        phase = cprof['yearly_phase']
+        price_f = float(price or 10)
+        pack = int(pack or 1)
+        bucket = promo_map.get(prod_id, {})
+
+        stock = base * prnd.uniform(4, 9)
+        reorder_point = base * 3
+        target_stock = base * 10
+
+        for (d, doy, ordinal, weekday_f, trend) in calendar:
+            yearly = 1.0 + yearly_amp * math.sin(2 * math.pi * (doy - phase) / 365.0)
+
+            promo = bucket.get(ordinal)
+            if promo:
+                promo_id, disc = promo
+                uplift = 1.35 + (disc / 100.0) * 2.6
+            else:
+                promo_id, disc, uplift = None, 0.0, 1.0
+
+            noise = max(0.15, prnd.gauss(1.0, noise_pct))
+            demand = base * yearly * weekday_f * trend * uplift * noise
+
+            # Пополнение: (s,S) — при падении ниже точки заказа приходит партия
+            if stock < reorder_point:
+                stock += max(pack, math.ceil((target_stock - stock) / pack) * pack)
+
+            is_oos = 0
+            if prnd.random() < oos_rate:
+                # Разрыв поставки: продали только то, что было
+                demand *= prnd.uniform(0.0, 0.35)
+                is_oos = 1
+            if demand > stock:
+                demand = stock
+                is_oos = 1
+
+            qty = round(max(0.0, demand), 3)
+            stock = round(max(0.0, stock - qty), 3)
+            sell_price = round(price_f * (1 - disc / 100.0), 2)
+            rows.append((store_id, prod_id, d, qty, round(qty * sell_price, 2), sell_price,
+                         promo_id, stock, is_oos))
+    return store_idx, rows
+
+
+def _traffic_shard(task: Tuple) -> Tuple[int, List[Tuple], List[Tuple], List[Tuple]]:
+    """
+    Метрики магазина из агрегатов его продаж:
+    (store_idx, PLG_STORE_METRICS, PLG_CATEGORY_METRICS, PLG_ZONE_TRAFFIC).
+    """
+    seed, si, store_id, daily, cat_rows, zones, conv_min, conv_max = task
+
+    # Seed от НОМЕРА магазина в наборе, а не от PLG_STORES.ID —
+    # иначе повторная генерация с тем же seed даёт другие числа.
+    srnd = random.Random(seed * 31 + si)
+    metric_rows = []
+    for (d, amount, qty) in daily:
+        d = d.date() if hasattr(d, 'date') else d
+        amount = float(amount or 0)
+        conv = srnd.uniform(conv_min, conv_max)
+        # Средний чек держим в реальном для рынка диапазоне (~7-9 € по курсу
+        # 19.4 MDL/EUR). Раньше он считался как «средняя цена × 6.5» и давал
+        # ~660 MDL — на бенчмарке с зарубежными сетями наша точка улетала
+        # за пределы облака и сравнение теряло смысл.
+        avg_check = min(280.0, max(90.0, srnd.gauss(148.0, 26.0)))
+        buyers = max(1, int(amount / avg_check))
+        traffic = max(buyers, int(buyers / (conv / 100.0)))
+        metric_rows.append((store_id, d, traffic, buyers, round(conv, 2),
+                            round(avg_check, 2), round(amount, 2)))
+
+    cat_metric_rows = [(store_id, int(cid), (d.date() if hasattr(d, 'date') else d),
+                        int(float(q or 0) * srnd.uniform(2.5, 4.5)), int(float(q or 0)),
+                        round(float(a or 0), 2))
+                       for (d, cid, q, a) in cat_rows]
+
+    # Проходимость зон: доля категории в продажах → нормируем в 0..100
+    cat_share = {}
+    for (_, cid, q, _) in cat_rows:
+        cat_share[int(cid)] = cat_share.get(int(cid), 0.0) + float(q or 0)
+    max_share = max(cat_share.values()) if cat_share else 1.0
+
+    traffic_rows = []
+    recent = sorted({(d.date() if hasattr(d, 'date') else d) for (d, _, _) in daily})[-14:]
+    for (zone_id, cat_id, ztype) in zones:
+        for d in recent:
+            if ztype in ('checkout', 'entrance'):
+                pct = 100.0
+            elif ztype in ('storage', 'service', 'wc'):
+                pct = round(srnd.uniform(2, 20), 2)
+            elif cat_id and cat_id in cat_share:
+                pct = round(min(98.0, 25 + 73 * cat_share[int(cat_id)] / max_share
+                                + srnd.uniform(-6, 6)), 2)
+            else:
+                pct = round(srnd.uniform(30, 70), 2)
+            traffic_rows.append((int(zone_id), d, round(pct, 2),
+                                 int(srnd.uniform(300, 3000)),
+                                 int(srnd.uniform(20, 240)), int(srnd.uniform(50, 900))))
+    return si, metric_rows, cat_metric_rows, traffic_rows
+
+
 class GeneratorCancelled(Exception):
     """Прогон остановлен оператором из админки."""
 
@@ -213,7 +403,8 @@ class DataGenerator:
     STAGES = ['network', 'suppliers', 'assortment', 'events', 'demand', 'traffic',
               'logistics', 'competitors', 'markets']
 
-    def __init__(self, run_id: int, dataset_id: int, params: Dict[str, Any], stages: List[str]):
+    def __init__(self, run_id: int, dataset_id: int, params: Dict[str, Any], stages: List[str],
+                 checkpoint: Optional[Dict[str, Any]] = None):
         self.run_id = run_id
         self.dataset_id = dataset_id
         self.params = params
@@ -224,13 +415,33 @@ class DataGenerator:
         self.cancelled = False
         self.conn = None
         self._t0 = time.time()
+        try:
+            self.workers = max(1, int(params.get('workers') or min(4, os.cpu_count() or 1)))
+        except (TypeError, ValueError):
+            self.workers = 1
+
+        # Контрольная точка прерванного прогона: завершённые этапы, этап,
+        # на котором остановились, и сколько его единиц уже записано.
+        checkpoint = checkpoint or {}
+        self.done_stages: List[str] = list(checkpoint.get('done') or [])
+        self.resume_stage: Optional[str] = checkpoint.get('stage')
+        self.resume_unit = int(checkpoint.get('unit') or 0)
+        if checkpoint.get('rnd'):
+            version, internal, gauss_next = checkpoint['rnd']
+            self.rnd.setstate((version, tuple(internal), gauss_next))
+        # ROWS_WRITTEN прогона считается нарастающим итогом, а в набор
+        # добавляется только записанное в этом запуске.
+        self.rows = int(checkpoint.get('rows') or 0)
+        self._rows_base = self.rows
+        self._rows_committed = self.rows
+        self._resume_pending = bool(checkpoint)
 
     # ==================== Публичный запуск ====================
 
     @staticmethod
     def launch(dataset_id: int, params: Dict[str, Any], stages: List[str],
                username: str) -> Dict[str, Any]:
-        """Создаёт запись прогона и запускает генерацию в фоновом потоке."""
+        """Создаёт запись прогона и ставит генерацию в очередь (models/run_queue.py)."""
         stages = [s for s in (stages or DataGenerator.STAGES) if s in DataGenerator.STAGES]
         if not stages:
             return {"success": False, "error": "Не выбран ни один алгоритм генерации"}
@@ -249,27 +460,115 @@ class DataGenerator:
                  "p_algo": ('full' if len(stages) == len(DataGenerator.STAGES)
                             else ','.join(stages))[:200],
                  "p_params": json.dumps(params, ensure_ascii=False)[:2000],
-                 "p_stage": stages[0], "p_user": username[:150], "p_id": run_id_var})
-            conn.commit()
+                 "p_stage": 'queued', "p_user": username[:150], "p_id": run_id_var})
             run_id = int(run_id_var.getvalue()[0])
+            run_queue.enqueue(cur, 'datagen', run_id,
+                              {"dataset_id": dataset_id, "params": params, "stages": stages},
+                              username)
+            conn.commit()
+        finally:
+            conn.close()
+        return {"success": True, "run_id": run_id, "dataset_id": dataset_id, "stages": stages,
+                "queued": True}
+
+    @staticmethod
+    def resume(run_id: int) -> Dict[str, Any]:
+        """
+        Продолжает прерванный (failed / cancelled) прогон с последней
+        контрольной точки. Запись прогона та же: оператор видит один прогон
+        с RESUME_COUNT, а не цепочку обрывков.
+        """
+        run_id = int(run_id)
+        with DataGenerator._lock:
+            if run_id in DataGenerator._active:
+                return {"success": False, "error": "Прогон уже выполняется"}
+
+        conn = DatabaseConnection.get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT DATASET_ID, ALGORITHM, PARAMS_JSON, STATUS, CHECKPOINT_STAGE, "
+                "CHECKPOINT_UNIT, CHECKPOINT_JSON FROM PLG_GEN_RUNS WHERE ID = :p_id",
+                {"p_id": run_id})
+            row = cur.fetchone()
+            if not row:
+                return {"success": False, "error": "Прогон не найден"}
+            dataset_id, algorithm, params_json, status, ck_stage, ck_unit, ck_json = row
+            if status not in ('failed', 'cancelled'):
+                return {"success": False, "error": "Продолжить можно только прерванный прогон"}
+            if ck_json is None:
+                return {"success": False, "error": "У прогона нет контрольной точки"}
+            if hasattr(ck_json, 'read'):
+                ck_json = ck_json.read()
+            checkpoint = json.loads(ck_json)
+            checkpoint['stage'] = ck_stage
+            checkpoint['unit'] = int(ck_unit or 0)
+            params = json.loads(params_json or '{}')
+            stages = (list(DataGenerator.STAGES) if algorithm == 'full'
+                      else [s for s in (algorithm or '').split(',') if s in DataGenerator.STAGES])
+            if not stages or dataset_id is None:
+                return {"success": False, "error": "Состав прогона не восстанавливается"}
+            cur.execute(
+                "UPDATE PLG_GEN_RUNS SET STATUS = 'running', STAGE = 'queued', MESSAGE = NULL, "
+                "FINISHED_AT = NULL, RESUME_COUNT = NVL(RESUME_COUNT, 0) + 1 WHERE ID = :p_id",
+                {"p_id": run_id})
+            cur.execute("UPDATE PLG_DATASETS SET STATUS = 'building' WHERE ID = :p_id",
+                        {"p_id": int(dataset_id)})
+            # Контрольную точку воркер перечитает из PLG_GEN_RUNS при старте
+            # задания: между постановкой и стартом она не меняется.
+            run_queue.enqueue(cur, 'datagen', run_id,
+                              {"dataset_id": int(dataset_id), "params": params,
+                               "stages": stages, "resume": True})
+            conn.commit()
+        finally:
+            conn.close()
+
+        done = list(checkpoint.get('done') or [])
+        return {"success": True, "run_id": run_id, "dataset_id": int(dataset_id),
+                "stages": [s for s in stages if s not in done],
+                "resume_stage": checkpoint.get('stage'), "resume_unit": checkpoint['unit'],
+                "queued": True}
+
+    @staticmethod
+    def _load_checkpoint(run_id: int) -> Dict[str, Any]:
+        conn = DatabaseConnection.get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT CHECKPOINT_STAGE, CHECKPOINT_UNIT, CHECKPOINT_JSON "
+                "FROM PLG_GEN_RUNS WHERE ID = :p_id", {"p_id": int(run_id)})
+            row = cur.fetchone()
         finally:
             conn.close()
+        if not row or row[2] is None:
+            return {}
+        ck_json = row[2].read() if hasattr(row[2], 'read') else row[2]
+        checkpoint = json.loads(ck_json)
+        checkpoint['stage'] = row[0]
+        checkpoint['unit'] = int(row[1] or 0)
+        return checkpoint
 
-        gen = DataGenerator(run_id, dataset_id, params, stages)
+    @staticmethod
+    def from_job(run_id: int, payload: Dict[str, Any]) -> "DataGenerator":
+        """Экземпляр прогона из задания очереди (models/run_queue.py)."""
+        checkpoint = DataGenerator._load_checkpoint(run_id) if payload.get('resume') else None
+        gen = DataGenerator(run_id, int(payload["dataset_id"]), payload.get("params") or {},
+                            payload["stages"], checkpoint)
         with DataGenerator._lock:
             DataGenerator._active[run_id] = gen
-        thread = threading.Thread(target=gen._run, name=f"plg-datagen-{run_id}", daemon=True)
-        thread.start()
-        return {"success": True, "run_id": run_id, "dataset_id": dataset_id, "stages": stages}
+        return gen
 
     @staticmethod
     def cancel(run_id: int) -> Dict[str, Any]:
         with DataGenerator._lock:
             gen = DataGenerator._active.get(int(run_id))
-        if not gen:
-            return {"success": False, "error": "Прогон не найден среди активных"}
-        gen.cancelled = True
-        return {"success": True}
+        if gen:
+            gen.cancelled = True
+            return {"success": True}
+        # Прогон в очереди или у воркера в другом процессе
+        if run_queue.request_cancel('datagen', run_id):
+            return {"success": True}
+        return {"success": False, "error": "Прогон не найден среди активных"}
 
     # ==================== Внутренняя механика ====================
 
@@ -290,7 +589,17 @@ class DataGenerator:
             pass
 
     def _finish(self, status: str, message: str = ""):
+        """
+        Закрывает прогон. При отмене и сбое сначала откатывает незафиксированную
+        часть текущей единицы (магазин сети, пачка ассортимента, события):
+        иначе COMMIT статуса записал бы её, и продолжение прогона вставило бы
+        эти строки второй раз. Счётчик строк возвращается к последней
+        контрольной точке.
+        """
         try:
+            if status != 'done':
+                self.conn.rollback()
+                self.rows = self._rows_committed
             cur = self.conn.cursor()
             cur.execute(
                 "UPDATE PLG_GEN_RUNS SET STATUS = :p_status, PROGRESS_PCT = :p_pct, "
@@ -303,7 +612,8 @@ class DataGenerator:
             cur.execute(
                 "UPDATE PLG_DATASETS SET STATUS = :p_status, ROWS_TOTAL = ROWS_TOTAL + :p_rows, "
                 "FINISHED_AT = SYSTIMESTAMP WHERE ID = :p_id",
-                {"p_status": ds_status, "p_rows": self.rows, "p_id": self.dataset_id})
+                {"p_status": ds_status, "p_rows": self.rows - self._rows_base,
+                 "p_id": self.dataset_id})
             self.conn.commit()
         except Exception:
             pass
@@ -322,12 +632,18 @@ class DataGenerator:
             total_weight = sum(weights[s] for s in self.stages) or 1
             done_weight = 0
             for stage in self.stages:
+                if stage in self.done_stages:
+                    done_weight += weights[stage]
+                    continue
                 self._check_cancel()
                 self._progress(stage, int(done_weight / total_weight * 100))
                 getattr(self, f"_gen_{stage}")(
                     lambda p, st=stage, dw=done_weight, w=weights[stage]:
                     self._progress(st, int((dw + w * p) / total_weight * 100)))
                 done_weight += weights[stage]
+                self._resume_pending = False
+                self.done_stages.append(stage)
+                self._checkpoint(None, 0)
             self._finish('done', f"Сгенерировано строк: {self.rows}")
         except GeneratorCancelled:
             self._finish('cancelled', 'Прогон остановлен оператором')
@@ -342,6 +658,54 @@ class DataGenerator:
             with DataGenerator._lock:
                 DataGenerator._active.pop(self.run_id, None)
 
+    # ==================== Контрольные точки ====================
+
+    def _checkpoint(self, stage: Optional[str], unit: int):
+        """
+        Фиксирует записанную единицу этапа и COMMIT'ит её вместе с данными.
+
+        Вызывается вместо голого commit() в конце магазина (поставщика, ...):
+        UPDATE контрольной точки попадает в ту же транзакцию, что и строки
+        магазина, поэтому после сбоя точка никогда не «обгоняет» данные.
+        stage=None — этап целиком завершён и уже внесён в done_stages.
+        """
+        version, internal, gauss_next = self.rnd.getstate()
+        state = json.dumps({"done": self.done_stages, "rows": self.rows,
+                            "rnd": [version, list(internal), gauss_next]})
+        cur = self.conn.cursor()
+        cur.setinputsizes(p_json=oracledb.DB_TYPE_CLOB)
+        cur.execute(
+            "UPDATE PLG_GEN_RUNS SET CHECKPOINT_STAGE = :p_stage, CHECKPOINT_UNIT = :p_unit, "
+            "CHECKPOINT_JSON = :p_json, ROWS_WRITTEN = :p_rows WHERE ID = :p_id",
+            {"p_stage": stage, "p_unit": int(unit), "p_json": state,
+             "p_rows": self.rows, "p_id": self.run_id})
+        self.conn.commit()
+        self._rows_committed = self.rows
+
+    def _resume_from(self, stage: str) -> Optional[int]:
+        """
+        Для первого этапа после продолжения — номер первой незаписанной
+        единицы (0, если этап оборвался до первой контрольной точки).
+        None — этап идёт с нуля в обычном порядке, подчищать нечего.
+        """
+        if not self._resume_pending:
+            return None
+        self._resume_pending = False
+        return self.resume_unit if self.resume_stage == stage else 0
+
+    def _discard_store_rows(self, table: str, stores: List[Tuple], start: int,
+                            where: str = "STORE_ID = :1"):
+        """
+        Удаляет строки магазинов stores[start:] — хвост этапа, который
+        пишется пачками по BATCH и мог закоммитить часть магазина до сбоя.
+        """
+        if start >= len(stores):
+            return
+        cur = self.conn.cursor()
+        cur.executemany(f"DELETE FROM {table} WHERE {where}",
+                        [(int(st[0]),) for st in stores[start:]])
+        self.conn.commit()
+
     def _executemany(self, sql: str, rows: List[Tuple], batch: int = BATCH):
         if not rows:
             return
@@ -373,7 +737,7 @@ class DataGenerator:
         weights = {'hyper': 1, 'super': 4, 'discounter': 3, 'convenience': 4}
         pool = [f for f in formats for _ in range(weights.get(f, 1))]
 
-        for i in range(count):
+        for i in range(self._resume_from('network') or 0, count):
             self._check_cancel()
             fmt = pool[i % len(pool)] if i < len(pool) else self.rnd.choice(pool)
             prof = STORE_FORMATS[fmt]
@@ -429,7 +793,7 @@ class DataGenerator:
                 self.rows += 1
 
             self._gen_fixtures(cur, store_id, fmt, zone_ids)
-            self.conn.commit()
+            self._checkpoint('network', i + 1)
             progress((i + 1) / count)
 
     @staticmethod
@@ -547,10 +911,15 @@ class DataGenerator:
             plan[0] = (plan[0][0], max(1, plan[0][1] + diff))
 
         made = 0
+        first = self._resume_from('assortment') or 0
         for ccode, qty in plan:
             prof = CATEGORY_PROFILE[ccode]
             bases = SKU_BASE.get(ccode, [(ccode, ccode, ccode)])
             for n in range(qty):
+                if made < first:
+                    # Уже записан до сбоя; состояние rnd восстановлено из точки
+                    made += 1
+                    continue
                 self._check_cancel()
                 base = bases[n % len(bases)]
                 variant = SKU_VARIANT[self.rnd.randrange(len(SKU_VARIANT))]
@@ -587,7 +956,7 @@ class DataGenerator:
                      "p_sup_id": sup_id})
                 self.rows += 1
                 if made % 100 == 0:
-                    self.conn.commit()
+                    self._checkpoint('assortment', made)
                     progress(made / total)
         self.conn.commit()
         cur.execute("UPDATE PLG_DATASETS SET SKU_COUNT = :p_n WHERE ID = :p_id",
@@ -615,7 +984,10 @@ class DataGenerator:
         today = date.today()
         cur = self.conn.cursor()
 
+        first = self._resume_from('events') or 0
         for si, (store_id, store_code) in enumerate(stores):
+            if si < first:
+                continue
             self._check_cancel()
             zones = self._fetch(
                 "SELECT ID, CODE, CATEGORY_ID FROM PLG_ZONES WHERE STORE_ID = :p_st "
@@ -756,7 +1128,7 @@ class DataGenerator:
                      "p_read": self.rnd.choice([0, 0, 1]), "p_ago": self.rnd.uniform(0, 20)})
                 self.rows += 1
 
-            self.conn.commit()
+            self._checkpoint('events', si + 1)
             progress((si + 1) / len(stores))
 
     # ==================== 4. История спроса ====================
@@ -770,13 +1142,18 @@ class DataGenerator:
 
         Ассортимент магазина зависит от формата: гипермаркет держит всю матрицу,
         «у дома» — только треть, поэтому сеть выглядит неоднородно, как настоящая.
+
+        Ряды магазина считает _demand_shard в пуле процессов; здесь — только
+        подготовка входа, запись в порядке магазинов и контрольная точка.
         """
         days = int(self.params.get('days') or 365)
-        noise_pct = float(self.params.get('noise_pct') or 18) / 100.0
-        oos_rate = float(self.params.get('oos_rate') or 0.015)
-        trend_year = float(self.params.get('trend_pct_year') or 6) / 100.0
-        weekly_amp = float(self.params.get('weekly_amplitude') or 0.35)
-        yearly_amp_k = float(self.params.get('yearly_amplitude') or 0.20)
+        knobs = {
+            'noise_pct': float(self.params.get('noise_pct') or 18) / 100.0,
+            'oos_rate': float(self.params.get('oos_rate') or 0.015),
+            'trend_year': float(self.params.get('trend_pct_year') or 6) / 100.0,
+            'weekly_amp': float(self.params.get('weekly_amplitude') or 0.35),
+            'yearly_amp_k': float(self.params.get('yearly_amplitude') or 0.20),
+        }
 
         stores = self._fetch(
             "SELECT ID, STORE_FORMAT, AREA_SQM FROM PLG_STORES WHERE DATASET_ID = :p_ds ORDER BY ID",
@@ -788,123 +1165,98 @@ class DataGenerator:
         if not stores or not products:
             return
 
+        first = self._resume_from('demand')
+        if first is not None:
+            self._discard_store_rows("PLG_SALES_DAILY", stores, first)
+        first = first or 0
+
         today = date.today()
         start = today - timedelta(days=days - 1)
 
-        # Промо-календарь: (store_id, product_id) -> {date_ordinal: (promo_id, discount)}
-        promo_map: Dict[Tuple[int, int], Dict[int, Tuple[int, float]]] = {}
+        # Промо-календарь: store_id -> product_id -> {date_ordinal: (promo_id, discount)}.
+        # Разложен по магазинам, чтобы в процесс пула уходил только свой кусок.
+        promo_map: Dict[int, Dict[int, Dict[int, Tuple[int, float]]]] = {}
         for (pid, store_id, d_from, d_to, disc, prod_id) in self._fetch(
                 "SELECT pr.ID, pr.STORE_ID, pr.DATE_FROM, pr.DATE_TO, NVL(pr.DISCOUNT_PCT,0), pp.PRODUCT_ID "
                 "FROM PLG_PROMOS pr JOIN PLG_PROMO_PRODUCTS pp ON pp.PROMO_ID = pr.ID "
                 "JOIN PLG_STORES s ON s.ID = pr.STORE_ID WHERE s.DATASET_ID = :p_ds "
                 "ORDER BY pr.ID",
                 {"p_ds": self.dataset_id}):
-            key = (int(store_id), int(prod_id))
-            bucket = promo_map.setdefault(key, {})
+            bucket = promo_map.setdefault(int(store_id), {}).setdefault(int(prod_id), {})
             d = d_from.date() if hasattr(d_from, 'date') else d_from
             end = d_to.date() if hasattr(d_to, 'date') else d_to
             while d <= end:
                 bucket[d.toordinal()] = (int(pid), float(disc))
                 d += timedelta(days=1)
 
-        abc_base = {'A': (7.0, 26.0), 'B': (2.2, 8.0), 'C': (0.35, 2.6)}
         sql = ("INSERT INTO PLG_SALES_DAILY (ID, STORE_ID, PRODUCT_ID, SALES_DATE, QTY, AMOUNT, "
                "PRICE, PROMO_ID, STOCK_END, IS_OOS) "
                "VALUES (PLG_SALES_SEQ.NEXTVAL, :1, :2, :3, :4, :5, :6, :7, :8, :9)")
 
-        total_pairs = 0
+        pairs_by_store = []
         for store_id, fmt, area in stores:
             share = STORE_FORMATS.get(fmt, STORE_FORMATS['super'])['assortment_share']
-            total_pairs += max(1, int(len(products) * share))
-        done_pairs = 0
-        buffer: List[Tuple] = []
-
-        # Порядковый номер товара внутри набора. Именно он, а НЕ PLG_PRODUCTS.ID,
-        # идёт в seed: ID выдаёт последовательность Oracle, поэтому у второго
-        # набора с тем же seed он другой, и данные переставали воспроизводиться.
-        prod_index = {int(p[0]): i for i, p in enumerate(products)}
-
-        for store_idx, (store_id, fmt, area) in enumerate(stores):
-            self._check_cancel()
-            prof = STORE_FORMATS.get(fmt, STORE_FORMATS['super'])
-            share = prof['assortment_share']
-            traffic_k = sum(prof['traffic']) / 2.0 / 3000.0   # нормировка к «среднему» супермаркету
-
-            # Ассортимент магазина детерминирован seed'ом и НОМЕРОМ магазина в наборе
-            srnd = random.Random(self.seed * 7919 + store_idx)
-            local_products = products if share >= 0.999 else srnd.sample(
-                products, max(1, int(len(products) * share)))
+            pairs_by_store.append(max(1, int(len(products) * share)))
+        total_pairs = sum(pairs_by_store)
+        done_pairs = sum(pairs_by_store[:first])
+
+        plain_products = [(int(p[0]), p[1], p[2], p[3], p[4]) for p in products]
+        tasks = ((self.seed, store_idx, int(store_id), fmt, plain_products,
+                  promo_map.get(int(store_id), {}), start, days, knobs)
+                 for store_idx, (store_id, fmt, area) in enumerate(stores)
+                 if store_idx >= first)
+
+        for store_idx, rows in self._shard_map(_demand_shard, tasks):
+            self._executemany(sql, rows)
+            done_pairs += pairs_by_store[store_idx]
+            self._checkpoint('demand', store_idx + 1)
+            progress(done_pairs / max(1, total_pairs))
 
-            for (prod_id, ccode, price, abc, pack) in local_products:
-                self._check_cancel()
-                cprof = CATEGORY_PROFILE.get(ccode, CATEGORY_PROFILE['grocery'])
-                lo, hi = abc_base.get(abc or 'C', abc_base['C'])
-                prnd = random.Random(self.seed * 104729 + store_idx * 7919
-                                     + prod_index.get(int(prod_id), 0))
-                base = prnd.uniform(lo, hi) * traffic_k
-                yearly_amp = cprof['yearly_amp'] * (yearly_amp_k / 0.20)
-                phase = cprof['yearly_phase']
-                price_f = float(price or 10)
-                pack = int(pack or 1)
-                bucket = promo_map.get((int(store_id), int(prod_id)), {})
-
-                stock = base * prnd.uniform(4, 9)
-                reorder_point = base * 3
-                target_stock = base * 10
-
-                for i in range(days):
-                    d = start + timedelta(days=i)
-                    doy = d.timetuple().tm_yday
-                    yearly = 1.0 + yearly_amp * math.sin(2 * math.pi * (doy - phase) / 365.0)
-                    wd = WEEKDAY_PROFILE[d.weekday()]
-                    weekday_f = 1.0 + (wd - 1.0) * (weekly_amp / 0.35)
-                    trend = (1.0 + trend_year) ** (i / 365.0)
-
-                    promo = bucket.get(d.toordinal())
-                    if promo:
-                        promo_id, disc = promo
-                        uplift = 1.35 + (disc / 100.0) * 2.6
-                    else:
-                        promo_id, disc, uplift = None, 0.0, 1.0
-
-                    noise = max(0.15, prnd.gauss(1.0, noise_pct))
-                    demand = base * yearly * weekday_f * trend * uplift * noise
-
-                    # Пополнение: (s,S) — при падении ниже точки заказа приходит партия
-                    if stock < reorder_point:
-                        stock += max(pack, math.ceil((target_stock - stock) / pack) * pack)
-
-                    is_oos = 0
-                    if prnd.random() < oos_rate:
-                        # Разрыв поставки: продали только то, что было
-                        demand *= prnd.uniform(0.0, 0.35)
-                        is_oos = 1
-                    if demand > stock:
-                        demand = stock
-                        is_oos = 1
-
-                    qty = round(max(0.0, demand), 3)
-                    stock = round(max(0.0, stock - qty), 3)
-                    sell_price = round(price_f * (1 - disc / 100.0), 2)
-                    buffer.append((int(store_id), int(prod_id), d, qty,
-                                   round(qty * sell_price, 2), sell_price,
-                                   promo_id, stock, is_oos))
-
-                    if len(buffer) >= BATCH:
-                        self._executemany(sql, buffer)
-                        buffer = []
-
-                done_pairs += 1
-                if done_pairs % 200 == 0:
-                    progress(done_pairs / max(1, total_pairs))
-
-        if buffer:
-            self._executemany(sql, buffer)
         cur = self.conn.cursor()
         cur.execute("UPDATE PLG_DATASETS SET DAYS_DEPTH = :p_d, STORE_COUNT = :p_s WHERE ID = :p_id",
                     {"p_d": days, "p_s": len(stores), "p_id": self.dataset_id})
         self.conn.commit()
 
+    def _shard_map(self, fn, tasks):
+        """
+        Считает fn(task) в пуле процессов и отдаёт результаты СТРОГО в порядке
+        задач. В полёте держится не больше workers × SHARD_WINDOW задач: ряды
+        спроса большого магазина — миллионы строк, и копить их быстрее, чем
+        Oracle успевает писать, нельзя. При workers=1, под eventlet или если
+        пул не поднялся / сломался по ходу (BrokenProcessPool) всё — включая
+        задачи, бывшие в полёте, — считается в текущем потоке: результат тот
+        же, задачи от порядка исполнения не зависят.
+        """
+        tasks = iter(tasks)
+        pool = _process_pool(self.workers)
+        if pool is not None:
+            window = self.workers * SHARD_WINDOW
+            pending = deque()
+            try:
+                for task in tasks:
+                    self._check_cancel()
+                    pending.append((task, pool.submit(fn, task)))
+                    if len(pending) >= window:
+                        yield pending[0][1].result()
+                        pending.popleft()
+                while pending:
+                    self._check_cancel()
+                    yield pending[0][1].result()
+                    pending.popleft()
+                return
+            except (BrokenProcessPool, OSError):
+                # Пул не поднялся или его процессы убиты — досчитываем то, что
+                # было в полёте, и остаток в текущем потоке, в том же порядке.
+                tasks = itertools.chain([t for t, _ in pending], tasks)
+                pending.clear()
+            finally:
+                for _, fut in pending:
+                    fut.cancel()
+                pool.shutdown(wait=True, cancel_futures=True)
+        for task in tasks:
+            self._check_cancel()
+            yield fn(task)
+
     # ==================== 5. Трафик и показатели ====================
 
     def _gen_traffic(self, progress):
@@ -913,6 +1265,9 @@ class DataGenerator:
         выручка = сумма продаж дня, покупатели = выручка / средний чек,
         трафик = покупатели / конверсия. Поэтому дашборд и аналитика
         согласованы с историей спроса, а не живут своей жизнью.
+
+        Чтение агрегатов идёт здесь, расчёт — в _traffic_shard в пуле
+        процессов: пока процесс считает магазин, поток читает следующий.
         """
         conv_min = float(self.params.get('conversion_min') or 16)
         conv_max = float(self.params.get('conversion_max') or 21)
@@ -920,83 +1275,50 @@ class DataGenerator:
                              {"p_ds": self.dataset_id})
         if not stores:
             return
-        cur = self.conn.cursor()
-
-        for si, (store_id,) in enumerate(stores):
-            self._check_cancel()
-            daily = self._fetch(
-                "SELECT SALES_DATE, SUM(AMOUNT), SUM(QTY) FROM PLG_SALES_DAILY "
-                "WHERE STORE_ID = :p_st GROUP BY SALES_DATE ORDER BY SALES_DATE",
-                {"p_st": store_id})
-            if not daily:
-                continue
 
-            # Seed от НОМЕРА магазина в наборе, а не от PLG_STORES.ID —
-            # иначе повторная генерация с тем же seed даёт другие числа.
-            srnd = random.Random(self.seed * 31 + si)
-            metric_rows = []
-            for (d, amount, qty) in daily:
-                d = d.date() if hasattr(d, 'date') else d
-                amount = float(amount or 0)
-                conv = srnd.uniform(conv_min, conv_max)
-                # Средний чек держим в реальном для рынка диапазоне (~7-9 € по курсу
-                # 19.4 MDL/EUR). Раньше он считался как «средняя цена × 6.5» и давал
-                # ~660 MDL — на бенчмарке с зарубежными сетями наша точка улетала
-                # за пределы облака и сравнение теряло смысл.
-                avg_check = min(280.0, max(90.0, srnd.gauss(148.0, 26.0)))
-                buyers = max(1, int(amount / avg_check))
-                traffic = max(buyers, int(buyers / (conv / 100.0)))
-                metric_rows.append((int(store_id), d, traffic, buyers, round(conv, 2),
-                                    round(avg_check, 2), round(amount, 2)))
+        first = self._resume_from('traffic')
+        if first is not None:
+            self._discard_store_rows("PLG_STORE_METRICS", stores, first)
+            self._discard_store_rows("PLG_CATEGORY_METRICS", stores, first)
+            self._discard_store_rows("PLG_ZONE_TRAFFIC", stores, first,
+                                     "ZONE_ID IN (SELECT ID FROM PLG_ZONES WHERE STORE_ID = :1)")
+        first = first or 0
+
+        def tasks():
+            for si in range(first, len(stores)):
+                store_id = int(stores[si][0])
+                daily = self._fetch(
+                    "SELECT SALES_DATE, SUM(AMOUNT), SUM(QTY) FROM PLG_SALES_DAILY "
+                    "WHERE STORE_ID = :p_st GROUP BY SALES_DATE ORDER BY SALES_DATE",
+                    {"p_st": store_id})
+                if not daily:
+                    continue
+                # Показатели по категориям — из продаж категории
+                cat_rows = self._fetch(
+                    "SELECT sd.SALES_DATE, p.CATEGORY_ID, SUM(sd.QTY), SUM(sd.AMOUNT) "
+                    "FROM PLG_SALES_DAILY sd JOIN PLG_PRODUCTS p ON p.ID = sd.PRODUCT_ID "
+                    "WHERE sd.STORE_ID = :p_st AND p.CATEGORY_ID IS NOT NULL "
+                    "GROUP BY sd.SALES_DATE, p.CATEGORY_ID "
+                    "ORDER BY sd.SALES_DATE, p.CATEGORY_ID", {"p_st": store_id})
+                zones = self._fetch(
+                    "SELECT ID, CATEGORY_ID, ZONE_TYPE FROM PLG_ZONES WHERE STORE_ID = :p_st ORDER BY ID",
+                    {"p_st": store_id})
+                yield (self.seed, si, store_id, daily, cat_rows, zones, conv_min, conv_max)
+
+        for si, metric_rows, cat_metric_rows, traffic_rows in self._shard_map(_traffic_shard, tasks()):
             self._executemany(
                 "INSERT INTO PLG_STORE_METRICS (STORE_ID, METRIC_DATE, TRAFFIC, BUYERS, "
                 "CONVERSION_PCT, AVG_CHECK, REVENUE, CURRENCY) "
                 "VALUES (:1, :2, :3, :4, :5, :6, :7, 'MDL')", metric_rows)
-
-            # Показатели по категориям — из продаж категории
-            cat_rows = self._fetch(
-                "SELECT sd.SALES_DATE, p.CATEGORY_ID, SUM(sd.QTY), SUM(sd.AMOUNT) "
-                "FROM PLG_SALES_DAILY sd JOIN PLG_PRODUCTS p ON p.ID = sd.PRODUCT_ID "
-                "WHERE sd.STORE_ID = :p_st AND p.CATEGORY_ID IS NOT NULL "
-                "GROUP BY sd.SALES_DATE, p.CATEGORY_ID", {"p_st": store_id})
             self._executemany(
                 "INSERT INTO PLG_CATEGORY_METRICS (STORE_ID, CATEGORY_ID, METRIC_DATE, "
                 "VISITS, SALES_QTY, SALES_AMT) VALUES (:1, :2, :3, :4, :5, :6)",
-                [(int(store_id), int(cid), (d.date() if hasattr(d, 'date') else d),
-                  int(float(q or 0) * srnd.uniform(2.5, 4.5)), int(float(q or 0)), round(float(a or 0), 2))
-                 for (d, cid, q, a) in cat_rows])
-
-            # Проходимость зон: доля категории в продажах → нормируем в 0..100
-            zones = self._fetch(
-                "SELECT ID, CATEGORY_ID, ZONE_TYPE FROM PLG_ZONES WHERE STORE_ID = :p_st ORDER BY ID",
-                {"p_st": store_id})
-            cat_share = {}
-            total_qty = sum(float(q or 0) for (_, _, q, _) in cat_rows) or 1.0
-            for (_, cid, q, _) in cat_rows:
-                cat_share[int(cid)] = cat_share.get(int(cid), 0.0) + float(q or 0)
-            max_share = max(cat_share.values()) if cat_share else 1.0
-
-            traffic_rows = []
-            recent = sorted({(d.date() if hasattr(d, 'date') else d) for (d, _, _) in daily})[-14:]
-            for (zone_id, cat_id, ztype) in zones:
-                for d in recent:
-                    if ztype in ('checkout', 'entrance'):
-                        pct = 100.0
-                    elif ztype in ('storage', 'service', 'wc'):
-                        pct = round(srnd.uniform(2, 20), 2)
-                    elif cat_id and cat_id in cat_share:
-                        pct = round(min(98.0, 25 + 73 * cat_share[int(cat_id)] / max_share
-                                        + srnd.uniform(-6, 6)), 2)
-                    else:
-                        pct = round(srnd.uniform(30, 70), 2)
-                    traffic_rows.append((int(zone_id), d, round(pct, 2),
-                                         int(srnd.uniform(300, 3000)),
-                                         int(srnd.uniform(20, 240)), int(srnd.uniform(50, 900))))
+                cat_metric_rows)
             self._executemany(
                 "INSERT INTO PLG_ZONE_TRAFFIC (ZONE_ID, METRIC_DATE, METRIC_HOUR, TRAFFIC_PCT, "
                 "VISITORS, DWELL_SEC, PICKUPS) VALUES (:1, :2, NULL, :3, :4, :5, :6)",
                 traffic_rows)
-
+            self._checkpoint('traffic', si + 1)
             progress((si + 1) / len(stores))
 
     # ==================== 6. Поставщики ====================
@@ -1012,7 +1334,10 @@ class DataGenerator:
         cur = self.conn.cursor()
         total = len(SUPPLIER_BRANDS)
 
+        first = self._resume_from('suppliers') or 0
         for idx, (brand, stype, ccodes, country) in enumerate(SUPPLIER_BRANDS):
+            if idx < first:
+                continue
             self._check_cancel()
             srnd = random.Random(self.seed * 6151 + idx)
             city = 'Chișinău' if country == 'MD' else {'RO': 'București', 'IT': 'Milano',
@@ -1118,7 +1443,7 @@ class DataGenerator:
                      "p_margin": round(srnd.uniform(8, 34), 2)})
                 self.rows += 1
 
-            self.conn.commit()
+            self._checkpoint('suppliers', idx + 1)
             progress((idx + 1) / total)
 
     # ==================== 7. Логистика: РЦ, парк, рейсы ====================
@@ -1146,6 +1471,13 @@ class DataGenerator:
         if not stores:
             return
         cur = self.conn.cursor()
+        if self._resume_from('logistics') is not None:
+            # Расписание построено на одном потоке lrnd, продолжить его с
+            # середины нельзя: недописанный этап сносим и строим целиком.
+            # Рейсы и закрепление магазинов уходят каскадом от РЦ.
+            cur.execute("DELETE FROM PLG_VEHICLES WHERE DATASET_ID = :p_ds", {"p_ds": self.dataset_id})
+            cur.execute("DELETE FROM PLG_DC WHERE DATASET_ID = :p_ds", {"p_ds": self.dataset_id})
+            self.conn.commit()
         lrnd = random.Random(self.seed * 15485863)
 
         # --- Один центральный РЦ на сеть (схема «РЦ + прямые поставки»)
@@ -1406,8 +1738,20 @@ class DataGenerator:
         check_rounds = int(self.params.get('price_rounds') or 4)
         today = date.today()
 
+        first = self._resume_from('competitors')
+        if first is not None:
+            # Цены конкурента пишутся пачками и могли закоммититься без него
+            # самого: недописанного конкурента удаляем каскадом и строим заново.
+            cur.executemany("DELETE FROM PLG_COMPETITORS WHERE DATASET_ID = :1 AND CODE = :2",
+                            [(self.dataset_id, f"D{self.dataset_id}-CMP-{ci + 1:02d}")
+                             for ci in range(first, len(COMPETITOR_CHAINS))])
+            self.conn.commit()
+        first = first or 0
+
         base_idx = {'discount': 0.88, 'mid': 1.0, 'premium': 1.14}
         for ci, (name, positioning, share, store_count, color) in enumerate(COMPETITOR_CHAINS):
+            if ci < first:
+                continue
             self._check_cancel()
             crnd = random.Random(self.seed * 2654435761 + ci)
             c_var = cur.var(int)
@@ -1477,7 +1821,7 @@ class DataGenerator:
                      "p_share": round(crnd.uniform(2, 25), 2)})
                 self.rows += 1
 
-            self.conn.commit()
+            self._checkpoint('competitors', ci + 1)
             progress((ci + 1) / len(COMPETITOR_CHAINS))
 
     # ==================== 9. Рынки других стран ====================
@@ -1485,8 +1829,11 @@ class DataGenerator:
     def _gen_markets(self, progress):
         """Страны-рынки и схожие торговые сети для бенчмарка."""
         cur = self.conn.cursor()
+        first = self._resume_from('markets') or 0
         for mi, (code, ru, ro, en, pop, gdp, curr, retail, modern,
                  top5, check_eur, per100k, pl) in enumerate(MARKET_DATA):
+            if mi < first:
+                continue
             self._check_cancel()
             mrnd = random.Random(self.seed * 97 + mi)
             m_var = cur.var(int)
@@ -1522,7 +1869,7 @@ class DataGenerator:
                      "p_online": online, "p_loy": 1 if mrnd.random() < 0.8 else 0,
                      "p_bench": 1 if code == 'MD' or mrnd.random() < 0.25 else 0})
                 self.rows += 1
-            self.conn.commit()
+            self._checkpoint('markets', mi + 1)
             progress((mi + 1) / len(MARKET_DATA))
 
 
@@ -22,7 +22,12 @@
   order_qty    = max(0, спрос за (lead_time + horizon) + safety_stock − остаток)
   и округляется вверх до кратности короба (ORDER_MULTIPLE).
 
-Oracle-объекты: sql/85_plg_forecast.sql
+Завершённый прогон сворачивается в снимок заказа PLG_ORDER_SNAPSHOT
+(строка на магазин × SKU) — экраны заказа читают его, а не PLG_FCT_RESULTS.
+
+Прогоны выполняются через очередь models/run_queue.py (launch ставит задание).
+
+Oracle-объекты: sql/85_plg_forecast.sql, sql/115_plg_order_snapshot.sql
 """
 from __future__ import annotations
 
@@ -39,6 +44,7 @@ root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
+from models import run_queue
 from models.database import DatabaseConnection
 
 BATCH = 10000
@@ -547,6 +553,70 @@ def fresh_order(daily_forecast: Sequence[float], origin: date, route: Dict,
     }
 
 
+# ==================== Снимок заказа ====================
+
+_SNAPSHOT_SQL = (
+    "INSERT INTO PLG_ORDER_SNAPSHOT (RUN_ID, STORE_ID, PRODUCT_ID, SUPPLIER_ID, "
+    "DATE_FROM, DATE_TO, QTY_FORECAST, QTY_ACTUAL, SAFETY_STOCK, STOCK_ON_HAND, ORDER_QTY, "
+    "COVERAGE_DAYS, ROUTE, NEXT_DELIVERY, WASTE_FORECAST, PRICE, ORDER_AMOUNT, "
+    "QTY_ADJUSTED, ADJ_REASON, ADJ_NOTE, ADJ_BY, ADJ_AT, QTY_FINAL, AMOUNT_FINAL, IS_ADJUSTED) "
+    "SELECT g.RUN_ID, g.STORE_ID, g.PRODUCT_ID, p.SUPPLIER_ID, "
+    "g.DATE_FROM, g.DATE_TO, g.QTY_FORECAST, g.QTY_ACTUAL, g.SAFETY_STOCK, g.STOCK_ON_HAND, "
+    "g.ORDER_QTY, g.COVERAGE_DAYS, g.ROUTE, g.NEXT_DELIVERY, g.WASTE_FORECAST, p.PRICE, "
+    "ROUND(g.ORDER_QTY * p.PRICE, 2), "
+    "a.QTY_ADJUSTED, a.REASON, a.NOTE, a.USERNAME, a.UPDATED_AT, "
+    "NVL(a.QTY_ADJUSTED, g.ORDER_QTY), ROUND(NVL(a.QTY_ADJUSTED, g.ORDER_QTY) * p.PRICE, 2), "
+    "CASE WHEN a.ID IS NOT NULL THEN 1 ELSE 0 END "
+    "FROM (SELECT RUN_ID, STORE_ID, PRODUCT_ID, MIN(FCT_DATE) AS DATE_FROM, "
+    "      MAX(FCT_DATE) AS DATE_TO, ROUND(SUM(QTY_FORECAST), 3) AS QTY_FORECAST, "
+    "      ROUND(SUM(QTY_ACTUAL), 3) AS QTY_ACTUAL, ROUND(MAX(SAFETY_STOCK), 3) AS SAFETY_STOCK, "
+    "      ROUND(MAX(STOCK_ON_HAND), 3) AS STOCK_ON_HAND, ROUND(SUM(ORDER_QTY), 3) AS ORDER_QTY, "
+    "      MAX(COVERAGE_DAYS) AS COVERAGE_DAYS, MAX(ROUTE) AS ROUTE, "
+    "      MAX(NEXT_DELIVERY) AS NEXT_DELIVERY, ROUND(SUM(WASTE_FORECAST), 3) AS WASTE_FORECAST "
+    "      FROM PLG_FCT_RESULTS WHERE RUN_ID = :p_run "
+    "      GROUP BY RUN_ID, STORE_ID, PRODUCT_ID) g "
+    "JOIN PLG_PRODUCTS p ON p.ID = g.PRODUCT_ID "
+    "LEFT JOIN PLG_ORDER_ADJUSTMENTS a ON a.RUN_ID = g.RUN_ID AND a.STORE_ID = g.STORE_ID "
+    " AND a.PRODUCT_ID = g.PRODUCT_ID AND a.STATUS = 'active'")
+
+
+def materialize_order_snapshot(conn, run_id: int) -> int:
+    """
+    Свод PLG_FCT_RESULTS прогона → PLG_ORDER_SNAPSHOT одним INSERT ... SELECT
+    в базе. Повторный вызов пересобирает снимок (корректировки берутся из
+    журнала PLG_ORDER_ADJUSTMENTS, поэтому не теряются). Возвращает число строк.
+    """
+    cur = conn.cursor()
+    cur.execute("DELETE FROM PLG_ORDER_SNAPSHOT WHERE RUN_ID = :p_run", {"p_run": int(run_id)})
+    cur.execute(_SNAPSHOT_SQL, {"p_run": int(run_id)})
+    rows = cur.rowcount or 0
+    cur.execute("UPDATE PLG_FCT_RUNS SET SNAPSHOT_ROWS = :p_n WHERE ID = :p_run",
+                {"p_n": rows, "p_run": int(run_id)})
+    conn.commit()
+    return rows
+
+
+def ensure_order_snapshot(conn, run_id: int) -> bool:
+    """
+    Снимок прогона готов — или собирается сейчас, если прогон завершён
+    раньше, чем появилась схема снимков. False — прогон не завершён
+    (снимка нет и быть не должно).
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT STATUS, SNAPSHOT_ROWS FROM PLG_FCT_RUNS WHERE ID = :p_run",
+                {"p_run": int(run_id)})
+    row = cur.fetchone()
+    if not row or row[0] != 'done':
+        return False
+    if row[1] is None:
+        try:
+            materialize_order_snapshot(conn, run_id)
+        except Exception:
+            # Параллельный запрос собрал тот же снимок первым (PK) — он и готов
+            conn.rollback()
+    return True
+
+
 # ==================== Движок прогонов ====================
 
 class ForecastEngine:
@@ -601,29 +671,40 @@ class ForecastEngine:
             cur.execute(
                 "INSERT INTO PLG_FCT_RUNS (MODEL_ID, DATASET_ID, STORE_ID, RUN_MODE, "
                 "HORIZON_DAYS, STATUS, STAGE, USERNAME) "
-                "VALUES (:p_m, :p_ds, :p_st, :p_mode, :p_h, 'running', 'init', :p_user) "
+                "VALUES (:p_m, :p_ds, :p_st, :p_mode, :p_h, 'running', 'queued', :p_user) "
                 "RETURNING ID INTO :p_id",
                 {"p_m": model["id"], "p_ds": dataset_id, "p_st": store_id, "p_mode": mode,
                  "p_h": model["horizon"], "p_user": username[:150], "p_id": run_var})
-            conn.commit()
             run_id = int(run_var.getvalue()[0])
+            run_queue.enqueue(cur, 'forecast', run_id,
+                              {"model": model, "dataset_id": dataset_id,
+                               "store_id": store_id, "mode": mode}, username)
+            conn.commit()
         finally:
             conn.close()
+        return {"success": True, "run_id": run_id, "mode": mode, "model": model["code"],
+                "queued": True}
 
-        engine = ForecastEngine(run_id, model, dataset_id, store_id, mode)
+    @staticmethod
+    def from_job(run_id: int, payload: Dict[str, Any]) -> "ForecastEngine":
+        """Экземпляр прогона из задания очереди (models/run_queue.py)."""
+        engine = ForecastEngine(run_id, payload["model"], payload.get("dataset_id"),
+                                payload.get("store_id"), payload.get("mode") or 'forecast')
         with ForecastEngine._lock:
             ForecastEngine._active[run_id] = engine
-        threading.Thread(target=engine._run, name=f"plg-forecast-{run_id}", daemon=True).start()
-        return {"success": True, "run_id": run_id, "mode": mode, "model": model["code"]}
+        return engine
 
     @staticmethod
     def cancel(run_id: int) -> Dict[str, Any]:
         with ForecastEngine._lock:
             engine = ForecastEngine._active.get(int(run_id))
-        if not engine:
-            return {"success": False, "error": "Прогон не найден среди активных"}
-        engine.cancelled = True
-        return {"success": True}
+        if engine:
+            engine.cancelled = True
+            return {"success": True}
+        # Прогон в очереди или у воркера в другом процессе
+        if run_queue.request_cancel('forecast', run_id):
+            return {"success": True}
+        return {"success": False, "error": "Прогон не найден среди активных"}
 
     # ---------- служебное ----------
 
@@ -688,6 +769,12 @@ class ForecastEngine:
         try:
             origin = self._execute()
             msg = f"Рядов посчитано: {self.series_count}, пропущено: {self.skipped}"
+            try:
+                self._progress("order snapshot", 99)
+                materialize_order_snapshot(self.conn, self.run_id)
+            except Exception:
+                # Снимок не критичен для прогона: экран соберёт его при первом обращении
+                self.conn.rollback()
             if self.series_count == 0 and self.skipped:
                 # Частый случай: истории меньше, чем требует алгоритм. Без явного
                 # объяснения прогон выглядит как успешный, но пустой.
@@ -0,0 +1,288 @@
+"""
+Векторный индекс поведения SKU для ИИ-мониторинга «Планограмм».
+
+Строится один раз на прогон мониторинга и магазин (models/plg_ai_monitor.py)
+и хранится в PLG_AI_VECTOR_INDEX одним BLOB'ом: дальше выбросы среди
+соседей и API «похожие SKU» работают по нему, а не перебирают все
+признаки прогона на каждый вызов.
+
+Устройство — чистый stdlib, без numpy (рабочий venv не меняется):
+
+  * векторы — плоский array('f') (float32), нормированные на единицу,
+    поэтому косинусное сходство = скалярное произведение;
+  * поиск — IVF: сферический k-means на ~√n центроидов, запрос смотрит
+    только nprobe ближайших списков. Это приближённый поиск, как и
+    FETCH APPROX по HNSW в базе, которым он заменён;
+  * выбросы по категории — ТОЧНО и за O(n·d): среднее косинусное
+    расстояние до остальных товаров категории выводится из суммы её
+    векторов: mean = 1 − (v·Σu − v·v) / (n − 1). Парный перебор не нужен.
+
+Сериализация: заголовок struct + сырые байты массивов (to_bytes/from_bytes).
+Кеш процесса: get_index() держит последние индексы (run, store) в памяти.
+
+Oracle-объекты: sql/114_plg_ai_vector_index.sql
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from operator import mul
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+MAGIC = b'PLGV'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')   # magic, version, dim, count, nlist
+
+KMEANS_ITER = 6
+KMEANS_SAMPLE = 1024    # центроиды учатся на выборке, затем назначаются все векторы
+CACHE_SIZE = 64
+
+
+def _normalize(vec: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(c * c for c in vec))
+    if norm <= 0:
+        return [0.0] * len(vec)
+    return [c / norm for c in vec]
+
+
+def _dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(map(mul, a, b))
+
+
+class BehaviorIndex:
+    """Нормированные векторы одного магазина + IVF-разбиение для top-k."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.ids = array('q')
+        self.cats = array('q')          # 0 = без категории
+        self.vecs = array('f')
+        self.centroids = array('f')
+        self.assign = array('i')        # номер списка IVF для каждого вектора
+        self._lists: Optional[List[array]] = None
+        self._pos: Optional[Dict[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids) // self.dim if self.dim else 0
+
+    # ==================== Построение ====================
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[int, Optional[int], Sequence[float]]],
+              nlist: Optional[int] = None) -> 'BehaviorIndex':
+        """
+        items — (product_id, category_id, координаты). Нулевые векторы
+        пропускаются: косинус для них не определён, и база их тоже не сравнивала.
+        """
+        idx: Optional[BehaviorIndex] = None
+        for pid, cat_id, coords in items:
+            if idx is None:
+                idx = cls(len(coords))
+            unit = _normalize(coords)
+            if not any(unit):
+                continue
+            idx.ids.append(int(pid))
+            idx.cats.append(int(cat_id or 0))
+            idx.vecs.extend(unit)
+        if idx is None:
+            return cls(0)
+        idx._train(nlist)
+        return idx
+
+    def _rows(self) -> List[array]:
+        dim = self.dim
+        return [self.vecs[i * dim:(i + 1) * dim] for i in range(len(self.ids))]
+
+    def _train(self, nlist: Optional[int]):
+        """
+        Сферический k-means, детерминированный: и выборка для обучения,
+        и начальные центроиды берутся с шагом по порядку векторов, а не
+        случайно — один и тот же прогон всегда даёт один и тот же индекс.
+        """
+        rows = self._rows()
+        n, dim = len(rows), self.dim
+        if not n:
+            return
+        k = max(1, min(nlist or int(math.sqrt(n)), n))
+        sample = rows if n <= KMEANS_SAMPLE else [rows[int(i * n / KMEANS_SAMPLE)]
+                                                  for i in range(KMEANS_SAMPLE)]
+        cents = [sample[int(c * len(sample) / k)] for c in range(k)]
+        for _ in range(KMEANS_ITER):
+            sums = [[0.0] * dim for _ in range(k)]
+            for row in sample:
+                best = max(range(k), key=lambda c: _dot(row, cents[c]))
+                acc = sums[best]
+                for j in range(dim):
+                    acc[j] += row[j]
+            moved = [array('f', _normalize(acc)) if any(acc) else cents[c]
+                     for c, acc in enumerate(sums)]
+            if moved == cents:
+                break
+            cents = moved
+        self.centroids = array('f', [c for cent in cents for c in cent])
+        self.assign = array('i', [max(range(k), key=lambda c: _dot(row, cents[c])) for row in rows])
+        self._lists = None
+
+    # ==================== Поиск ====================
+
+    def _ensure_lists(self):
+        if self._lists is None:
+            lists = [array('i') for _ in range(self.nlist)]
+            for i, c in enumerate(self.assign):
+                lists[c].append(i)
+            self._lists = lists
+            self._pos = {pid: i for i, pid in enumerate(self.ids)}
+
+    def vector_of(self, product_id: int) -> Optional[List[float]]:
+        self._ensure_lists()
+        i = self._pos.get(int(product_id))
+        if i is None:
+            return None
+        return list(self.vecs[i * self.dim:(i + 1) * self.dim])
+
+    def search(self, vec: Sequence[float], k: int = 8, nprobe: Optional[int] = None,
+               exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Ближайшие по косинусу: [(product_id, distance)], distance = 1 − cos,
+        по возрастанию. Смотрит nprobe ближайших списков IVF (по умолчанию
+        четверть, но не меньше трёх) — сравнений ~n·nprobe/nlist вместо n.
+        """
+        if not len(self.ids):
+            return []
+        self._ensure_lists()
+        q = _normalize(vec)
+        dim, nl = self.dim, self.nlist
+        probe = nprobe or max(3, nl // 4)
+        order = heapq.nlargest(min(probe, nl), range(nl),
+                               key=lambda c: _dot(q, self.centroids[c * dim:(c + 1) * dim]))
+        ex = int(exclude) if exclude is not None else None
+        vecs, ids = self.vecs, self.ids
+        cand = []
+        for c in order:
+            for i in self._lists[c]:
+                pid = ids[i]
+                if pid == ex:
+                    continue
+                cand.append((_dot(q, vecs[i * dim:(i + 1) * dim]), pid))
+        best = heapq.nlargest(k, cand)
+        return [(pid, round(max(0.0, 1.0 - s), 6)) for s, pid in best]
+
+    def category_mean_distance(self, min_peers: int = 5) -> Dict[int, Tuple[int, float, int]]:
+        """
+        {product_id: (category_id, среднее косинусное расстояние до остальных
+        товаров категории, число соседей)} — то же, что давал
+        AVG(VECTOR_DISTANCE(..., COSINE)) по парам внутри категории в базе,
+        но через сумму векторов категории. Товары без категории не участвуют.
+        """
+        dim = self.dim
+        rows = self._rows()
+        sums: Dict[int, List[float]] = {}
+        counts: Dict[int, int] = {}
+        for row, cat in zip(rows, self.cats):
+            if not cat:
+                continue
+            acc = sums.setdefault(cat, [0.0] * dim)
+            for j in range(dim):
+                acc[j] += row[j]
+            counts[cat] = counts.get(cat, 0) + 1
+        out: Dict[int, Tuple[int, float, int]] = {}
+        for pid, row, cat in zip(self.ids, rows, self.cats):
+            peers = counts.get(cat, 0) - 1
+            if not cat or peers < min_peers:
+                continue
+            total = _dot(row, sums[cat]) - _dot(row, row)
+            out[pid] = (cat, 1.0 - total / peers, peers)
+        return out
+
+    # ==================== Хранение ====================
+
+    def to_bytes(self) -> bytes:
+        return b''.join([
+            HEADER.pack(MAGIC, VERSION, self.dim, len(self.ids), self.nlist),
+            self.ids.tobytes(), self.cats.tobytes(), self.vecs.tobytes(),
+            self.centroids.tobytes(), self.assign.tobytes()])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BehaviorIndex':
+        magic, version, dim, count, nlist = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Неизвестный формат векторного индекса')
+        idx = cls(dim)
+        pos = HEADER.size
+        for name, code, n in (('ids', 'q', count), ('cats', 'q', count),
+                              ('vecs', 'f', count * dim), ('centroids', 'f', nlist * dim),
+                              ('assign', 'i', count)):
+            arr = array(code)
+            size = arr.itemsize * n
+            arr.frombytes(data[pos:pos + size])
+            pos += size
+            setattr(idx, name, arr)
+        return idx
+
+
+# ==================== Кеш процесса ====================
+
+_cache: 'OrderedDict[Tuple[int, int], BehaviorIndex]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def remember(run_id: int, store_id: int, index: BehaviorIndex):
+    with _cache_lock:
+        _cache[(int(run_id), int(store_id))] = index
+        _cache.move_to_end((int(run_id), int(store_id)))
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def get_index(db, run_id: int, store_id: int) -> Optional[BehaviorIndex]:
+    """
+    Индекс (run, store): из памяти процесса, иначе из PLG_AI_VECTOR_INDEX.
+    None — у прогона индекса нет (прогон старше этой схемы).
+    """
+    key = (int(run_id), int(store_id))
+    with _cache_lock:
+        idx = _cache.get(key)
+        if idx is not None:
+            _cache.move_to_end(key)
+            return idx
+    # BLOB читается своим курсором: execute_query отдаёт LOB'ы текстом
+    # (UTF-8 или base64), а индексу нужны сырые байты.
+    import oracledb
+
+    try:
+        cur = db.connection.cursor()
+        try:
+            cur.outputtypehandler = _blob_as_bytes
+            cur.execute(
+                "SELECT PAYLOAD FROM PLG_AI_VECTOR_INDEX WHERE RUN_ID = :p_run AND STORE_ID = :p_st",
+                {'p_run': key[0], 'p_st': key[1]})
+            row = cur.fetchone()
+            payload = row[0] if row else None
+            if payload is not None and hasattr(payload, 'read'):
+                payload = payload.read()
+        finally:
+            cur.close()
+    except oracledb.Error:
+        return None
+    if payload is None:
+        return None
+    idx = BehaviorIndex.from_bytes(bytes(payload))
+    remember(key[0], key[1], idx)
+    return idx
+
+
+def _blob_as_bytes(cursor, metadata):
+    """outputtypehandler: BLOB сразу байтами (LONG RAW), без LOB-локатора."""
+    import oracledb
+
+    if metadata.type_code is oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    return None
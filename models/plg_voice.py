@@ -22,13 +22,20 @@
 3. **Три языка равноправны.** Русский, румынский и английский разбираются
    одним кодом: отличаются только словари числительных, единиц и команд.
 
+Сопоставитель строится один раз на магазин и язык и живёт в кеше процесса
+(cached_matcher): голосовая команда не перечитывает каталог и словарь
+синонимов, а перебирает только товары, делящие с фразой хотя бы одну
+триграмму.
+
 Oracle-объекты: sql/94_plg_mobile.sql
 """
 from __future__ import annotations
 
 import re
+import threading
+import time
 import unicodedata
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 # ==================== Словари ====================
 
@@ -150,6 +157,8 @@ STOP_WORDS = {
 MATCH_OK = 72.0          # выше — позиция принимается автоматически
 MATCH_AMBIGUOUS = 45.0   # между порогами — просим подтвердить выбор
 
+MATCHER_TTL = 900        # сек; страховка на правки каталога в обход invalidate_matchers
+
 
 # ==================== Нормализация ====================
 
@@ -321,6 +330,15 @@ class ProductMatcher:
     (PLG_VOICE_SYNONYMS). Оценка складывается из доли совпавших слов
     и триграммной схожести: первое ловит «молоко домашнее» → «Молоко
     домашнее 3.2%», второе — оговорки и падежи.
+
+    Поверх кандидатов — обратный индекс «триграмма → кандидаты». Оценка
+    ненулевая только у кандидата, который делит с фразой хотя бы одну
+    триграмму (совпадение слова по триграммам или по общей основе из
+    четырёх букв тоже даёт общую триграмму), поэтому match() считает
+    только их, а не весь каталог. Схожесть при этом получается из того же
+    подсчёта общих триграмм. Если таких товаров меньше пяти, варианты
+    добираются товарами с нулевой оценкой в порядке каталога — как при
+    полном переборе.
     """
 
     def __init__(self, products: Sequence[Dict[str, Any]],
@@ -329,6 +347,7 @@ class ProductMatcher:
         self.lang = lang
         self.products = list(products)
         self.index: List[Tuple[Dict[str, Any], str, List[str], float]] = []
+        by_id = {p.get('id'): p for p in self.products}
         for p in self.products:
             for key in ('name_ru', 'name_ro', 'name_en', 'name'):
                 name = p.get(key)
@@ -345,22 +364,46 @@ class ProductMatcher:
             if not phrase:
                 continue
             if s.get('product_id'):
-                for p in self.products:
-                    if p.get('id') == s['product_id']:
-                        self.index.append((p, phrase, phrase.split(), float(s.get('weight') or 1)))
+                p = by_id.get(s['product_id'])
+                if p is not None:
+                    self.index.append((p, phrase, phrase.split(), float(s.get('weight') or 1)))
             elif s.get('category_id'):
                 self.category_hints.setdefault(int(s['category_id']), []).append(phrase)
+        self._postings: Dict[str, List[int]] = {}
+        self._gram_count: List[int] = []
+        self._rank: Dict[Any, int] = {}    # порядок товара в каталоге — для равных оценок
+        for i, (p, norm_name, _w, _wt) in enumerate(self.index):
+            self._rank.setdefault(p.get('id'), i)
+            grams = _trigrams(norm_name)
+            self._gram_count.append(len(grams))
+            for g in grams:
+                self._postings.setdefault(g, []).append(i)
 
     def match(self, phrase: str) -> Tuple[Optional[Dict[str, Any]], float, List[Dict[str, Any]]]:
         words = [w for w in normalize(phrase).split()
                  if w not in STOP_WORDS.get(self.lang, set())]
         if not words:
             return None, 0.0, []
+        query = _trigrams(' '.join(words))
+        shared: Dict[int, int] = {}
+        for g in query:
+            for i in self._postings.get(g, ()):
+                shared[i] = shared.get(i, 0) + 1
+        word_hits: Dict[Tuple[str, str], bool] = {}
         scored: Dict[int, Tuple[float, Dict[str, Any]]] = {}
-        for product, norm_name, name_words, weight in self.index:
-            overlap = sum(1 for w in words if any(words_match(w, nw) for nw in name_words))
+        for i, common in shared.items():
+            product, norm_name, name_words, weight = self.index[i]
+            overlap = 0
+            for w in words:
+                for nw in name_words:
+                    hit = word_hits.get((w, nw))
+                    if hit is None:
+                        hit = word_hits[(w, nw)] = bool(words_match(w, nw))
+                    if hit:
+                        overlap += 1
+                        break
             cover = overlap / len(words)
-            sim = similarity(' '.join(words), norm_name)
+            sim = 2.0 * common / (len(query) + self._gram_count[i])
             score = (0.65 * cover + 0.35 * sim) * 100 * weight
             pid = product.get('id')
             if pid is None:
@@ -377,7 +420,16 @@ class ProductMatcher:
                 if product.get('category_id') == cat_id:
                     scored[pid] = (min(100.0, score * 1.15), product)
 
-        ranked = sorted(scored.values(), key=lambda x: -x[0])[:5]
+        # Кандидатов меньше пяти — добираем нулевыми в порядке каталога:
+        # приложение показывает выбор и для непонятой фразы
+        for pid, i in self._rank.items():
+            if len(scored) >= 5:
+                break
+            if pid is not None and pid not in scored:
+                scored[pid] = (0.0, self.index[i][0])
+
+        order = sorted(scored, key=lambda pid: (-scored[pid][0], self._rank[pid]))
+        ranked = [scored[pid] for pid in order[:5]]
         if not ranked:
             return None, 0.0, []
         best_score, best = ranked[0]
@@ -389,6 +441,49 @@ class ProductMatcher:
         return best, best_score, options
 
 
+# ==================== Кеш сопоставителей ====================
+
+_matchers: Dict[Tuple[int, str], Tuple[float, List[Dict[str, Any]], ProductMatcher]] = {}
+_matchers_lock = threading.Lock()
+_matchers_gen = 0
+
+
+def cached_matcher(store_id: int, lang: str,
+                   loader: Callable[[int, str], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]
+                   ) -> Tuple[List[Dict[str, Any]], ProductMatcher]:
+    """
+    (каталог, сопоставитель) магазина на языке — из кеша процесса.
+
+    loader(store_id, lang) → (товары, синонимы) вызывается только на промахе
+    и вне блокировки: сборка каталога одного магазина не задерживает
+    голосовые команды других. Если пока грузили, кеш сбросили
+    (invalidate_matchers), результат отдаётся, но не запоминается.
+    """
+    key = (int(store_id), lang)
+    now = time.time()
+    with _matchers_lock:
+        hit = _matchers.get(key)
+        if hit and now - hit[0] < MATCHER_TTL:
+            return hit[1], hit[2]
+        gen = _matchers_gen
+    items, synonyms = loader(store_id, lang)
+    matcher = ProductMatcher(items, synonyms, lang)
+    with _matchers_lock:
+        if gen == _matchers_gen:
+            _matchers[key] = (now, items, matcher)
+    return items, matcher
+
+
+def invalidate_matchers(store_id: Optional[int] = None, lang: Optional[str] = None) -> None:
+    """Сброс кеша: правка товара — все магазины, новый синоним — все магазины его языка."""
+    global _matchers_gen
+    with _matchers_lock:
+        _matchers_gen += 1
+        for key in list(_matchers):
+            if (store_id is None or key[0] == int(store_id)) and (lang is None or key[1] == lang):
+                del _matchers[key]
+
+
 # ==================== Основной вход ====================
 
 def parse_order(text: str, lang: str, matcher: ProductMatcher) -> Dict[str, Any]:
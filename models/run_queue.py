@@ -0,0 +1,425 @@
+"""
+Очередь фоновых прогонов «Планограмм»: прогноз, генератор данных,
+ИИ-мониторинг.
+
+Раньше каждый launch() сразу поднимал поток в веб-процессе — без общего
+лимита, на том же пуле соединений и GIL, что и Flask/Socket.IO. Теперь:
+
+  * launch() пишет запись прогона (STATUS = 'running', STAGE = 'queued')
+    и задание в PLG_JOB_QUEUE в одной транзакции — enqueue();
+  * отдельный процесс scripts/plg_worker.py (Dispatcher) забирает задания
+    по приоритету с учётом лимита одновременных прогонов движка
+    (PLG_JOB_LIMITS.MAX_RUNNING) и выполняет их в своих потоках;
+  * отмена из веб-процесса — флаг CANCEL_REQUESTED: воркер видит его
+    на очередном пульсе и ставит engine.cancelled, дальше движок
+    останавливается штатно, как при прежней отмене;
+  * задание, воркер которого перестал отправлять пульс (упал процесс),
+    закрывается как failed вместе с прогоном — генератор после этого
+    продолжается кнопкой «Продолжить» с контрольной точки;
+  * ProgressFeed в веб-процессе одним запросом читает этап и процент
+    активных прогонов и отправляет изменения подписчикам Socket.IO —
+    вкладки браузера больше не опрашивают PLG_*_RUNS каждые 2–4 секунды.
+
+Если воркер не развёрнут (локальная разработка), тот же Dispatcher
+запускается потоком внутри app.py: Config.PLG_QUEUE_EMBEDDED.
+
+Движок подключается записью в ENGINES и статическим методом from_job(run_id,
+payload) у класса: он восстанавливает экземпляр из PAYLOAD_JSON
+и регистрирует его в _active класса.
+
+Тем же путём идут сравнение алгоритмов прогноза топлива (движок
+'fuel_backtest', sql/119_peco_backtest_cache.sql) и автозаказ топлива
+(движок 'fuel_autoorder', sql/120_peco_autoorder_queue.sql).
+
+Oracle-объекты: sql/116_plg_job_queue.sql
+"""
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from models.database import DatabaseConnection
+
+# engine -> (модуль, класс, таблица прогонов)
+ENGINES: Dict[str, tuple] = {
+    'forecast':  ('models.plg_forecast', 'ForecastEngine', 'PLG_FCT_RUNS'),
+    'datagen':   ('models.plg_datagen', 'DataGenerator', 'PLG_GEN_RUNS'),
+    'aimonitor': ('models.plg_ai_monitor', 'AiMonitorEngine', 'PLG_AI_RUNS'),
+    'fuel_backtest': ('models.peco_plan', 'FuelBacktestEngine', 'PECO_FCT_BT_RUNS'),
+    'fuel_autoorder': ('models.peco_autoorder', 'FuelAutoOrderEngine', 'PECO_ORDER_RUNS'),
+}
+
+POLL_SEC = 2.0
+STALE_SEC = 180          # без пульса дольше — воркер считается упавшим
+RECOVER_EVERY_SEC = 60
+CLAIM_ATTEMPTS = 5        # кандидатов за один claim, если их перехватывают
+
+
+def _clob(value) -> Optional[str]:
+    return value.read() if hasattr(value, 'read') else value
+
+
+# ==================== Постановка и отмена ====================
+
+def enqueue(cur, engine: str, run_id: int, payload: Dict[str, Any],
+            username: str = '', priority: Optional[int] = None):
+    """
+    Задание в очередь. Курсор — вызывающего: запись прогона и задание
+    коммитятся вместе, «прогон без задания» не появляется. Приоритет по
+    умолчанию — PLG_JOB_LIMITS.PRIORITY движка.
+    """
+    cur.execute(
+        "INSERT INTO PLG_JOB_QUEUE (ENGINE, RUN_ID, PRIORITY, PAYLOAD_JSON, USERNAME) "
+        "VALUES (:p_eng, :p_run, NVL(:p_prio, (SELECT PRIORITY FROM PLG_JOB_LIMITS "
+        "WHERE ENGINE = :p_eng2)), :p_payload, :p_user)",
+        {'p_eng': engine, 'p_eng2': engine, 'p_run': int(run_id), 'p_prio': priority,
+         'p_payload': json.dumps(payload, ensure_ascii=False, default=str),
+         'p_user': (username or '')[:150]})
+
+
+def request_cancel(engine: str, run_id: int) -> bool:
+    """
+    Отмена прогона через очередь. Ещё не начатое задание снимается сразу
+    (и прогон закрывается как cancelled), выполняемому ставится флаг для
+    воркера. False — активного задания у прогона нет.
+    """
+    table = ENGINES[engine][2]
+    conn = DatabaseConnection.get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE PLG_JOB_QUEUE SET STATUS = 'cancelled', FINISHED_AT = SYSTIMESTAMP "
+            "WHERE ENGINE = :p_eng AND RUN_ID = :p_run AND STATUS = 'queued'",
+            {'p_eng': engine, 'p_run': int(run_id)})
+        if cur.rowcount:
+            cur.execute(
+                f"UPDATE {table} SET STATUS = 'cancelled', MESSAGE = :p_msg, "
+                "FINISHED_AT = SYSTIMESTAMP WHERE ID = :p_run AND STATUS IN ('queued', 'running')",
+                {'p_msg': 'Снято из очереди оператором', 'p_run': int(run_id)})
+            conn.commit()
+            return True
+        cur.execute(
+            "UPDATE PLG_JOB_QUEUE SET CANCEL_REQUESTED = 1 "
+            "WHERE ENGINE = :p_eng AND RUN_ID = :p_run AND STATUS = 'running'",
+            {'p_eng': engine, 'p_run': int(run_id)})
+        found = cur.rowcount > 0
+        conn.commit()
+        return found
+    finally:
+        conn.close()
+
+
+# ==================== Сторона воркера ====================
+
+def claim(conn, worker: str, engines: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Забирает следующее задание, для движка которого есть свободный слот.
+
+    Строки лимитов блокируются FOR UPDATE до COMMIT: два воркера не могут
+    одновременно посчитать «занято 0 из 1» и оба взять прогон того же движка.
+    Задание считается взятым, только если UPDATE изменил ровно его строку
+    из 'queued': снятое из очереди между выбором и UPDATE не запускается.
+    """
+    if not engines:
+        return None
+    cur = conn.cursor()
+    binds = {f'p_e{i}': e for i, e in enumerate(engines)}
+    in_list = ', '.join(f':{k}' for k in binds)
+    try:
+        cur.execute(f"SELECT ENGINE, MAX_RUNNING FROM PLG_JOB_LIMITS "
+                    f"WHERE ENGINE IN ({in_list}) FOR UPDATE", binds)
+        limits = {r[0]: int(r[1] or 0) for r in cur.fetchall()}
+        cur.execute(f"SELECT ENGINE, COUNT(*) FROM PLG_JOB_QUEUE WHERE STATUS = 'running' "
+                    f"AND ENGINE IN ({in_list}) GROUP BY ENGINE", binds)
+        running = {r[0]: int(r[1]) for r in cur.fetchall()}
+        free = [e for e, cap in limits.items() if running.get(e, 0) < cap]
+        if not free:
+            conn.rollback()
+            return None
+        fbinds = {f'p_f{i}': e for i, e in enumerate(free)}
+        row = None
+        for _ in range(CLAIM_ATTEMPTS):
+            cur.execute(
+                "SELECT ID, ENGINE, RUN_ID, PAYLOAD_JSON FROM PLG_JOB_QUEUE "
+                f"WHERE STATUS = 'queued' AND ENGINE IN ({', '.join(':' + k for k in fbinds)}) "
+                "ORDER BY PRIORITY, ID FETCH FIRST 1 ROWS ONLY", fbinds)
+            row = cur.fetchone()
+            if not row:
+                break
+            payload = _clob(row[3])
+            cur.execute(
+                "UPDATE PLG_JOB_QUEUE SET STATUS = 'running', WORKER = :p_w, ATTEMPTS = ATTEMPTS + 1, "
+                "STARTED_AT = SYSTIMESTAMP, HEARTBEAT_AT = SYSTIMESTAMP "
+                "WHERE ID = :p_id AND STATUS = 'queued'",
+                {'p_w': worker[:120], 'p_id': int(row[0])})
+            if cur.rowcount == 1:
+                break
+            # Между SELECT и UPDATE задание сняли (request_cancel) или его
+            # взял другой воркер: это задание не выполняем, смотрим следующее.
+            row = None
+        if not row:
+            conn.rollback()
+            return None
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {'id': int(row[0]), 'engine': row[1], 'run_id': int(row[2]),
+            'payload': json.loads(payload) if payload else {}}
+
+
+def heartbeat(conn, job_ids: List[int]) -> Set[int]:
+    """Отмечает пульс заданий воркера; возвращает те, где запрошена отмена."""
+    if not job_ids:
+        return set()
+    binds = {f'p_j{i}': int(j) for i, j in enumerate(job_ids)}
+    in_list = ', '.join(f':{k}' for k in binds)
+    cur = conn.cursor()
+    cur.execute(f"UPDATE PLG_JOB_QUEUE SET HEARTBEAT_AT = SYSTIMESTAMP WHERE ID IN ({in_list})",
+                binds)
+    cur.execute(f"SELECT ID FROM PLG_JOB_QUEUE WHERE CANCEL_REQUESTED = 1 AND ID IN ({in_list})",
+                binds)
+    cancel = {int(r[0]) for r in cur.fetchall()}
+    conn.commit()
+    return cancel
+
+
+def finish(conn, job: Dict[str, Any], error: str = ''):
+    """
+    Закрывает задание статусом прогона: движок сам пишет done / failed /
+    cancelled в свою таблицу. Прогон, оставшийся 'queued' / 'running'
+    (движок не смог даже подключиться), закрывается как failed.
+    """
+    table = ENGINES[job['engine']][2]
+    cur = conn.cursor()
+    cur.execute(f"SELECT STATUS FROM {table} WHERE ID = :p_run", {'p_run': job['run_id']})
+    row = cur.fetchone()
+    status = row[0] if row else 'failed'
+    if status not in ('done', 'failed', 'cancelled'):
+        status = 'failed'
+        error = error or 'Прогон завершился без итогового статуса'
+        cur.execute(
+            f"UPDATE {table} SET STATUS = 'failed', MESSAGE = :p_msg, FINISHED_AT = SYSTIMESTAMP "
+            "WHERE ID = :p_run AND STATUS IN ('queued', 'running')",
+            {'p_msg': error[:2000], 'p_run': job['run_id']})
+    cur.execute(
+        "UPDATE PLG_JOB_QUEUE SET STATUS = :p_st, FINISHED_AT = SYSTIMESTAMP, ERROR = :p_err "
+        "WHERE ID = :p_id",
+        {'p_st': status, 'p_err': (error or None) and error[:2000], 'p_id': job['id']})
+    conn.commit()
+
+
+def recover_stale(conn, stale_sec: int = STALE_SEC) -> int:
+    """
+    Задания, чей воркер перестал отправлять пульс, закрываются как failed
+    вместе с прогоном. Автоматически не перезапускаются: прогноз
+    и мониторинг дешевле перезапустить оператору, а генератор продолжается
+    с контрольной точки (DataGenerator.resume).
+    """
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT ID, ENGINE, RUN_ID FROM PLG_JOB_QUEUE WHERE STATUS = 'running' "
+        "AND HEARTBEAT_AT < SYSTIMESTAMP - NUMTODSINTERVAL(:p_sec, 'SECOND')",
+        {'p_sec': int(stale_sec)})
+    rows = cur.fetchall()
+    msg = 'Воркер очереди перестал отвечать — прогон прерван'
+    for job_id, engine, run_id in rows:
+        if engine in ENGINES:
+            cur.execute(
+                f"UPDATE {ENGINES[engine][2]} SET STATUS = 'failed', MESSAGE = :p_msg, "
+                "FINISHED_AT = SYSTIMESTAMP WHERE ID = :p_run AND STATUS IN ('queued', 'running')",
+                {'p_msg': msg, 'p_run': int(run_id)})
+        cur.execute(
+            "UPDATE PLG_JOB_QUEUE SET STATUS = 'failed', ERROR = :p_msg, FINISHED_AT = SYSTIMESTAMP "
+            "WHERE ID = :p_id AND STATUS = 'running'", {'p_msg': msg, 'p_id': int(job_id)})
+    conn.commit()
+    return len(rows)
+
+
+class Dispatcher:
+    """
+    Цикл воркера: пульс и отмены → забор заданий в свободные слоты.
+    Слоты — потоки этого процесса; сколько прогонов движка идёт во всей
+    системе, ограничивает PLG_JOB_LIMITS, а не число слотов.
+    """
+
+    def __init__(self, slots: int = 2, engines: Optional[List[str]] = None,
+                 name: Optional[str] = None, poll_sec: float = POLL_SEC):
+        self.slots = max(1, int(slots))
+        self.engines = [e for e in (engines or ENGINES) if e in ENGINES]
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_sec = poll_sec
+        self.stop = threading.Event()
+        self._jobs: Dict[int, tuple] = {}      # job_id -> (job, engine, thread)
+        self._conn = None
+        self._recovered_at = 0.0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = DatabaseConnection.get_connection()
+        return self._conn
+
+    def _drop_connection(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def run_forever(self):
+        while not self.stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[plg-queue] {self.name}: {e}")
+                self._drop_connection()
+            self.stop.wait(self.poll_sec)
+
+    def shutdown(self, timeout: float = 60.0):
+        """
+        Остановка воркера: выполняемые прогоны отменяются штатно (генератор
+        потом продолжается с контрольной точки), задания закрываются.
+        """
+        self.stop.set()
+        for _, engine, _ in self._jobs.values():
+            engine.cancelled = True
+        for _, _, thread in self._jobs.values():
+            thread.join(timeout)
+        try:
+            conn = self._connection()
+            for job, _, _ in self._jobs.values():
+                finish(conn, job, 'Воркер очереди остановлен')
+        finally:
+            self._jobs.clear()
+            self._drop_connection()
+
+    def tick(self):
+        conn = self._connection()
+        for job_id in [j for j, (_, _, th) in self._jobs.items() if not th.is_alive()]:
+            job, _, _ = self._jobs.pop(job_id)
+            finish(conn, job)
+        for job_id in heartbeat(conn, list(self._jobs)):
+            self._jobs[job_id][1].cancelled = True
+        if time.time() - self._recovered_at > RECOVER_EVERY_SEC:
+            recover_stale(conn)
+            self._recovered_at = time.time()
+        while len(self._jobs) < self.slots:
+            job = claim(conn, self.name, self.engines)
+            if not job:
+                break
+            self._start(conn, job)
+
+    def _start(self, conn, job: Dict[str, Any]):
+        module, cls_name, _ = ENGINES[job['engine']]
+        try:
+            cls = getattr(importlib.import_module(module), cls_name)
+            engine = cls.from_job(job['run_id'], job['payload'])
+        except Exception as e:
+            finish(conn, job, f'Задание не восстановлено: {e}')
+            return
+        thread = threading.Thread(target=engine._run, daemon=True,
+                                  name=f"plg-{job['engine']}-{job['run_id']}")
+        self._jobs[job['id']] = (job, engine, thread)
+        thread.start()
+
+
+_embedded: Optional[Dispatcher] = None
+_embedded_lock = threading.Lock()
+
+
+def start_embedded(slots: int = 2) -> Dispatcher:
+    """Диспетчер потоком в текущем процессе — когда отдельный воркер не запущен."""
+    global _embedded
+    with _embedded_lock:
+        if _embedded is None:
+            _embedded = Dispatcher(slots=slots, name=f'embedded:{os.getpid()}')
+            threading.Thread(target=_embedded.run_forever, daemon=True,
+                             name='plg-queue-embedded').start()
+    return _embedded
+
+
+# ==================== Прогресс для Socket.IO ====================
+
+def active_runs(conn, linger_sec: int = 15) -> List[Dict[str, Any]]:
+    """
+    Этап и процент всех поставленных и выполняемых прогонов (и только что
+    завершённых — чтобы экран получил финальный статус) одним запросом.
+    QUEUE_POS — место в очереди среди ожидающих, по приоритету.
+    """
+    runs = ' UNION ALL '.join(
+        f"SELECT '{eng}' AS ENGINE, ID, STATUS, STAGE, PROGRESS_PCT FROM {table}"
+        for eng, (_, _, table) in ENGINES.items())
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT j.ENGINE, j.RUN_ID, j.STATUS, r.STATUS, r.STAGE, r.PROGRESS_PCT, "
+        "CASE WHEN j.STATUS = 'queued' THEN ROW_NUMBER() OVER "
+        "(PARTITION BY j.STATUS ORDER BY j.PRIORITY, j.ID) END "
+        f"FROM PLG_JOB_QUEUE j JOIN ({runs}) r ON r.ENGINE = j.ENGINE AND r.ID = j.RUN_ID "
+        "WHERE j.STATUS IN ('queued', 'running') "
+        "OR j.FINISHED_AT > SYSTIMESTAMP - NUMTODSINTERVAL(:p_sec, 'SECOND')",
+        {'p_sec': int(linger_sec)})
+    return [{'engine': r[0], 'run_id': int(r[1]), 'job_status': r[2], 'status': r[3],
+             'stage': r[4], 'progress_pct': int(r[5] or 0),
+             'queue_pos': int(r[6]) if r[6] is not None else None}
+            for r in cur.fetchall()]
+
+
+class ProgressFeed:
+    """
+    Один опрос очереди на веб-процесс вместо опроса из каждой вкладки:
+    изменения уходят через emit(событие, данные). Пока подписчиков нет,
+    база не опрашивается.
+    """
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None], interval: float = POLL_SEC):
+        self.emit = emit
+        self.interval = interval
+        self.subscribers: Set[str] = set()
+        self._last: Dict[tuple, tuple] = {}
+        self._conn = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, sid: str):
+        with self._lock:
+            self.subscribers.add(sid)
+            self._last.clear()          # новый подписчик получает полный срез
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True,
+                                                name='plg-progress-feed')
+                self._thread.start()
+
+    def unsubscribe(self, sid: str):
+        with self._lock:
+            self.subscribers.discard(sid)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.subscribers:
+                continue
+            try:
+                if self._conn is None:
+                    self._conn = DatabaseConnection.get_connection()
+                rows = active_runs(self._conn)
+                self._conn.rollback()       # чтение без открытой транзакции
+            except Exception as e:
+                print(f"[plg-queue] progress feed: {e}")
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+                continue
+            last, self._last = self._last, {}
+            for row in rows:
+                key = (row['engine'], row['run_id'])
+                state = (row['status'], row['stage'], row['progress_pct'], row['queue_pos'])
+                self._last[key] = state
+                if last.get(key) != state:
+                    self.emit(row)
@@ -7,7 +7,9 @@ Nufarul AI Parser — умный разбор текстовых заказов
 Выход: [{service_id, qty, original, confidence, service_name}]
 """
 import re
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable, Tuple, Union
 from rapidfuzz import fuzz, process
 
 # ---- Нормализация текста ----
@@ -196,10 +198,12 @@ def _normalize(text: str) -> str:
     return text
 
 
+_NO_DIA = str.maketrans('ăâîșțĂÂÎȘȚ', 'aaistAAIST')
+
+
 def _remove_diacritics(text: str) -> str:
     """Убираем румынские диакритики для fuzzy-сравнения: ăâîșț → aaisit."""
-    table = str.maketrans('ăâîșțĂÂÎȘȚ', 'aaistAAIST')
-    return text.translate(table)
+    return text.translate(_NO_DIA)
 
 
 def _stem_ru(word: str) -> str:
@@ -236,6 +240,27 @@ def _is_latin(text: str) -> bool:
     return bool(re.search(r'[a-zA-ZăâîșțĂÂÎȘȚ]', text))
 
 
+def _synonym_lookups() -> Tuple[Dict[str, str], Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    Словари синонимов, разложенные по ключам поиска — один раз при импорте:
+    RO без диакритик → первая полная форма; стем RU / RO → полные формы
+    в порядке словаря (первая, которой ещё нет среди кандидатов, и берётся).
+    """
+    ro_no_dia: Dict[str, str] = {}
+    for short, full in SYNONYMS_RO.items():
+        ro_no_dia.setdefault(_remove_diacritics(short), full)
+    ru_stems: Dict[str, List[str]] = {}
+    for short, full in SYNONYMS_RU.items():
+        ru_stems.setdefault(_stem_ru(short), []).append(full)
+    ro_stems: Dict[str, List[str]] = {}
+    for short, full in SYNONYMS_RO.items():
+        ro_stems.setdefault(_stem_ro(_remove_diacritics(short)), []).append(full)
+    return ro_no_dia, ru_stems, ro_stems
+
+
+_SYN_RO_NO_DIA, _SYN_RU_STEMS, _SYN_RO_STEMS = _synonym_lookups()
+
+
 def _expand_synonyms(query: str) -> List[str]:
     """
     Раскрытие синонимов в обоих языках.
@@ -252,24 +277,18 @@ def _expand_synonyms(query: str) -> List[str]:
     # 2. Точное совпадение в RO-синонимах (с диакритиками и без)
     if q in SYNONYMS_RO:
         candidates.insert(0, SYNONYMS_RO[q])
-    else:
-        # Пробуем без диакритик
-        for syn_key, syn_val in SYNONYMS_RO.items():
-            if _remove_diacritics(syn_key) == q_no_dia:
-                candidates.insert(0, syn_val)
-                break
+    elif q_no_dia in _SYN_RO_NO_DIA:
+        candidates.insert(0, _SYN_RO_NO_DIA[q_no_dia])
 
     # 3. Стем-совпадение RU
-    q_stem_ru = _stem_ru(q)
-    for short, full in SYNONYMS_RU.items():
-        if _stem_ru(short) == q_stem_ru and full not in candidates:
+    for full in _SYN_RU_STEMS.get(_stem_ru(q), ()):
+        if full not in candidates:
             candidates.insert(0, full)
             break
 
     # 4. Стем-совпадение RO
-    q_stem_ro = _stem_ro(q_no_dia)
-    for short, full in SYNONYMS_RO.items():
-        if _stem_ro(_remove_diacritics(short)) == q_stem_ro and full not in candidates:
+    for full in _SYN_RO_STEMS.get(_stem_ro(q_no_dia), ()):
+        if full not in candidates:
             candidates.insert(0, full)
             break
 
@@ -327,116 +346,225 @@ def _split_order_text(text: str) -> List[Dict[str, Any]]:
     return items
 
 
-def parse_order(text: str, services: List[Dict[str, Any]],
-                threshold: int = 45) -> List[Dict[str, Any]]:
-    """
-    Главная функция: парсит текст заказа → список совпадений.
-    Полностью двуязычный: RU + RO + смешанный ввод.
+_LANG_KEYS = ('name_ru', 'name_ro', 'name_en', 'name')
+_FUZZY_SCORERS = (fuzz.token_set_ratio, fuzz.partial_ratio, fuzz.WRatio)
 
-    Args:
-        text: произвольный текст от оператора (RU, RO, или смешанный)
-        services: список услуг из БД [{id, name_ru, name_ro, name_en, name, price, ...}]
-        threshold: минимальный порог схожести (0-100)
+CATALOG_TTL = 900      # сек; страховка на правки услуг в обход invalidate_catalog
+_GRAM = 3              # длина n-граммы инвертированного индекса
+_MEMO_LIMIT = 4096     # разобранных позиций на версию каталога
+# extractOne отбрасывает оценку, равную score_cutoff (внутренний эпсилон),
+# поэтому поднятый порог ставится чуть ниже известной оценки
+_CUTOFF_SLACK = 0.01
 
-    Returns:
-        [{service_id, qty, original, confidence, service_name, service_name_ro}]
-    """
-    if not text or not text.strip():
-        return []
 
-    # Собираем словарь: normalized_name → (service, lang_key)
-    # Каждое имя услуги добавляется на всех доступных языках
-    name_map = {}      # normalized_name → service
-    choices = []       # для rapidfuzz
-    choices_no_dia = []  # без диакритик для RO-поиска
-
-    for s in services:
-        for key in ('name_ru', 'name_ro', 'name_en', 'name'):
-            name = (s.get(key) or '').strip()
-            if name:
-                norm = _normalize(name)
-                if norm not in name_map:
-                    name_map[norm] = s
-                    choices.append(norm)
-                # Также добавляем версию без диакритик для RO
-                norm_no_dia = _remove_diacritics(norm)
-                if norm_no_dia != norm and norm_no_dia not in name_map:
-                    name_map[norm_no_dia] = s
-                    choices.append(norm_no_dia)
-
-    items = _split_order_text(text)
-    results = []
+def _grams(text: str) -> set:
+    return {text[i:i + _GRAM] for i in range(len(text) - _GRAM + 1)}
 
-    for item in items:
-        raw_query = item["query"]
-        qty = item["qty"]
 
-        # 1. Раскрытие синонимов (возвращает список кандидатов)
-        candidates = _expand_synonyms(raw_query)
+class CatalogIndex:
+    """
+    Каталог услуг, собранный для parse_order один раз на версию каталога.
+
+    name_map / choices — те же, что parse_order строил на каждом вызове
+    (порядок имён сохранён: от него зависят ничьи). Поверх них —
+    точный словарь имён и инвертированный индекс триграмм: подстрока
+    ищется только среди имён со всеми её триграммами, а не перебором
+    всего каталога. Нечёткие скореры rapidfuzz идут по тому же списку
+    choices с порогом не ниже уже найденной оценки — ответ extractOne
+    (первое имя с максимальной оценкой) от этого не меняется. Заранее
+    отсекать имена для скореров нельзя: partial_ratio и WRatio дают
+    оценку выше порога и без общих n-грамм, и уверенность бы поменялась.
+    Разобранные позиции запоминаются: при наборе текста оператором
+    прежние позиции разбираются заново на каждое нажатие.
+    """
+
+    def __init__(self, services: List[Dict[str, Any]]):
+        self.services = list(services)
+        self.name_map: Dict[str, Dict[str, Any]] = {}
+        self.choices: List[str] = []
+        for s in self.services:
+            for key in _LANG_KEYS:
+                name = (s.get(key) or '').strip()
+                if name:
+                    norm = _normalize(name)
+                    if norm not in self.name_map:
+                        self.name_map[norm] = s
+                        self.choices.append(norm)
+                    norm_no_dia = _remove_diacritics(norm)
+                    if norm_no_dia != norm and norm_no_dia not in self.name_map:
+                        self.name_map[norm_no_dia] = s
+                        self.choices.append(norm_no_dia)
+        self._pos = {name: i for i, name in enumerate(self.choices)}
+        self._postings: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.choices):
+            for g in _grams(name):
+                self._postings.setdefault(g, []).append(i)
+        # Имена услуги на всех языках — для оценки 97 / 87 после точного поиска
+        self._lang_names: Dict[int, List[Tuple[str, str]]] = {}
+        for s in self.services:
+            names = []
+            for key in _LANG_KEYS:
+                lang_name = _normalize(s.get(key, '') or '')
+                names.append((lang_name, _remove_diacritics(lang_name)))
+            self._lang_names[id(s)] = names
+        self._memo: Dict[Tuple[str, int], Tuple[Optional[Dict[str, Any]], float]] = {}
+        self._memo_lock = threading.Lock()
+
+    def _containing(self, q: str) -> List[int]:
+        """Позиции имён, содержащих q; для коротких q — перебор."""
+        if len(q) < _GRAM:
+            return [i for i, name in enumerate(self.choices) if q in name]
+        lists = []
+        for g in _grams(q):
+            posting = self._postings.get(g)
+            if not posting:
+                return []
+            lists.append(posting)
+        rarest = min(lists, key=len)
+        return [i for i in rarest if q in self.choices[i]]
+
+    def _exact(self, query_norm: str, query_no_dia: str) -> Optional[Dict[str, Any]]:
+        """
+        Услуга точного совпадения имени, иначе — самого короткого имени,
+        содержащего запрос (при равной длине — раньше по каталогу).
+        """
+        equal = [self._pos[q] for q in (query_norm, query_no_dia) if q in self._pos]
+        if equal:
+            return self.name_map[self.choices[min(equal)]]
+        hits = set(self._containing(query_norm))
+        if query_no_dia != query_norm:
+            hits.update(self._containing(query_no_dia))
+        if not hits:
+            return None
+        best = min(hits, key=lambda i: (len(self.choices[i]), i))
+        return self.name_map[self.choices[best]]
+
+    def match(self, raw_query: str, threshold: int) -> Tuple[Optional[Dict[str, Any]], float]:
+        """(услуга, оценка) для одной позиции заказа — как разбирал parse_order."""
+        key = (raw_query, threshold)
+        hit = self._memo.get(key)
+        if hit is not None:
+            return hit
 
         best_match_svc = None
         best_match_score = 0
-        best_match_via = None  # для отладки
-
-        for candidate in candidates:
+        seen = set()
+        for candidate in _expand_synonyms(raw_query):
             query_norm = _normalize(candidate)
+            # Повтор того же запроса не может дать строго большую оценку
+            if query_norm in seen:
+                continue
+            seen.add(query_norm)
             query_no_dia = _remove_diacritics(query_norm)
 
-            # 2. Точное вхождение (подстрока) — проверяем и с диакритиками и без
-            exact_match = None
-            best_substr_len = 999999
-            for name, svc in name_map.items():
-                if query_norm == name or query_no_dia == name:
-                    exact_match = svc
-                    best_substr_len = len(name)
-                    break
-                # Подстрока
-                if query_norm in name or query_no_dia in name:
-                    if exact_match is None or len(name) < best_substr_len:
-                        exact_match = svc
-                        best_substr_len = len(name)
-
+            # 1. Точное вхождение (подстрока) — и с диакритиками, и без
+            exact_match = self._exact(query_norm, query_no_dia)
             if exact_match:
-                # Проверяем совпадение по любому языковому полю
-                for lang_key in ('name_ru', 'name_ro', 'name_en', 'name'):
-                    lang_name = _normalize(exact_match.get(lang_key, '') or '')
-                    lang_name_no_dia = _remove_diacritics(lang_name)
+                for lang_name, lang_name_no_dia in self._lang_names[id(exact_match)]:
                     if query_norm == lang_name or query_no_dia == lang_name_no_dia:
-                        score = 97
-                        if score > best_match_score:
-                            best_match_svc = exact_match
-                            best_match_score = score
-                            best_match_via = "exact"
+                        if 97 > best_match_score:
+                            best_match_svc, best_match_score = exact_match, 97
                         break
                     if query_norm in lang_name or query_no_dia in lang_name_no_dia:
-                        score = 87
-                        if score > best_match_score:
-                            best_match_svc = exact_match
-                            best_match_score = score
-                            best_match_via = "substring"
+                        if 87 > best_match_score:
+                            best_match_svc, best_match_score = exact_match, 87
                         break
 
             if best_match_score >= 95:
                 break  # уже отличное совпадение, не нужно продолжать
 
-            # 3. rapidfuzz fuzzy matching — проверяем и с диакритиками и без
-            for q_variant in [query_norm, query_no_dia]:
-                for scorer, scorer_name in [
-                    (fuzz.token_set_ratio, "token_set"),
-                    (fuzz.partial_ratio, "partial"),
-                    (fuzz.WRatio, "wratio"),
-                ]:
-                    res = process.extractOne(
-                        q_variant, choices,
-                        scorer=scorer,
-                        score_cutoff=threshold,
-                    )
+            # 2. rapidfuzz: порог — не ниже текущей лучшей оценки, результат
+            #    ниже неё всё равно не принимается
+            variants = [query_norm] if query_no_dia == query_norm else [query_norm, query_no_dia]
+            for q_variant in variants:
+                for scorer in _FUZZY_SCORERS:
+                    cutoff = max(threshold, best_match_score - _CUTOFF_SLACK)
+                    res = process.extractOne(q_variant, self.choices, scorer=scorer, score_cutoff=cutoff)
                     if res and res[1] > best_match_score:
-                        matched_svc = name_map.get(res[0])
-                        if matched_svc:
-                            best_match_svc = matched_svc
-                            best_match_score = res[1]
-                            best_match_via = scorer_name
+                        best_match_svc = self.name_map[res[0]]
+                        best_match_score = res[1]
+
+        result = (best_match_svc, best_match_score)
+        with self._memo_lock:
+            if len(self._memo) >= _MEMO_LIMIT:
+                self._memo.clear()
+            self._memo[key] = result
+        return result
+
+
+_catalog_lock = threading.Lock()
+_catalog: Optional[Tuple[float, CatalogIndex]] = None
+_catalog_gen = 0
+_last_index: Optional[Tuple[tuple, CatalogIndex]] = None
+
+
+def _index_for(services: List[Dict[str, Any]]) -> CatalogIndex:
+    """Индекс для переданного списка услуг: тот же список имён — прежний индекс."""
+    global _last_index
+    fingerprint = tuple((s.get('id'),) + tuple(s.get(key) for key in _LANG_KEYS) for s in services)
+    last = _last_index
+    if last and last[0] == fingerprint:
+        return last[1]
+    index = CatalogIndex(services)
+    _last_index = (fingerprint, index)
+    return index
+
+
+def cached_catalog(loader: Callable[[], List[Dict[str, Any]]]) -> CatalogIndex:
+    """
+    Индекс каталога услуг из кеша процесса.
+
+    loader() → список услуг вызывается только на промахе и вне блокировки;
+    ошибка загрузки пробрасывается и ничего не кеширует. Если пока грузили,
+    кеш сбросили (invalidate_catalog), индекс отдаётся, но не запоминается.
+    """
+    global _catalog
+    now = time.time()
+    with _catalog_lock:
+        if _catalog and now - _catalog[0] < CATALOG_TTL:
+            return _catalog[1]
+        gen = _catalog_gen
+    index = CatalogIndex(loader())
+    with _catalog_lock:
+        if gen == _catalog_gen:
+            _catalog = (now, index)
+    return index
+
+
+def invalidate_catalog() -> None:
+    """Сброс кеша после правки или удаления услуги."""
+    global _catalog, _catalog_gen
+    with _catalog_lock:
+        _catalog_gen += 1
+        _catalog = None
+
+
+def parse_order(text: str, services: Union[List[Dict[str, Any]], CatalogIndex],
+                threshold: int = 45) -> List[Dict[str, Any]]:
+    """
+    Главная функция: парсит текст заказа → список совпадений.
+    Полностью двуязычный: RU + RO + смешанный ввод.
+
+    Args:
+        text: произвольный текст от оператора (RU, RO, или смешанный)
+        services: список услуг из БД [{id, name_ru, name_ro, name_en, name, price, ...}]
+                  или готовый CatalogIndex (cached_catalog) — тогда каталог
+                  не собирается заново
+        threshold: минимальный порог схожести (0-100)
+
+    Returns:
+        [{service_id, qty, original, confidence, service_name, service_name_ro}]
+    """
+    if not text or not text.strip():
+        return []
+
+    index = services if isinstance(services, CatalogIndex) else _index_for(services)
+    results = []
+
+    for item in _split_order_text(text):
+        raw_query = item["query"]
+        qty = item["qty"]
+        best_match_svc, best_match_score = index.match(raw_query, threshold)
 
         if best_match_svc and best_match_score >= threshold:
             results.append({
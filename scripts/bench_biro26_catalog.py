@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""RO: Replica catalogului magazinului Biro26 (models/biro26_catalog.py):
+    - implicit: catalog sintetic de --rows produse (ca cele ~78k din
+      TMS_UNIVERS), masoara construirea replicii si latenta cererilor tipice
+      ale magazinului — pagina 1 / pagina adinca, cautare, filtru pe brand +
+      pret, sortare dupa pret, fatete cu numarator;
+    - --live: pe serverul cu Oracle, incarca replica si compara cererile de
+      mai sus cu Biro26Store.get_products_stock (aceleasi coduri, aceeasi
+      ordine, aceleasi preturi si total). Cod de iesire 1 la nepotrivire.
+
+EN: synthetic latency bench of the shop catalog replica; with --live, a
+    parity check against the live Oracle query (exit 1 on any mismatch).
+
+Rulare: python3 scripts/bench_biro26_catalog.py [--rows 78000] [--repeat 20]
+        python3 scripts/bench_biro26_catalog.py --live
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models.biro26_catalog import Biro26Catalog, CatalogReplica  # noqa: E402
+
+WORDS = ["Pix", "Caiet", "Creion", "Marker", "Dosar", "Hirtie", "Biblioraft", "Capsator",
+         "Lipici", "Foarfece", "Rigla", "Radiera", "Plic", "Etichete", "Toner", "Tabla"]
+ATTRS = ["albastru", "rosu", "negru", "A4", "A5", "80g", "cu arc", "mat", "lucios", "set 12",
+         "0.5 mm", "1 mm", "magnetic", "plastic", "metal", "carton"]
+BRANDS = ["BIC", "Herlitz", "Austral", "Biblion", "Stabilo", "Faber-Castell", "Koh-i-Noor",
+          "Maped", "Pelikan", "Esselte", "Leitz", "Centropen"]
+GROUPS = {"Instrumente de scris": ["Pixuri", "Creioane", "Markere"],
+          "Hirtie": ["Caiete", "Hirtie copiator", "Plicuri"],
+          "Arhivare": ["Dosare", "Bibliorafturi"],
+          "Birou": ["Capsatoare", "Lipici", "Foarfece", "Rigle"]}
+
+QUERIES = [
+    ("pagina 1", {}),
+    ("pagina 300", {"offset": 300 * 24, "limit": 24}),
+    ("cautare", {"search": "albastru"}),
+    ("cautare barcode", {"search": "48400001"}),
+    ("brand + pret", {"brand": "BIC,Stabilo", "price_min": 10, "price_max": 100}),
+    ("grupa, pret desc", {"grupa": "Hirtie", "sort": "price_desc"}),
+    ("total", {"with_count": True}),
+]
+
+
+def synth(n: int, seed: int = 7) -> CatalogReplica:
+    rnd = random.Random(seed)
+    products, barcodes, webattr, prices = {}, {}, {}, {}
+    for i in range(n):
+        cod = 100000 + i
+        g = rnd.choice(list(GROUPS))
+        den = f"{rnd.choice(WORDS)} {rnd.choice(ATTRS)} {rnd.choice(ATTRS)} {i % 997}"
+        retail = round(rnd.uniform(1, 3000), 2) if rnd.random() < 0.9 else None
+        products[cod] = (cod, f"SKU-{i}", den, None, "buc.", "P", None,
+                         "2" if rnd.random() < 0.03 else None, g, rnd.choice(GROUPS[g]),
+                         rnd.choice(BRANDS), None, None, 1 if rnd.random() < 0.05 else 0,
+                         retail and round(retail * 0.8, 2), retail and round(retail * 0.9, 2),
+                         retail)
+        barcodes[cod] = [f"4840{cod:09d}"]
+        if rnd.random() < 0.3:
+            webattr[cod] = (den + " calitate premium", None, "descriere " + " ".join(rnd.sample(ATTRS, 4)))
+        if rnd.random() < 0.5:
+            prices[cod] = [("2026-01-01 00:00:00", "2026-12-31 00:00:00",
+                            round(rnd.uniform(1, 3000), 2), None, None)]
+    return CatalogReplica(products, barcodes, webattr, prices, charset="CL8MSWIN1251")
+
+
+def bench(args) -> None:
+    t0 = time.perf_counter()
+    rep = synth(args.rows)
+    print(f"replica: {args.rows} produse, construita in {time.perf_counter() - t0:.2f} s")
+    t0 = time.perf_counter()
+    rep.query(price_date="2026-10-19")
+    print(f"prima cerere (preturi la data + fatete de baza): {time.perf_counter() - t0:.2f} s")
+    for label, kw in QUERIES:
+        kw = {"limit": 24, **kw, "price_date": "2026-10-19"}
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = rep.query(**kw)
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"  {label:<18} mediana {statistics.median(times):7.2f} ms  "
+              f"max {max(times):7.2f} ms  rinduri {len(out['entries'])}"
+              + (f"  total {out['total']}" if "total" in out else ""))
+    t0 = time.perf_counter()
+    f = rep.query(price_date="2026-10-19", search="A4", facets=True)["facets"]
+    print(f"fatete pe 'A4': {(time.perf_counter() - t0) * 1000:.1f} ms, "
+          f"{len(f['brand'])} branduri, {len(f['categorie'])} categorii")
+
+
+def live(args) -> None:
+    from models.biro26_oracle_store import Biro26Store
+
+    t0 = time.perf_counter()
+    st = Biro26Catalog.refresh(full=True)
+    print(f"replica incarcata din Oracle: {Biro26Catalog.status()['products']} produse, "
+          f"{time.perf_counter() - t0:.1f} s ({st.get('mode')})")
+    bad = 0
+    for label, kw in QUERIES + [("pagina 1, nume desc", {"sort": "name_desc"}),
+                                ("produse noi", {"only_new": True})]:
+        kw = {"limit": 50, **kw}
+        t0 = time.perf_counter()
+        a = Biro26Store.get_products_stock(**kw)
+        t_live = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        b = Biro26Catalog.products_stock(**kw)
+        t_rep = time.perf_counter() - t0
+        if not (a.get("success") and b.get("success")):
+            print(f"  {label}: eroare live={a.get('error')} replica={b.get('error')}")
+            bad += 1
+            continue
+        key = lambda rows: [(r["cod"], r["retail1"], r["angro"], r["ionline"], r["image"])
+                            for r in rows]
+        same = key(a["data"]) == key(b["data"]) and a.get("total") == b.get("total")
+        bad += not same
+        print(f"  {label:<20} live {t_live:6.2f} s  replica {t_rep:6.2f} s  "
+              f"{'OK' if same else 'NEPOTRIVIRE'}")
+    if bad:
+        raise SystemExit(1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replica catalogului Biro26: latenta / paritate cu Oracle")
+    ap.add_argument("--rows", type=int, default=78000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--live", action="store_true", help="paritate cu interogarea live (Oracle)")
+    args = ap.parse_args()
+    live(args) if args.live else bench(args)
+
+
+if __name__ == "__main__":
+    main()
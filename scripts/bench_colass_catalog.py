@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Локальный разбор сметы Colass по индексу каталога (models/colass_catalog.py)
+на сгенерированном каталоге в 50 000 строк — против прежнего перебора
+ColassController.ai_parse_estimate_local: каждая часть сметы против каждой
+работы и ресурса, с нормализацией строки каталога на каждую часть.
+
+Каталог: работы и ресурсы из словаря RO/RU строительных терминов с
+диаметрами и размерами, коды в стиле сборников норм (TsA02B, CA03B12).
+Сметы: строки «количество + единица + название» — имена целиком, куски
+имён, имена с опечатками, коды, русские синонимы, мусор.
+
+Сверка:
+  * перебор индекса (exhaustive=True) — тот же ответ, строка и оценка, что
+    у прежнего кода, на первых --legacy-parts частях (прежний код медленный);
+  * ступени 100 / 99 / 92 / 80 — совпадают с полным перебором на всех частях;
+  * отбор кандидатов — печатается, на скольких найденных полным перебором
+    частях индекс дал ту же строку и оценку, и где совпал итог «найдено /
+    не найдено» при пороге 45. Мусор без общих с каталогом слов индекс
+    оценивает нулём, полный перебор — малой оценкой; итог тот же.
+
+Запуск: python3 scripts/bench_colass_catalog.py [--rows 50000] [--pastes 30]
+        [--lines 20] [--legacy-parts 20]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from controllers.colass_controller import _norm_text, _score_local, _split_ai_parts
+from models.colass_catalog import ColassCatalogIndex, _tier
+
+ACTIONS = ['Montarea', 'Demontarea', 'Instalarea', 'Executarea', 'Sapatura', 'Umplutura', 'Izolarea',
+           'Vopsirea', 'Turnarea', 'Sudarea', 'Spalarea', 'Proba', 'Transportarea', 'Compactarea']
+OBJECTS = ['teava PE', 'teava otel', 'robinet', 'contor apa', 'camin vizitare', 'beton armat',
+           'nisip', 'pietris', 'hidroizolatie', 'cablu electric', 'tub protectie', 'fundatie',
+           'strat asfalt', 'bordura', 'gard metalic', 'stalp iluminat', 'hidrant', 'vana sertar',
+           'racord', 'cot', 'teu', 'reductie', 'flansa', 'armatura', 'plasa sudata']
+PLACES = ['in transee', 'manual', 'mecanizat', 'pe pat de nisip', 'la adancime 1.5 m',
+          'in teren categoria II', 'in canal', 'suprateran', 'in camin', 'cu excavator']
+RESOURCES = ['Teava PEHD', 'Teava otel zincat', 'Ciment M400', 'Nisip de rau', 'Pietris 5-20',
+             'Electrozi', 'Robinet cu bila', 'Beton B25', 'Armatura A-III', 'Bitum', 'Cablu VVG',
+             'Excavator 0.65 m3', 'Autobasculanta 10 t', 'Macara 16 t', 'Muncitor cat. 3', 'Sudor']
+SYNONYMS = {'teava': 'труба', 'nisip': 'песок', 'robinet': 'кран', 'contor': 'счетчик'}
+UNITS = ['m', 'm3', 'buc', 'kg', 'ore', 'шт']
+
+
+def synth(n: int, seed: int = 5):
+    rnd = random.Random(seed)
+    works, resources = [], []
+    n_works = n * 3 // 5
+    for i in range(n_works):
+        name = f"{rnd.choice(ACTIONS)} {rnd.choice(OBJECTS)}"
+        if rnd.random() < 0.7:
+            name += f" d{rnd.choice([20, 25, 32, 40, 50, 63, 90, 110, 160, 225, 315])}"
+        if rnd.random() < 0.6:
+            name += f" {rnd.choice(PLACES)}"
+        code = f"{rnd.choice(['Ts', 'CA', 'RpCS', 'AC', 'IzF'])}{rnd.choice('ABC')}{rnd.randint(1, 60):02d}{rnd.choice('ABCD')}{i % 97}"
+        works.append({'id': i + 1, 'code': code, 'name': name, 'unit': rnd.choice(UNITS),
+                      'price': round(rnd.uniform(1, 900), 2), 'entity_type': 'work'})
+    for i in range(n - n_works):
+        name = f"{rnd.choice(RESOURCES)} {rnd.choice(['', 'tip ', 'marca '])}{rnd.randint(1, 400)}"
+        if rnd.random() < 0.4:
+            name += f" {rnd.choice(['GOST', 'SR EN', 'import', 'local'])}"
+        resources.append({'id': i + 1, 'code': f"{rnd.randint(1000000, 9999999)}", 'name': name,
+                          'unit': rnd.choice(UNITS), 'price': round(rnd.uniform(1, 900), 2),
+                          'type_id': rnd.randint(1, 4), 'entity_type': 'resource'})
+    return works, resources
+
+
+def typo(s: str, rnd: random.Random) -> str:
+    if len(s) < 5:
+        return s
+    i = rnd.randrange(1, len(s) - 1)
+    kind = rnd.randrange(3)
+    if kind == 0:
+        return s[:i] + s[i + 1:]
+    if kind == 1:
+        return s[:i] + s[i] + s[i:]
+    return s[:i] + s[i + 1] + s[i] + s[i + 2:] if i + 2 <= len(s) else s
+
+
+def pastes(rows, count: int, lines: int, seed: int = 11):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(count):
+        parts = []
+        for _ in range(lines):
+            r = rnd.choice(rows)
+            kind = rnd.randrange(7)
+            if kind == 0:
+                text = r['name']
+            elif kind == 1:
+                w = r['name'].split()
+                text = ' '.join(w[:rnd.randint(2, max(2, len(w)))])
+            elif kind == 2:
+                text = typo(r['name'], rnd)
+            elif kind == 3:
+                text = r['code']
+            elif kind == 4:
+                text = ' '.join(SYNONYMS.get(w.lower(), w) for w in r['name'].split())
+            elif kind == 5:
+                w = r['name'].split()
+                rnd.shuffle(w)
+                text = ' '.join(w[:3])
+            else:
+                text = ''.join(rnd.choice('qwxyzjk ') for _ in range(rnd.randint(4, 14))).strip() or 'xq'
+            qty = rnd.choice(['', f"{rnd.randint(1, 500)} {rnd.choice(UNITS)} ", f"{rnd.randint(1, 40)},5 "])
+            parts.append(f"{qty}{text}".replace(',', '.') if qty else text.replace(',', ' '))
+        out.append('\n'.join(parts))
+    return out
+
+
+def legacy_best(token_norm, works, resources):
+    """Прежний перебор ai_parse_estimate_local: нормализация строк на каждую часть."""
+    best, best_score = None, -1.0
+    for row in works + resources:
+        score = _score_local(token_norm, _norm_text(row.get('name') or ''), _norm_text(row.get('code') or ''))
+        if score > best_score:
+            best, best_score = row, score
+    return best, best_score
+
+
+def brute_tiers(index: ColassCatalogIndex, token):
+    best, best_pos, hit = -1.0, None, set()
+    for pos, (name, code) in enumerate(zip(index._names, index._codes)):
+        if not name:
+            continue
+        tier = _tier(token, name, code)
+        if tier is not None:
+            hit.add(pos)
+            if tier > best:
+                best, best_pos = tier, pos
+    return best, best_pos, hit
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Замер локального разбора сметы Colass по каталогу')
+    ap.add_argument('--rows', type=int, default=50000)
+    ap.add_argument('--pastes', type=int, default=30)
+    ap.add_argument('--lines', type=int, default=20)
+    ap.add_argument('--legacy-parts', type=int, default=20)
+    ap.add_argument('--threshold', type=int, default=45)
+    args = ap.parse_args()
+
+    works, resources = synth(args.rows)
+    texts = pastes(works + resources, args.pastes, args.lines)
+    t0 = time.perf_counter()
+    index = ColassCatalogIndex(works + resources, _norm_text)
+    t_build = (time.perf_counter() - t0) * 1000
+    print(f"каталог: {len(works)} работ + {len(resources)} ресурсов, сборка индекса {t_build:.0f} мс")
+
+    tokens = [[_norm_text(p['token']) for p in _split_ai_parts(t)] for t in texts]
+    flat = [t for paste in tokens for t in paste]
+
+    # Прежний перебор — только на первых частях
+    legacy_n = min(args.legacy_parts, len(flat))
+    t0 = time.perf_counter()
+    ref_legacy = [legacy_best(t, works, resources) for t in flat[:legacy_n]]
+    t_legacy = (time.perf_counter() - t0) / max(1, legacy_n) * 1000
+    for t, (rr, rs) in zip(flat, ref_legacy):
+        gr, gs = index.match(t, exhaustive=True)
+        if rr is not gr or rs != gs:
+            raise SystemExit(f'перебор: расхождение на «{t}»: {rr and rr["name"]} {rs} против {gr and gr["name"]} {gs}')
+
+    for t in flat:
+        if index._tiers(t) != brute_tiers(index, t):
+            raise SystemExit(f'ступени: расхождение на «{t}»')
+
+    t0 = time.perf_counter()
+    ref = [index.match(t, exhaustive=True) for t in flat]
+    t_full = (time.perf_counter() - t0) / len(flat) * 1000
+
+    per_paste = []
+    got = []
+    for paste in tokens:
+        t0 = time.perf_counter()
+        got.extend(index.match_many(paste))
+        per_paste.append((time.perf_counter() - t0) * 1000)
+
+    found = [(r, g) for r, g in zip(ref, got) if round(r[1], 2) >= args.threshold]
+    same = sum(rr is gr for (rr, _rs), (gr, _gs) in found)
+    same_score = sum(rs == gs for (_rr, rs), (_gr, gs) in found)
+    found_same = sum((round(rs, 2) >= args.threshold) == (round(gs, 2) >= args.threshold)
+                     for (_rr, rs), (_gr, gs) in zip(ref, got))
+    for (rr, rs), (gr, gs) in zip(ref, got):
+        if rs in (100.0, 99.0) and (rr is not gr or rs != gs):
+            raise SystemExit(f'ступень {rs}: индекс нашёл {gr and gr["name"]} {gs}')
+
+    parts = len(flat) / len(tokens)
+    print(f"частей: {len(flat)} в {len(tokens)} сметах (~{parts:.0f} на смету)")
+    print(f"прежний перебор:     {t_legacy:9.1f} мс/часть  ~{t_legacy * parts / 1000:7.2f} с/смета  "
+          f"(по {legacy_n} частям, ответы совпали)")
+    print(f"перебор индекса:     {t_full:9.1f} мс/часть  ~{t_full * parts / 1000:7.2f} с/смета")
+    print(f"индекс, match_many:  {statistics.mean(per_paste) / parts:9.2f} мс/часть  "
+          f"p50 {pct(per_paste, 0.5):.1f} мс  p95 {pct(per_paste, 0.95):.1f} мс  max {max(per_paste):.1f} мс / смета")
+    print(f"найдено полным перебором {len(found)} частей, из них у индекса: та же строка "
+          f"{same / max(1, len(found)) * 100:.1f}%, та же оценка {same_score / max(1, len(found)) * 100:.1f}%")
+    print(f"тот же итог «найдено / не найдено» при пороге {args.threshold}: {found_same / len(flat) * 100:.1f}% частей")
+
+
+if __name__ == '__main__':
+    main()
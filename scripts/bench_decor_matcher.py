@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Разбор строк сметы DECOR по каталогу материалов (models/decor_matcher.py)
+на сгенерированных каталогах — против прежнего перебора: каждая строка
+против каждого материала, difflib.SequenceMatcher по четырём полям.
+
+Каталог: коды в стиле прайсов HUUN / YENI VERANDA (M6521, EM07100091,
+VRD-0004), имена из словаря профилей, аксессуаров, стекла. Строки:
+коды как есть и внутри строки, куски имён, имена с опечатками, мусор.
+
+Сверка: с ядром difflib (как без rapidfuzz) ответ — материал и оценка —
+обязан совпасть с прежним на каждой строке. С ядром rapidfuzz ступени
+100 / 95 / 90 сверяются точно; нечёткие оценки считаются иначе (общая
+подпоследовательность вместо блоков difflib), печатается доля совпавших
+материалов.
+
+Запуск: python3 scripts/bench_decor_matcher.py [--materials 200 2000 10000]
+        [--tokens 300]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import models.decor_matcher as decor_matcher
+from decor_local_store import DecorLocalStore
+from models.decor_matcher import DecorMaterialMatcher
+
+norm = DecorLocalStore._norm_text
+
+WORDS = ['profile', 'cover', 'gutter', 'rear', 'side', 'middle', 'main', 'carrier', 'angle',
+         'connection', 'glass', 'insulated', 'single', 'veranda', 'epdm', 'fitil', 'led',
+         'white', 'rgb', 'dimmer', 'drainage', 'water', 'plastic', 'bracket', 'screw', 'post',
+         'beam', 'rail', 'sliding', 'panel', 'capac', 'profil', 'sticla', 'jgheab', 'garnitura']
+
+
+def synth(n: int, seed: int = 3):
+    rnd = random.Random(seed)
+    mats = []
+    for i in range(n):
+        kind = rnd.randrange(3)
+        if kind == 0:
+            code = f'M{rnd.randint(1000, 99999)}'
+        elif kind == 1:
+            code = f'EM{rnd.randint(10 ** 7, 10 ** 8 - 1)}'
+        else:
+            code = f'VRD-{rnd.randint(1, 9999):04d}'
+        name = ' '.join(rnd.sample(WORDS, rnd.randint(2, 4))).title()
+        mats.append({'id': i + 1, 'code': code, 'name': name,
+                     'name_original': name.upper() if rnd.random() < 0.5 else '',
+                     'name_ro': ' '.join(rnd.sample(WORDS[-5:], 2)) if rnd.random() < 0.4 else name,
+                     'active': 'Y'})
+    return mats
+
+
+def typo(s: str, rnd: random.Random) -> str:
+    if len(s) < 4:
+        return s
+    i = rnd.randrange(1, len(s) - 1)
+    return s[:i] + s[i + 1:] if rnd.random() < 0.5 else s[:i] + s[i] + s[i:]
+
+
+def tokens(mats, count: int, seed: int = 9):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(count):
+        m = rnd.choice(mats)
+        kind = rnd.randrange(6)
+        if kind == 0:
+            out.append(m['code'])
+        elif kind == 1:
+            out.append(f"{m['code']} {rnd.choice(WORDS)}")
+        elif kind == 2:
+            w = m['name'].split()
+            out.append(' '.join(w[:rnd.randint(1, len(w))]))
+        elif kind == 3:
+            out.append(typo(m['name'], rnd))
+        elif kind == 4:
+            out.append(typo(m['code'], rnd))
+        else:
+            out.append(''.join(rnd.choice('abcdefghij 0123') for _ in range(rnd.randint(2, 12))))
+    return [norm(t) for t in out]
+
+
+def legacy_tier(token_norm, m):
+    """Ступень прежнего DecorLocalStore._ai_score_material или None."""
+    code = norm(m.get('code'))
+    if token_norm == code and code:
+        return 100.0
+    if code and code in token_norm:
+        return 95.0
+    names = (norm(m.get('name')), norm(m.get('name_original')), norm(m.get('name_ro')))
+    if token_norm and any(token_norm in n for n in names if n):
+        return 90.0
+    return None
+
+
+def legacy_score(token_norm, m):
+    """Прежний DecorLocalStore._ai_score_material."""
+    tier = legacy_tier(token_norm, m)
+    if tier is not None:
+        return tier
+    best = 0.0
+    for cand in [norm(m.get(k)) for k in ('code', 'name', 'name_original', 'name_ro')]:
+        if cand:
+            best = max(best, SequenceMatcher(None, token_norm, cand).ratio() * 100.0)
+    return round(best, 2)
+
+
+def legacy_tiers(token_norm, mats):
+    """Ступени по каталогу: (лучшая, её материал, материалы со ступенью)."""
+    best, best_pos, hit = -1.0, None, set()
+    for pos, m in enumerate(mats):
+        tier = legacy_tier(token_norm, m)
+        if tier is not None:
+            hit.add(pos)
+            if tier > best:
+                best, best_pos = tier, pos
+    return best, best_pos, hit
+
+
+def legacy_best(token_norm, mats):
+    best, best_score = None, -1.0
+    for m in mats:
+        score = legacy_score(token_norm, m)
+        if score > best_score:
+            best, best_score = m, score
+    return best, best_score
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Замер разбора строк сметы DECOR по материалам')
+    ap.add_argument('--materials', type=int, nargs='+', default=[200, 2000, 10000])
+    ap.add_argument('--tokens', type=int, default=300)
+    args = ap.parse_args()
+    rapid = decor_matcher.fuzz is not None
+
+    print(f"{'материалов':>10} {'строк':>6} | {'прежний, мс/стр':>15} | {'difflib, мс/стр':>15} "
+          f"{'x':>6} | {'rapidfuzz, мс/стр':>17} {'x':>6} {'тот же':>7} | {'сборка, мс':>10}")
+    for n in args.materials:
+        mats = synth(n)
+        toks = tokens(mats, args.tokens)
+        t0 = time.perf_counter()
+        ref = [legacy_best(t, mats) for t in toks]
+        t_old = (time.perf_counter() - t0) / len(toks) * 1000
+
+        t0 = time.perf_counter()
+        matcher = DecorMaterialMatcher(mats, norm)
+        t_build = (time.perf_counter() - t0) * 1000
+
+        saved = decor_matcher.fuzz
+        decor_matcher.fuzz = None
+        try:
+            t0 = time.perf_counter()
+            got = [matcher.best(t) for t in toks]
+            t_dl = (time.perf_counter() - t0) / len(toks) * 1000
+        finally:
+            decor_matcher.fuzz = saved
+        for t, (rm, rs), (gm, gs) in zip(toks, ref, got):
+            if rm is not gm or rs != gs:
+                raise SystemExit(f'difflib: расхождение на «{t}»: {rm["code"]} {rs} против {gm["code"]} {gs}')
+        for t in toks:
+            if matcher._tiers(t) != legacy_tiers(t, mats):
+                raise SystemExit(f'ступени: расхождение на «{t}»')
+
+        line = (f"{n:>10} {len(toks):>6} | {t_old:>15.3f} | {t_dl:>15.3f} {t_old / t_dl:>6.1f} | ")
+        if rapid:
+            t0 = time.perf_counter()
+            got = [matcher.best(t) for t in toks]
+            t_rf = (time.perf_counter() - t0) / len(toks) * 1000
+            same = 0
+            for t, (rm, rs), (gm, gs) in zip(toks, ref, got):
+                if rs in (100.0, 95.0) and (rm is not gm or rs != gs):
+                    raise SystemExit(f'rapidfuzz: ступень {rs} на «{t}»: {rm["code"]} против {gm["code"]} {gs}')
+                same += rm is gm
+            line += f"{t_rf:>17.3f} {t_old / t_rf:>6.1f} {same / len(toks) * 100:>6.1f}% | "
+        else:
+            line += f"{'нет rapidfuzz':>32} | "
+        print(line + f"{t_build:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Локальный разбор заказов Nufarul (nufarul_ai_parser.parse_order)
+на каталоге услуг из sql/16_nufarul_services_data.sql и
+sql/20_nufarul_ro_translations.sql — против прежнего разбора, который
+собирал name_map / choices и перебирал каталог на каждом вызове.
+
+Корпус ввода оператора: синонимы RU / RO, имена каталога, они же
+с опечатками (пропуск, перестановка, удвоение буквы), фразы с
+количеством и единицами — и каждая фраза по нажатиям клавиш: поле
+разбирается на каждый введённый символ.
+
+Ответы (услуга, количество, уверенность) сверяются с прежним разбором
+на каждом вводе: расхождение — ошибка.
+
+Запуск: python3 scripts/bench_nufarul_parser.py [--threshold 40] [--typos 3]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from rapidfuzz import fuzz, process
+
+from nufarul_ai_parser import (SYNONYMS_RO, SYNONYMS_RU, CatalogIndex, _normalize,
+                               _remove_diacritics, _split_order_text, _stem_ro, _stem_ru,
+                               parse_order)
+
+PHRASES = [
+    '2 рубашки, palton, 3 perne',
+    '2 cămăși, пальто',
+    '2шт рубашка и куртка на пуху',
+    'rochie 2 buc; geaca si 3 perne',
+    'ковер 2, шторы, тюль',
+    'costum sportiv, pantaloni 2 buc, fata de perna',
+    'Куртка Vindiac джинсовая с капюшоном',
+    'plapuma 2 persoane, cuvertura',
+    'дубленка и шуба норка',
+    '3 подушки, одеяло, плед',
+]
+
+
+def load_catalog():
+    """Услуги: имена RU из sql/16, к ним RO-переводы из sql/20 по порядку ID."""
+    with open(os.path.join(ROOT, 'sql', '16_nufarul_services_data.sql'), encoding='utf-8') as f:
+        names = re.findall(r"VALUES \('((?:[^']|'')*)',", f.read())
+    with open(os.path.join(ROOT, 'sql', '20_nufarul_ro_translations.sql'), encoding='utf-8') as f:
+        ro = re.findall(r"NAME_RO = '((?:[^']|'')*)' WHERE ID = (\d+)", f.read())
+    services = [{'id': i + 1, 'name_ru': n.replace("''", "'"), 'name_ro': None, 'name_en': None}
+                for i, n in enumerate(names)]
+    for k, (name_ro, _sid) in enumerate(sorted(ro, key=lambda r: int(r[1]))):
+        if k < len(services):
+            services[k]['name_ro'] = name_ro.replace("''", "'")
+    return services
+
+
+def typo(word: str, rnd: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rnd.randrange(1, len(word) - 1)
+    kind = rnd.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+    return word[:i] + word[i] + word[i:]
+
+
+def corpus(services, typos: int, seed: int = 5):
+    rnd = random.Random(seed)
+    texts = list(SYNONYMS_RU) + list(SYNONYMS_RO)
+    for s in services:
+        for name in (s['name_ru'], s['name_ro']):
+            if name:
+                texts.append(name)
+                texts.extend(typo(name, rnd) for _ in range(typos))
+    for short in list(SYNONYMS_RU) + list(SYNONYMS_RO):
+        texts.append(f'{rnd.randint(1, 5)} {typo(short, rnd)}')
+    for phrase in PHRASES:
+        texts.extend(phrase[:k] for k in range(1, len(phrase) + 1))
+    return texts
+
+
+# ---- прежний разбор (до CatalogIndex), скопирован для сверки ----
+
+def legacy_expand_synonyms(query):
+    q = _normalize(query)
+    q_no_dia = _remove_diacritics(q)
+    candidates = [q]
+    if q in SYNONYMS_RU:
+        candidates.insert(0, SYNONYMS_RU[q])
+    if q in SYNONYMS_RO:
+        candidates.insert(0, SYNONYMS_RO[q])
+    else:
+        for syn_key, syn_val in SYNONYMS_RO.items():
+            if _remove_diacritics(syn_key) == q_no_dia:
+                candidates.insert(0, syn_val)
+                break
+    q_stem_ru = _stem_ru(q)
+    for short, full in SYNONYMS_RU.items():
+        if _stem_ru(short) == q_stem_ru and full not in candidates:
+            candidates.insert(0, full)
+            break
+    q_stem_ro = _stem_ro(q_no_dia)
+    for short, full in SYNONYMS_RO.items():
+        if _stem_ro(_remove_diacritics(short)) == q_stem_ro and full not in candidates:
+            candidates.insert(0, full)
+            break
+    return candidates
+
+
+def legacy_parse_order(text, services, threshold=45):
+    if not text or not text.strip():
+        return []
+    name_map, choices = {}, []
+    for s in services:
+        for key in ('name_ru', 'name_ro', 'name_en', 'name'):
+            name = (s.get(key) or '').strip()
+            if name:
+                norm = _normalize(name)
+                if norm not in name_map:
+                    name_map[norm] = s
+                    choices.append(norm)
+                norm_no_dia = _remove_diacritics(norm)
+                if norm_no_dia != norm and norm_no_dia not in name_map:
+                    name_map[norm_no_dia] = s
+                    choices.append(norm_no_dia)
+    results = []
+    for item in _split_order_text(text):
+        raw_query, qty = item['query'], item['qty']
+        best_svc, best_score = None, 0
+        for candidate in legacy_expand_synonyms(raw_query):
+            query_norm = _normalize(candidate)
+            query_no_dia = _remove_diacritics(query_norm)
+            exact_match, best_substr_len = None, 999999
+            for name, svc in name_map.items():
+                if query_norm == name or query_no_dia == name:
+                    exact_match = svc
+                    break
+                if query_norm in name or query_no_dia in name:
+                    if exact_match is None or len(name) < best_substr_len:
+                        exact_match = svc
+                        best_substr_len = len(name)
+            if exact_match:
+                for lang_key in ('name_ru', 'name_ro', 'name_en', 'name'):
+                    lang_name = _normalize(exact_match.get(lang_key, '') or '')
+                    lang_name_no_dia = _remove_diacritics(lang_name)
+                    if query_norm == lang_name or query_no_dia == lang_name_no_dia:
+                        if 97 > best_score:
+                            best_svc, best_score = exact_match, 97
+                        break
+                    if query_norm in lang_name or query_no_dia in lang_name_no_dia:
+                        if 87 > best_score:
+                            best_svc, best_score = exact_match, 87
+                        break
+            if best_score >= 95:
+                break
+            for q_variant in [query_norm, query_no_dia]:
+                for scorer in (fuzz.token_set_ratio, fuzz.partial_ratio, fuzz.WRatio):
+                    res = process.extractOne(q_variant, choices, scorer=scorer, score_cutoff=threshold)
+                    if res and res[1] > best_score:
+                        best_svc, best_score = name_map[res[0]], res[1]
+        if best_svc and best_score >= threshold:
+            results.append((best_svc['id'], qty, raw_query, round(best_score)))
+        else:
+            results.append((None, qty, raw_query, 0))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Замер локального разбора заказов Nufarul')
+    ap.add_argument('--threshold', type=int, default=40)
+    ap.add_argument('--typos', type=int, default=3, help='опечаток на имя каталога')
+    args = ap.parse_args()
+
+    services = load_catalog()
+    texts = corpus(services, args.typos)
+    print(f"каталог:  {len(services)} услуг, корпус: {len(texts)} вводов")
+
+    t0 = time.perf_counter()
+    ref = [legacy_parse_order(t, services, args.threshold) for t in texts]
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    cold = [parse_order(t, services, args.threshold) for t in texts]
+    t_cold = time.perf_counter() - t0
+
+    # Отдельный индекс: запомненные списком позиции не в счёт
+    index = CatalogIndex(services)
+    t0 = time.perf_counter()
+    warm = [parse_order(t, index, args.threshold) for t in texts]
+    t_warm = time.perf_counter() - t0
+
+    for text, r, c, w in zip(texts, ref, cold, warm):
+        for name, got in (('список', c), ('индекс', w)):
+            got = [(m['service_id'], m['qty'], m['original'], m['confidence']) for m in got]
+            if got != r:
+                raise SystemExit(f'{name}: расхождение на «{text}»: {r} против {got}')
+    matched = sum(1 for r in ref for m in r if m[0] is not None)
+    print(f"прежний:  {t_old:8.3f} с   {t_old / len(texts) * 1000:7.2f} мс на ввод, позиций найдено {matched}")
+    print(f"список:   {t_cold:8.3f} с   x{t_old / t_cold:.1f} (услуги списком, как раньше)")
+    print(f"индекс:   {t_warm:8.3f} с   x{t_old / t_warm:.1f}   {t_warm / len(texts) * 1000:7.2f} мс на ввод")
+
+
+if __name__ == '__main__':
+    main()
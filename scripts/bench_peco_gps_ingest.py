@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Синтетический replay GPS-телеметрии: сколько пингов в секунду принимает
+PecoGps.ingest.
+
+Трек строится для каждой машины с GPS-устройством (случайное блуждание
+вокруг нефтебазы, шаг 10 секунд), пинги режутся на пачки как у провайдера
+и отправляются в ingest по очереди. Доля пачек (--retry) отправляется
+повторно — так проверяется, что повтор не удваивает трек: такие пинги
+должны вернуться в duplicates, а не в accepted.
+
+--legacy прогоняет те же пачки прежним способом (INSERT на пинг +
+перечитывание справочников на пачку) — для сравнения на одной базе.
+
+Время пингов — от 2000-01-01: после замера они удаляются по этому
+признаку и не попадают в разбор рейсов.
+
+Запуск: python3 scripts/bench_peco_gps_ingest.py [--pings 20000] [--batch 500]
+        [--retry 0.1] [--legacy]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models.database import DatabaseModel
+from models.peco_gps import PecoGps, invalidate_lookup
+
+EPOCH = datetime(2000, 1, 1)
+
+
+def rows(res):
+    if not res or not res.get('success'):
+        return []
+    cols = [c.lower() for c in (res.get('columns') or [])]
+    return [dict(zip(cols, r)) for r in (res.get('data') or [])]
+
+
+def synth_pings(devices, total: int, seed: int = 7):
+    """Пинги по очереди от всех устройств, как их отдаёт провайдер."""
+    rnd = random.Random(seed)
+    pos = {d: (47.0 + rnd.uniform(-0.5, 0.5), 28.8 + rnd.uniform(-0.5, 0.5)) for d in devices}
+    out = []
+    step = 0
+    while len(out) < total:
+        ts = (EPOCH + timedelta(seconds=10 * step)).strftime('%Y-%m-%dT%H:%M:%S')
+        for dev in devices:
+            lat, lon = pos[dev]
+            lat += rnd.uniform(-0.002, 0.002)
+            lon += rnd.uniform(-0.002, 0.002)
+            pos[dev] = (lat, lon)
+            out.append({'device_id': dev, 'ts': ts, 'lat': round(lat, 6), 'lon': round(lon, 6),
+                        'speed': round(rnd.uniform(0, 80), 1), 'ignition': 1,
+                        'seal_closed': 1})
+            if len(out) >= total:
+                break
+        step += 1
+    return out
+
+
+def legacy_ingest(provider, payload):
+    """Прежний путь: справочники на каждую пачку и INSERT на каждый пинг."""
+    with DatabaseModel() as db:
+        trucks = {r['gps_device_id']: r for r in rows(db.execute_query(
+            "SELECT ID, GPS_DEVICE_ID FROM PECO_TRUCKS "
+            "WHERE GPS_DEVICE_ID IS NOT NULL AND ACTIVE = 1"))}
+        trips = {int(r['truck_id']): int(r['id']) for r in rows(db.execute_query(
+            "SELECT ID, TRUCK_ID FROM PECO_TRIPS "
+            "WHERE STATUS IN ('loading','en_route') ORDER BY ID"))}
+        accepted = 0
+        for p in payload['pings']:
+            truck = trucks.get(str(p['device_id']))
+            if not truck:
+                continue
+            r = db.execute_query(
+                "INSERT INTO PECO_GPS_PINGS (TRUCK_ID, TRIP_ID, TS, LAT, LON, "
+                "SPEED_KMH, HEADING, IGNITION, SEAL_CLOSED, FUEL_L, PROVIDER_ID) "
+                "VALUES (:p_t, :p_tr, "
+                " NVL(TO_TIMESTAMP(:p_ts, 'YYYY-MM-DD\"T\"HH24:MI:SS'), SYSTIMESTAMP), "
+                " :p_lat, :p_lon, :p_sp, NULL, :p_ig, :p_seal, NULL, :p_pr)",
+                {'p_t': int(truck['id']), 'p_tr': trips.get(int(truck['id'])),
+                 'p_ts': p['ts'], 'p_lat': p['lat'], 'p_lon': p['lon'], 'p_sp': p['speed'],
+                 'p_ig': p['ignition'], 'p_seal': p['seal_closed'], 'p_pr': provider.get('id')})
+            accepted += 1 if r.get('success') else 0
+        db.connection.commit()
+    return {'success': True, 'accepted': accepted, 'duplicates': 0}
+
+
+def cleanup():
+    with DatabaseModel() as db:
+        db.execute_query("DELETE FROM PECO_GPS_PINGS WHERE TS < :p_ts",
+                         {'p_ts': EPOCH + timedelta(days=365)})
+        db.connection.commit()
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Replay-замер приёма GPS-телеметрии')
+    ap.add_argument('--pings', type=int, default=20000)
+    ap.add_argument('--batch', type=int, default=500, help='пингов в пачке провайдера')
+    ap.add_argument('--retry', type=float, default=0.1, help='доля пачек, отправляемых повторно')
+    ap.add_argument('--legacy', action='store_true', help='прежний построчный приём')
+    args = ap.parse_args()
+
+    with DatabaseModel() as db:
+        devices = [str(r['gps_device_id']) for r in rows(db.execute_query(
+            "SELECT GPS_DEVICE_ID FROM PECO_TRUCKS "
+            "WHERE GPS_DEVICE_ID IS NOT NULL AND ACTIVE = 1 ORDER BY ID"))]
+        provider = rows(db.execute_query(
+            "SELECT ID, CODE FROM PECO_GPS_PROVIDERS WHERE ACTIVE = 1 ORDER BY ID"))
+    if not devices or not provider:
+        print('нет машин с GPS-устройством или активного провайдера'); return
+    provider = provider[0]
+
+    pings = synth_pings(devices, args.pings)
+    batches = [pings[i:i + args.batch] for i in range(0, len(pings), args.batch)]
+    rnd = random.Random(11)
+    retries = [b for b in batches if rnd.random() < args.retry]
+    ingest = legacy_ingest if args.legacy else PecoGps.ingest
+
+    invalidate_lookup()
+    cleanup()
+    accepted = duplicates = 0
+    sent = 0
+    t0 = time.perf_counter()
+    try:
+        for batch in batches + retries:
+            res = ingest(provider, {'pings': batch})
+            if not res.get('success'):
+                print('ошибка пачки:', res.get('error')); return
+            accepted += res.get('accepted', 0)
+            duplicates += res.get('duplicates', 0)
+            sent += len(batch)
+        elapsed = time.perf_counter() - t0
+    finally:
+        cleanup()
+
+    print(f"режим:        {'построчный (legacy)' if args.legacy else 'пакетный'}")
+    print(f"устройств:    {len(devices)}, пачек {len(batches)} + повторов {len(retries)} "
+          f"по {args.batch}")
+    print(f"отправлено:   {sent} пингов за {elapsed:.2f} с")
+    print(f"принято:      {accepted}, дублей отсечено: {duplicates}")
+    print(f"скорость:     {sent / elapsed:,.0f} пингов/с".replace(',', ' '))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Раскладка строк заказа по секциям бензовозов (models/peco_packing.py)
+на сгенерированных парках и книгах заказов — против прежней раскладки
+«машина за машиной» из FuelAutoOrder.plan_trips.
+
+Парк: машины нескольких типовых компоновок секций. Книга заказов:
+станции с одной-тремя строками, объём строки — сумма одной-трёх секций
+из объёмов парка (так его подбирает автозаказ), срочность случайна.
+
+Каждое решение проверяется: секции строки в сумме дают ровно её литры,
+секция занята не больше одного раза и только в своей машине, станций
+в рейсе не больше --max-stations, строка разложена не больше одного
+раза. Нарушение — ошибка.
+
+Запуск: python3 scripts/bench_peco_packing.py [--trucks 12 24 48]
+        [--load 1.3] [--max-stations 3] [--budget 2] [--plateau 16] [--seeds 3]
+
+Те же проверки на малых парках — tests/test_peco.py.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models.peco_packing import pack_fleet
+
+# Типовые компоновки секций бензовозов, литры
+LAYOUTS = [
+    [8000, 8000, 7000],
+    [7000, 6000, 6000, 5000],
+    [6000, 5000, 5000, 4000],
+    [5000, 5000, 5000, 5000, 5000],
+    [9000, 6000, 4000],
+]
+
+
+def synth(trucks: int, load: float, seed: int):
+    """Парк и книга заказов: объём книги ≈ load × суммарный объём секций."""
+    rnd = random.Random(seed)
+    fleet, comps = [], {}
+    cid = 0
+    for t in range(trucks):
+        fleet.append({'id': t + 1, 'depot_id': 1, 'driver_name': None})
+        comps[t + 1] = []
+        for v in rnd.choice(LAYOUTS):
+            cid += 1
+            comps[t + 1].append({'id': cid, 'truck_id': t + 1, 'volume_l': float(v)})
+    capacity = sum(c['volume_l'] for cs in comps.values() for c in cs)
+    vols = sorted({c['volume_l'] for cs in comps.values() for c in cs})
+    items, total, st = [], 0.0, 0
+    while total < capacity * load:
+        st += 1
+        for g in rnd.sample(['A95', 'DT', 'A98', 'LPG'], rnd.randint(1, 3)):
+            liters = sum(rnd.choice(vols) for _ in range(rnd.choice([1, 1, 2, 2, 3])))
+            items.append({'item_id': len(items) + 1, 'order_id': st, 'station_id': st,
+                          'grade_code': g, 'liters_order': liters, 'depot_id': 1,
+                          'days_to_dry': round(rnd.uniform(0.3, 6.0), 2)})
+            total += liters
+    items.sort(key=lambda it: (it['days_to_dry'], -it['liters_order']))
+    return fleet, comps, items
+
+
+def legacy(items, trucks, comps_by_truck, max_stations):
+    """Прежняя раскладка из plan_trips: машина за машиной, секции от крупной."""
+    loads, assigned = [], set()
+    for truck in trucks:
+        free = sorted(comps_by_truck.get(truck['id'], []), key=lambda c: -c['volume_l'])
+        load, stations = [], set()
+        for it in items:
+            if it['item_id'] in assigned or not free:
+                continue
+            if it['station_id'] not in stations and len(stations) >= max_stations:
+                continue
+            taken, rest = [], float(it['liters_order'])
+            for c in list(free):
+                if c['volume_l'] <= rest + 1e-6:
+                    taken.append(c)
+                    free.remove(c)
+                    rest -= c['volume_l']
+                    if rest <= 1e-6:
+                        break
+            if rest > 1e-6:
+                free.extend(taken)
+                free.sort(key=lambda c: -c['volume_l'])
+                continue
+            assigned.add(it['item_id'])
+            stations.add(it['station_id'])
+            load.append((it, taken))
+        if load:
+            loads.append((truck, load))
+    return {'loads': loads, 'assigned': assigned,
+            'liters': sum(it['liters_order'] for _t, ld in loads for it, _c in ld)}
+
+
+def check(name, res, comps_by_truck, max_stations):
+    used, seen = set(), set()
+    for truck, load in res['loads']:
+        own = {c['id'] for c in comps_by_truck[truck['id']]}
+        if len({it['station_id'] for it, _c in load}) > max_stations:
+            raise SystemExit(f'{name}: больше {max_stations} станций в рейсе машины {truck["id"]}')
+        for it, cs in load:
+            if it['item_id'] in seen:
+                raise SystemExit(f'{name}: строка {it["item_id"]} разложена дважды')
+            seen.add(it['item_id'])
+            if abs(sum(c['volume_l'] for c in cs) - it['liters_order']) > 1e-6:
+                raise SystemExit(f'{name}: секции строки {it["item_id"]} не дают её объём')
+            for c in cs:
+                if c['id'] in used or c['id'] not in own:
+                    raise SystemExit(f'{name}: секция {c["id"]} занята дважды или чужая')
+                used.add(c['id'])
+    if seen != set(res['assigned']):
+        raise SystemExit(f'{name}: assigned не совпадает с раскладкой')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Замер раскладки по секциям бензовозов PECO')
+    ap.add_argument('--trucks', type=int, nargs='+', default=[12, 24, 48])
+    ap.add_argument('--load', type=float, default=1.3,
+                    help='объём книги заказов к суммарному объёму секций парка')
+    ap.add_argument('--max-stations', type=int, default=3)
+    ap.add_argument('--budget', type=float, default=2.0, help='бюджет улучшения, с')
+    ap.add_argument('--plateau', type=int, default=None,
+                    help='проходов без улучшения до остановки (0 — весь бюджет)')
+    ap.add_argument('--seeds', type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'машин':>6} {'строк':>6} | {'прежняя: л / строк / рейсов / с':>34} | "
+          f"{'парк: л / строк / рейсов / с':>32} {'разрыв':>7} {'проходов':>8}")
+    for n in args.trucks:
+        for seed in range(args.seeds):
+            fleet, comps, items = synth(n, args.load, seed)
+            t0 = time.perf_counter()
+            old = legacy(items, fleet, comps, args.max_stations)
+            t_old = time.perf_counter() - t0
+            check('прежняя', old, comps, args.max_stations)
+            new = pack_fleet(items, fleet, comps, args.max_stations, args.budget,
+                             **({} if args.plateau is None else {'plateau': args.plateau}))
+            check('парк', new, comps, args.max_stations)
+            if new['liters'] > new['bound'] + 1e-6:
+                raise SystemExit('парк: объём выше верхней границы')
+            print(f"{n:>6} {len(items):>6} | {old['liters']:>10,.0f} {len(old['assigned']):>6} "
+                  f"{len(old['loads']):>6} {t_old:>8.3f}  | {new['liters']:>10,.0f} "
+                  f"{len(new['assigned']):>6} {len(new['loads']):>6} {new['elapsed_sec']:>7.3f} "
+                  f"{new['gap'] * 100:>6.1f}% {new['starts']:>8}".replace(',', ' '))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Воркер очереди фоновых прогонов «Планограмм» (прогноз, генератор данных,
+ИИ-мониторинг) — отдельно от процесса Flask/Socket.IO.
+
+Забирает задания из PLG_JOB_QUEUE по приоритету; сколько прогонов движка
+идёт одновременно во всей системе, задаёт PLG_JOB_LIMITS.MAX_RUNNING,
+поэтому воркеров можно запускать несколько (на разных машинах тоже).
+
+Запуск: python3 scripts/plg_worker.py [--slots N] [--engine forecast --engine datagen ...]
+
+На сервере — юнитом systemd artgranit-plg-worker рядом с app.py (его ставит
+setup-https.sh, full_restart.sh запускает воркер вместе с app.py); в .env веб-процесса
+тогда PLG_QUEUE_EMBEDDED=0, иначе он поднимет ещё и встроенный диспетчер.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config import Config
+from models.run_queue import ENGINES, Dispatcher
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Воркер очереди прогонов PLG')
+    ap.add_argument('--slots', type=int, default=Config.PLG_WORKER_SLOTS,
+                    help='сколько заданий этот процесс выполняет одновременно')
+    ap.add_argument('--engine', action='append', choices=sorted(ENGINES),
+                    help='брать только задания этих движков (по умолчанию — все)')
+    args = ap.parse_args()
+
+    worker = Dispatcher(slots=args.slots, engines=args.engine)
+    # SIGTERM/Ctrl+C: новые задания не берутся, выполняемые отменяются
+    # штатно и закрываются (Dispatcher.shutdown).
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop.set())
+    print(f"[plg-worker] {worker.name}: слотов {worker.slots}, движки {', '.join(worker.engines)}")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+    worker.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -41,6 +41,7 @@ def main():
     with DatabaseModel() as db:
         if args.clean:
             db.execute_query('DELETE FROM PECO_GPS_EVENTS')
+            db.execute_query('DELETE FROM PECO_GPS_TRIP_STATE')
             db.connection.commit()
             db.execute_query('DELETE FROM PECO_GPS_PINGS')
             db.connection.commit()
@@ -109,7 +110,9 @@ def main():
         db.connection.commit()
         print(f"рейс {trip['id']}: пингов {len(pings)}")
 
-    res = PecoGps.analyze(trips[0]['id'])
+    # Демо-трек лежит в прошлом относительно уже разобранных пингов рейса —
+    # разбираем рейс заново, а не от водяного знака
+    res = PecoGps.analyze(trips[0]['id'], rebuild=True)
     print('событий найдено:', res.get('events'), res.get('error', ''))
     with DatabaseModel() as db:
         for r in rows(db.execute_query(
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Сверка итогов смет Colass с полным пересчётом по строкам.
+
+Итоги CLS_ESTIMATES (TOTAL_MANOPERA / MATERIALE / UTILAJE / AMOUNT) и
+CLS_ESTIMATE_SECTIONS.TOTAL_AMOUNT ведутся приращениями при каждой правке
+строки сметы (ColassController._apply_totals_delta). Скрипт сравнивает их
+с GROUP BY по CLS_ESTIMATE_ITEMS (ColassController.verify_estimate_totals)
+и печатает расхождения; --repair пересчитывает такие сметы целиком.
+Код выхода 1, если расхождения есть (без --repair) — для cron.
+
+Запуск: python3 scripts/verify_colass_totals.py [--estimate-id 42] [--repair]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from controllers.colass_controller import ColassController
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Сверка итогов смет Colass с полным пересчётом')
+    ap.add_argument('--estimate-id', type=int, default=None, help='одна смета (по умолчанию — все)')
+    ap.add_argument('--repair', action='store_true', help='пересчитать сметы с расхождениями')
+    args = ap.parse_args()
+
+    out = ColassController.verify_estimate_totals(estimate_id=args.estimate_id, repair=args.repair)
+    if not out.get('success'):
+        raise SystemExit(f"ошибка: {out.get('error')}")
+    mismatches = out.get('mismatches') or []
+    print(f"смет проверено: {out.get('checked')}, расхождений: {len(mismatches)}")
+    for m in mismatches:
+        where = f"смета {m['estimate_id']}" + (f", раздел {m['section_id']}" if m.get('section_id') else '')
+        print(f"  {where}: {m['field']} {m['stored']} ≠ {m['calculated']}")
+    if out.get('repaired'):
+        print(f"пересчитаны: {', '.join(str(x) for x in out['repaired'])}")
+    elif mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -215,9 +215,34 @@ RestartSec=10
 WantedBy=multi-user.target
 EOF
 
+# Воркер очереди прогонов PLG (scripts/plg_worker.py): на REMOTE встроенный
+# диспетчер выключен (PLG_QUEUE_EMBEDDED=0), без этого юнита прогоны прогноза,
+# бэктесты и автозаказ PECO так и остаются в статусе 'queued'.
+# SIGTERM: новые задания не берутся, выполняемые закрываются штатно.
+cat > /etc/systemd/system/artgranit-plg-worker.service << EOF
+[Unit]
+Description=Artgranit PLG run queue worker
+After=network.target artgranit.service
+
+[Service]
+Type=simple
+User=ubuntu
+WorkingDirectory=$PROJECT_PATH
+Environment="PATH=$PROJECT_PATH/venv/bin"
+Environment="ENVIRONMENT=REMOTE"
+ExecStart=$PROJECT_PATH/venv/bin/python3 scripts/plg_worker.py
+KillSignal=SIGTERM
+TimeoutStopSec=60
+Restart=on-failure
+RestartSec=10
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 systemctl daemon-reload
-systemctl enable artgranit
-systemctl restart artgranit
+systemctl enable artgranit artgranit-plg-worker
+systemctl restart artgranit artgranit-plg-worker
 
 sleep 2
 if systemctl is-active --quiet artgranit; then
@@ -225,6 +250,11 @@ if systemctl is-active --quiet artgranit; then
 else
     echo "⚠️ Ошибка при запуске artgranit service, проверьте: sudo systemctl status artgranit"
 fi
+if systemctl is-active --quiet artgranit-plg-worker; then
+    echo "✓ Воркер очереди PLG запущен"
+else
+    echo "⚠️ Воркер очереди PLG не запустился, проверьте: sudo systemctl status artgranit-plg-worker"
+fi
 
 echo ""
 echo "=========================================="
@@ -240,6 +270,7 @@ echo "   (камера будет работать через HTTPS)"
 echo ""
 echo "📋 Логи:"
 echo "   Flask: sudo journalctl -u artgranit -f"
+echo "   Воркер PLG: sudo journalctl -u artgranit-plg-worker -f"
 echo "   Nginx: sudo tail -f /var/log/nginx/error.log"
 echo ""
 echo "🔄 Обновление сертификата:"
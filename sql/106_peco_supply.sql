@@ -321,7 +321,7 @@ CREATE TABLE PECO_ORDER_RUNS (
   DURATION_SEC  NUMBER,
   CONSTRAINT PK_PECO_ORDER_RUNS PRIMARY KEY (ID),
   CONSTRAINT FK_PECO_OR_DE FOREIGN KEY (DEPOT_ID) REFERENCES PECO_DEPOTS (ID),
-  CONSTRAINT CK_PECO_OR_ST CHECK (STATUS IN ('running','done','failed','cancelled'))
+  CONSTRAINT CK_PECO_OR_ST CHECK (STATUS IN ('queued','running','done','failed','cancelled'))
 );
 /
 
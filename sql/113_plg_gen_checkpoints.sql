@@ -0,0 +1,63 @@
+-- ============================================================
+-- Планограммы: контрольные точки генератора тестовых данных
+--
+-- Прогон генератора на большой сети идёт часами, и раньше любой сбой
+-- (обрыв соединения, рестарт веб-процесса, отмена оператором) означал
+-- запуск с нуля. Теперь после каждого завершённого магазина (поставщика,
+-- конкурента, рынка) генератор пишет контрольную точку в PLG_GEN_RUNS
+-- в ТОЙ ЖЕ транзакции, что и данные этого магазина, и прерванный прогон
+-- продолжается с первого незавершённого:
+--
+--   CHECKPOINT_STAGE  этап, на котором остановились
+--   CHECKPOINT_UNIT   сколько единиц этапа уже записано (магазинов и т.п.)
+--   CHECKPOINT_JSON   завершённые этапы и состояние общего random.Random —
+--                     без него продолжение дало бы другие данные, чем
+--                     непрерывный прогон с тем же seed
+--   RESUME_COUNT      сколько раз прогон продолжали
+--
+-- Вызов: POST /api/plg/gen/runs/<id>/resume
+-- Код: models/plg_datagen.py (DataGenerator.resume, _checkpoint)
+-- Префикс объектов: PLG_
+-- ============================================================
+
+DECLARE
+  PROCEDURE add_col(p_col VARCHAR2, p_def VARCHAR2) IS
+    v_n NUMBER;
+  BEGIN
+    SELECT COUNT(*) INTO v_n FROM USER_TAB_COLUMNS
+     WHERE TABLE_NAME = 'PLG_GEN_RUNS' AND COLUMN_NAME = p_col;
+    IF v_n = 0 THEN
+      EXECUTE IMMEDIATE 'ALTER TABLE PLG_GEN_RUNS ADD (' || p_col || ' ' || p_def || ')';
+    END IF;
+  END;
+BEGIN
+  add_col('CHECKPOINT_STAGE', 'VARCHAR2(60)');
+  add_col('CHECKPOINT_UNIT',  'NUMBER DEFAULT 0');
+  add_col('CHECKPOINT_JSON',  'CLOB');
+  add_col('RESUME_COUNT',     'NUMBER DEFAULT 0');
+END;
+/
+
+-- Пересоздание представления: новые колонки нужны админке, чтобы
+-- показать кнопку «Продолжить» только у прерванных прогонов.
+CREATE OR REPLACE VIEW V_PLG_GEN_RUNS AS
+SELECT
+  r.ID, r.DATASET_ID, d.CODE AS DATASET_CODE,
+  d.NAME_RU AS DATASET_RU, d.NAME_RO AS DATASET_RO, d.NAME_EN AS DATASET_EN,
+  r.ALGORITHM,
+  NVL(a.NAME_RU, r.ALGORITHM) AS ALGORITHM_NAME_RU,
+  NVL(a.NAME_RO, r.ALGORITHM) AS ALGORITHM_NAME_RO,
+  NVL(a.NAME_EN, r.ALGORITHM) AS ALGORITHM_NAME_EN,
+  r.PARAMS_JSON, r.STATUS, r.STAGE, r.PROGRESS_PCT, r.ROWS_WRITTEN,
+  r.DURATION_SEC, r.MESSAGE, r.USERNAME, r.STARTED_AT, r.FINISHED_AT,
+  r.CHECKPOINT_STAGE, r.CHECKPOINT_UNIT, r.RESUME_COUNT,
+  CASE WHEN r.STATUS IN ('failed','cancelled') AND r.CHECKPOINT_JSON IS NOT NULL
+       THEN 1 ELSE 0 END AS IS_RESUMABLE
+FROM PLG_GEN_RUNS r
+LEFT JOIN PLG_DATASETS d ON d.ID = r.DATASET_ID
+LEFT JOIN PLG_GEN_ALGORITHMS a ON a.CODE = r.ALGORITHM;
+
+-- Строка интерфейса для кнопки «Продолжить»
+DELETE FROM PLG_I18N WHERE MSG_KEY = 'gen.resume';
+INSERT INTO PLG_I18N (MSG_KEY, SCOPE, TEXT_RU, TEXT_RO, TEXT_EN) VALUES ('gen.resume', 'ui', 'Продолжить', 'Continuă', 'Resume');
+COMMIT;
@@ -0,0 +1,41 @@
+-- ============================================================
+-- Планограммы: векторный индекс поведения SKU (по прогону и магазину)
+--
+-- Раньше выбросы среди соседей считались в базе попарным
+-- AVG(VECTOR_DISTANCE(...)) по каждой категории, а «похожие SKU» на
+-- каждый запрос обходили признаки прогона через FETCH APPROX. Теперь
+-- мониторинг один раз на прогон и магазин строит компактный индекс
+-- (float32-векторы + IVF-разбиение, models/plg_vector_index.py) и кладёт
+-- его сюда одним BLOB'ом; API /api/plg/ai/similar держит его в памяти
+-- процесса и смотрит только ближайшие списки IVF.
+--
+--   DIM / ITEM_COUNT / NLIST  — размерность, число векторов, число списков
+--   PAYLOAD                   — сериализованный индекс (BehaviorIndex.to_bytes)
+--
+-- Колонка EMB в PLG_AI_FEATURES остаётся: её читают выгрузки признаков
+-- и старые прогоны без индекса (контроллер тогда идёт прежним SQL-путём).
+--
+-- Код: models/plg_vector_index.py, models/plg_ai_monitor.py
+-- Префикс объектов: PLG_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'PLG_AI_VECTOR_INDEX';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE PLG_AI_VECTOR_INDEX (
+      RUN_ID      NUMBER     NOT NULL,
+      STORE_ID    NUMBER     NOT NULL,
+      DIM         NUMBER     NOT NULL,
+      ITEM_COUNT  NUMBER     DEFAULT 0,
+      NLIST       NUMBER     DEFAULT 0,
+      PAYLOAD     BLOB,
+      BUILT_AT    TIMESTAMP  DEFAULT SYSTIMESTAMP,
+      CONSTRAINT PK_PLG_AI_VIDX PRIMARY KEY (RUN_ID, STORE_ID),
+      CONSTRAINT FK_PLG_AIV_RUN   FOREIGN KEY (RUN_ID)   REFERENCES PLG_AI_RUNS(ID) ON DELETE CASCADE,
+      CONSTRAINT FK_PLG_AIV_STORE FOREIGN KEY (STORE_ID) REFERENCES PLG_STORES(ID) ON DELETE CASCADE
+    )]';
+  END IF;
+END;
+/
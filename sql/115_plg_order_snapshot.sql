@@ -0,0 +1,112 @@
+-- ============================================================
+-- Планограммы: снимок рекомендуемого заказа по прогону
+--
+-- V_PLG_ORDER_PROPOSAL и V_PLG_ORDER_ADJUSTED сворачивают PLG_FCT_RESULTS
+-- (строка на SKU × день горизонта) и подклеивают корректировки на КАЖДЫЙ
+-- показ экрана автозаказа, печатного пакета и выгрузки. На сети это
+-- десятки тысяч строк результата ради одной страницы в 250 позиций.
+--
+-- PLG_ORDER_SNAPSHOT — тот же свод, материализованный один раз:
+-- строка на «магазин × SKU» прогона с количеством модели, страховым
+-- запасом, покрытием, маршрутом и решением закупщика рядом.
+--
+--   * заполняется в конце прогона прогноза (models/plg_forecast.py,
+--     materialize_order_snapshot); прогоны, сделанные до этой схемы,
+--     материализуются при первом обращении;
+--   * корректировка и её сброс правят строку снимка на месте, журнал
+--     PLG_ORDER_ADJUSTMENTS при этом ведётся как раньше — это обучающий
+--     сигнал, снимок его не заменяет;
+--   * PLG_FCT_RUNS.SNAPSHOT_ROWS — признак «снимок готов» (NULL = нет).
+--
+-- Цена фиксируется на момент прогона: заказ считается по той цене,
+-- по которой его рекомендовали, а не по сегодняшней.
+--
+-- Код: models/plg_forecast.py, controllers/plg_ai_controller.py,
+--      controllers/planogram_controller.py (get_order_proposal)
+-- Префикс объектов: PLG_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'PLG_ORDER_SNAPSHOT';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE PLG_ORDER_SNAPSHOT (
+      RUN_ID          NUMBER        NOT NULL,
+      STORE_ID        NUMBER        NOT NULL,
+      PRODUCT_ID      NUMBER        NOT NULL,
+      SUPPLIER_ID     NUMBER,
+      DATE_FROM       DATE,
+      DATE_TO         DATE,
+      QTY_FORECAST    NUMBER(14,3),
+      QTY_ACTUAL      NUMBER(14,3),
+      SAFETY_STOCK    NUMBER(14,3),
+      STOCK_ON_HAND   NUMBER(14,3),
+      ORDER_QTY       NUMBER(14,3),              -- рекомендация модели
+      COVERAGE_DAYS   NUMBER(6,2),
+      ROUTE           VARCHAR2(10),
+      NEXT_DELIVERY   DATE,
+      WASTE_FORECAST  NUMBER(14,3),
+      PRICE           NUMBER(14,2),
+      ORDER_AMOUNT    NUMBER(16,2),
+      QTY_ADJUSTED    NUMBER(14,3),              -- решение закупщика
+      ADJ_REASON      VARCHAR2(20),
+      ADJ_NOTE        VARCHAR2(600),
+      ADJ_BY          VARCHAR2(150),
+      ADJ_AT          TIMESTAMP,
+      QTY_FINAL       NUMBER(14,3),
+      AMOUNT_FINAL    NUMBER(16,2),
+      IS_ADJUSTED     NUMBER(1)     DEFAULT 0,
+      CONSTRAINT PK_PLG_ORDER_SNAPSHOT PRIMARY KEY (RUN_ID, STORE_ID, PRODUCT_ID),
+      CONSTRAINT FK_PLG_OSN_RUN   FOREIGN KEY (RUN_ID)     REFERENCES PLG_FCT_RUNS(ID) ON DELETE CASCADE,
+      CONSTRAINT FK_PLG_OSN_STORE FOREIGN KEY (STORE_ID)   REFERENCES PLG_STORES(ID) ON DELETE CASCADE,
+      CONSTRAINT FK_PLG_OSN_PROD  FOREIGN KEY (PRODUCT_ID) REFERENCES PLG_PRODUCTS(ID) ON DELETE CASCADE
+    )]';
+  END IF;
+
+  -- Страницы экранов: по сумме модели (прогноз) и «правленые сверху, по сумме» (автозаказ)
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PLG_OSN_AMOUNT';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE INDEX IX_PLG_OSN_AMOUNT ON PLG_ORDER_SNAPSHOT '
+                   || '(RUN_ID, ORDER_AMOUNT DESC)';
+  END IF;
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PLG_OSN_FINAL';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE INDEX IX_PLG_OSN_FINAL ON PLG_ORDER_SNAPSHOT '
+                   || '(RUN_ID, IS_ADJUSTED DESC, AMOUNT_FINAL DESC)';
+  END IF;
+
+  SELECT COUNT(*) INTO v_n FROM USER_TAB_COLUMNS
+   WHERE TABLE_NAME = 'PLG_FCT_RUNS' AND COLUMN_NAME = 'SNAPSHOT_ROWS';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE PLG_FCT_RUNS ADD (SNAPSHOT_ROWS NUMBER)';
+  END IF;
+END;
+/
+
+-- Снимок с названиями: колонки обоих прежних представлений, чтобы экраны
+-- прогноза (V_PLG_ORDER_PROPOSAL) и автозаказа (V_PLG_ORDER_ADJUSTED)
+-- читали его без переделки. Соединения — по первичным ключам страницы.
+CREATE OR REPLACE VIEW V_PLG_ORDER_SNAPSHOT AS
+SELECT
+  o.RUN_ID, o.STORE_ID, s.CODE AS STORE_CODE,
+  s.NAME_RU AS STORE_RU, s.NAME_RO AS STORE_RO, s.NAME_EN AS STORE_EN,
+  s.NAME_RU AS STORE_NAME_RU, s.NAME_RO AS STORE_NAME_RO, s.NAME_EN AS STORE_NAME_EN,
+  o.PRODUCT_ID, p.CODE AS PRODUCT_CODE,
+  p.NAME_RU AS PRODUCT_RU, p.NAME_RO AS PRODUCT_RO, p.NAME_EN AS PRODUCT_EN,
+  p.NAME_RU AS PRODUCT_NAME_RU, p.NAME_RO AS PRODUCT_NAME_RO, p.NAME_EN AS PRODUCT_NAME_EN,
+  p.ABC_CLASS, p.ORDER_MULTIPLE, p.LEAD_TIME_DAYS, p.CURRENCY,
+  c.NAME_RU AS CATEGORY_RU, c.NAME_RO AS CATEGORY_RO, c.NAME_EN AS CATEGORY_EN,
+  c.NAME_RU AS CATEGORY_NAME_RU, c.NAME_RO AS CATEGORY_NAME_RO, c.NAME_EN AS CATEGORY_NAME_EN,
+  o.DATE_FROM, o.DATE_TO, o.QTY_FORECAST, o.QTY_ACTUAL, o.SAFETY_STOCK, o.STOCK_ON_HAND,
+  o.ORDER_QTY, o.ORDER_QTY AS QTY_MODEL, o.PRICE, o.ORDER_AMOUNT,
+  o.COVERAGE_DAYS, o.ROUTE, o.NEXT_DELIVERY, o.WASTE_FORECAST,
+  o.QTY_ADJUSTED, o.ADJ_REASON, o.ADJ_NOTE, o.ADJ_BY, o.ADJ_AT,
+  o.QTY_FINAL, o.AMOUNT_FINAL, o.IS_ADJUSTED,
+  o.SUPPLIER_ID, sup.NAME_RU AS SUPPLIER_NAME_RU,
+  sup.NAME_RO AS SUPPLIER_NAME_RO, sup.NAME_EN AS SUPPLIER_NAME_EN
+FROM PLG_ORDER_SNAPSHOT o
+JOIN PLG_STORES s   ON s.ID = o.STORE_ID
+JOIN PLG_PRODUCTS p ON p.ID = o.PRODUCT_ID
+LEFT JOIN PLG_CATEGORIES c  ON c.ID = p.CATEGORY_ID
+LEFT JOIN PLG_SUPPLIERS sup ON sup.ID = o.SUPPLIER_ID;
@@ -0,0 +1,89 @@
+-- ============================================================
+-- Планограммы: очередь фоновых прогонов (прогноз, генератор, ИИ-мониторинг)
+--
+-- Раньше ForecastEngine / DataGenerator / AiMonitorEngine сразу поднимали
+-- поток в веб-процессе без общего лимита: три оператора, нажавшие «старт»,
+-- получали три тяжёлых прогона, делящих пул из пяти соединений и GIL
+-- с Flask/Socket.IO. Теперь launch() только пишет запись прогона
+-- (STATUS = 'running', STAGE = 'queued') и задание в PLG_JOB_QUEUE,
+-- а выполняют задания отдельные процессы scripts/plg_worker.py.
+--
+--   PLG_JOB_QUEUE   задание: движок, прогон, приоритет, состояние, воркер,
+--                   пульс (HEARTBEAT_AT) и флаг отмены для воркера
+--   PLG_JOB_LIMITS  сколько заданий движка может выполняться одновременно
+--                   во всей системе; строку лимита воркер блокирует
+--                   FOR UPDATE на время выбора задания, поэтому лимит
+--                   соблюдается и при нескольких воркерах
+--
+-- Меньшее значение PRIORITY — раньше; при равенстве — по времени постановки.
+--
+-- Код: models/run_queue.py, scripts/plg_worker.py
+-- Префикс объектов: PLG_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'PLG_JOB_LIMITS';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE PLG_JOB_LIMITS (
+      ENGINE       VARCHAR2(30)  NOT NULL,
+      MAX_RUNNING  NUMBER        DEFAULT 1 NOT NULL,
+      PRIORITY     NUMBER        DEFAULT 100,     -- приоритет по умолчанию для launch()
+      NOTE         VARCHAR2(400),
+      CONSTRAINT PK_PLG_JOB_LIMITS PRIMARY KEY (ENGINE)
+    )]';
+  END IF;
+
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'PLG_JOB_QUEUE';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE PLG_JOB_QUEUE (
+      ID                NUMBER GENERATED BY DEFAULT AS IDENTITY,
+      ENGINE            VARCHAR2(30)   NOT NULL,
+      RUN_ID            NUMBER         NOT NULL,
+      PRIORITY          NUMBER         DEFAULT 100,
+      STATUS            VARCHAR2(20)   DEFAULT 'queued',
+      CANCEL_REQUESTED  NUMBER(1)      DEFAULT 0,
+      ATTEMPTS          NUMBER         DEFAULT 0,
+      WORKER            VARCHAR2(120),
+      PAYLOAD_JSON      CLOB,
+      USERNAME          VARCHAR2(150),
+      ENQUEUED_AT       TIMESTAMP      DEFAULT SYSTIMESTAMP,
+      STARTED_AT        TIMESTAMP,
+      HEARTBEAT_AT      TIMESTAMP,
+      FINISHED_AT       TIMESTAMP,
+      ERROR             VARCHAR2(2000),
+      CONSTRAINT PK_PLG_JOB_QUEUE PRIMARY KEY (ID),
+      CONSTRAINT FK_PLG_JOBQ_ENGINE FOREIGN KEY (ENGINE) REFERENCES PLG_JOB_LIMITS(ENGINE),
+      CONSTRAINT CHK_PLG_JOBQ_STATUS CHECK (STATUS IN ('queued','running','done','failed','cancelled'))
+    )]';
+  END IF;
+
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PLG_JOBQ_PICK';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE INDEX IX_PLG_JOBQ_PICK ON PLG_JOB_QUEUE (STATUS, ENGINE, PRIORITY, ID)';
+  END IF;
+
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PLG_JOBQ_RUN';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE INDEX IX_PLG_JOBQ_RUN ON PLG_JOB_QUEUE (ENGINE, RUN_ID)';
+  END IF;
+END;
+/
+
+-- Лимиты по умолчанию: генератор и прогноз тяжёлые (по одному),
+-- мониторинг легче. Существующие строки не трогаем — их мог поменять админ.
+MERGE INTO PLG_JOB_LIMITS t
+USING (
+  SELECT 'forecast' AS ENGINE, 1 AS MAX_RUNNING, 100 AS PRIORITY, 'Прогноз и бэктест (PLG_FCT_RUNS)' AS NOTE FROM DUAL UNION ALL
+  SELECT 'datagen',  1, 200, 'Генератор тестовых данных (PLG_GEN_RUNS)' FROM DUAL UNION ALL
+  SELECT 'aimonitor', 2, 100, 'ИИ-мониторинг (PLG_AI_RUNS)' FROM DUAL
+) s ON (t.ENGINE = s.ENGINE)
+WHEN NOT MATCHED THEN
+  INSERT (ENGINE, MAX_RUNNING, PRIORITY, NOTE) VALUES (s.ENGINE, s.MAX_RUNNING, s.PRIORITY, s.NOTE);
+COMMIT;
+
+-- Строка интерфейса: место прогона в очереди
+DELETE FROM PLG_I18N WHERE MSG_KEY = 'gen.queued';
+INSERT INTO PLG_I18N (MSG_KEY, SCOPE, TEXT_RU, TEXT_RO, TEXT_EN) VALUES ('gen.queued', 'ui', 'в очереди', 'în coadă', 'queued');
+COMMIT;
@@ -0,0 +1,43 @@
+-- ============================================================
+-- PECO: пакетный идемпотентный приём GPS-телеметрии
+--
+-- Провайдер шлёт тысячи пингов в минуту и при таймауте повторяет пачку
+-- целиком. Раньше каждый пинг был отдельным INSERT, а повтор пачки
+-- удваивал трек. Теперь PecoGps.ingest пишет пачку одним executemany,
+-- а дубль (машина, время пинга) отсекает уникальный индекс: строка
+-- отклоняется как batch error ORA-00001 и считается «уже принятой» —
+-- без проверки существования на каждую строку.
+--
+--   UX_PECO_PINGS_TRUCK_TS  уникальный (TRUCK_ID, TS); заменяет
+--                           неуникальный IX_PECO_PINGS_TRUCK с теми же
+--                           колонками — трек машины читается тем же путём
+--   PECO_PING_SEQ CACHE     ID пинга выдаёт триггер из последовательности;
+--                           NOCACHE на пачке в тысячи строк — лишний
+--                           обход словаря на каждую строку
+--
+-- Устройство провайдера соответствует одной машине (PECO_TRUCKS.GPS_DEVICE_ID),
+-- поэтому ключ (устройство, ts) хранится как (TRUCK_ID, TS).
+--
+-- Код: models/peco_gps.py (PecoGps.ingest), scripts/bench_peco_gps_ingest.py
+-- Префикс объектов: PECO_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'UX_PECO_PINGS_TRUCK_TS';
+  IF v_n = 0 THEN
+    -- Дубли, накопленные до индекса повторными пачками: остаётся первый принятый
+    EXECUTE IMMEDIATE q'[DELETE FROM PECO_GPS_PINGS WHERE ROWID NOT IN
+      (SELECT MIN(ROWID) KEEP (DENSE_RANK FIRST ORDER BY ID)
+         FROM PECO_GPS_PINGS GROUP BY TRUCK_ID, TS)]';
+    SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PECO_PINGS_TRUCK';
+    IF v_n > 0 THEN
+      EXECUTE IMMEDIATE 'DROP INDEX IX_PECO_PINGS_TRUCK';
+    END IF;
+    EXECUTE IMMEDIATE 'CREATE UNIQUE INDEX UX_PECO_PINGS_TRUCK_TS ON PECO_GPS_PINGS (TRUCK_ID, TS)';
+  END IF;
+  EXECUTE IMMEDIATE 'ALTER SEQUENCE PECO_PING_SEQ CACHE 1000';
+END;
+/
+COMMIT;
@@ -0,0 +1,61 @@
+-- ============================================================
+-- PECO: инкрементальный разбор GPS-телеметрии рейсов
+--
+-- Раньше PecoGps.analyze на каждый вызов перечитывал ВСЕ пинги всех
+-- рейсов в статусах loading / en_route / done, их точки маршрута и уже
+-- найденные события. Теперь у рейса есть водяной знак: разбираются
+-- только пинги, принятые после него, а незакрытые эпизоды детекторов
+-- (стоянка, съезд с коридора, открытая пломба) переносятся между вызовами.
+--
+--   WATERMARK_ID  наибольший ID разобранного пинга (порядок приёма)
+--   WATERMARK_TS  время последнего разобранного пинга
+--   STATE_JSON    открытые эпизоды и ключи последней минуты (TripScanner.state)
+--   PINGS_SEEN    сколько пингов рейса разобрано всего
+--
+-- Водяной знак — по ID, а не по TS: пинг, который провайдер дослал с
+-- временем старше уже разобранных, получает новый ID и не теряется.
+-- Детекторы идут по времени, поэтому такой рейс разбирается заново
+-- с первого пинга (уже записанные события не повторяются). Пинги
+-- берутся с запасом INGEST_SETTLE_SEC от приёма: ID выдаётся
+-- при вставке, и пачка с меньшими ID может зафиксироваться позже.
+-- Водяной знак и события рейса пишутся одной транзакцией.
+--
+-- Код: models/peco_gps.py (PecoGps.analyze, TripScanner, CorridorIndex)
+-- Префикс объектов: PECO_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'PECO_GPS_TRIP_STATE';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE PECO_GPS_TRIP_STATE (
+      TRIP_ID       NUMBER     NOT NULL,
+      WATERMARK_ID  NUMBER,
+      WATERMARK_TS  TIMESTAMP,
+      STATE_JSON    CLOB,
+      PINGS_SEEN    NUMBER     DEFAULT 0,
+      UPDATED_AT    TIMESTAMP  DEFAULT SYSTIMESTAMP,
+      CONSTRAINT PK_PECO_GPS_TRIP_STATE PRIMARY KEY (TRIP_ID),
+      CONSTRAINT FK_PECO_GTS_TRIP FOREIGN KEY (TRIP_ID) REFERENCES PECO_TRIPS (ID) ON DELETE CASCADE
+    )]';
+  END IF;
+END;
+/
+
+-- Рейсы, разобранные до водяного знака по ID: WATERMARK_ID пуст, и
+-- первый разбор проходит рейс заново без повторов событий
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TAB_COLUMNS
+   WHERE TABLE_NAME = 'PECO_GPS_TRIP_STATE' AND COLUMN_NAME = 'WATERMARK_ID';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE PECO_GPS_TRIP_STATE ADD (WATERMARK_ID NUMBER)';
+  END IF;
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PECO_PINGS_TRIP_ID';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE INDEX IX_PECO_PINGS_TRIP_ID ON PECO_GPS_PINGS (TRIP_ID, ID)';
+  END IF;
+END;
+/
@@ -0,0 +1,94 @@
+-- ============================================================
+-- PECO: сравнение алгоритмов прогноза — в очереди, по резервуарам
+-- в пуле процессов и с кэшем срезов
+--
+-- Раньше peco_plan.run_backtests считал алгоритм × резервуар × срез
+-- подряд в потоке HTTP-запроса, и полный прогон по 184 резервуарам
+-- с переобучением gbt / conformal на каждом срезе занимал минуты.
+-- Теперь POST /api/plg/fuel/backtest ставит задание 'fuel_backtest'
+-- в PLG_JOB_QUEUE (sql/116), резервуары считаются задачами пула
+-- процессов, а этап и процент видны в PECO_FCT_BT_RUNS.
+--
+--   PECO_FCT_BT_RUNS    прогон сравнения: параметры, этап, процент,
+--                       сколько срезов взято из кэша, лучший алгоритм
+--   PECO_FCT_BT_FOLDS   прогноз суммы за горизонт на срезе: ключ —
+--                       резервуар, алгоритм, хеш параметров (с ревизией
+--                       алгоритма), горизонт, дата среза; HIST_HASH —
+--                       хеш обучающего окна. Совпал — срез не
+--                       пересчитывается
+--   PECO_FCT_BACKTESTS.RUN_ID  из какого прогона строка сравнения
+--
+-- Начало истории и даты срезов привязаны к календарю (models/peco_plan.py,
+-- anchor_history / calendar_cuts): через сутки новых данных обучающие
+-- окна прежних срезов не меняются, считается только новый срез.
+--
+-- Код: models/peco_plan.py (run_backtests, FuelBacktestEngine)
+-- Префикс объектов: PECO_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'PECO_FCT_BT_RUNS';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE PECO_FCT_BT_RUNS (
+      ID            NUMBER GENERATED BY DEFAULT AS IDENTITY,
+      STATUS        VARCHAR2(20)   DEFAULT 'running',   -- running / done / failed / cancelled
+      STAGE         VARCHAR2(60),
+      PROGRESS_PCT  NUMBER         DEFAULT 0,
+      PARAMS_JSON   CLOB,
+      FOLDS_TOTAL   NUMBER,
+      FOLDS_CACHED  NUMBER,
+      BEST_ALGO     VARCHAR2(30),
+      DURATION_SEC  NUMBER,
+      MESSAGE       VARCHAR2(2000),
+      USERNAME      VARCHAR2(150),
+      STARTED_AT    TIMESTAMP      DEFAULT SYSTIMESTAMP,
+      FINISHED_AT   TIMESTAMP,
+      CONSTRAINT PK_PECO_FCT_BT_RUNS PRIMARY KEY (ID),
+      CONSTRAINT CHK_PECO_BTR_STATUS CHECK (STATUS IN ('running','done','failed','cancelled'))
+    )]';
+  END IF;
+
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'PECO_FCT_BT_FOLDS';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE PECO_FCT_BT_FOLDS (
+      TANK_ID      NUMBER         NOT NULL,
+      ALGORITHM    VARCHAR2(30)   NOT NULL,
+      PARAMS_HASH  VARCHAR2(40)   NOT NULL,
+      HORIZON      NUMBER         NOT NULL,
+      CUT_DATE     DATE           NOT NULL,
+      HIST_HASH    VARCHAR2(40)   NOT NULL,
+      PRED_L       NUMBER(16,4),
+      UPDATED_AT   TIMESTAMP      DEFAULT SYSTIMESTAMP,
+      CONSTRAINT PK_PECO_FCT_BT_FOLDS PRIMARY KEY (TANK_ID, ALGORITHM, PARAMS_HASH, HORIZON, CUT_DATE)
+    )]';
+  END IF;
+
+  -- Кэш читается по горизонту и окну дат целиком, одним запросом на прогон
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PECO_BT_FOLDS_H';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE INDEX IX_PECO_BT_FOLDS_H ON PECO_FCT_BT_FOLDS (HORIZON, CUT_DATE)';
+  END IF;
+
+  SELECT COUNT(*) INTO v_n FROM USER_TAB_COLUMNS
+   WHERE TABLE_NAME = 'PECO_FCT_BACKTESTS' AND COLUMN_NAME = 'RUN_ID';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE PECO_FCT_BACKTESTS ADD (RUN_ID NUMBER)';
+  END IF;
+END;
+/
+
+-- Сравнение тяжёлое: одно на систему, пул процессов и так занимает ядра
+MERGE INTO PLG_JOB_LIMITS t
+USING (SELECT 'fuel_backtest' AS ENGINE, 1 AS MAX_RUNNING, 100 AS PRIORITY,
+              'Сравнение алгоритмов прогноза топлива (PECO_FCT_BT_RUNS)' AS NOTE FROM DUAL) s
+ON (t.ENGINE = s.ENGINE)
+WHEN NOT MATCHED THEN
+  INSERT (ENGINE, MAX_RUNNING, PRIORITY, NOTE) VALUES (s.ENGINE, s.MAX_RUNNING, s.PRIORITY, s.NOTE);
+COMMIT;
+
+-- Строка интерфейса: сколько срезов взято из кэша
+DELETE FROM PLG_I18N WHERE MSG_KEY = 'fa.cached';
+INSERT INTO PLG_I18N (MSG_KEY, SCOPE, TEXT_RU, TEXT_RO, TEXT_EN) VALUES ('fa.cached', 'ui', 'срезов из кэша', 'secțiuni din cache', 'folds from cache');
+COMMIT;
@@ -0,0 +1,57 @@
+-- ============================================================
+-- PECO: автозаказ топлива — прогоном очереди, с этапами и пакетной записью
+--
+-- FuelAutoOrder.run был синхронным: при нескольких сотнях резервуаров
+-- с прогнозом бустингом HTTP-запрос не доживал до ответа. Теперь
+-- POST /api/plg/fuel/autoorder ставит задание 'fuel_autoorder'
+-- в PLG_JOB_QUEUE (sql/116) и сразу отдаёт run_id; резервуары
+-- прогнозируются пачками в пуле процессов, а этап (load / history /
+-- forecast i/N / write / sourcing / finished) и процент пишутся
+-- в PECO_ORDER_RUNS.STAGE / PROGRESS_PCT — их видно опросом
+-- GET /api/plg/fuel/autoorder/runs/<id> и через Socket.IO. Прогон в
+-- очереди стоит со STATUS = 'queued', воркер переводит его в 'running'.
+--
+-- Заказы и строки пишутся пачками: шапки одним executemany, их ID —
+-- одним запросом по RUN_ID, строки — вторым executemany.
+--
+--   IX_PECO_FO_RUN     заказы прогона по RUN_ID (и для выборки ID после
+--                      пакетной вставки, и для плана снабжения)
+--   PECO_FITEM_SEQ     ID строки выдаёт триггер; NOCACHE на пачке в
+--                      сотни строк — обход словаря на каждую строку
+--
+-- Код: models/peco_autoorder.py (FuelAutoOrder, FuelAutoOrderEngine)
+-- Префикс объектов: PECO_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = 'IX_PECO_FO_RUN';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE INDEX IX_PECO_FO_RUN ON PECO_FUEL_ORDERS (RUN_ID, STATION_ID)';
+  END IF;
+  EXECUTE IMMEDIATE 'ALTER SEQUENCE PECO_FITEM_SEQ CACHE 100';
+  -- Статус 'queued' — прогон ждёт воркера
+  SELECT COUNT(*) INTO v_n FROM USER_CONSTRAINTS WHERE CONSTRAINT_NAME = 'CK_PECO_OR_ST';
+  IF v_n > 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE PECO_ORDER_RUNS DROP CONSTRAINT CK_PECO_OR_ST';
+  END IF;
+  EXECUTE IMMEDIATE 'ALTER TABLE PECO_ORDER_RUNS ADD CONSTRAINT CK_PECO_OR_ST '
+    || 'CHECK (STATUS IN (''queued'',''running'',''done'',''failed'',''cancelled''))';
+END;
+/
+
+-- Автозаказ лёгкий относительно сравнения алгоритмов, но два прогона
+-- сразу дали бы два набора черновиков на одну сеть — по одному
+MERGE INTO PLG_JOB_LIMITS t
+USING (SELECT 'fuel_autoorder' AS ENGINE, 1 AS MAX_RUNNING, 50 AS PRIORITY,
+              'Автозаказ топлива (PECO_ORDER_RUNS)' AS NOTE FROM DUAL) s
+ON (t.ENGINE = s.ENGINE)
+WHEN NOT MATCHED THEN
+  INSERT (ENGINE, MAX_RUNNING, PRIORITY, NOTE) VALUES (s.ENGINE, s.MAX_RUNNING, s.PRIORITY, s.NOTE);
+COMMIT;
+
+-- Строка интерфейса: прогон автозаказа поставлен
+DELETE FROM PLG_I18N WHERE MSG_KEY = 'fu.started';
+INSERT INTO PLG_I18N (MSG_KEY, SCOPE, TEXT_RU, TEXT_RO, TEXT_EN) VALUES ('fu.started', 'ui', 'Расчёт заказа запущен', 'Calculul comenzii a pornit', 'Order calculation started');
+COMMIT;
@@ -0,0 +1,44 @@
+-- ============================================================
+-- DECOR: версия строки для построчной записи
+--
+-- Раньше каждая операция DecorLocalStore (смена статуса заказа, правка
+-- материала, настройки) сохраняла state через _replace_state: DELETE
+-- всех таблиц DECOR_* и повторная вставка всех строк, включая всю
+-- историю заказов. Теперь decor_oracle_store.save_changes пишет только
+-- затронутые строки, а UPDATE / DELETE проверяют ROW_VERSION, прочитанную
+-- при загрузке: если строку успел изменить другой процесс, транзакция
+-- откатывается, операция перечитывает state и применяется заново.
+--
+--   ROW_VERSION  DECOR_MATERIALS, DECOR_SETTINGS, DECOR_ORDERS,
+--                DECOR_SLIDING_MATERIALS, DECOR_SLIDING_SETTINGS;
+--                +1 на каждое изменение строки
+--
+-- Счётчики DECOR_COUNTERS версию не получают: их UPDATE сверяет прежнее
+-- значение. Дочерние строки заказа (inputs / metrics / summary / items)
+-- и настроек пишутся только вместе с шапкой, под её версией.
+--
+-- Код: models/decor_oracle_store.py (save_changes), decor_local_store.py
+-- Префикс объектов: DECOR_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+  TYPE t_names IS TABLE OF VARCHAR2(30);
+  v_tables t_names := t_names('DECOR_MATERIALS', 'DECOR_SETTINGS', 'DECOR_ORDERS',
+                              'DECOR_SLIDING_MATERIALS', 'DECOR_SLIDING_SETTINGS');
+BEGIN
+  FOR i IN 1 .. v_tables.COUNT LOOP
+    -- Таблицу могла ещё не создать ensure_schema: тогда колонку добавит она
+    SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = v_tables(i);
+    IF v_n > 0 THEN
+      SELECT COUNT(*) INTO v_n FROM USER_TAB_COLUMNS
+       WHERE TABLE_NAME = v_tables(i) AND COLUMN_NAME = 'ROW_VERSION';
+    ELSE
+      v_n := 1;
+    END IF;
+    IF v_n = 0 THEN
+      EXECUTE IMMEDIATE 'ALTER TABLE ' || v_tables(i) || ' ADD (ROW_VERSION NUMBER DEFAULT 1 NOT NULL)';
+    END IF;
+  END LOOP;
+END;
+/
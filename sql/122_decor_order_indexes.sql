@@ -0,0 +1,47 @@
+-- ============================================================
+-- DECOR: индексы выборок заказов
+--
+-- Раньше DecorLocalStore держал заказы в state: get_orders фильтровал
+-- весь список подстроками в Python, а report_by_day брал его целиком
+-- (и видел только последние 1000 заказов). Теперь state в кэше процесса
+-- без заказов, а заказы читаются запросами decor_oracle_store:
+--
+--   query_orders          фильтр, сортировка ID DESC и FETCH FIRST в Oracle,
+--                         расчёт и строки — только для отобранных заказов
+--   report_orders_by_day  GROUP BY по дню создания, без выборки заказов
+--
+--   IX_DECOR_ORD_STATUS   фильтр по статусу, уже в порядке ID
+--   IX_DECOR_ORD_DAY      день создания (SUBSTR(CREATED_AT, 1, 10)) —
+--                         фильтр дат и группировка отчёта
+--   IX_DECOR_ORD_SEARCH   поиск подстроки: номер, штрихкод, клиент, телефон
+--                         и проект в нижнем регистре и ID — фильтр считается
+--                         по узкому индексу, без чтения таблицы; ведущий
+--                         столбец обслуживает точный поиск по номеру
+--   IX_DECOR_ORD_BARCODE  точный поиск по штрихкоду
+--
+-- Те же индексы создаёт ensure_schema при первом обращении.
+-- Код: models/decor_oracle_store.py (query_orders, report_orders_by_day),
+--      decor_local_store.py
+-- Префикс объектов: DECOR_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+  PROCEDURE make(p_name VARCHAR2, p_ddl VARCHAR2) IS
+  BEGIN
+    SELECT COUNT(*) INTO v_n FROM USER_INDEXES WHERE INDEX_NAME = p_name;
+    IF v_n = 0 THEN
+      EXECUTE IMMEDIATE p_ddl;
+    END IF;
+  END;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'DECOR_ORDERS';
+  IF v_n > 0 THEN
+    make('IX_DECOR_ORD_STATUS', 'CREATE INDEX IX_DECOR_ORD_STATUS ON DECOR_ORDERS (STATUS_ID, ID)');
+    make('IX_DECOR_ORD_DAY', 'CREATE INDEX IX_DECOR_ORD_DAY ON DECOR_ORDERS (SUBSTR(CREATED_AT, 1, 10), ID)');
+    make('IX_DECOR_ORD_SEARCH', 'CREATE INDEX IX_DECOR_ORD_SEARCH ON DECOR_ORDERS ('
+      || 'LOWER(ORDER_NUMBER), LOWER(BARCODE), LOWER(CLIENT_NAME), LOWER(CLIENT_PHONE), LOWER(PROJECT_NAME), ID)');
+    make('IX_DECOR_ORD_BARCODE', 'CREATE INDEX IX_DECOR_ORD_BARCODE ON DECOR_ORDERS (LOWER(BARCODE))');
+  END IF;
+END;
+/
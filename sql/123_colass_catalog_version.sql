@@ -0,0 +1,61 @@
+-- ============================================================
+-- Colass: версия каталога работ и ресурсов
+--
+-- Раньше ColassController.ai_parse_estimate_local на каждый разбор сметы
+-- читал CLS_WORK_CATALOG и CLS_RESOURCES целиком и нормализовал каждую
+-- строку. Теперь разобранный каталог (models/colass_catalog.py) живёт в
+-- процессе, а перечитывается, только когда сменилась версия каталога:
+--
+--   CLS_CATALOG_VERSION  одна строка NAME = 'catalog': VERSION +1 на
+--                        каждую команду INSERT / UPDATE / DELETE по
+--                        CLS_WORK_CATALOG и CLS_RESOURCES (и при импорте)
+--   CLS_WORK_CATALOG_AV, триггеры уровня команды, не строки: импорт
+--   CLS_RESOURCES_AV     на тысячи строк двигает версию один раз
+--
+-- Процесс сверяет версию не чаще раза в 5 секунд. Пока этого скрипта
+-- не запускали, каталог в процессе просто перечитывается раз в 10 минут.
+--
+-- Код: models/colass_catalog.py, controllers/colass_controller.py
+-- Префикс объектов: CLS_
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'CLS_CATALOG_VERSION';
+  IF v_n = 0 THEN
+    EXECUTE IMMEDIATE q'[CREATE TABLE CLS_CATALOG_VERSION (
+      NAME        VARCHAR2(30)  NOT NULL,
+      VERSION     NUMBER        DEFAULT 1 NOT NULL,
+      UPDATED_AT  TIMESTAMP     DEFAULT SYSTIMESTAMP,
+      CONSTRAINT PK_CLS_CATALOG_VERSION PRIMARY KEY (NAME)
+    )]';
+  END IF;
+END;
+/
+
+MERGE INTO CLS_CATALOG_VERSION t
+USING (SELECT 'catalog' AS NAME FROM DUAL) s ON (t.NAME = s.NAME)
+WHEN NOT MATCHED THEN
+  INSERT (NAME, VERSION) VALUES (s.NAME, 1);
+COMMIT;
+
+DECLARE
+  v_n NUMBER;
+  TYPE t_names IS TABLE OF VARCHAR2(30);
+  v_tables t_names := t_names('CLS_WORK_CATALOG', 'CLS_RESOURCES');
+BEGIN
+  FOR i IN 1 .. v_tables.COUNT LOOP
+    SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = v_tables(i);
+    IF v_n > 0 THEN
+      EXECUTE IMMEDIATE 'CREATE OR REPLACE TRIGGER ' || v_tables(i) || '_AV'
+        || ' AFTER INSERT OR UPDATE OR DELETE ON ' || v_tables(i)
+        || q'[ BEGIN
+  UPDATE CLS_CATALOG_VERSION
+     SET VERSION = VERSION + 1, UPDATED_AT = SYSTIMESTAMP
+   WHERE NAME = 'catalog';
+END;]';
+    END IF;
+  END LOOP;
+END;
+/
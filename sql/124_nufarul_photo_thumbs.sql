@@ -0,0 +1,35 @@
+-- ============================================================
+-- Nufarul: миниатюры и SHA-256 фото заказов
+--
+-- NufarulController.save_photo пишет BLOB кусками (INSERT ... EMPTY_BLOB()
+-- RETURNING ID, PHOTO_BLOB) и рядом кладёт:
+--
+--   PHOTO_SHA256  хэш содержимого — ETag и ключ кеша на диске
+--                 (models/nufarul_photos.py, NUF_PHOTO_CACHE_DIR)
+--   THUMB_BLOB    миниатюра JPEG 320 px для списков
+--
+-- Фото, сохранённые раньше, получают оба поля при первой выдаче
+-- (NufarulController.backfill_photo).
+--
+-- Таблица NUF_ORDER_PHOTOS — из 19_nufarul_photos.sql (ставится вручную);
+-- пока её нет, скрипт ничего не делает.
+-- ============================================================
+
+DECLARE
+  v_n NUMBER;
+  PROCEDURE add_col(p_col VARCHAR2, p_def VARCHAR2) IS
+  BEGIN
+    SELECT COUNT(*) INTO v_n FROM USER_TAB_COLUMNS
+     WHERE TABLE_NAME = 'NUF_ORDER_PHOTOS' AND COLUMN_NAME = p_col;
+    IF v_n = 0 THEN
+      EXECUTE IMMEDIATE 'ALTER TABLE NUF_ORDER_PHOTOS ADD (' || p_col || ' ' || p_def || ')';
+    END IF;
+  END;
+BEGIN
+  SELECT COUNT(*) INTO v_n FROM USER_TABLES WHERE TABLE_NAME = 'NUF_ORDER_PHOTOS';
+  IF v_n > 0 THEN
+    add_col('PHOTO_SHA256', 'VARCHAR2(64)');
+    add_col('THUMB_BLOB', 'BLOB');
+  END IF;
+END;
+/
@@ -0,0 +1,58 @@
+-- =====================================================================
+-- Biro26: calculul de stoc pe diferente (snapshot-diff).
+-- RO: Pina acum fiecare calcul (UN$SOLD.GET_SOLDT) copia TOT soldul in
+--     YBIRO_STOCK_CALC_ITEM sub un calc_id nou — tabelul crestea cu tot
+--     catalogul la fiecare rulare. Acum:
+--       * YBIRO_STOCK_CUR tine soldul CURENT (un rind per sc+dep) — din el
+--         citesc grila si magazinul (inainte: ITEM al calculului is_latest);
+--       * un calcul DELTA scrie in ITEM doar rindurile schimbate fata de
+--         CUR (is_del='1' = rind disparut din sold) si le aplica pe CUR;
+--       * un calcul FULL scrie tot, ca inainte, si rescrie CUR;
+--       * calculele vechi se sterg dupa retentie (Biro26Store.compact_stock_calcs).
+-- EN: snapshot-diff stock calculation: YBIRO_STOCK_CUR holds the current
+--     balance read by the grid; a DELTA run stores only changed rows
+--     (is_del='1' tombstones) and applies them to CUR; old runs are
+--     compacted by a retention policy.
+-- RO/EN comments only (project rule). Target: officeplus (Oracle 11g).
+-- Rerunnable. Run: ./venv/bin/python deploy_biro26_stock_tables.py
+-- =====================================================================
+
+DECLARE
+  n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO n FROM USER_TAB_COLUMNS
+   WHERE TABLE_NAME = 'YBIRO_STOCK_CALC' AND COLUMN_NAME = 'CALC_MODE';
+  IF n = 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE YBIRO_STOCK_CALC ADD ('
+      || 'calc_mode VARCHAR2(10) DEFAULT ''FULL'', '   -- FULL / DELTA
+      || 'changed_count NUMBER)';                       -- RO: rinduri scrise in ITEM / EN: rows written
+  END IF;
+  SELECT COUNT(*) INTO n FROM USER_TAB_COLUMNS
+   WHERE TABLE_NAME = 'YBIRO_STOCK_CALC_ITEM' AND COLUMN_NAME = 'IS_DEL';
+  IF n = 0 THEN
+    EXECUTE IMMEDIATE 'ALTER TABLE YBIRO_STOCK_CALC_ITEM ADD (is_del VARCHAR2(1) DEFAULT ''0'')';
+  END IF;
+END;
+/
+
+DECLARE
+  n NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO n FROM USER_TABLES WHERE TABLE_NAME = 'YBIRO_STOCK_CUR';
+  IF n = 0 THEN
+    EXECUTE IMMEDIATE 'CREATE TABLE YBIRO_STOCK_CUR ('
+      || 'sc NUMBER NOT NULL, '          -- RO: cod marfa / EN: item code
+      || 'dep NUMBER NOT NULL, '         -- RO: departament (NVL(dep,0)) / EN: department
+      || 'cant NUMBER, '
+      || 'cant1 NUMBER, '
+      || 'calc_id NUMBER, '              -- RO: calculul care a scris rindul / EN: run that wrote it
+      || 'CONSTRAINT pk_ybiro_stock_cur PRIMARY KEY (sc, dep))';
+    -- RO: soldul curent = rindurile ultimului calcul (cum citeau pina acum)
+    -- EN: seed with the latest run's rows (what the readers used so far)
+    EXECUTE IMMEDIATE 'INSERT INTO YBIRO_STOCK_CUR(sc, dep, cant, cant1, calc_id) '
+      || 'SELECT sc, NVL(dep,0), cant, cant1, calc_id FROM YBIRO_STOCK_CALC_ITEM '
+      || 'WHERE calc_id = (SELECT MAX(id) FROM YBIRO_STOCK_CALC WHERE is_latest = ''1'')';
+    COMMIT;
+  END IF;
+END;
+/
@@ -304,6 +304,11 @@ function cardBuy(cod) {
   }
   addToCart(realCod, name, pprice(p));
 }
+// RO: cardurile cer varianta micsorata a imaginilor trecute prin proxy
+// EN: cards ask the proxy for the downsized variant
+function thumbSrc(u) {
+  return (u && u.indexOf('/api/biro26/img?') === 0) ? u + '&w=320' : u;
+}
 function cardHtml(p) {
   PMAP[p.cod] = p;
   const price = pprice(p);
@@ -324,7 +329,7 @@ function cardHtml(p) {
       '" type="button" aria-label="Favorite" onclick="favToggle(this,' + p.cod + ')">' +
       (favHas(p.cod) ? '❤' : '♡') + '</button>' +
     (p.image
-      ? '<div class="product-img live" style="background-image:url(\'' + esc(p.image) +
+      ? '<div class="product-img live" style="background-image:url(\'' + esc(thumbSrc(p.image)) +
         '\')" onclick="openProd(' + p.cod + ')"></div>'
       : '<div class="product-img p-markers" onclick="openProd(' + p.cod + ')"></div>') +
     '<span class="stock ' + (inStock ? 'in' : 'order') + '">' +
@@ -414,6 +414,48 @@ def test_calc_stock_no_gtt_index_step():
     assert "CREATE INDEX" not in joined.upper()
 
 
+def test_calc_stock_delta_stores_only_changed_rows():
+    fake = _stock_header_fake()
+    with patch("models.biro26_oracle_store.Biro26DB", return_value=fake):
+        r = Biro26Store.calc_stock(data_doc="2026-07-01")
+    sqls = [s["sql"] for s in fake.last_script]
+    joined = " ".join(sqls)
+    assert r["success"] and "compacted" in r
+    assert "FULL OUTER JOIN YBIRO_STOCK_CUR" in joined and "is_del" in joined
+    assert "DECODE(n.CANT, o.cant, 0, 1) = 1" in joined          # NULL-safe comparison
+    assert "MERGE INTO YBIRO_STOCK_CUR" in joined and "DELETE FROM YBIRO_STOCK_CUR c" in joined
+    assert any(s["params"].get("p_mode") == "DELTA" for s in fake.last_script)
+    # is_latest is only cleared once GET_SOLDT (implicit DDL commit) has run
+    soldt = next(i for i, q in enumerate(sqls) if "GET_SOLDT" in q)
+    assert next(i for i, q in enumerate(sqls) if "SET is_latest='0'" in q) > soldt
+    assert "DELETE FROM YBIRO_STOCK_CALC WHERE id IN" in sqls[-1]   # retention, same tx
+
+
+def test_calc_stock_full_mode_rewrites_current_balance():
+    fake = _stock_header_fake()
+    with patch("models.biro26_oracle_store.Biro26DB", return_value=fake):
+        Biro26Store.calc_stock(data_doc="2026-07-01", mode="full")
+    joined = " ".join(s["sql"] for s in fake.last_script)
+    assert "FULL OUTER JOIN" not in joined and "DELETE FROM YBIRO_STOCK_CUR" in joined
+    assert any(s["params"].get("p_mode") == "FULL" for s in fake.last_script)
+
+
+def test_compact_stock_calcs_keeps_latest_and_recent_runs():
+    class _DB(_FakeStockCalcDB):
+        def execute_script(self, statements):
+            self.last_script = statements
+            return {"success": True, "message": "",
+                    "results": [{"rowcount": 150000}, {"rowcount": 3}]}
+    fake = _DB([], [])
+    with patch("models.biro26_oracle_store.Biro26DB", return_value=fake):
+        r = Biro26Store.compact_stock_calcs(keep_days=7, keep_calcs=2)
+    assert r["data"] == {"items": 150000, "calcs": 3}
+    q = fake.last_script[0]
+    assert "is_latest = '0'" in q["sql"] and "rn > :keep" in q["sql"]
+    assert q["params"] == {"keep": 2, "days": 7}
+    assert "YBIRO_STOCK_CALC_ITEM" in fake.last_script[0]["sql"]    # items before headers (FK)
+
+
 def test_get_latest_stock_calc_ok():
     cols = ["ID","DATA_DOC","DEP_FILTER","CONT_FILTER","PFILT","ROW_COUNT","STATUS","ERR_TEXT","RUN_AT"]
     rows = [(1,"01.07.2026",None,"217 2165 2114","ACDE12",0,"OK",None,"01.07.2026 16:53")]
@@ -432,7 +474,7 @@ def test_get_products_stock_joins_stock_and_image():
     with patch("models.biro26_oracle_store.Biro26DB", return_value=fake):
         r = Biro26Store.get_products_stock(limit=10)
     assert r["success"] and r["data"][0]["real_cant"] is None
-    assert "TIP='P'" in fake.last_sql and "YBIRO_STOCK_CALC_ITEM" in fake.last_sql
+    assert "TIP='P'" in fake.last_sql and "YBIRO_STOCK_CUR" in fake.last_sql
     assert "ROWNUM" in fake.last_sql and "FETCH" not in fake.last_sql.upper()
 
 
@@ -596,3 +638,416 @@ def test_move_tree_categorie_sql():
         r = Biro26Store.move_tree_categorie("G1", "C1", "G2")
     assert r["success"] and "SET GRUPA = :ng" in fake.last_sql
     assert "WHERE GRUPA = :g AND CATEGORIE = :c" in fake.last_sql
+
+
+# ── catalog replica (public shop) ───────────────────────────────────
+
+from models import biro26_catalog
+from models.biro26_catalog import Biro26Catalog
+
+
+def _cat_product(cod, den, brand=None, retail=None, angro=None, grupa="Birou",
+                 categorie="Pixuri", codvechi=None, namerus=None, isarhiv=None, matgr1=0):
+    # CORE_COLS order
+    return [cod, codvechi, den, namerus, "buc.", "P", None, isarhiv, grupa, categorie,
+            brand, None, "http://x/%d.jpg" % cod, matgr1, angro, None, retail]
+
+
+_CAT_PRODUCTS = [
+    _cat_product(3, "Caiet A4", brand="Herlitz", retail=25.5, codvechi="CV-3"),
+    _cat_product(1, "Pix albastru", brand="BIC", retail=10, angro=8, namerus="Ручка"),
+    _cat_product(2, "Pix rosu", brand="BIC", retail=None, grupa="Scoala", categorie=None),
+    _cat_product(4, "Pix vechi", brand="BIC", retail=3, isarhiv="2"),
+    _cat_product(5, None, retail=7),
+]
+
+
+class _FakeCatalogDB:
+    """Answers the replica's full load, change scan and page extras."""
+    def __init__(self, products=None, prices=None, changes=None, counts=None):
+        self.products = products if products is not None else _CAT_PRODUCTS
+        self.prices = prices if prices is not None else [
+            [1, "2026-01-01 00:00:00", "2026-12-31 00:00:00", 12, 9, None]]
+        self.changes = changes or []
+        self.counts = counts
+        self.queries = []
+
+    def execute_script(self, statements):
+        core = {"columns": [c.upper() for c in biro26_catalog.CORE_COLS],
+                "data": [p for p in self.products if p[0] in self._cods(statements)]}
+        if statements[0]["sql"].startswith("SET TRANSACTION"):
+            meta = {"columns": ["CS", "NSORT", "U", "G", "M", "B", "W", "P"],
+                    "data": [["CL8MSWIN1251", "BINARY", 100, 100, 100, 100, 100, 100]]}
+            head = [{"rowcount": 0}, meta]
+        else:
+            head = []
+        cods = self._cods(statements)
+        return {"success": True, "message": "", "results": head + [
+            core,
+            {"columns": ["COD", "BARCODE"], "data": [[3, "4840000000022"]] if 3 in cods else []},
+            {"columns": ["COD", "DENUMIRE_FULL_RO", "DENUMIRE_FULL_RU", "DESCRIERE_NON_DIACR_RO"],
+             "data": [[1, "Pix albastru cu capac", None, "cerneala gel 0.5"]] if 1 in cods else []},
+            {"columns": ["SC", "DS", "DE", "PRETV", "PRETV1", "PRETV2"],
+             "data": [p for p in self.prices if p[0] in cods]}]}
+
+    def _cods(self, statements):
+        import re
+        sql = statements[-4]["sql"]
+        m = re.search(r"u\.COD IN \(([\d,]+)\)", sql)
+        return {int(c) for c in m.group(1).split(",")} if m else {p[0] for p in self.products}
+
+    def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        if "YBIRO_GRP_I18N" in sql:
+            return {"success": True, "columns": ["KIND", "NAME_RO", "NAME_RU", "NAME_EN"],
+                    "data": [["grupa", "Birou", "Офис", "Office"]]}
+        if "UNION ALL" in sql:
+            return {"success": True, "columns": ["T", "COD", "SCN"],
+                    "data": self.changes + [["C" + k, None, v] for k, v in self.counts.items()]}
+        cols = ["COD", "IE_LINKADRES", "REAL_CANT", "RESERVED", "AVAIL_CANT", "BARCODE",
+                "BC_CNT", "VARIANT", "MASTER_COD", "VAR_CNT", "DENUM_FULL", "DENUM_FULL_RU"]
+        return {"success": True, "columns": cols,
+                "data": [[c, "https://cdn/1.jpg" if c == 1 else None, 5, 0, 5, None, 0,
+                          None, None, 1, None, None] for c in (1, 2, 3, 4, 5)]}
+
+
+def _load_catalog(fake):
+    Biro26Catalog._replica = None
+    with patch("models.biro26_catalog.Biro26DB", return_value=fake):
+        Biro26Catalog.refresh(full=True)
+    return Biro26Catalog._replica
+
+
+def test_catalog_full_load_serves_live_shaped_rows_in_name_order():
+    fake = _FakeCatalogDB()
+    _load_catalog(fake)
+    with patch("models.biro26_catalog.Biro26DB", return_value=fake):
+        r = Biro26Catalog.products_stock(price_date="2026-10-19", with_count=True, limit=2)
+    assert r["success"] and r["total"] == 4                    # archived card hidden
+    assert [d["cod"] for d in r["data"]] == [3, 1]             # Caiet < Pix (BINARY)
+    row = r["data"][1]
+    assert list(row)[:15] == ["cod", "codvechi", "denumirea", "namerus", "um", "tip",
+                              "grupa", "categorie", "brand", "matgr1", "angro", "ionline",
+                              "retail1", "angro_fara_tva", "image"]
+    assert row["retail1"] == 12 and row["angro"] == 9 and row["angro_fara_tva"] == 7.5
+    assert row["image"] == "https://cdn/1.jpg" and row["avail_cant"] == 5
+    assert "COD IN (1,3)" in fake.queries[-1]                  # stock joins: page codes only
+    Biro26Catalog._replica = None
+
+
+def test_catalog_price_as_of_date_and_price_sort_nulls_last():
+    r = _load_catalog(_FakeCatalogDB())
+    ent = r.query(price_date="2025-06-01", sort="price_asc")["entries"]
+    assert [e[0] for e in ent] == [5, 1, 3, 2]                 # 7 < 10 (feed) < 25.5 < NULL
+    ent = r.query(price_date="2026-10-19", sort="price_desc")["entries"]
+    assert [e[0] for e in ent] == [3, 1, 5, 2]                 # price list 12 applies
+    ent = r.query(price_date="2026-10-19", sort="name_desc")["entries"]
+    assert [e[0] for e in ent] == [5, 2, 1, 3]                 # NULL name first on DESC
+    Biro26Catalog._replica = None
+
+
+def test_catalog_search_matches_live_like_semantics():
+    r = _load_catalog(_FakeCatalogDB())
+    cods = lambda q: sorted(e[0] for e in r.query(search=q, price_date="2026-10-19")["entries"])
+    assert cods("pix") == [1, 2]                               # UPPER(DENUMIREA) LIKE
+    assert cods("ручка") == [1]                                # NAMERUS
+    assert cods("capac") == [1]                                # DENUMIRE_FULL_RO
+    assert cods("GEL 0.5") == [1]                              # description INSTR
+    assert cods("48400000") == [3] and cods("cv-3") == [] and cods("CV-3") == [3]
+    assert cods("P_x r%") == [2]                               # LIKE wildcards
+    assert cods("x%cap") == [1] and cods("albastru%capac") == [1]
+    assert cods("a4" + "%" + "pix") == []                      # never spans two products
+    Biro26Catalog._replica = None
+
+
+def test_catalog_facets_brands_and_tree():
+    r = _load_catalog(_FakeCatalogDB())
+    f = r.query(price_date="2026-10-19", brand="BIC", facets=True)["facets"]
+    assert f["brand"] == [{"brand": "BIC", "cnt": 2}]
+    assert f["price"] == [{"from": 0, "to": 50, "cnt": 1}]
+    assert Biro26Catalog.product_brands()["data"] == [{"brand": "BIC", "cnt": 2},
+                                                      {"brand": "Herlitz", "cnt": 1}]
+    tree = Biro26Catalog.product_tree()["data"]
+    assert [(t["grupa"], t["categorie"], t["cnt"]) for t in tree] == [
+        ("Birou", "Pixuri", 3), ("Scoala", None, 1)]
+    assert tree[0]["grupa_ru"] == "Офис" and tree[1]["grupa_ru"] is None
+    Biro26Catalog._replica = None
+
+
+def test_catalog_falls_back_to_live_query():
+    Biro26Catalog._replica = None
+    with patch("models.biro26_catalog.Biro26Store.get_products_stock",
+               return_value={"success": True, "data": []}) as live:
+        Biro26Catalog.products_stock(search="pix")
+    assert live.called
+    _load_catalog(_FakeCatalogDB())
+    with patch("models.biro26_catalog.Biro26Store.get_products_stock",
+               return_value={"success": True, "data": []}) as live:
+        Biro26Catalog.products_stock(price_date="2001-01-01")   # older than the local price history
+    assert live.called
+    Biro26Catalog._replica = None
+
+
+def test_catalog_not_served_when_oracle_order_differs():
+    fake = _FakeCatalogDB(products=list(reversed(_CAT_PRODUCTS)))
+    Biro26Catalog._replica = None
+    with patch("models.biro26_catalog.Biro26DB", return_value=fake):
+        try:
+            Biro26Catalog.refresh(full=True)
+        except RuntimeError:
+            pass
+    assert Biro26Catalog._replica is None
+
+
+def test_catalog_incremental_refresh_and_count_mismatch():
+    _load_catalog(_FakeCatalogDB())
+    Biro26Catalog._next_full = float("inf")
+    renamed = [list(p) for p in _CAT_PRODUCTS]
+    renamed[0][2] = "Zmeu"
+    counts = {"U": 5, "B": 1, "W": 1, "P": 1}
+    fake = _FakeCatalogDB(products=renamed, changes=[["U", 3, 150]], counts=counts)
+    with patch("models.biro26_catalog.Biro26DB", return_value=fake):
+        out = Biro26Catalog.refresh()
+    assert out["mode"] == "incremental" and out["changed"] == 1
+    r = Biro26Catalog._replica
+    assert r.products[3][2] == "Zmeu" and r.order[-2] == 3 and Biro26Catalog._marks["U"] == 150
+    fake = _FakeCatalogDB(products=_CAT_PRODUCTS[1:], counts=dict(counts, U=4))
+    with patch("models.biro26_catalog.Biro26DB", return_value=fake):
+        out = Biro26Catalog.refresh()                           # physical delete -> full reload
+    assert out["mode"] == "full" and 3 not in Biro26Catalog._replica.products
+    Biro26Catalog._replica = None
+
+
+# ── image proxy disk cache ──────────────────────────────────────────
+
+from models.biro26_imgproxy import ImageCache
+
+
+def _png(w=800, h=400):
+    import io
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new("RGB", (w, h), (200, 30, 30)).save(out, "PNG")
+    return out.getvalue()
+
+
+def _counting_fetcher(data, delay=0.0):
+    import time as _t
+    calls = []
+    def fetcher(url):
+        calls.append(url)
+        _t.sleep(delay)
+        return data, "image/png"
+    return fetcher, calls
+
+
+def test_image_cache_hit_skips_the_source(tmp_path):
+    fetcher, calls = _counting_fetcher(_png())
+    c = ImageCache(root=str(tmp_path), fetcher=fetcher)
+    d1, ctype, etag = c.get("http://impreso.md/a.png")
+    d2, _, etag2 = c.get("http://impreso.md/a.png")
+    assert d1 == d2 and etag == etag2 and ctype == "image/png" and len(calls) == 1
+    c.get("http://impreso.md/same-bytes.png")                  # same content, one blob
+    assert len(list((tmp_path / "blobs").rglob("*"))) == 2     # 1 dir + 1 blob
+
+
+def test_image_cache_single_flight_and_width_variant(tmp_path):
+    import io
+    import threading
+    from PIL import Image
+    fetcher, calls = _counting_fetcher(_png(), delay=0.2)
+    c = ImageCache(root=str(tmp_path), fetcher=fetcher)
+    out = []
+    ts = [threading.Thread(target=lambda: out.append(c.get("http://impreso.md/b.png", width=320)))
+          for _ in range(8)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert len(calls) == 1 and len({o[0] for o in out}) == 1
+    data, ctype, etag = out[0]
+    assert ctype == "image/jpeg" and etag.endswith("-w320")
+    assert c.get("http://impreso.md/b.png", width=320) == out[0]   # variant from disk
+    with Image.open(io.BytesIO(data)) as im:
+        assert im.size == (320, 160)
+
+
+def test_image_cache_keeps_allowlist_and_serves_stale_on_failure(tmp_path):
+    fetcher, calls = _counting_fetcher(_png())
+    c = ImageCache(root=str(tmp_path), ttl=0, fetcher=fetcher)
+    for bad in ("https://impreso.md/a.png", "http://169.254.169.254/x.png"):
+        try:
+            c.get(bad)
+            assert False
+        except ValueError:
+            pass
+    assert calls == []
+    first = c.get("http://impreso.md/c.png")
+    def down(url):
+        raise OSError("connection refused")
+    c._fetch = down
+    assert c.get("http://impreso.md/c.png") == first           # expired, source down -> stale copy
+
+
+def test_image_cache_evicts_least_recently_used(tmp_path):
+    import os, time as _t
+    c = ImageCache(root=str(tmp_path), max_bytes=6000, fetcher=lambda u: (u.encode() * 100, "image/png"))
+    a = c._blob(c.get("http://impreso.md/1.png")[2])
+    os.utime(a, (_t.time() - 100, _t.time() - 100))
+    b = c._blob(c.get("http://impreso.md/2.png")[2])
+    os.utime(b, (_t.time() - 50, _t.time() - 50))
+    c.get("http://impreso.md/1.png")                            # hit refreshes 1
+    c.get("http://impreso.md/3.png")
+    assert os.path.exists(a) and not os.path.exists(b)
+
+
+def test_image_cache_needs_a_private_root(tmp_path):
+    import os
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    fetcher, calls = _counting_fetcher(_png())
+    c = ImageCache(root=str(shared), fetcher=fetcher)
+    assert not c.ok
+    data, ctype, _ = c.get("http://impreso.md/a.png")
+    c.get("http://impreso.md/a.png")
+    assert data == _png() and ctype == "image/png" and len(calls) == 2
+    assert list(shared.iterdir()) == []                        # nothing written
+    assert ImageCache(root=str(tmp_path / "own"), fetcher=fetcher).ok
+
+
+def test_image_cache_ignores_planted_or_tampered_files(tmp_path):
+    import json
+    png = _png()
+    fetcher, calls = _counting_fetcher(png)
+    c = ImageCache(root=str(tmp_path), fetcher=fetcher)
+    url = "http://impreso.md/x.png"
+    _, _, sha = c.get(url)
+
+    meta = c._meta_path(url)
+    with open(meta, "w") as f:                                  # not an image type
+        json.dump({"sha": sha, "ctype": "text/html", "fetched": 9e12}, f)
+    assert c.get(url)[1] == "image/png" and len(calls) == 2
+
+    with open(c._blob(sha), "wb") as f:                         # content swapped
+        f.write(b"<script>alert(1)</script>")
+    assert c.get(url)[0] == png
+    assert open(c._blob(sha), "rb").read() == png               # rewritten on refetch
+    assert len(calls) == 3
+
+
+# ── shared cache layer ──────────────────────────────────────────────
+
+from models.biro26_cache import CacheRegion
+
+
+def _counting_loader(value, delay=0.0):
+    import time as _t
+    calls = []
+    def loader():
+        calls.append(1)
+        _t.sleep(delay)
+        return value
+    return loader, calls
+
+
+def test_cache_region_single_flight_and_counters():
+    import threading
+    r = CacheRegion("t.single", 60, register=False)
+    loader, calls = _counting_loader({"v": 1}, delay=0.2)
+    out = []
+    ts = [threading.Thread(target=lambda: out.append(r.get("k", loader))) for _ in range(6)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert len(calls) == 1 and all(o is out[0] for o in out)
+    assert r.get("k", loader) == {"v": 1} and len(calls) == 1
+    s = r.stats()
+    assert s["loads"] == 1 and s["misses"] == 6 and s["hits"] == 1 and s["entries"] == 1
+
+
+def test_cache_region_swr_serves_stale_and_cache_if():
+    import time as _t
+    r = CacheRegion("t.swr", 0.05, swr=True, register=False,
+                    cache_if=lambda v: v.get("success"))
+    assert r.get("k", lambda: {"success": False}) == {"success": False}
+    assert r.stats()["entries"] == 0                           # failures are not kept
+    r.get("k", lambda: {"success": True, "n": 1})
+    _t.sleep(0.08)
+    slow, calls = _counting_loader({"success": True, "n": 2}, delay=0.2)
+    assert r.get("k", slow)["n"] == 1                          # expired -> stale, no wait
+    assert r.get("k", slow)["n"] == 1 and r.stats()["stale"] == 2
+    _t.sleep(0.3)
+    assert len(calls) == 1                                     # one background refresh
+    assert r.get("k", slow)["n"] == 2
+
+
+def test_cache_region_invalidation_soft_hard_and_hooks():
+    import threading, time as _t
+    r = CacheRegion("t.inval", 60, swr=True, register=False)
+    seen = []
+    r.on_invalidate(seen.append)
+    r.get("a", lambda: 1)
+    r.get("b", lambda: 2)
+    r.invalidate("a", hard=False)
+    assert r.peek("a") == 1 and r.peek("b") == 2 and seen == ["a"]
+    r.invalidate()
+    assert r.peek("b") is None and seen == ["a", None]
+    # RO: incarcare pornita inainte de invalidare -> pastrata, dar expirata
+    # EN: a load that started before the invalidation is kept, but stale
+    slow, _ = _counting_loader("old", delay=0.2)
+    t = threading.Thread(target=lambda: r.get("c", slow))
+    t.start()
+    _t.sleep(0.05)
+    r.invalidate("x")
+    t.join()
+    assert r.get("c", lambda: "new") == "old" and r.stats()["stale"] == 1
+
+
+def test_cache_region_shared_between_processes(tmp_path):
+    a = CacheRegion("t.shared", 60, shared=True, cache_dir=str(tmp_path), register=False)
+    b = CacheRegion("t.shared", 60, shared=True, cache_dir=str(tmp_path), register=False)
+    a.get("k", lambda: {"v": 1})
+    assert b.get("k", lambda: {"v": "other"}) == {"v": 1} and b.stats()["shared_hits"] == 1
+    a.invalidate("k")
+    assert b.get("k", lambda: {"v": 2}) == {"v": 2}            # invalidation reached b
+    assert a.get("k", lambda: {"v": 3}) == {"v": 2}            # ... and b's reload reached a
+    s = CacheRegion("t.secret", 60, shared=True, secret=True, cache_dir=str(tmp_path),
+                    register=False)
+    s.get("k", lambda: {"password": "x"})
+    assert not list(tmp_path.glob("t.secret-*"))
+
+
+def test_cache_region_refuses_foreign_or_open_directory(tmp_path):
+    import os
+    shared = tmp_path / "shm"
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)                                    # e.g. planted by another user
+    r = CacheRegion("t.open", 60, shared=True, cache_dir=str(shared), register=False)
+    r.get("k", lambda: {"v": 1})
+    assert r.stats()["shared"] is False and not list(shared.iterdir())
+
+
+def test_cache_region_shares_json_values_only(tmp_path):
+    from decimal import Decimal
+    a = CacheRegion("t.json", 60, shared=True, cache_dir=str(tmp_path), register=False)
+    a.get("plain", lambda: {"rows": [1, "x"], "ok": True})
+    a.get("tuple", lambda: (1, 2))
+    a.get("dec", lambda: {"p": Decimal("1.5")})
+    files = sorted(p.suffix for p in tmp_path.glob("t.json-*"))
+    assert files == [".json"]                                  # only the JSON-exact value
+    b = CacheRegion("t.json", 60, shared=True, cache_dir=str(tmp_path), register=False)
+    assert b.get("plain", lambda: None) == {"rows": [1, "x"], "ok": True}
+    assert b.get("tuple", lambda: "own") == "own"
+
+
+def test_credit_offers_on_cache_region(monkeypatch):
+    from models.biro26_credit import Biro26Credit
+    results = iter([{"success": False, "error": "ORA-1"},
+                    {"success": True, "data": [1]},
+                    {"success": True, "data": [2]}])
+    monkeypatch.setattr(Biro26Credit, "_build_offers", staticmethod(lambda: next(results)))
+    Biro26Credit.invalidate_offers()
+    assert Biro26Credit.public_offers()["success"] is False
+    assert Biro26Credit.public_offers()["data"] == [1]
+    assert Biro26Credit.public_offers()["data"] == [1]         # cached
+    Biro26Credit.invalidate_offers()
+    assert Biro26Credit.public_offers()["data"] == [2]
+    Biro26Credit.invalidate_offers()
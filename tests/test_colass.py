@@ -0,0 +1,200 @@
+"""Tests for ColassController estimate totals: full recalculation and incremental deltas."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decimal import Decimal
+
+import pytest
+
+from controllers import colass_controller
+from controllers.colass_controller import ColassController
+
+
+class FakeDB:
+    """execute_query by SQL prefix; unmatched statements succeed with no rows."""
+    def __init__(self, answers=None):
+        self.answers = answers or {}
+        self.sql = []
+
+    def execute_query(self, sql, params=None):
+        text = " ".join(sql.split())
+        self.sql.append((text, params))
+        for prefix, res in self.answers.items():
+            if text.startswith(prefix):
+                return res
+        return {"success": True, "data": [], "columns": []}
+
+
+def test_recalc_totals_locks_the_estimate_before_aggregating():
+    db = FakeDB({"SELECT NVL(rt.CODE": {"success": True, "columns": ["TYPE_CODE", "TOTAL_AMOUNT"],
+                                         "data": [("MANOPERA", 10), ("OTHER", 5)]}})
+    ColassController._recalc_totals(db, 7)
+    assert db.sql[0][0] == "SELECT ID FROM CLS_ESTIMATES WHERE ID = :eid FOR UPDATE"
+    assert db.sql[1][0].startswith("SELECT NVL(rt.CODE")
+    update = [p for s, p in db.sql if s.startswith("UPDATE CLS_ESTIMATES")][0]
+    assert update["m1"] == 10 and update["mt"] == 15
+
+
+def test_recalc_totals_failed_aggregate_does_not_write_zeros():
+    db = FakeDB({"SELECT NVL(rt.CODE": {"success": False, "message": "ORA-00942"}})
+    with pytest.raises(RuntimeError, match="ORA-00942"):
+        ColassController._recalc_totals(db, 7)
+    assert not any(s.startswith("UPDATE") for s, _ in db.sql)
+
+
+class EstimateDB:
+    """
+    One estimate held in memory: executes the item writes, the incremental
+    totals updates and verify_estimate_totals' queries the way Oracle would.
+    """
+    TYPES = {1: "MANOPERA", 2: "MATERIALE", 3: "UTILAJE", 4: "TRANSPORT"}
+
+    def __init__(self):
+        zero = Decimal(0)
+        self.estimate = {"id": 7, "manopera": zero, "materiale": zero, "utilaje": zero, "amount": zero}
+        self.sections = {10: zero, 11: zero}
+        self.items = {}
+        self.next_id = 100
+        self.connection = type("Conn", (), {"commit": lambda self: None})()
+
+    def __call__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @staticmethod
+    def _result(cols, rows):
+        return {"success": True, "columns": cols, "data": rows}
+
+    def calculated(self):
+        calc = {code.lower(): Decimal(0) for code in ("MANOPERA", "MATERIALE", "UTILAJE")}
+        sections = {sid: Decimal(0) for sid in self.sections}
+        for item in self.items.values():
+            code = self.TYPES.get(item["type"], "OTHER").lower()
+            if code in calc:
+                calc[code] += item["amount"]
+            if item["section"] in sections:
+                sections[item["section"]] += item["amount"]
+        calc["amount"] = sum((i["amount"] for i in self.items.values()), Decimal(0))
+        return calc, sections
+
+    def execute_query(self, sql, params=None):
+        text, p = " ".join(sql.split()), params or {}
+        e = self.estimate
+        if text.startswith("INSERT INTO CLS_ESTIMATE_ITEMS"):
+            self.next_id += 1
+            self.items[self.next_id] = {
+                "section": p["section_id"], "type": p["resource_type_id"],
+                "qty": p["qty"], "price": p["price"], "amount": p["amount"], "notes": p["notes"]}
+        elif text.startswith("SELECT MAX(ID) AS ID FROM CLS_ESTIMATE_ITEMS"):
+            return self._result(["ID"], [(max(self.items),)])
+        elif text.startswith("SELECT ID, ESTIMATE_ID, SECTION_ID"):
+            i = self.items[p["id"]]
+            return self._result(
+                ["ID", "ESTIMATE_ID", "SECTION_ID", "RESOURCE_TYPE_ID", "QTY", "PRICE", "AMOUNT", "NOTES"],
+                [(p["id"], 7, i["section"], i["type"], i["qty"], i["price"], i["amount"], i["notes"])])
+        elif text.startswith("SELECT ESTIMATE_ID, SECTION_ID, RESOURCE_TYPE_ID, AMOUNT"):
+            i = self.items[p["id"]]
+            return self._result(["ESTIMATE_ID", "SECTION_ID", "RESOURCE_TYPE_ID", "AMOUNT"],
+                                [(7, i["section"], i["type"], i["amount"])])
+        elif text.startswith("UPDATE CLS_ESTIMATE_ITEMS"):
+            self.items[p["id"]].update(section=p["section_id"], qty=p["qty"], price=p["price"],
+                                       amount=p["amount"], notes=p["notes"])
+        elif text.startswith("DELETE FROM CLS_ESTIMATE_ITEMS"):
+            del self.items[p["id"]]
+        elif text.startswith("UPDATE CLS_ESTIMATES SET TOTAL_MANOPERA = TOTAL_MANOPERA +"):
+            assert p["eid"] == 7
+            code = self.TYPES.get(p["tid"])
+            if code in ("MANOPERA", "MATERIALE", "UTILAJE"):
+                e[code.lower()] += p["amount"]
+            e["amount"] += p["amount"]
+        elif text.startswith("UPDATE CLS_ESTIMATE_SECTIONS SET TOTAL_AMOUNT = TOTAL_AMOUNT +"):
+            if p["eid"] == 7 and p["sid"] in self.sections:
+                self.sections[p["sid"]] += p["amount"]
+        elif text.startswith("SELECT COUNT(*) AS CNT FROM CLS_ESTIMATES"):
+            return self._result(["CNT"], [(1,)])
+        elif text.startswith("SELECT * FROM ( SELECT e.ID AS ESTIMATE_ID"):
+            calc, _sections = self.calculated()
+            fields = ("manopera", "materiale", "utilaje", "amount")
+            if all(e[f] == calc[f] for f in fields):
+                return self._result([], [])
+            return self._result(
+                ["ESTIMATE_ID"] + [f"TOTAL_{f.upper()}" for f in fields] + [f"CALC_{f.upper()}" for f in fields],
+                [(7, *(e[f] for f in fields), *(calc[f] for f in fields))])
+        elif text.startswith("SELECT * FROM ( SELECT s.ESTIMATE_ID"):
+            _calc, sections = self.calculated()
+            return self._result(["ESTIMATE_ID", "SECTION_ID", "TOTAL_AMOUNT", "CALC_AMOUNT"],
+                                [(7, sid, self.sections[sid], sections[sid])
+                                 for sid in sorted(self.sections) if self.sections[sid] != sections[sid]])
+        else:
+            raise AssertionError(f"unexpected SQL: {text[:80]}")
+        return {"success": True}
+
+
+@pytest.fixture
+def estimate(monkeypatch):
+    db = EstimateDB()
+    monkeypatch.setattr(colass_controller, "DatabaseModel", db)
+    return db
+
+
+def _add(section, type_id, qty, price):
+    res = ColassController.add_estimate_item(7, {"item_name": "x", "section_id": section,
+                                                 "resource_type_id": type_id, "qty": qty, "price": price})
+    assert res["success"], res
+    return res["id"]
+
+
+def test_item_type_picks_the_total_bucket(estimate):
+    _add(10, 1, 2, 10.5)
+    _add(10, 2, 3, 1.25)
+    _add(11, 3, 1, 100)
+    _add(11, 4, 1, 7)          # a type without its own column only counts in TOTAL_AMOUNT
+    _add(None, None, 1, 0.1)   # no type, no section
+    e = estimate.estimate
+    assert (e["manopera"], e["materiale"], e["utilaje"]) == (Decimal("21.0"), Decimal("3.75"), Decimal("100"))
+    assert e["amount"] == Decimal("131.85")
+    assert estimate.sections == {10: Decimal("24.75"), 11: Decimal("107")}
+
+
+def test_moving_an_item_between_sections_moves_its_amount(estimate):
+    item = _add(10, 2, 4, 2.5)
+    assert ColassController.update_estimate_item(item, {"section_id": 11, "qty": 5})["success"]
+    assert estimate.sections == {10: Decimal(0), 11: Decimal("12.5")}
+    assert estimate.estimate["materiale"] == estimate.estimate["amount"] == Decimal("12.5")
+
+
+def test_delete_takes_the_item_out_of_every_total(estimate):
+    keep = _add(10, 1, 1, 3)
+    gone = _add(11, 1, 2, 4)
+    assert ColassController.delete_estimate_item(gone)["success"]
+    assert estimate.estimate["manopera"] == estimate.estimate["amount"] == Decimal(3)
+    assert estimate.sections == {10: Decimal(3), 11: Decimal(0)}
+    assert keep in estimate.items and gone not in estimate.items
+    assert not ColassController.delete_estimate_item(gone)["success"]
+
+
+def test_delta_totals_match_a_full_recalculation_after_mixed_edits(estimate):
+    ids = [_add(10 + i % 2, 1 + i % 4, 1 + i, 0.1 * (i + 1) + 0.0333) for i in range(12)]
+    for n, item in enumerate(ids[:8]):
+        change = {"qty": n + 0.5} if n % 3 else {"section_id": 11 if n % 2 else 10, "price": 1.1111}
+        assert ColassController.update_estimate_item(item, change)["success"]
+    for item in ids[::3]:
+        assert ColassController.delete_estimate_item(item)["success"]
+    assert ColassController.update_estimate_item(ids[1], {"amount": 99.99999})["success"]
+    _add(11, 3, 3, 0.3333)
+
+    res = ColassController.verify_estimate_totals(7)
+    assert res["success"] and res["checked"] == 1
+    assert res["mismatches"] == []
+    calc, sections = estimate.calculated()
+    assert estimate.sections == sections and estimate.estimate["amount"] == calc["amount"]
+
+    estimate.sections[10] += Decimal("0.0001")                # the check itself does see drift
+    assert [m["section_id"] for m in ColassController.verify_estimate_totals(7)["mismatches"]] == [10]
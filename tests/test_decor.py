@@ -0,0 +1,277 @@
+"""Tests for DECOR row-level persistence and the per-process state cache."""
+import os
+import sys
+from copy import deepcopy
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import oracledb
+import pytest
+
+import decor_local_store
+from decor_local_store import DecorLocalStore
+from models import decor_oracle_store
+
+
+class FakeDecorDb:
+    """
+    The DECOR rows save_changes touches, with Oracle's transaction and
+    row-version semantics: a connection works on a copy that commit
+    publishes and rollback drops.
+    """
+    def __init__(self, stamp=5):
+        self.counters = {
+            "next_material_id": 1000, "next_order_id": 1, "next_quote_seq": 1,
+            "next_sliding_material_id": 1, "state_stamp": stamp,
+        }
+        self.materials = {
+            m["id"]: {"unit_price": m["unit_price"], "row_version": 1}
+            for m in DecorLocalStore._default_materials()
+        }
+        self.orders = {}
+        self.commits = self.rollbacks = 0
+
+    def tables(self):
+        return {"counters": self.counters, "materials": self.materials, "orders": self.orders}
+
+    def connect(self):
+        return _FakeConn(self)
+
+    def load_state(self, default_factory=None, fallback_path=None, include_orders=True):
+        state = default_factory()
+        state["materials"] = [
+            dict(m, unit_price=self.materials[m["id"]]["unit_price"])
+            for m in state["materials"] if m["id"] in self.materials
+        ]
+        counters = dict(self.counters)
+        stamp = counters.pop("state_stamp")
+        state.update(counters)
+        state["_versions"] = {
+            "materials": {mid: row["row_version"] for mid, row in self.materials.items()},
+            "sliding_materials": {}, "settings": 1, "sliding_settings": 1,
+            "counters": counters, "orders": {}, "stamp": stamp,
+        }
+        return state
+
+
+class _FakeConn:
+    def __init__(self, db):
+        self.db = db
+        self.work = deepcopy(db.tables())
+
+    def cursor(self):
+        return _FakeCursor(self.work)
+
+    def commit(self):
+        self.db.counters, self.db.materials, self.db.orders = (
+            self.work["counters"], self.work["materials"], self.work["orders"])
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+def _duplicate():
+    return oracledb.IntegrityError(SimpleNamespace(code=1, message="ORA-00001"))
+
+
+class _FakeCursor:
+    def __init__(self, work):
+        self.t = work
+        self.rowcount = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _versioned(self, table, p):
+        row = table.get(p["id"])
+        if row is None or row["row_version"] != p["row_version"]:
+            return 0
+        row["row_version"] += 1
+        if "unit_price" in p:
+            row["unit_price"] = p["unit_price"]
+        if "status_id" in p:
+            row["status_id"] = p["status_id"]
+        return 1
+
+    def execute(self, sql, params=None):
+        text, p = " ".join(sql.split()), params or {}
+        counters, materials, orders = self.t["counters"], self.t["materials"], self.t["orders"]
+        self.rowcount, self._rows = 0, []
+        if text.startswith("INSERT INTO DECOR_COUNTERS"):
+            key = p.get("counter_key", "state_stamp")
+            if key in counters:
+                raise _duplicate()
+            counters[key] = p.get("counter_value", 1)
+            self.rowcount = 1
+        elif text.startswith("UPDATE DECOR_COUNTERS SET COUNTER_VALUE = COUNTER_VALUE + 1"):
+            if "state_stamp" in counters:
+                counters["state_stamp"] += 1
+                self.rowcount = 1
+        elif text.startswith("UPDATE DECOR_COUNTERS"):
+            if counters.get(p["counter_key"]) == p["old_value"]:
+                counters[p["counter_key"]] = p["new_value"]
+                self.rowcount = 1
+        elif text.startswith("SELECT COUNTER_VALUE FROM DECOR_COUNTERS"):
+            self._rows = [(counters["state_stamp"],)] if "state_stamp" in counters else []
+        elif text.startswith("INSERT INTO DECOR_MATERIALS"):
+            if p["id"] in materials:
+                raise _duplicate()
+            materials[p["id"]] = {"unit_price": p["unit_price"], "row_version": 1}
+            self.rowcount = 1
+        elif text.startswith("UPDATE DECOR_MATERIALS"):
+            self.rowcount = self._versioned(materials, p)
+        elif text.startswith("DELETE FROM DECOR_MATERIALS"):
+            row = materials.get(p["id"])
+            if row is not None and row["row_version"] == p["row_version"]:
+                del materials[p["id"]]
+                self.rowcount = 1
+        elif text.startswith("INSERT INTO DECOR_ORDERS"):
+            if p["id"] in orders:
+                raise _duplicate()
+            orders[p["id"]] = {"order_number": p["order_number"], "status_id": p["status_id"], "row_version": 1}
+            self.rowcount = 1
+        elif text.startswith("UPDATE DECOR_ORDERS"):
+            self.rowcount = self._versioned(orders, p)
+
+    def executemany(self, sql, rows):
+        pass
+
+    def fetchall(self):
+        return self._rows
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDecorDb()
+    monkeypatch.setattr(decor_oracle_store, "_SCHEMA_READY", True)
+    monkeypatch.setattr(decor_oracle_store.DatabaseConnection, "get_connection", staticmethod(fake.connect))
+    monkeypatch.setattr(decor_local_store, "load_decor_state", fake.load_state)
+    monkeypatch.setattr(decor_local_store, "decor_state_stamp", lambda: fake.counters["state_stamp"])
+    monkeypatch.setattr(decor_local_store.time, "sleep", lambda s: None)
+    monkeypatch.setattr(DecorLocalStore, "_state_cache", None)
+    monkeypatch.setattr(DecorLocalStore, "_state_check_sec", 3600.0)
+    return fake
+
+
+def _material(mid):
+    return next(m for m in DecorLocalStore._load()["materials"] if m["id"] == mid)
+
+
+def _price_update(mid, price):
+    return {**_material(mid), "unit_price": price}
+
+
+# ── process cache ────────────────────────────────────────────
+
+def test_interleaved_writes_do_not_drop_an_update_from_the_cache(db):
+    DecorLocalStore._load()                                   # cache at stamp 5
+    payload_a = _price_update(1, 99.0)
+    payload_b = _price_update(2, 1.0)
+
+    def write_b(state, changes):
+        # B copied the cache at stamp 5; A writes stamp 6 before B commits
+        assert DecorLocalStore.upsert_material(payload_a)["success"]
+        row = next(m for m in state["materials"] if m["id"] == 2)
+        row["unit_price"] = payload_b["unit_price"]
+        changes.materials.add(2)
+        return {"success": True}
+
+    assert DecorLocalStore._mutate(write_b)["success"]        # B writes stamp 7
+    assert db.counters["state_stamp"] == 7
+    assert _material(1)["unit_price"] == 99.0 == db.materials[1]["unit_price"]
+    assert _material(2)["unit_price"] == 1.0
+    assert DecorLocalStore._load()["_versions"]["stamp"] == 7
+
+
+def test_sequential_write_becomes_the_cache(db):
+    DecorLocalStore._load()
+    assert DecorLocalStore.upsert_material(_price_update(3, 9.5))["success"]
+    cached = DecorLocalStore._state_cache
+    assert cached is not None and cached["_versions"]["stamp"] == 6
+    assert _material(3)["unit_price"] == 9.5
+
+
+# ── row versions ─────────────────────────────────────────────
+
+def test_conflict_reloads_and_retries(db):
+    DecorLocalStore._load()                                   # cache: material 1 at version 1
+    db.materials[1]["row_version"] = 2                        # another process wrote it
+    db.counters["state_stamp"] += 1
+
+    res = DecorLocalStore.upsert_material(_price_update(1, 50.0))
+    assert res["success"]
+    assert db.rollbacks == 1 and db.commits == 1              # first attempt refused, second applied
+    assert db.materials[1] == {"unit_price": 50.0, "row_version": 3}
+
+
+def test_conflict_is_reported_after_the_retries(db, monkeypatch):
+    def stale_save(state, changes):
+        raise decor_oracle_store.DecorConflictError("x")
+
+    monkeypatch.setattr(decor_local_store, "save_decor_changes", stale_save)
+    res = DecorLocalStore.upsert_material(_price_update(1, 50.0))
+    assert not res["success"] and "другим пользователем" in res["error"]
+
+
+def test_concurrent_create_order_collides_on_the_counter(db, monkeypatch):
+    payload = {"client_name": "A", "client_phone": "1", "width_mm": 3000, "projection_mm": 2500}
+    save = DecorLocalStore._save.__func__
+    rival = {}
+
+    def save_after_rival(cls, state, changes=None):
+        if not rival:
+            # both read next_order_id = 1; the rival commits first
+            rival["started"] = True
+            rival["res"] = DecorLocalStore.create_order({**payload, "client_name": "B"})
+        return save(cls, state, changes)
+
+    monkeypatch.setattr(DecorLocalStore, "_save", classmethod(save_after_rival))
+    res = DecorLocalStore.create_order(payload)
+    assert rival["res"]["success"] and res["success"]
+    assert rival["res"]["data"]["id"] == 1 and res["data"]["id"] == 2
+    assert db.rollbacks == 1                                  # counter UPDATE matched no row
+    assert sorted(db.orders) == [1, 2] and db.counters["next_order_id"] == 3
+    assert db.orders[1]["order_number"] != db.orders[2]["order_number"]
+
+
+def test_delete_checks_the_row_version(db):
+    state = DecorLocalStore._read_state()[0]
+    db.materials[4]["row_version"] = 2
+    state["materials"] = [m for m in state["materials"] if m["id"] != 4]
+    changes = decor_oracle_store.DecorChanges()
+    changes.deleted_materials.add(4)
+    with pytest.raises(decor_oracle_store.DecorConflictError):
+        decor_oracle_store.save_changes(state, changes)
+    assert 4 in db.materials and db.counters["state_stamp"] == 5
+
+    state["_versions"]["materials"][4] = 2
+    decor_oracle_store.save_changes(state, changes)
+    assert 4 not in db.materials and 4 not in state["_versions"]["materials"]
+
+
+def test_reference_writes_bump_the_stamp_order_writes_do_not(db):
+    state = DecorLocalStore._read_state()[0]
+    changes = decor_oracle_store.DecorChanges()
+    changes.materials.add(5)
+    decor_oracle_store.save_changes(state, changes)
+    assert db.counters["state_stamp"] == 6 == state["_versions"]["stamp"]
+    assert state["_versions"]["materials"][5] == 2
+
+    db.orders[7] = {"order_number": "D-7", "status_id": 1, "row_version": 1}
+    order = {"id": 7, "order_number": "D-7", "status_id": 2}
+    state["orders"] = [order]
+    state["_versions"]["orders"] = {7: 1}
+    changes = decor_oracle_store.DecorChanges()
+    changes.order(7)
+    decor_oracle_store.save_changes(state, changes)
+    assert db.orders[7]["status_id"] == 2 and state["_versions"]["orders"][7] == 2
+    assert db.counters["state_stamp"] == 6 == state["_versions"]["stamp"]
@@ -0,0 +1,97 @@
+"""Tests for nufarul_ai_parser: compiled catalog index and its process cache."""
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+pytest.importorskip("rapidfuzz")
+
+from unittest.mock import patch, MagicMock
+import nufarul_ai_parser as parser
+from controllers.nufarul_controller import NufarulController
+
+
+SERVICES = [
+    {"id": 1, "name_ru": "Блуза с коротким рукавом", "name_ro": "Bluză cu mânecă scurtă", "name_en": None},
+    {"id": 2, "name_ru": "Демисезонное пальто без капюшона", "name_ro": "Palton de demi-sezon fără glugă", "name_en": None},
+    {"id": 3, "name_ru": "Подушка на синтепоне 50x70", "name_ro": "Pernă pe sintepon 50x70", "name_en": None},
+    {"id": 4, "name_ru": "Брюки, джинсы", "name_ro": "Pantaloni, jeanși", "name_en": "Trousers, jeans"},
+    {"id": 5, "name_ru": "Куртка на пуху с капюшоном", "name_ro": "Geacă pe puf cu glugă", "name_en": None},
+]
+
+# Ответы разбора до CatalogIndex: (service_id, qty, original, confidence)
+EXPECTED = {
+    "2 рубашки, palton, 3 perne": [(1, 2, "рубашки", 97), (2, 1, "palton", 97), (3, 3, "perne", 97)],
+    "pantaloni 2 buc": [(4, 2, "pantaloni", 97)],
+    "курточка пуховая": [(5, 1, "курточка пуховая", 69)],
+    "2 cămăși, пальто": [(4, 2, "cămăși", 60), (2, 1, "пальто", 97)],
+    "bluza cu maneca scurta": [(1, 1, "bluza cu maneca scurta", 97)],
+    "xyz qwe": [(None, 1, "xyz qwe", 0)],
+    "jeans": [(4, 1, "jeans", 97)],
+    "подушк": [(3, 1, "подушк", 100)],
+}
+
+
+def _short(matches):
+    return [(m["service_id"], m["qty"], m["original"], m["confidence"]) for m in matches]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    parser.invalidate_catalog()
+    yield
+    parser.invalidate_catalog()
+
+
+@pytest.mark.parametrize("text", sorted(EXPECTED))
+def test_parse_order_matches_legacy_answers(text):
+    assert _short(parser.parse_order(text, SERVICES, threshold=40)) == EXPECTED[text]
+    index = parser.CatalogIndex(SERVICES)
+    assert _short(parser.parse_order(text, index, threshold=40)) == EXPECTED[text]
+    # Повтор — из запомненных позиций, ответ тот же
+    assert _short(parser.parse_order(text, index, threshold=40)) == EXPECTED[text]
+
+
+def test_cached_catalog_loads_once_until_invalidated():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return SERVICES
+
+    first = parser.cached_catalog(loader)
+    assert parser.cached_catalog(loader) is first
+    assert len(calls) == 1
+    parser.invalidate_catalog()
+    assert parser.cached_catalog(loader) is not first
+    assert len(calls) == 2
+
+
+def test_get_parse_catalog_does_not_cache_failed_load():
+    failed = {"success": False, "error": "ORA-12541", "data": []}
+    ok = {"success": True, "data": SERVICES}
+    with patch.object(NufarulController, "get_services", side_effect=[failed, ok]) as gs:
+        with pytest.raises(RuntimeError):
+            NufarulController.get_parse_catalog()
+        catalog = NufarulController.get_parse_catalog()
+        assert NufarulController.get_parse_catalog() is catalog
+    assert gs.call_count == 2
+    assert len(catalog.services) == len(SERVICES)
+
+
+def test_upsert_and_delete_service_invalidate_catalog():
+    class FakeDB:
+        def __init__(self):
+            self.connection = MagicMock()
+        def execute_query(self, sql, params=None):
+            return {"success": True}
+        def __enter__(self): return self
+        def __exit__(self, *a): pass
+
+    catalog = parser.cached_catalog(lambda: SERVICES)
+    with patch('controllers.nufarul_controller.DatabaseModel', side_effect=lambda: FakeDB()):
+        assert NufarulController.upsert_service({"id": 1, "name_ru": "Блуза"})["success"] is True
+        assert parser.cached_catalog(lambda: SERVICES) is not catalog
+        catalog = parser.cached_catalog(lambda: SERVICES)
+        assert NufarulController.delete_service(1)["success"] is True
+        assert parser.cached_catalog(lambda: SERVICES) is not catalog
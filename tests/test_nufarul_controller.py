@@ -71,64 +71,353 @@ def test_get_group_params_includes_subgroups_json():
     assert row['subgroups_json'] == '[{"key":"sg1","label_ru":"Test"}]'
 
 
-# ── create_order_with_params ──────────────────────────────────
+# ── create_order / create_order_with_params ───────────────────
+
+class FakeVar:
+    def __init__(self):
+        self.value = None
+    def getvalue(self):
+        return self.value
+
+
+class LedgerCursor:
+    """Cursor fake for the order path: counts round-trips (execute / executemany)
+    and answers the status lookup and the PL/SQL order block like Oracle would."""
+    def __init__(self, seq_val=1001, order_id=2001, first_item_id=3001, statuses=None):
+        self.seq_val = seq_val
+        self.order_id = order_id
+        self.first_item_id = first_item_id
+        self.statuses = [("received", 99), ("ready", 100)] if statuses is None else statuses
+        self.round_trips = 0
+        self.executed = []
+        self.executemany_calls = []
+        self._rows = []
+    def var(self, typ, size=None):
+        return FakeVar()
+    def execute(self, sql, params=None):
+        self.round_trips += 1
+        self.executed.append((sql, params))
+        if "NUF_ORDER_STATUSES" in sql:
+            self._rows = list(self.statuses)
+        elif "NUF_ORDERS_LEDGER" in sql:
+            n = params["n"]
+            params["oid"].value = self.order_id
+            params["onum"].value = f"2026-{str(self.seq_val).zfill(5)}"
+            params["iids"].value = "".join(f"{self.first_item_id + i}," for i in range(n)) or None
+    def fetchall(self):
+        return self._rows
+    def executemany(self, sql, data):
+        self.round_trips += 1
+        self.executemany_calls.append((sql, data))
+    def close(self):
+        pass
+
+
+class CursorDB(FakeDB):
+    def __init__(self, cursor):
+        self._rows = []
+        self._cols = []
+        self.connection = MagicMock()
+        self.connection.cursor.return_value = cursor
+
+
+@pytest.fixture(autouse=True)
+def _reset_status_cache():
+    NufarulController._status_ids = {}
+    yield
+    NufarulController._status_ids = {}
+
+
+def _items(n):
+    return [{"service_id": i + 1, "qty": 2, "price": 10.5} for i in range(n)]
+
 
 def test_create_order_with_params_writes_params_to_companion_table():
     """PARAMS JSON must be inserted into NUF_ORDER_ITEM_PARAMS for each item.
-    The controller now uses db.connection.cursor() directly (batch path), so we
+    The controller uses db.connection.cursor() directly (batch path), so we
     mock the cursor rather than execute_query."""
-    params_inserts = []
-    executemany_calls = []
-
-    # cursor.fetchone / fetchall return values depend on the SQL issued
-    call_idx = [0]
-    def fake_execute(sql, params=None):
-        call_idx[0] += 1
-
-    def fake_fetchone():
-        # bootstrap query: seq_val, order_id, year, status_id
-        return (1001, 2001, "2026", 99)
-
-    def fake_fetchall():
-        # item IDs batch query
-        return [(3001,)]
-
-    def fake_executemany(sql, data):
-        executemany_calls.append((sql, data))
-        if 'NUF_ORDER_ITEM_PARAMS' in sql:
-            for row in data:
-                params_inserts.append(row.get('params'))
-
-    mock_cursor = MagicMock()
-    mock_cursor.__enter__ = lambda s: s
-    mock_cursor.__exit__ = MagicMock(return_value=False)
-    mock_cursor.execute = fake_execute
-    mock_cursor.fetchone = fake_fetchone
-    mock_cursor.fetchall = fake_fetchall
-    mock_cursor.executemany = fake_executemany
-
-    mock_conn = MagicMock()
-    mock_conn.cursor.return_value = mock_cursor
-    mock_conn.commit = MagicMock()
-    mock_conn.rollback = MagicMock()
-
-    class DirectCursorDB(FakeDB):
-        def __init__(self):
-            self._rows = []
-            self._cols = []
-            self.connection = mock_conn
-        def __enter__(self): return self
-        def __exit__(self, *a): pass
-
+    cur = LedgerCursor()
     items = [
         {"service_id": 1, "qty": 1, "price": 180.0,
          "params": {"color": "#c0392b", "fabric": "Шерсть", "stains": True}}
     ]
-    with patch('controllers.nufarul_controller.DatabaseModel', return_value=DirectCursorDB()):
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(cur)):
         result = NufarulController.create_order_with_params("Test", "+373", items)
 
+    params_inserts = [row.get('params') for sql, data in cur.executemany_calls
+                      if 'NUF_ORDER_ITEM_PARAMS' in sql for row in data]
     assert result.get('success'), f"Expected success, got: {result}"
     assert len(params_inserts) == 1, f"Expected 1 params insert, got {len(params_inserts)}"
     stored = json.loads(params_inserts[0])
     assert stored["color"] == "#c0392b"
     assert stored["fabric"] == "Шерсть"
+    assert result["item_ids"] == [{"service_id": 1, "item_id": 3001}]
+
+
+@pytest.mark.parametrize("method", ["create_order", "create_order_with_params"])
+def test_create_order_round_trips_do_not_grow_with_items(method):
+    trips = {}
+    for n in (1, 20):
+        NufarulController._status_ids = {"received": 99}
+        cur = LedgerCursor()
+        with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(cur)):
+            result = getattr(NufarulController, method)("Ion", "+373", _items(n))
+        assert result["success"], result
+        assert [r["item_id"] for r in result["item_ids"]] == list(range(3001, 3001 + n))
+        items_sql, rows = next(c for c in cur.executemany_calls if "NUF_ORDER_ITEMS_LEDGER" in c[0])
+        assert len(rows) == n
+        assert rows[0] == {"sid": 1, "qty": 2.0, "price": 10.5, "amount": 21.0, "iid": 3001, "oid": 2001}
+        trips[n] = cur.round_trips
+    assert trips[1] == trips[20] == 2
+
+
+def test_create_order_looks_up_status_once_per_process():
+    cursors = [LedgerCursor(), LedgerCursor()]
+    for cur in cursors:
+        with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(cur)):
+            assert NufarulController.create_order("Ion", "+373", _items(3))["success"]
+    assert [sum("NUF_ORDER_STATUSES" in sql for sql, _ in c.executed) for c in cursors] == [1, 0]
+    block_params = cursors[1].executed[0][1]
+    assert block_params["sid"] == 99
+    assert block_params["total"] == 63.0
+
+
+def test_create_order_returns_ledger_number_and_payment():
+    cur = LedgerCursor(seq_val=7)
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(cur)):
+        result = NufarulController.create_order_with_params(
+            "", "", _items(2), notes=" x ", payment_method="card", ready_date="2026-03-01T10:30")
+    assert result["order_number"] == result["barcode"] == "2026-00007"
+    assert result["total_amount"] == 42.0
+    assert result["payment_method"] == "card"
+    assert result["ready_date"] == "2026-03-01T10:30:00"
+    block_sql, block_params = cur.executed[-1]
+    assert "NUF_ORDER_PAYMENT" in block_sql
+    assert block_params["cname"] == "Аноним" and block_params["cphone"] is None
+    assert block_params["notes"] == "x" and block_params["pay"] == "card"
+
+    plain = LedgerCursor()
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(plain)):
+        assert NufarulController.create_order("", "", _items(1))["success"]
+    assert "NUF_ORDER_PAYMENT" not in plain.executed[-1][0]
+
+
+def test_create_order_missing_status_rolls_back():
+    cur = LedgerCursor(statuses=[])
+    db = CursorDB(cur)
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=db):
+        result = NufarulController.create_order("Ion", "+373", _items(1))
+    assert result == {"success": False, "error": "Status 'received' not found"}
+    assert not cur.executemany_calls
+    db.connection.rollback.assert_called_once()
+
+
+# ── photos: streamed BLOBs, thumbnails, disk cache ────────────
+
+import base64
+import io
+
+from models import nufarul_photos
+
+
+class FakeLob:
+    def __init__(self, data=b"", chunk=8192):
+        self.data = bytearray(data)
+        self.chunk = chunk
+        self.writes = 0
+        self.reads = 0
+    def getchunksize(self):
+        return self.chunk
+    def write(self, data, offset):
+        self.writes += 1
+        self.data[offset - 1:offset - 1 + len(data)] = data
+    def read(self, offset=1, amount=None):
+        self.reads += 1
+        return bytes(self.data[offset - 1:offset - 1 + amount])
+
+
+class PhotoCursor:
+    def __init__(self, lob, photo_id=77):
+        self.lob = lob
+        self.photo_id = photo_id
+        self.executed = []
+        self.outputtypehandler = None
+    def setinputsizes(self, **kw):
+        pass
+    def var(self, typ, *a, **kw):
+        return FakeVar()
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if "RETURNING" in sql:
+            params["pid"].value = [self.photo_id]
+            params["lob"].value = [self.lob]
+    def fetchone(self):
+        return (self.lob,)
+    def close(self):
+        pass
+
+
+def _jpeg(size=(1200, 800)):
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(out, "JPEG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def photo_cache(tmp_path, monkeypatch):
+    cache = nufarul_photos.PhotoCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(nufarul_photos, "photo_cache", cache)
+    return cache
+
+
+def test_save_photo_streams_blob_and_returns_inserted_id(photo_cache):
+    data = _jpeg()
+    lob = FakeLob()
+    cur = PhotoCursor(lob)
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(cur)):
+        result = NufarulController.save_photo(5, None, stream=io.BytesIO(data))
+    assert result["success"], result
+    assert result["photo_id"] == 77
+    assert result["photo_size"] == len(data) and result["has_thumb"]
+    assert bytes(lob.data) == data
+    assert not any("MAX(ID)" in sql for sql, _ in cur.executed)
+    thumb = cur.executed[0][1]["thumb"]
+    from PIL import Image
+    assert max(Image.open(io.BytesIO(thumb)).size) == nufarul_photos.THUMB_SIDE
+    assert open(photo_cache.path(result["sha256"]), "rb").read() == data
+
+
+def test_save_photo_base64_is_decoded_in_chunks(photo_cache):
+    data = bytes(range(256)) * 3000
+    text = "data:image/png;base64," + base64.encodebytes(data).decode()  # with newlines
+    lob = FakeLob()
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(PhotoCursor(lob))):
+        result = NufarulController.save_photo(5, 1, text, mime_type="image/png")
+    assert result["success"], result
+    assert bytes(lob.data) == data
+    assert lob.writes > 1
+    assert result["has_thumb"] is False  # not an image: stored without thumbnail
+
+
+def test_iter_photo_reads_lob_in_chunks_and_fills_cache(photo_cache):
+    import hashlib
+    data = b"x" * (nufarul_photos.CHUNK_BYTES * 2 + 10)
+    lob = FakeLob(data)
+    sha = hashlib.sha256(data).hexdigest()
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(PhotoCursor(lob))):
+        chunks = list(NufarulController.iter_photo(1, sha256=sha))
+    assert b"".join(chunks) == data and len(chunks) == 3
+    assert open(photo_cache.path(sha), "rb").read() == data
+    assert photo_cache.path(sha + ".thumb") is None
+
+
+def test_photo_cache_evicts_least_recent(tmp_path):
+    import hashlib
+    cache = nufarul_photos.PhotoCache(str(tmp_path / "cache"), max_bytes=1000)
+    blobs = [c * 400 for c in (b"x", b"y", b"z")]
+    keys = [hashlib.sha256(b).hexdigest() for b in blobs]
+    for i, (k, b) in enumerate(zip(keys, blobs)):
+        cache.put_bytes(k, b)
+        os.utime(os.path.join(str(tmp_path / "cache"), k[:2], k), (i, i))
+    assert cache.path(keys[0]) is None
+    assert cache.path(keys[2]) is not None
+    with pytest.raises(ValueError):
+        cache.path("../etc/passwd")
+
+
+def test_photo_cache_serves_only_verified_files(tmp_path):
+    import hashlib
+    cache = nufarul_photos.PhotoCache(str(tmp_path / "cache"))
+    data = _jpeg()
+    sha = hashlib.sha256(data).hexdigest()
+    cache.put_bytes(sha, data)
+    cache.put_bytes(sha + ".thumb", data)
+    assert cache.path(sha) and cache.path(sha + ".thumb")
+    with open(cache._path(sha), "wb") as f:
+        f.write(b"<html>")
+    with open(cache._path(sha + ".thumb"), "wb") as f:
+        f.write(b"<html>")
+    assert cache.path(sha) is None and not os.path.exists(cache._path(sha))
+    assert cache.path(sha + ".thumb") is None
+
+
+def test_photo_cache_is_off_in_a_shared_directory(tmp_path):
+    import hashlib
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    cache = nufarul_photos.PhotoCache(str(shared))
+    assert not cache.ok
+    data = b"photo"
+    sha = hashlib.sha256(data).hexdigest()
+    cache.put_bytes(sha, data)
+    assert cache.path(sha) is None and list(shared.iterdir()) == []
+
+
+class LegacyPhotoDB(FakeDB):
+    """NUF_ORDER_PHOTOS before sql/124: no PHOTO_SHA256 / THUMB_BLOB."""
+    def __init__(self, rows, columns):
+        super().__init__(rows, columns)
+        self.sql = []
+    def execute_query(self, sql, params=None):
+        self.sql.append(sql)
+        if "THUMB_BLOB IS NULL" in sql or "SELECT PHOTO_SHA256" in sql:
+            return {"success": False, "message": 'ORA-00904: "PHOTO_SHA256": invalid identifier'}
+        return super().execute_query(sql, params)
+
+
+def test_photos_are_listed_before_sql_124():
+    cols = ['ID', 'ORDER_ID', 'ITEM_ID', 'PHOTO_MIME', 'PHOTO_SIZE', 'PHOTO_NAME',
+            'PHOTO_SHA256', 'HAS_THUMB', 'CREATED_AT', 'THUMB_BLOB']
+    db = LegacyPhotoDB([(1, 9, None, 'image/jpeg', 100, 'a.jpg', None, 0, None, None)], cols)
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=db):
+        listed = NufarulController.get_order_photos(9, include_data=True)
+        one = NufarulController.get_photo(1)
+        backfill = NufarulController.backfill_photo(1)
+    assert listed['success'] and listed['data'][0]['thumb_url'] == '/api/nufarul-operator/photo/1'
+    assert listed['data'][0]['thumb_base64'] is None
+    assert one['success'] and one['data']['photo_sha256'] is None
+    assert backfill['success'] is False and 'ORA-00904' in backfill['error']
+    assert not db.connection.cursor.called                     # BLOB not read for the backfill
+
+
+def test_save_photo_before_sql_124_inserts_without_hash_columns(photo_cache):
+    import oracledb
+
+    class LegacyCursor(PhotoCursor):
+        def execute(self, sql, params=None):
+            if "PHOTO_SHA256" in sql:
+                raise oracledb.DatabaseError(MagicMock(code=904))
+            super().execute(sql, params)
+
+    data = _jpeg()
+    lob = FakeLob()
+    cur = LegacyCursor(lob)
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=CursorDB(cur)):
+        result = NufarulController.save_photo(5, None, stream=io.BytesIO(data))
+    assert result["success"], result
+    assert result["has_thumb"] is False and bytes(lob.data) == data
+    assert "THUMB_BLOB" not in cur.executed[0][0] and "sha" not in cur.executed[0][1]
+
+
+def test_order_photos_keys_match_operator_template():
+    """The order-search screen renders p.thumb_url / p.url from /order/<id>/photos."""
+    import re
+    cols = ['ID', 'ORDER_ID', 'ITEM_ID', 'PHOTO_MIME', 'PHOTO_SIZE', 'PHOTO_NAME',
+            'PHOTO_SHA256', 'HAS_THUMB', 'CREATED_AT']
+    rows = [(1, 9, None, 'image/jpeg', 100, 'a.jpg', 'a' * 64, 1, None),
+            (2, 9, None, 'image/png', 50, 'b.png', 'b' * 64, 0, None)]
+    with patch('controllers.nufarul_controller.DatabaseModel', return_value=FakeDB(rows, cols)):
+        result = NufarulController.get_order_photos(9)
+    assert result['success'] is True
+    first, second = result['data']
+    assert first['thumb_url'] == '/api/nufarul-operator/photo/1/thumb'
+    assert second['thumb_url'] == second['url'] == '/api/nufarul-operator/photo/2'
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    html = open(os.path.join(root, 'templates', 'nufarul_operator.html'), encoding='utf-8').read()
+    block = html[html.index("'/order/' + o.id + '/photos"):html.index("document.getElementById('backFromSearch')")]
+    read = set(re.findall(r"\bp\.(\w+)", block))
+    assert read and read <= set(first)
+    assert 'photo_blob' not in block
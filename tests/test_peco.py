@@ -0,0 +1,413 @@
+"""Tests for PECO fuel forecasting, trip packing and GPS telemetry."""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from models import peco_forecast as fc
+
+
+# ── forecast_gbt: presorted trainer vs the exact threshold search ──
+
+class _RefTree:
+    __slots__ = ('feat', 'thr', 'left', 'right', 'value')
+
+    def __init__(self):
+        self.feat, self.thr, self.left, self.right, self.value = None, 0.0, None, None, 0.0
+
+    def predict(self, x):
+        node = self
+        while node.feat is not None:
+            node = node.left if x[node.feat] <= node.thr else node.right
+        return node.value
+
+
+def _ref_tree(X, g, depth, min_leaf):
+    """The trainer forecast_gbt used before GbtMatrix: sort every feature per node."""
+    node = _RefTree()
+    node.value = sum(g) / len(g)
+    if depth <= 0 or len(g) < 2 * min_leaf:
+        return node
+    best = (0.0, None, 0.0)
+    total_sum, total_n = sum(g), len(g)
+    for f in range(len(X[0])):
+        left_sum, left_n, prev = 0.0, 0, None
+        for val, gv in sorted(zip((row[f] for row in X), g)):
+            if prev is not None and val != prev and left_n >= min_leaf \
+                    and total_n - left_n >= min_leaf:
+                right_sum, right_n = total_sum - left_sum, total_n - left_n
+                gain = (left_sum * left_sum / left_n + right_sum * right_sum / right_n
+                        - total_sum * total_sum / total_n)
+                if gain > best[0]:
+                    best = (gain, f, (val + prev) / 2.0)
+            left_sum += gv
+            left_n += 1
+            prev = val
+    if best[1] is None or best[0] <= 1e-12:
+        return node
+    node.feat, node.thr = best[1], best[2]
+    li = [i for i in range(len(X)) if X[i][node.feat] <= node.thr]
+    ri = [i for i in range(len(X)) if X[i][node.feat] > node.thr]
+    node.left = _ref_tree([X[i] for i in li], [g[i] for i in li], depth - 1, min_leaf)
+    node.right = _ref_tree([X[i] for i in ri], [g[i] for i in ri], depth - 1, min_leaf)
+    return node
+
+
+def _ref_forecast_gbt(series, weekdays, horizon, future_wd,
+                      rounds=60, depth=3, lr=0.1, min_leaf=3):
+    X = [fc._features(series, weekdays, i) for i in range(14, len(series))]
+    y = [float(series[i]) for i in range(14, len(series))]
+    base = sum(y) / len(y)
+    pred, trees = [base] * len(y), []
+    for _ in range(rounds):
+        tree = _ref_tree(X, [y[i] - pred[i] for i in range(len(y))], depth, min_leaf)
+        trees.append(tree)
+        for i in range(len(y)):
+            pred[i] += lr * tree.predict(X[i])
+    hist, wds, out = [float(v) for v in series], [int(w) for w in weekdays], []
+    for h in range(horizon):
+        wds.append(int(future_wd[h]))
+        feat = fc._features(hist + [0.0], wds, len(hist))
+        val = max(0.0, base + sum(lr * t.predict(feat) for t in trees))
+        out.append(val)
+        hist.append(val)
+    return out
+
+
+def _tank_series(seed, days=134):
+    rnd = random.Random(seed)
+    level, trend = rnd.uniform(800, 6000), rnd.uniform(-2, 4)
+    week = [rnd.uniform(0.8, 1.25) for _ in range(7)]
+    series = [max(0.0, round((level + trend * i) * week[i % 7] * rnd.gauss(1, 0.12), 1))
+              for i in range(days)]
+    return series, [i % 7 for i in range(days)]
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_forecast_gbt_matches_exact_trainer(seed):
+    series, weekdays = _tank_series(seed)
+    future_wd = [(len(series) + h) % 7 for h in range(7)]
+    got = fc.forecast_gbt(series, weekdays, 7, future_wd)['daily']
+    want = _ref_forecast_gbt(series, weekdays, 7, future_wd)
+    assert max(abs(a - b) for a, b in zip(got, want)) <= 1e-9 * max(1.0, max(want))
+
+
+def test_gbt_backtest_shared_matrix_matches_exact_trainer_per_fold():
+    series, weekdays = _tank_series(42, days=110)
+    res = fc.backtest('gbt', series, weekdays, horizon=3, folds=3)
+    assert res['preds']
+    for cut, pred in res['preds'].items():
+        want = sum(_ref_forecast_gbt(series[:cut], weekdays[:cut], 3, weekdays[cut:cut + 3]))
+        assert abs(pred - want) <= 1e-9 * max(1.0, want)
+
+
+# ── pack_fleet on generated fleets ──────────────────────────
+
+from models.peco_packing import pack_fleet
+from scripts.bench_peco_packing import legacy, synth
+
+
+def _check_plan(res, comps_by_truck, max_stations):
+    """Every section used once and only in its own truck, liters exact, stations capped."""
+    used, seen = set(), set()
+    for truck, load in res['loads']:
+        own = {c['id'] for c in comps_by_truck[truck['id']]}
+        assert len({it['station_id'] for it, _c in load}) <= max_stations
+        for it, cs in load:
+            assert it['item_id'] not in seen
+            seen.add(it['item_id'])
+            assert abs(sum(c['volume_l'] for c in cs) - it['liters_order']) <= 1e-6
+            for c in cs:
+                assert c['id'] in own and c['id'] not in used
+                used.add(c['id'])
+    assert seen == set(res['assigned'])
+
+
+@pytest.mark.parametrize("trucks,seed", [(6, 0), (6, 1), (12, 0), (12, 1), (24, 2)])
+def test_pack_fleet_valid_and_not_worse_than_legacy(trucks, seed):
+    fleet, comps, items = synth(trucks, 1.3, seed)
+    old = legacy(items, fleet, comps, 3)
+    new = pack_fleet(items, fleet, comps, 3, time_budget=2.0)
+    _check_plan(new, comps, 3)
+    assert new['liters'] >= old['liters'] - 1e-6
+    assert new['liters'] <= new['bound'] + 1e-6
+
+
+def test_pack_fleet_stops_on_plateau_before_the_budget():
+    fleet, comps, items = synth(12, 1.3, 0)
+    res = pack_fleet(items, fleet, comps, 3, time_budget=5.0, plateau=4)
+    assert not res['timed_out'] and res['elapsed_sec'] < 1.0
+    assert 5 <= res['starts'] <= 200
+    full = pack_fleet(items, fleet, comps, 3, time_budget=0.3, plateau=0)
+    assert full['starts'] > res['starts'] or full['liters'] == full['bound']
+
+
+# ── peco_gps: ingest and incremental analysis ──
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from models import peco_gps
+
+
+class _GpsCursor:
+    """Cursor for the GPS writes: pings with UX_PECO_PINGS_TRUCK_TS, events, trip state."""
+
+    def __init__(self, db):
+        self.db = db
+        self.errors = []
+
+    def setinputsizes(self, *types):
+        pass
+
+    def executemany(self, sql, rows, batcherrors=False):
+        if sql.startswith("INSERT INTO PECO_GPS_EVENTS"):
+            self.db.events.extend(rows)
+            return
+        for i, row in enumerate(rows):
+            if row[2] is None or (row[0], row[2]) in {(p[0], p[2]) for p in self.db.pings}:
+                self.errors.append(SimpleNamespace(offset=i, code=1, message="ORA-00001"))
+                continue
+            self.db.pings.append(row)
+
+    def getbatcherrors(self):
+        return self.errors
+
+    def execute(self, sql, params):
+        assert sql.startswith("MERGE INTO PECO_GPS_TRIP_STATE")
+        old = self.db.state.get(params["p_tr"])
+        self.db.state[params["p_tr"]] = {
+            "watermark_id": params["p_wm"], "state_json": params["p_st"],
+            "pings_seen": (old["pings_seen"] if old else 0) + params["p_n"]}
+
+
+class FakeGpsDb:
+    """DatabaseModel over PECO_GPS_PINGS / _EVENTS / _TRIP_STATE of one trip (10, truck 1)."""
+
+    def __init__(self):
+        self.pings = []
+        self.events = []
+        self.state = {}
+        self.connection = SimpleNamespace(cursor=lambda: _GpsCursor(self), commit=lambda: None)
+
+    def __call__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_ping(self, minute, speed=50.0):
+        self.pings.append((1, 10, datetime(2026, 8, 20, 10, 0) + timedelta(minutes=minute),
+                           47.0, 28.8, speed))
+
+    def _trip_pings(self):
+        return [{"id": i + 1, "ts": p[2], "lat": p[3], "lon": p[4], "speed_kmh": p[5],
+                 "ignition": 1, "seal_closed": 1} for i, p in enumerate(self.pings)]
+
+    def execute_query(self, sql, params=None):
+        params = params or {}
+        if sql.startswith("DELETE FROM PECO_GPS_TRIP_STATE"):
+            self.state.clear()
+            return {"success": True}
+        if sql.startswith("SELECT EVENT_TYPE, TS FROM PECO_GPS_EVENTS"):
+            return {"success": True, "columns": ["EVENT_TYPE", "TS"],
+                    "data": [(e[2], e[4]) for e in self.events]}
+        if sql.startswith("SELECT t.ID"):
+            st = self.state.get(10)
+            wm = st["watermark_id"] if st else None
+            if not any(wm is None or p["id"] > wm for p in self._trip_pings()):
+                return {"success": True, "columns": [], "data": []}
+            return {"success": True,
+                    "columns": ["ID", "TRUCK_ID", "DEPOT_ID", "WATERMARK_ID", "STATE_JSON"],
+                    "data": [(10, 1, None, wm, st["state_json"] if st else None)]}
+        assert sql.startswith("SELECT ID, TS") and sql.endswith("ORDER BY TS, ID")
+        rows = [p for p in self._trip_pings() if "p_wm" not in params or p["id"] > params["p_wm"]]
+        rows.sort(key=lambda p: (p["ts"], p["id"]))
+        cols = ["ID", "TS", "LAT", "LON", "SPEED_KMH", "IGNITION", "SEAL_CLOSED"]
+        return {"success": True, "columns": cols, "data": [tuple(p[c.lower()] for c in cols) for p in rows]}
+
+
+@pytest.fixture
+def gps_db(monkeypatch):
+    fake = FakeGpsDb()
+    monkeypatch.setattr(peco_gps, "DatabaseModel", fake)
+    monkeypatch.setattr(peco_gps, "_device_lookup", lambda db, missing=False: ({"dev-1": 1}, {1: 10}))
+    monkeypatch.setattr(peco_gps, "_corridor", lambda db, tid, depot: peco_gps.CorridorIndex([]))
+    return fake
+
+
+def test_ingest_gives_each_ping_without_ts_its_own_time(gps_db):
+    batch = {"pings": [{"device_id": "dev-1", "lat": 47.0, "lon": 28.8 + i / 100} for i in range(3)]}
+    res = peco_gps.PecoGps.ingest({"id": 7}, batch)
+    assert res["success"] and res["accepted"] == 3 and res["duplicates"] == 0
+    stamps = [p[2] for p in gps_db.pings]
+    assert len(set(stamps)) == 3 and stamps == sorted(stamps)
+
+    # a ping with a provider ts is still deduplicated on (truck, ts)
+    timed = {"pings": [{"device_id": "dev-1", "ts": "2026-08-20T10:15:00", "lat": 47.0, "lon": 28.8}]}
+    assert peco_gps.PecoGps.ingest({"id": 7}, timed)["accepted"] == 1
+    assert peco_gps.PecoGps.ingest({"id": 7}, timed)["duplicates"] == 1
+
+
+def test_analyze_does_not_skip_a_late_ping(gps_db):
+    for minute in range(3):
+        gps_db.add_ping(minute)
+    gps_db.add_ping(3, speed=120.0)
+    res = peco_gps.PecoGps.analyze()
+    assert res["success"] and res["pings"] == 4 and len(gps_db.events) == 1
+    assert peco_gps.PecoGps.analyze()["trips"] == 0             # nothing new since the watermark
+
+    # the provider sends a ping older than everything analysed so far
+    gps_db.add_ping(-5, speed=130.0)
+    res = peco_gps.PecoGps.analyze()
+    assert res["success"] and res["trips"] == 1 and res["events"] == 1
+    assert sorted(e[4].minute for e in gps_db.events) == [3, 55]   # the old event is not repeated
+    assert gps_db.state[10]["watermark_id"] == 5 and gps_db.state[10]["pings_seen"] == 5
+
+    gps_db.add_ping(4)
+    res = peco_gps.PecoGps.analyze()                               # in order again: no replay
+    assert res["pings"] == 1 and res["events"] == 0
+
+
+# ── peco_autoorder: run status ──
+
+from models import peco_autoorder
+from models.peco_autoorder import FuelAutoOrder
+
+
+class _RunsCursor:
+    def __init__(self, runs):
+        self.runs = runs
+
+    def execute(self, sql, params=None):
+        if sql.startswith("INSERT INTO PECO_ORDER_RUNS"):
+            params["p_id"].value = len(self.runs) + 1
+            self.runs[params["p_id"].value] = {"status": params["p_s"], "stage": params["p_st"]}
+
+    def fetchone(self):
+        return (1,)
+
+    def var(self, typ):
+        out = SimpleNamespace(value=None)
+        out.getvalue = lambda: [out.value]
+        return out
+
+
+class _RunsDb:
+    """PECO_ORDER_RUNS rows behind both the cursor API and execute_query."""
+
+    def __init__(self):
+        self.runs = {}
+        self.connection = SimpleNamespace(cursor=lambda: _RunsCursor(self.runs),
+                                          commit=lambda: None, close=lambda: None)
+
+    def execute_query(self, sql, params):
+        run = self.runs[params["p_id"]]
+        if "SET STAGE" in sql:
+            run["stage"] = params["p_st"]
+            if run["status"] == "queued" and "WHEN 'queued' THEN 'running'" in sql:
+                run["status"] = "running"
+        elif run["status"] == "running" or (
+                run["status"] == "queued" and "STATUS IN ('queued', 'running')" in sql):
+            run["status"] = params["p_st"]
+        return {"success": True}
+
+
+def test_queued_autoorder_run_turns_running_when_the_worker_starts(monkeypatch):
+    db = _RunsDb()
+    jobs = []
+    monkeypatch.setattr(peco_autoorder.DatabaseConnection, "get_connection", lambda: db.connection)
+    monkeypatch.setattr(peco_autoorder.run_queue, "enqueue", lambda cur, engine, run_id, *a: jobs.append(run_id))
+    monkeypatch.setattr(FuelAutoOrder, "_prepare", staticmethod(lambda params: {"success": True, "p": {}}))
+
+    res = FuelAutoOrder.launch({}, "op")
+    assert res["queued"] and jobs == [res["run_id"]]
+    assert db.runs[res["run_id"]] == {"status": "queued", "stage": "queued"}
+    FuelAutoOrder._stage(db, res["run_id"], "load", 3)
+    assert db.runs[res["run_id"]] == {"status": "running", "stage": "load"}
+
+    # a queued run that fails before its first stage is still closed
+    res = FuelAutoOrder.launch({}, "op")
+    FuelAutoOrder._close_run(db, res["run_id"], "failed", "no data")
+    assert db.runs[res["run_id"]]["status"] == "failed"
+
+
+# ── peco_plan: tank history store ──
+
+from datetime import date
+
+from models import peco_plan
+
+
+class _DailyDb:
+    """PECO_TANK_DAILY rows with an ORA_ROWSCN that every write raises."""
+
+    def __init__(self, days=40):
+        self.scn = 100
+        self.rows = {}
+        start = date(2026, 8, 1)
+        for i in range(days):
+            self.write(1, start + timedelta(days=i), 1000.0 + i)
+
+    def write(self, tank, day, liters):
+        self.scn += 1
+        self.rows[(tank, day)] = {"liters": liters, "scn": self.scn}
+
+    def execute_query(self, sql, params=None):
+        params = params or {}
+        if sql.startswith("SELECT MAX(ORA_ROWSCN)"):
+            return {"success": True, "columns": ["SCN", "CNT", "LAST_DATE"],
+                    "data": [(self.scn, len(self.rows), max(d for _t, d in self.rows))]}
+        cols = ["TANK_ID", "GRADE_CODE", "SALE_DATE", "LITERS"]
+        picked = [(t, "DT", d, r["liters"]) for (t, d), r in sorted(self.rows.items())
+                  if "p_scn" not in params or r["scn"] > params["p_scn"]]
+        return {"success": True, "columns": cols, "data": picked}
+
+
+def test_history_store_picks_up_an_update_of_an_old_day():
+    db, store = _DailyDb(), peco_plan.TankHistoryStore()
+    series = store.history(db, 60)[1]["series"]
+    assert series[0] == 1000.0 and store.version == 1
+
+    db.write(1, date(2026, 8, 1), 5.0)                    # loader corrects the first day
+    assert store.history(db, 60)[1]["series"][0] == 5.0
+    assert store.version == 2
+    store.history(db, 60)
+    assert store.version == 2                             # unchanged stamp: nothing re-read
+
+
+def _double(task):
+    return task[0] * 2
+
+
+def test_pool_map_finishes_inline_when_the_pool_breaks(monkeypatch):
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+
+    class BrokenAfterThree:
+        def __init__(self, max_workers):
+            self.n = 0
+
+        def submit(self, fn, task):
+            f = Future()
+            self.n += 1
+            if self.n <= 3:
+                f.set_result(fn(task))
+            else:
+                f.set_exception(BrokenProcessPool("worker died"))
+            return f
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    monkeypatch.setattr(peco_plan, "ProcessPoolExecutor", BrokenAfterThree)
+    tasks = [(i,) for i in range(20)]
+    got = list(peco_plan.pool_map(_double, tasks, workers=4))
+    assert sorted(got) == [i * 2 for i in range(20)]          # each task exactly once
+    assert got[-5:] == [30, 32, 34, 36, 38]                   # the rest inline, in task order
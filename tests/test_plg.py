@@ -0,0 +1,316 @@
+"""Tests for the PLG data generator, run queue, behaviour index and voice matcher."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from models import plg_datagen
+from models.plg_datagen import DataGenerator
+
+
+class FakeConn:
+    """Records the calls a generator makes on its Oracle connection."""
+    def __init__(self):
+        self.calls = []
+
+    def cursor(self):
+        conn = self
+        class _Cur:
+            rowcount = 1
+            def execute(self, sql, params=None):
+                conn.calls.append(("execute", sql.split()[0] + " " + sql.split()[1], params))
+            def setinputsizes(self, **kw):
+                pass
+        return _Cur()
+
+    def commit(self):
+        self.calls.append(("commit",))
+
+    def rollback(self):
+        self.calls.append(("rollback",))
+
+
+def _gen(workers=1):
+    g = DataGenerator(1, 2, {"workers": workers}, ["network"])
+    g.conn = FakeConn()
+    return g
+
+
+# ── _finish ──────────────────────────────────────────────────
+
+@pytest.mark.parametrize("status", ["cancelled", "failed"])
+def test_finish_rolls_back_partial_unit_before_status(status):
+    g = _gen()
+    g._checkpoint(None, 0)
+    g.rows += 40                                # written, not yet checkpointed
+    g.conn.calls.clear()
+    g._finish(status, "x")
+    kinds = [c[0] for c in g.conn.calls]
+    assert kinds[0] == "rollback" and kinds[-1] == "commit"
+    assert g.conn.calls[1][2]["p_rows"] == 0    # ROWS_WRITTEN back at the checkpoint
+
+
+def test_finish_done_keeps_the_transaction():
+    g = _gen()
+    g.rows = 7
+    g._finish("done")
+    assert ("rollback",) not in g.conn.calls
+    assert g.conn.calls[0][2]["p_rows"] == 7
+
+
+# ── _shard_map ───────────────────────────────────────────────
+
+def _square(x):
+    return x * x
+
+
+def test_shard_map_inline_when_pool_unavailable(monkeypatch):
+    monkeypatch.setattr(plg_datagen, "_process_pool", lambda workers: None)
+    assert list(_gen(workers=4)._shard_map(_square, range(6))) == [0, 1, 4, 9, 16, 25]
+
+
+def test_shard_map_finishes_inline_when_pool_breaks(monkeypatch):
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+
+    class BrokenAfterTwo:
+        def __init__(self):
+            self.n = 0
+        def submit(self, fn, task):
+            f = Future()
+            self.n += 1
+            if self.n <= 2:
+                f.set_result(fn(task))
+            else:
+                f.set_exception(BrokenProcessPool("worker died"))
+            return f
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    monkeypatch.setattr(plg_datagen, "_process_pool", lambda workers: BrokenAfterTwo())
+    assert list(_gen(workers=2)._shard_map(_square, range(50))) == [x * x for x in range(50)]
+
+
+# ── behaviour index from PLG_AI_VECTOR_INDEX ─────────────────
+
+def test_get_index_loads_index_back_from_stored_blob():
+    import oracledb
+    from models import plg_vector_index as pvi
+
+    built = pvi.BehaviorIndex.build(
+        [(pid, pid % 3, [pid % 5 + 1.0, pid % 7 + 0.5, (pid * 13) % 11 + 0.1]) for pid in range(1, 60)])
+    stored = built.to_bytes()
+
+    class Blob:                                  # LOB locator: what a plain fetch returns
+        def read(self):
+            return stored
+
+    class Cursor:
+        arraysize = 100
+        outputtypehandler = None
+        def var(self, type_, arraysize):
+            self.var_type = type_
+            return "var"
+        def execute(self, sql, params):
+            assert params == {"p_run": 11, "p_st": 5}
+            meta = type("Meta", (), {"type_code": oracledb.DB_TYPE_BLOB})()
+            self.handler_used = self.outputtypehandler is not None \
+                and self.outputtypehandler(self, meta) == "var" \
+                and self.var_type is oracledb.DB_TYPE_LONG_RAW
+        def fetchone(self):
+            return (stored if self.handler_used else Blob(),)
+        def close(self):
+            pass
+
+    class DB:
+        def __init__(self):
+            self.connection = type("Conn", (), {"cursor": lambda s: Cursor()})()
+        def execute_query(self, *a, **kw):       # text-mode LOBs: must not be used here
+            raise AssertionError("BLOB read through execute_query")
+
+    pvi._cache.clear()
+    idx = pvi.get_index(DB(), 11, 5)
+    assert idx is not None and list(idx.ids) == list(built.ids)
+    assert idx.search(built.vector_of(7), 3) == built.search(built.vector_of(7), 3)
+    assert pvi.get_index(None, 11, 5) is idx     # served from the process cache
+
+
+# ── run queue: claim / cancel / heartbeat / finish ───────────
+
+from models import run_queue
+
+
+class ScriptedConn:
+    """
+    Connection whose cursor answers by SQL prefix: handlers[prefix] is
+    (rows, rowcount) or a callable(params) returning that.
+    """
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.sql = []
+        self.commits = self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        conn = self
+        class _Cur:
+            rowcount = 0
+            _rows = []
+            def execute(self, sql, params=None):
+                text = " ".join(sql.split())
+                conn.sql.append((text, params))
+                for prefix, h in conn.handlers.items():
+                    if text.startswith(prefix):
+                        rows, self.rowcount = h(params) if callable(h) else h
+                        self._rows = list(rows)
+                        return
+                self._rows, self.rowcount = [], 0
+            def fetchall(self):
+                return self._rows
+            def fetchone(self):
+                return self._rows.pop(0) if self._rows else None
+        return _Cur()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def _claim_conn(candidates, updated):
+    """candidates — queued rows in claim order; updated(job_id) -> rows changed."""
+    queue = list(candidates)
+    return ScriptedConn({
+        "SELECT ENGINE, MAX_RUNNING FROM PLG_JOB_LIMITS": ([("forecast", 1), ("datagen", 1)], 0),
+        "SELECT ENGINE, COUNT(*) FROM PLG_JOB_QUEUE": ([("datagen", 1)], 0),
+        "SELECT ID, ENGINE, RUN_ID, PAYLOAD_JSON": lambda p: ([queue.pop(0)] if queue else [], 0),
+        "UPDATE PLG_JOB_QUEUE SET STATUS = 'running'": lambda p: ([], updated(p["p_id"])),
+    })
+
+
+def test_claim_takes_job_for_engine_with_free_slot():
+    conn = _claim_conn([(7, "forecast", 70, '{"h": 1}')], lambda job_id: 1)
+    job = run_queue.claim(conn, "w1", ["forecast", "datagen"])
+    assert job == {"id": 7, "engine": "forecast", "run_id": 70, "payload": {"h": 1}}
+    assert conn.commits == 1 and conn.rollbacks == 0
+    cand = [p for s, p in conn.sql if s.startswith("SELECT ID, ENGINE")][0]
+    assert set(cand.values()) == {"forecast"}           # datagen is at its limit
+
+
+def test_claim_skips_job_cancelled_between_select_and_update():
+    conn = _claim_conn([(7, "forecast", 70, None), (8, "forecast", 80, None)],
+                       lambda job_id: 0 if job_id == 7 else 1)
+    job = run_queue.claim(conn, "w1", ["forecast"])
+    assert job["id"] == 8 and job["payload"] == {}
+
+
+def test_claim_returns_none_when_every_candidate_is_taken():
+    conn = _claim_conn([(7, "forecast", 70, None)], lambda job_id: 0)
+    assert run_queue.claim(conn, "w1", ["forecast"]) is None
+    assert conn.commits == 0 and conn.rollbacks == 1
+
+
+def test_claim_without_free_slot_does_not_look_at_the_queue():
+    conn = ScriptedConn({
+        "SELECT ENGINE, MAX_RUNNING FROM PLG_JOB_LIMITS": ([("forecast", 1)], 0),
+        "SELECT ENGINE, COUNT(*) FROM PLG_JOB_QUEUE": ([("forecast", 1)], 0),
+    })
+    assert run_queue.claim(conn, "w1", ["forecast"]) is None
+    assert conn.rollbacks == 1 and len(conn.sql) == 2
+
+
+def test_request_cancel_queued_job_closes_the_run(monkeypatch):
+    conn = ScriptedConn({"UPDATE PLG_JOB_QUEUE SET STATUS = 'cancelled'": ([], 1),
+                         "UPDATE PLG_FCT_RUNS SET STATUS = 'cancelled'": ([], 1)})
+    monkeypatch.setattr(run_queue.DatabaseConnection, "get_connection", lambda: conn)
+    assert run_queue.request_cancel("forecast", 70) is True
+    assert [s.split(" SET")[0] for s, _ in conn.sql] == ["UPDATE PLG_JOB_QUEUE", "UPDATE PLG_FCT_RUNS"]
+    assert conn.commits == 1 and conn.closed
+
+
+def test_request_cancel_running_job_sets_flag(monkeypatch):
+    flagged = ScriptedConn({"UPDATE PLG_JOB_QUEUE SET CANCEL_REQUESTED = 1": ([], 1)})
+    monkeypatch.setattr(run_queue.DatabaseConnection, "get_connection", lambda: flagged)
+    assert run_queue.request_cancel("datagen", 5) is True
+    idle = ScriptedConn({})
+    monkeypatch.setattr(run_queue.DatabaseConnection, "get_connection", lambda: idle)
+    assert run_queue.request_cancel("datagen", 5) is False
+
+
+def test_heartbeat_reports_cancel_requests_and_finish_closes_orphan_run():
+    conn = ScriptedConn({"SELECT ID FROM PLG_JOB_QUEUE WHERE CANCEL_REQUESTED": ([(3,)], 0)})
+    assert run_queue.heartbeat(conn, [3, 4]) == {3}
+    conn = ScriptedConn({"SELECT STATUS FROM PLG_GEN_RUNS": ([("running",)], 0)})
+    run_queue.finish(conn, {"id": 3, "engine": "datagen", "run_id": 30})
+    assert conn.sql[1][0].startswith("UPDATE PLG_GEN_RUNS SET STATUS = 'failed'")
+    assert conn.sql[2][1]["p_st"] == "failed" and conn.commits == 1
+
+
+# ── voice orders: matcher and its cache ──
+
+from controllers import plg_mobile_controller
+from controllers.plg_mobile_controller import PlgMobileController
+from models import plg_voice
+
+CATALOGUE = [
+    {"id": 1, "name_ru": "Молоко домашнее 3.2%", "category_id": 1},
+    {"id": 2, "name_ru": "Хлеб белый", "category_id": 2},
+    {"id": 3, "name_ru": "Сыр твёрдый", "category_id": 1},
+    {"id": 4, "name_ru": "Яблоки красные", "category_id": 3},
+]
+
+
+def test_match_pads_options_with_zero_scores_in_catalogue_order():
+    best, score, options = plg_voice.ProductMatcher(CATALOGUE).match("молоко")
+    assert best["id"] == 1 and score > 50
+    assert sorted(o["id"] for o in options) == [1, 2, 3, 4]
+    zero = [o["id"] for o in options if o["score"] == 0.0]
+    assert zero and zero == sorted(zero) and options[-len(zero):] == [o for o in options if o["id"] in zero]
+
+    best, score, options = plg_voice.ProductMatcher(CATALOGUE).match("кзщ")
+    assert best["id"] == 1 and score == 0.0 and len(options) == 4
+
+
+class _VoiceDb:
+    def __init__(self):
+        self.connection = type("Conn", (), {"commit": lambda self: None})()
+
+    def execute_query(self, sql, params=None):
+        if sql.startswith("SELECT SOURCE_TEXT"):
+            return {"success": True, "columns": ["SOURCE_TEXT"], "data": [("помидоры 2 кг",)]}
+        return {"success": True}
+
+
+def test_learned_synonym_rebuilds_only_the_store_it_came_from(monkeypatch):
+    loads = []
+
+    def loader(store_id, lang):
+        loads.append(store_id)
+        return CATALOGUE, []
+
+    monkeypatch.setattr(plg_voice, "_matchers", {})
+    monkeypatch.setattr(PlgMobileController, "_load_matcher_data", staticmethod(loader))
+    monkeypatch.setattr(PlgMobileController, "warm_matchers",
+                        staticmethod(lambda store_id=None, background=True:
+                                     PlgMobileController._store_matcher(store_id, "ru")))
+    for store in (1, 2):
+        PlgMobileController._store_matcher(store, "ru")
+    PlgMobileController._learn_synonym(_VoiceDb(), 9, 4, "ru", 2)
+    assert loads == [1, 2, 2]
+    assert set(plg_voice._matchers) == {(1, "ru"), (2, "ru")}
+
+
+def test_matchers_are_warmed_on_first_device_use_not_at_import(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(plg_mobile_controller, "_warm_started", False)
+    monkeypatch.setattr(PlgMobileController, "warm_matchers",
+                        staticmethod(lambda store_id=None, background=True: warmed.append(store_id)))
+    PlgMobileController.warm_on_first_use()
+    PlgMobileController.warm_on_first_use()
+    assert warmed == [None]